@@ -1,15 +1,17 @@
 from rest_framework import serializers
-from django.db.models import Sum
 
 from apps.accounting.accountingsettings.models import ChartOfAccounts
 from apps.accounting.accountingsettings.models.chart_of_account import CHART_OF_ACCOUNT_TYPE
-from apps.accounting.journalentry.models import JournalEntryLine
 
 
 class ChartOfAccountTreeNodeSerializer(serializers.ModelSerializer):
     children = serializers.SerializerMethodField()
+    opening_debit = serializers.SerializerMethodField()
+    opening_credit = serializers.SerializerMethodField()
     total_debit = serializers.SerializerMethodField()
     total_credit = serializers.SerializerMethodField()
+    closing_debit = serializers.SerializerMethodField()
+    closing_credit = serializers.SerializerMethodField()
     acc_type_name = serializers.SerializerMethodField()
 
     class Meta:
@@ -23,8 +25,12 @@ class ChartOfAccountTreeNodeSerializer(serializers.ModelSerializer):
             'acc_type_name',
             'level',
             'has_child',
+            'opening_debit',
+            'opening_credit',
             'total_debit',
             'total_credit',
+            'closing_debit',
+            'closing_credit',
             'children'
         )
 
@@ -33,21 +39,27 @@ class ChartOfAccountTreeNodeSerializer(serializers.ModelSerializer):
         children_obj = children_map.get(obj.id, [])
         return ChartOfAccountTreeNodeSerializer(children_obj, many=True, context=self.context).data
 
-    @classmethod
-    def get_total_debit(cls, obj):
-        result = JournalEntryLine.objects.filter(
-            account=obj,
-            journal_entry__je_state=1
-        ).aggregate(total=Sum('debit'))
-        return result['total'] or 0
+    def get_balance(self, obj, key):
+        # trial_balance: kết quả TrialBalanceEngine.run() do view truyền vào context
+        return self.context.get('trial_balance', {}).get(obj.id, {}).get(key, 0)
 
-    @classmethod
-    def get_total_credit(cls, obj):
-        result = JournalEntryLine.objects.filter(
-            account=obj,
-            journal_entry__je_state=1
-        ).aggregate(total=Sum('credit'))
-        return result['total'] or 0
+    def get_opening_debit(self, obj):
+        return self.get_balance(obj, 'opening_debit')
+
+    def get_opening_credit(self, obj):
+        return self.get_balance(obj, 'opening_credit')
+
+    def get_total_debit(self, obj):
+        return self.get_balance(obj, 'total_debit')
+
+    def get_total_credit(self, obj):
+        return self.get_balance(obj, 'total_credit')
+
+    def get_closing_debit(self, obj):
+        return self.get_balance(obj, 'closing_debit')
+
+    def get_closing_credit(self, obj):
+        return self.get_balance(obj, 'closing_credit')
 
     @classmethod
     def get_acc_type_name(cls, obj):
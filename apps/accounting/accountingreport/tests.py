@@ -1,3 +1,79 @@
+import datetime
+
 from django.test import TestCase
 
-# Create your tests here.
+from apps.accounting.accountingreport.utils.trial_balance import TrialBalanceEngine
+from apps.accounting.accountingsettings.models import ChartOfAccounts
+from apps.accounting.journalentry.models import JournalEntry, JournalEntryLine
+from apps.core.company.models import Company
+from apps.core.tenant.models import Tenant
+from apps.shared.extends.tests import bulk_new
+
+
+class TrialBalanceEngineTestCase(TestCase):
+    def setUp(self):
+        tenant = bulk_new(Tenant, title='Tenant', code='TENANT_TB')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_TB', tenant=tenant)
+        self.common = {'tenant': tenant, 'company': self.company}
+        self.parent = self.new_account('131', level=1)
+        self.child_1 = self.new_account('1311', level=2, parent_account=self.parent)
+        self.child_2 = self.new_account('1312', level=2, parent_account=self.parent)
+        self.je_obj = bulk_new(JournalEntry, sub_period_order=1, **self.common)
+
+    def new_account(self, acc_code, **kwargs):
+        return bulk_new(
+            ChartOfAccounts, acc_code=acc_code, acc_name=acc_code, foreign_acc_name=acc_code, acc_type=1,
+            **kwargs, **self.common,
+        )
+
+    def new_line(self, account, posting_date, debit=0, credit=0, je_state=1):
+        return bulk_new(
+            JournalEntryLine, journal_entry=self.je_obj, account=account, debit=debit, credit=credit,
+            je_state=je_state, posting_date=datetime.datetime.fromisoformat(posting_date), **self.common,
+        )
+
+    def test_run(self):
+        # trước kỳ: 1311 dư nợ 100, 1312 dư có 30
+        self.new_line(self.child_1, '2026-01-10', debit=100)
+        self.new_line(self.child_2, '2026-01-15', credit=30)
+        # trong kỳ
+        self.new_line(self.child_1, '2026-02-05', credit=20)
+        self.new_line(self.child_2, '2026-02-20', debit=50)
+        # bút toán nháp / sau kỳ không tính
+        self.new_line(self.child_1, '2026-02-06', debit=999, je_state=0)
+        self.new_line(self.child_2, '2026-03-01', debit=999)
+
+        result = TrialBalanceEngine(company_id=self.company.id, from_date='2026-02-01', to_date='2026-02-28').run()
+        self.assertEqual(
+            {
+                account_id: tuple(data[key] for key in TrialBalanceEngine.COLUMNS)
+                for account_id, data in result.items()
+            },
+            {
+                self.child_1.id: (100, 0, 0, 20, 80, 0),
+                self.child_2.id: (0, 30, 50, 0, 20, 0),
+                # tài khoản cha: số dư ròng của tổng phát sinh tài khoản con (100 nợ - 30 có), không cộng số dư con
+                self.parent.id: (70, 0, 50, 20, 100, 0),
+            }
+        )
+
+    def test_run_without_period(self):
+        self.new_line(self.child_1, '2026-01-10', debit=100)
+        self.new_line(self.child_2, '2026-02-20', credit=130)
+
+        result = TrialBalanceEngine(company_id=self.company.id).run()
+        self.assertEqual(result[self.parent.id]['opening_debit'], 0)
+        self.assertEqual((result[self.parent.id]['total_debit'], result[self.parent.id]['total_credit']), (100, 130))
+        self.assertEqual((result[self.parent.id]['closing_debit'], result[self.parent.id]['closing_credit']), (0, 30))
+
+    def test_run_day_boundary(self):
+        # from_date / to_date là ngày: giờ trong ngày to_date vẫn thuộc kỳ, 00:00 from_date không thuộc đầu kỳ
+        self.new_line(self.child_1, '2026-01-31T23:59', debit=10)
+        self.new_line(self.child_1, '2026-02-01T00:00', debit=20)
+        self.new_line(self.child_1, '2026-02-28T23:30', debit=40)
+        self.new_line(self.child_1, '2026-03-01T00:00', debit=999)
+
+        result = TrialBalanceEngine(company_id=self.company.id, from_date='2026-02-01', to_date='2026-02-28').run()
+        self.assertEqual(
+            tuple(result[self.child_1.id][key] for key in TrialBalanceEngine.COLUMNS), (10, 0, 60, 0, 70, 0)
+        )
@@ -0,0 +1 @@
+from .trial_balance import *
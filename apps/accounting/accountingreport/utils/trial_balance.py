@@ -0,0 +1,148 @@
+import datetime
+
+from django.db.models import Sum, Q, Max
+
+from apps.accounting.accountingsettings.models import ChartOfAccounts
+from apps.accounting.journalentry.models import JournalEntryLine
+from apps.masterdata.saledata.models.periods import Periods, SubPeriods
+
+__all__ = ['TrialBalanceEngine']
+
+
+class TrialBalanceEngine:
+    """
+    Bảng cân đối số phát sinh theo hệ thống tài khoản:
+        - 1 query group theo account trên các dòng bút toán đã ghi sổ (je_state=1):
+          phát sinh trước kỳ (đầu kỳ) + phát sinh trong kỳ
+        - Cộng dồn từ tài khoản con lên tài khoản cha trong bộ nhớ
+        - Số dư đầu kỳ / cuối kỳ tính theo số dư ròng (nợ - có) của từng tài khoản
+    Kỳ lọc theo: sub_period > period > from_date/to_date (from_date/to_date ghi đè khi có).
+    Không truyền kỳ => toàn bộ phát sinh nằm trong kỳ.
+    """
+    COLUMNS = ('opening_debit', 'opening_credit', 'total_debit', 'total_credit', 'closing_debit', 'closing_credit')
+
+    def __init__(self, company_id, period_id=None, sub_period_id=None, from_date=None, to_date=None):
+        self.company_id = company_id
+        self.from_date, self.to_date = self.get_date_range(
+            company_id=company_id, period_id=period_id, sub_period_id=sub_period_id,
+        )
+        self.from_date = self.parse_date(from_date) or self.from_date
+        self.to_date = self.parse_date(to_date) or self.to_date
+
+    @staticmethod
+    def parse_date(value) -> datetime.date | None:
+        if not value:
+            return None
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        if isinstance(value, datetime.date):
+            return value
+        try:
+            return datetime.date.fromisoformat(str(value)[:10])
+        except ValueError:
+            return None
+
+    @staticmethod
+    def start_of_day(value) -> datetime.datetime:
+        # kỳ [from_date, to_date] => posting_date trong [đầu ngày from_date, đầu ngày sau to_date)
+        return datetime.datetime.combine(value, datetime.time.min)
+
+    @staticmethod
+    def get_date_range(company_id, period_id=None, sub_period_id=None) -> tuple:
+        if sub_period_id:
+            sub_period_obj = SubPeriods.objects.filter(
+                id=sub_period_id, period_mapped__company_id=company_id
+            ).first()
+            if sub_period_obj:
+                return sub_period_obj.start_date, sub_period_obj.end_date
+        if period_id:
+            period_obj = Periods.objects.filter(id=period_id, company_id=company_id).first()
+            if period_obj:
+                end_date = period_obj.end_date or period_obj.sub_periods_period_mapped.aggregate(
+                    end_date=Max('end_date')
+                )['end_date']
+                return period_obj.start_date, end_date
+        return None, None
+
+    def get_account_amount(self) -> dict:
+        """
+        Phát sinh nợ/có theo account (chưa cộng dồn): 1 query
+        Returns:
+            {account_id: {'opening_debit', 'opening_credit', 'total_debit', 'total_credit'}}
+        """
+        filter_line = Q(company_id=self.company_id, je_state=1, account__isnull=False)
+        if self.to_date:
+            filter_line &= Q(posting_date__lt=self.start_of_day(self.to_date + datetime.timedelta(days=1)))
+        if self.from_date:
+            filter_before = Q(posting_date__lt=self.start_of_day(self.from_date))
+            filter_in = Q(posting_date__gte=self.start_of_day(self.from_date))
+            aggregates = {
+                'opening_debit': Sum('debit', filter=filter_before),
+                'opening_credit': Sum('credit', filter=filter_before),
+                'total_debit': Sum('debit', filter=filter_in),
+                'total_credit': Sum('credit', filter=filter_in),
+            }
+        else:
+            aggregates = {'total_debit': Sum('debit'), 'total_credit': Sum('credit')}
+        result = {}
+        for item in JournalEntryLine.objects.filter(filter_line).order_by().values('account_id').annotate(
+                **aggregates
+        ):
+            result[item['account_id']] = {
+                'opening_debit': item.get('opening_debit', None) or 0,
+                'opening_credit': item.get('opening_credit', None) or 0,
+                'total_debit': item['total_debit'] or 0,
+                'total_credit': item['total_credit'] or 0,
+            }
+        return result
+
+    @staticmethod
+    def parse_balance(debit, credit) -> tuple[float, float]:
+        balance = debit - credit
+        return (balance, 0) if balance >= 0 else (0, -balance)
+
+    def get_rolled_amount(self) -> dict:
+        """
+        Phát sinh theo account đã cộng dồn từ tài khoản con lên tài khoản cha (chưa tính số dư)
+        """
+        account_amount = self.get_account_amount()
+        accounts = list(
+            ChartOfAccounts.objects.filter(company_id=self.company_id).values('id', 'parent_account_id', 'level')
+        )
+        rolled = {
+            item['id']: dict(account_amount.get(item['id'], {
+                'opening_debit': 0, 'opening_credit': 0, 'total_debit': 0, 'total_credit': 0,
+            })) for item in accounts
+        }
+        # cộng dồn từ level sâu nhất lên => tài khoản cha nhận tổng đã cộng dồn của con
+        for item in sorted(accounts, key=lambda x: x['level'], reverse=True):
+            parent_id = item['parent_account_id']
+            if parent_id and parent_id in rolled:
+                parent_data = rolled[parent_id]
+                for key, value in rolled[item['id']].items():
+                    parent_data[key] += value
+        return rolled
+
+    @classmethod
+    def parse_row(cls, data) -> dict:
+        # số dư đầu kỳ / cuối kỳ là số dư ròng (nợ - có) => tài khoản cha bù trừ số dư giữa các tài khoản con
+        opening_debit, opening_credit = cls.parse_balance(data['opening_debit'], data['opening_credit'])
+        closing_debit, closing_credit = cls.parse_balance(
+            opening_debit + data['total_debit'], opening_credit + data['total_credit'],
+        )
+        return {
+            'opening_debit': opening_debit,
+            'opening_credit': opening_credit,
+            'total_debit': data['total_debit'],
+            'total_credit': data['total_credit'],
+            'closing_debit': closing_debit,
+            'closing_credit': closing_credit,
+        }
+
+    def run(self) -> dict:
+        """
+        Returns:
+            {account_id: {'opening_debit', 'opening_credit', 'total_debit', 'total_credit', 'closing_debit',
+            'closing_credit'}} cho toàn bộ tài khoản của company (tài khoản cha = tổng tài khoản con + chính nó)
+        """
+        return {account_id: self.parse_row(data) for account_id, data in self.get_rolled_amount().items()}
@@ -3,6 +3,7 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
 from apps.accounting.accountingreport.serializers.accountbalance_report import ChartOfAccountTreeNodeSerializer
+from apps.accounting.accountingreport.utils import TrialBalanceEngine
 from apps.accounting.accountingsettings.models import ChartOfAccounts
 from apps.accounting.accountingsettings.models.chart_of_account import CHART_OF_ACCOUNT_TYPE
 from apps.shared import mask_view, BaseListMixin
@@ -41,4 +42,14 @@ class ChartOfAccountTypeTreeList(BaseListMixin):
         login_require=True, auth_require=False,
     )
     def get(self, request, *args, **kwargs):
+        params = request.query_params
+        self.ser_context = {
+            'trial_balance': TrialBalanceEngine(
+                company_id=request.user.company_current_id,
+                period_id=params.get('period_id', None),
+                sub_period_id=params.get('sub_period_id', None),
+                from_date=params.get('from_date', None),
+                to_date=params.get('to_date', None),
+            ).run()
+        }
         return self.list(request, *args, **kwargs)
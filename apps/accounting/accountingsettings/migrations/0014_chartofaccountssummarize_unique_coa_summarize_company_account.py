@@ -0,0 +1,61 @@
+# Generated by Django 4.2.8 on 2026-10-18 21:11
+
+from django.db import migrations, models
+
+
+def rebuild_duplicate_summarize(apps, schema_editor):
+    # ensure_rows chạy đồng thời có thể tạo trùng (company, account); dòng tạo sau thiếu các delta cộng trước đó
+    # => không gộp/giữ được số liệu của dòng nào, tính lại summarize của các company có dòng trùng từ bút toán đã duyệt
+    # (giống ChartOfAccountsSummarize.get_rebuild_rows)
+    summarize_cls = apps.get_model('accountingsettings', 'chartofaccountssummarize')
+    line_cls = apps.get_model('journalentry', 'journalentryline')
+    company_ids = list(
+        summarize_cls.objects.order_by().values('company_id', 'account_id').annotate(
+            count_row=models.Count('id')
+        ).filter(count_row__gt=1).values_list('company_id', flat=True).distinct()
+    )
+    filter_opening = models.Q(journal_entry__je_transaction_app_code__isnull=True)
+    for company_id in company_ids:
+        amount_list = line_cls.objects.filter(
+            company_id=company_id, journal_entry__system_status=3, account__isnull=False,
+        ).order_by().values('account_id', 'tenant_id').annotate(
+            opening_debit=models.Sum('debit', filter=filter_opening),
+            opening_credit=models.Sum('credit', filter=filter_opening),
+            total_debit=models.Sum('debit', filter=~filter_opening),
+            total_credit=models.Sum('credit', filter=~filter_opening),
+        )
+        bulk_info = []
+        for item in amount_list:
+            opening_debit, opening_credit = item['opening_debit'] or 0, item['opening_credit'] or 0
+            total_debit, total_credit = item['total_debit'] or 0, item['total_credit'] or 0
+            bulk_info.append(
+                summarize_cls(
+                    tenant_id=item['tenant_id'],
+                    company_id=company_id,
+                    account_id=item['account_id'],
+                    opening_debit=opening_debit,
+                    opening_credit=opening_credit,
+                    total_debit=total_debit,
+                    total_credit=total_credit,
+                    closing_debit=opening_debit + total_debit,
+                    closing_credit=opening_credit + total_credit,
+                )
+            )
+        summarize_cls.objects.filter(company_id=company_id).delete()
+        summarize_cls.objects.bulk_create(bulk_info)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accountingsettings', '0013_alter_jeglaccountmapping_options'),
+        ('journalentry', '0007_journalentryline_je_state_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_duplicate_summarize, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chartofaccountssummarize',
+            constraint=models.UniqueConstraint(fields=('company', 'account'), name='unique_coa_summarize_company_account'),
+        ),
+    ]
@@ -1,8 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 from apps.masterdata.saledata.models.price import Currency
-from apps.shared import MasterDataAbstractModel
+from apps.shared import MasterDataAbstractModel, DisperseModel
 
 
 __all__ = [
@@ -115,54 +115,138 @@ class ChartOfAccountsSummarize(MasterDataAbstractModel):
     class Meta:
         verbose_name = 'ChartOfAccountsSummarize'
         verbose_name_plural = 'ChartOfAccountsSummarize'
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'account'], name='unique_coa_summarize_company_account'),
+        ]
+
+    @classmethod
+    def group_line_amount(cls, je_obj) -> dict:
+        """ Tổng nợ/có theo account của các dòng bút toán: {account_id: (debit, credit)} """
+        result = {}
+        for account_id, debit, credit in je_obj.je_lines.filter(account__isnull=False).values_list(
+                'account_id', 'debit', 'credit'
+        ):
+            old_debit, old_credit = result.get(account_id, (0, 0))
+            result[account_id] = (old_debit + (debit or 0), old_credit + (credit or 0))
+        return result
+
+    @classmethod
+    def ensure_rows(cls, tenant_id, company_id, account_ids):
+        """ Tạo dòng summarize còn thiếu của các account (1 query kiểm tra + 1 bulk_create) """
+        existed = set(
+            cls.objects.filter(company_id=company_id, account_id__in=account_ids).values_list('account_id', flat=True)
+        )
+        cls.objects.bulk_create(
+            [
+                cls(tenant_id=tenant_id, company_id=company_id, account_id=account_id)
+                for account_id in account_ids if account_id not in existed
+            ]
+        )
+        return True
 
     @classmethod
     def initial_summarize(cls, je_obj):
-        je_line_list = je_obj.je_lines.all()
-        cls.objects.filter_on_company(account_id__in=je_line_list.values_list('account_id', flat=True)).update(
-            opening_debit=0, opening_credit=0
+        # số dư đầu kỳ = dòng bút toán số dư ban đầu (ghi đè), cuối kỳ = đầu kỳ + phát sinh
+        # F() => tính trên DB, không đọc-sửa-ghi trong Python
+        line_amount = cls.group_line_amount(je_obj)
+        cls.ensure_rows(je_obj.tenant_id, je_obj.company_id, list(line_amount.keys()))
+        # account không còn trong số dư ban đầu (cập nhật lại phiếu) => về 0, giống rebuild
+        cls.objects.filter(company_id=je_obj.company_id).exclude(account_id__in=line_amount.keys()).exclude(
+            opening_debit=0, opening_credit=0,
+        ).update(
+            opening_debit=0,
+            opening_credit=0,
+            closing_debit=F('total_debit'),
+            closing_credit=F('total_credit'),
         )
-        for line in je_line_list:
-            chart_of_accounts_summarize_obj = cls.objects.filter_on_company(account_id=line.account_id).first()
-            if not chart_of_accounts_summarize_obj:
-                chart_of_accounts_summarize_obj = cls.objects.create(
-                    tenant=je_obj.tenant,
-                    company=je_obj.company,
-                    account=line.account,
-                )
-            chart_of_accounts_summarize_obj.opening_debit += line.debit
-            chart_of_accounts_summarize_obj.opening_credit += line.credit
-            chart_of_accounts_summarize_obj.closing_debit = (
-                    chart_of_accounts_summarize_obj.opening_debit + chart_of_accounts_summarize_obj.total_debit
-            )
-            chart_of_accounts_summarize_obj.closing_credit = (
-                    chart_of_accounts_summarize_obj.opening_credit + chart_of_accounts_summarize_obj.total_credit
-            )
-            chart_of_accounts_summarize_obj.save(
-                update_fields=['opening_debit', 'opening_credit', 'closing_debit', 'closing_credit']
+        for account_id, (debit, credit) in line_amount.items():
+            cls.objects.filter(company_id=je_obj.company_id, account_id=account_id).update(
+                opening_debit=debit,
+                opening_credit=credit,
+                closing_debit=F('total_debit') + debit,
+                closing_credit=F('total_credit') + credit,
             )
         return True
 
     @classmethod
     def update_summarize(cls, je_obj):
-        je_line_list = je_obj.je_lines.all()
-        for line in je_line_list:
-            chart_of_accounts_summarize_obj = cls.objects.filter_on_company(account_id=line.account_id).first()
-            if not chart_of_accounts_summarize_obj:
-                chart_of_accounts_summarize_obj = cls.objects.create(
-                    tenant=je_obj.tenant,
-                    company=je_obj.company,
-                    account=line.account,
-                )
-            chart_of_accounts_summarize_obj.total_debit += line.debit
-            chart_of_accounts_summarize_obj.total_credit += line.credit
-            chart_of_accounts_summarize_obj.closing_debit = (
-                    chart_of_accounts_summarize_obj.opening_debit + chart_of_accounts_summarize_obj.total_debit
-            )
-            chart_of_accounts_summarize_obj.closing_credit = (
-                    chart_of_accounts_summarize_obj.opening_credit + chart_of_accounts_summarize_obj.total_credit
-            )
-            chart_of_accounts_summarize_obj.save(
-                update_fields=['total_debit', 'total_credit', 'closing_debit', 'closing_credit']
+        # cộng delta trên DB (UPDATE ... SET x = x + delta) => không mất số khi nhiều phiếu ghi sổ đồng thời
+        # closing += delta (không dùng opening + total vì MySQL tính SET lần lượt trên giá trị đã cập nhật)
+        line_amount = cls.group_line_amount(je_obj)
+        cls.ensure_rows(je_obj.tenant_id, je_obj.company_id, list(line_amount.keys()))
+        for account_id, (debit, credit) in line_amount.items():
+            cls.objects.filter(company_id=je_obj.company_id, account_id=account_id).update(
+                total_debit=F('total_debit') + debit,
+                total_credit=F('total_credit') + credit,
+                closing_debit=F('closing_debit') + debit,
+                closing_credit=F('closing_credit') + credit,
             )
         return True
+
+    @classmethod
+    def get_rebuild_rows(cls, company_id) -> list:
+        """
+        Dòng summarize của company tính từ JournalEntryLine (phiếu đã duyệt):
+            - đầu kỳ: bút toán số dư ban đầu (je_transaction_app_code rỗng)
+            - phát sinh: các bút toán còn lại
+        """
+        filter_opening = models.Q(journal_entry__je_transaction_app_code__isnull=True)
+        amount_list = DisperseModel(app_model='journalentry.JournalEntryLine').get_model().objects.filter(
+            company_id=company_id, journal_entry__system_status=3, account__isnull=False,
+        ).order_by().values('account_id', 'tenant_id').annotate(
+            opening_debit=models.Sum('debit', filter=filter_opening),
+            opening_credit=models.Sum('credit', filter=filter_opening),
+            total_debit=models.Sum('debit', filter=~filter_opening),
+            total_credit=models.Sum('credit', filter=~filter_opening),
+        )
+        bulk_info = []
+        for item in amount_list:
+            opening_debit, opening_credit = item['opening_debit'] or 0, item['opening_credit'] or 0
+            total_debit, total_credit = item['total_debit'] or 0, item['total_credit'] or 0
+            bulk_info.append(
+                cls(
+                    tenant_id=item['tenant_id'],
+                    company_id=company_id,
+                    account_id=item['account_id'],
+                    opening_debit=opening_debit,
+                    opening_credit=opening_credit,
+                    total_debit=total_debit,
+                    total_credit=total_credit,
+                    closing_debit=opening_debit + total_debit,
+                    closing_credit=opening_credit + total_credit,
+                )
+            )
+        return bulk_info
+
+    @classmethod
+    def rebuild(cls, company_id) -> int:
+        """
+        Tính lại toàn bộ summarize của company, ghi đè số liệu lên dòng đang có (không xóa + tạo lại):
+            - khóa dòng của company (select_for_update) trước khi đọc bút toán => update_summarize đồng thời
+              chờ rebuild commit rồi cộng delta vào đúng dòng, không bị mất vì dòng đã xóa
+            - account không còn bút toán => về 0
+        """
+        amount_fields = [
+            'opening_debit', 'opening_credit', 'total_debit', 'total_credit', 'closing_debit', 'closing_credit',
+        ]
+        with transaction.atomic():
+            current = {
+                obj.account_id: obj for obj in cls.objects.select_for_update().filter(company_id=company_id)
+            }
+            bulk_info = cls.get_rebuild_rows(company_id)
+            objs_update, objs_create = [], []
+            for obj in bulk_info:
+                current_obj = current.pop(obj.account_id, None)
+                if current_obj:
+                    for field in amount_fields:
+                        setattr(current_obj, field, getattr(obj, field))
+                    objs_update.append(current_obj)
+                else:
+                    objs_create.append(obj)
+            for current_obj in current.values():
+                for field in amount_fields:
+                    setattr(current_obj, field, 0)
+                objs_update.append(current_obj)
+            cls.objects.bulk_update(objs_update, fields=amount_fields, batch_size=500)
+            cls.objects.bulk_create(objs_create)
+        return len(bulk_info)
@@ -11,6 +11,7 @@ __all__ = [
 
 from apps.accounting.accountingsettings.models import AssetCategory, ChartOfAccounts
 from apps.masterdata.saledata.models import Product
+from apps.shared.extends.models import bulk_table_generation
 
 
 class AssetCategoryListSerializer(serializers.ModelSerializer):
@@ -347,6 +348,7 @@ class AssetCategoryUpdateSerializer(serializers.ModelSerializer):
         # Update linked products
         if linked_product_data is not None:
             Product.objects.filter(asset_category=instance).update(asset_category=None)
+            bulk_table_generation(Product, tenant_id=instance.tenant_id, company_id=instance.company_id)
 
             for product_id in linked_product_data:
                 product = Product.objects.filter(id=product_id).first()
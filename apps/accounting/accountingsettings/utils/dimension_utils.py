@@ -131,6 +131,26 @@ class DimensionUtils:
 
         return True
 
+    @staticmethod
+    def bulk_sync_dimension_value(objs, app_id, tenant_id, company_id):
+        # bản ghi mới tạo bằng bulk_create (không qua save()): tạo DimensionValue 1 lần cho cả danh sách
+        application = DimensionUtils._get_application(app_id=app_id)
+        mapped_dimension = Dimension.objects.filter(
+            tenant_id=tenant_id, company_id=company_id, related_app=application
+        ).first()
+        sync_config = DimensionSyncConfig.objects.filter(
+            tenant_id=tenant_id, company_id=company_id, dimension=mapped_dimension
+        ).first()
+        if not application or not mapped_dimension or not sync_config or not sync_config.sync_on_save:
+            return []
+        return DimensionValue.objects.bulk_create([
+            DimensionValue(
+                tenant_id=tenant_id, company_id=company_id,
+                related_app=application, related_doc_id=obj.id, dimension=mapped_dimension,
+                title=obj.title, code=obj.code, allow_posting=True, date_created=obj.date_created,
+            ) for obj in objs
+        ])
+
     # @staticmethod
     # def auto_delete_dimension_value(instance, app_id):
     #     ...
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.8 on 2026-10-18 18:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def init_line_ledger_fields(apps, schema_editor):
+    # copy trạng thái / ngày ghi sổ / kỳ từ phiếu JE xuống các dòng đã có
+    journal_entry_cls = apps.get_model('journalentry', 'journalentry')
+    journal_entry_line_cls = apps.get_model('journalentry', 'journalentryline')
+    for je_obj in journal_entry_cls.objects.all().only(
+            'id', 'je_state', 'je_posting_date', 'date_created', 'period_mapped_id', 'sub_period_id'
+    ).iterator(chunk_size=2000):
+        journal_entry_line_cls.objects.filter(journal_entry_id=je_obj.id).update(
+            je_state=je_obj.je_state,
+            posting_date=je_obj.je_posting_date or je_obj.date_created,
+            period_mapped_id=je_obj.period_mapped_id,
+            sub_period_id=je_obj.sub_period_id,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('saledata', '0087_product_asset_category'),
+        ('journalentry', '0006_journalentrysummarize'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalentryline',
+            name='je_state',
+            field=models.SmallIntegerField(choices=[(0, 'Draft'), (1, 'Posted'), (2, 'Reversed')], default=0),
+        ),
+        migrations.AddField(
+            model_name='journalentryline',
+            name='period_mapped',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='je_line_period_mapped', to='saledata.periods'),
+        ),
+        migrations.AddField(
+            model_name='journalentryline',
+            name='posting_date',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='journalentryline',
+            name='sub_period',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='je_line_sub_period', to='saledata.subperiods'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentryline',
+            index=models.Index(fields=['company', 'account', 'period_mapped', 'posting_date'], name='journalentr_company_c4be46_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentryline',
+            index=models.Index(fields=['company', 'account', 'posting_date'], name='journalentr_company_36c66e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentryline',
+            index=models.Index(fields=['company', 'business_partner', 'account', 'posting_date'], name='journalentr_company_2f503b_idx'),
+        ),
+        migrations.RunPython(init_line_ledger_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.8 on 2026-10-18 21:11
+
+from django.db import migrations, models
+
+
+def merge_duplicate_summarize(apps, schema_editor):
+    # update_summarize chỉ cộng vào 1 dòng => gộp số liệu các dòng trùng company vào dòng tạo trước rồi xóa
+    summarize_cls = apps.get_model('journalentry', 'journalentrysummarize')
+    kept = {}
+    for obj in summarize_cls.objects.order_by('date_created', 'id'):
+        kept_obj = kept.setdefault(obj.company_id, obj)
+        if kept_obj.pk != obj.pk:
+            kept_obj.total_je_doc += obj.total_je_doc
+            kept_obj.total_debit += obj.total_debit
+            kept_obj.total_credit += obj.total_credit
+            kept_obj.save(update_fields=['total_je_doc', 'total_debit', 'total_credit'])
+            obj.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journalentry', '0007_journalentryline_je_state_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_summarize, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='journalentrysummarize',
+            constraint=models.UniqueConstraint(fields=('company',), name='unique_je_summarize_company'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import logging
 from django.db import models, transaction
+from django.db.models import F, Sum, Count
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from apps.accounting.accountingsettings.models import JE_DOCUMENT_TYPE_APP
@@ -138,7 +139,9 @@ class JournalEntry(DataAbstractModel, AutoDocumentAbstractModel):
                     sub_period_obj = Periods.get_sub_period_by_doc_date(period_obj, doc_date)
                     if sub_period_obj:
                         sub_period_order = sub_period_obj.order
-                        je_obj = cls.objects.filter_on_company(je_transaction_app_code=None).first()
+                        # bút toán số dư ban đầu: 1 phiếu / company (je_transaction_app_code rỗng, giống rebuild)
+                        je_obj = cls.objects.filter(company_id=ib_obj.company_id, je_transaction_app_code=None).first()
+                        old_total = (je_obj.total_debit, je_obj.total_credit) if je_obj else None
                         if not je_obj:
                             je_obj = cls.objects.create(
                                 **kwargs,
@@ -176,7 +179,7 @@ class JournalEntry(DataAbstractModel, AutoDocumentAbstractModel):
                         je_obj.total_debit += total_debit
                         je_obj.total_credit += total_credit
                         je_obj.save(update_fields=['total_debit', 'total_credit'])
-                        JournalEntrySummarize.update_summarize(je_obj)
+                        JournalEntrySummarize.update_summarize(je_obj, old_total=old_total)
                         ChartOfAccountsSummarize.initial_summarize(je_obj)
                         print(f'# [JE] JE created successfully ({je_obj.code})!\n')
                         return je_obj
@@ -231,6 +234,15 @@ class JournalEntryLine(MasterDataAbstractModel):
     taxable_value = models.FloatField(default=0)
     use_for_recon = models.BooleanField(default=False)  # để biết đc là dòng bút toán này dùng để cấn trừ
     use_for_recon_type = models.CharField(max_length=100, blank=True)  # để biết đc cặp bút toán làm cấn trừ.
+    # sổ cái: copy từ phiếu JE để lọc theo account/kỳ không cần join journal_entry (đồng bộ qua sync_ledger_fields)
+    je_state = models.SmallIntegerField(default=0, choices=[(0, _('Draft')), (1, _('Posted')), (2, _('Reversed'))])
+    posting_date = models.DateTimeField(null=True)
+    period_mapped = models.ForeignKey(
+        'saledata.Periods', on_delete=models.SET_NULL, related_name='je_line_period_mapped', null=True
+    )
+    sub_period = models.ForeignKey(
+        'saledata.SubPeriods', on_delete=models.SET_NULL, related_name='je_line_sub_period', null=True
+    )
 
     class Meta:
         verbose_name = 'Journal Entry Line'
@@ -238,30 +250,73 @@ class JournalEntryLine(MasterDataAbstractModel):
         ordering = ('je_line_type', 'order')
         default_permissions = ()
         permissions = ()
+        indexes = [
+            models.Index(fields=['company', 'account', 'period_mapped', 'posting_date']),
+            models.Index(fields=['company', 'account', 'posting_date']),
+            models.Index(fields=['company', 'business_partner', 'account', 'posting_date']),
+        ]
+
+    @classmethod
+    def get_ledger_fields(cls, je_obj) -> dict:
+        return {
+            'je_state': je_obj.je_state,
+            'posting_date': je_obj.je_posting_date or je_obj.date_created,
+            'period_mapped_id': je_obj.period_mapped_id,
+            'sub_period_id': je_obj.sub_period_id,
+        }
+
+    @classmethod
+    def sync_ledger_fields(cls, je_obj):
+        """ Cập nhật lại kỳ / ngày ghi sổ / trạng thái trên các dòng khi phiếu JE thay đổi """
+        return cls.objects.filter(journal_entry=je_obj).update(**cls.get_ledger_fields(je_obj))
 
     @classmethod
-    def parse_obj_je_line_mapped(cls, je_obj, order, item, je_line_type=0):
+    def prefetch_line_refs(cls, rows: list[dict]) -> dict:
+        """
+        Lấy trước dữ liệu tham chiếu của các dòng (mỗi loại 1 query): product, đối tác, nhân viên, tiền tệ chính
+        Returns:
+            {'currency_primary': obj, 'product': {id: obj}, 'business_partner': {...}, 'business_employee': {...}}
+        """
+        refs = {'currency_primary': None, 'product': {}, 'business_partner': {}, 'business_employee': {}}
+        if any(not item.get('currency_mapped') for item in rows):
+            refs['currency_primary'] = Currency.objects.filter_on_company(is_primary=True).first()
+        for key, field_name, app_model, select_related in (
+                ('product', 'product_mapped_id', 'saledata.Product', []),
+                ('business_partner', 'business_partner_id', 'saledata.Account', []),
+                ('business_employee', 'business_employee_id', 'hr.Employee', ['group']),
+        ):
+            obj_ids = {str(item.get(field_name)) for item in rows if item.get(field_name)}
+            if obj_ids:
+                refs[key] = {
+                    str(obj.id): obj for obj in DisperseModel(app_model=app_model).get_model().objects.filter(
+                        id__in=obj_ids
+                    ).select_related(*select_related)
+                }
+        return refs
+
+    @classmethod
+    def parse_obj_je_line_mapped(cls, je_obj, order, item, je_line_type=0, refs=None):
+        # refs: kết quả prefetch_line_refs (tạo nhiều dòng), không truyền => tự lấy cho 1 dòng
+        if refs is None:
+            refs = cls.prefetch_line_refs([item])
+
         # Nếu không truyền Currency vào, sẽ tự động lấy theo đồng tiền mặc định của công ty
         currency_mapped = item.get('currency_mapped')
         if not currency_mapped:
-            currency_mapped = Currency.objects.filter_on_company(is_primary=True).first()
+            currency_mapped = refs['currency_primary']
 
         product_mapped_data = {}
         business_partner_data = {}
         business_employee_data = {}
         if item.get('product_mapped_id'):
-            product_obj = DisperseModel(app_model='saledata.Product').get_model().objects.filter(
-                id=item.get('product_mapped_id')
-            ).first()
+            product_obj = refs['product'].get(str(item.get('product_mapped_id')), None)
             product_mapped_data = {
                 'id': str(product_obj.id),
                 'code': product_obj.code,
                 'title': product_obj.title,
             } if product_obj else {}
         if item.get('business_partner_id'):
-            account_obj = DisperseModel(app_model='saledata.Account').get_model().objects.filter(
-                id=item.get('business_partner_id')
-            ).first()
+            account_obj = refs['business_partner'].get(str(item.get('business_partner_id')), None)
             business_partner_data = {
                 'id': str(account_obj.id),
                 'code': account_obj.code,
@@ -269,9 +324,7 @@ class JournalEntryLine(MasterDataAbstractModel):
                 'tax_code': account_obj.tax_code,
             } if account_obj else {}
         if item.get('business_employee_id'):
-            employee_obj = DisperseModel(app_model='hr.Employee').get_model().objects.filter(
-                id=item.get('business_employee_id')
-            ).first()
+            employee_obj = refs['business_employee'].get(str(item.get('business_employee_id')), None)
             business_employee_data = employee_obj.get_detail_with_group() if employee_obj else {}
 
         return cls(
@@ -306,6 +359,7 @@ class JournalEntryLine(MasterDataAbstractModel):
             taxable_value=item.get('taxable_value', 0),
             use_for_recon=item.get('use_for_recon', False),
             use_for_recon_type=item.get('use_for_recon_type', ''),
+            **cls.get_ledger_fields(je_obj),
         )
 
     @classmethod
@@ -331,15 +385,16 @@ class JournalEntryLine(MasterDataAbstractModel):
         debit_rows = je_line_data.get('debit_rows', [])
         credit_rows = je_line_data.get('credit_rows', [])
 
+        refs = cls.prefetch_line_refs([*debit_rows, *credit_rows])
         je_line_info = []
         total_debit = 0
         for order, item in enumerate(debit_rows): # get debit row
-            debit_je_line_obj = cls.parse_obj_je_line_mapped(je_obj, order, item, 0)
+            debit_je_line_obj = cls.parse_obj_je_line_mapped(je_obj, order, item, 0, refs=refs)
             je_line_info.append(debit_je_line_obj)
             total_debit += item.get('debit', 0)
         total_credit = 0
         for order, item in enumerate(credit_rows): # get credit row
-            credit_je_line_obj = cls.parse_obj_je_line_mapped(je_obj, order, item, 1)
+            credit_je_line_obj = cls.parse_obj_je_line_mapped(je_obj, order, item, 1, refs=refs)
             je_line_info.append(credit_je_line_obj)
             total_credit += item.get('credit', 0)
 
@@ -357,20 +412,49 @@ class JournalEntrySummarize(MasterDataAbstractModel):
     class Meta:
         verbose_name = 'Journal Entry Summarize'
         verbose_name_plural = 'Journal Entry Summarizes'
+        constraints = [
+            models.UniqueConstraint(fields=['company'], name='unique_je_summarize_company'),
+        ]
 
     @classmethod
-    def update_summarize(cls, je_obj):
+    def update_summarize(cls, je_obj, old_total=None):
+        """
+        Cộng phiếu đã duyệt vào summarize của company.
+        old_total: (total_debit, total_credit) trước khi cập nhật khi phiếu đã được cộng trước đó
+        (bút toán số dư ban đầu tạo lại dòng) => chỉ cộng chênh lệch, không đếm thêm phiếu.
+        """
         if je_obj.system_status == 3:
-            # JE Summarize
-            je_summarize_obj = cls.objects.filter(company=je_obj.company).first()
-            if not je_summarize_obj:
-                je_summarize_obj = cls.objects.create(
-                    tenant=je_obj.tenant,
-                    company=je_obj.company
-                )
-            je_summarize_obj.total_je_doc += 1
-            je_summarize_obj.total_debit += je_obj.total_debit
-            je_summarize_obj.total_credit += je_obj.total_credit
-            je_summarize_obj.total_source_type = len(JE_DOCUMENT_TYPE_APP)
-            je_summarize_obj.save(update_fields=['total_je_doc', 'total_debit', 'total_credit', 'total_source_type'])
+            # JE Summarize: cộng delta trên DB (F) => không mất số khi nhiều phiếu ghi sổ đồng thời
+            je_summarize_obj, _created = cls.objects.get_or_create(
+                company_id=je_obj.company_id, defaults={'tenant_id': je_obj.tenant_id}
+            )
+            old_debit, old_credit = old_total or (0, 0)
+            cls.objects.filter(pk=je_summarize_obj.pk).update(
+                total_je_doc=F('total_je_doc') + (0 if old_total else 1),
+                total_debit=F('total_debit') + je_obj.total_debit - old_debit,
+                total_credit=F('total_credit') + je_obj.total_credit - old_credit,
+                total_source_type=len(JE_DOCUMENT_TYPE_APP),
+            )
         return True
+
+    @classmethod
+    def rebuild(cls, company_id):
+        """
+        Tính lại summarize của company từ các bút toán đã duyệt (gồm bút toán số dư ban đầu)
+        Khóa dòng summarize (select_for_update) trước khi đọc rồi ghi đè => update_summarize đồng thời chờ rebuild
+        commit rồi cộng delta vào đúng dòng
+        """
+        company_obj = DisperseModel(app_model='company.Company').get_model().objects.get(id=company_id)
+        with transaction.atomic():
+            obj = cls.objects.select_for_update().filter(company_id=company_id).first()
+            total = JournalEntry.objects.filter(company_id=company_id, system_status=3).aggregate(
+                total_je_doc=Count('id'), total_debit=Sum('total_debit'), total_credit=Sum('total_credit'),
+            )
+            if not obj:
+                obj = cls(tenant_id=company_obj.tenant_id, company_id=company_id)
+            obj.total_je_doc = total['total_je_doc'] or 0
+            obj.total_debit = total['total_debit'] or 0
+            obj.total_credit = total['total_credit'] or 0
+            obj.total_source_type = len(JE_DOCUMENT_TYPE_APP)
+            obj.save()
+            return obj
@@ -3,7 +3,7 @@ from django.utils.translation import gettext_lazy as _
 
 from apps.accounting.accountingsettings.models import ChartOfAccountsSummarize
 from apps.accounting.accountingsettings.models.account_determination import JE_DOCUMENT_TYPE_APP
-from apps.accounting.journalentry.models import JournalEntry, JournalEntrySummarize
+from apps.accounting.journalentry.models import JournalEntry, JournalEntrySummarize, JournalEntryLine
 
 
 # JE
@@ -104,3 +104,8 @@ class JournalEntryUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = JournalEntry
         fields = "__all__"
+
+    def update(self, instance, validated_data):
+        instance = super().update(instance, validated_data)
+        JournalEntryLine.sync_ledger_fields(instance)
+        return instance
@@ -1,3 +1,306 @@
+import datetime
+import uuid
+from types import SimpleNamespace
+
 from django.test import TestCase
 
-# Create your tests here.
+from apps.accounting.accountingsettings.models import ChartOfAccounts, ChartOfAccountsSummarize
+from apps.accounting.journalentry.models import JournalEntry, JournalEntryLine, JournalEntrySummarize
+from apps.accounting.journalentry.utils.ledger import GeneralLedger
+from apps.core.company.models import Company
+from apps.core.hr.models import Employee, Group
+from apps.core.tenant.models import Tenant
+from apps.masterdata.saledata.models import Account, Currency, Product
+from apps.masterdata.saledata.models.periods import Periods, SubPeriods
+from apps.shared.extends.tests import bulk_new
+
+
+class JournalEntrySummarizeTestCase(TestCase):
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_JE')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_JE', tenant=self.tenant)
+        common = {'tenant': self.tenant, 'company': self.company}
+        self.period = bulk_new(
+            Periods, title='2026', code='P2026', fiscal_year=2026, start_date=datetime.date(2026, 1, 1),
+            end_date=datetime.date(2026, 12, 31), **common,
+        )
+        for month in range(1, 13):
+            bulk_new(
+                SubPeriods, period_mapped=self.period, order=month, code=f'M{month}', name=f'M{month}',
+                start_date=datetime.date(2026, month, 1),
+                end_date=datetime.date(2026 + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1),
+            )
+        self.accounts = [
+            bulk_new(
+                ChartOfAccounts, acc_code=acc_code, acc_name=acc_code, foreign_acc_name=acc_code, acc_type=1,
+                **common,
+            ) for acc_code in ('111', '131', '331', '511')
+        ]
+
+    def new_doc(self, date_approved):
+        return SimpleNamespace(
+            tenant=self.tenant, company=self.company, tenant_id=self.tenant.id, company_id=self.company.id,
+            date_approved=date_approved, date_created=date_approved, employee_created_id=None, employee_inherit_id=None,
+        )
+
+    def get_line_data(self, debit_rows, credit_rows):
+        return {
+            'debit_rows': [{'account': self.accounts[idx], 'debit': amount} for idx, amount in debit_rows],
+            'credit_rows': [{'account': self.accounts[idx], 'credit': amount} for idx, amount in credit_rows],
+        }
+
+    def post_initial_balance(self, debit_rows, credit_rows):
+        ib_obj = self.new_doc(datetime.datetime(2026, 1, 1, 8))
+        ib_obj.period_mapped = self.period
+        return JournalEntry.create_or_update_je_initial_balance(
+            ib_obj, je_transaction_id=uuid.uuid4(), je_transaction_data={},
+            je_line_data=self.get_line_data(debit_rows, credit_rows),
+        )
+
+    def post_doc(self, date_approved, debit_rows, credit_rows):
+        return JournalEntry.auto_create_journal_entry(
+            self.new_doc(date_approved), je_transaction_app_code='arinvoice.arinvoice', je_transaction_id=uuid.uuid4(),
+            je_transaction_data={}, je_line_data=self.get_line_data(debit_rows, credit_rows),
+        )
+
+    def get_summarize(self):
+        je_summarize = JournalEntrySummarize.objects.values(
+            'company_id', 'total_je_doc', 'total_debit', 'total_credit', 'total_source_type',
+        ).get()
+        # live giữ dòng toàn 0 của account bị bỏ khỏi số dư ban đầu, rebuild thì không tạo => so sánh dòng khác 0
+        coa_summarize = {}
+        for item in ChartOfAccountsSummarize.objects.filter(company=self.company).values(
+                'account_id', 'opening_debit', 'opening_credit', 'total_debit', 'total_credit',
+                'closing_debit', 'closing_credit',
+        ):
+            account_id = item.pop('account_id')
+            if any(item.values()):
+                coa_summarize[account_id] = item
+        return je_summarize, coa_summarize
+
+    def test_live_equals_rebuild(self):
+        self.assertIsNotNone(self.post_initial_balance(debit_rows=[(0, 500), (1, 200)], credit_rows=[(2, 700)]))
+        self.assertIsNotNone(self.post_doc(datetime.datetime(2026, 2, 10, 9), [(1, 110)], [(3, 110)]))
+        # cập nhật lại số dư ban đầu: không đếm thêm phiếu, account 131 không còn trong số dư ban đầu
+        self.assertIsNotNone(self.post_initial_balance(debit_rows=[(0, 900)], credit_rows=[(2, 900)]))
+        self.assertIsNotNone(self.post_doc(datetime.datetime(2026, 3, 5, 9), [(0, 110)], [(1, 110)]))
+
+        je_summarize, coa_summarize = self.get_summarize()
+        self.assertEqual(je_summarize['total_je_doc'], 3)
+        self.assertEqual((je_summarize['total_debit'], je_summarize['total_credit']), (1120, 1120))
+        self.assertEqual(
+            coa_summarize[self.accounts[1].id],
+            {
+                'opening_debit': 0, 'opening_credit': 0, 'total_debit': 110, 'total_credit': 110,
+                'closing_debit': 110, 'closing_credit': 110,
+            }
+        )
+
+        JournalEntrySummarize.rebuild(self.company.id)
+        ChartOfAccountsSummarize.rebuild(self.company.id)
+        self.assertEqual(self.get_summarize(), (je_summarize, coa_summarize))
+
+    def test_rebuild_updates_rows_in_place(self):
+        self.assertIsNotNone(self.post_doc(datetime.datetime(2026, 2, 10, 9), [(1, 110)], [(3, 110)]))
+        je_summarize_id = JournalEntrySummarize.objects.get(company=self.company).id
+        coa_ids = set(ChartOfAccountsSummarize.objects.filter(company=self.company).values_list('id', flat=True))
+        # số liệu sai lệch + dòng của account không có bút toán => rebuild ghi đè / về 0 trên chính các dòng đó
+        ChartOfAccountsSummarize.objects.filter(company=self.company).update(total_debit=999, closing_debit=999)
+        stale = bulk_new(
+            ChartOfAccountsSummarize, tenant=self.tenant, company=self.company, account=self.accounts[0],
+            total_debit=50, closing_debit=50,
+        )
+
+        self.assertEqual(JournalEntrySummarize.rebuild(self.company.id).id, je_summarize_id)
+        self.assertEqual(ChartOfAccountsSummarize.rebuild(self.company.id), 2)
+        self.assertEqual(
+            set(ChartOfAccountsSummarize.objects.filter(company=self.company).values_list('id', flat=True)),
+            coa_ids | {stale.id},
+        )
+        self.assertEqual(
+            list(
+                ChartOfAccountsSummarize.objects.filter(company=self.company).order_by(
+                    'account__acc_code'
+                ).values_list('account__acc_code', 'total_debit', 'total_credit', 'closing_debit', 'closing_credit')
+            ),
+            [('111', 0, 0, 0, 0), ('131', 110, 0, 110, 0), ('511', 0, 110, 0, 110)],
+        )
+
+
+class JournalEntryLineBuilderTestCase(TestCase):
+    LINE_FIELDS = (
+        'order', 'account_id', 'account_data', 'je_line_type', 'product_mapped_id', 'product_mapped_data',
+        'business_partner_id', 'business_partner_data', 'business_employee_id', 'business_employee_data', 'debit',
+        'credit', 'currency_mapped_id', 'currency_mapped_data', 'je_state', 'posting_date',
+    )
+
+    def setUp(self):
+        tenant = bulk_new(Tenant, title='Tenant', code='TENANT_JE_LINE')
+        company = bulk_new(Company, title='Company', code='COMPANY_JE_LINE', tenant=tenant)
+        common = {'tenant': tenant, 'company': company}
+        self.je_obj = bulk_new(
+            JournalEntry, sub_period_order=1, je_state=1, je_posting_date=datetime.datetime(2026, 2, 1), **common,
+        )
+        self.account = bulk_new(
+            ChartOfAccounts, acc_code='131', acc_name='131', foreign_acc_name='131', acc_type=1, **common,
+        )
+        group = bulk_new(Group, title='Sales', code='G_SALES', **common)
+        self.employees = [
+            bulk_new(Employee, first_name='Line', last_name='A', code='EMP_LINE_A', group=group, **common),
+            bulk_new(Employee, first_name='Line', last_name='B', code='EMP_LINE_B', **common),
+        ]
+        self.products = [bulk_new(Product, title=f'Product {idx}', code=f'P_LINE{idx}', **common) for idx in range(2)]
+        self.partner = bulk_new(Account, name='Partner', code='ACC_LINE', tax_code='0101', **common)
+        self.currency = bulk_new(Currency, title='USD', code='USD', abbreviation='USD', rate=25000, **common)
+
+    def get_rows(self):
+        return [
+            {
+                'account': self.account, 'debit': 100, 'product_mapped_id': self.products[0].id,
+                'business_partner_id': self.partner.id, 'business_employee_id': self.employees[0].id,
+            },
+            {
+                'account': self.account, 'debit': 50, 'product_mapped_id': str(self.products[1].id),
+                'business_employee_id': self.employees[1].id, 'currency_mapped': self.currency,
+            },
+            {'account': self.account, 'debit': 30},
+        ]
+
+    @staticmethod
+    def legacy_snapshot(item):
+        # dữ liệu dòng theo cách cũ: mỗi dòng lấy product / đối tác / nhân viên bằng .first()
+        product_obj = Product.objects.filter(id=item.get('product_mapped_id')).first()
+        account_obj = Account.objects.filter(id=item.get('business_partner_id')).first()
+        employee_obj = Employee.objects.filter(id=item.get('business_employee_id')).first()
+        return {
+            'product_mapped_data': {
+                'id': str(product_obj.id), 'code': product_obj.code, 'title': product_obj.title,
+            } if product_obj else {},
+            'business_partner_data': {
+                'id': str(account_obj.id), 'code': account_obj.code, 'name': account_obj.name,
+                'tax_code': account_obj.tax_code,
+            } if account_obj else {},
+            'business_employee_data': employee_obj.get_detail_with_group() if employee_obj else {},
+        }
+
+    def get_line_values(self):
+        return [
+            {key: getattr(obj, key) for key in self.LINE_FIELDS}
+            for obj in JournalEntryLine.objects.filter(journal_entry=self.je_obj).order_by('order')
+        ]
+
+    def test_prefetch_same_as_per_row(self):
+        rows = self.get_rows()
+        with self.assertNumQueries(6):
+            # currency chính + product + đối tác + nhân viên (kèm group) + xóa dòng cũ + bulk_create, không theo số dòng
+            total_debit, _total_credit = JournalEntryLine.create_je_line_mapped(
+                self.je_obj, {'debit_rows': rows, 'credit_rows': []},
+            )
+        self.assertEqual(total_debit, 180)
+        prefetched = self.get_line_values()
+
+        JournalEntryLine.objects.filter(journal_entry=self.je_obj).delete()
+        JournalEntryLine.objects.bulk_create(
+            [JournalEntryLine.parse_obj_je_line_mapped(self.je_obj, order, item, 0) for order, item in enumerate(rows)]
+        )
+        self.assertEqual(prefetched, self.get_line_values())
+
+        for line_values, item in zip(prefetched, rows):
+            snapshot_keys = ('product_mapped_data', 'business_partner_data', 'business_employee_data')
+            self.assertEqual({key: line_values[key] for key in snapshot_keys}, self.legacy_snapshot(item))
+        self.assertEqual(prefetched[0]['business_employee_data']['group']['code'], 'G_SALES')
+        self.assertEqual(prefetched[1]['currency_mapped_data']['abbreviation'], 'USD')
+
+
+class GeneralLedgerTestCase(TestCase):
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_LEDGER')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_LEDGER', tenant=self.tenant)
+        self.common = {'tenant': self.tenant, 'company': self.company}
+        self.period = bulk_new(
+            Periods, title='2026', code='P2026', fiscal_year=2026, start_date=datetime.date(2026, 1, 1),
+            end_date=datetime.date(2026, 12, 31), **self.common,
+        )
+        self.sub_periods = {
+            month: bulk_new(
+                SubPeriods, period_mapped=self.period, order=month, code=f'M{month}', name=f'M{month}',
+                start_date=datetime.date(2026, month, 1),
+                end_date=datetime.date(2026 + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1),
+            ) for month in range(1, 13)
+        }
+        self.cash, self.receivable = [
+            bulk_new(
+                ChartOfAccounts, acc_code=acc_code, acc_name=acc_code, foreign_acc_name=acc_code, acc_type=1,
+                **self.common,
+            ) for acc_code in ('111', '131')
+        ]
+        self.partner_a, self.partner_b = [
+            bulk_new(Account, name=code, code=code, tax_code=code, **self.common) for code in ('ACC_A', 'ACC_B')
+        ]
+        self.lines = {}
+        for code, posting_date, account, partner, debit, credit, je_state in [
+            ('L1', datetime.datetime(2026, 1, 15, 10), self.receivable, self.partner_a, 100, 0, 1),
+            ('L2', datetime.datetime(2026, 2, 1, 0), self.receivable, self.partner_a, 50, 0, 1),
+            ('L3', datetime.datetime(2026, 2, 28, 23, 30), self.receivable, self.partner_a, 0, 30, 1),
+            ('L4', datetime.datetime(2026, 3, 1, 0), self.receivable, self.partner_a, 999, 0, 1),
+            ('L5', datetime.datetime(2026, 2, 10, 9), self.receivable, self.partner_b, 70, 0, 1),
+            ('L6', datetime.datetime(2026, 2, 12, 9), self.receivable, self.partner_a, 500, 0, 0),
+            ('L7', datetime.datetime(2026, 2, 5, 9), self.cash, self.partner_a, 0, 20, 1),
+        ]:
+            self.lines[code] = self.new_line(code, posting_date, account, partner, debit, credit, je_state)
+
+    def new_line(self, code, posting_date, account, partner, debit, credit, je_state):
+        sub_period = self.sub_periods[posting_date.month]
+        je_obj = bulk_new(
+            JournalEntry, code=code, title=code, je_state=je_state, je_posting_date=posting_date,
+            period_mapped=self.period, sub_period=sub_period, sub_period_order=sub_period.order, system_status=3,
+            **self.common,
+        )
+        return bulk_new(
+            JournalEntryLine, journal_entry=je_obj, account=account, business_partner=partner, debit=debit,
+            credit=credit, je_line_type=0 if debit else 1, order=0, **JournalEntryLine.get_ledger_fields(je_obj),
+            **self.common,
+        )
+
+    @classmethod
+    def get_rows(cls, ledger_rows):
+        return [(item['journal_entry__code'], item['balance']) for item in ledger_rows]
+
+    def test_account_ledger(self):
+        ledger = GeneralLedger(
+            company_id=self.company.id, from_date=datetime.date(2026, 2, 1), to_date=datetime.date(2026, 2, 28),
+        )
+        # đầu kỳ: L1 (trước 01/02); dòng lúc 00:00 01/02 và 23:30 28/02 thuộc kỳ, 00:00 01/03 và dòng chưa ghi sổ thì không
+        self.assertEqual(ledger.get_opening_balance(account_id=self.receivable.id), 100)
+        self.assertEqual(
+            self.get_rows(ledger.iter_account_ledger(self.receivable.id)), [('L2', 150), ('L5', 220), ('L3', 190)]
+        )
+        self.assertEqual(self.get_rows(ledger.iter_account_ledger(self.cash.id)), [('L7', -20)])
+
+    def test_partner_ledger(self):
+        ledger = GeneralLedger(
+            company_id=self.company.id, from_date=datetime.date(2026, 2, 1), to_date=datetime.date(2026, 2, 28),
+        )
+        self.assertEqual(
+            self.get_rows(ledger.iter_partner_ledger(self.partner_a.id, account_id=self.receivable.id)),
+            [('L2', 150), ('L3', 120)],
+        )
+        # không truyền tài khoản => mọi tài khoản của đối tác
+        self.assertEqual(
+            self.get_rows(ledger.iter_partner_ledger(self.partner_a.id)), [('L2', 150), ('L7', 130), ('L3', 100)]
+        )
+        self.assertEqual(self.get_rows(ledger.iter_partner_ledger(self.partner_b.id)), [('L5', 70)])
+
+    def test_period_filter(self):
+        # lọc theo kỳ con, không truyền ngày => số dư đầu tính đến ngày bắt đầu kỳ con
+        ledger = GeneralLedger(company_id=self.company.id, sub_period_id=self.sub_periods[2].id)
+        self.assertEqual(ledger.from_date, datetime.date(2026, 2, 1))
+        self.assertEqual(
+            self.get_rows(ledger.iter_account_ledger(self.receivable.id)), [('L2', 150), ('L5', 220), ('L3', 190)]
+        )
+        ledger = GeneralLedger(company_id=self.company.id, period_id=self.period.id)
+        self.assertEqual(ledger.get_opening_balance(account_id=self.receivable.id), 0)
+        self.assertEqual(
+            self.get_rows(ledger.iter_account_ledger(self.receivable.id)),
+            [('L1', 100), ('L2', 150), ('L5', 220), ('L3', 190), ('L4', 1189)],
+        )
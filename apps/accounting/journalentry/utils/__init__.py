@@ -1 +1,2 @@
 from .je_log_handler import *
+from .ledger import *
@@ -0,0 +1,96 @@
+import datetime
+
+from django.db.models import Sum, Q
+
+from apps.accounting.journalentry.models import JournalEntryLine
+from apps.masterdata.saledata.models.periods import Periods, SubPeriods
+
+__all__ = ['GeneralLedger']
+
+
+class GeneralLedger:
+    """
+    Sổ cái / sổ chi tiết công nợ trên JournalEntryLine (chỉ dòng đã ghi sổ):
+        - Lọc trực tiếp theo company/account/kỳ/ngày ghi sổ trên dòng (index), không join journal_entry
+        - Số dư đầu = 1 query aggregate trước from_date, sau đó stream từng dòng (iterator) và cộng dồn số dư
+          => không load toàn bộ dòng vào bộ nhớ
+    """
+    CHUNK_SIZE = 2000
+    LINE_FIELDS = (
+        'id', 'journal_entry_id', 'journal_entry__code', 'posting_date', 'period_mapped_id', 'sub_period_id',
+        'account_id', 'account_data', 'business_partner_id', 'business_partner_data', 'product_mapped_id',
+        'je_line_type', 'debit', 'credit',
+    )
+
+    def __init__(self, company_id, from_date=None, to_date=None, period_id=None, sub_period_id=None):
+        self.company_id = company_id
+        self.from_date = from_date
+        self.to_date = to_date
+        self.period_id = period_id
+        self.sub_period_id = sub_period_id
+        if not self.from_date:
+            # lọc theo kỳ => số dư đầu tính đến ngày bắt đầu kỳ
+            if sub_period_id:
+                self.from_date = SubPeriods.objects.filter(id=sub_period_id).values_list(
+                    'start_date', flat=True
+                ).first()
+            elif period_id:
+                self.from_date = Periods.objects.filter(id=period_id).values_list('start_date', flat=True).first()
+
+    @staticmethod
+    def start_of_day(value) -> datetime.datetime:
+        # so sánh trực tiếp posting_date với mốc datetime (không dùng __date) => dùng được index của posting_date
+        return datetime.datetime.combine(value, datetime.time.min)
+
+    def get_filter(self, **kwargs) -> Q:
+        filter_line = Q(company_id=self.company_id, je_state=1, **kwargs)
+        if self.period_id:
+            filter_line &= Q(period_mapped_id=self.period_id)
+        if self.sub_period_id:
+            filter_line &= Q(sub_period_id=self.sub_period_id)
+        if self.to_date:
+            filter_line &= Q(posting_date__lt=self.start_of_day(self.to_date + datetime.timedelta(days=1)))
+        return filter_line
+
+    def get_opening_balance(self, **kwargs) -> float:
+        """ Số dư (nợ - có) trước from_date """
+        if not self.from_date:
+            return 0
+        total = JournalEntryLine.objects.filter(
+            company_id=self.company_id, je_state=1, posting_date__lt=self.start_of_day(self.from_date), **kwargs
+        ).aggregate(debit=Sum('debit'), credit=Sum('credit'))
+        return (total['debit'] or 0) - (total['credit'] or 0)
+
+    def iter_lines(self, opening_balance=0, **kwargs):
+        """
+        Stream các dòng theo thứ tự ghi sổ kèm số dư lũy kế (balance = nợ - có)
+        """
+        filter_line = self.get_filter(**kwargs)
+        if self.from_date:
+            filter_line &= Q(posting_date__gte=self.start_of_day(self.from_date))
+        balance = opening_balance
+        for item in JournalEntryLine.objects.filter(filter_line).order_by(
+                'posting_date', 'journal_entry_id', 'je_line_type', 'order'
+        ).values(*self.LINE_FIELDS).iterator(chunk_size=self.CHUNK_SIZE):
+            balance += (item['debit'] or 0) - (item['credit'] or 0)
+            item['balance'] = balance
+            yield item
+
+    def iter_account_ledger(self, account_id):
+        """
+        Sổ cái của 1 tài khoản
+        Yields:
+            dict dòng (LINE_FIELDS) + 'balance'
+        """
+        opening_balance = self.get_opening_balance(account_id=account_id)
+        yield from self.iter_lines(opening_balance=opening_balance, account_id=account_id)
+
+    def iter_partner_ledger(self, business_partner_id, account_id=None):
+        """
+        Sổ chi tiết công nợ của 1 đối tác (theo 1 tài khoản công nợ hoặc tất cả tài khoản)
+        """
+        kwargs = {'business_partner_id': business_partner_id}
+        if account_id:
+            kwargs['account_id'] = account_id
+        opening_balance = self.get_opening_balance(**kwargs)
+        yield from self.iter_lines(opening_balance=opening_balance, **kwargs)
@@ -32,6 +32,7 @@ class UserList(AccountListMixin, AccountCreateMixin):
     serializer_list_minimal = UserListSerializer
     use_cache_queryset = True
     use_cache_minimal = True
+    cache_tables_relate = ['company_companyuseremployee']
     serializer_create = UserCreateSerializer
     serializer_detail = UserDetailSerializer
     list_hidden_field = ['tenant_current_id']
@@ -43,6 +44,10 @@ class UserList(AccountListMixin, AccountCreateMixin):
     def filter_kwargs_q(self) -> Q():
         return Q()
 
+    def get_list_cache_permit(self) -> str:
+        # list không lọc theo quyền (filter_kwargs_q = Q()) => key cache không tách theo quyền
+        return ''
+
     @property
     def filter_kwargs(self) -> dict[str, any]:
         if self.request.user.company_current_id:
@@ -245,6 +250,7 @@ class UserOfTenantList(AccountListMixin):
     serializer_list_minimal = UserListSerializer
     use_cache_queryset = True
     use_cache_minimal = True
+    cache_tables_relate = ['company_companyuseremployee']
     serializer_create = UserCreateSerializer
     serializer_detail = UserDetailSerializer
     list_hidden_field = ['tenant_current_id']
@@ -258,6 +264,10 @@ class UserOfTenantList(AccountListMixin):
     def filter_kwargs_q(self) -> Q():
         return Q()
 
+    def get_list_cache_permit(self) -> str:
+        # list không lọc theo quyền (filter_kwargs_q = Q()) => key cache không tách theo quyền
+        return ''
+
     @property
     def filter_kwargs(self) -> dict[str, any]:
         # if self.request.user.company_current_id:
@@ -0,0 +1,476 @@
+"""
+Import cả file (CSV/XLSX) của 1 API import ở background (ImportJob), thay vì FE gọi API import cho từng dòng.
+    - File đọc dạng generator theo dòng (ImportFileReader), dòng đầu là mã field của serializer create của API;
+      XLSX đọc thẳng xml của sheet đầu tiên bằng iterparse => bộ nhớ không tăng theo số dòng.
+    - Mỗi chunk (ImportJob.chunk_size dòng) validate bằng serializer create của API ở chế độ many=True, các dòng hợp lệ
+      ghi trong 1 transaction; chunk ghi lỗi => rollback cả chunk và các dòng của chunk đều báo lỗi.
+    - API mà create chỉ tạo bản ghi của model (ModelImportChunkHandler, theo Meta.model của serializer): validate đọc
+      qua ImportMapLookup (giá trị đã tồn tại 1 query / chunk, bảng tham chiếu 1 query / job), ghi bằng 1 bulk_create.
+      Import sản phẩm có handler riêng (ProductImportChunkHandler).
+    - API mà create có bước phụ qua save() / signal (vd: nhân viên, user, khách hàng) dùng ImportChunkHandler:
+      ghi từng dòng bằng serializer.create() như API import từng dòng, trong transaction của chunk.
+    - Kết quả từng dòng (số dòng, trạng thái, lỗi) ghi ra file CSV lưu vào attachments (ImportJob.result_file),
+      tiến trình cập nhật vào job sau mỗi chunk.
+API bật chế độ này bằng ImportJobMixin (apps.core.base.mixins), task chạy job: run_import_job (apps.core.base.tasks).
+"""
+import csv
+import io
+import json
+import os
+import posixpath
+import tempfile
+import zipfile
+from itertools import islice
+from xml.etree import ElementTree
+
+from crum import get_current_user
+from django.core.files import File
+from django.db import transaction
+from rest_framework import serializers
+
+from apps.core.base.models import ImportJob
+from apps.shared import DisperseModel, BaseMsg
+from apps.shared.extends.models import bulk_table_generation
+
+__all__ = [
+    'ImportFileReader', 'ImportLookup', 'ImportLookupMixin', 'ImportMapLookup',
+    'ImportChunkHandler', 'ModelImportChunkHandler', 'ImportJobRunner',
+]
+
+NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+class ImportFileReader:
+    """
+    Đọc file import theo dòng: for row_number, row in ImportFileReader(file_obj, file_name)
+        - CSV: UTF-8 (có/không BOM)
+        - XLSX: sheet đầu tiên, shared strings load 1 lần, dòng đã đọc bị xoá khỏi cây xml
+    Dòng trống bị bỏ qua, dòng đầu tiên có dữ liệu là header.
+    """
+    FORMATS = ('csv', 'xlsx')
+
+    def __init__(self, file_obj, file_name):
+        self.file_obj = file_obj
+        self.file_format = self.get_format(file_name)
+        self.headers = []
+
+    @classmethod
+    def get_format(cls, file_name) -> str:
+        file_format = os.path.splitext(file_name or '')[1].lower().lstrip('.')
+        if file_format not in cls.FORMATS:
+            raise ValueError(f'File format "{file_format}" is not supported, accept: {", ".join(cls.FORMATS)}.')
+        return file_format
+
+    def __iter__(self):
+        """ Yields: (số dòng trong file, {header: giá trị chuỗi}) """
+        self.headers = []
+        iter_values = self.iter_xlsx() if self.file_format == 'xlsx' else self.iter_csv()
+        for row_number, values in iter_values:
+            values = [str(value).strip() if value is not None else '' for value in values]
+            if not any(values):
+                continue
+            if not self.headers:
+                self.headers = values
+                continue
+            yield row_number, {
+                header: values[idx] if idx < len(values) else ''
+                for idx, header in enumerate(self.headers) if header
+            }
+
+    # ----- CSV -----
+
+    def iter_csv(self):
+        text_file = io.TextIOWrapper(self.file_obj, encoding='utf-8-sig', newline='')
+        try:
+            reader = csv.reader(text_file)
+            for values in reader:
+                yield reader.line_num, values
+        finally:
+            text_file.detach()
+
+    # ----- XLSX -----
+
+    @classmethod
+    def column_index(cls, cell_ref: str) -> int:
+        """ 'A1' => 0, 'AB12' => 27 """
+        idx = 0
+        for char in cell_ref:
+            if not char.isalpha():
+                break
+            idx = idx * 26 + ord(char.upper()) - 64
+        return idx - 1
+
+    @classmethod
+    def number_text(cls, value: str) -> str:
+        # số lưu dạng float trong xml (vd: 1001 hoặc 0.30000000000000004) => chuỗi như Excel hiển thị
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        if number.is_integer() and abs(number) < 1e15:
+            return str(int(number))
+        return format(number, '.15g')
+
+    @classmethod
+    def xlsx_sheet_path(cls, zip_file) -> str:
+        try:
+            workbook = ElementTree.fromstring(zip_file.read('xl/workbook.xml'))
+            rel_id = workbook.find(f'{NS_MAIN}sheets/{NS_MAIN}sheet').get(f'{NS_REL}id')
+            rels = ElementTree.fromstring(zip_file.read('xl/_rels/workbook.xml.rels'))
+            for rel in rels.iter(f'{NS_PKG_REL}Relationship'):
+                if rel.get('Id') == rel_id:
+                    target = rel.get('Target')
+                    return target.lstrip('/') if target.startswith('/') else posixpath.normpath('xl/' + target)
+        except (KeyError, AttributeError):
+            pass
+        return 'xl/worksheets/sheet1.xml'
+
+    @classmethod
+    def xlsx_shared_strings(cls, zip_file) -> list[str]:
+        result = []
+        if 'xl/sharedStrings.xml' not in zip_file.namelist():
+            return result
+        with zip_file.open('xl/sharedStrings.xml') as xml_file:
+            for _event, elem in ElementTree.iterparse(xml_file):
+                if elem.tag == f'{NS_MAIN}si':
+                    nodes = elem.findall(f'{NS_MAIN}t') + elem.findall(f'{NS_MAIN}r/{NS_MAIN}t')
+                    result.append(''.join(node.text or '' for node in nodes))
+                    elem.clear()
+        return result
+
+    @classmethod
+    def xlsx_cell_value(cls, cell, shared_strings) -> str:
+        cell_type = cell.get('t', 'n')
+        if cell_type == 'inlineStr':
+            return ''.join(node.text or '' for node in cell.iter(f'{NS_MAIN}t'))
+        value = cell.find(f'{NS_MAIN}v')
+        if value is None or value.text is None:
+            return ''
+        if cell_type == 's':
+            return shared_strings[int(value.text)]
+        if cell_type == 'n':
+            return cls.number_text(value.text)
+        return value.text
+
+    def iter_xlsx(self):
+        with zipfile.ZipFile(self.file_obj) as zip_file:
+            shared_strings = self.xlsx_shared_strings(zip_file)
+            with zip_file.open(self.xlsx_sheet_path(zip_file)) as xml_file:
+                sheet_data, row_count = None, 0
+                for event, elem in ElementTree.iterparse(xml_file, events=('start', 'end')):
+                    if event == 'start':
+                        if elem.tag == f'{NS_MAIN}sheetData':
+                            sheet_data = elem
+                        continue
+                    if elem.tag != f'{NS_MAIN}row':
+                        continue
+                    row_count += 1
+                    values = []
+                    for cell in elem.iter(f'{NS_MAIN}c'):
+                        cell_ref = cell.get('r', None)
+                        if cell_ref:
+                            values.extend([''] * (self.column_index(cell_ref) - len(values)))
+                        values.append(self.xlsx_cell_value(cell, shared_strings))
+                    yield int(elem.get('r', row_count)), values
+                    if sheet_data is not None:
+                        sheet_data.remove(elem)
+
+
+class ImportLookup:
+    """
+    Tra cứu khi validate dòng import: giá trị đã tồn tại, bản ghi tham chiếu theo mã.
+    Mặc định query theo từng dòng (API import từng dòng), ImportMapLookup nạp trước khi import cả file.
+    Serializer lấy qua ImportLookupMixin (self.import_lookup), queryset truyền vào giữ điều kiện lọc của serializer.
+    """
+
+    @classmethod
+    def from_context(cls, context) -> 'ImportLookup':
+        return (context or {}).get('import_lookup', None) or cls()
+
+    def value_exist(self, queryset, field_name, value, row_field=None) -> bool:  # pylint: disable=W0613
+        # row_field: cột của dòng import chứa giá trị (mặc định = field_name), vd: 'group__code' <=> cột 'group'
+        return queryset.filter(**{field_name: value}).exists()
+
+    def get_reference(self, queryset, code):
+        """ Không có => queryset.model.DoesNotExist """
+        return queryset.get(code=code)
+
+
+class ImportLookupMixin:
+    """ Serializer create của API import: self.import_lookup theo context (import cả file) hoặc query từng dòng """
+
+    @property
+    def import_lookup(self) -> ImportLookup:
+        return ImportLookup.from_context(getattr(self, 'context', None))
+
+
+class ImportMapLookup(ImportLookup):
+    """
+    Import cả file:
+        - value_exist: query 1 lần / chunk cho mọi giá trị của field trong chunk (set_chunk)
+        - get_reference: nạp cả bảng tham chiếu 1 lần / job vào dict {mã: obj} (trùng mã => bản ghi đầu như .first())
+    Giá trị không có trong dòng của chunk (vd: validate đã đổi giá trị) => query như ImportLookup.
+    Chuỗi so sánh không phân biệt hoa thường như collation của MySQL.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.existed = {}
+        self.references = {}
+
+    def set_chunk(self, rows: list[dict]):
+        self.rows = rows
+        self.existed = {}
+
+    @classmethod
+    def key_value(cls, value):
+        return value.casefold() if isinstance(value, str) else value
+
+    def value_exist(self, queryset, field_name, value, row_field=None) -> bool:
+        row_field = row_field or field_name
+        key = (queryset.model, field_name, row_field)
+        if key not in self.existed:
+            values = {str(row[row_field]) for row in self.rows if row.get(row_field, None) not in (None, '')}
+            existed = {
+                self.key_value(item)
+                for item in queryset.filter(**{f'{field_name}__in': list(values)}).values_list(field_name, flat=True)
+            } if values else set()
+            self.existed[key] = (values, existed)
+        values, existed = self.existed[key]
+        if str(value) not in values:
+            return super().value_exist(queryset, field_name, value)
+        return self.key_value(value) in existed
+
+    def get_reference(self, queryset, code):
+        key = queryset.model
+        if key not in self.references:
+            objs = {}
+            for obj in queryset:
+                objs.setdefault(obj.code, obj)
+            self.references[key] = objs
+        obj = self.references[key].get(code, None)
+        if obj is None:
+            raise queryset.model.DoesNotExist
+        return obj
+
+
+class ImportChunkHandler:
+    """
+    Validate + ghi 1 chunk dòng import bằng serializer create của API (view_class.serializer_create).
+    API override qua import_chunk_class:
+        - prefetch(): nạp bảng tham chiếu 1 lần / job vào self.context (serializer đọc qua context)
+        - parse_row(): chuyển giá trị chuỗi của file về dạng API nhận
+        - prepare_chunk() / check_chunk(): query dùng chung cho chunk, kiểm tra trùng trong file
+        - write_chunk(): ghi các dòng hợp lệ (vd: bulk_create)
+    """
+
+    def __init__(self, job: ImportJob, view_class):
+        self.job = job
+        self.view_class = view_class
+        self.serializer_class = view_class.serializer_create
+        self.context = self.get_context()
+        self.extras = self.get_extras()
+        self.optional_fields = {
+            name for name, field in self.serializer_class().fields.items() if not field.required and not field.read_only
+        }
+
+    def get_context(self) -> dict:
+        # giống ser_context API đặt trong post (ImportJobMixin.get_import_context), user là người tạo job
+        get_import_context = getattr(self.view_class, 'get_import_context', None)
+        return get_import_context(get_current_user()) if get_import_context else {}
+
+    def get_extras(self) -> dict:
+        # field ẩn của API create (create_hidden_field) lấy theo người tạo job
+        values = {
+            'tenant_id': self.job.tenant_id,
+            'tenant_current_id': self.job.tenant_id,
+            'company_id': self.job.company_id,
+            'employee_created_id': self.job.employee_created_id,
+            'employee_inherit_id': self.job.employee_created_id,
+        }
+        extras = {}
+        for key in getattr(self.view_class, 'create_hidden_field', None) or []:
+            if key not in values:
+                raise ValueError(f'Hidden field "{key}" is not supported by import job.')
+            extras[key] = values[key]
+        return extras
+
+    def prefetch(self):
+        return None
+
+    def parse_row(self, row: dict) -> dict:
+        # ô trống của field không bắt buộc => coi như không gửi (dùng default của serializer)
+        return {key: value for key, value in row.items() if value != '' or key not in self.optional_fields}
+
+    def prepare_chunk(self, rows: list[dict]):  # pylint: disable=W0613
+        return None
+
+    def validate_chunk(self, rows: list[dict]) -> tuple[list[int], list[dict], dict]:
+        """
+        Validate many=True, chunk có dòng lỗi => validate lại các dòng còn lại (không lưu được validated_data từng phần)
+        Returns: (vị trí các dòng hợp lệ, validated_data tương ứng, {vị trí dòng lỗi: errors})
+        """
+        indexes, errors = list(range(len(rows))), {}
+        while indexes:
+            serializer = self.serializer_class(data=[rows[idx] for idx in indexes], many=True, context=self.context)
+            if serializer.is_valid():
+                return indexes, list(serializer.validated_data), errors
+            if not isinstance(serializer.errors, list):
+                errors.update({idx: serializer.errors for idx in indexes})
+                break
+            errors_chunk = {indexes[pos]: err for pos, err in enumerate(serializer.errors) if err}
+            errors.update(errors_chunk)
+            indexes = [idx for idx in indexes if idx not in errors_chunk]
+        return [], [], errors
+
+    def check_chunk(self, validated_list: list[dict]) -> dict:  # pylint: disable=W0613
+        """ Returns: {vị trí trong validated_list: errors} các dòng hợp lệ nhưng không được ghi """
+        return {}
+
+    def write_chunk(self, validated_list: list[dict]) -> list:
+        # mặc định: ghi từng dòng như API import từng dòng (serializer.save(**extras)), không bulk_create
+        serializer = self.serializer_class(context=self.context)
+        return [serializer.create({**validated_data, **self.extras}) for validated_data in validated_list]
+
+    def finish(self):
+        return None
+
+
+class ModelImportChunkHandler(ImportChunkHandler):
+    """
+    Import cả file cho API mà create chỉ là Model.objects.create(**validated_data), model = Meta.model của serializer.
+        - validate của serializer đọc qua ImportMapLookup (context 'import_lookup')
+        - import_unique_fields của API (mặc định ('code',)): trùng trong cùng chunk => giữ dòng đầu
+          (dòng của chunk trước đã ghi => validate thấy đã tồn tại)
+        - ghi cả chunk bằng 1 bulk_create, after_bulk_create cho bước cập nhập sau khi tạo,
+          bulk_create không phát signal => tăng generation cache của bảng (bulk_table_generation)
+    """
+
+    def __init__(self, job: ImportJob, view_class):
+        super().__init__(job=job, view_class=view_class)
+        self.model_cls = self.serializer_class.Meta.model
+        self.unique_fields = tuple(getattr(view_class, 'import_unique_fields', None) or ('code',))
+
+    def prefetch(self):
+        self.context['import_lookup'] = ImportMapLookup()
+
+    def prepare_chunk(self, rows: list[dict]):
+        self.context['import_lookup'].set_chunk(rows)
+
+    def check_chunk(self, validated_list: list[dict]) -> dict:
+        errors, values = {}, {field_name: set() for field_name in self.unique_fields}
+        for pos, validated_data in enumerate(validated_list):
+            for field_name in self.unique_fields:
+                value = validated_data.get(field_name, None)
+                if value in (None, ''):
+                    continue
+                if value in values[field_name]:
+                    errors.setdefault(pos, {})[field_name] = BaseMsg.CAUSE_DUPLICATE
+                values[field_name].add(value)
+        return errors
+
+    def after_bulk_create(self, objs: list):  # pylint: disable=W0613
+        return None
+
+    def write_chunk(self, validated_list: list[dict]) -> list:
+        objs = self.model_cls.objects.bulk_create(
+            [self.model_cls(**{**validated_data, **self.extras}) for validated_data in validated_list]
+        )
+        self.after_bulk_create(objs)
+        bulk_table_generation(self.model_cls, tenant_id=self.job.tenant_id, company_id=self.job.company_id)
+        return objs
+
+
+class ImportJobRunner:
+    RESULT_COLUMNS = ['import_row', 'import_status', 'import_errors']
+    STATUS_SUCCESS = 'success'
+    STATUS_ERROR = 'error'
+
+    def __init__(self, job: ImportJob, view_class):
+        self.job = job
+        handler_class = getattr(view_class, 'import_chunk_class', None) or ImportChunkHandler
+        self.handler = handler_class(job=job, view_class=view_class)
+
+    @classmethod
+    def parse_errors(cls, errors) -> str:
+        if isinstance(errors, serializers.ValidationError):
+            errors = errors.detail
+        elif isinstance(errors, Exception):
+            errors = {'detail': str(errors)}
+        return json.dumps(errors, ensure_ascii=False, default=str)
+
+    def run_chunk(self, rows: list[dict]) -> list[tuple[str, str]]:
+        """ Returns: [(trạng thái, lỗi)] theo thứ tự rows """
+        result = [(self.STATUS_SUCCESS, '')] * len(rows)
+        rows = [self.handler.parse_row(row) for row in rows]
+        self.handler.prepare_chunk(rows)
+        indexes, validated_list, errors = self.handler.validate_chunk(rows)
+        errors_check = self.handler.check_chunk(validated_list)
+        if errors_check:
+            errors.update({indexes[pos]: err for pos, err in errors_check.items()})
+            keep = [pos for pos in range(len(indexes)) if pos not in errors_check]
+            indexes, validated_list = [indexes[pos] for pos in keep], [validated_list[pos] for pos in keep]
+        if validated_list:
+            try:
+                with transaction.atomic():
+                    self.handler.write_chunk(validated_list)
+            except Exception as err:
+                errors.update({idx: err for idx in indexes})
+        for idx, err in errors.items():
+            result[idx] = (self.STATUS_ERROR, self.parse_errors(err))
+        return result
+
+    def update_progress(self, result):
+        self.job.row_total += len(result)
+        self.job.row_error += sum(1 for status, _errors in result if status == self.STATUS_ERROR)
+        self.job.row_success = self.job.row_total - self.job.row_error
+        self.job.save(update_fields=['row_total', 'row_success', 'row_error'])
+
+    def run_rows(self, reader: ImportFileReader, writer):
+        """ Chạy từng chunk dòng của file, ghi dòng + kết quả vào file kết quả """
+        self.handler.prefetch()
+        iter_rows, has_header = iter(reader), False
+        while True:
+            rows = list(islice(iter_rows, self.job.chunk_size or 500))
+            if not has_header:
+                writer.writerow(reader.headers + self.RESULT_COLUMNS)
+                has_header = True
+            if not rows:
+                break
+            result = self.run_chunk([row for _row_number, row in rows])
+            for (row_number, row), (status, errors) in zip(rows, result):
+                writer.writerow([row.get(header, '') for header in reader.headers] + [row_number, status, errors])
+            self.update_progress(result)
+        self.handler.finish()
+
+    def save_result(self, result_file, file_size):
+        file_name = os.path.splitext(self.job.file.file_name)[0] + '_result.csv'
+        files_cls = DisperseModel(app_model='attachments.Files').get_model()
+        return files_cls.objects.create(
+            tenant_id=self.job.tenant_id,
+            company_id=self.job.company_id,
+            employee_created_id=self.job.employee_created_id,
+            file_name=file_name,
+            file_size=file_size,
+            file_type='text/csv',
+            remarks=f'Import {self.job.import_code}',
+            file=File(result_file, name=file_name),
+        )
+
+    def run(self):
+        """ Returns: Files của file CSV kết quả """
+        with tempfile.TemporaryFile() as source_file, tempfile.TemporaryFile() as result_file:
+            for chunk in self.job.file.file.chunks():
+                source_file.write(chunk)
+            source_file.seek(0)
+
+            text_file = io.TextIOWrapper(result_file, encoding='utf-8-sig', newline='')
+            self.run_rows(ImportFileReader(source_file, self.job.file.file_name), csv.writer(text_file))
+            text_file.flush()
+            text_file.detach()
+
+            file_size = result_file.tell()
+            result_file.seek(0)
+            return self.save_result(result_file, file_size)
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.8 on 2026-10-18 19:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0023_companyconfig_shift_companyconfig_shift_data_and_more'),
+        ('hr', '0005_permissiongrant'),
+        ('tenant', '0001_initial'),
+        ('attachments', '0017_folder_module_id'),
+        ('base', '0019_nprovince_nward'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(blank=True, max_length=100)),
+                ('code', models.CharField(blank=True, max_length=100)),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='The record created at value')),
+                ('date_modified', models.DateTimeField(auto_now=True, help_text='Date modified this record in last')),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_delete', models.BooleanField(default=False)),
+                ('state', models.SmallIntegerField(choices=[(0, 'Waiting'), (1, 'Running'), (2, 'Done'), (3, 'Failed')], default=0)),
+                ('import_code', models.CharField(help_text='url name của API import, vd: ProductImportList', max_length=100)),
+                ('chunk_size', models.PositiveIntegerField(default=500)),
+                ('row_total', models.PositiveIntegerField(default=0, help_text='Số dòng đã xử lý')),
+                ('row_success', models.PositiveIntegerField(default=0)),
+                ('row_error', models.PositiveIntegerField(default=0)),
+                ('msg', models.TextField(blank=True)),
+                ('date_started', models.DateTimeField(null=True)),
+                ('date_finished', models.DateTimeField(null=True)),
+                ('company', models.ForeignKey(help_text='The company claims that this record belongs to them', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_belong_to_company', to='company.company')),
+                ('employee_created', models.ForeignKey(help_text='Employee created this record', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_employee_creator', to='hr.employee')),
+                ('employee_modified', models.ForeignKey(help_text='Employee modified this record in last', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_employee_modifier', to='hr.employee')),
+                ('file', models.ForeignKey(help_text='File import (CSV/XLSX), dòng đầu là mã field của API import', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_job_file', to='attachments.files')),
+                ('result_file', models.ForeignKey(help_text='File CSV kết quả: dữ liệu gốc + số dòng, trạng thái, lỗi của từng dòng', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_job_result_file', to='attachments.files')),
+                ('tenant', models.ForeignKey(help_text='The tenant claims that this record belongs to them', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_belong_to_tenant', to='tenant.tenant')),
+            ],
+            options={
+                'verbose_name': 'Import Job',
+                'verbose_name_plural': 'Import Jobs',
+                'ordering': ('-date_created',),
+                'permissions': (),
+                'default_permissions': (),
+            },
+        ),
+    ]
@@ -1,5 +1,8 @@
+from apps.core.base.import_job import ImportChunkHandler
 from apps.core.base.models import PlanApplication
-from apps.shared import ResponseController, BaseListMixin
+from apps.core.base.serializers import ImportJobCreateSerializer, ImportJobListSerializer
+from apps.core.base.tasks import run_import_job
+from apps.shared import ResponseController, BaseListMixin, call_task_background
 
 
 class ApplicationListMixin(BaseListMixin):
@@ -21,3 +24,42 @@ class ApplicationListMixin(BaseListMixin):
 
         serializer = self.get_serializer_list(queryset, many=True)
         return ResponseController.success_200(data=serializer.data, key_data='result')
+
+
+class ImportJobMixin:
+    """
+    Import cả file ở background cho API import (đặt trước BaseCreateMixin):
+        POST ?import_background=1, body {'file': id file đã upload (attachments), 'chunk_size': 500}
+        => tạo ImportJob, task run_import_job validate + ghi theo chunk, FE theo dõi job qua API import-data/job
+    Không có ?import_background=1 => import từng dòng như cũ.
+    Job ghi bằng import_chunk_class: mặc định ImportChunkHandler (serializer.create từng dòng trong transaction
+    của chunk), API mà create chỉ tạo bản ghi của model dùng ModelImportChunkHandler (bulk_create,
+    import_unique_fields: field kiểm tra trùng trong chunk), sản phẩm / đơn vị tính có handler riêng.
+    """
+    import_chunk_class = ImportChunkHandler
+
+    @classmethod
+    def get_import_context(cls, user) -> dict:  # pylint: disable=W0613
+        # context của serializer create (ser_context) theo user, dùng chung cho import từng dòng và import cả file
+        return {}
+
+    def create(self, request, *args, **kwargs):
+        if request.query_params.get('import_background', None) in ['1', 'true', 'True']:
+            return self.import_background(request)
+        return super().create(request, *args, **kwargs)
+
+    def import_background(self, request):
+        field_hidden = self.cls_check.attr.setup_hidden(from_view='create')
+        if self.check_perm_by_obj_or_body_data(body_data=field_hidden, hidden_field=self.create_hidden_field) is True:
+            serializer = ImportJobCreateSerializer(data=request.data, context={'user': request.user})
+            serializer.is_valid(raise_exception=True)
+            job = serializer.save(
+                tenant_id=request.user.tenant_current_id,
+                company_id=request.user.company_current_id,
+                employee_created_id=request.user.employee_current_id,
+                import_code=self.__class__.__name__,
+            )
+            call_task_background(my_task=run_import_job, **{'job_id': str(job.id)})
+            job.refresh_from_db()
+            return ResponseController.success_200(data=ImportJobListSerializer(job).data, key_data='result')
+        return ResponseController.forbidden_403()
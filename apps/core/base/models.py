@@ -807,3 +807,41 @@ class AppEmpConfigZonesHidden(SimpleAbstractModel):
         verbose_name_plural = 'Employees Zones Hidden'
         default_permissions = ()
         permissions = ()
+
+
+# - ImportJob: import cả file (CSV/XLSX) của 1 API import ở background, đọc theo chunk,
+#   kết quả từng dòng (thành công/lỗi) ghi ra file CSV trong attachments
+
+IMPORT_JOB_STATE = [
+    (0, 'Waiting'),
+    (1, 'Running'),
+    (2, 'Done'),
+    (3, 'Failed'),
+]
+
+
+class ImportJob(MasterDataAbstractModel):
+    state = models.SmallIntegerField(choices=IMPORT_JOB_STATE, default=0)
+    import_code = models.CharField(max_length=100, help_text='url name của API import, vd: ProductImportList')
+    file = models.ForeignKey(
+        'attachments.Files', on_delete=models.SET_NULL, null=True, related_name='import_job_file',
+        help_text='File import (CSV/XLSX), dòng đầu là mã field của API import',
+    )
+    result_file = models.ForeignKey(
+        'attachments.Files', on_delete=models.SET_NULL, null=True, related_name='import_job_result_file',
+        help_text='File CSV kết quả: dữ liệu gốc + số dòng, trạng thái, lỗi của từng dòng',
+    )
+    chunk_size = models.PositiveIntegerField(default=500)
+    row_total = models.PositiveIntegerField(default=0, help_text='Số dòng đã xử lý')
+    row_success = models.PositiveIntegerField(default=0)
+    row_error = models.PositiveIntegerField(default=0)
+    msg = models.TextField(blank=True)
+    date_started = models.DateTimeField(null=True)
+    date_finished = models.DateTimeField(null=True)
+
+    class Meta:
+        verbose_name = 'Import Job'
+        verbose_name_plural = 'Import Jobs'
+        ordering = ('-date_created',)
+        default_permissions = ()
+        permissions = ()
@@ -5,10 +5,12 @@ from django.utils.translation import gettext_lazy as trans
 from apps.core.base.models import (
     SubscriptionPlan, Application, ApplicationProperty, PermissionApplication,
     Country, City, District, Ward, Currency as BaseCurrency, BaseItemUnit, IndicatorParam, Zones, ZonesProperties,
-    ApplicationEmpConfig, AppEmpConfigZonesHidden, AppEmpConfigZonesEditing, NProvince, NWard
+    ApplicationEmpConfig, AppEmpConfigZonesHidden, AppEmpConfigZonesEditing, NProvince, NWard, ImportJob
 )
+from apps.core.base.import_job import ImportFileReader
 from apps.core.hr.models import Employee
-from apps.shared import BaseMsg
+from apps.shared import BaseMsg, DisperseModel
+from apps.shared.translations.base import AttachmentMsg
 
 
 # Subscription Plan
@@ -426,3 +428,55 @@ class NWardListSerializer(serializers.ModelSerializer):
     class Meta:
         model = NWard
         fields = ('id', 'fullname')
+
+
+# Import Job
+class ImportJobCreateSerializer(serializers.ModelSerializer):
+    file = serializers.UUIDField()
+    chunk_size = serializers.IntegerField(required=False, min_value=1, max_value=5000)
+
+    class Meta:
+        model = ImportJob
+        fields = ('file', 'chunk_size')
+
+    def validate_file(self, value):
+        user = self.context.get('user', None)
+        file_obj = DisperseModel(app_model='attachments.Files').get_model().objects.filter(
+            id=value, tenant_id=user.tenant_current_id, company_id=user.company_current_id,
+        ).first() if user else None
+        if not file_obj:
+            raise serializers.ValidationError(AttachmentMsg.FILE_NOT_FOUND)
+        if file_obj.file_name.rsplit('.', 1)[-1].lower() not in ImportFileReader.FORMATS:
+            raise serializers.ValidationError(BaseMsg.FORMAT_NOT_MATCH)
+        return file_obj
+
+
+class ImportJobListSerializer(serializers.ModelSerializer):
+    file = serializers.SerializerMethodField()
+    result_file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = (
+            'id',
+            'state',
+            'import_code',
+            'file',
+            'result_file',
+            'chunk_size',
+            'row_total',
+            'row_success',
+            'row_error',
+            'msg',
+            'date_created',
+            'date_started',
+            'date_finished',
+        )
+
+    @classmethod
+    def get_file(cls, obj):
+        return obj.file.get_detail() if obj.file else {}
+
+    @classmethod
+    def get_result_file(cls, obj):
+        return obj.result_file.get_detail() if obj.result_file else {}
@@ -0,0 +1,49 @@
+from celery import shared_task
+from crum import impersonate
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from apps.core.base.import_job import ImportJobRunner
+from apps.core.base.models import ImportJob
+
+
+def get_job_user(job: ImportJob):
+    """
+    User của người tạo job, phạm vi dữ liệu (tenant, company, employee) lấy theo job thay vì công ty user đang chọn
+    lúc task chạy => filter_on_company / field ẩn đúng công ty đã tạo job. Chỉ gán trên object, không lưu.
+    """
+    employee_obj = job.employee_created
+    user = employee_obj.user if employee_obj else None
+    if not user or employee_obj.tenant_id != job.tenant_id or employee_obj.company_id != job.company_id:
+        raise ValueError('Employee created is not working in company of this import job.')
+    user.tenant_current_id = job.tenant_id
+    user.company_current_id = job.company_id
+    user.employee_current_id = job.employee_created_id
+    return user
+
+
+@shared_task
+def run_import_job(job_id):
+    # import cả file ở background dưới quyền người tạo job, FE theo dõi tiến trình + tải file kết quả qua attachments
+    job = ImportJob.objects.select_related('file', 'employee_created__user').filter(id=job_id, state=0).first()
+    if not job:
+        return False
+    job.state = 1
+    job.date_started = timezone.now()
+    job.save(update_fields=['state', 'date_started'])
+    try:
+        user = get_job_user(job)
+        if not job.file:
+            raise ValueError('File import does not exist.')
+        view_class = getattr(resolve(reverse(job.import_code)).func, 'view_class', None)
+        if not getattr(view_class, 'serializer_create', None):
+            raise ValueError(f'API {job.import_code} does not support import.')
+        with impersonate(user):
+            job.result_file = ImportJobRunner(job=job, view_class=view_class).run()
+        job.state = 2
+    except Exception as err:
+        job.state = 3
+        job.msg = str(err)
+    job.date_finished = timezone.now()
+    job.save(update_fields=['state', 'result_file', 'msg', 'date_finished'])
+    return job.state == 2
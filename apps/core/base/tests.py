@@ -1,3 +1,139 @@
-from django.test import TestCase
+import io
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from crum import get_current_user, impersonate
+from django.test import SimpleTestCase, TestCase
+
+from apps.core.account.models import User
+from apps.core.account.views_import import CoreAccountUserImport
+from apps.core.attachments.models import Files
+from apps.core.base.import_job import ImportChunkHandler, ImportFileReader, ImportJobRunner
+from apps.core.base.models import ImportJob
+from apps.core.base.tasks import get_job_user, run_import_job
+from apps.core.company.models import Company
+from apps.core.hr.models import Employee
+from apps.core.hr.views.fimport import GroupLevelImport
+from apps.core.tenant.models import Tenant
+from apps.shared.extends.tests import bulk_new
+
+XLSX_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+XLSX_WORKBOOK = (
+    f'<workbook {XLSX_NS} xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Data" sheetId="1" r:id="rId3"/></sheets></workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId3" Target="worksheets/data.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '</Relationships>'
+)
+XLSX_SHARED_STRINGS = (
+    f'<sst {XLSX_NS}><si><t>code</t></si><si><t>title</t></si><si><t>price</t></si>'
+    '<si><r><t>Sản phẩm </t></r><r><t>A</t></r></si><si><t>P001</t></si></sst>'
+)
+XLSX_SHEET = (
+    f'<worksheet {XLSX_NS}><sheetData>'
+    '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="C1" t="s"><v>2</v></c></row>'
+    '<row r="3"><c r="A3" t="s"><v>4</v></c><c r="B3" t="s"><v>3</v></c><c r="C3"><v>1500000</v></c></row>'
+    '<row r="4"><c r="A4"><v>1002</v></c><c r="C4"><v>0.30000000000000004</v></c></row>'
+    '<row r="5"><c r="B5" t="inlineStr"><is><t>Inline</t></is></c></row>'
+    '<row r="6"><c r="A6" t="s"></c></row>'
+    '</sheetData></worksheet>'
+)
+
+
+def make_xlsx() -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_file:
+        zip_file.writestr('xl/workbook.xml', XLSX_WORKBOOK)
+        zip_file.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        zip_file.writestr('xl/sharedStrings.xml', XLSX_SHARED_STRINGS)
+        zip_file.writestr('xl/worksheets/data.xml', XLSX_SHEET)
+    buffer.seek(0)
+    return buffer
+
+
+class ImportFileReaderTestCase(SimpleTestCase):
+    def test_csv(self):
+        content = '\ufeffcode,title,price\n\nP001, Sản phẩm A ,1500000\n,,\nP002,"B, C"\n'
+        reader = ImportFileReader(io.BytesIO(content.encode('utf-8')), 'product.CSV')
+        self.assertEqual(list(reader), [
+            (3, {'code': 'P001', 'title': 'Sản phẩm A', 'price': '1500000'}),
+            (5, {'code': 'P002', 'title': 'B, C', 'price': ''}),
+        ])
+        self.assertEqual(reader.headers, ['code', 'title', 'price'])
+
+    def test_xlsx(self):
+        reader = ImportFileReader(make_xlsx(), 'product.xlsx')
+        self.assertEqual(list(reader), [
+            (3, {'code': 'P001', 'title': 'Sản phẩm A', 'price': '1500000'}),
+            (4, {'code': '1002', 'title': '', 'price': '0.3'}),
+            (5, {'code': '', 'title': 'Inline', 'price': ''}),
+        ])
+
+    def test_format(self):
+        self.assertEqual(ImportFileReader.column_index('AB12'), 27)
+        with self.assertRaises(ValueError):
+            ImportFileReader(io.BytesIO(b''), 'product.xls')
+
+
+class ImportJobScopeTestCase(TestCase):
+    """ Người tạo job đang chọn công ty khác lúc task chạy => vẫn import vào công ty của job """
+
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_JOB')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_JOB', tenant=self.tenant)
+        self.company_other = bulk_new(
+            Company, title='Company other', code='COMPANY_JOB_OTHER', sub_domain='other', tenant=self.tenant
+        )
+        self.user = bulk_new(
+            User, username='import', username_auth='import-job', tenant_current=self.tenant,
+            company_current=self.company_other,
+        )
+        self.employee = bulk_new(
+            Employee, first_name='Import', last_name='Job', code='EMP_JOB', user=self.user, tenant=self.tenant,
+            company=self.company,
+        )
+        self.job = bulk_new(
+            ImportJob, import_code='GroupLevelImport', tenant=self.tenant, company=self.company,
+            employee_created=self.employee, file=bulk_new(Files, file_name='group_level.csv', file_size=0),
+        )
+
+    def test_job_user(self):
+        user = get_job_user(self.job)
+        self.assertEqual(
+            (user.tenant_current_id, user.company_current_id, user.employee_current_id),
+            (self.tenant.id, self.company.id, self.employee.id),
+        )
+        # chỉ gán trên object, công ty đang chọn của user không đổi
+        self.assertEqual(User.objects.get(id=self.user.id).company_current_id, self.company_other.id)
+
+        self.job.employee_created = bulk_new(
+            Employee, first_name='Other', last_name='Job', code='EMP_JOB_OTHER', user=self.user, tenant=self.tenant,
+            company=self.company_other,
+        )
+        with self.assertRaises(ValueError):
+            get_job_user(self.job)
+
+    def test_handler_context(self):
+        with impersonate(get_job_user(self.job)):
+            handler = ImportChunkHandler(job=self.job, view_class=GroupLevelImport)
+            self.assertEqual(handler.context, {'company_current_id': self.company.id})
+            self.assertEqual(handler.extras, {'tenant_id': self.tenant.id, 'company_id': self.company.id})
+            handler = ImportChunkHandler(job=self.job, view_class=CoreAccountUserImport)
+            self.assertEqual(handler.context['company_current'].id, self.company.id)
+            self.assertEqual(handler.extras, {'tenant_current_id': self.tenant.id})
+
+    def test_run_in_job_company(self):
+        scopes = []
+
+        def run(runner):
+            user = get_current_user()
+            scopes.append((runner.handler.view_class, user.company_current_id, runner.handler.context))
+
+        with mock.patch.object(ImportJobRunner, 'run', autospec=True, side_effect=run):
+            self.assertIs(run_import_job(str(self.job.id)), True)
+        self.assertEqual(scopes, [(GroupLevelImport, self.company.id, {'company_current_id': self.company.id})])
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.state, self.job.msg), (2, ''))
@@ -10,7 +10,7 @@ from apps.shared import ResponseController, BaseListMixin, mask_view, BaseRetrie
 from apps.core.base.models import (
     SubscriptionPlan, Application, ApplicationProperty, PermissionApplication,
     Country, City, District, Ward, Currency as BaseCurrency, BaseItemUnit, IndicatorParam, PlanApplication, Zones,
-    ApplicationEmpConfig, NProvince, NWard
+    ApplicationEmpConfig, NProvince, NWard, ImportJob
 )
 
 from apps.core.base.serializers import (
@@ -20,7 +20,7 @@ from apps.core.base.serializers import (
     BaseItemUnitListSerializer, IndicatorParamListSerializer, ApplicationPropertyForPrintListSerializer,
     ApplicationPropertyForMailListSerializer, ZonesCreateUpdateSerializer, ZonesListSerializer,
     ApplicationZonesListSerializer, AppEmpConfigListSerializer, AppEmpConfigCreateUpdateSerializer,
-    NProvinceListSerializer, NWardListSerializer,
+    NProvinceListSerializer, NWardListSerializer, ImportJobListSerializer,
 )
 
 
@@ -606,3 +606,38 @@ class NWardList(BaseListMixin):
     @mask_view(login_require=False)
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
+
+
+class ImportJobList(BaseListMixin):
+    queryset = ImportJob.objects
+    serializer_list = ImportJobListSerializer
+    list_hidden_field = BaseListMixin.LIST_HIDDEN_FIELD_DEFAULT
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('file', 'result_file').filter(
+            employee_created_id=self.request.user.employee_current_id
+        )
+
+    @swagger_auto_schema(
+        operation_summary="Import job list",
+        operation_description="Background file imports of current employee",
+    )
+    @mask_view(login_require=True, auth_require=False, employee_require=True)
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class ImportJobDetail(BaseRetrieveMixin):
+    queryset = ImportJob.objects
+    serializer_detail = ImportJobListSerializer
+    retrieve_hidden_field = BaseRetrieveMixin.RETRIEVE_MASTER_DATA_FIELD_HIDDEN_DEFAULT
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('file', 'result_file').filter(
+            employee_created_id=self.request.user.employee_current_id
+        )
+
+    @swagger_auto_schema(operation_summary='Import job detail')
+    @mask_view(login_require=True, auth_require=False, employee_require=True)
+    def get(self, request, *args, pk, **kwargs):
+        return self.retrieve(request, *args, pk, **kwargs)
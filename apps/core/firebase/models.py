@@ -1,5 +1,5 @@
 from django.db import models
-from apps.shared import SimpleAbstractModel
+from apps.shared.extends.models import SimpleAbstractModel
 
 
 class DeviceToken(SimpleAbstractModel):
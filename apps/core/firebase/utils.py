@@ -1,11 +1,14 @@
 from django.conf import settings
 from firebase_admin import messaging
+from firebase_admin.exceptions import FirebaseError
 from firebase_admin.messaging import UnregisteredError
 
 from apps.core.firebase.models import DeviceToken
 
 
 class FCMNotify:
+    MULTICAST_MAX_TOKENS = 500  # giới hạn token của 1 lần send_each_for_multicast
+
     @classmethod
     def destroy_token_of_user(cls, user_obj):
         if user_obj:
@@ -41,3 +44,77 @@ class FCMNotify:
                     return False
                 return True
         return False
+
+    @classmethod
+    def get_token_of_users(cls, user_ids) -> dict[str, str]:
+        # giống send_fcm_notification: dùng token active mới nhất của user
+        token_of_user = {}
+        for user_id, token in DeviceToken.objects.filter(
+                user_id__in=user_ids, is_active=True
+        ).order_by('-created_at').values_list('user_id', 'token'):
+            token_of_user.setdefault(str(user_id), token)
+        return token_of_user
+
+    @classmethod
+    def send_multicast(cls, title: str, body: str, data: dict, tokens: list[str]) -> tuple[int, list[str]]:
+        """
+        Gửi 1 nội dung tới tokens (chia lô MULTICAST_MAX_TOKENS)
+        Returns:
+            (số message gửi thành công, token không còn đăng ký)
+        """
+        count, token_unregistered = 0, []
+        for idx in range(0, len(tokens), cls.MULTICAST_MAX_TOKENS):
+            tokens_batch = tokens[idx:idx + cls.MULTICAST_MAX_TOKENS]
+            try:
+                response = messaging.send_each_for_multicast(
+                    messaging.MulticastMessage(
+                        notification=messaging.Notification(title=title, body=body),
+                        data=data,
+                        tokens=tokens_batch,
+                    )
+                )
+            except FirebaseError as err:
+                print('send_fcm_multicast.err:', err)
+                continue
+            count += response.success_count
+            token_unregistered += [
+                token for token, item in zip(tokens_batch, response.responses)
+                if not item.success and isinstance(item.exception, UnregisteredError)
+            ]
+        return count, token_unregistered
+
+    @classmethod
+    def send_fcm_multicast(cls, messages: list[dict]) -> int:
+        """
+        Gửi nhiều notify: token của các user lấy 1 lần, message cùng nội dung gom vào 1 multicast
+        (tối đa MULTICAST_MAX_TOKENS token), token không còn đăng ký bị xóa 1 lần.
+        Args:
+            messages: [{'user_id': ..., 'title': str, 'body': str, 'data': dict | None}]
+        Returns:
+            Số message gửi thành công
+        """
+        if settings.FIREBASE_ENABLE is not True or not messages:
+            return 0
+
+        token_of_user = cls.get_token_of_users({str(item['user_id']) for item in messages if item.get('user_id', None)})
+        message_group = {}
+        for item in messages:
+            token = token_of_user.get(str(item.get('user_id', None)), None)
+            if token:
+                key = (item['title'], item['body'], tuple(sorted((item.get('data', None) or {}).items())))
+                tokens = message_group.setdefault(key, [])
+                if token not in tokens:
+                    tokens.append(token)
+
+        count = 0
+        token_unregistered = []
+        for (title, body, data), tokens in message_group.items():
+            success_count, tokens_failed = cls.send_multicast(
+                title=title, body=body, data=dict(data) if data else None, tokens=tokens,
+            )
+            count += success_count
+            token_unregistered += tokens_failed
+
+        if token_unregistered:
+            DeviceToken.objects.filter(token__in=token_unregistered).delete()
+        return count
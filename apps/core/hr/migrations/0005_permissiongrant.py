@@ -0,0 +1,36 @@
+# Generated by Django 4.2.8 on 2026-10-18 17:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr', '0004_employee_email_app_password_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PermissionGrant',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('permit_code', models.CharField(help_text='{app_label}.{model_code}.{perm_code}', max_length=150)),
+                ('permit_from', models.CharField(choices=[('ids', 'By document ID'), ('opp', 'By opportunity'), ('prj', 'By project')], max_length=3)),
+                ('source_id', models.UUIDField(help_text='Document ID | Opportunity ID | Project ID')),
+                ('range_code', models.CharField(blank=True, default='', max_length=10)),
+                ('range_data', models.JSONField(default=dict)),
+                ('is_general', models.BooleanField(default=False)),
+                ('employee', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='permission_grants', to='hr.employee')),
+                ('role', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='permission_grants', to='hr.role')),
+            ],
+            options={
+                'verbose_name': 'Permission Grant',
+                'verbose_name_plural': 'Permission Grants',
+                'permissions': (),
+                'default_permissions': (),
+                'indexes': [models.Index(fields=['employee', 'permit_code'], name='hr_permissi_employe_d72a71_idx'), models.Index(fields=['role', 'permit_code'], name='hr_permissi_role_id_dc43e3_idx'), models.Index(fields=['permit_from', 'source_id'], name='hr_permissi_permit__02a4df_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+
+def remove_duplicate_grants(apps, schema_editor):
+    # giữ 1 dòng cho mỗi (owner, permit_code, permit_from, source_id, range_code, is_general)
+    grant_cls = apps.get_model('hr', 'permissiongrant')
+    keys_existed = set()
+    duplicate_ids = []
+    for obj in grant_cls.objects.order_by('id').values(
+            'id', 'employee_id', 'role_id', 'permit_code', 'permit_from', 'source_id', 'range_code', 'is_general'
+    ).iterator():
+        key = (
+            obj['employee_id'], obj['role_id'], obj['permit_code'], obj['permit_from'], obj['source_id'],
+            obj['range_code'], obj['is_general']
+        )
+        if key in keys_existed:
+            duplicate_ids.append(obj['id'])
+        else:
+            keys_existed.add(key)
+    grant_cls.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr', '0005_permissiongrant'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_grants, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='permissiongrant',
+            constraint=models.UniqueConstraint(fields=('employee', 'permit_code', 'permit_from', 'source_id', 'range_code', 'is_general'), name='unique_permission_grant_employee'),
+        ),
+        migrations.AddConstraint(
+            model_name='permissiongrant',
+            constraint=models.UniqueConstraint(fields=('role', 'permit_code', 'permit_from', 'source_id', 'range_code', 'is_general'), name='unique_permission_grant_role'),
+        ),
+    ]
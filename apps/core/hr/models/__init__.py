@@ -2,3 +2,4 @@ from .general import *
 from .employee import *
 from .roles import *
 from .summary import *
+from .permission_grant import *
@@ -2,9 +2,10 @@ from django.db import models
 from django.utils.text import slugify
 
 from apps.core.attachments.storages.aws.storages_backend import PublicMediaStorage
+from apps.core.hr.models.permission_grant import PermissionGrant
 from apps.core.hr.models.private_extends import PermissionAbstractModel
 from apps.core.models import TenantAbstractModel
-from apps.shared import SimpleAbstractModel, GENDER_CHOICE, StringHandler, TypeCheck, DisperseModel
+from apps.shared import SimpleAbstractModel, GENDER_CHOICE, StringHandler, TypeCheck, DisperseModel, PermitSnapshot
 
 __all__ = [
     'Employee',
@@ -388,6 +389,63 @@ class EmployeePermission(SimpleAbstractModel, PermissionAbstractModel):
     def get_app_allowed(self) -> str:
         return str(self.employee_id)
 
+    def get_grant_owner(self) -> dict:
+        return {'employee_id': self.employee_id}
+
+    def grant_changed(self):
+        PermitSnapshot.bump_employee(employee_id=self.employee_id)
+
+    @classmethod
+    def append_permit_by_ids_many(cls, app_label, model_code, doc_id, perms: dict[str, list[str]]) -> set[str]:
+        """
+        append_permit_by_ids cho nhiều nhân viên cùng 1 chứng từ bằng số query cố định
+        * param 'perms': {employee_id: ['view', 'edit']}
+        Returns: employee_id có thêm grant mới (đã làm mới snapshot)
+        Chạy đồng thời: bulk_create bỏ qua dòng trùng (ignore_conflicts, có unique constraint) thay vì lỗi
+        IntegrityError; không biết được dòng nào thực sự được tạo => làm mới snapshot cho mọi nhân viên có grant
+        chưa tồn tại lúc kiểm tra trước (thừa 1 lần làm mới khi trùng, không sót)
+        """
+        if not (app_label and model_code and doc_id and perms):
+            return set()
+        employee_ids = {str(employee_id) for employee_id in perms.keys()}
+        permit_existed = {
+            str(employee_id) for employee_id in cls.objects.filter(
+                employee_id__in=employee_ids
+            ).values_list('employee_id', flat=True)
+        }
+        cls.objects.bulk_create(
+            [cls(employee_id=employee_id) for employee_id in employee_ids if employee_id not in permit_existed],
+            ignore_conflicts=True,
+        )
+
+        permit_codes = {
+            (str(employee_id), f'{app_label}.{model_code}.{perm_code}'.lower())
+            for employee_id, perm_codes in perms.items() for perm_code in perm_codes if perm_code
+        }
+        grant_existed = {
+            (str(employee_id), permit_code) for employee_id, permit_code in PermissionGrant.objects.filter(
+                employee_id__in=employee_ids,
+                permit_code__in={permit_code for _employee_id, permit_code in permit_codes},
+                permit_from='ids',
+                source_id=doc_id,
+                range_code='',
+            ).values_list('employee_id', 'permit_code')
+        }
+        grant_new = sorted(permit_codes - grant_existed)
+        PermissionGrant.objects.bulk_create(
+            [
+                PermissionGrant(
+                    employee_id=employee_id, permit_code=permit_code,
+                    permit_from='ids', source_id=doc_id, range_code='',
+                ) for employee_id, permit_code in grant_new
+            ],
+            ignore_conflicts=True,
+        )
+        changed_ids = {employee_id for employee_id, _permit_code in grant_new}
+        for employee_id in changed_ids:
+            PermitSnapshot.bump_employee(employee_id=employee_id)
+        return changed_ids
+
     def sync_parsed_to_main(self):
         self.employee.permissions_parsed = self.permissions_parsed
         self.employee.save(update_fields=['permissions_parsed'])
@@ -0,0 +1,135 @@
+__all__ = [
+    'PERMIT_GRANT_FROM',
+    'PermissionGrant',
+]
+
+from django.db import models
+
+from apps.shared import SimpleAbstractModel
+
+PERMIT_GRANT_FROM = (
+    ('ids', 'By document ID'),
+    ('opp', 'By opportunity'),
+    ('prj', 'By project'),
+)
+
+
+class PermissionGrant(SimpleAbstractModel):
+    """
+    Quyền theo từng chứng từ / opportunity / project của Employee hoặc Role (thay cho JSON
+    permission_by_id, permission_by_opp, permission_by_project + phần ids/opp/prj trong permissions_parsed)
+        - permit_from = ids: source_id là ID chứng từ, range_code rỗng
+        - permit_from = opp|prj: source_id là ID opportunity/project, range_code là range trong opp/prj
+        - is_general = True: quyền general phát sinh khi là thành viên opp/prj (depend on app)
+    Cấp quyền = insert 1 dòng, kiểm tra = truy vấn theo index (owner, permit_code).
+    """
+    employee = models.ForeignKey(
+        'hr.Employee', on_delete=models.CASCADE, null=True, related_name='permission_grants',
+    )
+    role = models.ForeignKey(
+        'hr.Role', on_delete=models.CASCADE, null=True, related_name='permission_grants',
+    )
+    permit_code = models.CharField(max_length=150, help_text='{app_label}.{model_code}.{perm_code}')
+    permit_from = models.CharField(max_length=3, choices=PERMIT_GRANT_FROM)
+    source_id = models.UUIDField(help_text='Document ID | Opportunity ID | Project ID')
+    range_code = models.CharField(max_length=10, blank=True, default='')
+    range_data = models.JSONField(default=dict)
+    is_general = models.BooleanField(default=False)
+
+    @classmethod
+    def rows_from_parsed(cls, parsed: dict, permit_from, source_id) -> list[dict]:
+        """
+        Chuyển kết quả parse của 1 opp/prj ({code: {'opp': {id: {range: data}}, 'general': {range: data}}})
+        thành danh sách field cho các dòng grant.
+        """
+        result = []
+        for permit_code, permit_data in parsed.items():
+            for range_code, range_data in permit_data.get(permit_from, {}).get(str(source_id), {}).items():
+                result.append(
+                    {
+                        'permit_code': permit_code, 'permit_from': permit_from, 'source_id': source_id,
+                        'range_code': range_code, 'range_data': range_data or {}, 'is_general': False,
+                    }
+                )
+            for range_code, range_data in permit_data.get('general', {}).items():
+                result.append(
+                    {
+                        'permit_code': permit_code, 'permit_from': permit_from, 'source_id': source_id,
+                        'range_code': range_code, 'range_data': range_data or {}, 'is_general': True,
+                    }
+                )
+        return result
+
+    @classmethod
+    def get_parsed(cls, permit_code, employee_id=None, role_ids=None) -> dict[str, dict]:
+        """
+        Gom grant của 1 permit_code theo owner về đúng format 1 key trong permissions_parsed
+            - ids: không lấy từng dòng, chỉ trả về điều kiện lọc grant của owner ('ids_grant'),
+              phạm vi dữ liệu lọc bằng Exists trên bảng này (xem filter_ids_exists)
+        Returns:
+            {'{employee_id|role_id}': {'general': {}, 'ids_grant': {}, 'opp': {}, 'prj': {}}}
+        """
+        filter_owner = models.Q()
+        if employee_id:
+            filter_owner |= models.Q(employee_id=employee_id)
+        if role_ids:
+            filter_owner |= models.Q(role_id__in=role_ids)
+        if not filter_owner:
+            return {}
+
+        result = {}
+
+        def get_owner_data(owner_id):
+            if str(owner_id) not in result:
+                result[str(owner_id)] = {'general': {}, 'ids_grant': {}, 'opp': {}, 'prj': {}}
+            return result[str(owner_id)]
+
+        queryset = cls.objects.filter(filter_owner, permit_code=permit_code)
+        for owner_employee_id, owner_role_id in queryset.filter(permit_from='ids').values_list(
+                'employee_id', 'role_id'
+        ).distinct():
+            owner_key, owner_id = (
+                ('employee_id', owner_employee_id) if owner_employee_id else ('role_id', owner_role_id)
+            )
+            get_owner_data(owner_id)['ids_grant'] = {'permit_code': permit_code, owner_key: str(owner_id)}
+
+        for obj in queryset.exclude(permit_from='ids').values(
+                'employee_id', 'role_id', 'permit_from', 'source_id', 'range_code', 'range_data', 'is_general',
+        ):
+            data = get_owner_data(obj['employee_id'] or obj['role_id'])
+            if obj['is_general'] is True:
+                data['general'].setdefault(obj['range_code'], {}).update(obj['range_data'] or {})
+            else:
+                data[obj['permit_from']].setdefault(str(obj['source_id']), {})[obj['range_code']] = obj['range_data']
+        return result
+
+    @classmethod
+    def filter_ids_exists(cls, outer_ref='id', **grant_filter) -> models.Exists:
+        """
+        Chứng từ được cấp quyền theo ID: DB đối chiếu với grant (source_id = ID chứng từ), không dựng danh sách id__in
+        * param 'grant_filter': 'ids_grant' của get_parsed - {'permit_code': ..., 'employee_id' | 'role_id': ...}
+        """
+        return models.Exists(
+            cls.objects.filter(permit_from='ids', source_id=models.OuterRef(outer_ref), **grant_filter)
+        )
+
+    class Meta:
+        verbose_name = 'Permission Grant'
+        verbose_name_plural = 'Permission Grants'
+        default_permissions = ()
+        permissions = ()
+        indexes = [
+            models.Index(fields=['employee', 'permit_code']),
+            models.Index(fields=['role', 'permit_code']),
+            models.Index(fields=['permit_from', 'source_id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['employee', 'permit_code', 'permit_from', 'source_id', 'range_code', 'is_general'],
+                name='unique_permission_grant_employee',
+            ),
+            models.UniqueConstraint(
+                fields=['role', 'permit_code', 'permit_from', 'source_id', 'range_code', 'is_general'],
+                name='unique_permission_grant_role',
+            ),
+        ]
@@ -10,6 +10,8 @@ from django.db import models
 
 from apps.shared.permissions.util import PermissionController
 
+from .permission_grant import PermissionGrant
+
 SYNC_STATE = (
     (0, 'Fail'),
     (1, 'Success'),
@@ -31,7 +33,7 @@ class PermissionAbstractModel(models.Model):
         }
     }
 
-    # by ID
+    # by ID (legacy: đã chuyển sang hr.PermissionGrant - permit_from = 'ids')
     permission_by_id_sample = {
         'hr.employee.view': [],
         'hr.employee.edit': [],
@@ -62,7 +64,7 @@ class PermissionAbstractModel(models.Model):
         default=list, verbose_name='Permissions was configured by Administrator',
     )
 
-    # by opportunity
+    # by opportunity (legacy: đã chuyển sang hr.PermissionGrant - permit_from = 'opp')
     permission_by_opp_sample_before_sync = {
         '{opp_id}': [
             {
@@ -96,7 +98,7 @@ class PermissionAbstractModel(models.Model):
         default=dict, verbose_name='Permission was configured at Opportunity',
     )
 
-    # by project
+    # by project (legacy: đã chuyển sang hr.PermissionGrant - permit_from = 'prj')
     permission_by_project_sample = {
         '{project_id}': [
             {
@@ -123,23 +125,11 @@ class PermissionAbstractModel(models.Model):
     )
 
     # as sum data permissions
+    # chỉ gồm quyền theo range (general), quyền theo ids/opp/prj lưu ở hr.PermissionGrant
     permissions_parsed_sample = {
         'hr.employee.view': {
-            '4': {},
-            'ids': {
-                '{doc_id}': {},
-            },
-            'opp': {
-                '{opp_id}': {
-                    'me': {},
-                    'all': {},
-                },
-            },
-            'prj': {
-                '{project_id}': {
-                    'me': {},
-                    'all': {},
-                },
+            'general': {
+                '4': {},
             },
         },
         'hr.employee.edit': {'4': {}},
@@ -173,90 +163,118 @@ class PermissionAbstractModel(models.Model):
         default_permissions = ()
         permissions = ()
 
-    def _remove_ids_empty(self):
-        for permit_code, permit_ids in dict(self.permission_by_id).items():
-            if not permit_ids:
-                del self.permission_by_id[permit_code]
-
-    def append_permit_by_ids(self, app_label, model_code, perm_code, doc_id, tenant_id):
-        if app_label and model_code and perm_code:
-            key = f'{app_label}.{model_code}.{perm_code}'.lower()
-
-            self._remove_ids_empty()
+    def get_grant_owner(self) -> dict:
+        """
+        Return to filter/create kwargs of owner on hr.PermissionGrant. Example: {'employee_id': ...}
+        """
+        raise NotImplementedError
 
-            permission_by_id = self.permission_by_id
+    def grant_changed(self):
+        """
+        Callback after grants of instance were changed (refresh permission snapshot)
+        """
+        raise NotImplementedError
 
-            if key not in permission_by_id:
-                permission_by_id[key] = {}
-            permission_by_id[key] = {**permission_by_id[key], str(doc_id): {}}
+    def append_permit_by_ids(self, app_label, model_code, perm_code, doc_id, tenant_id):  # pylint: disable=W0613
+        if app_label and model_code and perm_code and doc_id:
+            _obj, created = PermissionGrant.objects.get_or_create(
+                **self.get_grant_owner(),
+                permit_code=f'{app_label}.{model_code}.{perm_code}'.lower(),
+                permit_from='ids',
+                source_id=doc_id,
+                range_code='',
+            )
+            if created:
+                self.grant_changed()
+        return self
 
-            self.permission_by_id = permission_by_id
-            self.permissions_parsed = PermissionController(tenant_id=tenant_id).get_permission_parsed(
-                instance=self
+    def convert_legacy_grants(self, tenant_id) -> int:
+        """
+        Chuyển quyền legacy (JSON permission_by_id / permission_by_opp / permission_by_project) sang hr.PermissionGrant,
+        giữ các grant đã có (dòng trùng bỏ qua theo unique constraint), thu gọn permissions_parsed về phần general
+        """
+        owner = self.get_grant_owner()
+        controller = PermissionController(tenant_id=tenant_id)
+        bulk_info = []
+        for permit_code, doc_ids in (self.permission_by_id or {}).items():
+            for doc_id in doc_ids:
+                bulk_info.append(
+                    PermissionGrant(
+                        **owner, permit_code=permit_code.lower(), permit_from='ids', source_id=doc_id, range_code='',
+                    )
+                )
+        for permit_from, data in [('opp', self.permission_by_opp), ('prj', self.permission_by_project)]:
+            for source_id, perm_config in (data or {}).items():
+                for row in controller.get_permission_grants(
+                        instance=self, permit_from=permit_from, source_id=source_id, perm_config=perm_config,
+                ):
+                    bulk_info.append(PermissionGrant(**owner, **row))
+        PermissionGrant.objects.bulk_create(bulk_info, ignore_conflicts=True)
+
+        self.permission_by_id = {}
+        self.permission_by_opp = {}
+        self.permission_by_project = {}
+        self.permissions_parsed = controller.get_permission_parsed(instance=self)
+        self.save(sync_parsed=True)
+        self.grant_changed()
+        return len(bulk_info)
+
+    def replace_grants(self, permit_from, source_id, rows: list[dict]):
+        PermissionGrant.objects.filter(
+            **self.get_grant_owner(), permit_from=permit_from, source_id=source_id,
+        ).delete()
+        if rows:
+            PermissionGrant.objects.bulk_create(
+                [PermissionGrant(**self.get_grant_owner(), **row) for row in rows]
             )
-            super().save(update_fields=['permission_by_id', 'permissions_parsed'])
-            self.call_sync()
+        self.grant_changed()
         return self
 
-    def _check_type_and_remove_opp_empty(self):
-        for opp_id, permit_opp_data in dict(self.permission_by_opp).items():
-            if not permit_opp_data:
-                del self.permission_by_opp[opp_id]
-            # else:
-            #     for item in permit_opp_data:
-            #         if (
-            #                 'range' in item
-            #                 and type(item['range']) == int
-            #                 and item['range'] in [1, 4]
-            #         ):
-            #             item['range'] = str(item['range'])
-            #
-            #         if (
-            #                 'space' in item
-            #                 and type(item['space']) == int
-            #                 and item['space'] in [0, 1]
-            #         ):
-            #             item['space'] = str(item['space'])
+    def _drop_legacy_source(self, tenant_id, field_name, source_id):
+        """
+        Bỏ config opp/prj legacy (JSON chưa chuyển sang grant) của source_id, tính lại permissions_parsed
+        => grant mới thay thế / xoá quyền không bị gộp lại từ JSON cũ
+        """
+        legacy_data = getattr(self, field_name) or {}
+        if str(source_id) in legacy_data:
+            del legacy_data[str(source_id)]
+            setattr(self, field_name, legacy_data)
+            self.permissions_parsed = PermissionController(tenant_id=tenant_id).get_permission_parsed(instance=self)
+            self.save(update_fields=[field_name, 'permissions_parsed'], sync_parsed=True)
+        return self
 
     def append_permit_by_opp(self, tenant_id, opp_id, perm_config):
         if opp_id and tenant_id:
-            self.permission_by_opp[str(opp_id)] = perm_config
-            self._check_type_and_remove_opp_empty()
-            self.permissions_parsed = PermissionController(tenant_id=tenant_id).get_permission_parsed(instance=self)
-            super().save(update_fields=['permission_by_opp', 'permissions_parsed'])
-            self.call_sync()
+            self._drop_legacy_source(tenant_id=tenant_id, field_name='permission_by_opp', source_id=opp_id)
+            self.replace_grants(
+                permit_from='opp', source_id=opp_id,
+                rows=PermissionController(tenant_id=tenant_id).get_permission_grants(
+                    instance=self, permit_from='opp', source_id=opp_id, perm_config=perm_config,
+                ),
+            )
         return self
 
     def remove_permit_by_opp(self, tenant_id, opp_id):
-        if opp_id and str(opp_id) in self.permission_by_opp and tenant_id:
-            del self.permission_by_opp[str(opp_id)]
-            self._check_type_and_remove_opp_empty()
-            self.permissions_parsed = PermissionController(tenant_id=tenant_id).get_permission_parsed(instance=self)
-            super().save(update_fields=['permission_by_opp', 'permissions_parsed'])
-            self.call_sync()
+        if opp_id and tenant_id:
+            self._drop_legacy_source(tenant_id=tenant_id, field_name='permission_by_opp', source_id=opp_id)
+            self.replace_grants(permit_from='opp', source_id=opp_id, rows=[])
         return self
 
-    def _remove_prj_empty(self):
-        for prj_id, permit_prj_data in dict(self.permission_by_project).items():
-            if not permit_prj_data:
-                del self.permission_by_project[prj_id]
-
     def append_permit_by_prj(self, tenant_id, prj_id, perm_config):
         if prj_id and tenant_id:
-            self.permission_by_project[str(prj_id)] = perm_config
-            self._remove_prj_empty()
-            self.permissions_parsed = PermissionController(tenant_id=tenant_id).get_permission_parsed(instance=self)
-            super().save(update_fields=['permission_by_project', 'permissions_parsed'])
-            self.call_sync()
+            self._drop_legacy_source(tenant_id=tenant_id, field_name='permission_by_project', source_id=prj_id)
+            self.replace_grants(
+                permit_from='prj', source_id=prj_id,
+                rows=PermissionController(tenant_id=tenant_id).get_permission_grants(
+                    instance=self, permit_from='prj', source_id=prj_id, perm_config=perm_config,
+                ),
+            )
         return self
 
     def remove_permit_by_prj(self, tenant_id, prj_id):
-        if prj_id and str(prj_id) in self.permission_by_project and tenant_id:
-            del self.permission_by_project[str(prj_id)]
-            self._remove_prj_empty()
-            self.permissions_parsed = PermissionController(tenant_id=tenant_id).get_permission_parsed(instance=self)
-            super().save(update_fields=['permission_by_project', 'permissions_parsed'])
-            self.call_sync()
+        if prj_id and tenant_id:
+            self._drop_legacy_source(tenant_id=tenant_id, field_name='permission_by_project', source_id=prj_id)
+            self.replace_grants(permit_from='prj', source_id=prj_id, rows=[])
         return self
 
     def save(self, *args, **kwargs):
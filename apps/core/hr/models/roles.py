@@ -2,7 +2,7 @@ from django.db import models
 
 from apps.core.hr.models.private_extends import PermissionAbstractModel
 from apps.core.models import TenantAbstractModel
-from apps.shared import SimpleAbstractModel
+from apps.shared import SimpleAbstractModel, PermitSnapshot
 
 
 class Role(TenantAbstractModel):
@@ -150,6 +150,12 @@ class RolePermission(SimpleAbstractModel, PermissionAbstractModel):
         self.role.permissions_parsed = self.permissions_parsed
         self.role.save(update_fields=['permissions_parsed'])
 
+    def get_grant_owner(self) -> dict:
+        return {'role_id': self.role_id}
+
+    def grant_changed(self):
+        PermitSnapshot.bump(company_id=self.role.company_id)
+
     def get_app_allowed(self) -> tuple[list[str], list[str]]:
         app_ids, app_prefix = [], []
         for obj in PlanRoleApp.objects.select_related('application').filter(plan_role__role=self.role):
@@ -3,6 +3,7 @@ import re
 from rest_framework import serializers
 
 from apps.core.account.models import User
+from apps.core.base.import_job import ImportLookupMixin
 from apps.core.company.models import CompanyUserEmployee
 from apps.core.hr.models import Group, Employee, GroupLevel, Role, RoleHolder
 from apps.shared import HRMsg, BaseMsg, AccountMsg
@@ -14,13 +15,14 @@ class GroupLevelImportReturnSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'code')
 
 
-class GroupLevelImportSerializer(serializers.ModelSerializer):
+class GroupLevelImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     level = serializers.IntegerField()
 
-    @classmethod
-    def validate_level(cls, value):
+    def validate_level(self, value):
         if value and isinstance(value, int) and value > 0:
-            if not GroupLevel.objects.filter_current(level=value, fill__company=True).exists():
+            if not self.import_lookup.value_exist(
+                    GroupLevel.objects.filter_current(fill__company=True), 'level', value
+            ):
                 return value
             raise serializers.ValidationError({'level': HRMsg.GROUP_LEVEL_EXIST})
         raise serializers.ValidationError({'level': HRMsg.GROUP_LEVEL_OUT_OF_RANGE})
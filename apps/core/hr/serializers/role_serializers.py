@@ -8,7 +8,7 @@ from apps.core.tenant.models import TenantPlan
 from apps.core.hr.models import Role, RoleHolder, PlanRole, Employee, RolePermission, PlanRoleApp
 from apps.core.hr.tasks import sync_plan_app_employee
 
-from apps.shared import HRMsg, TypeCheck, call_task_background
+from apps.shared import HRMsg, TypeCheck, call_task_background, PermitSnapshot
 from apps.shared.permissions.util import PermissionController
 
 from .common import (
@@ -87,6 +87,8 @@ class RoleCreateSerializer(serializers.ModelSerializer):
                 ]
                 if holder_bulk_info:
                     RoleHolder.objects.bulk_create(holder_bulk_info)
+                    # bulk_create không bắn signal: chủ động làm mới snapshot quyền của company
+                    PermitSnapshot.bump(company_id=role_objs.company_id)
 
             create_plan_role_update_tenant_plan(
                 role=role_objs,
@@ -1,3 +1,255 @@
-from django.test import TestCase
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from apps.core.company.models import Company
+from apps.core.hr.models import Employee, EmployeePermission, Group, PermissionGrant, Role, RoleHolder, RolePermission
+from apps.core.tenant.models import Tenant
+from apps.shared.extends.mask_view import PermissionController as MaskPermissionController
+from apps.shared.extends.permit_snapshot import PermitSnapshot
+from apps.shared.extends.tests import bulk_new
+from apps.shared.permissions import FilterComponent
+from apps.shared.permissions.util import PermissionController
+
+
+class PermissionGrantTestCase(TestCase):
+    def setUp(self):
+        tenant = bulk_new(Tenant, title='Tenant', code='TENANT_PERMIT')
+        company = bulk_new(Company, title='Company', code='COMPANY_PERMIT', sub_domain='company-permit', tenant=tenant)
+        self.employee = bulk_new(
+            Employee, first_name='Permit', last_name='Test', code='EMP_PERMIT', tenant=tenant, company=company
+        )
+        self.doc_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+
+    def test_convert_legacy_grants(self):
+        emp_permit = bulk_new(
+            EmployeePermission, employee=self.employee,
+            permission_by_id={'Sales.SaleOrder.View': self.doc_ids, 'sales.saleorder.edit': self.doc_ids[:1]},
+        )
+        # grant đã có trước khi chuyển được giữ lại, không tạo trùng
+        emp_permit.append_permit_by_ids('sales', 'saleorder', 'view', self.doc_ids[0], None)
+
+        self.assertEqual(emp_permit.convert_legacy_grants(tenant_id=self.employee.tenant_id), 3)
+        self.assertEqual(emp_permit.convert_legacy_grants(tenant_id=self.employee.tenant_id), 0)
+        self.assertEqual(
+            sorted(
+                PermissionGrant.objects.filter(employee=self.employee).values_list('permit_code', 'source_id')
+            ),
+            sorted([
+                ('sales.saleorder.edit', uuid.UUID(self.doc_ids[0])),
+                ('sales.saleorder.view', uuid.UUID(self.doc_ids[0])),
+                ('sales.saleorder.view', uuid.UUID(self.doc_ids[1])),
+            ])
+        )
+        emp_permit.refresh_from_db()
+        self.assertEqual(emp_permit.permission_by_id, {})
+
+    def test_recompute_keeps_unconverted_legacy(self):
+        # lưu quyền (như employee_serializers / role_serializers) trước khi chạy convert_permit_to_grants
+        legacy_opp_id = str(uuid.uuid4())
+        emp_permit = bulk_new(
+            EmployeePermission, employee=self.employee,
+            permission_by_id={'sales.saleorder.view': self.doc_ids},
+            permission_by_opp={legacy_opp_id: []},
+        )
+        emp_permit.permission_by_configured = []
+        emp_permit.permissions_parsed = PermissionController(
+            tenant_id=self.employee.tenant_id
+        ).get_permission_parsed(instance=emp_permit)
+        emp_permit.save(sync_parsed=True)
+
+        self.employee.refresh_from_db()
+        self.assertEqual(
+            self.employee.permissions_parsed['sales.saleorder.view']['ids'],
+            {self.doc_ids[0]: {}, self.doc_ids[1]: {}},
+        )
+
+        # thay quyền opp bằng grant => bỏ config legacy của opp đó
+        emp_permit.remove_permit_by_opp(tenant_id=self.employee.tenant_id, opp_id=legacy_opp_id)
+        emp_permit.refresh_from_db()
+        self.assertEqual(emp_permit.permission_by_opp, {})
+        self.assertEqual(emp_permit.permission_by_id, {'sales.saleorder.view': self.doc_ids})
+
+    def test_append_many_concurrent(self):
+        employee_2 = bulk_new(
+            Employee, first_name='Permit', last_name='Other', code='EMP_PERMIT_2', tenant=self.employee.tenant,
+            company=self.employee.company,
+        )
+        perms = {str(self.employee.id): ['view'], str(employee_2.id): ['view', 'edit']}
+        self.assertEqual(
+            EmployeePermission.append_permit_by_ids_many('sales', 'saleorder', self.doc_ids[0], perms),
+            {str(self.employee.id), str(employee_2.id)},
+        )
+        self.assertEqual(EmployeePermission.append_permit_by_ids_many('sales', 'saleorder', self.doc_ids[0], perms), set())
+        # request khác đã tạo cùng dòng sau bước kiểm tra trước => bỏ qua dòng trùng, không lỗi, vẫn làm mới snapshot
+        with mock.patch.object(EmployeePermission.objects, 'filter', return_value=EmployeePermission.objects.none()):
+            with mock.patch.object(PermissionGrant.objects, 'filter', return_value=PermissionGrant.objects.none()):
+                changed_ids = EmployeePermission.append_permit_by_ids_many(
+                    'sales', 'saleorder', self.doc_ids[0], perms
+                )
+        self.assertEqual(changed_ids, {str(self.employee.id), str(employee_2.id)})
+        self.assertEqual(EmployeePermission.objects.filter(employee_id__in=perms.keys()).count(), 2)
+        self.assertEqual(PermissionGrant.objects.filter(source_id=self.doc_ids[0]).count(), 3)
+
+    def test_merge_keeps_legacy_ids(self):
+        legacy_opp_id, grant_opp_id = str(uuid.uuid4()), str(uuid.uuid4())
+        key = 'sales.saleorder.view'
+        ids_grant = {'permit_code': key, 'employee_id': str(self.employee.id)}
+        merged = MaskPermissionController.merge_permission_grants(
+            permissions_parsed={
+                key: {
+                    'general': {'1': {}},
+                    'ids': {self.doc_ids[0]: {}},
+                    'opp': {legacy_opp_id: {'1': {}}},
+                },
+            },
+            key=key,
+            grant_data={
+                'general': {'4': {}},
+                'ids_grant': ids_grant,
+                'opp': {grant_opp_id: {'4': {}}, legacy_opp_id: {'4': {}}},
+                'prj': {},
+            },
+        )
+        self.assertEqual(merged[key], {
+            'general': {'1': {}, '4': {}},
+            'ids': {self.doc_ids[0]: {}},
+            'ids_grant': ids_grant,
+            'opp': {legacy_opp_id: {'1': {}, '4': {}}, grant_opp_id: {'4': {}}},
+            'prj': {},
+        })
+
+    def test_ids_grant_filtered_by_db(self):
+        # "chứng từ" là Employee: grant theo ID không được nạp từng dòng, lọc bằng Exists
+        docs = [
+            bulk_new(
+                Employee, first_name='Doc', last_name=str(idx), code=f'EMP_DOC_{idx}',
+                tenant=self.employee.tenant, company=self.employee.company,
+            ) for idx in range(3)
+        ]
+        emp_permit = bulk_new(EmployeePermission, employee=self.employee)
+        for doc in docs[:2]:
+            emp_permit.append_permit_by_ids('hr', 'employee', 'view', doc.id, None)
+
+        with self.assertNumQueries(2):
+            grants = PermissionGrant.get_parsed(permit_code='hr.employee.view', employee_id=self.employee.id)
+        ids_grant = {'permit_code': 'hr.employee.view', 'employee_id': str(self.employee.id)}
+        self.assertEqual(grants, {
+            str(self.employee.id): {'general': {}, 'ids_grant': ids_grant, 'opp': {}, 'prj': {}},
+        })
+
+        django_q = FilterComponent(main_data={'id__grant': ids_grant}, logic_next='or').django_q
+        self.assertEqual(
+            set(Employee.objects.filter(django_q).values_list('id', flat=True)), {docs[0].id, docs[1].id}
+        )
+        self.assertTrue(MaskPermissionController.check_permit_each_item('id__grant', ids_grant, docs[0]))
+        self.assertFalse(MaskPermissionController.check_permit_each_item('id__grant', ids_grant, docs[2]))
+
+@override_settings(
+    CACHE_ENABLED=True, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+)
+class PermitSnapshotTestCase(TestCase):
+    """
+    Snapshot đã lưu không được đọc lại sau mỗi thay đổi quyền, ở cả 2 tầng: bộ nhớ process (cùng process)
+    và cache dùng chung (process khác - xóa bộ nhớ process trước khi đọc)
+    """
+
+    def setUp(self):
+        PermitSnapshot.sv_cache().clear()
+        PermitSnapshot._local_data.clear()  # pylint: disable=W0212
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_SNAPSHOT')
+        self.company = bulk_new(
+            Company, title='Company', code='COMPANY_SNAPSHOT', sub_domain='company-snapshot', tenant=self.tenant
+        )
+        self.employee = self.new_employee('EMP_SNAPSHOT')
+        self.role = self.new_role('ROLE_SNAPSHOT')
+        self.emp_permit = bulk_new(EmployeePermission, employee=self.employee)
+        self.role_permit = bulk_new(RolePermission, role=self.role)
+
+    def new_employee(self, code):
+        return bulk_new(
+            Employee, first_name='Snapshot', last_name=code, code=code, tenant=self.tenant, company=self.company
+        )
+
+    def new_role(self, code):
+        return bulk_new(Role, title=code, code=code, tenant=self.tenant, company=self.company)
+
+    def new_group(self, code):
+        return bulk_new(Group, title=code, code=code, tenant=self.tenant, company=self.company)
+
+    def new_role_holder(self, code):
+        return bulk_new(RoleHolder, employee=self.employee, role=self.new_role(code))
+
+    def snapshot_key(self):
+        version = PermitSnapshot.get_version(self.company.id, self.employee.id)
+        return PermitSnapshot.make_key(self.company.id, version, self.employee.id, 'attr')
+
+    def assert_refreshed(self, get_write, name):
+        """ get_write: trả về hàm ghi (1 lần cho mỗi tầng cache) """
+        for shared in (False, True):
+            write = get_write()
+            key = self.snapshot_key()
+            PermitSnapshot.set(key, {'write': name})
+            if shared:
+                PermitSnapshot._local_data.clear()  # pylint: disable=W0212
+            self.assertEqual(PermitSnapshot.get(key), {'write': name}, name)
+            write()
+            if shared:
+                PermitSnapshot._local_data.clear()  # pylint: disable=W0212
+            self.assertNotEqual(self.snapshot_key(), key, name)
+            self.assertIsNone(PermitSnapshot.get(self.snapshot_key()), name)
+
+    def test_model_save(self):
+        self.assert_refreshed(lambda: self.role.save, 'role.save')
+        self.assert_refreshed(lambda: self.employee.save, 'employee.save')
+        self.assert_refreshed(lambda: self.new_group(f'GROUP_{uuid.uuid4().hex}').save, 'group.save')
+        self.assert_refreshed(lambda: self.new_role_holder(f'ROLE_{uuid.uuid4().hex}').save, 'role_holder.save')
+
+    @mock.patch('apps.shared.extends.signals.call_task_background')
+    def test_model_delete(self, _call_task_background):
+        self.assert_refreshed(lambda: self.new_role(f'ROLE_{uuid.uuid4().hex}').delete, 'role.delete')
+        self.assert_refreshed(lambda: self.new_employee(f'EMP_{uuid.uuid4().hex}').delete, 'employee.delete')
+        self.assert_refreshed(lambda: self.new_group(f'GROUP_{uuid.uuid4().hex}').delete, 'group.delete')
+        self.assert_refreshed(lambda: self.new_role_holder(f'ROLE_{uuid.uuid4().hex}').delete, 'role_holder.delete')
+
+    def test_grant_by_ids(self):
+        self.assert_refreshed(
+            lambda: lambda: self.emp_permit.append_permit_by_ids('sales', 'saleorder', 'view', uuid.uuid4(), None),
+            'employee.append_permit_by_ids'
+        )
+        self.assert_refreshed(
+            lambda: lambda: EmployeePermission.append_permit_by_ids_many(
+                'sales', 'saleorder', str(uuid.uuid4()), {str(self.employee.id): ['view']}
+            ),
+            'employee.append_permit_by_ids_many'
+        )
+        self.assert_refreshed(
+            lambda: lambda: self.role_permit.append_permit_by_ids('sales', 'saleorder', 'view', uuid.uuid4(), None),
+            'role.append_permit_by_ids'
+        )
+
+    def test_grant_by_opp_prj(self):
+        def get_write(permit, permit_from):
+            source_id = uuid.uuid4()
+            permit.replace_grants(permit_from, source_id, [])
+            return lambda: permit.replace_grants(permit_from, source_id, [{
+                'permit_code': 'sales.saleorder.view', 'permit_from': permit_from, 'source_id': source_id,
+                'range_code': '4', 'range_data': {}, 'is_general': False,
+            }])
+
+        self.assert_refreshed(lambda: get_write(self.emp_permit, 'opp'), 'employee.append_opp')
+        self.assert_refreshed(lambda: get_write(self.role_permit, 'prj'), 'role.append_prj')
+        self.assert_refreshed(
+            lambda: lambda: self.emp_permit.remove_permit_by_opp(self.tenant.id, uuid.uuid4()), 'employee.remove_opp'
+        )
+        self.assert_refreshed(
+            lambda: lambda: self.role_permit.remove_permit_by_prj(self.tenant.id, uuid.uuid4()), 'role.remove_prj'
+        )
+
+    def test_convert_legacy_grants(self):
+        def get_write():
+            self.emp_permit.permission_by_id = {'sales.saleorder.view': [str(uuid.uuid4())]}
+            return lambda: self.emp_permit.convert_legacy_grants(tenant_id=self.tenant.id)
+
+        self.assert_refreshed(get_write, 'convert_legacy_grants')
@@ -84,6 +84,7 @@ class EmployeeList(BaseListMixin, BaseCreateMixin):
     queryset = Employee.objects
     search_fields = ["search_content"]
     filterset_class = EmployeeListFilter
+    use_cache_minimal = True
 
     serializer_list = EmployeeListSerializer
     serializer_list_minimal = EmployeeListAllSerializer
@@ -1,5 +1,7 @@
 from drf_yasg.utils import swagger_auto_schema
 
+from apps.core.base.import_job import ModelImportChunkHandler
+from apps.core.base.mixins import ImportJobMixin
 from apps.core.hr.models import GroupLevel, Group, Role, Employee
 from apps.core.hr.serializers.fimport import (
     GroupImportSerializer, GroupLevelImportReturnSerializer,
@@ -9,12 +11,20 @@ from apps.core.hr.serializers.fimport import (
 from apps.shared import BaseCreateMixin, mask_view
 
 
-class GroupLevelImport(BaseCreateMixin):
+class GroupLevelImport(ImportJobMixin, BaseCreateMixin):
     queryset = GroupLevel.objects
 
     serializer_detail = GroupLevelImportReturnSerializer
     serializer_create = GroupLevelImportSerializer
     create_hidden_field = ['tenant_id', 'company_id']
+    import_chunk_class = ModelImportChunkHandler
+    import_unique_fields = ('level',)
+
+    @classmethod
+    def get_import_context(cls, user) -> dict:
+        return {
+            'company_current_id': user.company_current_id,
+        }
 
     @swagger_auto_schema(
         operation_summary="Import Group Level",
@@ -26,13 +36,11 @@ class GroupLevelImport(BaseCreateMixin):
         label_code='hr', model_code='group', perm_code='create',
     )
     def post(self, request, *args, **kwargs):
-        self.ser_context = {
-            'company_current_id': request.user.company_current_id,
-        }
+        self.ser_context = self.get_import_context(request.user)
         return self.create(request, *args, **kwargs)
 
 
-class GroupImport(BaseCreateMixin):
+class GroupImport(ImportJobMixin, BaseCreateMixin):
     queryset = Group.objects
 
     serializer_detail = GroupImportReturnSerializer
@@ -52,7 +60,7 @@ class GroupImport(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class RoleImport(BaseCreateMixin):
+class RoleImport(ImportJobMixin, BaseCreateMixin):
     queryset = Role.objects
     serializer_create = RoleImportSerializer
     serializer_detail = RoleImportReturnSerializer
@@ -68,12 +76,18 @@ class RoleImport(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class EmployeeImport(BaseCreateMixin):
+class EmployeeImport(ImportJobMixin, BaseCreateMixin):
     queryset = Employee.objects
     serializer_detail = EmployeeImportReturnSerializer
     serializer_create = EmployeeImportSerializer
     create_hidden_field = ('tenant_id', 'company_id')
 
+    @classmethod
+    def get_import_context(cls, user) -> dict:
+        return {
+            'company_obj': user.company_current
+        }
+
     @swagger_auto_schema(operation_summary="Import employee", request_body=EmployeeImportSerializer)
     @mask_view(
         login_require=True, auth_require=True,
@@ -81,7 +95,5 @@ class EmployeeImport(BaseCreateMixin):
         label_code='hr', model_code='employee', perm_code='create',
     )
     def post(self, request, *args, **kwargs):
-        self.ser_context = {
-            'company_obj': request.user.company_current
-        }
+        self.ser_context = self.get_import_context(request.user)
         return self.create(request, *args, **kwargs)
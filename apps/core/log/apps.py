@@ -6,4 +6,4 @@ class LogConfig(AppConfig):
     name = 'apps.core.log'
 
     def ready(self):
-        from .signals import new_notify
+        from .signals import new_notify, flush_activity_log_sink
@@ -151,6 +151,32 @@ class ActivityLog(models.Model):
                 self.request_method = self.request_method.upper()
         return True
 
+    @classmethod
+    def bulk_before_save(cls, objs: list['ActivityLog']) -> list['ActivityLog']:
+        """
+        before_save cho nhiều log (trước bulk_create): user, employee được truy vấn 1 lần cho cả danh sách
+        """
+        user_ids = {obj.user_id for obj in objs if obj.user_id}
+        employee_ids = {obj.employee_id for obj in objs if obj.employee_id}
+        user_data = {
+            str(user_obj.id): parse_backup_user(user_obj)
+            for user_obj in apps.get_model(app_label='account', model_name='User').objects.filter(id__in=user_ids)
+        } if user_ids else {}
+        employee_data = {
+            str(employee_obj.id): parse_backup_employee(employee_obj)
+            for employee_obj in apps.get_model(app_label='hr', model_name='Employee').objects.filter(
+                id__in=employee_ids
+            )
+        } if employee_ids else {}
+        for obj in objs:
+            if obj.user_id:
+                obj.user_data = user_data.get(str(obj.user_id), {})
+            if obj.employee_id:
+                obj.employee_data = employee_data.get(str(obj.employee_id), {})
+            if obj.request_method:
+                obj.request_method = obj.request_method.upper()
+        return objs
+
     def save(self, *args, **kwargs):
         self.before_save(force_insert=kwargs.get('force_insert', False))
         super().save(*args, **kwargs)
@@ -320,6 +346,52 @@ class Notifications(models.Model):
                         self.application = obj
         return True
 
+    @classmethod
+    def bulk_before_save(cls, objs: list['Notifications']) -> list['Notifications']:
+        """
+        before_save cho nhiều notify: user, employee, application được truy vấn 1 lần cho cả danh sách
+        """
+        user_ids = {obj.user_id for obj in objs if obj.user_id}
+        employee_ids = {obj.employee_id for obj in objs if obj.employee_id} | {
+            obj.employee_sender_id for obj in objs if obj.employee_sender_id
+        }
+        user_data = {
+            str(user_obj.id): parse_backup_user(user_obj)
+            for user_obj in apps.get_model(app_label='account', model_name='User').objects.filter(id__in=user_ids)
+        } if user_ids else {}
+        employee_data = {
+            str(employee_obj.id): parse_backup_employee(employee_obj)
+            for employee_obj in apps.get_model(app_label='hr', model_name='Employee').objects.filter(
+                id__in=employee_ids
+            )
+        } if employee_ids else {}
+
+        app_codes = set()
+        for obj in objs:
+            arr_tmp = obj.doc_app.split('.') if obj.doc_app else []
+            if len(arr_tmp) == 2:
+                app_codes.add((arr_tmp[0].lower(), arr_tmp[1].lower()))
+        app_mapped = {}
+        if app_codes:
+            for app_obj in apps.get_model(app_label='base', model_name='Application').objects.filter(
+                    app_label__in={x[0] for x in app_codes}, model_code__in={x[1] for x in app_codes},
+            ):
+                app_mapped.setdefault((app_obj.app_label, app_obj.model_code), app_obj.id)
+
+        for obj in objs:
+            if obj.user_id:
+                obj.user_data = user_data.get(str(obj.user_id), {})
+            if obj.employee_id:
+                obj.employee_data = employee_data.get(str(obj.employee_id), {})
+            if obj.employee_sender_id:
+                obj.employee_sender_data = employee_data.get(str(obj.employee_sender_id), {})
+            arr_tmp = obj.doc_app.split('.') if obj.doc_app else []
+            if len(arr_tmp) == 2:
+                app_id = app_mapped.get((arr_tmp[0].lower(), arr_tmp[1].lower()), None)
+                if app_id:
+                    obj.application_id = app_id
+        return objs
+
     def save(self, *args, **kwargs):
         self.before_save(force_insert=kwargs.get('force_insert', False))
         super().save(*args, **kwargs)
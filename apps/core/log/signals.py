@@ -1,8 +1,10 @@
+from celery.signals import worker_process_shutdown
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from apps.core.firebase.utils import FCMNotify
 from apps.core.log.models import Notifications
+from apps.core.log.sink import ActivityLogSink
 
 
 @receiver(post_save, sender=Notifications)
@@ -16,3 +18,9 @@ def new_notify(sender, instance, created, **kwargs):
                 title=f"""[{company.title or ''}] {instance.title}""",
                 body=instance.msg,
             )
+
+
+@worker_process_shutdown.connect
+def flush_activity_log_sink(**kwargs):  # pylint: disable=W0613
+    # process con của worker dừng => ghi hết activity log còn trong buffer của process đó
+    return ActivityLogSink.flush()
@@ -0,0 +1,108 @@
+"""
+Write-behind cho ActivityLog:
+    - Mỗi request chỉ đưa record vào buffer của process (không gửi task / INSERT ngay)
+    - Flush khi đủ ACTIVITY_LOG_SINK_BATCH_SIZE record hoặc record cũ nhất đã chờ ACTIVITY_LOG_SINK_FLUSH_INTERVAL giây
+      (thread timer, và kiểm tra lại ở mỗi push): 1 task force_log_activity_many => 1 bulk_create trên DB logs
+    - Flush khi process kết thúc bình thường (atexit) và khi process con của celery worker dừng
+      (worker_process_shutdown trong log/signals.py)
+Giới hạn mất log: process bị SIGKILL / OOM thì atexit không chạy => mất phần còn trong buffer,
+    tối đa ACTIVITY_LOG_SINK_BATCH_SIZE - 1 record, gồm các record của ACTIVITY_LOG_SINK_FLUSH_INTERVAL giây cuối.
+    Cần không mất log nào => giữ ACTIVITY_LOG_SINK_ENABLED = False.
+Tắt (ACTIVITY_LOG_SINK_ENABLED = False) => BaseMixin.write_log giữ cách cũ: 1 task force_log_activity / record.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from apps.core.log.tasks import force_log_activity_many
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['ActivityLogSink']
+
+
+class ActivityLogSink:
+    _buffer: list[dict] = []
+    _lock = threading.Lock()
+    _pid = None
+    _timer = None
+    _oldest_at = 0.0  # thời điểm push record cũ nhất còn trong buffer
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return getattr(settings, 'ACTIVITY_LOG_SINK_ENABLED', False) is True
+
+    @classmethod
+    def batch_size(cls) -> int:
+        return getattr(settings, 'ACTIVITY_LOG_SINK_BATCH_SIZE', 100)
+
+    @classmethod
+    def flush_interval(cls) -> float:
+        return getattr(settings, 'ACTIVITY_LOG_SINK_FLUSH_INTERVAL', 2)
+
+    @classmethod
+    def _ensure_started(cls):
+        # gọi trong lock; process mới (fork) => buffer riêng + thread flush riêng
+        pid = os.getpid()
+        if cls._pid != pid:
+            cls._pid = pid
+            cls._buffer = []
+            cls._timer = threading.Thread(target=cls._run_timer, name='activity-log-sink', daemon=True)
+            cls._timer.start()
+            atexit.register(cls.flush)
+
+    @classmethod
+    def _wait_time(cls) -> float:
+        # số giây tới khi record cũ nhất đủ flush_interval (buffer rỗng => chờ nguyên 1 interval)
+        if not cls._buffer:
+            return cls.flush_interval()
+        return cls._oldest_at + cls.flush_interval() - time.monotonic()
+
+    @classmethod
+    def _run_timer(cls):
+        while cls._timer is threading.current_thread():
+            wait_time = cls._wait_time()
+            if wait_time > 0:
+                time.sleep(wait_time)
+            else:
+                try:
+                    cls.flush()
+                except Exception as err:
+                    logger.error('[ActivityLogSink] Flush error: %s', str(err))
+                finally:
+                    connections.close_all()
+
+    @classmethod
+    def push(cls, **kwargs):
+        """
+        kwargs: ARGS of "force_log_activity"
+        """
+        with cls._lock:
+            cls._ensure_started()
+            if not cls._buffer:
+                cls._oldest_at = time.monotonic()
+            cls._buffer.append(kwargs)
+            # kiểm tra cả tuổi record cũ nhất => vẫn giữ giới hạn flush_interval khi thread timer bị trễ
+            is_full = len(cls._buffer) >= cls.batch_size() or cls._wait_time() <= 0
+        if is_full:
+            cls.flush()
+        return True
+
+    @classmethod
+    def flush(cls) -> int:
+        with cls._lock:
+            if cls._pid != os.getpid():
+                return 0
+            data_list, cls._buffer = cls._buffer, []
+        if not data_list:
+            return 0
+        if settings.CELERY_TASK_ALWAYS_EAGER:
+            force_log_activity_many(data_list=data_list)
+        else:
+            force_log_activity_many.apply_async(kwargs={'data_list': data_list})
+        return len(data_list)
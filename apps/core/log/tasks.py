@@ -3,15 +3,19 @@ from typing import Union
 from uuid import UUID
 
 from celery import shared_task
+from django.apps import apps
 from django.utils import timezone
 
+from apps.core.firebase.utils import FCMNotify
 from apps.core.log.models import (
     ActivityLog,
     Notifications,
 )
+from apps.shared.extends.caching import Caching
 
 __all__ = [
     'force_log_activity',
+    'force_log_activity_many',
     'force_new_notify',
     'force_new_notify_many',
 ]
@@ -53,6 +57,30 @@ def force_log_activity(
     return str(obj)
 
 
+FORCE_LOG_ACTIVITY_CHUNK_SIZE = 500
+
+
+@shared_task
+def force_log_activity_many(data_list: list[dict[str, any]]):
+    # data_list[index] is ARGS of "force_log_activity" => mỗi chunk: user/employee truy vấn 1 lần, 1 bulk_create
+    total = 0
+    for idx in range(0, len(data_list), FORCE_LOG_ACTIVITY_CHUNK_SIZE):
+        objs = ActivityLog.bulk_before_save(
+            [
+                ActivityLog(
+                    **{
+                        'automated_logging': False,
+                        'change_partial': False,
+                        **item,
+                        'data_change': item['data_change'] if isinstance(item.get('data_change', None), dict) else {},
+                    }
+                ) for item in data_list[idx:idx + FORCE_LOG_ACTIVITY_CHUNK_SIZE]
+            ]
+        )
+        total += len(ActivityLog.objects.bulk_create(objs))
+    return total
+
+
 @shared_task
 def force_new_notify(
         tenant_id: Union[UUID, str, None],
@@ -71,18 +99,17 @@ def force_new_notify(
         comment_mentions_id=None,
         notify_type: int = 0,
 ):
-    obj = Notifications(
+    obj = new_notify_obj(
         tenant_id=tenant_id,
         company_id=company_id,
-        title=title if len(title) <= 100 else f'{title[:97]}...',
+        title=title,
         msg=msg,
-        date_created=date_created if date_created else timezone.now(),
+        date_created=date_created,
         doc_id=doc_id,
         doc_app=doc_app,
         user_id=user_id,
         employee_id=employee_id,
         employee_sender_id=employee_sender_id,
-        is_done=False,
         application_id=application_id,
         comment_mentions_id=comment_mentions_id,
         notify_type=notify_type,
@@ -93,14 +120,74 @@ def force_new_notify(
     return obj
 
 
+def new_notify_obj(title: str, date_created: datetime.datetime = None, **kwargs) -> Notifications:
+    # kwargs là ARGS của "force_new_notify" (trừ is_submit) => object chưa before_save, chưa lưu
+    return Notifications(
+        title=title if len(title) <= 100 else f'{title[:97]}...',
+        date_created=date_created if date_created else timezone.now(),
+        is_done=False,
+        **kwargs,
+    )
+
+
+def clear_notify_cache(objs: list[Notifications]):
+    """
+    Xóa cache đếm notify chưa đọc của các employee nhận notify (1 lần gọi cache)
+    """
+    keys = {
+        Caching.key_cache_table(
+            table_name=Notifications.__name__,
+            string_key=Notifications.cache_base_key(my_obj=obj),
+            hash_key=True,
+        )
+        for obj in objs if obj.employee_id
+    }
+    if keys:
+        Caching().delete_many(list(keys))
+    return True
+
+
+def push_notify_fcm(objs: list[Notifications]):
+    """
+    Gửi FCM cho danh sách notify (thay cho signal new_notify từng dòng): batch multicast
+    """
+    # task chạy qua celery (json) => ID là str, so khớp theo str() ở cả 2 phía như bulk_before_save
+    employee_ids = {str(obj.employee_id) for obj in objs if obj.employee_id}
+    if not employee_ids:
+        return 0
+    user_of_employee = {
+        str(employee_id): user_id
+        for employee_id, user_id in apps.get_model(app_label='hr', model_name='Employee').objects.filter(
+            id__in=employee_ids, user__isnull=False,
+        ).values_list('id', 'user_id')
+    }
+    company_title = {
+        str(company_id): title
+        for company_id, title in apps.get_model(app_label='company', model_name='Company').objects.filter(
+            id__in={str(obj.company_id) for obj in objs if obj.company_id},
+        ).values_list('id', 'title')
+    }
+    messages = []
+    for obj in objs:
+        user_id = user_of_employee.get(str(obj.employee_id), None)
+        if user_id and str(obj.company_id) in company_title:
+            messages.append(
+                {
+                    'user_id': user_id,
+                    'title': f"""[{company_title[str(obj.company_id)] or ''}] {obj.title}""",
+                    'body': obj.msg,
+                }
+            )
+    return FCMNotify.send_fcm_multicast(messages=messages)
+
+
 @shared_task
 def force_new_notify_many(data_list: list[dict[str, any]]):
     # data_list[index] is ARGS of "force_new_notify" exclude args name "is_submit"
-    objs = []
-    for item in data_list:
-        objs.append(
-            force_new_notify(
-                **item, is_submit=True
-            )
-        )
+    # bulk: user/employee/application truy vấn 1 lần, bulk_create, FCM multicast
+    objs = Notifications.bulk_before_save([new_notify_obj(**item) for item in data_list])
+    objs = Notifications.objects.bulk_create(objs)
+    # bulk_create không phát post_save => tự xóa cache notify + gửi FCM
+    clear_notify_cache(objs)
+    push_notify_fcm(objs)
     return str(objs)
@@ -0,0 +1,216 @@
+import json
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from celery.signals import worker_process_shutdown
+
+from django.test import TestCase, override_settings
+from firebase_admin.messaging import UnregisteredError
+
+from apps.core.account.models import User
+from apps.core.company.models import Company
+from apps.core.firebase.models import DeviceToken
+from apps.core.hr.models import Employee
+from apps.core.log.models import ActivityLog, Notifications
+from apps.core.log.sink import ActivityLogSink
+from apps.core.log.tasks import force_log_activity_many, force_new_notify_many
+from apps.core.tenant.models import Tenant
+from apps.shared.extends.tests import bulk_new
+
+
+class NotifyManyTestCase(TestCase):
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_NOTIFY')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_NOTIFY', tenant=self.tenant)
+        self.doc_id = uuid.uuid4()
+        self.employees = []
+        for idx in range(2):
+            user = bulk_new(
+                User, username=f'notify{idx}', username_auth=f'notify{idx}-notify', password='',
+                tenant_current=self.tenant,
+            )
+            self.employees.append(
+                bulk_new(
+                    Employee, first_name='Notify', last_name=str(idx), code=f'EMP_NOTIFY{idx}', user=user,
+                    tenant=self.tenant, company=self.company,
+                )
+            )
+            bulk_new(DeviceToken, user=user, token=f'token-{idx}', is_active=True)
+
+    def get_data_list(self):
+        return [
+            {
+                'tenant_id': self.tenant.id, 'company_id': self.company.id, 'title': 'New task', 'msg': 'Task 01',
+                'date_created': None, 'doc_id': self.doc_id, 'doc_app': 'sales.saleorder', 'employee_id': employee.id,
+                'employee_sender_id': self.employees[0].id,
+            } for employee in self.employees
+        ]
+
+    @override_settings(FIREBASE_ENABLE=True)
+    def test_bulk_notify_and_fcm(self):
+        def send_each_for_multicast(message):
+            # token-1 không còn đăng ký
+            return SimpleNamespace(
+                success_count=1,
+                responses=[
+                    SimpleNamespace(
+                        success=token != 'token-1', exception=UnregisteredError('') if token == 'token-1' else None,
+                    ) for token in message.tokens
+                ],
+            )
+
+        with patch(
+                'apps.core.firebase.utils.messaging.send_each_for_multicast', side_effect=send_each_for_multicast,
+        ) as mock_send:
+            force_new_notify_many(self.get_data_list())
+
+        # cùng nội dung => 1 multicast cho cả 2 token
+        self.assertEqual(mock_send.call_count, 1)
+        self.assertCountEqual(mock_send.call_args.args[0].tokens, ['token-0', 'token-1'])
+        self.assertEqual(mock_send.call_args.args[0].notification.title, '[Company] New task')
+        self.assertEqual(list(DeviceToken.objects.values_list('token', flat=True)), ['token-0'])
+
+        objs = Notifications.objects.filter(company=self.company).order_by('employee__code')
+        self.assertEqual([obj.employee_id for obj in objs], [employee.id for employee in self.employees])
+        for obj in objs:
+            self.assertFalse(obj.is_done)
+            self.assertIsNotNone(obj.date_created)
+            self.assertEqual(obj.employee_sender_data.get('id', None), str(self.employees[0].id))
+
+    @override_settings(FIREBASE_ENABLE=True)
+    def test_bulk_notify_json_ids(self):
+        # call_task_background gửi qua celery với CELERY_TASK_SERIALIZER='json' => worker nhận ID dạng str
+        data_list = json.loads(json.dumps(self.get_data_list(), default=str))
+        with patch(
+                'apps.core.firebase.utils.messaging.send_each_for_multicast',
+                side_effect=lambda message: SimpleNamespace(
+                    success_count=len(message.tokens),
+                    responses=[SimpleNamespace(success=True, exception=None) for _token in message.tokens],
+                ),
+        ) as mock_send:
+            force_new_notify_many(data_list)
+
+        self.assertEqual(mock_send.call_count, 1)
+        self.assertCountEqual(mock_send.call_args.args[0].tokens, ['token-0', 'token-1'])
+        self.assertEqual(mock_send.call_args.args[0].notification.title, '[Company] New task')
+
+    @override_settings(FIREBASE_ENABLE=False)
+    def test_bulk_notify_firebase_disabled(self):
+        with patch('apps.core.firebase.utils.messaging.send_each_for_multicast') as mock_send:
+            force_new_notify_many(self.get_data_list())
+        mock_send.assert_not_called()
+        self.assertEqual(Notifications.objects.filter(company=self.company).count(), 2)
+        self.assertEqual(DeviceToken.objects.count(), 2)
+
+
+class ActivityLogManyTestCase(TestCase):
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_LOG')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_LOG', tenant=self.tenant)
+        self.user = bulk_new(
+            User, username='log', username_auth='log-log', password='', first_name='Log', last_name='User',
+            email='log@example.com', tenant_current=self.tenant,
+        )
+        self.employee = bulk_new(
+            Employee, first_name='Log', last_name='Employee', code='EMP_LOG', user=self.user,
+            tenant=self.tenant, company=self.company,
+        )
+
+    def test_backup_data(self):
+        # task nhận qua celery (json) => ID dạng str
+        data_list = json.loads(json.dumps([
+            {
+                'tenant_id': self.tenant.id, 'company_id': self.company.id, 'msg': f'Log {idx}',
+                'doc_id': uuid.uuid4(), 'doc_app': 'sales.saleorder', 'request_method': 'put',
+                'user_id': self.user.id if idx else None, 'employee_id': self.employee.id,
+            } for idx in range(2)
+        ], default=str))
+        with self.assertNumQueries(3):
+            self.assertEqual(force_log_activity_many(data_list), 2)
+
+        objs = {obj.msg: obj for obj in ActivityLog.objects.filter(company=self.company)}
+        self.assertEqual(objs['Log 0'].user_data, {})
+        self.assertEqual(objs['Log 1'].user_data['id'], str(self.user.id))
+        self.assertEqual(objs['Log 1'].user_data['email'], 'log@example.com')
+        for obj in objs.values():
+            self.assertEqual(obj.employee_data['id'], str(self.employee.id))
+            self.assertEqual(obj.request_method, 'PUT')
+
+
+@override_settings(
+    ACTIVITY_LOG_SINK_ENABLED=True, ACTIVITY_LOG_SINK_BATCH_SIZE=3, ACTIVITY_LOG_SINK_FLUSH_INTERVAL=60,
+    CELERY_TASK_ALWAYS_EAGER=True,
+)
+class ActivityLogSinkTestCase(TestCase):
+    def setUp(self):
+        self.reset_sink()
+        patcher = patch('apps.core.log.sink.force_log_activity_many')
+        self.force_log_activity_many = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('apps.core.log.sink.atexit.register')
+        self.atexit_register = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.reset_sink)
+
+    @classmethod
+    def reset_sink(cls):
+        # thread timer cũ tự dừng khi _timer không còn là nó
+        ActivityLogSink._pid = None  # pylint: disable=W0212
+        ActivityLogSink._timer = None  # pylint: disable=W0212
+        ActivityLogSink._buffer = []  # pylint: disable=W0212
+
+    def get_flushed(self):
+        return [call.kwargs['data_list'] for call in self.force_log_activity_many.call_args_list]
+
+    def test_buffering(self):
+        ActivityLogSink.push(msg='log 1')
+        ActivityLogSink.push(msg='log 2')
+        self.assertEqual(self.get_flushed(), [])
+        self.assertEqual(ActivityLogSink._buffer, [{'msg': 'log 1'}, {'msg': 'log 2'}])  # pylint: disable=W0212
+
+    def test_flush_by_size(self):
+        for idx in range(4):
+            ActivityLogSink.push(msg=f'log {idx}')
+        # đủ 3 record => 1 lần ghi cho cả batch, record thứ 4 chờ batch sau
+        self.assertEqual(self.get_flushed(), [[{'msg': 'log 0'}, {'msg': 'log 1'}, {'msg': 'log 2'}]])
+        self.assertEqual(ActivityLogSink._buffer, [{'msg': 'log 3'}])  # pylint: disable=W0212
+
+    def test_flush_by_time_on_push(self):
+        now = time.monotonic()
+        with patch('apps.core.log.sink.time.monotonic', return_value=now):
+            ActivityLogSink.push(msg='log 1')
+        self.assertEqual(self.get_flushed(), [])
+        # record cũ nhất đã chờ đủ flush_interval => push kế tiếp ghi luôn, không đợi thread timer
+        with patch('apps.core.log.sink.time.monotonic', return_value=now + 60):
+            ActivityLogSink.push(msg='log 2')
+        self.assertEqual(self.get_flushed(), [[{'msg': 'log 1'}, {'msg': 'log 2'}]])
+
+    @override_settings(ACTIVITY_LOG_SINK_FLUSH_INTERVAL=0.05)
+    def test_flush_by_timer(self):
+        flushed = threading.Event()
+        self.force_log_activity_many.side_effect = lambda data_list: flushed.set()
+        with patch('apps.core.log.sink.connections.close_all'):
+            ActivityLogSink.push(msg='log 1')
+            self.assertTrue(flushed.wait(timeout=5))
+        self.assertEqual(self.get_flushed(), [[{'msg': 'log 1'}]])
+        self.assertEqual(ActivityLogSink._buffer, [])  # pylint: disable=W0212
+
+    def test_flush_on_shutdown(self):
+        ActivityLogSink.push(msg='log 1')
+        self.atexit_register.assert_called_once_with(ActivityLogSink.flush)
+        ActivityLogSink.push(msg='log 2')
+        worker_process_shutdown.send(sender=None, pid=None, exitcode=0)
+        self.assertEqual(self.get_flushed(), [[{'msg': 'log 1'}, {'msg': 'log 2'}]])
+        # buffer rỗng => không gửi thêm task
+        self.assertEqual(ActivityLogSink.flush(), 0)
+        self.assertEqual(len(self.get_flushed()), 1)
+
+    def test_other_process_buffer_not_flushed(self):
+        ActivityLogSink.push(msg='log 1')
+        # buffer kế thừa sau fork thuộc process cha => process con không ghi lại
+        ActivityLogSink._pid = -1  # pylint: disable=W0212
+        self.assertEqual(ActivityLogSink.flush(), 0)
+        self.assertEqual(self.get_flushed(), [])
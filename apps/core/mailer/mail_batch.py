@@ -0,0 +1,183 @@
+__all__ = ['MailBatchQueue', 'send_mail_workflow_many']
+
+from collections import OrderedDict
+from uuid import UUID
+
+from celery import shared_task
+
+from apps.core.mailer.mail_control import SendMailController
+from apps.core.mailer.mail_data import MailDataResolver
+from apps.core.mailer.mail_pool import MailConnectionPool
+from apps.core.mailer.models import MailConfig, MailLog, MailLogData, MailTemplateSystem
+from apps.shared import DisperseModel
+
+
+class MailBatchQueue:
+    """
+    Hàng đợi gửi mail theo lô:
+        - mail gom theo (tenant, company, cấu hình server): mỗi nhóm gửi bằng send_messages qua 1 kết nối của
+          MailConnectionPool
+        - MailLog của cả lô tạo 1 lần bằng bulk_create với trạng thái gửi cuối cùng (thay vì create rồi update
+          từng dòng như MailLogController), kèm MailLogData (host, port) như update_log_data của MailLogController
+    """
+
+    def __init__(self):
+        self.groups = OrderedDict()
+        self.log_failures = []
+
+    @staticmethod
+    def parse_address(value) -> list[str]:
+        # giống setter address_to/address_cc/address_bcc của MailLogController
+        if isinstance(value, str):
+            value = [value]
+        if isinstance(value, list):
+            return [item for item in value if isinstance(item, str) and '@' in item]
+        return []
+
+    def get_log_data(self, mail_cls: SendMailController, message, log_data: dict) -> dict:
+        return {
+            'address_sender': mail_cls.from_email if mail_cls.from_email else '',
+            'address_to': self.parse_address(message.to if message else []),
+            'address_cc': self.parse_address(mail_cls.kwargs.get('cc_email', [])),
+            'address_bcc': self.parse_address(mail_cls.kwargs.get('bcc_email', [])),
+            **log_data,
+        }
+
+    def add(self, mail_cls: SendMailController, message, log_data: dict):
+        """
+        * param 'message': EmailMessage (SendMailController.build_message)
+        * param 'log_data': field của MailLog: tenant_id, company_id, system_code, doc_id, subject,...
+        """
+        key = (
+            str(log_data.get('tenant_id', None)),
+            str(log_data.get('company_id', None)),
+            MailConnectionPool.get_key(mail_cls.kwargs),
+        )
+        group = self.groups.setdefault(key, {'mail_cls': mail_cls, 'items': []})
+        group['items'].append((message, self.get_log_data(mail_cls, message, log_data)))
+        return self
+
+    def add_failure(self, mail_cls: SendMailController, log_data: dict, errors: str):
+        # mail không dựng được (lỗi template, data) => chỉ ghi log lỗi
+        self.log_failures.append(
+            (
+                MailLog(
+                    **self.get_log_data(mail_cls, None, log_data),
+                    status_code=2, status_remark='False', errors_data=f'[SendMailController] Errors: {errors}',
+                ),
+                mail_cls,
+            )
+        )
+        return self
+
+    @staticmethod
+    def get_log_server(log_obj: MailLog, mail_cls: SendMailController) -> MailLogData:
+        return MailLogData(log=log_obj, host=mail_cls.host, port=mail_cls.port)
+
+    @classmethod
+    def send_group(cls, mail_cls: SendMailController, items) -> list[tuple[MailLog, SendMailController]]:
+        if mail_cls.confirm_config():
+            results = mail_cls.send_messages([message for message, _log_data in items])
+        else:
+            skip_msg = f"[SendMailController] Skip send mail before confirm_config is false: Host: {mail_cls.host}"
+            results = [(skip_msg, '') for _item in items]
+
+        log_objs = []
+        for (_message, log_data), (state_send, errors) in zip(items, results):
+            log_objs.append(
+                (
+                    MailLog(
+                        **log_data,
+                        status_code=1 if state_send is True else 2,  # 1: sent, 2: error
+                        status_remark=str(state_send),
+                        errors_data=f'[SendMailController] Errors: {errors}' if errors else '',
+                    ),
+                    mail_cls,
+                )
+            )
+        return log_objs
+
+    def dispatch(self) -> list[MailLog]:
+        """ Gửi toàn bộ mail trong hàng đợi, Returns: danh sách MailLog đã tạo """
+        log_items = list(self.log_failures)
+        for group in self.groups.values():
+            log_items.extend(self.send_group(mail_cls=group['mail_cls'], items=group['items']))
+        self.groups.clear()
+        self.log_failures = []
+        if not log_items:
+            return []
+        log_objs = MailLog.objects.bulk_create([log_obj for log_obj, _mail_cls in log_items])
+        MailLogData.objects.bulk_create(
+            [self.get_log_server(log_obj, mail_cls) for log_obj, (_log_obj, mail_cls) in zip(log_objs, log_items)]
+        )
+        return log_objs
+
+
+def get_workflow_mail_cls(tenant_id, company_id):
+    """ Returns: (SendMailController, MailTemplateSystem) hoặc (None, mã lỗi) giống send_mail_workflow """
+    cls = SendMailController(mail_config=MailConfig.get_config(tenant_id=tenant_id, company_id=company_id), timeout=10)
+    if cls.is_active is not True:
+        return None, 'MAIL_CONFIG_DEACTIVATE'
+    template_obj = MailTemplateSystem.get_config(tenant_id=tenant_id, company_id=company_id, system_code=6)
+    if not (template_obj and template_obj.contents):
+        return None, 'TEMPLATE_HAS_NOT_CONTENTS_VALUE'
+    cls.setup(
+        subject=template_obj.subject if template_obj.subject else 'Workflow',
+        from_email=cls.kwargs['from_email'],
+        header={},
+        reply_to=cls.kwargs['reply_email'],
+    )
+    return cls, template_obj
+
+
+def get_workflow_employees(tenant_id, company_id, employee_ids) -> list:
+    """ Nhân viên nhận mail theo thứ tự employee_ids, bỏ qua nhân viên không có email / user không có email """
+    employee_objs = {
+        str(obj.id): obj for obj in DisperseModel(app_model='hr.Employee').get_model().objects.filter(
+            tenant_id=tenant_id, company_id=company_id, id__in=employee_ids,
+        ).select_related('user')
+    }
+    result = []
+    for employee_id in employee_ids:
+        employee_obj = employee_objs.get(str(employee_id), None)
+        if employee_obj and employee_obj.user and employee_obj.user.email and employee_obj.email:
+            result.append(employee_obj)
+    return result
+
+
+@shared_task
+def send_mail_workflow_many(
+        tenant_id: UUID or str,
+        company_id: UUID or str,
+        employee_ids: list,
+        runtime_id,
+        workflow_type,
+):
+    """
+    send_mail_workflow cho nhiều nhân viên của cùng 1 runtime: cấu hình, template, data load 1 lần,
+    gửi qua 1 kết nối SMTP (MailBatchQueue), log tạo bằng bulk_create
+    """
+    cls, template_obj = get_workflow_mail_cls(tenant_id=tenant_id, company_id=company_id)
+    if cls is None:
+        return template_obj
+    data = MailDataResolver.workflow(
+        runtime_id=runtime_id, workflow_type=workflow_type, tenant_id=tenant_id, company_id=company_id,
+    )
+    queue = MailBatchQueue()
+    for employee_obj in get_workflow_employees(tenant_id, company_id, employee_ids):
+        log_data = {
+            'tenant_id': tenant_id, 'company_id': company_id,
+            'system_code': 6,  # WORKFLOW
+            'doc_id': employee_obj.user_id, 'subject': cls.subject,
+        }
+        try:
+            message = cls.build_message(mail_to=[employee_obj.email], template=template_obj.contents, data=data)
+        except Exception as err:
+            queue.add_failure(mail_cls=cls, log_data=log_data, errors=str(err))
+            continue
+        queue.add(mail_cls=cls, message=message, log_data=log_data)
+    log_objs = queue.dispatch()
+    return {
+        'sent': len([obj for obj in log_objs if obj.status_code == 1]),
+        'failure': len([obj for obj in log_objs if obj.status_code != 1]),
+    }
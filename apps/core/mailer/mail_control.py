@@ -9,6 +9,7 @@ from django.utils import timezone
 from django.utils.text import slugify
 
 from apps.core.mailer.handle_html import HTMLController
+from apps.core.mailer.mail_pool import MailConnectionPool
 
 from apps.shared import FORMATTING, StringHandler
 
@@ -150,6 +151,38 @@ class SendMailController:  # pylint: disable=R0902
             headers['Reply-To'] = settings.headers['Reply-To'] = self.reply_to
         return headers
 
+    def build_message(
+            self,
+            mail_to, template,
+            data, mail_cc=None,
+            mail_bcc=None, as_name="",
+            doc_id=None, previous_id=None,
+            fpath_list=None, subject=None,
+    ) -> EmailMultiAlternatives:
+        data = self.data_resolve(data=data)
+        email = EmailMultiAlternatives(
+            subject=self.subject if subject is None else subject,
+            body=json.dumps(data),
+            from_email=f"{as_name} <{self.from_email}>",
+            to=mail_to if isinstance(mail_to, list) else [mail_to],
+            cc=mail_cc if isinstance(mail_cc, list) else [],
+            bcc=mail_bcc if isinstance(mail_bcc, list) else [],
+            headers=self.combine_email_header(doc_id, previous_id)
+        )
+        email.attach_alternative(
+            HTMLController(
+                html_str=template, is_unescape=True
+            ).handle_params(data=data).to_string(),
+            "text/html"
+        )
+        for fpath in fpath_list or []:
+            email.attach_file(fpath)
+        return email
+
+    def send_messages(self, messages: list[EmailMultiAlternatives]) -> list[tuple[bool, str]]:
+        # gửi qua kết nối dùng chung của worker (MailConnectionPool) thay vì mở kết nối mới
+        return MailConnectionPool.send_messages(connection_kwargs=self.kwargs, messages=messages)
+
     def send(
             self,
             mail_to, template,
@@ -166,41 +199,18 @@ class SendMailController:  # pylint: disable=R0902
             fpath_list = []
         if self.confirm_config():
             try:
-                with self.connection as connection:
-                    data = self.data_resolve(data=data)
-
-                    # send_mail(
-                    #     subject=self.subject,
-                    #     message=json.dumps(data),
-                    #     from_email=self.from_email,
-                    #     recipient_list=mail_to if isinstance(mail_to, list) else [mail_to],
-                    #     connection=connection,
-                    #     html_message=HTMLController.unescape(html_content),
-                    # )
-
-                    email = EmailMultiAlternatives(
-                        subject=self.subject,
-                        body=json.dumps(data),
-                        from_email=f"{as_name} <{self.from_email}>",
-                        to=mail_to if isinstance(mail_to, list) else [mail_to],
-                        cc=mail_cc if isinstance(mail_cc, list) else [],
-                        bcc=mail_bcc if isinstance(mail_bcc, list) else [],
-                        connection=connection,
-                        headers=self.combine_email_header(doc_id, previous_id)
-                    )
-                    email.attach_alternative(
-                        HTMLController(
-                            html_str=template, is_unescape=True
-                        ).handle_params(data=data).to_string(),
-                        "text/html"
-                    )
-                    for fpath in fpath_list:
-                        email.attach_file(fpath)
-                    email.send()
-                    return True
+                email = self.build_message(
+                    mail_to=mail_to, template=template, data=data, mail_cc=mail_cc, mail_bcc=mail_bcc,
+                    as_name=as_name, doc_id=doc_id, previous_id=previous_id, fpath_list=fpath_list,
+                )
             except Exception as err:
                 print('[SendMailController][send]', str(err))
                 raise ValueError(f'[SendMailController] Errors: {str(err)}')
+            state_send, errors = self.send_messages([email])[0]
+            if state_send is True:
+                return True
+            print('[SendMailController][send]', errors)
+            raise ValueError(f'[SendMailController] Errors: {errors}')
         info_config = ",".join([
             f"Host: {self.kwargs['host']}",
             f"Mail To: {mail_to}",
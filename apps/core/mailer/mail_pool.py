@@ -0,0 +1,126 @@
+"""
+Pool kết nối SMTP trong bộ nhớ process (mỗi worker celery có pool riêng).
+    - key = hash thông tin server (host, port, username, password, tls/ssl, cert, timeout): các task dùng chung
+      cấu hình mail gửi qua cùng 1 kết nối thay vì mở 1 phiên SMTP/TLS cho mỗi mail.
+    - kết nối không dùng quá IDLE_TIMEOUT giây bị đóng và mở lại khi cần; server ngắt kết nối giữa chừng => mở lại
+      và gửi lại đúng mail đang gửi 1 lần (mail đã gửi trước đó không bị gửi lại).
+    - tối đa LOCAL_MAX_SIZE kết nối (LRU), kết nối bị đẩy ra sẽ được đóng.
+"""
+import hashlib
+import smtplib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.mail import get_connection
+
+__all__ = ['MailConnectionPool']
+
+CONNECTION_FIELDS = (
+    'host', 'port', 'username', 'password', 'use_tls', 'use_ssl', 'ssl_keyfile', 'ssl_certfile', 'timeout',
+)
+
+
+class PoolEntry:
+    def __init__(self, connection):
+        self.connection = connection
+        self.last_used = 0.0
+        self.connect_count = 0
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        return getattr(self.connection, 'connection', None) is not None
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception as err:
+            print('[MailConnectionPool][close]', str(err))
+
+    def open(self, idle_timeout):
+        if self.is_open() and time.monotonic() - self.last_used > idle_timeout:
+            self.close()
+        if not self.is_open():
+            self.connection.open()
+            self.connect_count += 1
+        self.last_used = time.monotonic()
+        return self.connection
+
+
+class MailConnectionPool:
+    LOCAL_MAX_SIZE = 32
+    IDLE_TIMEOUT = 60
+
+    _local_data = OrderedDict()
+    _local_lock = threading.Lock()
+
+    @classmethod
+    def get_key(cls, connection_kwargs: dict) -> str:
+        data = '|'.join(str(connection_kwargs.get(field, None)) for field in CONNECTION_FIELDS)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get_entry(cls, connection_kwargs: dict) -> PoolEntry:
+        key = cls.get_key(connection_kwargs)
+        removed = []
+        with cls._local_lock:
+            entry = cls._local_data.get(key, None)
+            if entry is None:
+                entry = PoolEntry(connection=get_connection(fail_silently=False, **connection_kwargs))
+                cls._local_data[key] = entry
+                while len(cls._local_data) > cls.LOCAL_MAX_SIZE:
+                    removed.append(cls._local_data.popitem(last=False)[1])
+            cls._local_data.move_to_end(key)
+        for item in removed:
+            with item.lock:
+                item.close()
+        return entry
+
+    @classmethod
+    def send_messages(cls, connection_kwargs: dict, messages: list) -> list[tuple[bool, str]]:
+        """
+        Gửi danh sách EmailMessage qua 1 kết nối của pool
+        Returns: [(state_send, errors)] theo thứ tự messages
+        """
+        result = []
+        if not messages:
+            return result
+        entry = cls.get_entry(connection_kwargs)
+        with entry.lock:
+            for message in messages:
+                result.append(cls.send_one(entry, message))
+        return result
+
+    @classmethod
+    def send_one(cls, entry: PoolEntry, message) -> tuple[bool, str]:
+        for is_retry in (False, True):
+            try:
+                connection = entry.open(idle_timeout=cls.IDLE_TIMEOUT)
+                message.connection = connection
+                return connection.send_messages([message]) == 1, ''
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as err:
+                # kết nối cũ đã bị server đóng => mở lại và gửi lại 1 lần
+                entry.close()
+                if is_retry:
+                    return False, str(err)
+            except Exception as err:
+                if isinstance(err, smtplib.SMTPException) and not isinstance(err, smtplib.SMTPRecipientsRefused):
+                    # lỗi của phiên SMTP (không phải do người nhận) => không dùng lại kết nối này
+                    entry.close()
+                return False, str(err)
+        return False, ''
+
+    @classmethod
+    def get_connect_count(cls, connection_kwargs: dict) -> int:
+        with cls._local_lock:
+            entry = cls._local_data.get(cls.get_key(connection_kwargs), None)
+        return entry.connect_count if entry else 0
+
+    @classmethod
+    def clear(cls):
+        with cls._local_lock:
+            entries = list(cls._local_data.values())
+            cls._local_data.clear()
+        for entry in entries:
+            with entry.lock:
+                entry.close()
@@ -3,6 +3,8 @@ from datetime import timedelta
 from celery import shared_task
 from django.utils import timezone
 from apps.shared import DisperseModel
+# send_mail_workflow_many khai báo ở mail_batch, import lại để autodiscover đăng ký task
+from apps.core.mailer.mail_batch import send_mail_workflow_many  # pylint: disable=W0611
 from apps.core.mailer.mail_control import SendMailController
 from apps.core.mailer.mail_data import MailDataResolver
 from apps.core.mailer.utils import MailLogController
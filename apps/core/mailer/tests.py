@@ -1,3 +1,162 @@
-from django.test import TestCase
+import base64
+import socketserver
+import threading
+import time
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from apps.core.mailer.mail_batch import MailBatchQueue
+from apps.core.mailer.mail_control import SendMailController
+from apps.core.mailer.mail_pool import MailConnectionPool
+from apps.core.mailer.models import MailLog, MailLogData
+
+
+class DebugSMTPHandler(socketserver.StreamRequestHandler):
+    """ SMTP tối giản (EHLO, AUTH PLAIN, MAIL, RCPT, DATA, RSET, NOOP, QUIT): đếm kết nối và mail nhận được """
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('utf-8'))
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connection_total += 1
+        received = 0
+        self.reply('220 debug smtp')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', errors='ignore').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250-debug smtp')
+                self.reply('250 AUTH PLAIN')
+            elif command.startswith('AUTH PLAIN'):
+                base64.b64decode(command.split(' ')[-1] + '==')
+                self.reply('235 authenticated')
+            elif command.startswith('DATA'):
+                self.reply('354 end with <CRLF>.<CRLF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                received += 1
+                with server.lock:
+                    server.message_total += 1
+                self.reply('250 queued')
+                if server.close_after and received >= server.close_after:
+                    # server đóng kết nối (timeout, giới hạn số mail/kết nối)
+                    return
+            elif command.startswith('QUIT'):
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class DebugSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, close_after=0):
+        super().__init__(('127.0.0.1', 0), DebugSMTPHandler)
+        self.lock = threading.Lock()
+        self.connection_total = 0
+        self.message_total = 0
+        self.close_after = close_after
+
+
+# test runner đổi EMAIL_BACKEND sang locmem => dùng lại SMTP backend để gửi tới DebugSMTPServer
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend')
+class MailConnectionPoolTestCase(TestCase):
+    TOTAL = 50
+
+    def setUp(self):
+        MailConnectionPool.clear()
+        self.servers = []
+
+    def tearDown(self):
+        MailConnectionPool.clear()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def start_server(self, close_after=0):
+        server = DebugSMTPServer(close_after=close_after)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    @staticmethod
+    def get_mail_cls(server):
+        return SendMailController(
+            is_active=True, host='127.0.0.1', port=server.server_address[1],
+            username='debug', password='debug', use_tls=False, use_ssl=False,
+            ssl_keyfile=None, ssl_certfile=None, from_email='noreply@mis.com', reply_email=None,
+            cc_email=[], bcc_email=[], timeout=5,
+        ).setup(subject='Debug')
+
+    def send_total(self, mail_cls, total):
+        for idx in range(total):
+            state_send = mail_cls.send(mail_to=[f'user{idx}@mis.com'], template='<p>{{ name }}</p>', data={})
+            self.assertIs(state_send, True)
+
+    def test_send_reuse_connection(self):
+        server = self.start_server()
+        mail_cls = self.get_mail_cls(server)
+        start = time.perf_counter()
+        self.send_total(mail_cls, self.TOTAL)
+        duration = time.perf_counter() - start
+        self.assertEqual(server.message_total, self.TOTAL)
+        self.assertEqual(server.connection_total, 1, f'{self.TOTAL / duration:.0f} mails/s')
+        self.assertEqual(MailConnectionPool.get_connect_count(mail_cls.kwargs), 1)
+
+    def test_reconnect_when_server_closed(self):
+        server = self.start_server(close_after=10)
+        mail_cls = self.get_mail_cls(server)
+        self.send_total(mail_cls, 25)
+        # mỗi kết nối gửi được 10 mail => 3 kết nối, không mail nào bị gửi trùng/mất
+        self.assertEqual(server.message_total, 25)
+        self.assertEqual(server.connection_total, 3)
+
+    def test_queue_dispatch(self):
+        server = self.start_server()
+        mail_cls = self.get_mail_cls(server)
+        queue = MailBatchQueue()
+        for idx in range(self.TOTAL):
+            queue.add(
+                mail_cls=mail_cls,
+                message=mail_cls.build_message(mail_to=[f'user{idx}@mis.com'], template='<p>Hi</p>', data={}),
+                log_data={'system_code': 6, 'subject': 'Debug'},
+            )
+        queue.add_failure(mail_cls=mail_cls, log_data={'system_code': 6, 'subject': 'Debug'}, errors='template')
+        with self.assertNumQueries(2):
+            log_objs = queue.dispatch()
+        self.assertEqual(server.message_total, self.TOTAL)
+        self.assertEqual(server.connection_total, 1)
+        self.assertEqual(len(log_objs), self.TOTAL + 1)
+        self.assertEqual(MailLog.objects.filter(system_code=6, status_code=1).count(), self.TOTAL)
+        self.assertEqual(MailLog.objects.filter(system_code=6, status_code=2).count(), 1)
+        self.assertEqual(
+            set(MailLog.objects.filter(status_code=1).values_list('address_sender', flat=True)), {'noreply@mis.com'}
+        )
+        # MailLogData (host, port) cho mọi log, kể cả log lỗi
+        self.assertEqual(
+            set(MailLogData.objects.values_list('log_id', 'host', 'port')),
+            {(obj.id, '127.0.0.1', str(server.server_address[1])) for obj in log_objs},
+        )
+
+    def test_connection_per_config(self):
+        server_1 = self.start_server()
+        server_2 = self.start_server()
+        queue = MailBatchQueue()
+        for server in (server_1, server_2):
+            mail_cls = self.get_mail_cls(server)
+            for idx in range(10):
+                queue.add(
+                    mail_cls=mail_cls,
+                    message=mail_cls.build_message(mail_to=[f'user{idx}@mis.com'], template='<p>Hi</p>', data={}),
+                    log_data={'system_code': 6, 'subject': 'Debug'},
+                )
+        queue.dispatch()
+        for server in (server_1, server_2):
+            self.assertEqual(server.message_total, 10)
+            self.assertEqual(server.connection_total, 1)
@@ -1,6 +1,7 @@
 from django.urls import path
 
 from apps.core.account.views_import import CoreAccountUserImport
+from apps.core.base.views import ImportJobList, ImportJobDetail
 from apps.core.hr.views.fimport import (
     GroupLevelImport, GroupImport, RoleImport, EmployeeImport,
 )
@@ -14,6 +15,9 @@ from apps.masterdata.saledata.views.fimport import (
 from apps.masterdata.saledata.views.fimport_product import ProductImportList, ProductManufacturerImportList
 
 urlpatterns = [
+    # background import job
+    path('job', ImportJobList.as_view(), name='ImportJobList'),
+    path('job/<str:pk>', ImportJobDetail.as_view(), name='ImportJobDetail'),
     # core
     path('core/account/user', CoreAccountUserImport.as_view(), name='CoreAccountUserImport'),
     # hr
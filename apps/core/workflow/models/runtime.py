@@ -7,7 +7,7 @@ from django.db.models import Q
 from django.utils import timezone
 
 from apps.shared import (
-    SimpleAbstractModel, WORKFLOW_CONFIG_MODE, TypeCheck,
+    SimpleAbstractModel, WORKFLOW_CONFIG_MODE, TypeCheck, DisperseModel,
 )
 
 from .config import (
@@ -189,6 +189,45 @@ class Runtime(SimpleAbstractModel):
             RuntimeViewer.objects.get_or_create(runtime=self, employee=employee_obj, is_active=True)
         return self
 
+    def append_viewers(self, employee_ids) -> list:
+        """
+        append_viewer cho nhiều nhân viên (bulk_create không chạy signal append_permission_viewer_runtime):
+            - tạo viewer chưa có của runtime
+            - cấp quyền view (+ edit nếu có assignee có zone hoặc edit all zone trong runtime) cho viewer mới 1 lần
+        Returns: danh sách RuntimeViewer mới tạo
+        """
+        employee_ids = list(dict.fromkeys(str(employee_id) for employee_id in employee_ids if employee_id))
+        viewer_existed = {
+            str(employee_id) for employee_id in RuntimeViewer.objects.filter(
+                runtime=self, employee_id__in=employee_ids
+            ).values_list('employee_id', flat=True)
+        }
+        viewer_objs = RuntimeViewer.objects.bulk_create(
+            [
+                RuntimeViewer(runtime=self, employee_id=employee_id, is_active=True)
+                for employee_id in employee_ids if employee_id not in viewer_existed
+            ]
+        )
+        app_obj = self.app
+        if viewer_objs and app_obj and self.doc_id:
+            new_ids = [str(obj.employee_id) for obj in viewer_objs]
+            edit_ids = {
+                str(employee_id) for employee_id in RuntimeAssignee.objects.filter(
+                    (~Q(zone_and_properties={}) & ~Q(zone_and_properties=[])) | Q(is_edit_all_zone=True),
+                    stage__runtime=self,
+                    employee_id__in=new_ids,
+                ).values_list('employee_id', flat=True)
+            }
+            DisperseModel(app_model='hr.EmployeePermission').get_model().append_permit_by_ids_many(
+                app_label=app_obj.app_label,
+                model_code=app_obj.code,
+                doc_id=str(self.doc_id),
+                perms={
+                    employee_id: ['view', 'edit'] if employee_id in edit_ids else ['view'] for employee_id in new_ids
+                },
+            )
+        return viewer_objs
+
     @classmethod
     def check_document_in_progress(
             cls,
@@ -627,7 +666,7 @@ class RuntimeLog(SimpleAbstractModel):
         default_permissions = ()
         permissions = ()
 
-    def before_save(self, force_insert=False):
+    def before_save(self, force_insert=False, update_log_count=True):
         if force_insert:
             self.tenant = self.stage.tenant if self.stage else self.runtime.tenant
             self.company = self.stage.company if self.stage else self.runtime.company
@@ -646,7 +685,8 @@ class RuntimeLog(SimpleAbstractModel):
         if not self.runtime and self.stage:
             self.runtime = self.stage.runtime
 
-        if self.stage:
+        if self.stage and update_log_count:
+            # update_log_count=False: log tạo theo lô, stage tự cộng log_count 1 lần
             self.stage.log_count += 1
             self.stage.save(update_fields=['log_count'])
 
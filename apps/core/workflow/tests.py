@@ -1,3 +1,288 @@
+import datetime
+from types import SimpleNamespace
+from unittest import mock
+from uuid import uuid4
+
 from django.test import TestCase
 
-# Create your tests here.
+from apps.core.base.models import Application
+from apps.core.company.models import Company
+from apps.core.hr.models import Employee, EmployeePermission, PermissionGrant
+from apps.core.log.models import Notifications
+from apps.core.tenant.models import Tenant
+from apps.core.workflow.models import (
+    Workflow, Node, Association, Runtime, RuntimeStage, RuntimeAssignee, RuntimeViewer, RuntimeLog,
+)
+from apps.core.workflow.utils.plan import ConditionEvaluator, WorkflowPlan
+from apps.core.workflow.utils.runtime import RuntimeStageHandler
+from apps.core.workflow.utils.runtime_sub import WFConfigSupport
+from apps.shared.extends.tests import bulk_new
+
+
+class RuntimeAssigneeBulkTestCase(TestCase):
+    """ Tạo assignee theo lô (_create_assignee_bulk) phải cho cùng kết quả với tạo từng dòng """
+
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_WF')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_WF', tenant=self.tenant)
+        self.app = Application.objects.filter(app_label='quotation', code='quotation').first() or bulk_new(
+            Application, title='Quotation', code='quotation', app_label='quotation', model_code='quotation',
+        )
+        common = {'tenant': self.tenant, 'company': self.company}
+        self.employees = [
+            bulk_new(
+                Employee, first_name=f'Employee {idx}', last_name='Test', code=f'EMP_WF_{idx}',
+                email=f'employee{idx}@mis.com', **common
+            ) for idx in range(6)
+        ]
+        self.workflow = bulk_new(Workflow, title='Workflow', code='WF', **common)
+        self.node = bulk_new(Node, workflow=self.workflow, title='Approve', order=1, **common)
+        zone = [{'id': str(uuid4()), 'title': 'Zone', 'properties': []}]
+        self.assignee_and_zone = {
+            str(employee_obj.id): {
+                'zone_edit': zone if idx % 2 else [],
+                'zone_hidden': zone if idx == 4 else [],
+                'is_edit_all_zone': idx == 2,
+            } for idx, employee_obj in enumerate(self.employees)
+        }
+
+    def new_stage(self):
+        common = {'tenant': self.tenant, 'company': self.company}
+        runtime_obj = bulk_new(
+            Runtime, app=self.app, app_code='quotation.quotation', doc_id=uuid4(), doc_title='Document',
+            flow=self.workflow, **common
+        )
+        # nhân viên đầu tiên đã là viewer => không cấp lại quyền
+        bulk_new(RuntimeViewer, runtime=runtime_obj, employee=self.employees[0], is_active=True)
+        stage_obj = bulk_new(
+            RuntimeStage, runtime=runtime_obj, node=self.node, title='Approve', code='approve', order=1,
+            log_count=3, **common
+        )
+        return runtime_obj, RuntimeStage.objects.get(pk=stage_obj.pk)
+
+    def get_state(self, runtime_obj, stage_obj):
+        stage_obj.refresh_from_db()
+        return {
+            'stage': (
+                stage_obj.log_count, stage_obj.assignee_and_zone_data, stage_obj.assignee_and_zone_hidden_data,
+            ),
+            'assignee': sorted(
+                (
+                    str(obj.employee_id), obj.tenant_id, obj.company_id, obj.is_edit_all_zone, obj.is_done,
+                    str(obj.zone_and_properties), str(obj.zone_hidden_and_properties), str(obj.employee_data),
+                ) for obj in RuntimeAssignee.objects.filter(stage=stage_obj)
+            ),
+            'viewer': sorted(
+                (str(obj.employee_id), obj.is_active) for obj in RuntimeViewer.objects.filter(runtime=runtime_obj)
+            ),
+            'grant': sorted(
+                (str(obj.employee_id), obj.permit_code, obj.permit_from, obj.range_code)
+                for obj in PermissionGrant.objects.filter(source_id=runtime_obj.doc_id)
+            ),
+            'log': sorted(
+                (
+                    str(obj.actor_id), obj.tenant_id, obj.company_id, obj.runtime_id == runtime_obj.id,
+                    obj.kind, obj.action, obj.msg, obj.is_system, str(obj.actor_data),
+                ) for obj in RuntimeLog.objects.filter(stage=stage_obj)
+            ),
+            'notify': sorted(
+                (str(obj.employee_id), obj.notify_type, obj.msg)
+                for obj in Notifications.objects.filter(doc_id=runtime_obj.doc_id)
+            ),
+        }
+
+    def test_bulk_same_as_per_row(self):
+        runtime_per_row, stage_per_row = self.new_stage()
+        RuntimeStageHandler(runtime_per_row)._create_assignee_per_row(  # pylint: disable=W0212
+            stage_obj=stage_per_row, assignee_and_zone=self.assignee_and_zone, is_return=True, remark='Remark',
+        )
+        state_per_row = self.get_state(runtime_per_row, stage_per_row)
+
+        runtime_bulk, stage_bulk = self.new_stage()
+        RuntimeStageHandler(runtime_bulk)._create_assignee_bulk(  # pylint: disable=W0212
+            stage_obj=stage_bulk, assignee_and_zone=self.assignee_and_zone, is_return=True, remark='Remark',
+        )
+        state_bulk = self.get_state(runtime_bulk, stage_bulk)
+
+        for key, value in state_per_row.items():
+            self.assertEqual(value, state_bulk[key], key)
+        # 6 assignee + 3 log có sẵn
+        self.assertEqual(state_bulk['stage'][0], 9)
+        # 5 viewer mới: view cho tất cả, edit cho người có zone hoặc edit all zone
+        self.assertEqual(len([item for item in state_bulk['grant'] if item[1].endswith('.view')]), 5)
+        self.assertEqual(len([item for item in state_bulk['grant'] if item[1].endswith('.edit')]), 4)
+        self.assertEqual(
+            EmployeePermission.objects.filter(employee_id__in=[obj.id for obj in self.employees[1:]]).count(), 5
+        )
+
+
+class ConditionEvaluatorTestCase(TestCase):
+    def check(self, condition, **values):
+        return ConditionEvaluator.check(condition, values)
+
+    def test_parse(self):
+        cond_a = {'left': 'a', 'math': '=', 'right': 1, 'type': 'number'}
+        cond_b = {'left': {'code': 'b'}, 'math': 'is', 'right': 'x', 'type': 'string'}
+        self.assertEqual(ConditionEvaluator.parse([]), ConditionEvaluator.TRUE)
+        self.assertEqual(
+            ConditionEvaluator.parse([cond_a, 'OR', [cond_b, 'AND', cond_a], 'AND']),
+            ('or', (
+                ('cond', 'a', 'eq', 1, 'number'),
+                ('and', (('cond', 'b', 'eq', 'x', 'string'), ('cond', 'a', 'eq', 1, 'number'))),
+            )),
+        )
+        for condition in ('a = 1', [cond_a, 'XOR'], [{'left': 'a', 'math': '~', 'right': 1}], [{'math': '='}]):
+            with self.assertRaises(ValueError):
+                ConditionEvaluator.parse(condition)
+
+    def test_and_binds_tighter_than_or(self):
+        # a OR b AND c = a OR (b AND c)
+        condition = [
+            {'left': 'a', 'math': '=', 'right': True, 'type': 'boolean'}, 'OR',
+            {'left': 'b', 'math': '=', 'right': True, 'type': 'boolean'}, 'AND',
+            {'left': 'c', 'math': '=', 'right': True, 'type': 'boolean'},
+        ]
+        self.assertTrue(self.check(condition, a=True, b=False, c=False))
+        self.assertFalse(self.check(condition, a=False, b=True, c=False))
+        self.assertTrue(self.check(condition, a='false', b='true', c='1'))
+
+    def test_compare(self):
+        cases = [
+            ({'left': 'total', 'math': '>=', 'right': '100', 'type': 'number'}, {'total': 100}, True),
+            ({'left': 'total', 'math': '<', 'right': 100, 'type': 'number'}, {'total': '99.5'}, True),
+            ({'left': 'total', 'math': '>', 'right': 100, 'type': 'number'}, {'total': None}, False),
+            ({'left': 'total', 'math': '>', 'right': 100, 'type': 'number'}, {'total': 'abc'}, False),
+            ({'left': 'title', 'math': '!=', 'right': 'A', 'type': 'string'}, {'title': 'B'}, True),
+            ({'left': 'title', 'math': 'contains', 'right': 'an', 'type': 'string'}, {'title': 'Bank'}, True),
+            ({'left': 'title', 'math': 'starts with', 'right': 'Ba', 'type': 'string'}, {'title': 'Bank'}, True),
+            ({'left': 'title', 'math': 'ends with', 'right': 'Ba', 'type': 'string'}, {'title': 'Bank'}, False),
+            ({'left': 'title', 'math': 'is empty', 'right': None}, {'title': ''}, True),
+            ({'left': 'code', 'math': 'in', 'right': ['A', 'B'], 'type': 'string'}, {'code': 'B'}, True),
+            ({'left': 'code', 'math': 'not in', 'right': ['A', 'B'], 'type': 'string'}, {'code': 'B'}, False),
+            ({'left': 'tags', 'math': 'contains', 'right': {'id': 'x'}}, {'tags': [{'id': 'x'}, {'id': 'y'}]}, True),
+            (
+                {'left': 'date', 'math': '<=', 'right': '2025-06-30', 'type': 'date'},
+                {'date': datetime.datetime(2025, 6, 30, 15)}, True,
+            ),
+        ]
+        for condition, values, expected in cases:
+            self.assertEqual(self.check([condition], **values), expected, (condition, values))
+
+    def test_get_value_from_document(self):
+        doc_obj = SimpleNamespace(customer=SimpleNamespace(code='C1'), total=10)
+        self.assertEqual(
+            ConditionEvaluator.get_values(['customer.code', 'customer__code', 'total', 'none.x'], doc_obj=doc_obj),
+            {'customer.code': 'C1', 'customer__code': 'C1', 'total': 10, 'none.x': None},
+        )
+        # params ưu tiên hơn thuộc tính của chứng từ
+        self.assertEqual(ConditionEvaluator.get_values(['total'], doc_obj=doc_obj, params={'total': 5}), {'total': 5})
+
+    def test_compare_condition_malformed(self):
+        self.assertFalse(WFConfigSupport.compare_condition([{'left': 'a', 'math': '~', 'right': 1}], {'a': 1}))
+        self.assertTrue(WFConfigSupport.compare_condition([], {}))
+
+
+class WorkflowPlanBranchTestCase(TestCase):
+    """ Node A -> B (total >= 100), A -> C (total < 100), A -> D (total >= 50, hoặc code = VIP) """
+
+    def setUp(self):
+        WorkflowPlan.clear()
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_PLAN')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_PLAN', tenant=self.tenant)
+        common = {'tenant': self.tenant, 'company': self.company}
+        self.workflow = bulk_new(Workflow, title='Workflow', code='WF_PLAN', **common)
+        self.nodes = {
+            code: bulk_new(Node, workflow=self.workflow, title=code, order=idx, **common)
+            for idx, code in enumerate(('A', 'B', 'C', 'D', 'E'))
+        }
+        self.associations = {}
+        for code, condition in (
+                ('B', [{'left': 'total', 'math': '>=', 'right': 100, 'type': 'number'}]),
+                ('C', [{'left': 'total', 'math': '<', 'right': 100, 'type': 'number'}]),
+                ('D', [
+                    {'left': 'total', 'math': '>=', 'right': 50, 'type': 'number'}, 'OR',
+                    {'left': 'customer.code', 'math': '=', 'right': 'VIP', 'type': 'string'},
+                ]),
+                ('E', [{'left': 'total', 'math': '~', 'right': 0}]),
+        ):
+            self.associations[code] = bulk_new(
+                Association, workflow=self.workflow, node_in=self.nodes['A'], node_out=self.nodes[code],
+                condition=condition, **common
+            )
+        self.workflow = Workflow.objects.get(id=self.workflow.id)
+        self.plan = WorkflowPlan.get(self.workflow)
+
+    def get_next_codes(self, doc_obj=None, **params):
+        return sorted(
+            association_id for association_id in self.plan.get_next_list(
+                self.nodes['A'].id, doc_obj=doc_obj, params=params
+            )
+        )
+
+    def test_next_list(self):
+        ids = {code: obj.id for code, obj in self.associations.items()}
+        self.assertEqual(self.get_next_codes(total=20), [ids['C']])
+        self.assertEqual(self.get_next_codes(total=150), sorted([ids['B'], ids['D']]))
+        self.assertEqual(self.get_next_codes(total=60), sorted([ids['C'], ids['D']]))
+        # giá trị lấy từ chứng từ khi không có trong params, condition sai format (E) không bao giờ thỏa
+        doc_obj = SimpleNamespace(total=20, customer=SimpleNamespace(code='VIP'))
+        self.assertEqual(self.get_next_codes(doc_obj=doc_obj), sorted([ids['C'], ids['D']]))
+        self.assertEqual(self.plan.get_next_list(self.nodes['B'].id, params={'total': 1}), [])
+
+    def test_get_next(self):
+        association_obj = self.plan.get_next(self.nodes['A'].id, params={'total': 20, 'customer.code': 'NORMAL'})
+        self.assertEqual(association_obj.id, self.associations['C'].id)
+        self.assertEqual(association_obj.node_out.id, self.nodes['C'].id)
+        self.assertIsNone(self.plan.get_next(self.nodes['B'].id, params={}))
+        with self.assertRaises(ValueError):
+            self.plan.get_next(self.nodes['A'].id, params={'total': 150})
+        # WFConfigSupport đọc cùng plan
+        self.assertEqual(
+            WFConfigSupport(self.workflow).get_next(self.nodes['A'], params={'total': 10, 'customer.code': ''}).id,
+            self.associations['C'].id,
+        )
+
+    def test_check_association(self):
+        self.assertTrue(self.plan.check_association(self.associations['B'].id, self.nodes['A'].id, params={'total': 150}))
+        self.assertFalse(self.plan.check_association(self.associations['B'].id, self.nodes['A'].id, params={'total': 20}))
+        doc_obj = SimpleNamespace(total=20, customer=SimpleNamespace(code='VIP'))
+        self.assertTrue(self.plan.check_association(str(self.associations['D'].id), self.nodes['A'], doc_obj=doc_obj))
+        # condition sai format / không phải nhánh ra của node / không thuộc workflow
+        self.assertFalse(self.plan.check_association(self.associations['E'].id, self.nodes['A'].id, params={}))
+        self.assertFalse(self.plan.check_association(self.associations['B'].id, self.nodes['B'].id, params={'total': 150}))
+        self.assertFalse(self.plan.check_association(uuid4(), self.nodes['A'].id, params={'total': 150}))
+
+    def test_run_next_association_chosen_by_document(self):
+        common = {'tenant': self.tenant, 'company': self.company}
+        app = Application.objects.filter(app_label='quotation', code='quotation').first() or bulk_new(
+            Application, title='Quotation', code='quotation', app_label='quotation', model_code='quotation',
+        )
+        runtime_obj = bulk_new(
+            Runtime, app=app, app_code='quotation.quotation', doc_id=uuid4(), doc_title='Document', flow=self.workflow,
+            doc_params={}, **common
+        )
+        runtime_obj = Runtime.objects.select_related('flow').get(id=runtime_obj.id)
+        stage_obj = bulk_new(RuntimeStage, runtime=runtime_obj, node=self.nodes['A'], title='A', order=1, **common)
+        handler = RuntimeStageHandler(runtime_obj=runtime_obj)
+        for next_association_id, total, node_out_code in [
+            (self.associations['D'].id, 150, 'D'), (self.associations['C'].id, 20, 'C'), (None, 20, None),
+        ]:
+            doc_obj = SimpleNamespace(next_association_id=next_association_id, total=total)
+            with mock.patch('apps.core.workflow.utils.runtime.DocHandler.get_obj', return_value=doc_obj):
+                # association + node lấy từ plan (không query Association / Node)
+                with self.assertNumQueries(0):
+                    association_obj = handler.get_next_association(stage_obj)
+            self.assertEqual(
+                association_obj.node_out.id if association_obj else None,
+                self.nodes[node_out_code].id if node_out_code else None,
+            )
+        # nhánh chứng từ chọn không thỏa condition => lỗi (không tự đi nhánh khác)
+        doc_obj = SimpleNamespace(next_association_id=self.associations['C'].id, total=150)
+        with mock.patch('apps.core.workflow.utils.runtime.DocHandler.get_obj', return_value=doc_obj):
+            with self.assertRaisesMessage(ValueError, 'condition is not met'):
+                handler.get_next_association(stage_obj)
+
+    def test_plan_cached_by_workflow_version(self):
+        self.assertIs(WorkflowPlan.get(self.workflow), self.plan)
+        self.workflow.save()
+        self.assertIsNot(WorkflowPlan.get(Workflow.objects.get(id=self.workflow.id)), self.plan)
@@ -4,7 +4,7 @@ from typing import Union
 from django.db import models, transaction
 from django.utils import timezone
 
-from apps.core.mailer.tasks import send_mail_workflow
+from apps.core.mailer.tasks import send_mail_workflow, send_mail_workflow_many
 from apps.core.process.utils import ProcessRuntimeControl
 from apps.core.workflow.utils.runtime_sub import HookEventHandler
 from apps.shared import (DisperseModel, call_task_background, )
@@ -263,3 +263,23 @@ class DocHandler:
                             }
                         )
         return True
+
+    @classmethod
+    def send_mail_many(cls, emp_ids, runtime_obj, workflow_type):
+        # giống send_mail cho nhiều nhân viên: 1 task gửi cả lô qua 1 kết nối SMTP (send_mail_workflow_many)
+        mail_config_cls = DisperseModel(app_model='mailer.MailConfig').get_model()
+        if not emp_ids or not mail_config_cls or not hasattr(mail_config_cls, 'get_config'):
+            return True
+        config_obj = mail_config_cls.get_config(tenant_id=runtime_obj.tenant_id, company_id=runtime_obj.company_id)
+        if config_obj and config_obj.is_active:
+            call_task_background(
+                my_task=send_mail_workflow_many,
+                **{
+                    'tenant_id': str(runtime_obj.tenant_id),
+                    'company_id': str(runtime_obj.company_id),
+                    'employee_ids': [str(emp_id) for emp_id in emp_ids],
+                    'runtime_id': str(runtime_obj.id),
+                    'workflow_type': workflow_type,
+                }
+            )
+        return True
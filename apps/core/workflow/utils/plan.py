@@ -0,0 +1,551 @@
+"""
+Plan đã biên dịch của 1 phiên bản Workflow (dùng cho runtime).
+    - Node, Association, Zone (+ properties), collaborator (in form / out form / in workflow), zone của node
+      initial được load 1 lần (số query cố định) và chuyển thành dữ liệu thuần: danh sách kề theo node_in,
+      map zone -> properties, condition của association đã parse thành cây.
+    - Lưu trong bộ nhớ process (LRU), key = workflow id + date_modified: workflow được cập nhật (serializer
+      update luôn save workflow) => key mới, plan cũ tự hết hạn.
+    - Runtime chuyển stage không cần query lại cấu hình: Node/Association trả về là object mới (chưa query)
+      dựng từ plan, zone trả về là bản copy.
+Dữ liệu plan dùng chung (read-only), không được sửa trực tiếp.
+"""
+import copy
+import operator
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Union
+from uuid import UUID
+
+from django.db import models
+
+from apps.core.workflow.models import (
+    Workflow, Node, Association, Zone, InitialNodeZone, InitialNodeZoneHidden,
+    CollaborationInForm, CollaborationInFormZone, CollaborationInFormZoneHidden,
+    CollaborationOutForm, CollaborationOutFormZone, CollaborationOutFormZoneHidden,
+    CollabInWorkflow, CollabInWorkflowZone, CollabInWorkflowZoneHidden,
+)
+
+__all__ = ['ConditionEvaluator', 'WorkflowPlan']
+
+# thay cho CollabInWorkflow: chỉ giữ các thuộc tính WFSupportFunctionsHandler.get_assignee_node_in_wf sử dụng
+CollabInWorkflowPlan = namedtuple(
+    'CollabInWorkflowPlan',
+    ['in_wf_option', 'position_choice', 'employee_id', 'zone', 'zone_hidden', 'is_edit_all_zone'],
+)
+CollabFormPlan = namedtuple('CollabFormPlan', ['app_property_code', 'zone', 'zone_hidden', 'is_edit_all_zone'])
+AssociationPlan = namedtuple('AssociationPlan', ['id', 'node_in_id', 'node_out_id', 'condition_tree', 'fields'])
+
+
+def get_model_fields(obj: models.Model) -> dict:
+    return {
+        field.attname: getattr(obj, field.attname)
+        for field in obj._meta.concrete_fields  # pylint: disable=W0212
+    }
+
+
+def find_key(data: dict, value):
+    # id có thể là UUID, str hoặc object
+    value = getattr(value, 'id', value)
+    if value is None:
+        return None
+    if not isinstance(value, UUID):
+        try:
+            value = UUID(str(value))
+        except ValueError:
+            return None
+    return value if value in data else None
+
+
+def build_obj(model_cls, fields: dict) -> models.Model:
+    # object đã tồn tại trong DB (không query), JSONField được copy để runtime sửa thoải mái
+    fields = copy.deepcopy(fields)
+    return model_cls.from_db('default', list(fields.keys()), list(fields.values()))
+
+
+class ConditionEvaluator:
+    """
+    Parse + so sánh condition của Association với dữ liệu chứng từ
+    condition (xem Association.condition):
+        [
+            {'left': 'a', 'math': 'is', 'right': 'b', 'type': 'string'},
+            'AND',
+            [{'left': 'b', 'math': '=', 'right': 1, 'type': 'number'}, 'OR', {...}, 'OR'],
+            'AND',
+        ]
+    Cây sau khi parse:
+        ('cond', left, math, right, type) | ('and', (tree, ...)) | ('or', (tree, ...)) | ('true',)
+    AND ưu tiên hơn OR (a OR b AND c = a OR (b AND c)), điều kiện rỗng => True.
+    """
+    TRUE = ('true',)
+    LOGIC = {'AND': 'and', 'OR': 'or'}
+    MATH = {
+        '=': 'eq', '==': 'eq', 'is': 'eq', 'equal': 'eq',
+        '!=': 'ne', '≠': 'ne', '<>': 'ne', 'is not': 'ne', 'not': 'ne', 'not equal': 'ne',
+        '>': 'gt', '>=': 'ge', '≥': 'ge', '<': 'lt', '<=': 'le', '≤': 'le',
+        'contains': 'contains', 'not contains': 'not_contains', 'not_contains': 'not_contains',
+        'in': 'in', 'not in': 'not_in', 'not_in': 'not_in',
+        'is empty': 'empty', 'is_empty': 'empty', 'is not empty': 'not_empty', 'is_not_empty': 'not_empty',
+        'starts with': 'startswith', 'startswith': 'startswith', 'ends with': 'endswith', 'endswith': 'endswith',
+    }
+
+    @classmethod
+    def parse_left(cls, left) -> str:
+        # left: code của property hoặc dict property {'id', 'code', ...}
+        if isinstance(left, dict):
+            left = left.get('code', None) or left.get('id', None)
+        if not left:
+            raise ValueError('Condition left is required')
+        return str(left)
+
+    @classmethod
+    def parse_item(cls, item) -> tuple:
+        if isinstance(item, list):
+            return cls.parse(item)
+        if isinstance(item, dict):
+            math = cls.MATH.get(str(item.get('math', '')).strip().lower(), None)
+            if not math:
+                raise ValueError(f'Condition math is not support: {item.get("math", None)}')
+            return (
+                'cond', cls.parse_left(item.get('left', None)), math,
+                cls.normalize(item.get('right', None)), str(item.get('type', '') or 'string').lower(),
+            )
+        raise ValueError(f'Condition item is incorrect: {item}')
+
+    @classmethod
+    def parse(cls, condition: Union[list, None]) -> tuple:
+        """ Parse condition (list) => cây condition. Sai format => ValueError """
+        if not condition:
+            return cls.TRUE
+        if not isinstance(condition, list):
+            raise ValueError('Condition must be list')
+        or_groups = [[]]
+        for item in condition:
+            if isinstance(item, str):
+                logic = cls.LOGIC.get(item.strip().upper(), None)
+                if not logic:
+                    raise ValueError(f'Condition logic is not support: {item}')
+                if logic == 'or' and or_groups[-1]:
+                    or_groups.append([])
+                continue
+            or_groups[-1].append(cls.parse_item(item))
+        trees = [
+            group[0] if len(group) == 1 else ('and', tuple(group)) for group in or_groups if group
+        ]
+        if not trees:
+            return cls.TRUE
+        return trees[0] if len(trees) == 1 else ('or', tuple(trees))
+
+    @classmethod
+    def get_fields(cls, tree: tuple) -> set:
+        """ Các field (left) mà cây condition cần lấy từ chứng từ """
+        if tree[0] == 'cond':
+            return {tree[1]}
+        if tree[0] in ('and', 'or'):
+            return set().union(*[cls.get_fields(child) for child in tree[1]])
+        return set()
+
+    @classmethod
+    def normalize(cls, value):
+        # object (model / dict master data) => id, list => tuple
+        if isinstance(value, models.Model):
+            return str(value.pk)
+        if isinstance(value, dict):
+            value = value.get('id', None) if 'id' in value else value.get('code', None)
+            return str(value) if value is not None else None
+        if isinstance(value, (list, tuple, set)):
+            return tuple(cls.normalize(item) for item in value)
+        return value
+
+    @classmethod
+    def get_value(cls, doc_obj, params: dict, field: str):
+        """ Lấy giá trị field: ưu tiên params, sau đó thuộc tính của chứng từ (hỗ trợ 'a.b' hoặc 'a__b') """
+        if params and field in params:
+            return cls.normalize(params[field])
+        value = doc_obj
+        for attr in field.replace('__', '.').split('.'):
+            if value is None:
+                return None
+            value = value.get(attr, None) if isinstance(value, dict) else getattr(value, attr, None)
+            if isinstance(value, models.Manager):
+                value = [cls.normalize(item) for item in value.all()]
+        return cls.normalize(value)
+
+    @classmethod
+    def get_values(cls, fields, doc_obj=None, params: dict = None) -> dict:
+        return {field: cls.get_value(doc_obj, params, field) for field in fields}
+
+    @staticmethod
+    def cast_number(value):
+        return float(value) if isinstance(value, (int, float, Decimal, str, bool)) else value
+
+    @staticmethod
+    def cast_boolean(value):
+        if isinstance(value, str):
+            return value.strip().lower() in ('true', '1', 'yes')
+        return bool(value)
+
+    @staticmethod
+    def cast_date(value, value_type):
+        if isinstance(value, datetime):
+            return value.replace(tzinfo=None) if value_type == 'datetime' else value.date()
+        if isinstance(value, date):
+            return value if value_type == 'date' else datetime(value.year, value.month, value.day)
+        value = datetime.fromisoformat(str(value)).replace(tzinfo=None)
+        return value.date() if value_type == 'date' else value
+
+    @classmethod
+    def cast(cls, value, value_type):
+        if value is None or value == '':
+            return None
+        if isinstance(value, tuple):
+            return tuple(cls.cast(item, value_type) for item in value)
+        match value_type:
+            case 'number':
+                return cls.cast_number(value)
+            case 'boolean':
+                return cls.cast_boolean(value)
+            case 'date' | 'datetime':
+                return cls.cast_date(value, value_type)
+        return str(value)
+
+    # so sánh 2 giá trị đã cast (eq, ne chấp nhận None)
+    OPERATORS = {
+        'eq': operator.eq,
+        'ne': operator.ne,
+        'gt': operator.gt,
+        'ge': operator.ge,
+        'lt': operator.lt,
+        'le': operator.le,
+        'startswith': lambda value, right: str(value).startswith(str(right)),
+        'endswith': lambda value, right: str(value).endswith(str(right)),
+    }
+
+    @classmethod
+    def compare_empty(cls, value, math: str) -> bool:
+        is_empty = value is None or value in ('', (), [])
+        return is_empty if math == 'empty' else not is_empty
+
+    @classmethod
+    def compare_in(cls, value, math: str, right) -> bool:
+        right = right if isinstance(right, tuple) else (right,)
+        return (value in right) if math == 'in' else (value not in right)
+
+    @classmethod
+    def compare_contains(cls, value, math: str, right) -> bool:
+        if isinstance(value, tuple):
+            is_contain = right in value
+        else:
+            is_contain = value is not None and right is not None and str(right).lower() in str(value).lower()
+        return is_contain if math == 'contains' else not is_contain
+
+    @classmethod
+    def compare_operator(cls, value, math: str, right) -> bool:
+        func = cls.OPERATORS.get(math, None)
+        if not func or (math not in ('eq', 'ne') and (value is None or right is None)):
+            return False
+        try:
+            return func(value, right)
+        except TypeError:
+            return False
+
+    @classmethod
+    def compare(cls, value, math: str, right, value_type: str) -> bool:
+        if math in ('empty', 'not_empty'):
+            return cls.compare_empty(value, math)
+        try:
+            value = cls.cast(value, value_type)
+            right = cls.cast(right, value_type)
+        except (TypeError, ValueError):
+            return False
+        if math in ('in', 'not_in'):
+            return cls.compare_in(value, math, right)
+        if math in ('contains', 'not_contains'):
+            return cls.compare_contains(value, math, right)
+        return cls.compare_operator(value, math, right)
+
+    @classmethod
+    def evaluate(cls, tree: tuple, values: dict) -> bool:
+        match tree[0]:
+            case 'true':
+                return True
+            case 'cond':
+                return cls.compare(values.get(tree[1], None), tree[2], tree[3], tree[4])
+            case 'and':
+                return all(cls.evaluate(child, values) for child in tree[1])
+            case 'or':
+                return any(cls.evaluate(child, values) for child in tree[1])
+        return False
+
+    @classmethod
+    def check(cls, condition: Union[list, None], values: dict) -> bool:
+        """ Parse + evaluate (dùng khi không có plan), condition sai format => False """
+        try:
+            tree = cls.parse(condition)
+        except ValueError:
+            return False
+        return cls.evaluate(tree, values)
+
+
+class WorkflowPlanGraph:
+    """ Node + association (danh sách kề theo node_in, cây condition đã parse) của 1 workflow """
+    FALSE = ('false',)
+
+    def __init__(self, workflow_id):
+        self.nodes = {}
+        self.node_system = {}
+        for node_obj in Node.objects.filter(workflow_id=workflow_id):
+            self.nodes[node_obj.id] = get_model_fields(node_obj)
+            if node_obj.is_system and node_obj.code_node_system:
+                self.node_system.setdefault(node_obj.code_node_system, node_obj.id)
+
+        self.associations = {}
+        adjacency = {}
+        for association_obj in Association.objects.filter(workflow_id=workflow_id):
+            try:
+                condition_tree = ConditionEvaluator.parse(association_obj.condition)
+            except ValueError:
+                # condition sai format => không bao giờ thỏa
+                condition_tree = self.FALSE
+            self.associations[association_obj.id] = AssociationPlan(
+                id=association_obj.id,
+                node_in_id=association_obj.node_in_id,
+                node_out_id=association_obj.node_out_id,
+                condition_tree=condition_tree,
+                fields=get_model_fields(association_obj),
+            )
+            adjacency.setdefault(association_obj.node_in_id, []).append(association_obj.id)
+        self.adjacency = {node_id: tuple(ids) for node_id, ids in adjacency.items()}
+        # các field cần lấy từ chứng từ để xét các nhánh ra của từng node
+        self.node_condition_fields = {
+            node_id: frozenset().union(
+                *[ConditionEvaluator.get_fields(self.associations[item].condition_tree) for item in ids]
+            ) for node_id, ids in self.adjacency.items()
+        }
+
+    def get_node(self, node_id) -> Union[Node, None]:
+        key = find_key(self.nodes, node_id)
+        return build_obj(Node, self.nodes[key]) if key else None
+
+    def get_system_node(self, code_node_system) -> Union[Node, None]:
+        node_id = self.node_system.get(code_node_system, None)
+        return self.get_node(node_id) if node_id else None
+
+    def get_association(self, association_id) -> Union[Association, None]:
+        key = find_key(self.associations, association_id)
+        if not key:
+            return None
+        association_plan = self.associations[key]
+        association_obj = build_obj(Association, association_plan.fields)
+        association_obj.node_in = self.get_node(association_plan.node_in_id)
+        association_obj.node_out = self.get_node(association_plan.node_out_id)
+        return association_obj
+
+    def check_association(self, association_id, node_id, doc_obj=None, params: dict = None) -> bool:
+        """ Association là nhánh ra của node và thỏa condition với giá trị của chứng từ """
+        key = find_key(self.associations, association_id)
+        if not key or self.associations[key].node_in_id != find_key(self.nodes, node_id):
+            return False
+        condition_tree = self.associations[key].condition_tree
+        values = ConditionEvaluator.get_values(
+            ConditionEvaluator.get_fields(condition_tree), doc_obj=doc_obj, params=params
+        )
+        return ConditionEvaluator.evaluate(condition_tree, values)
+
+    def get_next_list(self, node_id, doc_obj=None, params: dict = None) -> list:
+        """
+        Các association đi ra từ node thỏa condition (giá trị chứng từ lấy 1 lần cho tất cả các nhánh)
+        """
+        node_key = find_key(self.adjacency, node_id)
+        if not node_key:
+            return []
+        values = ConditionEvaluator.get_values(self.node_condition_fields[node_key], doc_obj=doc_obj, params=params)
+        return [
+            association_id for association_id in self.adjacency[node_key]
+            if ConditionEvaluator.evaluate(self.associations[association_id].condition_tree, values)
+        ]
+
+
+class WorkflowPlan:
+    LOCAL_MAX_SIZE = 256
+
+    _local_data = OrderedDict()
+    _local_lock = threading.Lock()
+
+    @classmethod
+    def get_key(cls, workflow: Workflow) -> str:
+        return f'{workflow.id}.{workflow.date_modified.isoformat() if workflow.date_modified else ""}'
+
+    @classmethod
+    def get(cls, workflow: Workflow) -> 'WorkflowPlan':
+        """ Plan của workflow (biên dịch nếu chưa có trong bộ nhớ process) """
+        key = cls.get_key(workflow)
+        with cls._local_lock:
+            plan = cls._local_data.get(key, None)
+            if plan is not None:
+                cls._local_data.move_to_end(key)
+                return plan
+        plan = cls(workflow)
+        with cls._local_lock:
+            cls._local_data[key] = plan
+            while len(cls._local_data) > cls.LOCAL_MAX_SIZE:
+                cls._local_data.popitem(last=False)
+        return plan
+
+    @classmethod
+    def clear(cls):
+        with cls._local_lock:
+            cls._local_data.clear()
+
+    @staticmethod
+    def parse_zone(zone_obj: Zone) -> dict:
+        # giống RuntimeStageHandler.__get_zone_and_properties (trước khi có plan)
+        properties = []
+        properties_detail = []
+        for detail in zone_obj.properties.all():
+            properties.append(str(detail.id))
+            properties_detail.append(
+                {
+                    'id': str(detail.id),
+                    'code': str(detail.code),
+                    'type': str(detail.type),
+                    'content_type': str(detail.content_type),
+                    'properties': str(detail.properties),
+                    'compare_operator': str(detail.compare_operator),
+                    'remark': str(detail.remark),
+                }
+            )
+        return {
+            "id": str(zone_obj.id),
+            "title": zone_obj.title,
+            "remark": zone_obj.remark,
+            "properties": properties,
+            "properties_detail": properties_detail,
+        }
+
+    @staticmethod
+    def map_zone_ids(zone_order: dict, through_model, owner_field: str, owner_filter: dict) -> dict:
+        """ {owner_id: (zone_id, ...)} sắp xếp theo Zone.order (giống {m2m}.all()) """
+        result = {}
+        for owner_id, zone_id in through_model.objects.filter(**owner_filter).values_list(
+                f'{owner_field}_id', 'zone_id'
+        ):
+            if zone_id in zone_order:
+                result.setdefault(owner_id, []).append(zone_id)
+        return {
+            owner_id: tuple(sorted(zone_ids, key=lambda zone_id: zone_order[zone_id]))
+            for owner_id, zone_ids in result.items()
+        }
+
+    def __init__(self, workflow: Workflow):
+        self.key = self.get_key(workflow)
+        self.graph = WorkflowPlanGraph(workflow.id)
+
+        # zone + properties
+        self.zones = {}
+        zone_order = {}
+        for idx, zone_obj in enumerate(
+                Zone.objects.filter(workflow_id=workflow.id).prefetch_related('properties')
+        ):
+            self.zones[zone_obj.id] = self.parse_zone(zone_obj)
+            # order null xếp cuối (giống PostgreSQL)
+            zone_order[zone_obj.id] = (zone_obj.order is None, zone_obj.order or 0, idx)
+
+        # zone của node initial: {node_id: (zone_ids, zone_hidden_ids)}
+        node_filter = {'node__workflow_id': workflow.id}
+        zones_initial = self.map_zone_ids(zone_order, InitialNodeZone, 'node', node_filter)
+        zones_hidden_initial = self.map_zone_ids(zone_order, InitialNodeZoneHidden, 'node', node_filter)
+        self.zones_initial = {
+            node_id: (zones_initial.get(node_id, ()), zones_hidden_initial.get(node_id, ()))
+            for node_id in set(zones_initial) | set(zones_hidden_initial)
+        }
+
+        self.collab_in_form = self.load_collab_form(
+            zone_order, workflow.id, CollaborationInForm, CollaborationInFormZone, CollaborationInFormZoneHidden
+        )
+        self.collab_out_form = self.load_collab_form(
+            zone_order, workflow.id, CollaborationOutForm, CollaborationOutFormZone, CollaborationOutFormZoneHidden
+        )
+        self.collab_in_wf = self.load_collab_in_wf(zone_order, workflow.id)
+
+    @classmethod
+    def load_collab_form(cls, zone_order, workflow_id, collab_model, zone_model, zone_hidden_model) -> dict:
+        """ Collaborator in form / out form: {node_id: CollabFormPlan} """
+        collab_filter = {'collab__node__workflow_id': workflow_id}
+        zones = cls.map_zone_ids(zone_order, zone_model, 'collab', collab_filter)
+        zones_hidden = cls.map_zone_ids(zone_order, zone_hidden_model, 'collab', collab_filter)
+        queryset = collab_model.objects.filter(node__workflow_id=workflow_id)
+        is_in_form = collab_model is CollaborationInForm
+        if is_in_form:
+            queryset = queryset.select_related('app_property')
+        return {
+            collab.node_id: CollabFormPlan(
+                app_property_code=collab.app_property.code if is_in_form and collab.app_property else None,
+                zone=zones.get(collab.id, ()),
+                zone_hidden=zones_hidden.get(collab.id, ()),
+                is_edit_all_zone=collab.is_edit_all_zone,
+            ) for collab in queryset
+        }
+
+    @classmethod
+    def load_collab_in_wf(cls, zone_order, workflow_id) -> dict:
+        """ Collaborator in workflow: {node_id: (CollabInWorkflowPlan, ...)} """
+        collab_filter = {'collab__node__workflow_id': workflow_id}
+        zones = cls.map_zone_ids(zone_order, CollabInWorkflowZone, 'collab', collab_filter)
+        zones_hidden = cls.map_zone_ids(zone_order, CollabInWorkflowZoneHidden, 'collab', collab_filter)
+        collab_in_wf = {}
+        for collab in CollabInWorkflow.objects.filter(node__workflow_id=workflow_id):
+            collab_in_wf.setdefault(collab.node_id, []).append(
+                CollabInWorkflowPlan(
+                    in_wf_option=collab.in_wf_option,
+                    position_choice=collab.position_choice,
+                    employee_id=collab.employee_id,
+                    zone=zones.get(collab.id, ()),
+                    zone_hidden=zones_hidden.get(collab.id, ()),
+                    is_edit_all_zone=collab.is_edit_all_zone,
+                )
+            )
+        return {node_id: tuple(collabs) for node_id, collabs in collab_in_wf.items()}
+
+    # NODE / ASSOCIATION OBJECT
+    def get_node(self, node_id) -> Union[Node, None]:
+        return self.graph.get_node(node_id)
+
+    def get_system_node(self, code_node_system) -> Union[Node, None]:
+        return self.graph.get_system_node(code_node_system)
+
+    def get_association(self, association_id) -> Union[Association, None]:
+        return self.graph.get_association(association_id)
+
+    def check_association(self, association_id, node_id, doc_obj=None, params: dict = None) -> bool:
+        return self.graph.check_association(association_id, node_id, doc_obj=doc_obj, params=params)
+
+    def get_next_list(self, node_id, doc_obj=None, params: dict = None) -> list:
+        return self.graph.get_next_list(node_id, doc_obj=doc_obj, params=params)
+
+    def get_next(self, node_id, doc_obj=None, params: dict = None) -> Union[Association, None]:
+        association_passed = self.get_next_list(node_id, doc_obj=doc_obj, params=params)
+        match len(association_passed):
+            case 0:
+                return None
+            case 1:
+                return self.get_association(association_passed[0])
+        raise ValueError('Association passed large more than 1.')
+
+    # ZONE / COLLABORATOR
+    def get_zones(self, zone_ids) -> list[dict]:
+        return [copy.deepcopy(self.zones[zone_id]) for zone_id in zone_ids]
+
+    def get_zones_initial(self, node_id) -> (list[dict], list[dict]):
+        zone_ids, zone_hidden_ids = self.zones_initial.get(find_key(self.graph.nodes, node_id), ((), ()))
+        return self.get_zones(zone_ids), self.get_zones(zone_hidden_ids)
+
+    def get_collab_in_form(self, node_id) -> Union[CollabFormPlan, None]:
+        return self.collab_in_form.get(find_key(self.graph.nodes, node_id), None)
+
+    def get_collab_out_form(self, node_id) -> Union[CollabFormPlan, None]:
+        return self.collab_out_form.get(find_key(self.graph.nodes, node_id), None)
+
+    def get_collab_in_wf(self, node_id) -> tuple:
+        return self.collab_in_wf.get(find_key(self.graph.nodes, node_id), ())
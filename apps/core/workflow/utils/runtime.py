@@ -8,11 +8,12 @@ from django.utils import timezone
 
 from apps.core.log.tasks import (force_log_activity, )
 from apps.core.workflow.utils.document_handle import DocHandler
+from apps.core.workflow.utils.plan import WorkflowPlan
+from apps.core.workflow.utils.runtime_collab import RuntimeCollabHandler
 from apps.core.workflow.utils.runtime_sub import WFSupportFunctionsHandler, HookEventHandler, WFConfigSupport
 from apps.shared import (FORMATTING, DisperseModel, MAP_FIELD_TITLE, call_task_background, WorkflowMsgNotify, )
 from apps.core.workflow.models import (
-    WorkflowConfigOfApp, Workflow, Node, Association, CollaborationInForm, CollaborationOutForm, CollabInWorkflow,
-    Zone, Runtime, RuntimeStage, RuntimeAssignee, RuntimeLog,
+    WorkflowConfigOfApp, Workflow, Node, Association, Runtime, RuntimeStage, RuntimeAssignee, RuntimeLog,
 )
 
 logger = logging.getLogger(__name__)
@@ -266,28 +267,39 @@ class RuntimeHandler:
             return True
         return False
 
+    @classmethod
+    def get_stage_current_node(cls, runtime_obj) -> Union[Node, None]:
+        # node của stage hiện tại lấy từ plan của workflow (không query Node)
+        if runtime_obj.stage_currents and runtime_obj.stage_currents.node_id:
+            if runtime_obj.flow_id:
+                node_obj = WorkflowPlan.get(runtime_obj.flow).get_node(runtime_obj.stage_currents.node_id)
+                if node_obj:
+                    return node_obj
+            return runtime_obj.stage_currents.node
+        return None
+
     @classmethod
     def check_exit_condition(cls, runtime_obj, rt_assignee, action_code):
-        if runtime_obj.stage_currents:
-            if runtime_obj.stage_currents.node:
-                if RuntimeHandler.check_exit_base(runtime_obj=runtime_obj) is True:
-                    return True
-                return RuntimeHandler.check_exit_common(
-                    runtime_obj=runtime_obj, rt_assignee=rt_assignee, action_code=action_code
-                )
+        node_obj = cls.get_stage_current_node(runtime_obj=runtime_obj)
+        if node_obj:
+            if RuntimeHandler.check_exit_base(node_obj=node_obj) is True:
+                return True
+            return RuntimeHandler.check_exit_common(
+                node_obj=node_obj, rt_assignee=rt_assignee, action_code=action_code
+            )
         return False
 
     @classmethod
-    def check_exit_base(cls, runtime_obj):
-        if runtime_obj.stage_currents.node.option_collaborator != 2:
+    def check_exit_base(cls, node_obj):
+        if node_obj.option_collaborator != 2:
             return True
-        if len(runtime_obj.stage_currents.node.condition) <= 0:
+        if len(node_obj.condition) <= 0:
             return True
         return False
 
     @classmethod
-    def check_exit_common(cls, runtime_obj, rt_assignee, action_code):
-        for condition in runtime_obj.stage_currents.node.condition:
+    def check_exit_common(cls, node_obj, rt_assignee, action_code):
+        for condition in node_obj.condition:
             if all(key in condition for key in ('action', 'min_collab')):
                 if condition['action'] == action_code:
                     if action_code == 1:  # action approved
@@ -398,105 +410,116 @@ class RuntimeStageHandler:
         self.runtime_obj.save(update_fields=['task_bg_state'] + field_saved)
         return True
 
-    @classmethod
-    def __get_zone_and_properties(cls, zone_objs: list[Zone]) -> list[dict]:
-        result = []
-        for obj in zone_objs:
-            properties = []
-            properties_detail = []
-            for detail in obj.properties.all():
-                properties.append(str(detail.id))
-                properties_detail.append(
-                    {
-                        'id': str(detail.id),
-                        'code': str(detail.code),
-                        'type': str(detail.type),
-                        'content_type': str(detail.content_type),
-                        'properties': str(detail.properties),
-                        'compare_operator': str(detail.compare_operator),
-                        'remark': str(detail.remark),
-                    }
-                )
-            result.append(
-                {
-                    "id": str(obj.id),
-                    "title": obj.title,
-                    "remark": obj.remark,
-                    "properties": properties,
-                    "properties_detail": properties_detail,
-                }
-            )
-        return result
+    @property
+    def plan(self) -> WorkflowPlan:
+        return WorkflowPlan.get(self.runtime_obj.flow)
 
-    @classmethod
-    def parse_in_wf_collab(cls, node, doc_employee_inherit):
-        collab_in_wf = {}
-        for collab in CollabInWorkflow.objects.filter(node=node):
-            zone_and_properties = cls.__get_zone_and_properties(collab.zone.all())
-            zone_hidden_and_properties = cls.__get_zone_and_properties(collab.zone_hidden.all())
-            assignee_id = WFSupportFunctionsHandler.get_assignee_node_in_wf(
-                collab=collab, doc_employee_inherit=doc_employee_inherit
-            )
-            collab_in_wf[str(assignee_id)] = {
-                'zone_edit': zone_and_properties,
-                'zone_hidden': zone_hidden_and_properties,
-                'is_edit_all_zone': collab.is_edit_all_zone,
-            }
-        return collab_in_wf
+    # stage có từ ASSIGNEE_BULK_MIN assignee trở lên => ghi theo lô, ít hơn => tạo từng dòng (chạy signal như cũ)
+    ASSIGNEE_BULK_MIN = 2
 
     @classmethod
-    def __parse_collaboration(
-            cls, node: Node, doc_params: dict = dict, employee_creator_id: Union[UUID, str, any] = None,
-            doc_employee_inherit=None, runtime_obj=None
-    ) -> dict:
-        # OPTION_COLLABORATOR = (
-        #     (0, WorkflowMsg.COLLABORATOR_IN),
-        #     (1, WorkflowMsg.COLLABORATOR_OUT),
-        #     (2, WorkflowMsg.COLLABORATOR_WF),
-        # )
-        state_system, code_system = WFConfigSupport.check_stage_is_system(node)
-        if state_system and code_system == WFConfigSupport.code_node_initial and employee_creator_id:
-            return {
-                str(employee_creator_id): {
-                    'zone_edit': cls.__get_zone_and_properties(node.zones_initial_node.all()),
-                    'zone_hidden': cls.__get_zone_and_properties(node.zones_hidden_initial_node.all()),
-                    'is_edit_all_zone': node.is_edit_all_zone,
-                }
-            }
-        try:
-            collab_opt = node.option_collaborator
-            match collab_opt:
-                case 0:
-                    in_form_obj = CollaborationInForm.objects.get(node=node)
-                    app_properties = in_form_obj.app_property
-                    if not app_properties:
-                        raise ValueError('Application Properties must be required with collab in form')
-                    employee_id = doc_params.get(app_properties.code, None)
-                    if not employee_id:
-                        raise ValueError('Get employee from IN FORM return None')
-                    return {
-                        str(employee_id): {
-                            'zone_edit': cls.__get_zone_and_properties(in_form_obj.zone.all()),
-                            'zone_hidden': cls.__get_zone_and_properties(in_form_obj.zone_hidden.all()),
-                            'is_edit_all_zone': in_form_obj.is_edit_all_zone,
-                        }
-                    }
-                case 1:
-                    out_form_obj = CollaborationOutForm.objects.get(node=node)
-                    if runtime_obj:
-                        next_node_collab_id = DocHandler.get_next_node_collab_id(runtime_obj=runtime_obj)
-                        return {str(next_node_collab_id): {
-                            'zone_edit': cls.__get_zone_and_properties(out_form_obj.zone.all()),
-                            'zone_hidden': cls.__get_zone_and_properties(out_form_obj.zone_hidden.all()),
-                            'is_edit_all_zone': out_form_obj.is_edit_all_zone,
-                        }} if next_node_collab_id else {}
-                case 2:
-                    return cls.parse_in_wf_collab(node=node, doc_employee_inherit=doc_employee_inherit)
-        except CollaborationInForm.DoesNotExist:
-            pass
-        except CollaborationOutForm.DoesNotExist:
-            pass
-        return {}
+    def _update_stage_assignee(cls, stage_obj: RuntimeStage, assignee_and_zone: dict, update_fields=()):
+        # update assignee and zone to Stage
+        stage_obj.assignee_and_zone_data = {
+            emp_id: zone_and_properties.get('zone_edit', [])
+            for emp_id, zone_and_properties in assignee_and_zone.items()
+        }
+        stage_obj.assignee_and_zone_hidden_data = {
+            emp_id: zone_and_properties.get('zone_hidden', [])
+            for emp_id, zone_and_properties in assignee_and_zone.items()
+        }
+        stage_obj.save(update_fields=['assignee_and_zone_data', 'assignee_and_zone_hidden_data', *update_fields])
+        return stage_obj
+
+    def _create_assignee_per_row(
+            self, stage_obj: RuntimeStage, assignee_and_zone: dict, is_return: bool, remark: str
+    ) -> list[RuntimeAssignee]:
+        log_objs = []
+        objs_created = []
+        for emp_id, zone_and_properties in assignee_and_zone.items():
+            objs_created.append(RuntimeAssignee.objects.create(
+                stage=stage_obj,
+                employee_id=emp_id,
+                zone_and_properties=zone_and_properties.get('zone_edit', []),
+                zone_hidden_and_properties=zone_and_properties.get('zone_hidden', []),
+                is_edit_all_zone=zone_and_properties.get('is_edit_all_zone', False),
+            ))
+            # create instance log
+            log_obj_tmp = RuntimeLogHandler(
+                stage_obj=stage_obj,
+                actor_id=emp_id,
+                is_system=True,
+            ).log_new_assignee(perform_created=False, is_return=is_return, remark=remark)
+            # update some field need call save() (call bulk don't hit save())
+            log_obj_tmp.before_save(force_insert=True)
+            # add to list for call bulk create
+            log_objs.append(log_obj_tmp)
+            # send mail
+            DocHandler.send_mail(emp_id=emp_id, runtime_obj=self.runtime_obj, workflow_type=0)
+        # active hook push notify
+        HookEventHandler(runtime_obj=self.runtime_obj, is_return=is_return).push_base_notify(
+            runtime_assignee_obj=objs_created,
+        )
+        self._update_stage_assignee(stage_obj=stage_obj, assignee_and_zone=assignee_and_zone)
+        # create log
+        RuntimeLogHandler.perform_create(log_objs)
+        return objs_created
+
+    def _create_assignee_bulk(
+            self, stage_obj: RuntimeStage, assignee_and_zone: dict, is_return: bool, remark: str
+    ) -> list[RuntimeAssignee]:
+        """
+        Cùng kết quả với _create_assignee_per_row nhưng số query không tăng theo số assignee:
+            - nhân viên load 1 lần (employee_data của assignee, actor_data của log)
+            - assignee, log: bulk_create; log_count của stage cộng 1 lần
+            - viewer + quyền view/edit: Runtime.append_viewers (bulk_create không chạy signal của từng dòng)
+            - notify: 1 task cho cả stage; mail: nhân viên + cấu hình mail load 1 lần
+        """
+        employee_objs = {
+            str(obj.id): obj for obj in DisperseModel(app_model='hr.employee').get_model().objects.filter(
+                id__in=list(assignee_and_zone.keys())
+            )
+        }
+        employee_not_found = [str(emp_id) for emp_id in assignee_and_zone.keys() if str(emp_id) not in employee_objs]
+        if employee_not_found:
+            raise ValueError('Employee of assignee does not exist: ' + ', '.join(employee_not_found))
+
+        objs = []
+        log_objs = []
+        for emp_id, zone_and_properties in assignee_and_zone.items():
+            employee_obj = employee_objs[str(emp_id)]
+            objs.append(
+                RuntimeAssignee(
+                    tenant_id=stage_obj.tenant_id,
+                    company_id=stage_obj.company_id,
+                    stage=stage_obj,
+                    employee=employee_obj,
+                    zone_and_properties=zone_and_properties.get('zone_edit', []),
+                    zone_hidden_and_properties=zone_and_properties.get('zone_hidden', []),
+                    is_edit_all_zone=zone_and_properties.get('is_edit_all_zone', False),
+                    employee_data=employee_obj.get_detail_minimal(),
+                )
+            )
+            log_obj_tmp = RuntimeLogHandler(
+                stage_obj=stage_obj,
+                actor_obj=employee_obj,
+                is_system=True,
+            ).log_new_assignee(perform_created=False, is_return=is_return, remark=remark)
+            log_obj_tmp.before_save(force_insert=True, update_log_count=False)
+            log_objs.append(log_obj_tmp)
+
+        objs_created = RuntimeAssignee.objects.bulk_create(objs)
+        stage_obj.runtime.append_viewers(employee_ids=list(employee_objs.keys()))
+        DocHandler.send_mail_many(emp_ids=list(assignee_and_zone.keys()), runtime_obj=self.runtime_obj, workflow_type=0)
+        HookEventHandler(runtime_obj=self.runtime_obj, is_return=is_return).push_base_notify(
+            runtime_assignee_obj=objs_created,
+        )
+        stage_obj.log_count += len(log_objs)
+        self._update_stage_assignee(
+            stage_obj=stage_obj, assignee_and_zone=assignee_and_zone, update_fields=['log_count'],
+        )
+        RuntimeLogHandler.perform_create(log_objs)
+        return objs_created
 
     def _create_assignee_and_zone(
             self, stage_obj: RuntimeStage, is_return: bool, **kwargs
@@ -504,66 +527,22 @@ class RuntimeStageHandler:
         if stage_obj.node:
             try:
                 # get assignee and zone
-                assignee_and_zone = self.__parse_collaboration(
+                assignee_and_zone = RuntimeCollabHandler.parse_collaboration(
                     node=stage_obj.node,
+                    plan=self.plan,
                     doc_params=self.runtime_obj.doc_params,
                     employee_creator_id=self.runtime_obj.doc_employee_created_id if is_return else None,
                     doc_employee_inherit=self.runtime_obj.doc_employee_inherit,
                     runtime_obj=self.runtime_obj,
                 )
-                # convert assignee and zone to simple data
-                employee_ids_zones = {}
-                employee_ids_zones_hidden = {}
-                objs = []
-                log_objs = []
-                objs_created = []
-                for emp_id, zone_and_properties in assignee_and_zone.items():
-                    obj_assignee = RuntimeAssignee(
-                        stage=stage_obj,
-                        employee_id=emp_id,
-                        zone_and_properties=zone_and_properties.get('zone_edit', []),
-                        zone_hidden_and_properties=zone_and_properties.get('zone_hidden', []),
-                        is_edit_all_zone=zone_and_properties.get('is_edit_all_zone', False),
-                    )
-                    obj_assignee.before_save(force_insert=True)
-                    objs.append(obj_assignee)
-
-                    objs_created.append(RuntimeAssignee.objects.create(
-                        stage=stage_obj,
-                        employee_id=emp_id,
-                        zone_and_properties=zone_and_properties.get('zone_edit', []),
-                        zone_hidden_and_properties=zone_and_properties.get('zone_hidden', []),
-                        is_edit_all_zone=zone_and_properties.get('is_edit_all_zone', False),
-                    ))
-                    # create instance log
-                    log_obj_tmp = RuntimeLogHandler(
-                        stage_obj=stage_obj,
-                        actor_id=emp_id,
-                        is_system=True,
-                    ).log_new_assignee(
-                        perform_created=False,
-                        is_return=is_return,
-                        remark=kwargs.pop('remark', '')
-                    )
-                    # update some field need call save() (call bulk don't hit save())
-                    log_obj_tmp.before_save(force_insert=True)
-                    # add to list for call bulk create
-                    log_objs.append(log_obj_tmp)
-                    # push employee to stages.assignees
-                    employee_ids_zones.update({emp_id: zone_and_properties.get('zone_edit', [])})
-                    employee_ids_zones_hidden.update({emp_id: zone_and_properties.get('zone_hidden', [])})
-                    # send mail
-                    DocHandler.send_mail(emp_id=emp_id, runtime_obj=self.runtime_obj, workflow_type=0)
-                # active hook push notify
-                HookEventHandler(runtime_obj=self.runtime_obj, is_return=is_return).push_base_notify(
-                    runtime_assignee_obj=objs_created,
+                create_func = self._create_assignee_bulk if len(assignee_and_zone) >= self.ASSIGNEE_BULK_MIN \
+                    else self._create_assignee_per_row
+                objs_created = create_func(
+                    stage_obj=stage_obj,
+                    assignee_and_zone=assignee_and_zone,
+                    is_return=is_return,
+                    remark=kwargs.get('remark', ''),
                 )
-                # update assignee and zone to Stage
-                stage_obj.assignee_and_zone_data = employee_ids_zones
-                stage_obj.assignee_and_zone_hidden_data = employee_ids_zones_hidden
-                stage_obj.save(update_fields=['assignee_and_zone_data', 'assignee_and_zone_hidden_data'])
-                # create log
-                RuntimeLogHandler.perform_create(log_objs)
                 return True, objs_created
             except Exception as err:
                 # reject document if workflow error
@@ -572,11 +551,26 @@ class RuntimeStageHandler:
                 return False, []
         return True, []
 
+    def get_next_association(self, stage_obj: RuntimeStage) -> Union[Association, None]:
+        """
+        Association chứng từ đã chọn (next_association_id) lấy từ plan, kiểm tra lại bằng cây condition của plan:
+        phải là nhánh ra của node hiện tại và thỏa condition với giá trị chứng từ
+        """
+        doc_obj = DocHandler(self.runtime_obj.doc_id, self.runtime_obj.app_code).get_obj(
+            default_filter={'tenant_id': self.runtime_obj.tenant_id, 'company_id': self.runtime_obj.company_id}
+        )
+        association_id = getattr(doc_obj, 'next_association_id', None)
+        if not association_id:
+            return None
+        if not self.plan.check_association(
+                association_id, stage_obj.node_id, doc_obj=doc_obj, params=self.runtime_obj.doc_params
+        ):
+            raise ValueError('Next association is not an outgoing branch of this node or its condition is not met.')
+        return self.plan.get_association(association_id)
+
     def run_next(self, workflow: Workflow, stage_obj_currently: RuntimeStage) -> Union[RuntimeStage, None]:
-        # config_cls = WFConfigSupport(workflow=workflow)
-        # association_passed = config_cls.get_next(stage_obj_currently.node, self.runtime_obj.doc_params)
-        association_passed = DocHandler.get_next_association(runtime_obj=self.runtime_obj)
-        if association_passed and isinstance(association_passed, Association):
+        association_passed = self.get_next_association(stage_obj_currently)
+        if association_passed:
             is_next_stage, next_stage = self.create_stage(
                 node_passed=association_passed.node_out,
                 association_passed=association_passed,
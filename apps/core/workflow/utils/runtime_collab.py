@@ -0,0 +1,90 @@
+from typing import Union
+from uuid import UUID
+
+from apps.core.workflow.models import Node
+from apps.core.workflow.utils.document_handle import DocHandler
+from apps.core.workflow.utils.plan import WorkflowPlan
+from apps.core.workflow.utils.runtime_sub import WFConfigSupport, WFSupportFunctionsHandler
+
+__all__ = [
+    'RuntimeCollabHandler',
+]
+
+
+class RuntimeCollabHandler:
+    """
+    Người xử lý + zone của 1 node, đọc cấu hình từ plan của workflow:
+        {employee_id: {'zone_edit': [...], 'zone_hidden': [...], 'is_edit_all_zone': bool}}
+    """
+
+    @classmethod
+    def get_collab_data(cls, plan: WorkflowPlan, collab_obj) -> dict:
+        return {
+            'zone_edit': plan.get_zones(collab_obj.zone),
+            'zone_hidden': plan.get_zones(collab_obj.zone_hidden),
+            'is_edit_all_zone': collab_obj.is_edit_all_zone,
+        }
+
+    @classmethod
+    def parse_initial(cls, node: Node, plan: WorkflowPlan, employee_creator_id) -> dict:
+        zones_initial, zones_hidden_initial = plan.get_zones_initial(node.id)
+        return {
+            str(employee_creator_id): {
+                'zone_edit': zones_initial,
+                'zone_hidden': zones_hidden_initial,
+                'is_edit_all_zone': node.is_edit_all_zone,
+            }
+        }
+
+    @classmethod
+    def parse_in_form(cls, node: Node, plan: WorkflowPlan, doc_params: dict) -> dict:
+        in_form_obj = plan.get_collab_in_form(node.id)
+        if not in_form_obj:
+            return {}
+        if not in_form_obj.app_property_code:
+            raise ValueError('Application Properties must be required with collab in form')
+        employee_id = doc_params.get(in_form_obj.app_property_code, None)
+        if not employee_id:
+            raise ValueError('Get employee from IN FORM return None')
+        return {str(employee_id): cls.get_collab_data(plan, in_form_obj)}
+
+    @classmethod
+    def parse_out_form(cls, node: Node, plan: WorkflowPlan, runtime_obj) -> dict:
+        out_form_obj = plan.get_collab_out_form(node.id)
+        if out_form_obj and runtime_obj:
+            next_node_collab_id = DocHandler.get_next_node_collab_id(runtime_obj=runtime_obj)
+            if next_node_collab_id:
+                return {str(next_node_collab_id): cls.get_collab_data(plan, out_form_obj)}
+        return {}
+
+    @classmethod
+    def parse_in_wf_collab(cls, node: Node, plan: WorkflowPlan, doc_employee_inherit) -> dict:
+        collab_in_wf = {}
+        for collab in plan.get_collab_in_wf(node.id):
+            assignee_id = WFSupportFunctionsHandler.get_assignee_node_in_wf(
+                collab=collab, doc_employee_inherit=doc_employee_inherit
+            )
+            collab_in_wf[str(assignee_id)] = cls.get_collab_data(plan, collab)
+        return collab_in_wf
+
+    @classmethod
+    def parse_collaboration(
+            cls, node: Node, plan: WorkflowPlan, doc_params: dict = dict,
+            employee_creator_id: Union[UUID, str, any] = None, doc_employee_inherit=None, runtime_obj=None
+    ) -> dict:
+        # OPTION_COLLABORATOR = (
+        #     (0, WorkflowMsg.COLLABORATOR_IN),
+        #     (1, WorkflowMsg.COLLABORATOR_OUT),
+        #     (2, WorkflowMsg.COLLABORATOR_WF),
+        # )
+        state_system, code_system = WFConfigSupport.check_stage_is_system(node)
+        if state_system and code_system == WFConfigSupport.code_node_initial and employee_creator_id:
+            return cls.parse_initial(node=node, plan=plan, employee_creator_id=employee_creator_id)
+        match node.option_collaborator:
+            case 0:
+                return cls.parse_in_form(node=node, plan=plan, doc_params=doc_params)
+            case 1:
+                return cls.parse_out_form(node=node, plan=plan, runtime_obj=runtime_obj)
+            case 2:
+                return cls.parse_in_wf_collab(node=node, plan=plan, doc_employee_inherit=doc_employee_inherit)
+        return {}
@@ -10,6 +10,7 @@ from apps.shared import (
     WorkflowMsgNotify, DisperseModel
 )
 from apps.core.workflow.models import (Workflow, Node, Association, Runtime, RuntimeAssignee, RuntimeLog)
+from apps.core.workflow.utils.plan import ConditionEvaluator, WorkflowPlan
 
 
 class WFConfigSupport:
@@ -19,14 +20,18 @@ class WFConfigSupport:
 
     @classmethod
     def compare_condition(cls, condition: list, params: dict) -> bool:
-        print('cond: ', condition)
-        print('params: ', params)
-        return True
+        try:
+            tree = ConditionEvaluator.parse(condition)
+        except ValueError:
+            return False
+        values = ConditionEvaluator.get_values(ConditionEvaluator.get_fields(tree), params=params)
+        return ConditionEvaluator.evaluate(tree, values)
 
     def __init__(self, workflow: Workflow):
         if not isinstance(workflow, Workflow):
             raise AttributeError('[WFConfigSupport] Workflow must be required')
         self.flow = workflow
+        self.plan = WorkflowPlan.get(workflow)
 
     @classmethod
     def check_stage_is_system(cls, node_obj: Node):
@@ -40,39 +45,16 @@ class WFConfigSupport:
         return False, None
 
     def get_initial_node(self) -> Union[Node, None]:
-        try:
-            return Node.objects.get(workflow=self.flow, is_system=True, code_node_system=self.code_node_initial)
-        except Node.DoesNotExist:
-            pass
-        return None
+        return self.plan.get_system_node(self.code_node_initial)
 
     def get_approved_node(self) -> Union[Node, None]:
-        try:
-            return Node.objects.get(workflow=self.flow, is_system=True, code_node_system=self.code_node_approval)
-        except Node.DoesNotExist:
-            pass
-        return None
+        return self.plan.get_system_node(self.code_node_approval)
 
     def get_completed_node(self) -> Union[Node, None]:
-        try:
-            return Node.objects.get(workflow=self.flow, is_system=True, code_node_system=self.code_node_complete)
-        except Node.DoesNotExist:
-            pass
-        return None
+        return self.plan.get_system_node(self.code_node_complete)
 
-    def get_next(self, node_input: Node, params: dict) -> Union[Association, None]:
-        association_passed = [
-            obj for obj in Association.objects.filter(workflow_id=self.flow, node_in=node_input) if
-            self.compare_condition(obj.condition, params) is True
-        ]
-        match len(association_passed):
-            case 0:
-                return None
-            case 1:
-                return association_passed[0]
-            case _x if _x > 1:
-                raise ValueError('Association passed large more than 1.')
-        return None
+    def get_next(self, node_input: Node, params: dict, doc_obj=None) -> Union[Association, None]:
+        return self.plan.get_next(node_input, doc_obj=doc_obj, params=params)
 
 
 class HookEventHandler:
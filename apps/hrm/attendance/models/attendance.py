@@ -1,6 +1,7 @@
+from crum import get_current_user
 from django.db import models
 
-from apps.hrm.attendance.utils.logical_attendance import AttendanceHandler
+from apps.hrm.attendance.utils.attendance_engine import AttendanceBatchEngine
 from apps.shared import MasterDataAbstractModel, ATTENDANCE_STATUS, DisperseModel
 
 
@@ -58,26 +59,30 @@ class Attendance(MasterDataAbstractModel):
 
     @classmethod
     def push_attendance_data(cls, date):
+        return cls.push_attendance_data_range(dates=[date])
+
+    @classmethod
+    def push_attendance_data_range(cls, dates, tenant_id=None, company_id=None, push_log=True, workers=None):
+        """
+        Tính chấm công của tất cả nhân viên trong công ty cho nhiều ngày (AttendanceBatchEngine)
+        * param 'tenant_id', 'company_id': mặc định lấy theo user hiện tại
+        * param 'push_log': lấy access log từ máy chấm công trước khi tính
+        * param 'workers': số process tính ca song song
+        """
+        if not tenant_id or not company_id:
+            user_obj = get_current_user()
+            tenant_id = tenant_id or getattr(user_obj, 'tenant_current_id', None)
+            company_id = company_id or getattr(user_obj, 'company_current_id', None)
         m_log = DisperseModel(app_model='attendance.AccessLog').get_model()
-        m_employee = DisperseModel(app_model='hr.Employee').get_model()
         attendance_objs = []
-        if m_employee and m_log and hasattr(m_employee, 'objects') and hasattr(m_log, 'push_access_log'):
-            m_log.push_access_log(date=date)
-            for employee_id in m_employee.objects.filter_on_company().values_list('id', flat=True):
-                data_parse = AttendanceHandler.check_attendance(
-                    employee_id=employee_id,
-                    date=date,
-                )
-
-                # delete old records
-                cls.objects.filter(employee_id=employee_id, date=date).delete()
-
-                # create new records
-                created_objs = cls.objects.bulk_create([cls(**data) for data in data_parse])
-                if created_objs:
-                    attendance_objs = created_objs
+        if tenant_id and company_id and m_log and hasattr(m_log, 'push_access_log'):
+            if push_log:
+                for date in dates:
+                    m_log.push_access_log(date=date)
+            attendance_objs = AttendanceBatchEngine(
+                tenant_id=tenant_id, company_id=company_id, dates=dates
+            ).run(workers=workers)
             print('push_attendance_data done.')
-            return attendance_objs
         return attendance_objs
 
     class Meta:
@@ -85,11 +85,8 @@ class AttendanceCreateSerializer(serializers.ModelSerializer):
         month = validate_data.pop('month')
         year = validate_data.pop('year')
         dates = get_all_days_in_month(year=year, month=month)
-        objs_created = []
-        for date_check in dates:
-            objs_create = Attendance.push_attendance_data(date=date_check)
-            if not objs_created:
-                objs_created = objs_create
+        # tính cả tháng 1 lần (load dữ liệu 1 lần cho tất cả nhân viên/ngày)
+        objs_created = Attendance.push_attendance_data_range(dates=dates)
         if not objs_created:
             raise serializers.ValidationError({'detail': "Get attendance data fail"})
         validate_data.update({'instance': objs_created[0]})
@@ -1,3 +1,99 @@
+import datetime
+from types import SimpleNamespace
+
+from crum import impersonate
 from django.test import TestCase
 
-# Create your tests here.
+from apps.core.company.models import Company, CompanyConfig
+from apps.core.hr.models import Employee
+from apps.core.tenant.models import Tenant
+from apps.eoffice.leave.models import LeaveRequest, LeaveRequestDateListRegister
+from apps.hrm.attendance.models import AccessLog, DeviceIntegrateEmployee, ShiftAssignment, ShiftInfo
+from apps.hrm.attendance.models.attendance import Attendance
+from apps.hrm.attendance.utils.attendance_engine import AttendanceBatchEngine
+from apps.hrm.attendance.utils.logical_attendance import AttendanceHandler
+from apps.shared.extends.tests import bulk_new
+
+DATES = ['2025-06-02', '2025-06-03']
+
+
+class AttendanceBatchEngineTestCase(TestCase):
+    """
+    E1: có máy chấm công, phân ca 2 ngày, ngày 2 nghỉ phép
+    E2: có máy chấm công, phân ca ngày 1 (chỉ check-in), ngày 2 không có ca
+    E3: không tích hợp máy chấm công
+    """
+
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_ATT')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_ATT', tenant=self.tenant)
+        common = {'tenant': self.tenant, 'company': self.company}
+        self.shift = bulk_new(
+            ShiftInfo, title='Office', code='SHIFT', checkin_time=datetime.time(8), checkout_time=datetime.time(17),
+            checkin_gr_start=datetime.time(7), checkin_gr_end=datetime.time(8, 30),
+            checkout_gr_start=datetime.time(16, 30), checkout_gr_end=datetime.time(19), **common
+        )
+        bulk_new(CompanyConfig, company=self.company, shift=self.shift)
+        self.employees = [
+            bulk_new(Employee, first_name='Employee', last_name=str(idx), code=f'E{idx}', **common)
+            for idx in range(1, 4)
+        ]
+        e_1, e_2, _e_3 = self.employees
+        for employee_obj in (e_1, e_2):
+            bulk_new(DeviceIntegrateEmployee, employee=employee_obj, **common)
+        for employee_obj, date in ((e_1, DATES[0]), (e_1, DATES[1]), (e_2, DATES[0])):
+            bulk_new(ShiftAssignment, employee=employee_obj, shift=self.shift, date=date, **common)
+        for employee_obj, timestamp in (
+                (e_1, datetime.datetime(2025, 6, 2, 7, 55)), (e_1, datetime.datetime(2025, 6, 2, 8, 10)),
+                (e_1, datetime.datetime(2025, 6, 2, 17, 5)), (e_1, datetime.datetime(2025, 6, 3, 8)),
+                (e_1, datetime.datetime(2025, 6, 4, 8)), (e_2, datetime.datetime(2025, 6, 2, 8, 20)),
+        ):
+            bulk_new(AccessLog, employee=employee_obj, timestamp=timestamp, **common)
+        leave = bulk_new(LeaveRequest, title='Leave', code='LEAVE', system_status=3, **common)
+        bulk_new(
+            LeaveRequestDateListRegister, leave=leave, employee_inherit=e_1, subtotal=1,
+            date_from=datetime.date(2025, 6, 3), date_to=datetime.date(2025, 6, 3), **common
+        )
+
+    @classmethod
+    def parse_result(cls, data):
+        return (
+            str(data['employee_id']), str(data['date']), str(data.get('shift_id', None)),
+            data.get('checkin_time', None), data.get('checkout_time', None), data.get('attendance_status', None),
+            str(data.get('leave_id', None)),
+        )
+
+    def get_legacy_result(self):
+        """ cách cũ: check_attendance theo từng nhân viên, từng ngày """
+        user = SimpleNamespace(tenant_current_id=self.tenant.id, company_current_id=self.company.id)
+        result = []
+        with impersonate(user):
+            for employee_obj in self.employees:
+                for date in DATES:
+                    result.extend(AttendanceHandler.check_attendance(employee_id=employee_obj.id, date=date))
+        return sorted(self.parse_result(data) for data in result)
+
+    def get_engine_result(self):
+        attendance_objs = AttendanceBatchEngine(self.tenant.id, self.company.id, DATES).run()
+        return sorted(self.parse_result(obj.__dict__) for obj in attendance_objs)
+
+    def test_same_as_per_employee(self):
+        expected = self.get_legacy_result()
+        self.assertEqual(self.get_engine_result(), expected)
+        self.assertEqual(
+            sorted(((item[3], item[4], item[5]) for item in expected), key=str),
+            sorted([
+                (datetime.time(8, 10), datetime.time(17, 5), 1), (None, None, 2),
+                (datetime.time(8, 20), None, 0), (None, None, 4),
+            ], key=str),
+        )
+
+    def test_company_shift_same_as_per_employee(self):
+        # công ty dùng chung 1 ca => không dùng phân ca theo nhân viên
+        CompanyConfig.objects.filter(company=self.company).update(shift_mode=0)
+        self.assertEqual(self.get_engine_result(), self.get_legacy_result())
+
+    def test_rerun_replaces_rows(self):
+        engine_result = self.get_engine_result()
+        self.assertEqual(self.get_engine_result(), engine_result)
+        self.assertEqual(Attendance.objects.filter(company=self.company).count(), len(engine_result))
@@ -0,0 +1,185 @@
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from apps.hrm.attendance.utils.logical_attendance import AttendanceHandler
+from apps.shared import DisperseModel
+
+
+def parse_attendance_chunk(payload_list):
+    # chạy được trong process con: chỉ dùng dữ liệu đã load sẵn, không query DB
+    return AttendanceBatchEngine.parse_payload_list(payload_list)
+
+
+class AttendanceBatchData:
+    """ Dữ liệu đã load của AttendanceBatchEngine, gom theo nhân viên (và ngày) """
+
+    def __init__(self):
+        self.employees = []
+        self.integrate_ids = set()
+        self.logs_map = {}  # (employee_id, 'YYYY-MM-DD'): [AccessLog]
+        self.leaves_map = {}  # employee_id: [LeaveRequestDateListRegister]
+        self.businesses_map = {}  # employee_id: [BusinessRequest]
+        self.shift_assigns_map = {}  # (employee_id, 'YYYY-MM-DD'): [ShiftAssignment]
+        self.company_shift_assigns = None  # công ty dùng chung 1 ca
+
+    def get_shift_assigns(self, employee_id, date):
+        if self.company_shift_assigns is not None:
+            return self.company_shift_assigns
+        return self.shift_assigns_map.get((employee_id, date), [])
+
+
+class AttendanceBatchEngine:
+    """
+    Tính chấm công của toàn bộ nhân viên 1 công ty cho 1 hoặc nhiều ngày:
+        - access log, nghỉ phép, công tác, phân ca, tích hợp máy chấm công load 1 lần cho cả khoảng ngày
+          rồi gom theo nhân viên (thay vì query lại theo từng nhân viên/ngày)
+        - tính ca trong bộ nhớ bằng AttendanceHandler.parse_attendance (cùng logic với check_attendance),
+          có thể chia theo nhóm nhân viên cho nhiều process (workers)
+        - ghi kết quả theo nhóm CHUNK_SIZE nhân viên: 1 lệnh delete + 1 lệnh bulk_create
+    """
+    CHUNK_SIZE = 500
+
+    def __init__(self, tenant_id, company_id, dates):
+        self.tenant_id = tenant_id
+        self.company_id = company_id
+        # ngày dạng 'YYYY-MM-DD' (giống push_attendance_data)
+        self.dates = sorted({
+            item.isoformat() if isinstance(item, (datetime.date, datetime.datetime)) else str(item)
+            for item in dates
+        })
+        self.date_objs = {item: datetime.date.fromisoformat(item) for item in self.dates}
+        self.data = AttendanceBatchData()
+
+    def get_model(self, app_model):
+        return DisperseModel(app_model=app_model).get_model()
+
+    def filter_on_company(self, model, **kwargs):
+        # giống filter_on_company nhưng không phụ thuộc user hiện tại (chạy được trong task/command)
+        if hasattr(model, 'is_delete'):
+            kwargs.setdefault('is_delete', False)
+        return model.objects.filter(tenant_id=self.tenant_id, company_id=self.company_id, **kwargs)
+
+    def load(self):
+        if not self.dates:
+            return self
+        data = self.data
+        date_from, date_to = self.date_objs[self.dates[0]], self.date_objs[self.dates[-1]]
+        data.employees = list(
+            self.filter_on_company(self.get_model('hr.Employee')).only('id', 'tenant_id', 'company_id').order_by('id')
+        )
+        data.integrate_ids = set(
+            self.filter_on_company(
+                self.get_model('attendance.DeviceIntegrateEmployee'), employee__isnull=False
+            ).values_list('employee_id', flat=True)
+        )
+
+        # logs theo thứ tự mặc định (-timestamp) như khi check từng nhân viên
+        for log in self.filter_on_company(
+                self.get_model('attendance.AccessLog'), timestamp__date__in=self.dates
+        ).only('id', 'employee_id', 'timestamp').order_by('-timestamp'):
+            if log.timestamp:
+                data.logs_map.setdefault((log.employee_id, str(log.timestamp.date())), []).append(log)
+
+        for leave in self.filter_on_company(
+                self.get_model('leave.LeaveRequestDateListRegister'),
+                date_from__lte=date_to, date_to__gte=date_from, leave__system_status=3,
+        ).select_related('leave'):
+            data.leaves_map.setdefault(leave.employee_inherit_id, []).append(leave)
+
+        for item in self.get_model('businesstrip.BusinessRequestEmployeeOnTrip').objects.filter(
+                employee_on_trip_mapped__tenant_id=self.tenant_id,
+                employee_on_trip_mapped__company_id=self.company_id,
+                business_mapped__date_f__date__lte=date_to,
+                business_mapped__date_t__date__gte=date_from,
+                business_mapped__system_status=3,
+        ).select_related('business_mapped'):
+            data.businesses_map.setdefault(item.employee_on_trip_mapped_id, []).append(item.business_mapped)
+
+        company_config_obj = self.get_model('company.CompanyConfig').objects.filter(
+            company_id=self.company_id
+        ).select_related('shift').first()
+        if company_config_obj and company_config_obj.shift_mode == 0:
+            # công ty dùng chung 1 ca
+            data.company_shift_assigns = AttendanceHandler.get_company_shift_assigns(company_config_obj)
+        else:
+            for shift_assign in self.filter_on_company(
+                    self.get_model('attendance.ShiftAssignment'), date__in=self.dates
+            ).select_related('shift'):
+                data.shift_assigns_map.setdefault(
+                    (shift_assign.employee_id, str(shift_assign.date)), []
+                ).append(shift_assign)
+        return self
+
+    def get_payload(self, employee_obj):
+        """ Dữ liệu đã gom của 1 nhân viên cho tất cả các ngày """
+        days = []
+        leaves = self.data.leaves_map.get(employee_obj.id, [])
+        businesses = self.data.businesses_map.get(employee_obj.id, [])
+        for date in self.dates:
+            date_obj = self.date_objs[date]
+            days.append({
+                'date': date,
+                'logs_on_day': self.data.logs_map.get((employee_obj.id, date), []),
+                'leaves': [
+                    leave for leave in leaves
+                    if leave.date_from and leave.date_to and leave.date_from <= date_obj <= leave.date_to
+                ],
+                'businesses': [
+                    business for business in businesses
+                    if business.date_f.date() <= date_obj <= business.date_t.date()
+                ],
+                'shift_assigns': self.data.get_shift_assigns(employee_obj.id, date),
+            })
+        return {
+            'employee_obj': employee_obj,
+            'is_integrate': employee_obj.id in self.data.integrate_ids,
+            'days': days,
+        }
+
+    @classmethod
+    def parse_payload_list(cls, payload_list):
+        result = []
+        for payload in payload_list:
+            for day in payload['days']:
+                result.extend(AttendanceHandler.parse_attendance(
+                    date=day['date'],
+                    employee_obj=payload['employee_obj'],
+                    is_integrate=payload['is_integrate'],
+                    logs_on_day=day['logs_on_day'],
+                    leaves=day['leaves'],
+                    businesses=day['businesses'],
+                    shift_assigns=day['shift_assigns'],
+                ))
+        return result
+
+    def get_chunks(self):
+        employees = self.data.employees
+        for idx in range(0, len(employees), self.CHUNK_SIZE):
+            yield employees[idx:idx + self.CHUNK_SIZE]
+
+    def save_chunk(self, employee_list, data_parse):
+        model_attendance = self.get_model('attendance.Attendance')
+        model_attendance.objects.filter(
+            employee_id__in=[employee_obj.id for employee_obj in employee_list], date__in=self.dates
+        ).delete()
+        return model_attendance.objects.bulk_create([model_attendance(**data) for data in data_parse])
+
+    def run(self, workers=None):
+        """
+        * param 'workers': số process tính ca song song (None/1: tính trong process hiện tại)
+        Returns: danh sách Attendance đã tạo
+        """
+        self.load()
+        chunks = list(self.get_chunks())
+        payload_chunks = [[self.get_payload(employee_obj) for employee_obj in chunk] for chunk in chunks]
+        if workers and workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+                data_chunks = list(executor.map(parse_attendance_chunk, payload_chunks))
+        else:
+            data_chunks = [parse_attendance_chunk(payload_list) for payload_list in payload_chunks]
+
+        attendance_objs = []
+        for chunk, data_parse in zip(chunks, data_chunks):
+            attendance_objs.extend(self.save_chunk(chunk, data_parse))
+        return attendance_objs
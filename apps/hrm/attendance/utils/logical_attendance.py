@@ -33,7 +33,7 @@ class AttendanceHandler:
                 company_config_obj = employee_obj.company.company_config if employee_obj.company else None
                 if company_config_obj:
                     if company_config_obj.shift_mode == 0:
-                        shift_assigns = [company_config_obj.shift]
+                        shift_assigns = AttendanceHandler.get_company_shift_assigns(company_config_obj)
                 return AttendanceHandler.active_check(
                     date=date,
                     employee_obj=employee_obj,
@@ -44,11 +44,38 @@ class AttendanceHandler:
                 )
         return []
 
+    @classmethod
+    def get_company_shift_assigns(cls, company_config_obj):
+        # công ty dùng chung 1 ca: giả lập 1 phân ca (chưa lưu) với ca của công ty
+        model_shift_assign = DisperseModel(app_model='attendance.ShiftAssignment').get_model()
+        return [model_shift_assign(shift=company_config_obj.shift)]
+
     @classmethod
     def active_check(cls, date, employee_obj, data_logs, leaves, businesses, shift_assigns):
-        data_push_list = []
         integrate = employee_obj.device_integrate_employee.filter_on_company().first()
-        if integrate:
+        # Lọc logs theo date và employee_id
+        logs_on_day = [
+            log for log in data_logs
+            if log.employee_id == employee_obj.id and str(log.timestamp.date()) == date
+        ] if integrate and shift_assigns else []
+        return cls.parse_attendance(
+            date=date,
+            employee_obj=employee_obj,
+            is_integrate=bool(integrate),
+            logs_on_day=logs_on_day,
+            leaves=leaves,
+            businesses=businesses,
+            shift_assigns=shift_assigns,
+        )
+
+    @classmethod
+    def parse_attendance(cls, date, employee_obj, is_integrate, logs_on_day, leaves, businesses, shift_assigns):
+        """
+        Tính chấm công 1 nhân viên trong 1 ngày từ dữ liệu đã load sẵn (không query),
+        dùng chung cho check_attendance và AttendanceBatchEngine
+        """
+        data_push_list = []
+        if is_integrate:
             data_push = {
                 'employee_id': employee_obj.id,
                 'date': date,
@@ -66,11 +93,6 @@ class AttendanceHandler:
                 data_push_list.append(data_push)
                 return data_push_list
             if shift_assigns:
-                # Lọc logs theo date và employee_id
-                logs_on_day = [
-                    log for log in data_logs
-                    if log.employee_id == employee_obj.id and str(log.timestamp.date()) == date
-                ]
                 for shift_assign in shift_assigns:
                     data_push = AttendanceHandler.check_by_cases(
                         date=date,
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.8 on 2026-10-18 19:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr', '0005_permissiongrant'),
+        ('company', '0023_companyconfig_shift_companyconfig_shift_data_and_more'),
+        ('tenant', '0001_initial'),
+        ('payrolltemplate', '0001_initial'),
+        ('payroll', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(blank=True, max_length=100)),
+                ('code', models.CharField(blank=True, max_length=100)),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='The record created at value')),
+                ('date_modified', models.DateTimeField(auto_now=True, help_text='Date modified this record in last')),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_delete', models.BooleanField(default=False)),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('state', models.SmallIntegerField(choices=[(0, 'Waiting'), (1, 'Running'), (2, 'Done'), (3, 'Failed')], default=0)),
+                ('columns', models.JSONField(default=list, help_text='[{"code": "attr_code", "name": "attr name", "type": 0, "is_formula": true}]')),
+                ('inputs', models.JSONField(default=dict, help_text='{"employee_id": {"attr_code": "value nh\\u1eadp tay/import"}}')),
+                ('employee_total', models.IntegerField(default=0)),
+                ('msg', models.TextField(blank=True)),
+                ('date_started', models.DateTimeField(null=True)),
+                ('date_finished', models.DateTimeField(null=True)),
+                ('company', models.ForeignKey(help_text='The company claims that this record belongs to them', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_belong_to_company', to='company.company')),
+                ('employee_created', models.ForeignKey(help_text='Employee created this record', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_employee_creator', to='hr.employee')),
+                ('employee_modified', models.ForeignKey(help_text='Employee modified this record in last', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_employee_modifier', to='hr.employee')),
+                ('payroll_template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_run_template', to='payrolltemplate.payrolltemplate')),
+                ('tenant', models.ForeignKey(help_text='The tenant claims that this record belongs to them', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_belong_to_tenant', to='tenant.tenant')),
+            ],
+            options={
+                'verbose_name': 'Payroll Run',
+                'verbose_name_plural': 'Payroll Runs',
+                'ordering': ('-date_created',),
+                'permissions': (),
+                'default_permissions': (),
+            },
+        ),
+        migrations.CreateModel(
+            name='PayrollRunEmployee',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('values', models.JSONField(default=dict, help_text='{"attr_code": "value"}')),
+                ('employee', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payroll_run_employee', to='hr.employee')),
+                ('payroll_run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_run_employee', to='payroll.payrollrun')),
+            ],
+            options={
+                'verbose_name': 'Payroll Run Employee',
+                'verbose_name_plural': 'Payroll Run Employees',
+                'ordering': (),
+                'permissions': (),
+                'default_permissions': (),
+            },
+        ),
+    ]
@@ -1 +1,2 @@
 from .config import *
+from .payroll_run import *
@@ -0,0 +1,66 @@
+import json
+
+from django.db import models
+
+from apps.shared import MasterDataAbstractModel, SimpleAbstractModel
+
+# - PayrollRun: 1 lần chạy bảng lương theo template cho 1 kỳ lương, kết quả từng nhân viên lưu ở PayrollRunEmployee
+
+PAYROLL_RUN_STATE = [
+    (0, 'Waiting'),
+    (1, 'Running'),
+    (2, 'Done'),
+    (3, 'Failed'),
+]
+
+
+class PayrollRun(MasterDataAbstractModel):
+    payroll_template = models.ForeignKey(
+        'payrolltemplate.PayrollTemplate',
+        on_delete=models.CASCADE,
+        related_name='payroll_run_template'
+    )
+    period_start = models.DateField()
+    period_end = models.DateField()
+    state = models.SmallIntegerField(choices=PAYROLL_RUN_STATE, default=0)
+    columns = models.JSONField(
+        default=list,
+        help_text=json.dumps([{'code': 'attr_code', 'name': 'attr name', 'type': 0, 'is_formula': True}])
+    )
+    inputs = models.JSONField(
+        default=dict,
+        help_text=json.dumps({'employee_id': {'attr_code': 'value nhập tay/import'}})
+    )
+    employee_total = models.IntegerField(default=0)
+    msg = models.TextField(blank=True)
+    date_started = models.DateTimeField(null=True)
+    date_finished = models.DateTimeField(null=True)
+
+    class Meta:
+        verbose_name = 'Payroll Run'
+        verbose_name_plural = 'Payroll Runs'
+        ordering = ('-date_created',)
+        default_permissions = ()
+        permissions = ()
+
+
+class PayrollRunEmployee(SimpleAbstractModel):
+    payroll_run = models.ForeignKey(
+        PayrollRun,
+        on_delete=models.CASCADE,
+        related_name='payroll_run_employee'
+    )
+    employee = models.ForeignKey(
+        'hr.Employee',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='payroll_run_employee'
+    )
+    values = models.JSONField(default=dict, help_text=json.dumps({'attr_code': 'value'}))
+
+    class Meta:
+        verbose_name = 'Payroll Run Employee'
+        verbose_name_plural = 'Payroll Run Employees'
+        ordering = ()
+        default_permissions = ()
+        permissions = ()
@@ -0,0 +1,28 @@
+from celery import shared_task
+from django.utils import timezone
+
+from apps.hrm.payroll.models import PayrollRun
+from apps.hrm.payroll.utils.payroll_engine import PayrollEngine
+
+
+@shared_task
+def run_payroll(payroll_run_id):
+    # tính bảng lương theo PayrollRun, cập nhập tiến trình vào PayrollRun để FE theo dõi
+    payroll_run = PayrollRun.objects.select_related('payroll_template').filter(id=payroll_run_id, state=0).first()
+    if not payroll_run:
+        return False
+    payroll_run.state = 1
+    payroll_run.date_started = timezone.now()
+    payroll_run.save(update_fields=['state', 'date_started'])
+    try:
+        PayrollEngine(
+            template_obj=payroll_run.payroll_template, period_start=payroll_run.period_start,
+            period_end=payroll_run.period_end, inputs=payroll_run.inputs,
+        ).run(payroll_run)
+        payroll_run.state = 2
+    except Exception as err:
+        payroll_run.state = 3
+        payroll_run.msg = str(err)
+    payroll_run.date_finished = timezone.now()
+    payroll_run.save(update_fields=['state', 'msg', 'date_finished'])
+    return payroll_run.state == 2
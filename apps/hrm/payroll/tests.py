@@ -1,3 +1,237 @@
-from django.test import TestCase
+import datetime
+from types import SimpleNamespace
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+
+from apps.core.company.models import Company
+from apps.core.hr.models import Employee, Group
+from apps.core.tenant.models import Tenant
+from apps.hrm.attendance.models.attendance import Attendance
+from apps.hrm.employeeinfo.models import EmployeeInfo, EmployeeContract
+from apps.hrm.payroll.models import (
+    PayrollConfig, PayrollInsuranceRule, PayrollDeductionRule, PayrollTaxBracket, PayrollRun, PayrollRunEmployee,
+)
+from apps.hrm.payroll.tasks import run_payroll
+from apps.hrm.payroll.utils import PayrollEngine, PayrollExpression, PayrollFormulaPlan, PayrollTaxTable
+from apps.hrm.payrolltemplate.models import PayrollTemplate, SalaryTemplateEmployeeGroup
+from apps.shared.extends.tests import bulk_new
+
+# biểu thuế TNCN lũy tiến từng phần (tháng)
+TAX_BRACKETS = [
+    (0, 5e6, 5), (5e6, 10e6, 10), (10e6, 18e6, 15), (18e6, 32e6, 20), (32e6, 52e6, 25), (52e6, 80e6, 30), (80e6, 0, 35),
+]
+CONSTANTS = {
+    'social_insurance_employee': 0.08, 'social_insurance_employer': 0.175, 'social_insurance_ceiling': 46.8e6,
+    'unemployment_insurance_employee': 0.01, 'unemployment_insurance_employer': 0.01,
+    'unemployment_insurance_ceiling': 99.2e6, 'health_insurance_employee': 0.015, 'health_insurance_employer': 0.03,
+    'union_insurance_employee': 0, 'union_insurance_employer': 0.02,
+    'personal_deduction': 11e6, 'dependent_deduction': 4.4e6,
+}
+ATTRIBUTE_LIST = [
+    {'code': 'employee_name', 'type': 1, 'source': 0, 'order': 0},
+    {'code': 'employee_salary', 'type': 0, 'source': 0, 'order': 1},
+    {'code': 'insurance_salary', 'type': 0, 'source': 0, 'order': 2},
+    {'code': 'actual_work', 'type': 0, 'source': 0, 'order': 3},
+    {'code': 'shift_standard_work', 'type': 0, 'source': 0, 'order': 4},
+    {'code': 'allowance', 'type': 0, 'source': 1, 'order': 5},
+    {
+        'code': 'work_salary', 'type': 4, 'source': 2, 'formula_type': True, 'order': 6,
+        'formula': 'ROUND(IF(shift_standard_work > 0, employee_salary * actual_work / shift_standard_work, 0))',
+    },
+    {
+        'code': 'gross_salary', 'type': 4, 'source': 2, 'formula_type': True, 'order': 7,
+        'formula': ['work_salary', '+', 'allowance'],
+    },
+    {'code': 'employee_social_insurance', 'type': 0, 'source': 0, 'order': 8},
+    {'code': 'employee_health_insurance', 'type': 0, 'source': 0, 'order': 9},
+    {'code': 'employee_unemployment_insurance', 'type': 0, 'source': 0, 'order': 10},
+    {'code': 'company_social_insurance', 'type': 0, 'source': 0, 'order': 11},
+    {'code': 'employee_personal_deduction', 'type': 0, 'source': 0, 'order': 12},
+    {'code': 'employee_dependant_deduction', 'type': 0, 'source': 0, 'order': 13},
+    {
+        # cột công thức đặt trước cột nó tham chiếu: thứ tự tính theo DAG, không theo order
+        'code': 'net_salary', 'type': 4, 'source': 2, 'formula_type': True, 'order': 14,
+        'formula': {'formula': 'gross_salary - insurance_total - income_tax'},
+    },
+    {
+        'code': 'insurance_total', 'type': 4, 'source': 2, 'formula_type': True, 'order': 15,
+        'formula': 'employee_social_insurance + employee_health_insurance + employee_unemployment_insurance',
+    },
+    {
+        'code': 'income_tax', 'type': 4, 'source': 0, 'order': 16,
+        'formula': 'TAX(MAX(gross_salary - insurance_total - employee_personal_deduction'
+                   ' - employee_dependant_deduction, 0))',
+    },
+]
+
+
+def naive_evaluate(attribute_list, rows, constants, tax_brackets):
+    """ Tính từng nhân viên, từng cột (không dùng mảng numpy) """
+    plan = PayrollFormulaPlan(attribute_list)
+    tax_table = PayrollTaxTable(tax_brackets)
+    return [plan.evaluate_one({**constants, **row}, tax_table=tax_table) for row in rows]
+
+
+class PayrollFormulaTestCase(SimpleTestCase):
+    def test_tax_golden(self):
+        tax_table = PayrollTaxTable(TAX_BRACKETS)
+        golden = {
+            -1: 0, 0: 0, 3e6: 150e3, 5e6: 250e3, 7e6: 450e3, 20e6: 2.35e6, 45e6: 8e6, 100e6: 25.15e6,
+        }
+        result = tax_table.calc_array(list(golden.keys()))
+        for (value, expected), tax in zip(golden.items(), result):
+            self.assertAlmostEqual(tax, expected, places=4, msg=value)
+            self.assertAlmostEqual(tax_table.calc_one(value), expected, places=4, msg=value)
+
+    def test_plan_order(self):
+        plan = PayrollFormulaPlan(ATTRIBUTE_LIST)
+        self.assertLess(plan.order.index('insurance_total'), plan.order.index('net_salary'))
+        self.assertLess(plan.order.index('income_tax'), plan.order.index('net_salary'))
+        self.assertIn('employee_social_insurance', plan.expressions)
+        self.assertNotIn('employee_salary', plan.expressions)
+
+    def test_invalid_formula(self):
+        for formula in ('__import__("os")', 'a.b', 'a[0]', '"text"', 'lambda: 1', 'IF(a, b)', 'a +'):
+            with self.assertRaises(ValueError, msg=formula):
+                PayrollExpression.parse(formula)
+        for formula in ('ROUND(a, b)', 'ROUND(a, b + 1)', 'ROUND(a, 1.5)', 'ROUND(a, -b)'):
+            with self.subTest(formula=formula), self.assertRaisesMessage(ValueError, 'ROUND'):
+                PayrollExpression.parse(formula)
+        expression = PayrollExpression.parse('ROUND(a, -3)')
+        self.assertEqual(expression.eval_array({'a': np.array([1234567.0, 1500.0])}, 2).tolist(), [1235000, 2000])
+        self.assertEqual(expression.eval_scalar({'a': 1234567.0}), 1235000)
+        with self.assertRaisesMessage(ValueError, 'circular'):
+            PayrollFormulaPlan([
+                {'code': 'a', 'type': 4, 'formula': 'b + 1'}, {'code': 'b', 'type': 4, 'formula': 'a * 2'},
+            ])
+
+    def test_golden_one_employee(self):
+        engine = PayrollEngine(
+            template_obj=SimpleNamespace(attribute_list=ATTRIBUTE_LIST), period_start=None, period_end=None,
+            inputs={'E1': {'allowance': 2e6}},
+        )
+        result = engine.compute(
+            ['E1'], {
+                'employee_name': ['A'], 'employee_salary': [30e6], 'insurance_salary': [20e6],
+                'actual_work': [20], 'shift_standard_work': [22], 'dependant_number': [1],
+            }, CONSTANTS, PayrollTaxTable(TAX_BRACKETS),
+        )
+        # 30tr * 20/22 = 27.272.727 + 2tr phụ cấp; BH: 20tr * (8% + 1.5% + 1%) = 2.1tr
+        # thu nhập tính thuế: 29.272.727 - 2.1tr - 11tr - 4.4tr = 11.772.727 => thuế 750.000 + 1.772.727 * 15%
+        self.assertEqual(result['work_salary'][0], 27272727)
+        self.assertAlmostEqual(result['insurance_total'][0], 2.1e6)
+        self.assertAlmostEqual(result['income_tax'][0], 750e3 + 1772727 * 0.15, places=2)
+        self.assertAlmostEqual(result['net_salary'][0], 29272727 - 2.1e6 - (750e3 + 1772727 * 0.15), places=2)
+        self.assertEqual(result['employee_name'], ['A'])
+
+    def test_engine_same_as_naive(self):
+        rng = np.random.default_rng(2024)
+        total = 2000
+        system_data = {
+            'employee_name': [f'Employee {idx}' for idx in range(total)],
+            'employee_salary': rng.integers(5, 150, total) * 1e6,
+            'insurance_salary': rng.integers(5, 120, total) * 1e6,
+            'actual_work': rng.integers(0, 23, total),
+            'shift_standard_work': np.where(rng.random(total) < 0.05, 0, 22),
+            'dependant_number': rng.integers(0, 4, total),
+        }
+        keys = [f'E{idx}' for idx in range(total)]
+        allowance = rng.integers(0, 5, total) * 1e6
+        inputs = {key: {'allowance': float(allowance[idx])} for idx, key in enumerate(keys) if idx % 3}
+        engine = PayrollEngine(
+            template_obj=SimpleNamespace(attribute_list=ATTRIBUTE_LIST), period_start=None, period_end=None,
+            inputs=inputs,
+        )
+        result = engine.compute(keys, system_data, CONSTANTS, PayrollTaxTable(TAX_BRACKETS))
+
+        rows = [
+            {
+                **{code: values[idx] for code, values in system_data.items() if code != 'employee_name'},
+                'allowance': inputs.get(key, {}).get('allowance', 0),
+            } for idx, key in enumerate(keys)
+        ]
+        expected = naive_evaluate(ATTRIBUTE_LIST, rows, CONSTANTS, TAX_BRACKETS)
+        for code in PayrollFormulaPlan(ATTRIBUTE_LIST).order:
+            np.testing.assert_allclose(
+                result[code], [item[code] for item in expected], rtol=1e-12, atol=1e-6, err_msg=code
+            )
+
+
+class PayrollRunTestCase(TestCase):
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_PAYROLL')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_PAYROLL', tenant=self.tenant)
+        common = {'tenant': self.tenant, 'company': self.company}
+        self.group = bulk_new(Group, title='Group', code='GROUP_PAYROLL', **common)
+        self.employees = [
+            bulk_new(
+                Employee, first_name=f'Employee {idx}', last_name='Test', code=f'EMP_PAYROLL_{idx}',
+                group=self.group if idx < 3 else None, **common
+            ) for idx in range(4)
+        ]
+        for idx, employee_obj in enumerate(self.employees):
+            info_obj = bulk_new(
+                EmployeeInfo, employee=employee_obj, dependent_deduction=[{}] * idx, **common
+            )
+            # hợp đồng cũ + hợp đồng hiệu lực trong kỳ
+            for salary, effected_date in ((1e6, datetime.datetime(2024, 1, 1)), ((idx + 1) * 20e6, None)):
+                bulk_new(
+                    EmployeeContract, employee_info=info_obj, effected_date=effected_date or datetime.datetime(
+                        2025, 1, 1
+                    ), employee_salary=salary, employee_salary_insurance=salary / 2, **common
+                )
+            Attendance.objects.bulk_create([
+                Attendance(
+                    employee=employee_obj, date=datetime.date(2025, 3, day), attendance_status=1 if day > 2 else 0,
+                    **common,
+                ) for day in range(1, 23)
+            ])
+        config_obj = bulk_new(PayrollConfig, **common)
+        bulk_new(
+            PayrollInsuranceRule, payroll_config=config_obj, social_insurance_employee=8,
+            social_insurance_employer=17.5, social_insurance_ceiling=46.8e6, unemployment_insurance_employee=1,
+            unemployment_insurance_employer=1, unemployment_insurance_ceiling=99.2e6, health_insurance_employee=1.5,
+            health_insurance_employer=3, union_insurance_employer=2, **common
+        )
+        bulk_new(PayrollDeductionRule, payroll_config=config_obj, personal_deduction=11e6, dependent_deduction=4.4e6)
+        PayrollTaxBracket.objects.bulk_create([
+            PayrollTaxBracket(
+                payroll_config=config_obj, order=order, min_amount=min_amount, max_amount=max_amount, rate=rate
+            ) for order, (min_amount, max_amount, rate) in enumerate(TAX_BRACKETS)
+        ])
+        self.template = bulk_new(PayrollTemplate, title='Template', attribute_list=ATTRIBUTE_LIST, **common)
+        bulk_new(SalaryTemplateEmployeeGroup, salary_template=self.template, department_applied=self.group)
+
+    def test_run(self):
+        payroll_run = bulk_new(
+            PayrollRun, payroll_template=self.template, period_start=datetime.date(2025, 3, 1),
+            period_end=datetime.date(2025, 3, 31), inputs={str(self.employees[0].id): {'allowance': 1e6}},
+            tenant=self.tenant, company=self.company,
+        )
+        self.assertIs(run_payroll(str(payroll_run.id)), True)
+        payroll_run.refresh_from_db()
+        self.assertEqual((payroll_run.state, payroll_run.msg, payroll_run.employee_total), (2, '', 3))
+        self.assertEqual(len(payroll_run.columns), len(ATTRIBUTE_LIST))
+
+        line_objs = {
+            obj.employee_id: obj.values for obj in PayrollRunEmployee.objects.filter(payroll_run=payroll_run)
+        }
+        self.assertEqual(set(line_objs), {obj.id for obj in self.employees[:3]})
+        rows = []
+        for idx, employee_obj in enumerate(self.employees[:3]):
+            values = line_objs[employee_obj.id]
+            self.assertEqual(values['employee_name'], employee_obj.get_full_name())
+            self.assertEqual(values['employee_salary'], (idx + 1) * 20e6)
+            self.assertEqual((values['actual_work'], values['shift_standard_work']), (20, 22))
+            rows.append({
+                'employee_salary': (idx + 1) * 20e6, 'insurance_salary': (idx + 1) * 10e6, 'actual_work': 20,
+                'shift_standard_work': 22, 'dependant_number': idx, 'allowance': 1e6 if idx == 0 else 0,
+            })
+        constants = {
+            **CONSTANTS, 'union_insurance_employee': 0, 'union_insurance_employer': 0.02,
+        }
+        expected = naive_evaluate(ATTRIBUTE_LIST, rows, constants, TAX_BRACKETS)
+        for employee_obj, item in zip(self.employees[:3], expected):
+            for code in PayrollFormulaPlan(ATTRIBUTE_LIST).order:
+                self.assertAlmostEqual(line_objs[employee_obj.id][code], item[code], places=4, msg=code)
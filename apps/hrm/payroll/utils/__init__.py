@@ -0,0 +1,2 @@
+from .payroll_formula import *
+from .payroll_engine import *
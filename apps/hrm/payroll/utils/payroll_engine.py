@@ -0,0 +1,252 @@
+"""
+Tính bảng lương theo template cho toàn bộ nhân viên áp dụng trong 1 lần chạy (PayrollRun).
+    - Dữ liệu đầu vào load theo lô (số query cố định, không phụ thuộc số nhân viên): hợp đồng hiệu lực gần nhất,
+      số người phụ thuộc (EmployeeInfo), công chuẩn/công thực tế (Attendance trong kỳ), cấu hình bảo hiểm/giảm
+      trừ/biểu thuế của công ty (PayrollConfig); cột nhập tay/import lấy từ PayrollRun.inputs.
+    - Mỗi cột là 1 mảng numpy (1 phần tử / nhân viên), cột công thức tính theo thứ tự topo của PayrollFormulaPlan,
+      thuế TNCN lũy tiến tính bằng np.searchsorted trên biểu thuế.
+    - Kết quả lưu bằng bulk_create PayrollRunEmployee.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Q
+
+from apps.hrm.payroll.models import PayrollConfig, PayrollRun, PayrollRunEmployee
+from apps.shared import DisperseModel
+
+from .payroll_formula import PayrollFormulaPlan, PayrollTaxTable
+
+__all__ = ['PayrollEngine']
+
+# ATTENDANCE_STATUS: 0 Absent, 1 Present, 2 Leave, 3 Business
+ATTENDANCE_ACTUAL_WORK = (1, 2, 3)
+ATTENDANCE_STANDARD_WORK = (0, 1, 2, 3)
+
+INSURANCE_RATE_FIELDS = (
+    'social_insurance_employee', 'social_insurance_employer', 'unemployment_insurance_employee',
+    'unemployment_insurance_employer', 'health_insurance_employee', 'health_insurance_employer',
+    'union_insurance_employee', 'union_insurance_employer',
+)
+INSURANCE_CEILING_FIELDS = ('social_insurance_ceiling', 'unemployment_insurance_ceiling')
+DEDUCTION_FIELDS = ('personal_deduction', 'dependent_deduction')
+
+# mã thành phần hệ thống lấy từ hợp đồng: code -> field của EmployeeContract
+CONTRACT_FIELDS = {
+    'employee_salary': 'employee_salary',
+    'insurance_salary': 'employee_salary_insurance',
+    'employee_salary_ratio': 'employee_salary_rate',
+    'employee_salary_coefficient': 'employee_salary_coefficient',
+    'salary_level': 'employee_salary_level',
+}
+TEXT_FIELDS = ('employee_name', 'employee_code', 'employee_group', 'employee_role')
+
+
+class PayrollEngine:
+    BATCH_SIZE = 1000
+
+    def __init__(self, template_obj, period_start, period_end, inputs: dict = None):
+        self.template_obj = template_obj
+        self.period_start = period_start
+        self.period_end = period_end
+        self.inputs = inputs or {}
+        self.plan = PayrollFormulaPlan(template_obj.attribute_list)
+
+    # ----- dữ liệu đầu vào -----
+
+    @classmethod
+    def get_rule(cls, queryset, period_end):
+        return queryset.filter(status=True).filter(
+            Q(effective_date__isnull=True) | Q(effective_date__lte=period_end)
+        ).order_by('-effective_date', '-date_created').first()
+
+    @classmethod
+    def load_config(cls, company_id, period_end) -> tuple[dict, PayrollTaxTable]:
+        """ Returns: (hằng số dùng trong công thức, biểu thuế) """
+        constants = {field: 0.0 for field in INSURANCE_RATE_FIELDS + INSURANCE_CEILING_FIELDS + DEDUCTION_FIELDS}
+        config_obj = PayrollConfig.objects.filter(company_id=company_id).first()
+        if not config_obj:
+            return constants, PayrollTaxTable([])
+
+        insurance_obj = cls.get_rule(config_obj.payroll_insurance_rule_config, period_end)
+        if insurance_obj:
+            for field in INSURANCE_RATE_FIELDS:
+                # tỉ lệ cấu hình theo phần trăm (8 => 8%)
+                constants[field] = float(getattr(insurance_obj, field) or 0) / 100
+            for field in INSURANCE_CEILING_FIELDS:
+                constants[field] = float(getattr(insurance_obj, field) or 0)
+        deduction_obj = cls.get_rule(config_obj.payroll_deduction_rule_config, period_end)
+        if deduction_obj:
+            for field in DEDUCTION_FIELDS:
+                constants[field] = float(getattr(deduction_obj, field) or 0)
+        tax_table = PayrollTaxTable.from_objs(
+            config_obj.payroll_tax_bracket_config.filter(status=True).filter(
+                Q(effective_date__isnull=True) | Q(effective_date__lte=period_end)
+            ).order_by('order')
+        )
+        return constants, tax_table
+
+    def load_employees(self) -> list:
+        model_employee = DisperseModel(app_model='hr.Employee').get_model()
+        filter_kwargs = {'company_id': self.template_obj.company_id, 'is_delete': False, 'is_active': True}
+        group_ids = list(self.template_obj.department_applied.values_list('id', flat=True))
+        if group_ids:
+            filter_kwargs['group_id__in'] = group_ids
+        return list(
+            model_employee.objects.filter(**filter_kwargs).select_related('group').only(
+                'id', 'code', 'first_name', 'last_name', 'group__title'
+            ).order_by('code')
+        )
+
+    @classmethod
+    def load_role(cls, employee_ids) -> dict:
+        """ Returns: {employee_id: 'role 1, role 2'} (đọc bảng trung gian thay vì prefetch role của từng nhân viên) """
+        model_employee = DisperseModel(app_model='hr.Employee').get_model()
+        result = defaultdict(list)
+        for employee_id, title in model_employee.role.through.objects.filter(
+                employee_id__in=employee_ids
+        ).order_by('role__title').values_list('employee_id', 'role__title'):
+            result[employee_id].append(title)
+        return {employee_id: ', '.join(titles) for employee_id, titles in result.items()}
+
+    def load_contract(self, employee_ids) -> dict:
+        """ Returns: {employee_id: {code: giá trị} của hợp đồng hiệu lực gần nhất trong kỳ} """
+        model_contract = DisperseModel(app_model='employeeinfo.EmployeeContract').get_model()
+        result = {}
+        for item in model_contract.objects.filter(
+                employee_info__employee_id__in=employee_ids, is_delete=False,
+        ).filter(
+            Q(effected_date__isnull=True) | Q(effected_date__date__lte=self.period_end)
+        ).filter(
+            Q(expired_date__isnull=True) | Q(expired_date__date__gte=self.period_start)
+        ).order_by(
+            F('effected_date').asc(nulls_first=True), 'date_created'
+        ).values('employee_info__employee_id', *CONTRACT_FIELDS.values()):
+            result[item['employee_info__employee_id']] = {
+                code: item[field] for code, field in CONTRACT_FIELDS.items()
+            }
+        return result
+
+    @classmethod
+    def load_dependant(cls, employee_ids) -> dict:
+        model_info = DisperseModel(app_model='employeeinfo.EmployeeInfo').get_model()
+        return {
+            employee_id: len(dependent) if isinstance(dependent, list) else 0
+            for employee_id, dependent in model_info.objects.filter(employee_id__in=employee_ids).values_list(
+                'employee_id', 'dependent_deduction'
+            )
+        }
+
+    def load_attendance(self, employee_ids) -> tuple[dict, dict]:
+        """ Returns: ({employee_id: công thực tế}, {employee_id: công chuẩn}) """
+        model_attendance = DisperseModel(app_model='attendance.Attendance').get_model()
+        actual_work, standard_work = defaultdict(int), defaultdict(int)
+        for employee_id, status in model_attendance.objects.filter(
+                employee_id__in=employee_ids, date__gte=self.period_start, date__lte=self.period_end,
+                attendance_status__in=ATTENDANCE_STANDARD_WORK,
+        ).values_list('employee_id', 'attendance_status'):
+            standard_work[employee_id] += 1
+            if status in ATTENDANCE_ACTUAL_WORK:
+                actual_work[employee_id] += 1
+        return actual_work, standard_work
+
+    def load_system_data(self, employee_objs) -> dict:
+        """ Returns: {code: list giá trị theo thứ tự employee_objs} """
+        employee_ids = [obj.id for obj in employee_objs]
+        contracts = self.load_contract(employee_ids)
+        dependants = self.load_dependant(employee_ids)
+        actual_work, standard_work = self.load_attendance(employee_ids)
+        roles = self.load_role(employee_ids)
+        data = {
+            'employee_name': [obj.get_full_name() for obj in employee_objs],
+            'employee_code': [obj.code for obj in employee_objs],
+            'employee_group': [obj.group.title if obj.group else '' for obj in employee_objs],
+            'employee_role': [roles.get(obj.id, '') for obj in employee_objs],
+            'dependant_number': [dependants.get(obj.id, 0) for obj in employee_objs],
+            'actual_work': [actual_work.get(obj.id, 0) for obj in employee_objs],
+            'shift_standard_work': [standard_work.get(obj.id, 0) for obj in employee_objs],
+        }
+        for code in CONTRACT_FIELDS:
+            data[code] = [contracts[obj.id][code] if obj.id in contracts else 0 for obj in employee_objs]
+        return data
+
+    # ----- tính toán -----
+
+    @classmethod
+    def to_array(cls, values) -> np.ndarray:
+        result = np.zeros(len(values), dtype=np.float64)
+        for idx, value in enumerate(values):
+            try:
+                result[idx] = float(value or 0)
+            except (TypeError, ValueError):
+                result[idx] = 0
+        return result
+
+    def build_env(self, employee_keys: list, system_data: dict, constants: dict) -> dict:
+        """ Gộp hằng số cấu hình + dữ liệu hệ thống + dữ liệu nhập tay/import thành {code: np.ndarray | list} """
+        env = dict(constants)
+        input_codes = {code for values in self.inputs.values() for code in values}
+        for code in set(system_data) | input_codes | set(self.plan.inputs) | set(self.plan.columns):
+            if code in self.plan.expressions:
+                continue
+            values = system_data.get(code, None)
+            if code in input_codes:
+                values = list(values) if values is not None else [None] * len(employee_keys)
+                for idx, key in enumerate(employee_keys):
+                    employee_input = self.inputs.get(key, {})
+                    if code in employee_input:
+                        values[idx] = employee_input[code]
+            if values is None:
+                if code in env:
+                    continue
+                values = [0] * len(employee_keys)
+            is_number = code not in TEXT_FIELDS and self.plan.is_number(code)
+            env[code] = self.to_array(values) if is_number else list(values)
+        return env
+
+    def compute(self, employee_keys: list, system_data: dict, constants: dict, tax_table: PayrollTaxTable) -> dict:
+        """ Returns: {code: np.ndarray | list} cho các cột của template """
+        env = self.plan.evaluate(
+            self.build_env(employee_keys, system_data, constants), size=len(employee_keys), tax_table=tax_table
+        )
+        return {code: env.get(code, None) for code in self.plan.columns}
+
+    def get_columns(self) -> list[dict]:
+        return [
+            {
+                'code': code, 'name': item.get('name', ''), 'type': item.get('type', 0),
+                'is_formula': code in self.plan.expressions,
+            } for code, item in self.plan.columns.items()
+        ]
+
+    @classmethod
+    def to_rows(cls, result: dict, size: int) -> list[dict]:
+        columns = []
+        for code, values in result.items():
+            if values is None:
+                values = [None] * size
+            elif isinstance(values, np.ndarray):
+                values = values.tolist()
+            columns.append((code, values))
+        codes = [code for code, _values in columns]
+        return [dict(zip(codes, row)) for row in zip(*[values for _code, values in columns])]
+
+    # ----- chạy + lưu -----
+
+    def run(self, payroll_run: PayrollRun) -> list[PayrollRunEmployee]:
+        employee_objs = self.load_employees()
+        employee_keys = [str(obj.id) for obj in employee_objs]
+        constants, tax_table = self.load_config(self.template_obj.company_id, self.period_end)
+        result = self.compute(employee_keys, self.load_system_data(employee_objs), constants, tax_table)
+        line_objs = [
+            PayrollRunEmployee(payroll_run=payroll_run, employee=employee_obj, values=values)
+            for employee_obj, values in zip(employee_objs, self.to_rows(result, len(employee_objs)))
+        ]
+        with transaction.atomic():
+            PayrollRunEmployee.objects.filter(payroll_run=payroll_run).delete()
+            PayrollRunEmployee.objects.bulk_create(line_objs, batch_size=self.BATCH_SIZE)
+            payroll_run.columns = self.get_columns()
+            payroll_run.employee_total = len(line_objs)
+            payroll_run.save(update_fields=['columns', 'employee_total'])
+        return line_objs
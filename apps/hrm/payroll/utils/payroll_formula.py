@@ -0,0 +1,449 @@
+"""
+Công thức cột của bảng lương (PayrollTemplate.attribute_list).
+    - formula (chuỗi, danh sách token hoặc dict {'formula'|'expression'|'syntax': ...}) được parse 1 lần bằng ast
+      thành cây biểu thức thuần: chỉ cho phép số, mã cột, + - * / // % **, so sánh, AND/OR/NOT và các hàm trong
+      FORMULA_FUNCTIONS (IF, MIN, MAX, ABS, ROUND, FLOOR, CEIL, CAP, TAX). Mọi cú pháp khác => ValueError.
+    - Cột công thức tạo thành DAG theo mã cột được tham chiếu, thứ tự tính = sắp xếp topo (vòng lặp => ValueError).
+    - Cùng 1 cây tính được theo 2 cách: eval_array (mảng numpy cho toàn bộ nhân viên) và eval_scalar (từng nhân
+      viên, dùng để đối chiếu); chia cho 0 => 0 ở cả 2 cách.
+"""
+import ast
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+__all__ = ['PayrollTaxTable', 'PayrollExpression', 'PayrollFormulaPlan', 'FORMULA_FUNCTIONS', 'SYSTEM_FORMULA']
+
+FORMULA_FUNCTIONS = ('IF', 'MIN', 'MAX', 'ABS', 'ROUND', 'FLOOR', 'CEIL', 'CAP', 'AND', 'OR', 'NOT', 'TAX')
+
+# công thức mặc định của thành phần lương hệ thống (PayrollAttribute.data_source = 0) khi template không nhập
+# công thức, tham số lấy từ cấu hình lương của công ty (PayrollConfig)
+SYSTEM_FORMULA = {
+    'employee_social_insurance': 'CAP(insurance_salary, social_insurance_ceiling) * social_insurance_employee',
+    'company_social_insurance': 'CAP(insurance_salary, social_insurance_ceiling) * social_insurance_employer',
+    'employee_health_insurance': 'CAP(insurance_salary, social_insurance_ceiling) * health_insurance_employee',
+    'company_health_insurance': 'CAP(insurance_salary, social_insurance_ceiling) * health_insurance_employer',
+    'employee_unemployment_insurance':
+        'CAP(insurance_salary, unemployment_insurance_ceiling) * unemployment_insurance_employee',
+    'company_unemployment_insurance':
+        'CAP(insurance_salary, unemployment_insurance_ceiling) * unemployment_insurance_employer',
+    'employee_union_insurance': 'CAP(insurance_salary, social_insurance_ceiling) * union_insurance_employee',
+    'company_union_insurance': 'CAP(insurance_salary, social_insurance_ceiling) * union_insurance_employer',
+    'employee_personal_deduction': 'personal_deduction',
+    'employee_dependant_deduction': 'dependent_deduction * dependant_number',
+}
+
+BIN_OPERATORS = {
+    ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.FloorDiv: '//', ast.Mod: '%', ast.Pow: '**',
+}
+CMP_OPERATORS = {
+    ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=',
+}
+RE_KEYWORD_CALL = re.compile(r'\b(if|and|or|not)\s*\(', flags=re.IGNORECASE)
+
+
+class PayrollTaxTable:
+    """
+    Biểu thuế lũy tiến từng phần: [(min_amount, max_amount, rate)], max_amount = 0 => không giới hạn,
+    rate theo phần trăm (5 => 5%) giống thuế suất của các cấu hình thuế khác.
+    """
+
+    def __init__(self, brackets):
+        items = sorted(
+            (float(min_amount or 0), float(max_amount or 0), float(rate or 0))
+            for min_amount, max_amount, rate in brackets
+        )
+        self.lowers = np.array([item[0] for item in items], dtype=np.float64)
+        self.rates = np.array([item[2] / 100 for item in items], dtype=np.float64)
+        # thuế cộng dồn tại cận dưới của từng bậc
+        self.cumulative = np.zeros(len(items), dtype=np.float64)
+        for idx in range(1, len(items)):
+            upper = items[idx - 1][1] if items[idx - 1][1] > 0 else self.lowers[idx]
+            upper = min(upper, self.lowers[idx])
+            self.cumulative[idx] = self.cumulative[idx - 1] + (upper - self.lowers[idx - 1]) * self.rates[idx - 1]
+
+    @classmethod
+    def from_objs(cls, tax_bracket_objs):
+        return cls([(obj.min_amount, obj.max_amount, obj.rate) for obj in tax_bracket_objs])
+
+    def calc_array(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not self.lowers.size:
+            return np.zeros_like(values)
+        idx = np.searchsorted(self.lowers, values, side='right') - 1
+        safe_idx = np.maximum(idx, 0)
+        tax = self.cumulative[safe_idx] + (values - self.lowers[safe_idx]) * self.rates[safe_idx]
+        return np.where((idx >= 0) & (values > 0), tax, 0.0)
+
+    def calc_one(self, value):
+        value = float(value)
+        tax = 0.0
+        if value <= 0:
+            return tax
+        for idx, lower in enumerate(self.lowers):
+            if value < lower:
+                break
+            tax = self.cumulative[idx] + (value - lower) * self.rates[idx]
+        return float(tax)
+
+
+class PayrollExpression:
+    """
+    Cây biểu thức đã parse, mỗi node là tuple:
+        ('num', value) | ('var', code) | ('bin', op, left, right) | ('neg', node) | ('cmp', [ops], [nodes])
+        ('and' | 'or', [nodes]) | ('not', node) | ('call', FUNC, [nodes])
+    """
+
+    def __init__(self, source, tree):
+        self.source = source
+        self.tree = tree
+        self.variables = self.get_variables(tree, set())
+
+    @classmethod
+    def to_source(cls, formula) -> str:
+        if formula is None:
+            return ''
+        if isinstance(formula, (int, float)) and not isinstance(formula, bool):
+            return str(formula)
+        if isinstance(formula, str):
+            return formula.strip()
+        if isinstance(formula, dict):
+            for key in ('formula', 'expression', 'syntax', 'code', 'value'):
+                if key in formula:
+                    return cls.to_source(formula[key])
+            return ''
+        if isinstance(formula, (list, tuple)):
+            return ' '.join(cls.to_source(item) for item in formula).strip()
+        raise ValueError(f'Formula is not support: {formula!r}')
+
+    @classmethod
+    def parse(cls, formula) -> 'PayrollExpression':
+        source = cls.to_source(formula)
+        if source.startswith('='):
+            source = source[1:]
+        if not source:
+            raise ValueError('Formula is empty')
+        # IF/AND/OR/NOT kiểu excel: if(...) là từ khóa python => đổi về tên hàm
+        source_py = RE_KEYWORD_CALL.sub(lambda match: match.group(1).upper() + '(', source).replace('^', '**')
+        try:
+            node = ast.parse(source_py, mode='eval').body
+        except SyntaxError as err:
+            raise ValueError(f'Formula syntax error: {source}') from err
+        return cls(source=source, tree=cls.build(node))
+
+    @classmethod
+    def build(cls, node):
+        if isinstance(node, (ast.Constant, ast.Name)):
+            return cls.build_value(node)
+        if isinstance(node, ast.BinOp) and type(node.op) in BIN_OPERATORS:
+            return 'bin', BIN_OPERATORS[type(node.op)], cls.build(node.left), cls.build(node.right)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd, ast.Not)):
+            return cls.build_unary(node)
+        if isinstance(node, ast.Compare) and all(type(item) in CMP_OPERATORS for item in node.ops):
+            return (
+                'cmp', [CMP_OPERATORS[type(item)] for item in node.ops],
+                [cls.build(node.left)] + [cls.build(item) for item in node.comparators],
+            )
+        if isinstance(node, ast.BoolOp):
+            return 'and' if isinstance(node.op, ast.And) else 'or', [cls.build(item) for item in node.values]
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            return cls.build_call(node)
+        raise ValueError(f'Formula syntax is not support: {ast.dump(node)}')
+
+    @classmethod
+    def build_value(cls, node):
+        if isinstance(node, ast.Name):
+            name = node.id.upper()
+            if name in ('TRUE', 'FALSE'):
+                return 'num', 1.0 if name == 'TRUE' else 0.0
+            return 'var', node.id
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ValueError(f'Formula constant is not support: {node.value!r}')
+        return 'num', float(node.value)
+
+    @classmethod
+    def build_unary(cls, node):
+        if isinstance(node.op, ast.USub):
+            return 'neg', cls.build(node.operand)
+        if isinstance(node.op, ast.Not):
+            return 'not', cls.build(node.operand)
+        return cls.build(node.operand)
+
+    @classmethod
+    def build_call(cls, node):
+        func = node.func.id.upper()
+        if func not in FORMULA_FUNCTIONS:
+            raise ValueError(f'Formula function is not support: {node.func.id}')
+        args = [cls.build(item) for item in node.args]
+        cls.check_args(func, args)
+        if func in ('AND', 'OR'):
+            return func.lower(), args
+        if func == 'NOT':
+            return 'not', args[0]
+        return 'call', func, args
+
+    @classmethod
+    def check_args(cls, func, args):
+        total = len(args)
+        valid = {
+            'IF': total == 3, 'ABS': total == 1, 'FLOOR': total == 1, 'CEIL': total == 1, 'NOT': total == 1,
+            'TAX': total == 1, 'CAP': total == 2, 'ROUND': total in (1, 2),
+        }.get(func, total >= 1)
+        if not valid:
+            raise ValueError(f'Formula function {func} got wrong number of arguments: {total}')
+        if func == 'ROUND' and total == 2:
+            # số chữ số làm tròn phải là hằng số nguyên (vd: ROUND(x, -3)), không nhận biến/cột
+            digits = cls.get_constant(args[1])
+            if digits is None or not digits.is_integer():
+                raise ValueError('Formula function ROUND need number of digits is an integer constant')
+
+    @classmethod
+    def get_constant(cls, tree):
+        if tree[0] == 'num':
+            return tree[1]
+        if tree[0] == 'neg':
+            value = cls.get_constant(tree[1])
+            return None if value is None else -value
+        return None
+
+    @classmethod
+    def get_variables(cls, tree, result: set) -> set:
+        kind = tree[0]
+        if kind == 'var':
+            result.add(tree[1])
+        elif kind == 'bin':
+            cls.get_variables(tree[2], result)
+            cls.get_variables(tree[3], result)
+        elif kind in ('neg', 'not'):
+            cls.get_variables(tree[1], result)
+        elif kind in ('and', 'or', 'cmp', 'call'):
+            for item in tree[-1]:
+                cls.get_variables(item, result)
+        return result
+
+    # ----- tính theo mảng -----
+
+    def eval_array(self, env: dict, size: int, tax_table: PayrollTaxTable = None):
+        """ env: {code: np.ndarray(size) | float}, Returns: np.ndarray(size) float64 """
+        result = self._eval_array(self.tree, env, size, tax_table)
+        return np.broadcast_to(np.asarray(result, dtype=np.float64), (size,)).copy()
+
+    @classmethod
+    def _compare(cls, operator_code, left, right):
+        return {
+            '==': lambda: left == right, '!=': lambda: left != right, '<': lambda: left < right,
+            '<=': lambda: left <= right, '>': lambda: left > right, '>=': lambda: left >= right,
+        }[operator_code]()
+
+    def _eval_array(self, tree, env, size, tax_table):  # pylint: disable=R0911,R0912
+        kind = tree[0]
+        if kind == 'num':
+            return tree[1]
+        if kind == 'var':
+            return env.get(tree[1], 0.0)
+        if kind == 'neg':
+            return -np.asarray(self._eval_array(tree[1], env, size, tax_table), dtype=np.float64)
+        if kind == 'not':
+            return np.asarray(self._eval_array(tree[1], env, size, tax_table)) == 0
+        if kind == 'bin':
+            left = np.asarray(self._eval_array(tree[2], env, size, tax_table), dtype=np.float64)
+            right = np.asarray(self._eval_array(tree[3], env, size, tax_table), dtype=np.float64)
+            return self._bin_array(tree[1], left, right)
+        if kind == 'cmp':
+            values = [self._eval_array(item, env, size, tax_table) for item in tree[2]]
+            result = True
+            for operator_code, left, right in zip(tree[1], values[:-1], values[1:]):
+                result = np.logical_and(result, self._compare(operator_code, left, right))
+            return result
+        if kind in ('and', 'or'):
+            values = [np.asarray(self._eval_array(item, env, size, tax_table)) != 0 for item in tree[1]]
+            func = np.logical_and if kind == 'and' else np.logical_or
+            return func.reduce(np.broadcast_arrays(*values)) if len(values) > 1 else values[0]
+        func, args = tree[1], [self._eval_array(item, env, size, tax_table) for item in tree[2]]
+        return self._call_array(func, args, tax_table)
+
+    @classmethod
+    def _bin_array(cls, operator_code, left, right):
+        if operator_code in ('/', '//', '%'):
+            left, right = np.broadcast_arrays(left, right)
+            result = np.zeros(left.shape, dtype=np.float64)
+            mask = right != 0
+            func = {'/': np.true_divide, '//': np.floor_divide, '%': np.mod}[operator_code]
+            func(left, right, out=result, where=mask)
+            return result
+        if operator_code == '+':
+            return left + right
+        if operator_code == '-':
+            return left - right
+        if operator_code == '*':
+            return left * right
+        with np.errstate(over='ignore', invalid='ignore'):
+            return np.power(left, right)
+
+    @classmethod
+    def _call_array(cls, func, args, tax_table):  # pylint: disable=R0911
+        if func == 'IF':
+            return np.where(np.asarray(args[0]) != 0, args[1], args[2])
+        args = [np.asarray(item, dtype=np.float64) for item in args]
+        if func == 'MIN':
+            return np.minimum.reduce(np.broadcast_arrays(*args)) if len(args) > 1 else args[0]
+        if func == 'MAX':
+            return np.maximum.reduce(np.broadcast_arrays(*args)) if len(args) > 1 else args[0]
+        if func == 'ABS':
+            return np.abs(args[0])
+        if func == 'ROUND':
+            # digits là hằng số nguyên, đã kiểm tra lúc parse (check_args)
+            digits = int(args[1]) if len(args) > 1 else 0
+            return np.round(args[0], digits)
+        if func == 'FLOOR':
+            return np.floor(args[0])
+        if func == 'CEIL':
+            return np.ceil(args[0])
+        if func == 'CAP':
+            return np.where(args[1] > 0, np.minimum(args[0], args[1]), args[0])
+        if tax_table is None:
+            raise ValueError('Formula TAX() need tax brackets of payroll config')
+        return tax_table.calc_array(args[0])
+
+    # ----- tính từng nhân viên (đối chiếu) -----
+
+    def eval_scalar(self, env: dict, tax_table: PayrollTaxTable = None) -> float:
+        return float(self._eval_scalar(self.tree, env, tax_table))
+
+    def _eval_scalar(self, tree, env, tax_table):  # pylint: disable=R0911,R0912
+        kind = tree[0]
+        if kind == 'num':
+            return tree[1]
+        if kind == 'var':
+            return float(env.get(tree[1], 0.0))
+        if kind == 'neg':
+            return -self._eval_scalar(tree[1], env, tax_table)
+        if kind == 'not':
+            return float(not self._eval_scalar(tree[1], env, tax_table))
+        if kind == 'bin':
+            left = self._eval_scalar(tree[2], env, tax_table)
+            right = self._eval_scalar(tree[3], env, tax_table)
+            if tree[1] in ('/', '//', '%') and right == 0:
+                return 0.0
+            return float({
+                '+': lambda: left + right, '-': lambda: left - right, '*': lambda: left * right,
+                '/': lambda: left / right, '//': lambda: np.floor_divide(left, right),
+                '%': lambda: np.mod(left, right), '**': lambda: np.power(np.float64(left), right),
+            }[tree[1]]())
+        if kind == 'cmp':
+            values = [self._eval_scalar(item, env, tax_table) for item in tree[2]]
+            return float(all(
+                self._compare(operator_code, left, right)
+                for operator_code, left, right in zip(tree[1], values[:-1], values[1:])
+            ))
+        if kind == 'and':
+            return float(all(self._eval_scalar(item, env, tax_table) != 0 for item in tree[1]))
+        if kind == 'or':
+            return float(any(self._eval_scalar(item, env, tax_table) != 0 for item in tree[1]))
+        func, args = tree[1], [self._eval_scalar(item, env, tax_table) for item in tree[2]]
+        return self._call_scalar(func, args, tax_table)
+
+    @classmethod
+    def _call_scalar(cls, func, args, tax_table):  # pylint: disable=R0911
+        if func == 'IF':
+            return args[1] if args[0] != 0 else args[2]
+        if func == 'MIN':
+            return min(args)
+        if func == 'MAX':
+            return max(args)
+        if func == 'ABS':
+            return abs(args[0])
+        if func == 'ROUND':
+            # cùng quy tắc làm tròn với np.round của eval_array, digits là hằng số (check_args)
+            return float(np.round(args[0], int(args[1]) if len(args) > 1 else 0))
+        if func == 'FLOOR':
+            return float(np.floor(args[0]))
+        if func == 'CEIL':
+            return float(np.ceil(args[0]))
+        if func == 'CAP':
+            return min(args[0], args[1]) if args[1] > 0 else args[0]
+        if tax_table is None:
+            raise ValueError('Formula TAX() need tax brackets of payroll config')
+        return tax_table.calc_one(args[0])
+
+
+class PayrollFormulaPlan:
+    """
+    Kế hoạch tính của 1 template: cột công thức đã parse + thứ tự topo.
+        - cột có công thức (formula_type/type formula/source formula hoặc thành phần hệ thống có SYSTEM_FORMULA)
+          được tính, các cột còn lại là dữ liệu đầu vào (hệ thống, nhập tay, import)
+        - tên được tham chiếu mà không phải cột công thức => đầu vào (thiếu => 0)
+    """
+
+    def __init__(self, attribute_list: list):
+        self.columns = OrderedDict()
+        self.expressions = OrderedDict()
+        for item in sorted(attribute_list or [], key=lambda attr: attr.get('order', 0) or 0):
+            code = item.get('code', None)
+            if not code:
+                continue
+            self.columns[code] = item
+            formula = self.get_formula(item)
+            if formula:
+                try:
+                    self.expressions[code] = PayrollExpression.parse(formula)
+                except ValueError as err:
+                    raise ValueError(f'[{code}] {err}') from err
+        self.order = self.sort_topo()
+        self.inputs = sorted(
+            {name for expression in self.expressions.values() for name in expression.variables} - set(self.expressions)
+        )
+
+    @classmethod
+    def get_formula(cls, item: dict):
+        formula = item.get('formula', None)
+        has_formula = formula not in (None, '', [], {})
+        if has_formula and (item.get('formula_type', False) or item.get('type', None) == 4 or item.get('source') == 2):
+            return formula
+        if item.get('source', None) == 0:
+            # thành phần hệ thống: công thức của template (nếu có) hoặc công thức mặc định
+            return formula if has_formula else SYSTEM_FORMULA.get(item['code'], None)
+        return None
+
+    def sort_topo(self) -> list[str]:
+        depends = {
+            code: expression.variables & set(self.expressions) for code, expression in self.expressions.items()
+        }
+        result, visited, visiting = [], set(), []
+
+        def visit(code):
+            if code in visited:
+                return
+            if code in visiting:
+                cycle = visiting[visiting.index(code):] + [code]
+                raise ValueError('Formula has circular reference: ' + ' -> '.join(cycle))
+            visiting.append(code)
+            # giữ thứ tự cột của template cho các cột không phụ thuộc nhau
+            for item in sorted(depends[code], key=list(self.expressions).index):
+                visit(item)
+            visiting.pop()
+            visited.add(code)
+            result.append(code)
+
+        for code in self.expressions:
+            visit(code)
+        return result
+
+    def is_number(self, code) -> bool:
+        item = self.columns.get(code, None)
+        return code in self.expressions or item is None or item.get('type', 0) in (0, 3, 4)
+
+    def evaluate(self, env: dict, size: int, tax_table: PayrollTaxTable = None) -> dict:
+        """ Tính toàn bộ cột công thức cho size nhân viên, env: {code: np.ndarray(size) | float} """
+        env = dict(env)
+        for code in self.order:
+            env[code] = self.expressions[code].eval_array(env, size, tax_table)
+        return env
+
+    def evaluate_one(self, env: dict, tax_table: PayrollTaxTable = None) -> dict:
+        """ Tính cho 1 nhân viên, env: {code: float} """
+        env = dict(env)
+        for code in self.order:
+            env[code] = self.expressions[code].eval_scalar(env, tax_table)
+        return env
@@ -133,14 +133,31 @@ class Price(DataAbstractModel):
 
     @classmethod
     def get_children(cls, price_list_obj, factor=1.0):
+        """
+        Danh sách [(bảng giá, factor tích lũy tính từ price_list_obj)] gồm price_list_obj và các bảng giá con cháu
+        còn hiệu lực, theo thứ tự duyệt cây (cha trước con). Cây được load 1 query thay vì query theo từng cấp.
+        """
         if price_list_obj.valid_time_end.date() and price_list_obj.valid_time_end.date() < datetime.now().date():
             return []
 
-        children_with_factor = [(price_list_obj, factor)]
-
-        for child in cls.objects.filter(price_list_mapped=price_list_obj, valid_time_end__gt=datetime.now()):
-            children_with_factor.extend(cls.get_children(child, factor * child.factor))
-
+        children_map = {}
+        for child in cls.objects.filter(
+                tenant_id=price_list_obj.tenant_id, company_id=price_list_obj.company_id,
+                price_list_mapped__isnull=False, valid_time_end__gt=datetime.now()
+        ):
+            children_map.setdefault(child.price_list_mapped_id, []).append(child)
+
+        children_with_factor = []
+        visited = set()
+        stack = [(price_list_obj, factor)]
+        while stack:
+            node, node_factor = stack.pop()
+            if node.id in visited:
+                continue
+            visited.add(node.id)
+            children_with_factor.append((node, node_factor))
+            for child in reversed(children_map.get(node.id, [])):
+                stack.append((child, node_factor * child.factor))
         return children_with_factor
 
 
@@ -1,14 +1,12 @@
 # pylint: disable=C0302
 import logging
 from django.db import models
-from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from apps.accounting.accountingsettings.utils.dimension_utils import DimensionUtils
 from apps.core.attachments.storages.aws.storages_backend import PublicMediaStorage
-from apps.masterdata.saledata.models.periods import Periods
 from apps.masterdata.saledata.models.inventory import WareHouse
-from apps.masterdata.saledata.utils import ProductHandler
+from apps.masterdata.saledata.utils import ProductHandler, ProductCostResolver
 from apps.shared import DataAbstractModel, SimpleAbstractModel, MasterDataAbstractModel, DisperseModel, SERIAL_STATUS
 
 
@@ -432,6 +430,9 @@ class Product(DataAbstractModel):
             tenant=self.tenant, company=self.company, product=self, warehouse=warehouse_obj
         ).exclude(trans_title='Balance init input').exists()
 
+    def get_cost_resolver(self):
+        return ProductCostResolver(self.tenant_id, self.company_id)
+
     def get_current_cost_info(self, get_type=1, **kwargs):
         """
             Hàm lấy thông tin giá cost sản phẩm
@@ -441,13 +442,9 @@ class Product(DataAbstractModel):
                 2: value
                 3: [quantity, cost, value]
                 else: 0
+            Lấy cho nhiều sản phẩm/kho: dùng ProductCostResolver (số query cố định)
         """
-        company_config = getattr(self.company, 'company_config')
-        if company_config.cost_per_warehouse and 'warehouse_id' in kwargs:
-            return self.get_cost_info_by_warehouse(kwargs.get('warehouse_id'), get_type=get_type)
-        if company_config.cost_per_project and 'sale_order_id' in kwargs:
-            return self.get_cost_info_by_project(kwargs.get('sale_order_id'), get_type=get_type)
-        return 0
+        return self.get_cost_resolver().get_current_cost_info(self.id, get_type=get_type, **kwargs)
 
     def get_cost_info_by_warehouse(self, warehouse_id, get_type=1):
         """
@@ -459,47 +456,7 @@ class Product(DataAbstractModel):
                 3: [quantity, cost, value]
                 else: 0
         """
-        this_period = Periods.get_current_period(self.tenant_id, self.company_id)
-        if this_period:
-            latest_trans = self.rp_inv_cost_product.filter(warehouse_id=warehouse_id).first()
-            company_config = getattr(self.company, 'company_config')
-            if latest_trans:
-                if company_config.definition_inventory_valuation == 0:
-                    value_list = [
-                        latest_trans.latest_log.perpetual_current_quantity,
-                        latest_trans.latest_log.perpetual_current_cost,
-                        latest_trans.latest_log.perpetual_current_value
-                    ]
-                else:
-                    opening_value_list_obj = self.report_inventory_cost_product.filter(
-                        warehouse_id=warehouse_id, period_mapped=this_period,
-                    ).first()
-                    if opening_value_list_obj:
-                        value_list = [
-                            opening_value_list_obj.opening_balance_quantity,
-                            opening_value_list_obj.opening_balance_cost,
-                            opening_value_list_obj.opening_balance_value
-                        ] if not opening_value_list_obj.periodic_closed else [
-                            opening_value_list_obj.periodic_ending_balance_quantity,
-                            opening_value_list_obj.periodic_ending_balance_cost,
-                            opening_value_list_obj.periodic_ending_balance_value
-                        ]
-                    else:
-                        value_list = [0, 0, 0]
-            else:
-                # lấy SDDK, nếu cũng không có SDDK, trả về [0, 0, 0]
-                opening_value_list_obj = self.report_inventory_cost_product.filter(
-                    warehouse_id=warehouse_id, period_mapped=this_period, for_balance_init=True
-                ).first()
-                value_list = [
-                    opening_value_list_obj.opening_balance_quantity,
-                    opening_value_list_obj.opening_balance_cost,
-                    opening_value_list_obj.opening_balance_value
-                ] if opening_value_list_obj else [0, 0, 0]
-            if get_type != 3:
-                return value_list[get_type]
-            return value_list
-        return 0
+        return self.get_cost_resolver().get_cost_info_by_warehouse(self.id, warehouse_id, get_type=get_type)
 
     def get_cost_info_by_project(self, sale_order_id, get_type=1):
         """
@@ -511,77 +468,10 @@ class Product(DataAbstractModel):
                 3: [quantity, cost, value]
                 else: 0
         """
-        this_period = Periods.get_current_period(self.tenant_id, self.company_id)
-        if this_period:
-            latest_trans = self.rp_inv_cost_product.filter(sale_order_id=sale_order_id).first()
-            company_config = getattr(self.company, 'company_config')
-            if latest_trans:
-                if company_config.definition_inventory_valuation == 0:
-                    value_list = [
-                        latest_trans.latest_log.perpetual_current_quantity,
-                        latest_trans.latest_log.perpetual_current_cost,
-                        latest_trans.latest_log.perpetual_current_value
-                    ]
-                else:
-                    opening_value_list_obj = self.report_inventory_cost_product.filter(
-                        sale_order_id=sale_order_id, period_mapped=this_period,
-                    ).first()
-                    if opening_value_list_obj:
-                        value_list = [
-                            opening_value_list_obj.opening_balance_quantity,
-                            opening_value_list_obj.opening_balance_cost,
-                            opening_value_list_obj.opening_balance_value
-                        ] if not opening_value_list_obj.periodic_closed else [
-                            opening_value_list_obj.periodic_ending_balance_quantity,
-                            opening_value_list_obj.periodic_ending_balance_cost,
-                            opening_value_list_obj.periodic_ending_balance_value
-                        ]
-                    else:
-                        value_list = [0, 0, 0]
-            else:
-                opening_value_list_obj = self.report_inventory_cost_product.filter(
-                    sale_order_id=sale_order_id, period_mapped=this_period, for_balance_init=True
-                ).first()
-                value_list = [
-                    opening_value_list_obj.opening_balance_quantity,
-                    opening_value_list_obj.opening_balance_cost,
-                    opening_value_list_obj.opening_balance_value
-                ] if opening_value_list_obj else [0, 0, 0]
-            if get_type != 3:
-                return value_list[get_type]
-            return value_list
-        return 0
+        return self.get_cost_resolver().get_cost_info_by_project(self.id, sale_order_id, get_type=get_type)
 
     def get_cost_info_of_all_warehouse(self):
-        unit_cost_list = []
-        warehouse_list = WareHouse.objects.filter_on_company()
-        this_period = Periods.get_current_period(self.tenant_id, self.company_id)
-        if this_period:
-            sub_period_order = timezone.now().month - this_period.space_month
-            company_config = getattr(self.company, 'company_config')
-            for warehouse in warehouse_list:
-                latest_trans = self.rp_inv_cost_product.filter(warehouse_id=warehouse.id).first()
-                if latest_trans:
-                    if company_config.definition_inventory_valuation == 0 and \
-                            latest_trans.latest_log.perpetual_current_quantity > 0:
-                        unit_cost_list.append({
-                            'warehouse': {'id': str(warehouse.id), 'code': warehouse.code, 'title': warehouse.title},
-                            'quantity': latest_trans.latest_log.perpetual_current_quantity,
-                            'unit_cost': latest_trans.latest_log.perpetual_current_cost,
-                            'value': latest_trans.latest_log.perpetual_current_value,
-                        })
-                else:
-                    opening_value_list_obj = self.report_inventory_cost_product.filter(
-                        warehouse_id=warehouse.id, period_mapped=this_period, sub_period_order=sub_period_order
-                    ).first()
-                    if opening_value_list_obj and opening_value_list_obj.opening_balance_quantity > 0:
-                        unit_cost_list.append({
-                            'warehouse': {'id': str(warehouse.id), 'code': warehouse.code, 'title': warehouse.title},
-                            'quantity': opening_value_list_obj.opening_balance_quantity,
-                            'unit_cost': opening_value_list_obj.opening_balance_cost,
-                            'value': opening_value_list_obj.opening_balance_value,
-                        })
-        return unit_cost_list
+        return self.get_cost_resolver().get_cost_info_of_all_warehouse(self.id)
 
     def get_product_account_deter_sub_data(self, account_deter_foreign_title, warehouse_id=None):
         """
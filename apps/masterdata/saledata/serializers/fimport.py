@@ -1,6 +1,7 @@
 import json
 from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
+from apps.accounting.accountingsettings.utils.dimension_utils import DimensionUtils
 from apps.masterdata.saledata.models import (
     Contact, Salutation, Account, Currency, AccountGroup, AccountType, Industry,
     PaymentTerm, Term, Price, UnitOfMeasureGroup, ProductType, ProductCategory, UnitOfMeasure, TaxCategory, Tax,
@@ -8,7 +9,9 @@ from apps.masterdata.saledata.models import (
 from apps.masterdata.saledata.models.accounts import ACCOUNT_TYPE_SELECTION
 from apps.masterdata.saledata.serializers.accounts import AccountCommonFunc
 from apps.shared import AccountsMsg, HrMsg, BaseMsg, PriceMsg, ProductMsg
+from apps.shared.extends.models import bulk_table_generation
 
+from apps.core.base.import_job import ImportLookupMixin, ModelImportChunkHandler
 from apps.core.base.models import Currency as BaseCurrency
 from apps.core.hr.models import Employee
 
@@ -17,22 +20,22 @@ class SaleDataCurrencyImportReturnSerializer(serializers.ModelSerializer):
         model = Currency
         fields = ('id', 'abbreviation')
 
-class SaleDataCurrencyImportSerializer(serializers.ModelSerializer):
+class SaleDataCurrencyImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     abbreviation = serializers.CharField(max_length=100)
     currency = serializers.CharField(max_length=10, allow_null=True, allow_blank=True)
     rate = serializers.FloatField(allow_null=True)
 
-    @classmethod
-    def validate_abbreviation(cls, attrs):
-        if not Currency.objects.filter_current(fill__company=True, abbreviation=attrs).exists():
+    def validate_abbreviation(self, attrs):
+        if not self.import_lookup.value_exist(
+                Currency.objects.filter_current(fill__company=True), 'abbreviation', attrs
+        ):
             return attrs
         raise serializers.ValidationError({ 'abbreviation': BaseMsg.CODE_IS_EXISTS,})
 
-    @classmethod
-    def validate_currency(cls, attrs):
+    def validate_currency(self, attrs):
         if attrs:
             try:
-                return BaseCurrency.objects.get(code=attrs)
+                return self.import_lookup.get_reference(BaseCurrency.objects.all(), attrs)
             except BaseCurrency.DoesNotExist:
                 raise serializers.ValidationError({'currency': BaseMsg.CODE_NOT_EXIST,})
         return None
@@ -52,15 +55,16 @@ class AccountGroupImportReturnSerializer(serializers.ModelSerializer):
         model = AccountGroup
         fields = ('id', 'title', 'code')
 
-class AccountGroupImportSerializer(serializers.ModelSerializer):
+class AccountGroupImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     code = serializers.CharField(max_length=100)
     title = serializers.CharField(max_length=100)
     description = serializers.CharField(max_length=200, allow_blank=True)
 
-    @classmethod
-    def validate_code(cls, value):
+    def validate_code(self, value):
         if value:
-            if AccountGroup.objects.filter_current(fill__tenant=True, fill__company=True, code=value).exists():
+            if self.import_lookup.value_exist(
+                    AccountGroup.objects.filter_current(fill__tenant=True, fill__company=True), 'code', value
+            ):
                 raise serializers.ValidationError({"code": AccountsMsg.CODE_EXIST})
             return value
         raise serializers.ValidationError({"code": AccountsMsg.CODE_NOT_NULL})
@@ -86,14 +90,15 @@ class AccountTypeImportReturnSerializer(serializers.ModelSerializer):
         model = AccountType
         fields = ('id', 'title', 'code')
 
-class AccountTypeImportSerializer(serializers.ModelSerializer):
+class AccountTypeImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     code = serializers.CharField(max_length=100)
     title = serializers.CharField(max_length=100)
 
-    @classmethod
-    def validate_code(cls, value):
+    def validate_code(self, value):
         if value:
-            if AccountType.objects.filter_current(fill__tenant=True, fill__company=True, code=value).exists():
+            if self.import_lookup.value_exist(
+                    AccountType.objects.filter_current(fill__tenant=True, fill__company=True), 'code', value
+            ):
                 raise serializers.ValidationError({"code": AccountsMsg.CODE_EXIST})
             return value
         raise serializers.ValidationError({"code": AccountsMsg.CODE_NOT_NULL})
@@ -113,13 +118,14 @@ class IndustryImportReturnSerializer(serializers.ModelSerializer):
         model = Industry
         fields = ('id', 'title', 'code')
 
-class IndustryImportSerializer(serializers.ModelSerializer):
+class IndustryImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     code = serializers.CharField(max_length=100)
 
-    @classmethod
-    def validate_code(cls, value):
+    def validate_code(self, value):
         if value:
-            if Industry.objects.filter_current(fill__tenant=True, fill__company=True, code=value).exists():
+            if self.import_lookup.value_exist(
+                    Industry.objects.filter_current(fill__tenant=True, fill__company=True), 'code', value
+            ):
                 raise serializers.ValidationError({"code": AccountsMsg.CODE_EXIST})
             return value
         raise serializers.ValidationError({"code": AccountsMsg.CODE_NOT_NULL})
@@ -267,13 +273,12 @@ class SalutationImportReturnSerializer(serializers.ModelSerializer):
         model = Salutation
         fields = ('id', 'title')
 
-class SalutationImportSerializer(serializers.ModelSerializer):
+class SalutationImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     code = serializers.CharField(max_length=100)
 
-    @classmethod
-    def validate_code(cls, value):
+    def validate_code(self, value):
         if value:
-            if Salutation.objects.filter_current(fill__company=True, code=value).exists():
+            if self.import_lookup.value_exist(Salutation.objects.filter_current(fill__company=True), 'code', value):
                 raise serializers.ValidationError({"code": BaseMsg.CODE_IS_EXISTS})
             return value
         raise serializers.ValidationError({"code": BaseMsg.REQUIRED})
@@ -672,7 +677,7 @@ class SaleDataAccountImportSerializer(serializers.ModelSerializer):
             'contact_mapped',
         )
 
-class ProductUOMGroupImportSerializer(serializers.ModelSerializer):
+class ProductUOMGroupImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     title = serializers.CharField(max_length=100)
 
     @classmethod
@@ -681,10 +686,11 @@ class ProductUOMGroupImportSerializer(serializers.ModelSerializer):
             return value
         raise serializers.ValidationError({"title": AccountsMsg.TITLE_NOT_NULL})
 
-    @classmethod
-    def validate_code(cls, value):
+    def validate_code(self, value):
         if value:
-            if UnitOfMeasureGroup.objects.filter_current(fill__tenant=True, fill__company=True, code=value).exists():
+            if self.import_lookup.value_exist(
+                    UnitOfMeasureGroup.objects.filter_current(fill__tenant=True, fill__company=True), 'code', value
+            ):
                 raise serializers.ValidationError(ProductMsg.UNIT_OF_MEASURE_GROUP_CODE_EXIST)
             return value
         raise serializers.ValidationError({"code": ProductMsg.CODE_NOT_NULL})
@@ -698,7 +704,7 @@ class ProductUOMGroupImportReturnSerializer(serializers.ModelSerializer):
         model = AccountGroup
         fields = ('id', 'code', 'title')
 
-class ProductProductTypeImportSerializer(serializers.ModelSerializer):
+class ProductProductTypeImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     code = serializers.CharField(max_length=100)
     title = serializers.CharField(max_length=100)
 
@@ -712,10 +718,11 @@ class ProductProductTypeImportSerializer(serializers.ModelSerializer):
             return value
         raise serializers.ValidationError({"title": ProductMsg.TITLE_NOT_NULL})
 
-    @classmethod
-    def validate_code(cls, value):
+    def validate_code(self, value):
         if value:
-            if ProductType.objects.filter_current(fill__tenant=True, fill__company=True, code=value).exists():
+            if self.import_lookup.value_exist(
+                    ProductType.objects.filter_current(fill__tenant=True, fill__company=True), 'code', value
+            ):
                 raise serializers.ValidationError(ProductMsg.PRODUCT_CODE_EXIST)
             return value
         raise serializers.ValidationError({"code": ProductMsg.CODE_NOT_NULL})
@@ -729,7 +736,7 @@ class ProductProductTypeImportReturnSerializer(serializers.ModelSerializer):
         model = ProductType
         fields = ('id', 'code', 'title', 'description',)
 
-class ProductProductCategoryImportSerializer(serializers.ModelSerializer):
+class ProductProductCategoryImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     code = serializers.CharField(max_length=100)
     title = serializers.CharField(max_length=100)
 
@@ -739,10 +746,11 @@ class ProductProductCategoryImportSerializer(serializers.ModelSerializer):
             return value
         raise serializers.ValidationError({"title": ProductMsg.TITLE_NOT_NULL})
 
-    @classmethod
-    def validate_code(cls, value):
+    def validate_code(self, value):
         if value:
-            if ProductCategory.objects.filter_current(fill__tenant=True, fill__company=True, code=value).exists():
+            if self.import_lookup.value_exist(
+                    ProductCategory.objects.filter_current(fill__tenant=True, fill__company=True), 'code', value
+            ):
                 raise serializers.ValidationError(ProductMsg.PRODUCT_CODE_EXIST)
             return value
         raise serializers.ValidationError({"code": ProductMsg.CODE_NOT_NULL})
@@ -755,7 +763,7 @@ class ProductProductCategoryImportReturnSerializer(serializers.ModelSerializer):
         model = ProductCategory
         fields = ('id', 'code', 'title', 'description',)
 
-class ProductUOMImportSerializer(serializers.ModelSerializer):
+class ProductUOMImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     title = serializers.CharField(max_length=100)
     group = serializers.CharField(max_length=100)
 
@@ -763,10 +771,11 @@ class ProductUOMImportSerializer(serializers.ModelSerializer):
         model = UnitOfMeasure
         fields = ('code', 'title', 'group', 'ratio', 'rounding', 'is_referenced_unit')
 
-    @classmethod
-    def validate_code(cls, value):
+    def validate_code(self, value):
         if value:
-            if UnitOfMeasure.objects.filter_current(fill__tenant=True, fill__company=True, code=value).exists():
+            if self.import_lookup.value_exist(
+                    UnitOfMeasure.objects.filter_current(fill__tenant=True, fill__company=True), 'code', value
+            ):
                 raise serializers.ValidationError(ProductMsg.UNIT_OF_MEASURE_CODE_EXIST)
             return value
         raise serializers.ValidationError({"code": ProductMsg.CODE_NOT_NULL})
@@ -777,11 +786,12 @@ class ProductUOMImportSerializer(serializers.ModelSerializer):
             return value
         raise serializers.ValidationError({"title": ProductMsg.TITLE_NOT_NULL})
 
-    @classmethod
-    def validate_group(cls, value):
+    def validate_group(self, value):
         if value:
             try:
-                return UnitOfMeasureGroup.objects.get_current(fill__company=True, code=value)
+                return self.import_lookup.get_reference(
+                    UnitOfMeasureGroup.objects.filter_current(fill__company=True), value
+                )
             except UnitOfMeasureGroup.DoesNotExist:
                 raise serializers.ValidationError({'group': ProductMsg.UOM_GROUP_NOT_EXIST})
         raise serializers.ValidationError({'group': ProductMsg.UNIT_OF_MEASURE_GROUP_NOT_NULL})
@@ -796,12 +806,12 @@ class ProductUOMImportSerializer(serializers.ModelSerializer):
         if validate_data['group'].code == 'ImportGroup':
             raise serializers.ValidationError({'group': ProductMsg.CAN_NOT_CREATE_UOM_FOR_IMPORT_GROUP})
 
-        has_referenced_unit = UnitOfMeasure.objects.filter_current(
-            fill__tenant=True, fill__company=True,
-            group=validate_data['group'], is_referenced_unit=True
-        ).exists()
-        if has_referenced_unit:
-            if validate_data.get('is_referenced_unit', None):
+        if validate_data.get('is_referenced_unit', None):
+            has_referenced_unit = self.import_lookup.value_exist(
+                UnitOfMeasure.objects.filter_current(fill__tenant=True, fill__company=True, is_referenced_unit=True),
+                'group__code', validate_data['group'].code, row_field='group'
+            )
+            if has_referenced_unit:
                 raise serializers.ValidationError({'group': ProductMsg.UNIT_OF_MEASURE_GROUP_HAD_REFERENCE})
 
         return validate_data
@@ -815,27 +825,58 @@ class ProductUOMImportSerializer(serializers.ModelSerializer):
                 uom.group.save(update_fields=['uom_reference'])
         return uom
 
+
+class ProductUOMImportChunkHandler(ModelImportChunkHandler):
+    """ Import đơn vị tính cả file: bulk_create, đồng bộ dimension (thay save()) và uom_reference của nhóm """
+
+    def check_chunk(self, validated_list: list[dict]) -> dict:
+        # mỗi nhóm chỉ 1 đơn vị tham chiếu => trong chunk giữ dòng đầu
+        errors, group_ids = super().check_chunk(validated_list), set()
+        for pos, validated_data in enumerate(validated_list):
+            if pos in errors or not validated_data.get('is_referenced_unit', None):
+                continue
+            if validated_data['group'].id in group_ids:
+                errors[pos] = {'group': ProductMsg.UNIT_OF_MEASURE_GROUP_HAD_REFERENCE}
+            group_ids.add(validated_data['group'].id)
+        return errors
+
+    def after_bulk_create(self, objs: list):
+        DimensionUtils.bulk_sync_dimension_value(
+            objs=objs, app_id=UnitOfMeasure.get_app_id(),
+            tenant_id=self.job.tenant_id, company_id=self.job.company_id,
+        )
+        groups = []
+        for uom in objs:
+            if uom.is_referenced_unit is True and uom.group:
+                uom.group.uom_reference = uom
+                groups.append(uom.group)
+        if groups:
+            UnitOfMeasureGroup.objects.bulk_update(groups, fields=['uom_reference'])
+            bulk_table_generation(UnitOfMeasureGroup, tenant_id=self.job.tenant_id, company_id=self.job.company_id)
+
 class ProductUOMImportReturnSerializer(serializers.ModelSerializer):
     class Meta:
         model = UnitOfMeasure
         fields = ('id','code','title','is_referenced_unit')
 
-class PriceTaxCategoryImportSerializer(serializers.ModelSerializer):
+class PriceTaxCategoryImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     title = serializers.CharField(max_length=100)
 
     class Meta:
         model = TaxCategory
         fields = ('code', 'title', 'description',)
 
-    @classmethod
-    def validate_title(cls, value):
-        if TaxCategory.objects.filter_current(fill__tenant=True, fill__company=True, title=value).exists():
+    def validate_title(self, value):
+        if self.import_lookup.value_exist(
+                TaxCategory.objects.filter_current(fill__tenant=True, fill__company=True), 'title', value
+        ):
             raise serializers.ValidationError({"title": PriceMsg.TITLE_EXIST})
         return value
 
-    @classmethod
-    def validate_code(cls, value):
-        if TaxCategory.objects.filter_current(fill__tenant=True, fill__company=True,code=value).exists():
+    def validate_code(self, value):
+        if self.import_lookup.value_exist(
+                TaxCategory.objects.filter_current(fill__tenant=True, fill__company=True), 'code', value
+        ):
             raise serializers.ValidationError({"code": PriceMsg.CODE_EXIST})
         return value
 
@@ -844,24 +885,24 @@ class PriceTaxCategoryImportReturnSerializer(serializers.ModelSerializer):
         model = TaxCategory
         fields = ('id', 'code', 'title', 'description', 'is_default')
 
-class PriceTaxImportSerializer(serializers.ModelSerializer):
+class PriceTaxImportSerializer(ImportLookupMixin, serializers.ModelSerializer):
     title = serializers.CharField(max_length=150)
     code = serializers.CharField(max_length=150)
     category = serializers.CharField(max_length=100)
     rate = serializers.CharField()
     tax_type = serializers.CharField()
 
-    @classmethod
-    def validate_code(cls, value):
-        if Tax.objects.filter_current(fill__tenant=True, fill__company=True, code=value).exists():
+    def validate_code(self, value):
+        if self.import_lookup.value_exist(
+                Tax.objects.filter_current(fill__tenant=True, fill__company=True), 'code', value
+        ):
             raise serializers.ValidationError({"code": PriceMsg.CODE_EXIST})
         return value
 
-    @classmethod
-    def validate_category(cls, value):
+    def validate_category(self, value):
         if value:
             try:
-                return TaxCategory.objects.get_current(fill__company=True, code=value)
+                return self.import_lookup.get_reference(TaxCategory.objects.filter_current(fill__company=True), value)
             except TaxCategory.DoesNotExist:
                 raise serializers.ValidationError({'Tax category': BaseMsg.NOT_EXIST})
         raise serializers.ValidationError({'Tax category': BaseMsg.CODE_NOT_NULL})
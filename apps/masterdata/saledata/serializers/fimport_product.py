@@ -1,6 +1,7 @@
 import logging
 from django.db import transaction
 from rest_framework import serializers
+from apps.accounting.accountingsettings.utils.dimension_utils import DimensionUtils
 from apps.masterdata.saledata.models import (
     UnitOfMeasureGroup, ProductType, ProductCategory, Manufacturer,
     Product, ProductProductType, ProductMeasurements, UnitOfMeasure, Currency, Price, ProductPriceList, Tax
@@ -9,12 +10,156 @@ from apps.masterdata.saledata.serializers import (
     ProductCommonFunction, ProductCreateSerializer
 )
 from apps.shared import ProductMsg
+from apps.shared.extends.models import bulk_table_generation
+from apps.core.base.import_job import ImportChunkHandler, ImportLookupMixin
 from apps.core.base.models import BaseItemUnit
 
 
 logger = logging.getLogger(__name__)
 
 
+class ProductImportLookup:
+    """
+    Dữ liệu tham chiếu khi validate/ghi dòng import sản phẩm.
+    Mặc định query theo từng dòng (API import từng dòng), ProductImportMapLookup nạp trước cả bảng 1 lần / job.
+    """
+
+    def code_exist(self, code) -> bool:
+        return Product.objects.filter_on_company(code=code).exists()
+
+    def get_product_types(self, codes) -> list:
+        return list(ProductType.objects.filter_current(fill__tenant=True, fill__company=True, code__in=codes))
+
+    def get_product_category(self, code):
+        try:
+            return ProductCategory.objects.get_current(fill__tenant=True, fill__company=True, code=code)
+        except ProductCategory.DoesNotExist:
+            return None
+
+    def get_manufacturer(self, code):
+        try:
+            return Manufacturer.objects.get_on_company(code=code)
+        except Manufacturer.DoesNotExist:
+            return None
+
+    def get_uom_group(self, code):
+        try:
+            return UnitOfMeasureGroup.objects.get_current(fill__tenant=True, fill__company=True, code=code)
+        except UnitOfMeasureGroup.DoesNotExist:
+            return None
+
+    def get_uom(self, code, on_company=False):
+        # on_company: bỏ qua đơn vị đã xoá (is_delete)
+        if on_company:
+            return UnitOfMeasure.objects.filter_on_company(code=code).first()
+        return UnitOfMeasure.objects.filter_current(fill__tenant=True, fill__company=True, code=code).first()
+
+    def get_tax(self, code):
+        return Tax.objects.filter_on_company(code=code).first()
+
+    def get_primary_currency(self):
+        return Currency.objects.filter_current(fill__tenant=True, fill__company=True, is_primary=True).first()
+
+    def get_base_item_unit(self, title):
+        return BaseItemUnit.objects.filter(title=title).first()
+
+    def get_default_price(self):
+        return Price.objects.filter_current(fill__tenant=True, fill__company=True, is_default=True).first()
+
+    def get_auto_update_prices(self) -> list:
+        """ Returns: [(bảng giá tự cập nhập, hệ số tích luỹ theo bảng giá cha)] """
+        return [
+            (price_list, ProductCommonFunction.get_cumulative_factor(price_list))
+            for price_list in Price.objects.filter_current(fill__tenant=True, fill__company=True, auto_update=True)
+        ]
+
+
+class ProductImportMapLookup(ProductImportLookup):
+    """
+    Import cả file: các bảng tham chiếu của công ty nạp 1 lần vào dict {code: obj},
+    mã sản phẩm đã tồn tại query 1 lần / chunk (load_code_exist)
+    """
+
+    def __init__(self, tenant_id, company_id):
+        self.tenant_id = tenant_id
+        self.company_id = company_id
+        self.code_existed = set()
+        uom_objs = list(self.filter_company(UnitOfMeasure))
+        self.maps = {
+            'product_type': self.to_map(self.filter_company(ProductType)),
+            'product_category': self.to_map(self.filter_company(ProductCategory)),
+            'manufacturer': self.to_map(self.filter_company(Manufacturer), skip_deleted=True),
+            'uom_group': self.to_map(self.filter_company(UnitOfMeasureGroup)),
+            'uom': self.to_map(uom_objs),
+            'uom_company': self.to_map(uom_objs, skip_deleted=True),
+            'tax': self.to_map(self.filter_company(Tax), skip_deleted=True),
+            'base_item_unit': {
+                title: BaseItemUnit.objects.filter(title=title).first() for title in ('volume', 'weight')
+            },
+        }
+        self.defaults = {
+            'primary_currency': self.filter_company(Currency, is_primary=True).first(),
+            'default_price': self.filter_company(Price, is_default=True).first(),
+            'auto_update_prices': [
+                (price_list, ProductCommonFunction.get_cumulative_factor(price_list))
+                for price_list in self.filter_company(Price, auto_update=True)
+            ],
+        }
+
+    def filter_company(self, model_cls, **kwargs):
+        return model_cls.objects.filter(tenant_id=self.tenant_id, company_id=self.company_id, **kwargs)
+
+    @classmethod
+    def to_map(cls, objs, skip_deleted=False) -> dict:
+        # trùng mã => lấy bản ghi đầu tiên theo ordering của model như .first()
+        result = {}
+        for obj in objs:
+            if not (skip_deleted and getattr(obj, 'is_delete', False)):
+                result.setdefault(obj.code, obj)
+        return result
+
+    def load_code_exist(self, codes):
+        self.code_existed = set(
+            self.filter_company(Product, is_delete=False, code__in=[code for code in codes if code]).values_list(
+                'code', flat=True
+            )
+        )
+
+    def code_exist(self, code) -> bool:
+        return code in self.code_existed
+
+    def get_product_types(self, codes) -> list:
+        product_type_map = self.maps['product_type']
+        return [product_type_map[code] for code in dict.fromkeys(codes) if code in product_type_map]
+
+    def get_product_category(self, code):
+        return self.maps['product_category'].get(code, None)
+
+    def get_manufacturer(self, code):
+        return self.maps['manufacturer'].get(code, None)
+
+    def get_uom_group(self, code):
+        return self.maps['uom_group'].get(code, None)
+
+    def get_uom(self, code, on_company=False):
+        return self.maps['uom_company' if on_company else 'uom'].get(code, None)
+
+    def get_tax(self, code):
+        return self.maps['tax'].get(code, None)
+
+    def get_primary_currency(self):
+        return self.defaults['primary_currency']
+
+    def get_base_item_unit(self, title):
+        return self.maps['base_item_unit'].get(title, None)
+
+    def get_default_price(self):
+        return self.defaults['default_price']
+
+    def get_auto_update_prices(self) -> list:
+        return self.defaults['auto_update_prices']
+
+
 class ProductImportCreateSerializer(serializers.ModelSerializer):
     code = serializers.CharField(max_length=150)
     description = serializers.CharField(required=False, allow_null=True, allow_blank=True)
@@ -60,59 +205,59 @@ class ProductImportCreateSerializer(serializers.ModelSerializer):
             'purchase_default_uom', 'purchase_tax', 'supplied_by',
         )
 
-    @classmethod
-    def validate_code(cls, value):
-        return ProductCreateSerializer.validate_code(value)
+    @property
+    def import_lookup(self) -> ProductImportLookup:
+        # import cả file truyền lookup đã nạp sẵn qua context, API import từng dòng query theo từng dòng
+        return self.context.get('import_lookup', None) or ProductImportLookup()
+
+    def validate_code(self, value):
+        if value and self.import_lookup.code_exist(value):
+            raise serializers.ValidationError({"code": ProductMsg.CODE_EXIST})
+        return value if value else ProductCreateSerializer.validate_code(value)
 
     @classmethod
     def validate_product_choice(cls, value):
         return ProductCreateSerializer.validate_product_choice(value)
 
-    @classmethod
-    def validate_general_product_types_mapped(cls, value):
+    def validate_general_product_types_mapped(self, value):
         if value:
             codes = list(filter(None, [item.strip() for item in value.split(",")]))
-            objs = ProductType.objects.filter_current(fill__tenant=True, fill__company=True, code__in=codes)
-            if len(codes) == objs.count():
-                return list(objs)
+            objs = self.import_lookup.get_product_types(codes)
+            if len(codes) == len(objs):
+                return objs
             raise serializers.ValidationError({'general_product_types_mapped': ProductMsg.PRODUCT_TYPE_NOT_EXIST})
         raise serializers.ValidationError({'general_product_types_mapped': ProductMsg.PRODUCT_TYPE_NOT_NULL})
 
-    @classmethod
-    def validate_general_product_category(cls, value):
+    def validate_general_product_category(self, value):
         if value:
-            try:
-                return ProductCategory.objects.get_current(fill__tenant=True, fill__company=True, code=value)
-            except ProductCategory.DoesNotExist:
-                raise serializers.ValidationError({'general_product_category': ProductMsg.PRODUCT_CATEGORY_NOT_EXIST})
+            obj = self.import_lookup.get_product_category(value)
+            if obj:
+                return obj
+            raise serializers.ValidationError({'general_product_category': ProductMsg.PRODUCT_CATEGORY_NOT_EXIST})
         raise serializers.ValidationError({'general_product_category': ProductMsg.PRODUCT_CATEGORY_NOT_NULL})
 
-    @classmethod
-    def validate_general_manufacturer(cls, value):
+    def validate_general_manufacturer(self, value):
         if value:
-            try:
-                return Manufacturer.objects.get_on_company(code=value)
-            except Manufacturer.DoesNotExist:
-                raise serializers.ValidationError({'manufacturer': ProductMsg.MANUFACTURER_DOES_NOT_EXIST})
+            obj = self.import_lookup.get_manufacturer(value)
+            if obj:
+                return obj
+            raise serializers.ValidationError({'manufacturer': ProductMsg.MANUFACTURER_DOES_NOT_EXIST})
         return None
 
-    @classmethod
-    def validate_general_uom_group(cls, value):
+    def validate_general_uom_group(self, value):
         if value:
-            try:
-                return UnitOfMeasureGroup.objects.get_current(fill__tenant=True, fill__company=True, code=value)
-            except UnitOfMeasureGroup.DoesNotExist:
-                raise serializers.ValidationError({'general_uom_group': ProductMsg.UOM_GROUP_NOT_EXIST})
+            obj = self.import_lookup.get_uom_group(value)
+            if obj:
+                return obj
+            raise serializers.ValidationError({'general_uom_group': ProductMsg.UOM_GROUP_NOT_EXIST})
         raise serializers.ValidationError({'general_uom_group': ProductMsg.UOM_GROUP_NOT_NULL})
 
-    @classmethod
-    def validate_sale_tab_data(cls, product_choice, validate_data):# pylint: disable=R0912
+    def validate_sale_tab_data(self, product_choice, validate_data):# pylint: disable=R0912
         if 0 in product_choice:
             # valid sale_default_uom
             if not validate_data.get('sale_default_uom'):
                 raise serializers.ValidationError({'sale_default_uom': ProductMsg.UOM_NOT_NULL})
-            sale_default_uom = UnitOfMeasure.objects.filter_on_company(
-                code=validate_data.get('sale_default_uom')).first()
+            sale_default_uom = self.import_lookup.get_uom(validate_data.get('sale_default_uom'), on_company=True)
 
             if not sale_default_uom:
                 raise serializers.ValidationError({'sale_default_uom': ProductMsg.UOM_NOT_EXIST})
@@ -120,7 +265,7 @@ class ProductImportCreateSerializer(serializers.ModelSerializer):
             # valid sale_tax
             if not validate_data.get('sale_tax'):
                 raise serializers.ValidationError({'sale_tax': ProductMsg.TAX_NOT_NULL})
-            sale_tax = Tax.objects.filter_on_company(code=validate_data.get('sale_tax')).first()
+            sale_tax = self.import_lookup.get_tax(validate_data.get('sale_tax'))
             if not sale_tax:
                 raise serializers.ValidationError({'sale_tax': ProductMsg.TAX_NOT_EXIST})
             validate_data['sale_tax'] = sale_tax
@@ -140,9 +285,7 @@ class ProductImportCreateSerializer(serializers.ModelSerializer):
             validate_data['sale_general_price'] = sale_general_price
 
             # find sale_currency_using
-            sale_currency_using = Currency.objects.filter_current(
-                fill__tenant=True, fill__company=True, is_primary=True
-            ).first()
+            sale_currency_using = self.import_lookup.get_primary_currency()
             if sale_currency_using:
                 validate_data['sale_currency_using'] = sale_currency_using
             else:
@@ -156,15 +299,12 @@ class ProductImportCreateSerializer(serializers.ModelSerializer):
             validate_data['sale_general_price'] = 0
         return validate_data
 
-    @classmethod
-    def validate_inventory_tab_data(cls, product_choice, validate_data):
+    def validate_inventory_tab_data(self, product_choice, validate_data):
         if 1 in product_choice:
             # valid inventory_uom
             if not validate_data.get('inventory_uom'):
                 raise serializers.ValidationError({'inventory_uom': ProductMsg.UOM_NOT_NULL})
-            inventory_uom = UnitOfMeasure.objects.filter_current(
-                fill__tenant=True, fill__company=True, code=validate_data.get('inventory_uom')
-            ).first()
+            inventory_uom = self.import_lookup.get_uom(validate_data.get('inventory_uom'))
             if not inventory_uom:
                 raise serializers.ValidationError({'inventory_uom': ProductMsg.UOM_NOT_EXIST})
             validate_data['inventory_uom'] = inventory_uom
@@ -200,15 +340,12 @@ class ProductImportCreateSerializer(serializers.ModelSerializer):
             validate_data['standard_price'] = 0
         return validate_data
 
-    @classmethod
-    def validate_purchase_tab_data(cls, product_choice, validate_data):
+    def validate_purchase_tab_data(self, product_choice, validate_data):
         if 2 in product_choice:
             # valid purchase_default_uom
             if not validate_data.get('purchase_default_uom'):
                 raise serializers.ValidationError({'purchase_default_uom': ProductMsg.UOM_NOT_NULL})
-            purchase_default_uom = UnitOfMeasure.objects.filter_current(
-                fill__tenant=True, fill__company=True, code=validate_data.get('purchase_default_uom')
-            ).first()
+            purchase_default_uom = self.import_lookup.get_uom(validate_data.get('purchase_default_uom'))
             if not purchase_default_uom:
                 raise serializers.ValidationError({'purchase_default_uom': ProductMsg.UOM_NOT_EXIST})
             validate_data['purchase_default_uom'] = purchase_default_uom
@@ -217,7 +354,7 @@ class ProductImportCreateSerializer(serializers.ModelSerializer):
             # valid purchase_tax
             if not validate_data.get('purchase_tax'):
                 raise serializers.ValidationError({'purchase_tax': ProductMsg.TAX_NOT_NULL})
-            purchase_tax = Tax.objects.filter_on_company( code=validate_data.get('purchase_tax')).first()
+            purchase_tax = self.import_lookup.get_tax(validate_data.get('purchase_tax'))
             if not purchase_tax:
                 raise serializers.ValidationError({'purchase_tax': ProductMsg.TAX_NOT_EXIST})
             validate_data['purchase_tax'] = purchase_tax
@@ -259,114 +396,161 @@ class ProductImportCreateSerializer(serializers.ModelSerializer):
 
         return validate_data
 
-    def create(self, validated_data): # pylint: disable=R0914
+    @classmethod
+    def parse_measure(cls, validated_data, lookup: ProductImportLookup):
+        # volume/weight => object theo BaseItemUnit, model không cho null
+        for title in ('volume', 'weight'):
+            unit_obj = lookup.get_base_item_unit(title)
+            if unit_obj and validated_data.get(title):
+                validated_data[title] = {
+                    'id': str(unit_obj.id),
+                    'title': unit_obj.title,
+                    'measure': unit_obj.measure,
+                    'value': validated_data.get(title)
+                }
+            if validated_data[title] is None:
+                validated_data[title] = {}
+        return validated_data
+
+    @classmethod
+    def get_measurement_objs(cls, product, validated_data) -> list:
+        # create only if id in volume/weight and value is not None
+        result = []
+        for title in ('volume', 'weight'):
+            measure_data = validated_data.get(title, {})
+            if 'id' in measure_data and measure_data.get('value') is not None:
+                result.append(ProductMeasurements(
+                    product=product, measure_id=measure_data.get('id'), value=measure_data.get('value')
+                ))
+        return result
+
+    @classmethod
+    def get_price_list_objs(cls, product, validated_data, sale_general_price, lookup: ProductImportLookup) -> list:
+        # giá bán chung => bảng giá mặc định + các bảng giá tự cập nhập (nhân hệ số tích luỹ)
+        default_pr = lookup.get_default_price() if 0 in validated_data.get('product_choice', []) else None
+        if not default_pr:
+            return []
+        prod_price_bulk_info = [ProductPriceList(
+            product=product,
+            price_list_id=default_pr.id,
+            price=sale_general_price,
+            currency_using=validated_data.get('sale_currency_using'),
+            uom_using=validated_data.get('sale_default_uom'),
+            uom_group_using=validated_data.get('general_uom_group'),
+            get_price_from_source=False
+        )]
+        for price_list, cumulative_factor in lookup.get_auto_update_prices():
+            prod_price_bulk_info.append(ProductPriceList(
+                product=product,
+                price_list=price_list,
+                price=float(sale_general_price * cumulative_factor),
+                currency_using=validated_data.get('sale_currency_using'),
+                uom_using=validated_data.get('sale_default_uom'),
+                uom_group_using=validated_data.get('general_uom_group'),
+                get_price_from_source=True
+            ))
+        return prod_price_bulk_info
+
+    def create(self, validated_data):
+        lookup = self.import_lookup
         try:
             with transaction.atomic():
-                # create volume object
-                volume_obj = BaseItemUnit.objects.filter(title='volume')
-                if volume_obj and validated_data.get('volume'):
-                    volume_obj = volume_obj.first()
-                    validated_data['volume'] = {
-                        'id': str(volume_obj.id),
-                        'title': volume_obj.title,
-                        'measure': volume_obj.measure,
-                        'value': validated_data.get('volume')
-                    }
-                # create weight object
-                weight_obj = BaseItemUnit.objects.filter(title='weight')
-                if weight_obj and validated_data.get('weight'):
-                    weight_obj = weight_obj.first()
-                    validated_data['weight'] = {
-                        'id': str(weight_obj.id),
-                        'title': weight_obj.title,
-                        'measure': weight_obj.measure,
-                        'value': validated_data.get('weight')
-                    }
-                # get all price list by company that are auto updated
+                validated_data = self.parse_measure(validated_data, lookup)
                 sale_general_price = validated_data.pop('sale_general_price', 0)
                 general_product_types_mapped_list = validated_data.pop('general_product_types_mapped', [])
-
-                # create
-                # volume and weight not allow null in model
-                if validated_data['volume'] is None:
-                    validated_data['volume'] = {}
-                if validated_data['weight'] is None:
-                    validated_data['weight'] = {}
                 product = Product.objects.create(**validated_data)
 
-                # create product_measurements
-                if 'volume' in validated_data and 'weight' in validated_data:
-                    measure_data = {
-                        'weight': validated_data.get('weight', {}),
-                        'volume': validated_data.get('volume', {})
-                    }
-                    # create only if id in volume and value in volume is not None
-                    if all([
-                        'id' in measure_data.get('volume', {}),
-                        measure_data.get('volume', {}).get('value') is not None
-                    ]):
-                        ProductMeasurements.objects.create(
-                            product=product,
-                            measure_id=measure_data.get('volume', {}).get('id'),
-                            value=measure_data.get('volume', {}).get('value')
-                        )
-                    if all([
-                        'id' in measure_data.get('weight', {}),
-                        measure_data.get('weight', {}).get('value') is not None
-                    ]):
-                        ProductMeasurements.objects.create(
-                            product=product,
-                            measure_id=measure_data.get('weight', {}).get('id'),
-                            value=measure_data.get('weight', {}).get('value')
-                        )
+                ProductMeasurements.objects.bulk_create(self.get_measurement_objs(product, validated_data))
 
                 # add data to table ProductProductType
-                bulk_info = []
-                for item in general_product_types_mapped_list:
-                    bulk_info.append(ProductProductType(product=product, product_type=item))
                 ProductProductType.objects.filter(product=product).delete()
-                ProductProductType.objects.bulk_create(bulk_info)
+                ProductProductType.objects.bulk_create([
+                    ProductProductType(product=product, product_type=item) for item in general_product_types_mapped_list
+                ])
 
                 # create price list
-                if 0 in validated_data.get('product_choice', []):
-                    prod_price_bulk_info = []
-                    default_pr = Price.objects.filter_current(
-                        fill__tenant=True, fill__company=True, is_default=True
-                    ).first()
-                    if default_pr:
-                        prod_price_bulk_info.append(ProductPriceList(
-                            product=product,
-                            price_list_id=default_pr.id,
-                            price=sale_general_price,
-                            currency_using=validated_data.get('sale_currency_using'),
-                            uom_using=validated_data.get('sale_default_uom'),
-                            uom_group_using=validated_data.get('general_uom_group'),
-                            get_price_from_source=False
-                        ))
-                        sale_product_price_list = Price.objects.filter_current(
-                            fill__tenant=True, fill__company=True, auto_update=True
-                        )
-                        for price_list in sale_product_price_list:
-                            cumulative_factor = ProductCommonFunction.get_cumulative_factor(price_list)
-                            price = sale_general_price * cumulative_factor
-                            prod_price_bulk_info.append(ProductPriceList(
-                                product=product,
-                                price_list=price_list,
-                                price=float(price),
-                                currency_using=validated_data.get('sale_currency_using'),
-                                uom_using=validated_data.get('sale_default_uom'),
-                                uom_group_using=validated_data.get('general_uom_group'),
-                                get_price_from_source=True
-                            ))
-                        product.sale_price = sale_general_price
-                        product.save()
-                        ProductPriceList.objects.bulk_create(prod_price_bulk_info)
+                prod_price_bulk_info = self.get_price_list_objs(product, validated_data, sale_general_price, lookup)
+                if prod_price_bulk_info:
+                    product.sale_price = sale_general_price
+                    product.save()
+                    ProductPriceList.objects.bulk_create(prod_price_bulk_info)
 
         except Exception as err:
             logger.error(msg=f'Import product errors: {str(err)}')
             raise serializers.ValidationError({'import_product_error': err})
         return product
 
+    @classmethod
+    def bulk_create_many(cls, validated_list: list[dict], extras: dict, lookup: ProductImportLookup) -> list:
+        """
+        Ghi nhiều dòng đã validate (import cả file): mỗi bảng 1 lần bulk_create thay vì vài query / dòng.
+        bulk_create không gọi save()/signal => tự đồng bộ DimensionValue và làm mới cache các bảng đã ghi.
+        """
+        product_objs, measurement_objs, product_type_objs, price_objs = [], [], [], []
+        for validated_data in validated_list:
+            validated_data = cls.parse_measure({**validated_data, **extras}, lookup)
+            sale_general_price = validated_data.pop('sale_general_price', 0)
+            general_product_types_mapped_list = validated_data.pop('general_product_types_mapped', [])
+            product = Product(**validated_data)
+            prod_price_bulk_info = cls.get_price_list_objs(product, validated_data, sale_general_price, lookup)
+            if prod_price_bulk_info:
+                product.sale_price = sale_general_price
+            product_objs.append(product)
+            measurement_objs += cls.get_measurement_objs(product, validated_data)
+            product_type_objs += [
+                ProductProductType(product=product, product_type=item) for item in general_product_types_mapped_list
+            ]
+            price_objs += prod_price_bulk_info
+
+        Product.objects.bulk_create(product_objs)
+        ProductMeasurements.objects.bulk_create(measurement_objs)
+        ProductProductType.objects.bulk_create(product_type_objs)
+        ProductPriceList.objects.bulk_create(price_objs)
+        if product_objs:
+            DimensionUtils.bulk_sync_dimension_value(
+                objs=product_objs, app_id=Product.get_app_id(),
+                tenant_id=product_objs[0].tenant_id, company_id=product_objs[0].company_id,
+            )
+            bulk_table_generation(
+                Product, ProductMeasurements, ProductProductType, ProductPriceList,
+                tenant_id=product_objs[0].tenant_id, company_id=product_objs[0].company_id,
+            )
+        return product_objs
+
+
+class ProductImportChunkHandler(ImportChunkHandler):
+    """ Import sản phẩm cả file: bảng tham chiếu nạp 1 lần / job (ProductImportMapLookup), ghi bằng bulk_create """
+
+    def prefetch(self):
+        self.context['import_lookup'] = ProductImportMapLookup(
+            tenant_id=self.job.tenant_id, company_id=self.job.company_id
+        )
+
+    def parse_row(self, row: dict) -> dict:
+        # product_choice trong file: "0,1,2"
+        row = super().parse_row(row)
+        value = row.get('product_choice', None)
+        if isinstance(value, str):
+            row['product_choice'] = [item.strip() for item in value.strip('[]').split(',') if item.strip()]
+        return row
+
+    def prepare_chunk(self, rows: list[dict]):
+        self.context['import_lookup'].load_code_exist([row.get('code', None) for row in rows])
+
+    def check_chunk(self, validated_list: list[dict]) -> dict:
+        # trùng mã trong cùng chunk => giữ dòng đầu (các chunk trước đã ghi, được kiểm tra qua load_code_exist)
+        errors, codes = {}, set()
+        for pos, validated_data in enumerate(validated_list):
+            if validated_data['code'] in codes:
+                errors[pos] = {'code': ProductMsg.CODE_EXIST}
+            codes.add(validated_data['code'])
+        return errors
+
+    def write_chunk(self, validated_list: list[dict]) -> list:
+        return ProductImportCreateSerializer.bulk_create_many(
+            validated_list, extras=self.extras, lookup=self.context['import_lookup']
+        )
+
 
 class ProductImportDetailSerializer(serializers.Serializer):
     class Meta:
@@ -374,7 +558,7 @@ class ProductImportDetailSerializer(serializers.Serializer):
         fields = ('id',)
 
 
-class ProductManufacturerImportCreateSerializer(serializers.ModelSerializer):
+class ProductManufacturerImportCreateSerializer(ImportLookupMixin, serializers.ModelSerializer):
     code = serializers.CharField(max_length=100)
     title = serializers.CharField(max_length=100)
 
@@ -388,10 +572,9 @@ class ProductManufacturerImportCreateSerializer(serializers.ModelSerializer):
             return value
         raise serializers.ValidationError({"title": ProductMsg.TITLE_NOT_NULL})
 
-    @classmethod
-    def validate_code(cls, value):
+    def validate_code(self, value):
         if value:
-            if Manufacturer.objects.filter_on_company(code=value).exists():
+            if self.import_lookup.value_exist(Manufacturer.objects.filter_on_company(), 'code', value):
                 raise serializers.ValidationError(ProductMsg.CODE_EXIST)
             return value
         raise serializers.ValidationError({"code": ProductMsg.CODE_NOT_NULL})
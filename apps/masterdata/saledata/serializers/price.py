@@ -7,6 +7,7 @@ from apps.masterdata.saledata.models.price import (
     Currency, Price, ProductPriceList, PriceListCurrency
 )
 from apps.masterdata.saledata.models.product import ExpensePrice, Expense
+from apps.masterdata.saledata.tasks import call_price_list_cascade
 from apps.shared import PriceMsg, ProductMsg
 
 
@@ -309,68 +310,8 @@ class PriceUpdateSerializer(serializers.ModelSerializer):
 
     @classmethod
     def update_price_list_item(cls, price_list_obj):
-        if price_list_obj.price_list_type == 0:
-            root_price_list_item = ProductPriceList.objects.filter(
-                price_list=price_list_obj.price_list_mapped
-            ).select_related('product', 'uom_using', 'currency_using')
-            for item in ProductPriceList.objects.filter(price_list=price_list_obj, get_price_from_source=True):
-                root_item = root_price_list_item.filter(
-                    product=item.product, uom_using=item.uom_using, currency_using=item.currency_using
-                ).first()
-                if root_item:
-                    item.price = root_item.price * price_list_obj.factor
-                    item.save(update_fields=['price'])
-            cls.update_child_price_list_for_sale(price_list_obj)
-        else:
-            root_price_list_item = ExpensePrice.objects.filter(
-                price=price_list_obj.price_list_mapped
-            ).select_related('expense', 'uom', 'currency')
-            for item in ExpensePrice.objects.filter(price=price_list_obj, is_auto_update=True):
-                root_item = root_price_list_item.filter(
-                    expense=item.expense, uom=item.uom, currency=item.currency
-                ).first()
-                if root_item:
-                    item.price_value = root_item.price_value * price_list_obj.factor
-                    item.save(update_fields=['price_value'])
-            cls.update_child_price_list_for_expense(price_list_obj)
-        return True
-
-    @classmethod
-    def update_child_price_list_for_sale(cls, price_list_obj):
-        bulk_data = []
-        for child_obj, child_factor in Price.get_children(price_list_obj):
-            if child_obj != price_list_obj and child_obj.auto_update:
-                ProductPriceList.objects.filter(price_list=child_obj).delete()
-                for item in ProductPriceList.objects.filter(price_list=price_list_obj):
-                    bulk_data.append(ProductPriceList(
-                        price_list=child_obj,
-                        product=item.product,
-                        uom_using=item.uom_using,
-                        uom_group_using=item.uom_group_using,
-                        currency_using=item.currency_using,
-                        get_price_from_source=child_obj.auto_update,
-                        price=item.price * child_factor
-                    ))
-        ProductPriceList.objects.bulk_create(bulk_data)
-        return True
-
-    @classmethod
-    def update_child_price_list_for_expense(cls, price_list_obj):
-        bulk_data = []
-        for child_obj, child_factor in Price.get_children(price_list_obj):
-            if child_obj != price_list_obj and child_obj.auto_update:
-                ExpensePrice.objects.filter(price=child_obj).delete()
-                for item in ExpensePrice.objects.filter(price=price_list_obj):
-                    bulk_data.append(ExpensePrice(
-                        price=child_obj,
-                        expense=item.expense,
-                        uom=item.uom,
-                        currency=item.currency,
-                        is_auto_update=child_obj.auto_update,
-                        price_value=item.price_value * child_factor
-                    ))
-        ExpensePrice.objects.bulk_create(bulk_data)
-        return True
+        # giá lấy từ nguồn = giá bảng giá cha * factor mới, sau đó lan truyền xuống các bảng giá con
+        return call_price_list_cascade(price_list_obj)
 
     def update(self, instance, validated_data):
         old_factor = instance.factor
@@ -384,13 +325,12 @@ class PriceUpdateSerializer(serializers.ModelSerializer):
                 instance.factor = old_factor
                 instance.save(update_fields=['factor'])
         if 'currency' in validated_data:
-            children = Price.get_children(instance)
-            bulk_data = []
-            for child_obj, _ in children:
-                PriceListCurrency.objects.filter(price=child_obj).delete()
-                for item in instance.currency:
-                    bulk_data.append(PriceListCurrency(currency_id=item, price=child_obj))
-            PriceListCurrency.objects.bulk_create(bulk_data)
+            children = [child_obj for child_obj, _ in Price.get_children(instance)]
+            PriceListCurrency.objects.filter(price__in=children).delete()
+            PriceListCurrency.objects.bulk_create([
+                PriceListCurrency(currency_id=item, price=child_obj)
+                for child_obj in children for item in instance.currency
+            ])
         return instance
 
 
@@ -470,61 +410,16 @@ class PriceListUpdateItemSerializer(serializers.ModelSerializer):  # noqa
         return validate_data
 
     def update(self, instance, validated_data):
-        if instance.price_list_type == 0:
-            self.update_price_value_product(instance, validated_data['list_item_data'])
-        else:
-            self.update_price_value_expense(instance, validated_data['list_item_data'])
+        # chỉ ghi các dòng (item, uom, currency) thay đổi ở bảng giá này và các bảng giá con
+        call_price_list_cascade(instance, list_item=[{
+            'item_id': str(item['product_obj'].id),
+            'uom_id': str(item['uom_obj'].id),
+            'currency_id': str(item['currency_obj'].id),
+            'uom_group_id': str(item['uom_group_obj'].id),
+            'price': item['price'],
+        } for item in validated_data['list_item_data']])
         return instance
 
-    @classmethod
-    def update_price_value_product(cls, instance, list_item_data):
-        children = Price.get_children(instance)
-        ProductPriceList.objects.filter(
-            price_list__in=[child_obj for child_obj, child_factor in children],
-            product__in=[item['product_obj'] for item in list_item_data],
-            uom_using__in=[item['uom_obj'] for item in list_item_data],
-            currency_using__in=[item['currency_obj'] for item in list_item_data],
-            uom_group_using__in=[item['uom_group_obj'] for item in list_item_data]
-        ).delete()
-        bulk_data = []
-        for price_list_obj, price_list_factor in children:
-            for item in list_item_data:
-                bulk_data.append(ProductPriceList(
-                    price_list=price_list_obj,
-                    product=item['product_obj'],
-                    uom_using=item['uom_obj'],
-                    currency_using=item['currency_obj'],
-                    uom_group_using=item['uom_group_obj'],
-                    get_price_from_source=price_list_obj.auto_update,
-                    price=item['price'] * price_list_factor,
-                ))
-        ProductPriceList.objects.bulk_create(bulk_data)
-        return True
-
-    @classmethod
-    def update_price_value_expense(cls, instance, list_item_data):
-        children = Price.get_children(instance)
-        ExpensePrice.objects.filter(
-            price__in=[child_obj for child_obj, child_factor in children],
-            expense__in=[item['product_obj'] for item in list_item_data],
-            uom__in=[item['uom_obj'] for item in list_item_data],
-            currency__in=[item['currency_obj'] for item in list_item_data],
-        ).delete()
-
-        bulk_data = []
-        for child_obj, child_factor in children:
-            for item in list_item_data:
-                bulk_data.append(ExpensePrice(
-                    price=child_obj,
-                    expense=item['product_obj'],
-                    uom=item['uom_obj'],
-                    currency=item['currency_obj'],
-                    is_auto_update=child_obj.auto_update,
-                    price_value=item['price'] * child_factor,
-                ))
-        ExpensePrice.objects.bulk_create(bulk_data)
-        return True
-
 
 class PriceListDeleteItemSerializer(serializers.ModelSerializer):  # noqa
     item = serializers.DictField(required=True)
@@ -5,6 +5,7 @@ from apps.masterdata.saledata.models import (
     WarehouseEmployeeConfig, WarehouseEmployeeConfigDetail
 )
 from apps.masterdata.saledata.models.inventory import WarehouseShelf
+from apps.masterdata.saledata.utils import ProductCostResolver
 from apps.shared import TypeCheck
 
 
@@ -399,9 +400,10 @@ class ProductWareHouseListSerializerForGoodsTransfer(serializers.ModelSerializer
             'manufacture_date': lot.manufacture_date
         } for lot in obj.product_warehouse_lot_product_warehouse.filter(quantity_import__gt=0).order_by('lot_number')]
 
-    @classmethod
-    def get_unit_cost(cls, obj):
-        return obj.product.get_cost_info_by_warehouse(obj.warehouse_id)
+    def get_unit_cost(self, obj):
+        return ProductCostResolver.from_context(self.context, obj.product).get_cost_info_by_warehouse(
+            obj.product_id, obj.warehouse_id
+        )
 
 
 class WareHouseListSerializerForInventoryAdjustment(serializers.ModelSerializer):
@@ -0,0 +1,32 @@
+from celery import shared_task
+
+from apps.masterdata.saledata.models import Price
+from apps.masterdata.saledata.utils import PriceListCascade
+from apps.shared import call_task_background
+
+
+@shared_task
+def price_list_cascade(price_list_id, list_item=None):
+    # lan truyền giá xuống các bảng giá con (gọi từ call_price_list_cascade khi số dòng lớn)
+    price_list_obj = Price.objects.filter(id=price_list_id).first()
+    if price_list_obj:
+        return PriceListCascade(price_list_obj).run_children(list_item)
+    return False
+
+
+def call_price_list_cascade(price_list_obj, list_item=None):
+    """
+    list_item = None: factor của price_list_obj thay đổi
+    list_item = [...]: giá của các item trong price_list_obj thay đổi
+    Bảng giá nguồn cập nhật ngay, các bảng giá con chạy ngay nếu ít dòng, nhiều dòng => chạy background
+    """
+    cascade = PriceListCascade(price_list_obj)
+    row_count = cascade.run_source(list_item)
+    if not cascade.sub_children:
+        return True
+    if cascade.is_large(row_count):
+        return call_task_background(
+            my_task=price_list_cascade,
+            **{'price_list_id': str(price_list_obj.id), 'list_item': list_item}
+        )
+    return cascade.run_children(list_item)
@@ -1,12 +1,42 @@
+import datetime
 import sys
+import uuid
+from types import SimpleNamespace
+from unittest import mock
 from urllib.parse import urlencode
 
+from crum import impersonate
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from apps.core.base.import_job import ImportJobRunner
+from apps.core.base.models import BaseItemUnit, ImportJob
+from apps.core.company.models import Company, CompanyConfig
+from apps.core.hr.models import Employee
+from apps.core.tenant.models import Tenant
+from apps.masterdata.saledata.models import (
+    Account, AccountEmployee, Currency, Manufacturer, Periods, Price, Product, ProductCategory, ProductType, Tax,
+    TaxCategory, UnitOfMeasure, UnitOfMeasureGroup, WareHouse,
+)
 from apps.masterdata.saledata.models.config import PaymentTerm
-from apps.shared.extends.tests import AdvanceTestCase
-from rest_framework.test import APIClient
+from apps.masterdata.saledata.models.price import ProductPriceList
+from apps.masterdata.saledata.serializers.fimport_product import ProductImportCreateSerializer
+from apps.masterdata.saledata.tasks import call_price_list_cascade
+from apps.masterdata.saledata.utils import PriceListCascade, ProductCostResolver
+from apps.masterdata.saledata.views.accounts import AccountDDList
+from apps.masterdata.saledata.views.fimport import PriceTaxCategoryImport, PriceTaxImport, ProductUOMImport
+from apps.masterdata.saledata.views.fimport_product import ProductImportList
+from apps.sales.report.models import (
+    ReportInventoryCost, ReportInventoryCostLatestLog, ReportStock, ReportStockLog,
+)
+from apps.shared.extends.tests import AdvanceTestCase, bulk_new
+from rest_framework.test import APIClient, APIRequestFactory
 
 
 class AccountTestCase(AdvanceTestCase):
@@ -3193,3 +3223,601 @@ class ExpenseItemTestCase(AdvanceTestCase):
         self.assertEqual(str(data_changed.data['result']['expense_parent']['id']), expense1.data['result']['id'])
         self.assertEqual(data_changed.data['result']['level'], expense1.data['result']['level'] + 1)
         return response
+
+
+PRODUCT_IMPORT_ROWS = [
+    {
+        'code': 'P001', 'title': 'Product 1', 'part_number': '', 'product_choice': '0,1',
+        'general_product_category': 'CAT', 'general_product_types_mapped': 'PT1,PT2', 'general_uom_group': 'UG',
+        'general_manufacturer': 'MF', 'volume': '2.5', 'weight': '', 'sale_default_uom': 'UOM',
+        'sale_tax': 'VAT10', 'sale_general_price': '1000', 'inventory_uom': 'UOM', 'valuation_method': '1',
+        'standard_price': '800',
+    },
+    {
+        'code': 'P002', 'title': 'Product 2', 'part_number': 'X-2', 'product_choice': '2',
+        'general_product_category': 'CAT', 'general_product_types_mapped': 'PT1', 'general_uom_group': 'UG',
+        'weight': '3', 'purchase_default_uom': 'UOM', 'purchase_tax': 'VAT10', 'supplied_by': '1',
+    },
+    {
+        # nhóm sản phẩm không tồn tại
+        'code': 'P003', 'title': 'Product 3', 'part_number': '', 'product_choice': '',
+        'general_product_category': 'CAT_NONE', 'general_product_types_mapped': 'PT1', 'general_uom_group': 'UG',
+    },
+    {
+        # trùng mã trong file (khác chunk)
+        'code': 'P001', 'title': 'Product 1 again', 'part_number': '', 'product_choice': '',
+        'general_product_category': 'CAT', 'general_product_types_mapped': 'PT1', 'general_uom_group': 'UG',
+    },
+    {
+        # mã đã có trong hệ thống
+        'code': 'P_EXIST', 'title': 'Product exist', 'part_number': '', 'product_choice': '',
+        'general_product_category': 'CAT', 'general_product_types_mapped': 'PT1', 'general_uom_group': 'UG',
+    },
+    {
+        # đơn vị bán không thuộc nhóm đơn vị của sản phẩm
+        'code': 'P005', 'title': 'Product 5', 'part_number': '', 'product_choice': '0',
+        'general_product_category': 'CAT', 'general_product_types_mapped': 'PT1', 'general_uom_group': 'UG',
+        'sale_default_uom': 'UOM_OTHER', 'sale_tax': 'VAT10', 'sale_general_price': '10',
+    },
+    {
+        'code': 'P006', 'title': 'Product 6', 'part_number': '', 'product_choice': '0',
+        'general_product_category': 'CAT', 'general_product_types_mapped': 'PT2', 'general_uom_group': 'UG',
+        'sale_default_uom': 'UOM', 'sale_tax': 'VAT10', 'sale_general_price': '',
+    },
+    {
+        # trùng mã trong cùng chunk
+        'code': 'P006', 'title': 'Product 6 again', 'part_number': '', 'product_choice': '',
+        'general_product_category': 'CAT', 'general_product_types_mapped': 'PT2', 'general_uom_group': 'UG',
+    },
+]
+
+
+class ProductImportJobTestCase(TestCase):
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_IMPORT')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_IMPORT', tenant=self.tenant)
+        common = {'tenant': self.tenant, 'company': self.company}
+        self.employee = bulk_new(Employee, first_name='Import', last_name='Test', code='EMP_IMPORT', **common)
+        uom_group = bulk_new(UnitOfMeasureGroup, title='Unit', code='UG', **common)
+        bulk_new(UnitOfMeasure, title='Piece', code='UOM', group=uom_group, is_referenced_unit=True, **common)
+        bulk_new(
+            UnitOfMeasure, title='Kg', code='UOM_OTHER', **common,
+            group=bulk_new(UnitOfMeasureGroup, title='Weight', code='UG_OTHER', **common),
+        )
+        bulk_new(ProductType, title='Goods', code='PT1', **common)
+        bulk_new(ProductType, title='Service', code='PT2', **common)
+        bulk_new(ProductCategory, title='Category', code='CAT', **common)
+        bulk_new(Manufacturer, title='Manufacturer', code='MF', **common)
+        bulk_new(
+            Tax, title='VAT 10%', code='VAT10', rate=10, tax_type=2, **common,
+            category=bulk_new(TaxCategory, title='VAT', code='VAT', **common),
+        )
+        bulk_new(Currency, title='VND', code='VND', abbreviation='VND', is_primary=True, **common)
+        default_price = bulk_new(
+            Price, title='General', code='PRICE', factor=1, price_list_type=0, is_default=True, **common
+        )
+        bulk_new(
+            Price, title='Retail', code='PRICE_RETAIL', factor=1.2, price_list_type=0, auto_update=True,
+            price_list_mapped=default_price, **common
+        )
+        BaseItemUnit.objects.bulk_create([
+            BaseItemUnit(title='volume', measure='m³'), BaseItemUnit(title='weight', measure='kg'),
+        ])
+        bulk_new(Product, title='Product exist', code='P_EXIST', **common)
+        self.extras = {
+            'tenant_id': self.tenant.id, 'company_id': self.company.id, 'employee_created_id': self.employee.id,
+        }
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        return {
+            obj.code: {
+                'title': obj.title,
+                'product_choice': sorted(obj.product_choice),
+                'sale_price': obj.sale_price,
+                'standard_price': obj.standard_price,
+                'supplied_by': obj.supplied_by,
+                'volume': obj.volume.get('value', None),
+                'product_types': sorted(obj.product_product_types.values_list('product_type__code', flat=True)),
+                'measure': sorted(obj.product_measure.values_list('measure__title', 'value')),
+                'price_list': sorted(obj.product_price_product.values_list('price_list__code', 'price')),
+            } for obj in Product.objects.filter(code__startswith='P0')
+        }
+
+    def run_per_row(self, rows):
+        # giống FE gọi API import cho từng dòng
+        result = []
+        for row in rows:
+            serializer = ProductImportCreateSerializer(data=row)
+            if serializer.is_valid():
+                serializer.save(**self.extras)
+                result.append('success')
+            else:
+                result.append('error')
+        return result
+
+    def run_job(self, rows, chunk_size):
+        job = bulk_new(
+            ImportJob, import_code='ProductImportList', chunk_size=chunk_size, tenant=self.tenant,
+            company=self.company, employee_created=self.employee,
+        )
+        runner = ImportJobRunner(job=job, view_class=ProductImportList)
+        runner.handler.prefetch()
+        result = []
+        for idx in range(0, len(rows), chunk_size):
+            result += [status for status, _errors in runner.run_chunk(rows[idx:idx + chunk_size])]
+        return result
+
+    def test_job_same_as_per_row(self):
+        runner = ImportJobRunner(
+            job=ImportJob(tenant=self.tenant, company=self.company, employee_created=self.employee),
+            view_class=ProductImportList,
+        )
+        rows = [runner.handler.parse_row(row) for row in PRODUCT_IMPORT_ROWS]
+        with transaction.atomic():
+            result_per_row = self.run_per_row(rows)
+            snapshot_per_row = self.snapshot()
+            transaction.set_rollback(True)
+        self.assertEqual(self.snapshot(), {})
+
+        result_job = self.run_job(PRODUCT_IMPORT_ROWS, chunk_size=3)
+        self.assertEqual(
+            result_job, ['success', 'success', 'error', 'error', 'error', 'error', 'success', 'error']
+        )
+        self.assertEqual(result_job, result_per_row)
+        self.assertEqual(self.snapshot(), snapshot_per_row)
+        self.assertEqual(snapshot_per_row['P001']['price_list'], [('PRICE', 1000.0), ('PRICE_RETAIL', 1200.0)])
+        self.assertEqual(snapshot_per_row['P001']['measure'], [('volume', 2.5)])
+        self.assertEqual(snapshot_per_row['P002']['product_types'], ['PT1'])
+
+    def test_chunk_write_error(self):
+        # lỗi khi ghi => rollback cả chunk, các dòng hợp lệ của chunk báo lỗi
+        job = bulk_new(
+            ImportJob, import_code='ProductImportList', tenant=self.tenant, company=self.company,
+            employee_created=self.employee,
+        )
+        runner = ImportJobRunner(job=job, view_class=ProductImportList)
+        runner.handler.prefetch()
+        runner.handler.extras['employee_created_id'] = 'not-uuid'
+        result = runner.run_chunk(PRODUCT_IMPORT_ROWS[:3])
+        self.assertEqual([status for status, _errors in result], ['error', 'error', 'error'])
+        self.assertIn('detail', result[0][1])
+        self.assertIn('general_product_category', result[2][1])
+        self.assertFalse(Product.objects.filter(code__in=['P001', 'P002']).exists())
+
+
+
+class ModelImportJobTestCase(TestCase):
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_MODEL_IMPORT')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_MODEL_IMPORT', tenant=self.tenant)
+        self.common = {'tenant': self.tenant, 'company': self.company}
+        self.employee = bulk_new(Employee, first_name='Import', last_name='Test', code='EMP_MODEL', **self.common)
+        self.uom_group = bulk_new(UnitOfMeasureGroup, title='Unit', code='UG', **self.common)
+        bulk_new(UnitOfMeasure, title='Piece', code='UOM', group=self.uom_group, is_referenced_unit=True, **self.common)
+        self.uom_group_new = bulk_new(UnitOfMeasureGroup, title='Weight', code='UG_NEW', **self.common)
+        bulk_new(TaxCategory, title='VAT', code='VAT', **self.common)
+        self.user = SimpleNamespace(
+            tenant_current_id=self.tenant.id, company_current_id=self.company.id, employee_current_id=self.employee.id,
+        )
+
+    def run_job(self, view_class, rows, chunk_size):
+        job = bulk_new(
+            ImportJob, import_code=view_class.__name__, chunk_size=chunk_size, tenant=self.tenant,
+            company=self.company, employee_created=self.employee,
+        )
+        result = []
+        with impersonate(self.user):
+            runner = ImportJobRunner(job=job, view_class=view_class)
+            runner.handler.prefetch()
+            for idx in range(0, len(rows), chunk_size):
+                result += runner.run_chunk(rows[idx:idx + chunk_size])
+        return result
+
+    def test_uom_bulk_create(self):
+        rows = [
+            {'code': 'KG', 'title': 'Kg', 'group': 'UG_NEW', 'ratio': '1', 'is_referenced_unit': 'true'},
+            {'code': 'G', 'title': 'Gram', 'group': 'UG_NEW', 'ratio': '0.001', 'is_referenced_unit': 'true'},
+            {'code': 'KG', 'title': 'Kg again', 'group': 'UG_NEW', 'ratio': '1', 'is_referenced_unit': ''},
+            {'code': 'UOM', 'title': 'Piece again', 'group': 'UG', 'ratio': '1', 'is_referenced_unit': ''},
+            {'code': 'BOX', 'title': 'Box', 'group': 'UG', 'ratio': '10', 'is_referenced_unit': 'true'},
+            {'code': 'TON', 'title': 'Ton', 'group': 'UG_MISSING', 'ratio': '1000', 'is_referenced_unit': ''},
+            {'code': 'MG', 'title': 'Mg', 'group': 'UG_NEW', 'ratio': '0.000001', 'is_referenced_unit': ''},
+        ]
+        with mock.patch.object(UnitOfMeasure, 'save', autospec=True) as save_mock:
+            result = self.run_job(ProductUOMImport, rows, chunk_size=len(rows))
+        save_mock.assert_not_called()
+        self.assertEqual(
+            [status for status, _errors in result],
+            ['success', 'error', 'error', 'error', 'error', 'error', 'success'],
+        )
+        self.assertIn('group', result[1][1])
+        self.assertIn('code', result[2][1])
+        self.assertEqual(
+            sorted(UnitOfMeasure.objects.filter(group=self.uom_group_new).values_list('code', 'employee_created_id')),
+            [('KG', self.employee.id), ('MG', self.employee.id)],
+        )
+        self.uom_group_new.refresh_from_db()
+        self.assertEqual(self.uom_group_new.uom_reference.code, 'KG')
+
+    def test_existed_across_chunks(self):
+        rows = [
+            {'code': 'GTGT', 'title': 'GTGT', 'description': ''},
+            {'code': 'vat', 'title': 'VAT lower', 'description': ''},
+            {'code': 'GTGT', 'title': 'GTGT again', 'description': ''},
+            {'code': 'TTDB', 'title': 'GTGT', 'description': ''},
+            {'code': 'TTDB', 'title': 'TTDB', 'description': ''},
+        ]
+        result = self.run_job(PriceTaxCategoryImport, rows, chunk_size=2)
+        self.assertEqual(
+            [status for status, _errors in result], ['success', 'error', 'error', 'error', 'success'],
+        )
+        self.assertIn('code', result[2][1])
+        self.assertIn('title', result[3][1])
+
+        rows = [
+            {'code': 'VAT10', 'title': 'VAT 10%', 'category': 'GTGT', 'rate': '10', 'tax_type': '2'},
+            {'code': 'VAT10', 'title': 'VAT 10% again', 'category': 'VAT', 'rate': '10', 'tax_type': '2'},
+            {'code': 'VAT8', 'title': 'VAT 8%', 'category': 'MISSING', 'rate': '8', 'tax_type': '2'},
+        ]
+        result = self.run_job(PriceTaxImport, rows, chunk_size=3)
+        self.assertEqual([status for status, _errors in result], ['success', 'error', 'error'])
+        self.assertEqual(
+            list(Tax.objects.filter(company=self.company).values_list('code', 'category__code', 'rate', 'tax_type')),
+            [('VAT10', 'GTGT', 10.0, 2)],
+        )
+
+@override_settings(
+    CACHE_ENABLED=True, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class AccountListCacheTestCase(TestCase):
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_CACHE')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_CACHE', tenant=self.tenant)
+        common = {'tenant': self.tenant, 'company': self.company}
+        self.employee = bulk_new(Employee, first_name='Cache', last_name='Test', code='EMP_CACHE', **common)
+        self.account = bulk_new(Account, name='Account', code='ACC_CACHE', **common)
+
+    def get_cache_key(self):
+        view = AccountDDList()
+        view.request = Request(APIRequestFactory().get('/saledata/accounts-dd', {'employee__id': self.employee.id}))
+        view.kwargs = {}
+        return view.get_list_cache_key(
+            is_minimal=False, filter_kwargs={'tenant_id': self.tenant.id, 'company_id': self.company.id},
+        )
+
+    def test_write_invalidates_list_cache(self):
+        cache_key = self.get_cache_key()
+        AccountDDList.set_list_cache(cache_key, Response({'result': []}))
+        self.assertEqual(self.get_cache_key(), cache_key)
+        self.assertIsNotNone(AccountDDList.get_list_cache(cache_key))
+
+        # gán người quản lý cho account (bảng M2M trong cache_tables_relate) => page list đã cache hết hiệu lực
+        with self.captureOnCommitCallbacks(execute=True):
+            AccountEmployee.objects.create(account=self.account, employee=self.employee)
+        cache_key_new = self.get_cache_key()
+        self.assertNotEqual(cache_key_new, cache_key)
+        self.assertIsNone(AccountDDList.get_list_cache(cache_key_new))
+
+    def test_signals_only_for_cached_tables(self):
+        self.assertTrue(post_save.has_listeners(Account))
+        self.assertTrue(post_save.has_listeners(AccountEmployee))
+        self.assertFalse(post_save.has_listeners(Manufacturer))
+
+
+def legacy_cost_info(product, field, target_id, this_period):
+    """ cách cũ của Product.get_cost_info_by_warehouse / get_cost_info_by_project: các query .first() """
+    latest_trans = product.rp_inv_cost_product.filter(**{field: target_id}).first()
+    if latest_trans:
+        if product.company.company_config.definition_inventory_valuation == 0:
+            return [
+                latest_trans.latest_log.perpetual_current_quantity,
+                latest_trans.latest_log.perpetual_current_cost,
+                latest_trans.latest_log.perpetual_current_value
+            ]
+        obj = product.report_inventory_cost_product.filter(**{field: target_id}, period_mapped=this_period).first()
+        if not obj:
+            return [0, 0, 0]
+        if not obj.periodic_closed:
+            return [obj.opening_balance_quantity, obj.opening_balance_cost, obj.opening_balance_value]
+        return [
+            obj.periodic_ending_balance_quantity, obj.periodic_ending_balance_cost, obj.periodic_ending_balance_value
+        ]
+    obj = product.report_inventory_cost_product.filter(
+        **{field: target_id}, period_mapped=this_period, for_balance_init=True
+    ).first()
+    return [obj.opening_balance_quantity, obj.opening_balance_cost, obj.opening_balance_value] if obj else [0, 0, 0]
+
+
+def legacy_cost_info_of_all_warehouse(product, warehouse_list, this_period):
+    """ cách cũ của Product.get_cost_info_of_all_warehouse """
+    unit_cost_list = []
+    sub_period_order = timezone.now().month - this_period.space_month
+    for warehouse in warehouse_list:
+        warehouse_data = {'id': str(warehouse.id), 'code': warehouse.code, 'title': warehouse.title}
+        latest_trans = product.rp_inv_cost_product.filter(warehouse_id=warehouse.id).first()
+        if latest_trans:
+            if product.company.company_config.definition_inventory_valuation == 0 and \
+                    latest_trans.latest_log.perpetual_current_quantity > 0:
+                unit_cost_list.append({
+                    'warehouse': warehouse_data,
+                    'quantity': latest_trans.latest_log.perpetual_current_quantity,
+                    'unit_cost': latest_trans.latest_log.perpetual_current_cost,
+                    'value': latest_trans.latest_log.perpetual_current_value,
+                })
+        else:
+            obj = product.report_inventory_cost_product.filter(
+                warehouse_id=warehouse.id, period_mapped=this_period, sub_period_order=sub_period_order
+            ).first()
+            if obj and obj.opening_balance_quantity > 0:
+                unit_cost_list.append({
+                    'warehouse': warehouse_data,
+                    'quantity': obj.opening_balance_quantity,
+                    'unit_cost': obj.opening_balance_cost,
+                    'value': obj.opening_balance_value,
+                })
+    return unit_cost_list
+
+
+class ProductCostResolverTestCase(TestCase):
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_COST')
+        company = bulk_new(Company, title='Company', code='COMPANY_COST', tenant=self.tenant)
+        bulk_new(CompanyConfig, company=company)
+        self.company = Company.objects.get(id=company.id)
+        common = {'tenant': self.tenant, 'company': self.company}
+        today = timezone.now().date()
+        self.period = bulk_new(
+            Periods, title='Period', code='PERIOD', fiscal_year=today.year,
+            start_date=datetime.date(today.year, 1, 1), end_date=datetime.date(today.year, 12, 31), **common
+        )
+        self.sub_period_order = timezone.now().month
+        self.products = [
+            bulk_new(Product, title=f'Product {idx}', code=f'P{idx}', **common) for idx in range(2)
+        ]
+        self.warehouses = [
+            bulk_new(WareHouse, title=f'Warehouse {idx}', code=f'W{idx}', **common) for idx in range(3)
+        ]
+        p_1, p_2 = self.products
+        w_1, w_2, _w_3 = self.warehouses
+        # P1-W1: 2 dòng latest log (lấy dòng đầu theo id => id cố định), dòng cost đầu chưa khóa sổ
+        self.new_latest_log(p_1, w_1, 5, 10, id=uuid.UUID(int=1))
+        self.new_latest_log(p_1, w_1, 7, 20, id=uuid.UUID(int=2))
+        self.new_cost(p_1, w_1, 1, opening=(4, 8), ending=(6, 9))
+        self.new_cost(p_1, w_1, self.sub_period_order, opening=(5, 10), ending=(3, 11), periodic_closed=True)
+        # P1-W2: không có latest log => lấy SDDK, còn tồn kỳ hiện tại
+        self.new_cost(p_1, w_2, 1, opening=(2, 15), ending=(0, 0), for_balance_init=True)
+        self.new_cost(p_1, w_2, self.sub_period_order, opening=(3, 16), ending=(0, 0))
+        # P1-W3: không có dữ liệu
+        # P2-W1: hết hàng, dòng cost đầu đã khóa sổ
+        self.new_latest_log(p_2, w_1, 0, 12)
+        self.new_cost(p_2, w_1, 2, opening=(1, 12), ending=(9, 13), periodic_closed=True)
+        # P2-W2: có latest log, không có dòng cost
+        self.new_latest_log(p_2, w_2, 8, 30)
+
+    def new_latest_log(self, product, warehouse, quantity, cost, **kwargs):
+        common = {'tenant': self.tenant, 'company': self.company, 'product': product}
+        report_stock = bulk_new(
+            ReportStock, period_mapped=self.period, sub_period_order=self.sub_period_order, **common
+        )
+        log = bulk_new(
+            ReportStockLog, report_stock=report_stock, warehouse=warehouse, stock_type=1, quantity=quantity,
+            perpetual_current_quantity=quantity, perpetual_current_cost=cost,
+            perpetual_current_value=quantity * cost, **common
+        )
+        return bulk_new(ReportInventoryCostLatestLog, product=product, warehouse=warehouse, latest_log=log, **kwargs)
+
+    def new_cost(self, product, warehouse, sub_period_order, opening, ending, **kwargs):
+        return bulk_new(
+            ReportInventoryCost, tenant=self.tenant, company=self.company, product=product, warehouse=warehouse,
+            period_mapped=self.period, sub_period_order=sub_period_order,
+            opening_balance_quantity=opening[0], opening_balance_cost=opening[1],
+            opening_balance_value=opening[0] * opening[1],
+            periodic_ending_balance_quantity=ending[0], periodic_ending_balance_cost=ending[1],
+            periodic_ending_balance_value=ending[0] * ending[1], **kwargs
+        )
+
+    def assert_same_as_legacy(self):
+        resolver = ProductCostResolver(self.tenant.id, self.company.id)
+        resolver.warehouse_list = self.warehouses
+        resolver.prefetch_by_warehouse([
+            (product, warehouse) for product in self.products for warehouse in self.warehouses
+        ])
+        for product in Product.objects.filter(id__in=[obj.id for obj in self.products]).select_related('company'):
+            for warehouse in self.warehouses:
+                self.assertEqual(
+                    resolver.get_cost_info_by_warehouse(product.id, warehouse.id, get_type=3),
+                    legacy_cost_info(product, 'warehouse_id', warehouse.id, self.period),
+                    (product.code, warehouse.code),
+                )
+            self.assertEqual(
+                resolver.get_cost_info_by_project(product.id, None, get_type=3),
+                legacy_cost_info(product, 'sale_order_id', None, self.period),
+                product.code,
+            )
+            self.assertEqual(
+                resolver.get_cost_info_of_all_warehouse(product.id),
+                legacy_cost_info_of_all_warehouse(product, self.warehouses, self.period),
+                product.code,
+            )
+
+    def test_perpetual_same_as_legacy(self):
+        self.assert_same_as_legacy()
+        resolver = ProductCostResolver(self.tenant.id, self.company.id)
+        self.assertEqual(resolver.get_cost_info_by_warehouse(self.products[0].id, self.warehouses[0].id), 10)
+
+    def test_periodic_same_as_legacy(self):
+        CompanyConfig.objects.filter(company=self.company).update(definition_inventory_valuation=1)
+        self.assert_same_as_legacy()
+        resolver = ProductCostResolver(self.tenant.id, self.company.id)
+        self.assertEqual(
+            resolver.get_cost_info_by_warehouse(self.products[1].id, self.warehouses[0].id, get_type=3), [9, 13, 117]
+        )
+
+    def test_query_count(self):
+        resolver = ProductCostResolver(self.tenant.id, self.company.id)
+        # kỳ hiện tại, company config đã lấy => mỗi lần prefetch chỉ còn 2 query
+        self.assertIsNotNone(resolver.this_period)
+        self.assertEqual(resolver.definition_inventory_valuation, 0)
+        keys = [(product.id, warehouse.id) for product in self.products for warehouse in self.warehouses]
+        with self.assertNumQueries(2):
+            resolver.prefetch_by_warehouse(keys)
+            for product_id, warehouse_id in keys:
+                resolver.get_cost_info_by_warehouse(product_id, warehouse_id)
+
+
+def legacy_get_children(price_list_obj, factor=1.0):
+    """ cách cũ của Price.get_children: query theo từng cấp """
+    if price_list_obj.valid_time_end.date() and price_list_obj.valid_time_end.date() < datetime.datetime.now().date():
+        return []
+    children_with_factor = [(price_list_obj, factor)]
+    for child in Price.objects.filter(price_list_mapped=price_list_obj, valid_time_end__gt=datetime.datetime.now()):
+        children_with_factor.extend(legacy_get_children(child, factor * child.factor))
+    return children_with_factor
+
+
+def legacy_update_price_list_item(price_list_obj):
+    """ cách cũ của PriceUpdateSerializer.update_price_list_item (bảng giá sản phẩm) """
+    root_price_list_item = ProductPriceList.objects.filter(price_list=price_list_obj.price_list_mapped)
+    for item in ProductPriceList.objects.filter(price_list=price_list_obj, get_price_from_source=True):
+        root_item = root_price_list_item.filter(
+            product=item.product, uom_using=item.uom_using, currency_using=item.currency_using
+        ).first()
+        if root_item:
+            item.price = root_item.price * price_list_obj.factor
+            item.save(update_fields=['price'])
+    bulk_data = []
+    for child_obj, child_factor in legacy_get_children(price_list_obj):
+        if child_obj != price_list_obj and child_obj.auto_update:
+            ProductPriceList.objects.filter(price_list=child_obj).delete()
+            for item in ProductPriceList.objects.filter(price_list=price_list_obj):
+                bulk_data.append(ProductPriceList(
+                    price_list=child_obj, product=item.product, uom_using=item.uom_using,
+                    uom_group_using=item.uom_group_using, currency_using=item.currency_using,
+                    get_price_from_source=child_obj.auto_update, price=item.price * child_factor
+                ))
+    ProductPriceList.objects.bulk_create(bulk_data)
+
+
+def legacy_update_price_value_product(price_list_obj, list_item_data):
+    """ cách cũ của PriceListUpdateItemSerializer.update_price_value_product """
+    children = legacy_get_children(price_list_obj)
+    ProductPriceList.objects.filter(
+        price_list__in=[child_obj for child_obj, _child_factor in children],
+        product__in=[item['product_obj'] for item in list_item_data],
+        uom_using__in=[item['uom_obj'] for item in list_item_data],
+        currency_using__in=[item['currency_obj'] for item in list_item_data],
+        uom_group_using__in=[item['uom_group_obj'] for item in list_item_data]
+    ).delete()
+    ProductPriceList.objects.bulk_create([
+        ProductPriceList(
+            price_list=child_obj, product=item['product_obj'], uom_using=item['uom_obj'],
+            currency_using=item['currency_obj'], uom_group_using=item['uom_group_obj'],
+            get_price_from_source=child_obj.auto_update, price=item['price'] * child_factor,
+        ) for child_obj, child_factor in children for item in list_item_data
+    ])
+
+
+class PriceListCascadeTestCase(TestCase):
+    """ ROOT -> A (x2, lấy giá từ nguồn) -> B (x1.5, lấy giá từ nguồn), ROOT -> C (x3), A -> D (hết hạn) """
+
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_PRICE')
+        self.company = bulk_new(Company, title='Company', code='COMPANY_PRICE', tenant=self.tenant)
+        common = {'tenant': self.tenant, 'company': self.company}
+        self.uom_group = bulk_new(UnitOfMeasureGroup, title='Unit', code='UG', **common)
+        self.uom = bulk_new(UnitOfMeasure, title='Piece', code='UOM', group=self.uom_group, **common)
+        self.currency = bulk_new(Currency, title='VND', code='VND', abbreviation='VND', **common)
+        self.products = {
+            code: bulk_new(Product, title=code, code=code, **common) for code in ('P1', 'P2', 'P3')
+        }
+        valid_time_end = datetime.datetime(9999, 1, 1)
+        self.root = bulk_new(
+            Price, title='Root', code='ROOT', factor=1, price_list_type=0, valid_time_end=valid_time_end, **common
+        )
+        self.price_a = bulk_new(
+            Price, title='A', code='A', factor=2, price_list_type=0, auto_update=True, price_list_mapped=self.root,
+            valid_time_end=valid_time_end, **common
+        )
+        bulk_new(
+            Price, title='B', code='B', factor=1.5, price_list_type=0, auto_update=True,
+            price_list_mapped=self.price_a, valid_time_end=valid_time_end, **common
+        )
+        bulk_new(
+            Price, title='C', code='C', factor=3, price_list_type=0, price_list_mapped=self.root,
+            valid_time_end=valid_time_end, **common
+        )
+        bulk_new(
+            Price, title='D', code='D', factor=5, price_list_type=0, auto_update=True,
+            price_list_mapped=self.price_a, valid_time_end=datetime.datetime(2000, 1, 1), **common
+        )
+        for price_code, product_code, price, from_source in (
+                ('ROOT', 'P1', 100, False), ('ROOT', 'P2', 200, False),
+                ('A', 'P1', 200, True), ('A', 'P2', 999, True), ('A', 'P3', 50, False),
+                ('B', 'P1', 300, True), ('C', 'P1', 7, False),
+        ):
+            self.new_item(Price.objects.get(code=price_code), product_code, price, from_source)
+        self.root = Price.objects.get(id=self.root.id)
+        self.price_a = Price.objects.get(id=self.price_a.id)
+
+    def new_item(self, price_list_obj, product_code, price, from_source):
+        return bulk_new(
+            ProductPriceList, price_list=price_list_obj, product=self.products[product_code], price=price,
+            get_price_from_source=from_source, uom_using=self.uom, uom_group_using=self.uom_group,
+            currency_using=self.currency,
+        )
+
+    def snapshot(self):
+        return sorted(
+            (item.price_list.code, item.product.code, round(item.price, 6), item.get_price_from_source)
+            for item in ProductPriceList.objects.filter(
+                price_list__company=self.company
+            ).select_related('price_list', 'product')
+        )
+
+    def run_legacy(self, func, *args):
+        with transaction.atomic():
+            func(*args)
+            snapshot = self.snapshot()
+            transaction.set_rollback(True)
+        return snapshot
+
+    def test_get_children_same_as_legacy(self):
+        for price_list_obj in (self.root, self.price_a):
+            self.assertEqual(
+                [(child.id, factor) for child, factor in Price.get_children(price_list_obj)],
+                [(child.id, factor) for child, factor in legacy_get_children(price_list_obj)],
+            )
+
+    def test_factor_change_same_as_legacy(self):
+        Price.objects.filter(id=self.price_a.id).update(factor=4)
+        self.price_a = Price.objects.get(id=self.price_a.id)
+        expected = self.run_legacy(legacy_update_price_list_item, self.price_a)
+        call_price_list_cascade(self.price_a)
+        self.assertEqual(self.snapshot(), expected)
+        self.assertIn(('B', 'P3', 75.0, True), expected)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_factor_change_background_same_as_legacy(self):
+        # nhiều dòng => các bảng giá con chạy qua task price_list_cascade
+        Price.objects.filter(id=self.price_a.id).update(factor=4)
+        self.price_a = Price.objects.get(id=self.price_a.id)
+        expected = self.run_legacy(legacy_update_price_list_item, self.price_a)
+        with mock.patch.object(PriceListCascade, 'SYNC_LIMIT', 0):
+            call_price_list_cascade(self.price_a)
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_item_change_same_as_legacy(self):
+        list_item_data = [
+            {
+                'product_obj': self.products[code], 'uom_obj': self.uom, 'currency_obj': self.currency,
+                'uom_group_obj': self.uom_group, 'price': price,
+            } for code, price in (('P1', 150), ('P3', 10))
+        ]
+        expected = self.run_legacy(legacy_update_price_value_product, self.root, list_item_data)
+        call_price_list_cascade(self.root, list_item=[{
+            'item_id': str(item['product_obj'].id), 'uom_id': str(self.uom.id), 'currency_id': str(self.currency.id),
+            'uom_group_id': str(self.uom_group.id), 'price': item['price'],
+        } for item in list_item_data])
+        self.assertEqual(self.snapshot(), expected)
+        self.assertIn(('B', 'P1', 450.0, True), expected)
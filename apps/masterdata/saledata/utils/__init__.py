@@ -1 +1,3 @@
 from .logical_product import *
+from .product_cost import *
+from .price_cascade import *
@@ -0,0 +1,228 @@
+from apps.shared import DisperseModel
+
+__all__ = ['PriceListCascade']
+
+
+class PriceListCascade:
+    """
+    Lan truyền giá theo cây bảng giá (bảng giá gốc -> các bảng giá con lấy giá từ nguồn):
+        - cây bảng giá load 1 lần (Price.get_children), factor hiệu lực = tích factor trên đường đi từ bảng giá nguồn
+        - chỉ so sánh/ghi các dòng (item, uom, currency) bị ảnh hưởng: dòng đổi giá => bulk_update,
+          dòng chưa có => bulk_create, dòng không đổi giữ nguyên (không xóa rồi tạo lại như trước)
+        - số dòng cần đồng bộ > SYNC_LIMIT => phần bảng giá con chạy background
+          (saledata.tasks.call_price_list_cascade)
+    """
+    SYNC_LIMIT = 5000
+    BATCH_SIZE = 1000
+    ITEM_CONFIG = {
+        # price_list_type = 0: giá sản phẩm, còn lại: giá chi phí (giống các serializer bảng giá)
+        'product': {
+            'app_model': 'saledata.ProductPriceList',
+            'price_list': 'price_list_id',
+            'item': 'product_id',
+            'uom': 'uom_using_id',
+            'currency': 'currency_using_id',
+            'price': 'price',
+            'auto_update': 'get_price_from_source',
+            'extra': ('uom_group_using_id',),
+        },
+        'expense': {
+            'app_model': 'saledata.ExpensePrice',
+            'price_list': 'price_id',
+            'item': 'expense_id',
+            'uom': 'uom_id',
+            'currency': 'currency_id',
+            'price': 'price_value',
+            'auto_update': 'is_auto_update',
+            'extra': (),
+        },
+    }
+
+    def __init__(self, price_list_obj):
+        self.price_list_obj = price_list_obj
+        self.config = self.ITEM_CONFIG['product' if price_list_obj.price_list_type == 0 else 'expense']
+        self.item_model = DisperseModel(app_model=self.config['app_model']).get_model()
+        price_model = DisperseModel(app_model='saledata.Price').get_model()
+        self.children = price_model.get_children(price_list_obj)
+        self.sub_children = [(child, factor) for child, factor in self.children if child.id != price_list_obj.id]
+
+    def get_key(self, row):
+        # row: model instance hoặc dict
+        get_value = row.get if isinstance(row, dict) else lambda field: getattr(row, field)
+        return tuple(
+            str(get_value(self.config[field])) if get_value(self.config[field]) else None
+            for field in ('item', 'uom', 'currency')
+        )
+
+    def parse_item_data(self, item):
+        """ item: {'item_id', 'uom_id', 'currency_id', 'uom_group_id', 'price'} """
+        data = {
+            self.config['item']: item.get('item_id', None),
+            self.config['uom']: item.get('uom_id', None),
+            self.config['currency']: item.get('currency_id', None),
+            self.config['price']: float(item.get('price', 0) or 0),
+        }
+        if 'uom_group_using_id' in self.config['extra']:
+            data['uom_group_using_id'] = item.get('uom_group_id', None)
+        return data
+
+    def get_row_data(self, row, price=None, auto_update=None):
+        data = {
+            self.config[field]: getattr(row, self.config[field])
+            for field in ('item', 'uom', 'currency', 'price', 'auto_update')
+        }
+        for field in self.config['extra']:
+            data[field] = getattr(row, field)
+        if price is not None:
+            data[self.config['price']] = price
+        if auto_update is not None:
+            data[self.config['auto_update']] = auto_update
+        return data
+
+    @staticmethod
+    def is_same_value(value, new_value):
+        # id có thể là UUID hoặc str
+        if isinstance(value, (int, float, bool)) or value is None or new_value is None:
+            return value == new_value
+        return str(value) == str(new_value)
+
+    def is_large(self, row_count):
+        return row_count * len(self.sub_children) > self.SYNC_LIMIT
+
+    def get_sync_filter(self, desired, full_sync_ids):
+        filter_kwargs = {f"{self.config['price_list']}__in": list(desired.keys())}
+        if not full_sync_ids:
+            filter_kwargs[f"{self.config['item']}__in"] = list({
+                key[0] for rows in desired.values() for key in rows.keys()
+            })
+        return filter_kwargs
+
+    def set_row_data(self, row, data, update_fields):
+        """ Gán data vào row, trả về True nếu có giá trị thay đổi """
+        is_changed = False
+        for field in update_fields:
+            if field in data and not self.is_same_value(getattr(row, field), data[field]):
+                setattr(row, field, data[field])
+                is_changed = True
+        return is_changed
+
+    def compare_rows(self, desired, full_sync_ids, update_fields):
+        """
+        So sánh các dòng hiện có với dữ liệu mong muốn
+        Returns: (remaining: các dòng cần tạo mới, update_rows, delete_ids)
+        """
+        remaining = {price_list_id: dict(rows) for price_list_id, rows in desired.items()}
+        seen = set()
+        update_rows, delete_ids = [], []
+        for row in self.item_model.objects.filter(**self.get_sync_filter(desired, full_sync_ids)):
+            price_list_id = str(getattr(row, self.config['price_list']))
+            key = self.get_key(row)
+            if (price_list_id, key) in seen:
+                # dòng trùng (item, uom, currency) trong cùng bảng giá
+                if key in desired.get(price_list_id, {}) or price_list_id in full_sync_ids:
+                    delete_ids.append(row.id)
+                continue
+            seen.add((price_list_id, key))
+            data = remaining.get(price_list_id, {}).pop(key, None)
+            if data is None:
+                if price_list_id in full_sync_ids:
+                    delete_ids.append(row.id)
+            elif self.set_row_data(row, data, update_fields):
+                update_rows.append(row)
+        return remaining, update_rows, delete_ids
+
+    def sync(self, desired, full_sync_ids=()):
+        """
+        Đồng bộ dòng giá của nhiều bảng giá bằng số query cố định
+        * param 'desired': {price_list_id: {key: data}}
+        * param 'full_sync_ids': các bảng giá đồng bộ toàn bộ => xóa dòng không có trong desired
+        Returns: {'updated': int, 'created': int, 'deleted': int}
+        """
+        if not desired:
+            return {'updated': 0, 'created': 0, 'deleted': 0}
+        full_sync_ids = {str(price_list_id) for price_list_id in full_sync_ids}
+        update_fields = {self.config['price'], self.config['auto_update'], *self.config['extra']}
+        remaining, update_rows, delete_ids = self.compare_rows(desired, full_sync_ids, update_fields)
+
+        create_rows = [
+            self.item_model(**{self.config['price_list']: price_list_id, **data})
+            for price_list_id, rows in remaining.items() for data in rows.values()
+        ]
+        if update_rows:
+            self.item_model.objects.bulk_update(update_rows, fields=list(update_fields), batch_size=self.BATCH_SIZE)
+        if create_rows:
+            self.item_model.objects.bulk_create(create_rows, batch_size=self.BATCH_SIZE)
+        if delete_ids:
+            self.item_model.objects.filter(id__in=delete_ids).delete()
+        return {'updated': len(update_rows), 'created': len(create_rows), 'deleted': len(delete_ids)}
+
+    def cascade_items(self, list_item, children=None):
+        """
+        Giá của các item đổi ở bảng giá nguồn => ghi giá * factor xuống bảng giá nguồn và các bảng giá con
+        (chỉ các dòng (item, uom, currency) này)
+        """
+        desired = {}
+        for child_obj, child_factor in (self.children if children is None else children):
+            rows = desired.setdefault(str(child_obj.id), {})
+            for item in list_item:
+                data = self.parse_item_data(item)
+                data[self.config['price']] = data[self.config['price']] * child_factor
+                data[self.config['auto_update']] = child_obj.auto_update
+                rows[self.get_key(data)] = data
+        return self.sync(desired)
+
+    def update_from_parent(self):
+        """ Các dòng lấy giá từ nguồn của bảng giá này = giá bảng giá cha * factor """
+        price_list_obj = self.price_list_obj
+        parent_rows = {}
+        for row in self.item_model.objects.filter(
+                **{self.config['price_list']: price_list_obj.price_list_mapped_id}
+        ):
+            parent_rows.setdefault(self.get_key(row), row)
+        desired = {}
+        for row in self.item_model.objects.filter(
+                **{self.config['price_list']: price_list_obj.id, self.config['auto_update']: True}
+        ):
+            parent_row = parent_rows.get(self.get_key(row), None)
+            if parent_row:
+                desired[self.get_key(row)] = self.get_row_data(
+                    row, price=getattr(parent_row, self.config['price']) * price_list_obj.factor
+                )
+        return self.sync({str(price_list_obj.id): desired} if desired else {})
+
+    def cascade_all(self):
+        """
+        Đồng bộ toàn bộ dòng giá của các bảng giá con auto_update theo bảng giá này (giá * factor tích lũy),
+        dòng không còn ở bảng giá nguồn sẽ bị xóa
+        """
+        source_rows = {}
+        for row in self.item_model.objects.filter(
+                **{self.config['price_list']: self.price_list_obj.id}
+        ):
+            source_rows.setdefault(self.get_key(row), row)
+        desired = {}
+        for child_obj, child_factor in self.sub_children:
+            if child_obj.auto_update:
+                desired[str(child_obj.id)] = {
+                    key: self.get_row_data(
+                        row, price=getattr(row, self.config['price']) * child_factor, auto_update=True
+                    ) for key, row in source_rows.items()
+                }
+        return self.sync(desired, full_sync_ids=desired.keys())
+
+    def run_source(self, list_item=None):
+        """
+        list_item = None: factor của bảng giá thay đổi => cập nhật các dòng lấy giá từ nguồn
+        list_item = [...]: giá của các item trong bảng giá thay đổi
+        Returns: số dòng cần lan truyền xuống mỗi bảng giá con
+        """
+        if list_item is None:
+            self.update_from_parent()
+            return self.item_model.objects.filter(**{self.config['price_list']: self.price_list_obj.id}).count()
+        self.cascade_items(list_item, children=[(self.price_list_obj, 1.0)])
+        return len(list_item)
+
+    def run_children(self, list_item=None):
+        if list_item is None:
+            return self.cascade_all()
+        return self.cascade_items(list_item, children=self.sub_children)
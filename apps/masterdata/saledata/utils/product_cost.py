@@ -0,0 +1,234 @@
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.shared import DisperseModel
+
+__all__ = ['ProductCostResolver']
+
+
+class ProductCostResolver:
+    """
+    Lấy giá cost hiện tại cho nhiều cặp (sản phẩm, kho) hoặc (sản phẩm, dự án) với số query cố định:
+        - 1 query ReportInventoryCostLatestLog (+ latest_log) cho tất cả các cặp
+        - 1 query ReportInventoryCost của kỳ hiện tại cho tất cả các cặp
+        - kỳ hiện tại, company config chỉ lấy 1 lần
+    Kết quả được nhớ lại (memo) trong vòng đời của object => tạo mới cho mỗi request / mỗi lần xử lý chứng từ,
+    không dùng lại sau khi đã ghi log kho (giá cost đã thay đổi).
+    Kết quả giống Product.get_cost_info_by_warehouse / get_cost_info_by_project / get_cost_info_of_all_warehouse.
+    """
+    TARGET_FIELD = {
+        'warehouse': 'warehouse_id',
+        'project': 'sale_order_id',
+    }
+    LATEST_LOG_FIELDS = (
+        'latest_log__perpetual_current_quantity',
+        'latest_log__perpetual_current_cost',
+        'latest_log__perpetual_current_value',
+    )
+    COST_FIELDS = (
+        'sub_period_order', 'periodic_closed', 'for_balance_init',
+        'opening_balance_quantity', 'opening_balance_cost', 'opening_balance_value',
+        'periodic_ending_balance_quantity', 'periodic_ending_balance_cost', 'periodic_ending_balance_value',
+    )
+
+    def __init__(self, tenant_id, company_id):
+        self.tenant_id = tenant_id
+        self.company_id = company_id
+        self._this_period = None
+        self._this_period_loaded = False
+        self._company_config = None
+        # (kind, product_id, target_id): {'latest': [quantity, cost, value] | None, 'first':..., 'balance_init':...,
+        # 'sub_period': {}}
+        self.cost_memo = {}
+        self.warehouse_list = None
+
+    @classmethod
+    def from_context(cls, context, product_obj):
+        """ Dùng resolver đã chuẩn bị sẵn trong context của serializer (view), nếu không có thì tạo mới """
+        cost_resolver = context.get('cost_resolver', None) if context else None
+        if cost_resolver:
+            return cost_resolver
+        return cls(product_obj.tenant_id, product_obj.company_id)
+
+    @staticmethod
+    def parse_id(value):
+        value = getattr(value, 'id', value)
+        return str(value) if value else None
+
+    @property
+    def this_period(self):
+        if not self._this_period_loaded:
+            periods_model = DisperseModel(app_model='saledata.Periods').get_model()
+            self._this_period = periods_model.get_current_period(self.tenant_id, self.company_id)
+            self._this_period_loaded = True
+        return self._this_period
+
+    @property
+    def company_config(self):
+        if self._company_config is None:
+            company_config_model = DisperseModel(app_model='company.CompanyConfig').get_model()
+            self._company_config = company_config_model.objects.filter(company_id=self.company_id).first()
+        return self._company_config
+
+    @property
+    def definition_inventory_valuation(self):
+        return self.company_config.definition_inventory_valuation if self.company_config else 0
+
+    def get_filter_keys(self, kind, keys):
+        field = self.TARGET_FIELD[kind]
+        product_ids = {product_id for product_id, _target_id in keys}
+        target_ids = {target_id for _product_id, target_id in keys if target_id}
+        filter_target = Q(**{f'{field}__in': target_ids})
+        if any(not target_id for _product_id, target_id in keys):
+            filter_target |= Q(**{f'{field}__isnull': True})
+        return Q(product_id__in=product_ids) & filter_target
+
+    def prefetch(self, kind, keys):
+        """
+        Lấy dữ liệu cho các cặp chưa có trong memo
+        * param 'kind': 'warehouse' | 'project'
+        * param 'keys': [(product_id | product_obj, warehouse_id | sale_order_id | obj)]
+        """
+        keys = {(self.parse_id(product_id), self.parse_id(target_id)) for product_id, target_id in keys}
+        keys = [key for key in keys if key[0] and (kind, *key) not in self.cost_memo]
+        if not keys:
+            return self
+        field = self.TARGET_FIELD[kind]
+        filter_keys = self.get_filter_keys(kind, keys)
+        new_memo_keys = {(kind, *key) for key in keys}
+        for memo_key in new_memo_keys:
+            self.cost_memo[memo_key] = {'latest': None, 'first': None, 'balance_init': None, 'sub_period': {}}
+
+        # giao dịch gần nhất: giống rp_inv_cost_product.filter(...).first() => dòng đầu tiên theo id
+        latest_log_model = DisperseModel(app_model='report.ReportInventoryCostLatestLog').get_model()
+        for item in latest_log_model.objects.filter(filter_keys).order_by('id').values_list(
+                'product_id', field, 'latest_log_id', *self.LATEST_LOG_FIELDS
+        ):
+            memo_key = (kind, self.parse_id(item[0]), self.parse_id(item[1]))
+            if memo_key in new_memo_keys and self.cost_memo[memo_key]['latest'] is None:
+                # latest_log rỗng => dùng [0, 0, 0] thay vì lỗi
+                self.cost_memo[memo_key]['latest'] = [value or 0 for value in item[3:]] if item[2] else [0, 0, 0]
+
+        this_period = self.this_period
+        if this_period:
+            cost_model = DisperseModel(app_model='report.ReportInventoryCost').get_model()
+            for item in cost_model.objects.filter(filter_keys, period_mapped=this_period).order_by('id').values(
+                    'product_id', field, *self.COST_FIELDS
+            ):
+                memo_key = (kind, self.parse_id(item['product_id']), self.parse_id(item[field]))
+                if memo_key not in new_memo_keys:
+                    continue
+                cost_data = self.cost_memo[memo_key]
+                if cost_data['first'] is None:
+                    cost_data['first'] = item
+                if item['for_balance_init'] and cost_data['balance_init'] is None:
+                    cost_data['balance_init'] = item
+                cost_data['sub_period'].setdefault(item['sub_period_order'], item)
+        return self
+
+    def prefetch_by_warehouse(self, keys):
+        return self.prefetch('warehouse', keys)
+
+    def prefetch_by_project(self, keys):
+        return self.prefetch('project', keys)
+
+    def get_value_list(self, kind, product_id, target_id):
+        memo_key = (kind, self.parse_id(product_id), self.parse_id(target_id))
+        if memo_key not in self.cost_memo:
+            self.prefetch(kind, [(product_id, target_id)])
+        cost_data = self.cost_memo.get(memo_key, {})
+        latest_value_list = cost_data.get('latest', None)
+        if latest_value_list is not None:
+            if self.definition_inventory_valuation == 0:
+                return list(latest_value_list)
+            item = cost_data.get('first', None)
+            if not item:
+                return [0, 0, 0]
+            if not item['periodic_closed']:
+                return [
+                    item['opening_balance_quantity'], item['opening_balance_cost'], item['opening_balance_value']
+                ]
+            return [
+                item['periodic_ending_balance_quantity'],
+                item['periodic_ending_balance_cost'],
+                item['periodic_ending_balance_value']
+            ]
+        # lấy SDDK, nếu cũng không có SDDK, trả về [0, 0, 0]
+        item = cost_data.get('balance_init', None)
+        return [
+            item['opening_balance_quantity'], item['opening_balance_cost'], item['opening_balance_value']
+        ] if item else [0, 0, 0]
+
+    def get_cost_info(self, kind, product_id, target_id, get_type=1):
+        """
+            * param 'get_type':
+                0: quantity
+                1: cost (default)
+                2: value
+                3: [quantity, cost, value]
+        """
+        if not self.this_period:
+            return 0
+        value_list = self.get_value_list(kind, product_id, target_id)
+        if get_type != 3:
+            return value_list[get_type]
+        return value_list
+
+    def get_cost_info_by_warehouse(self, product_id, warehouse_id, get_type=1):
+        return self.get_cost_info('warehouse', product_id, warehouse_id, get_type=get_type)
+
+    def get_cost_info_by_project(self, product_id, sale_order_id, get_type=1):
+        return self.get_cost_info('project', product_id, sale_order_id, get_type=get_type)
+
+    def get_current_cost_info(self, product_id, get_type=1, **kwargs):
+        company_config = self.company_config
+        if not company_config:
+            return 0
+        if company_config.cost_per_warehouse and 'warehouse_id' in kwargs:
+            return self.get_cost_info_by_warehouse(product_id, kwargs.get('warehouse_id'), get_type=get_type)
+        if company_config.cost_per_project and 'sale_order_id' in kwargs:
+            return self.get_cost_info_by_project(product_id, kwargs.get('sale_order_id'), get_type=get_type)
+        return 0
+
+    def get_warehouse_list(self):
+        if self.warehouse_list is None:
+            warehouse_model = DisperseModel(app_model='saledata.WareHouse').get_model()
+            self.warehouse_list = list(warehouse_model.objects.filter_on_company().only('id', 'code', 'title'))
+        return self.warehouse_list
+
+    def prefetch_all_warehouse(self, product_ids):
+        return self.prefetch_by_warehouse([
+            (product_id, warehouse.id) for product_id in product_ids for warehouse in self.get_warehouse_list()
+        ])
+
+    def get_cost_info_of_all_warehouse(self, product_id):
+        """
+        Giá cost của sản phẩm ở các kho còn tồn (giống Product.get_cost_info_of_all_warehouse)
+        """
+        unit_cost_list = []
+        this_period = self.this_period
+        if this_period:
+            sub_period_order = timezone.now().month - this_period.space_month
+            self.prefetch_all_warehouse([product_id])
+            for warehouse in self.get_warehouse_list():
+                memo_key = ('warehouse', self.parse_id(product_id), self.parse_id(warehouse.id))
+                latest_value_list = self.cost_memo[memo_key]['latest']
+                warehouse_data = {'id': str(warehouse.id), 'code': warehouse.code, 'title': warehouse.title}
+                if latest_value_list is not None:
+                    if self.definition_inventory_valuation == 0 and latest_value_list[0] > 0:
+                        unit_cost_list.append({
+                            'warehouse': warehouse_data,
+                            'quantity': latest_value_list[0],
+                            'unit_cost': latest_value_list[1],
+                            'value': latest_value_list[2],
+                        })
+                else:
+                    item = self.cost_memo[memo_key]['sub_period'].get(sub_period_order, None)
+                    if item and item['opening_balance_quantity'] > 0:
+                        unit_cost_list.append({
+                            'warehouse': warehouse_data,
+                            'quantity': item['opening_balance_quantity'],
+                            'unit_cost': item['opening_balance_cost'],
+                            'value': item['opening_balance_value'],
+                        })
+        return unit_cost_list
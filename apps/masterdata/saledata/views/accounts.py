@@ -241,6 +241,8 @@ class AccountDDList(BaseListMixin):
     }
     serializer_list = AccountMinimalListSerializer
     list_hidden_field = BaseListMixin.LIST_HIDDEN_FIELD_DEFAULT
+    use_cache_queryset = True
+    cache_tables_relate = ['saledata_accountaccounttypes', 'saledata_accountemployee']
 
     @swagger_auto_schema(
         operation_summary="Account DD list",
@@ -1,5 +1,7 @@
 from drf_yasg.utils import swagger_auto_schema
 
+from apps.core.base.import_job import ModelImportChunkHandler
+from apps.core.base.mixins import ImportJobMixin
 from apps.masterdata.saledata.models import (
     Contact, Salutation, Currency, AccountGroup, AccountType, Industry,
     PaymentTerm, Account, UnitOfMeasureGroup, ProductType, TaxCategory, UnitOfMeasure, Tax,
@@ -17,15 +19,17 @@ from apps.masterdata.saledata.serializers.fimport import (
     ProductProductTypeImportReturnSerializer, ProductProductCategoryImportSerializer,
     ProductProductCategoryImportReturnSerializer, PriceTaxCategoryImportSerializer,
     PriceTaxCategoryImportReturnSerializer, ProductUOMImportSerializer, ProductUOMImportReturnSerializer,
-    PriceTaxImportSerializer, PriceTaxImportReturnSerializer,
+    PriceTaxImportSerializer, PriceTaxImportReturnSerializer, ProductUOMImportChunkHandler,
 )
 
 
-class CurrencyImport(BaseCreateMixin):
+class CurrencyImport(ImportJobMixin, BaseCreateMixin):
     queryset = Currency.objects
     serializer_create = SaleDataCurrencyImportSerializer
     serializer_detail = SaleDataCurrencyImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id']
+    import_chunk_class = ModelImportChunkHandler
+    import_unique_fields = ('abbreviation',)
 
     @swagger_auto_schema(
         operation_summary="Import currency",
@@ -40,11 +44,12 @@ class CurrencyImport(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class AccountGroupImport(BaseCreateMixin):
+class AccountGroupImport(ImportJobMixin, BaseCreateMixin):
     queryset = AccountGroup.objects
     serializer_create = AccountGroupImportSerializer
     serializer_detail = AccountGroupImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id']
+    import_chunk_class = ModelImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import Account Group",
@@ -60,11 +65,12 @@ class AccountGroupImport(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class AccountTypeImport(BaseCreateMixin):
+class AccountTypeImport(ImportJobMixin, BaseCreateMixin):
     queryset = AccountType.objects
     serializer_create = AccountTypeImportSerializer
     serializer_detail = AccountTypeImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id', 'employee_created_id']
+    import_chunk_class = ModelImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import AccountType",
@@ -80,11 +86,12 @@ class AccountTypeImport(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class IndustryImport(BaseCreateMixin):
+class IndustryImport(ImportJobMixin, BaseCreateMixin):
     queryset = Industry.objects
     serializer_create = IndustryImportSerializer
     serializer_detail = IndustryImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id', 'employee_created_id']
+    import_chunk_class = ModelImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import Industry",
@@ -100,7 +107,7 @@ class IndustryImport(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class PaymentTermImport(BaseCreateMixin):
+class PaymentTermImport(ImportJobMixin, BaseCreateMixin):
     queryset = PaymentTerm.objects
     serializer_create = PaymentTermImportSerializer
     serializer_detail = PaymentTermImportReturnSerializer
@@ -120,11 +127,12 @@ class PaymentTermImport(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class SalutationImport(BaseCreateMixin):
+class SalutationImport(ImportJobMixin, BaseCreateMixin):
     queryset = Salutation.objects
     serializer_create = SalutationImportSerializer
     serializer_detail = SalutationImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id', 'employee_created_id']
+    import_chunk_class = ModelImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import Salutation",
@@ -140,7 +148,7 @@ class SalutationImport(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class ContactImport(BaseCreateMixin):
+class ContactImport(ImportJobMixin, BaseCreateMixin):
     queryset = Contact.objects
     serializer_create = SaleDataContactImportSerializer
     serializer_detail = SaleDataContactImportReturnSerializer
@@ -160,7 +168,7 @@ class ContactImport(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class AccountImport(BaseCreateMixin):
+class AccountImport(ImportJobMixin, BaseCreateMixin):
     queryset = Account.objects
     serializer_create = SaleDataAccountImportSerializer
     serializer_detail = SaleDataAccountImportReturnSerializer
@@ -180,11 +188,12 @@ class AccountImport(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class ProductUOMGroupImport(BaseCreateMixin):
+class ProductUOMGroupImport(ImportJobMixin, BaseCreateMixin):
     queryset = UnitOfMeasureGroup.objects
     serializer_create = ProductUOMGroupImportSerializer
     serializer_detail = ProductUOMGroupImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id']
+    import_chunk_class = ModelImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import Product UOM Group",
@@ -199,11 +208,12 @@ class ProductUOMGroupImport(BaseCreateMixin):
     def post(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
 
-class ProductProductTypeImport(BaseCreateMixin):
+class ProductProductTypeImport(ImportJobMixin, BaseCreateMixin):
     queryset = ProductType.objects
     serializer_create = ProductProductTypeImportSerializer
     serializer_detail = ProductProductTypeImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id', 'employee_created_id']
+    import_chunk_class = ModelImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import Product Type",
@@ -218,11 +228,12 @@ class ProductProductTypeImport(BaseCreateMixin):
     def post(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
 
-class ProductProductCategoryImport(BaseCreateMixin):
+class ProductProductCategoryImport(ImportJobMixin, BaseCreateMixin):
     queryset = ProductType.objects
     serializer_create = ProductProductCategoryImportSerializer
     serializer_detail = ProductProductCategoryImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id', 'employee_created_id']
+    import_chunk_class = ModelImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import Product Category",
@@ -237,11 +248,12 @@ class ProductProductCategoryImport(BaseCreateMixin):
     def post(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
 
-class ProductUOMImport(BaseCreateMixin):
+class ProductUOMImport(ImportJobMixin, BaseCreateMixin):
     queryset = UnitOfMeasure.objects
     serializer_create = ProductUOMImportSerializer
     serializer_detail = ProductUOMImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id', 'employee_created_id']
+    import_chunk_class = ProductUOMImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import Product UOM",
@@ -256,11 +268,13 @@ class ProductUOMImport(BaseCreateMixin):
     def post(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
 
-class PriceTaxCategoryImport(BaseCreateMixin):
+class PriceTaxCategoryImport(ImportJobMixin, BaseCreateMixin):
     queryset = TaxCategory.objects
     serializer_create = PriceTaxCategoryImportSerializer
     serializer_detail = PriceTaxCategoryImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id', 'employee_created_id']
+    import_chunk_class = ModelImportChunkHandler
+    import_unique_fields = ('code', 'title')
 
     @swagger_auto_schema(
         operation_summary="Import TaxCategory",
@@ -275,11 +289,12 @@ class PriceTaxCategoryImport(BaseCreateMixin):
     def post(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
 
-class PriceTaxImport(BaseCreateMixin):
+class PriceTaxImport(ImportJobMixin, BaseCreateMixin):
     queryset = Tax.objects
     serializer_create = PriceTaxImportSerializer
     serializer_detail = PriceTaxImportReturnSerializer
     create_hidden_field = ['tenant_id', 'company_id', 'employee_created_id']
+    import_chunk_class = ModelImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import Tax",
@@ -1,17 +1,20 @@
 from drf_yasg.utils import swagger_auto_schema
+from apps.core.base.import_job import ModelImportChunkHandler
+from apps.core.base.mixins import ImportJobMixin
 from apps.masterdata.saledata.models import Product, Manufacturer
 from apps.masterdata.saledata.serializers.fimport_product import (
     ProductImportCreateSerializer, ProductImportDetailSerializer,
-    ProductManufacturerImportDetailSerializer, ProductManufacturerImportCreateSerializer
+    ProductManufacturerImportDetailSerializer, ProductManufacturerImportCreateSerializer, ProductImportChunkHandler,
 )
 from apps.shared import BaseCreateMixin, mask_view
 
 
-class ProductImportList(BaseCreateMixin):
+class ProductImportList(ImportJobMixin, BaseCreateMixin):
     queryset = Product.objects
     serializer_create = ProductImportCreateSerializer
     serializer_detail = ProductImportDetailSerializer
     create_hidden_field = ['tenant_id', 'company_id', 'employee_created_id']
+    import_chunk_class = ProductImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import Product",
@@ -25,11 +28,12 @@ class ProductImportList(BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
-class ProductManufacturerImportList(BaseCreateMixin):
+class ProductManufacturerImportList(ImportJobMixin, BaseCreateMixin):
     queryset = Manufacturer.objects
     serializer_create = ProductManufacturerImportCreateSerializer
     serializer_detail = ProductManufacturerImportDetailSerializer
     create_hidden_field = ['tenant_id', 'company_id', 'employee_created_id']
+    import_chunk_class = ModelImportChunkHandler
 
     @swagger_auto_schema(
         operation_summary="Import Product Manufacturer",
@@ -422,6 +422,13 @@ class ProductList(BaseListMixin, BaseCreateMixin):
     filterset_fields = {
         "general_product_types_mapped__id": ['exact']
     }
+    use_cache_queryset = True
+    # tồn kho (ProductWareHouse, ghi bằng bulk_update => bulk_table_generation) + bảng tham chiếu serializer đọc
+    cache_tables_relate = [
+        'saledata_productwarehouse', 'saledata_productproducttype', 'saledata_producttype', 'saledata_productattribute',
+        'saledata_productcategory', 'saledata_unitofmeasuregroup', 'saledata_unitofmeasure', 'saledata_tax',
+        'accountingsettings_assetcategory', 'accountingsettings_chartofaccounts',
+    ]
 
     def get_queryset(self):
         main_queryset = super().get_queryset().select_related(
@@ -9,6 +9,7 @@ from apps.masterdata.saledata.serializers.warehouse import (
 )
 from apps.shared import (
     BaseListMixin, BaseCreateMixin, BaseRetrieveMixin, BaseUpdateMixin, BaseDestroyMixin, mask_view, ResponseController,
+    Caching,
 )
 from apps.masterdata.saledata.models import (
     WareHouse, ProductWareHouse, ProductWareHouseLot, ProductWareHouseSerial, WarehouseEmployeeConfig
@@ -20,6 +21,7 @@ from apps.masterdata.saledata.serializers import (
     WarehouseEmployeeConfigListSerializer, WarehouseEmployeeConfigCreateSerializer,
     WarehouseEmployeeConfigDetailSerializer
 )
+from apps.masterdata.saledata.utils import ProductCostResolver
 from ..filters import ProductWareHouseListFilter
 
 __all__ = [
@@ -43,6 +45,14 @@ class WareHouseList(BaseListMixin, BaseCreateMixin):
         "is_active": ['exact'],
         "is_dropship": ['exact'],
     }
+    use_cache_queryset = True
+
+    def get_list_cache_scope(self) -> str:
+        # danh sách kho phụ thuộc quyền tương tác kho của employee
+        if hasattr(self.request.user.employee_current, 'warehouse_employees_emp'):
+            interact = self.request.user.employee_current.warehouse_employees_emp
+            return ','.join(sorted(str(item) for item in interact.warehouse_list))
+        return ''
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -75,6 +85,8 @@ class WareHouseList(BaseListMixin, BaseCreateMixin):
                 WareHouse.objects.filter_on_company(id=self.request.query_params.get('warehouse_id')).update(
                     use_for=self.request.query_params.get('use_for', 0)
                 )
+            # update() không phát signal => làm mới cache list kho
+            Caching().bump_table_generation(WareHouse._meta.db_table)  # pylint: disable=W0212
         return self.list(request, *args, **kwargs)
 
     @swagger_auto_schema(operation_summary='Create new WareHouse', request_body=WareHouseCreateSerializer)
@@ -189,6 +201,18 @@ class ProductWareHouseListForGoodsTransfer(BaseListMixin):
             'product_warehouse_lot_product_warehouse'
         ).order_by('product__code')
 
+    def paginate_queryset(self, queryset):
+        # lấy giá cost của các dòng trong trang 1 lần (pageSize = -1: lấy tất cả)
+        page = super().paginate_queryset(queryset)
+        self.ser_context = {
+            'cost_resolver': ProductCostResolver(
+                self.request.user.tenant_current_id, self.request.user.company_current_id
+            ).prefetch_by_warehouse([
+                (obj.product_id, obj.warehouse_id) for obj in (page if page is not None else queryset)
+            ])
+        }
+        return page
+
     @swagger_auto_schema(operation_summary='Product WareHouse For Goods Transfer')
     @mask_view(login_require=True, auth_require=False)
     def get(self, request, *args, **kwargs):
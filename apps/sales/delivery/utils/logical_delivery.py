@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from apps.core.diagram.models import DiagramSuffix
+from apps.masterdata.saledata.utils import ProductCostResolver
 from apps.shared import DisperseModel
 from apps.shared.translations.sales import DeliverMsg
 
@@ -143,9 +144,15 @@ class DeliHandler:
         quantity = 0
         total = 0
         list_reference = []
-        for deli_product in instance.delivery_product_delivery_sub.all():  # for in product
+        deli_product_list = list(instance.delivery_product_delivery_sub.all())
+        # lấy giá cost của tất cả (sản phẩm, kho) 1 lần
+        cost_resolver = ProductCostResolver(instance.tenant_id, instance.company_id).prefetch_by_warehouse([
+            (deli_product.product_id, data_deli.get('warehouse_id', None))
+            for deli_product in deli_product_list for data_deli in (deli_product.delivery_data or [])
+        ])
+        for deli_product in deli_product_list:  # for in product
             quantity += deli_product.picked_quantity
-            total_all_wh = cls.diagram_get_total_cost_by_wh(deli_product=deli_product)
+            total_all_wh = cls.diagram_get_total_cost_by_wh(deli_product=deli_product, cost_resolver=cost_resolver)
             total += total_all_wh
         if instance.order_delivery:
             if hasattr(instance.order_delivery, 'sale_order'):
@@ -175,7 +182,7 @@ class DeliHandler:
         return True
 
     @classmethod
-    def diagram_get_total_cost_by_wh(cls, deli_product):
+    def diagram_get_total_cost_by_wh(cls, deli_product, cost_resolver=None):
         total_all_wh = 0
         product_obj, delivery_data = deli_product.product, deli_product.delivery_data
         if product_obj:
@@ -191,7 +198,9 @@ class DeliHandler:
                     return deli_product.picked_quantity * so_cost.product_cost_price
             for data_deli in delivery_data:  # for in warehouse to get cost of warehouse
                 quantity_deli = data_deli.get('picked_quantity', 0)
-                cost = product_obj.get_cost_info_by_warehouse(
+                cost = cost_resolver.get_cost_info_by_warehouse(
+                    product_obj.id, data_deli.get('warehouse_id', None), get_type=1
+                ) if cost_resolver else product_obj.get_cost_info_by_warehouse(
                     warehouse_id=data_deli.get('warehouse_id', None), get_type=1
                 )
                 total_all_wh += cost * quantity_deli
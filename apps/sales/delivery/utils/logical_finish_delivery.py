@@ -3,6 +3,7 @@ from django.utils import timezone
 from apps.masterdata.saledata.models import UnitOfMeasure, ProductWareHouse, ProductWareHouseLot
 from apps.sales.acceptance.models import FinalAcceptance
 from apps.shared import DisperseModel
+from apps.shared.extends.models import bulk_table_generation
 
 
 class DeliFinishHandler:
@@ -161,6 +162,11 @@ class DeliFinishHandler:
                     item.picked_ready = item.picked_ready - item_sold
                 list_update.append(item)
         ProductWareHouse.objects.bulk_update(list_update, fields=['sold_amount', 'picked_ready', 'stock_amount'])
+        if list_update:
+            # bulk_update không phát signal => làm mới cache list sản phẩm (tồn kho)
+            bulk_table_generation(
+                ProductWareHouse, tenant_id=list_update[0].tenant_id, company_id=list_update[0].company_id,
+            )
         return True
 
     @classmethod
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from apps.core.workflow.tasks import decorator_run_workflow
+from apps.masterdata.saledata.utils import ProductCostResolver
 from apps.masterdata.saledata.models import ProductWareHouse, WareHouse, UnitOfMeasure, Account, ProductWareHouseLot, \
     ProductWareHouseSerial, Product
 from apps.sales.inventory.models import GoodsTransfer, GoodsTransferProduct
@@ -323,8 +324,11 @@ class GoodsTransferUpdateSerializer(AbstractCreateSerializerModel):
 
 def common_create_sub_goods_transfer(instance, data):
     bulk_data = []
+    cost_resolver = ProductCostResolver(instance.tenant_id, instance.company_id).prefetch_by_warehouse([
+        (item.get('product'), item.get('warehouse')) for item in data
+    ])
     for item in data:
-        item['unit_cost'] = item.get('product').get_cost_info_by_warehouse(item.get('warehouse'))
+        item['unit_cost'] = cost_resolver.get_cost_info_by_warehouse(item.get('product'), item.get('warehouse'))
         item['subtotal'] = item.get('unit_cost', 0) * item.get('quantity', 0)
         bulk_data.append(GoodsTransferProduct(goods_transfer=instance, **item))
     GoodsTransferProduct.objects.filter(goods_transfer=instance).delete()
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
+from apps.masterdata.saledata.utils import ProductCostResolver
 from apps.sales.inventory.models import (
     InventoryAdjustment, InventoryAdjustmentWarehouse, InventoryAdjustmentEmployeeInCharge,
     InventoryAdjustmentItem
@@ -213,9 +214,10 @@ class InventoryAdjustmentProductListSerializer(serializers.ModelSerializer):
             }
         return {}
 
-    @classmethod
-    def get_unit_cost(cls, obj):
-        return obj.product_mapped.get_cost_info_by_warehouse(obj.warehouse_mapped_id)
+    def get_unit_cost(self, obj):
+        return ProductCostResolver.from_context(self.context, obj.product_mapped).get_cost_info_by_warehouse(
+            obj.product_mapped_id, obj.warehouse_mapped_id
+        )
 
 
 class IACommonFunc:
@@ -396,21 +398,17 @@ class IAProductGRListSerializer(serializers.ModelSerializer):
         calculate = cls.calculate(obj)
         return calculate.get('difference', 0)
 
-    @classmethod
-    def get_product_unit_price(cls, obj):
-        return obj.product_mapped.get_cost_info_by_warehouse(
-            warehouse_id=obj.warehouse_mapped_id, get_type=1
+    def get_product_unit_price(self, obj):
+        return ProductCostResolver.from_context(self.context, obj.product_mapped).get_cost_info_by_warehouse(
+            obj.product_mapped_id, obj.warehouse_mapped_id, get_type=1
         )
 
     @classmethod
     def get_product_subtotal_price(cls, obj):
         return 0 if obj else 0
 
-    @classmethod
-    def get_product_cost_price(cls, obj):
-        return obj.product_mapped.get_cost_info_by_warehouse(
-            warehouse_id=obj.warehouse_mapped_id, get_type=1
-        )
+    def get_product_cost_price(self, obj):
+        return self.get_product_unit_price(obj)
 
     @classmethod
     def get_gr_completed_quantity(cls, obj):
@@ -1,4 +1,5 @@
 from apps.core.diagram.models import DiagramSuffix
+from apps.masterdata.saledata.utils import ProductCostResolver
 
 
 class ReturnHandler:
@@ -10,17 +11,19 @@ class ReturnHandler:
         list_reference = []
         if instance.delivery:
             list_reference.append(instance.delivery.code)
+        # dùng chung kỳ/config/giá cost đã lấy cho tất cả dòng trả hàng
+        cost_resolver = ProductCostResolver(instance.tenant_id, instance.company_id)
         for return_product in instance.goods_return_product_detail.all():
             if return_product.type == 0:  # no lot/serial
-                quantity_sub, cost = cls.setup_return_quantity_value(return_product=return_product)
+                quantity_sub, cost = cls.setup_return_quantity_value(return_product, cost_resolver)
                 quantity += quantity_sub
                 total += cost
             if return_product.type == 1:  # lot
-                quantity_sub, cost = cls.setup_return_quantity_value_lot(return_product=return_product)
+                quantity_sub, cost = cls.setup_return_quantity_value_lot(return_product, cost_resolver)
                 quantity += quantity_sub
                 total += cost
             if return_product.type == 2:  # serial
-                quantity_sub, cost = cls.setup_return_quantity_value_serial(return_product=return_product)
+                quantity_sub, cost = cls.setup_return_quantity_value_serial(return_product, cost_resolver)
                 quantity += quantity_sub
                 total += cost
         if instance.sale_order:
@@ -49,35 +52,35 @@ class ReturnHandler:
         return True
 
     @classmethod
-    def setup_return_quantity_value(cls, return_product):
+    def setup_return_quantity_value(cls, return_product, cost_resolver):
         if return_product.delivery_item:
             if return_product.delivery_item.product:
                 product_obj = return_product.delivery_item.product
-                cost = product_obj.get_cost_info_by_warehouse(
-                    warehouse_id=return_product.return_to_warehouse_id, get_type=1
+                cost = cost_resolver.get_cost_info_by_warehouse(
+                    product_obj.id, return_product.return_to_warehouse_id, get_type=1
                 )
                 return return_product.default_return_number, cost * return_product.default_return_number
         return 0, 0
 
     @classmethod
-    def setup_return_quantity_value_lot(cls, return_product):
+    def setup_return_quantity_value_lot(cls, return_product, cost_resolver):
         if return_product.lot_no:
             if return_product.lot_no.product_warehouse:
                 product_obj = return_product.lot_no.product_warehouse.product
                 if product_obj:
-                    cost = product_obj.get_cost_info_by_warehouse(
-                        warehouse_id=return_product.lot_no.product_warehouse.warehouse_id, get_type=1
+                    cost = cost_resolver.get_cost_info_by_warehouse(
+                        product_obj.id, return_product.lot_no.product_warehouse.warehouse_id, get_type=1
                     )
                     return return_product.lot_return_number, cost * return_product.lot_return_number
         return 0, 0
 
     @classmethod
-    def setup_return_quantity_value_serial(cls, return_product):
+    def setup_return_quantity_value_serial(cls, return_product, cost_resolver):
         if return_product.serial_no:
             if return_product.serial_no.product_warehouse:
                 product_obj = return_product.serial_no.product_warehouse.product
                 if product_obj:
-                    return 1, product_obj.get_cost_info_by_warehouse(
-                        warehouse_id=return_product.serial_no.product_warehouse.warehouse_id, get_type=1
+                    return 1, cost_resolver.get_cost_info_by_warehouse(
+                        product_obj.id, return_product.serial_no.product_warehouse.warehouse_id, get_type=1
                     )
         return 0, 0
@@ -6,6 +6,7 @@ from apps.sales.inventory.serializers.inventory_adjustment import (
     InventoryAdjustmentListSerializer, InventoryAdjustmentDetailSerializer,
     InventoryAdjustmentCreateSerializer, InventoryAdjustmentUpdateSerializer, InventoryAdjustmentProductListSerializer,
     IAProductGRListSerializer, InventoryAdjustmentDDListSerializer)
+from apps.masterdata.saledata.utils import ProductCostResolver
 from apps.shared import BaseListMixin, mask_view, BaseCreateMixin, BaseRetrieveMixin, BaseUpdateMixin
 
 
@@ -115,6 +116,18 @@ class InventoryAdjustmentProductList(BaseListMixin):
             'warehouse_mapped',
         )
 
+    def paginate_queryset(self, queryset):
+        # lấy giá cost của các dòng trong trang 1 lần (pageSize = -1: lấy tất cả)
+        page = super().paginate_queryset(queryset)
+        self.ser_context = {
+            'cost_resolver': ProductCostResolver(
+                self.request.user.tenant_current_id, self.request.user.company_current_id
+            ).prefetch_by_warehouse([
+                (obj.product_mapped_id, obj.warehouse_mapped_id) for obj in (page if page is not None else queryset)
+            ])
+        }
+        return page
+
     @swagger_auto_schema(
         operation_summary="Inventory Adjustment Product List",
         operation_description="Get Inventory Adjustment Product List",
@@ -143,6 +156,18 @@ class InventoryAdjustmentProductGRList(BaseListMixin):
             'warehouse_mapped',
         )
 
+    def paginate_queryset(self, queryset):
+        # lấy giá cost của các dòng trong trang 1 lần (pageSize = -1: lấy tất cả)
+        page = super().paginate_queryset(queryset)
+        self.ser_context = {
+            'cost_resolver': ProductCostResolver(
+                self.request.user.tenant_current_id, self.request.user.company_current_id
+            ).prefetch_by_warehouse([
+                (obj.product_mapped_id, obj.warehouse_mapped_id) for obj in (page if page is not None else queryset)
+            ])
+        }
+        return page
+
     @swagger_auto_schema(
         operation_summary="Inventory Adjustment Product GR List",
         operation_description="Get Inventory Adjustment Product GR List",
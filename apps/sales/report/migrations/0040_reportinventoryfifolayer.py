@@ -0,0 +1,86 @@
+# Generated by Django 4.2.8 on 2026-10-18 17:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def init_fifo_layers(apps, schema_editor):
+    # tạo lớp giá cho các log nhập đã có của sản phẩm FIFO, SL còn lại = SL nhập - SL đã bị lấy
+    stock_log_cls = apps.get_model('report', 'reportstocklog')
+    fifo_layer_cls = apps.get_model('report', 'reportinventoryfifolayer')
+    bulk_info = []
+    for log in stock_log_cls.objects.filter(
+            stock_type=1, product__valuation_method=0, quantity__gt=0
+    ).order_by('system_date').iterator(chunk_size=2000):
+        remaining_quantity = max(log.quantity - log.fifo_pushed_quantity, 0)
+        bulk_info.append(
+            fifo_layer_cls(
+                company_id=log.company_id,
+                product_id=log.product_id,
+                warehouse_id=log.warehouse_id,
+                lot_mapped_id=log.lot_mapped_id,
+                serial_number=log.serial_number,
+                sale_order_id=log.sale_order_id,
+                lease_order_id=log.lease_order_id,
+                service_order_id=log.service_order_id,
+                stock_log_id=log.id,
+                trans_code=log.trans_code,
+                system_date=log.system_date,
+                log_order=log.log_order,
+                quantity=log.quantity,
+                cost=log.cost,
+                remaining_quantity=remaining_quantity,
+                is_depleted=remaining_quantity <= 0,
+            )
+        )
+        if len(bulk_info) >= 2000:
+            fifo_layer_cls.objects.bulk_create(bulk_info)
+            bulk_info = []
+    fifo_layer_cls.objects.bulk_create(bulk_info)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('saledata', '0087_product_asset_category'),
+        ('saleorder', '0039_saleorder_currency_company_and_more'),
+        ('serviceorder', '0011_serviceorder_total_cost_and_more'),
+        ('company', '0023_companyconfig_shift_companyconfig_shift_data_and_more'),
+        ('leaseorder', '0016_remove_leaseorderproduct_offset_and_more'),
+        ('report', '0039_reportinventorycost_service_order_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportInventoryFifoLayer',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('serial_number', models.CharField(blank=True, max_length=100, null=True)),
+                ('trans_code', models.CharField(blank=True, max_length=100, null=True)),
+                ('system_date', models.DateTimeField(null=True)),
+                ('log_order', models.IntegerField(default=0)),
+                ('quantity', models.FloatField(default=0)),
+                ('cost', models.FloatField(default=0)),
+                ('remaining_quantity', models.FloatField(default=0)),
+                ('is_depleted', models.BooleanField(default=False, help_text='is True if remaining quantity is 0')),
+                ('company', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rp_inv_fifo_layer_company', to='company.company')),
+                ('lease_order', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rp_inv_fifo_layer_lease_order', to='leaseorder.leaseorder')),
+                ('lot_mapped', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rp_inv_fifo_layer_lot_mapped', to='saledata.productwarehouselot')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rp_inv_fifo_layer_product', to='saledata.product')),
+                ('sale_order', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rp_inv_fifo_layer_sale_order', to='saleorder.saleorder')),
+                ('service_order', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rp_inv_fifo_layer_service_order', to='serviceorder.serviceorder')),
+                ('stock_log', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rp_inv_fifo_layer', to='report.reportstocklog')),
+                ('warehouse', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rp_inv_fifo_layer_warehouse', to='saledata.warehouse')),
+            ],
+            options={
+                'verbose_name': 'Report Inventory FIFO Layer',
+                'verbose_name_plural': 'Report Inventory FIFO Layers',
+                'ordering': ('system_date', 'log_order'),
+                'permissions': (),
+                'default_permissions': (),
+                'indexes': [models.Index(fields=['product', 'is_depleted', 'system_date', 'log_order'], name='report_repo_product_9c090c_idx'), models.Index(fields=['product', 'warehouse', 'lot_mapped', 'is_depleted', 'system_date'], name='report_repo_product_f93fb2_idx')],
+            },
+        ),
+        migrations.RunPython(init_fifo_layers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.8 on 2026-10-18 17:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenant', '0001_initial'),
+        ('hr', '0004_employee_email_app_password_and_more'),
+        ('company', '0023_companyconfig_shift_companyconfig_shift_data_and_more'),
+        ('report', '0040_reportinventoryfifolayer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportInventoryRebuildJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(blank=True, max_length=100)),
+                ('code', models.CharField(blank=True, max_length=100)),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='The record created at value')),
+                ('date_modified', models.DateTimeField(auto_now=True, help_text='Date modified this record in last')),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_delete', models.BooleanField(default=False)),
+                ('state', models.SmallIntegerField(choices=[(0, 'Waiting'), (1, 'Running'), (2, 'Done'), (3, 'Failed')], default=0)),
+                ('product_ids', models.JSONField(default=list, help_text='rỗng: chạy lại toàn bộ sản phẩm của công ty')),
+                ('workers', models.PositiveSmallIntegerField(default=1)),
+                ('total_postings', models.IntegerField(default=0)),
+                ('done_postings', models.IntegerField(default=0)),
+                ('msg', models.TextField(blank=True)),
+                ('date_started', models.DateTimeField(null=True)),
+                ('date_finished', models.DateTimeField(null=True)),
+                ('company', models.ForeignKey(help_text='The company claims that this record belongs to them', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_belong_to_company', to='company.company')),
+                ('employee_created', models.ForeignKey(help_text='Employee created this record', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_employee_creator', to='hr.employee')),
+                ('employee_modified', models.ForeignKey(help_text='Employee modified this record in last', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_employee_modifier', to='hr.employee')),
+                ('tenant', models.ForeignKey(help_text='The tenant claims that this record belongs to them', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_belong_to_tenant', to='tenant.tenant')),
+            ],
+            options={
+                'verbose_name': 'Report Inventory Rebuild Job',
+                'verbose_name_plural': 'Report Inventory Rebuild Jobs',
+                'ordering': ('-date_created',),
+                'permissions': (),
+                'default_permissions': (),
+            },
+        ),
+    ]
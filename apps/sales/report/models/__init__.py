@@ -1,2 +1,4 @@
 from .report_sales import *
+from .report_inventory_ledger import *
 from .report_inventory import *
+from .report_export import *
@@ -0,0 +1,35 @@
+from django.db import models
+
+from apps.shared import MasterDataAbstractModel
+
+# - ReportExportJob: lưu tiến trình xuất báo cáo (CSV/XLSX) chạy background, file kết quả lưu ở attachments
+
+EXPORT_JOB_STATE = [
+    (0, 'Waiting'),
+    (1, 'Running'),
+    (2, 'Done'),
+    (3, 'Failed'),
+]
+
+EXPORT_FORMAT = [
+    ('csv', 'CSV'),
+    ('xlsx', 'XLSX'),
+]
+
+
+class ReportExportJob(MasterDataAbstractModel):
+    state = models.SmallIntegerField(choices=EXPORT_JOB_STATE, default=0)
+    report_code = models.CharField(max_length=100, help_text='url name của API báo cáo, vd: ReportRevenueList')
+    export_format = models.CharField(max_length=10, choices=EXPORT_FORMAT, default='xlsx')
+    params = models.JSONField(default=dict, help_text='query params của API báo cáo lúc tạo job')
+    file = models.ForeignKey('attachments.Files', on_delete=models.SET_NULL, null=True)
+    msg = models.TextField(blank=True)
+    date_started = models.DateTimeField(null=True)
+    date_finished = models.DateTimeField(null=True)
+
+    class Meta:
+        verbose_name = 'Report Export Job'
+        verbose_name_plural = 'Report Export Jobs'
+        ordering = ('-date_created',)
+        default_permissions = ()
+        permissions = ()
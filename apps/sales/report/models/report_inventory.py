@@ -5,6 +5,7 @@ from apps.sales.inventory.models.goods_registration import (
     GoodsRegistration, GReItemProductWarehouseSerial, GReItemProductWarehouseLot
 )
 from apps.shared import DataAbstractModel, SimpleAbstractModel
+from .report_inventory_ledger import ReportInventoryFifoLayer
 
 
 # - ReportStock: lưu sản phẩm theo từng tháng trong năm tài chính.
@@ -12,6 +13,7 @@ from apps.shared import DataAbstractModel, SimpleAbstractModel
 # - ReportInventoryCost: lưu giá cost đầu kì và cuối kì (hiện tại) của sản phẩm theo từng tháng trong năm tài chính
 # - ReportInventoryCostByWarehouse: lưu kho vật lí của sản phẩm (cho TH tính cost theo dự án)
 # - ReportInventoryCostLatestLog: lưu giao dịch gần nhất của sản phẩm
+# - ReportInventoryFifoLayer, ReportInventoryRebuildJob: xem report_inventory_ledger.py
 
 
 class BalanceInitialization(DataAbstractModel):
@@ -183,11 +185,14 @@ class ReportStockLog(DataAbstractModel):
     lot_data = models.JSONField(default=list)
     serial_data = models.JSONField(default=list)
 
-    fifo_pushed_quantity = models.IntegerField(default=0) # để biết được đã bị lấy bao nhiêu rồi
+    fifo_pushed_quantity = models.IntegerField(default=0) # (cũ) SL đã bị lấy, nay lưu ở ReportInventoryFifoLayer
     fifo_cost_detail = models.JSONField(default=list)
 
     @staticmethod
-    def parse_params_report_inventory_create(doc_item, cost_cfg):
+    def parse_params_report_inventory_create(doc_item, cost_cfg, gre_keys=None):
+        """
+        gre_keys: (serial_keys, lot_keys) đã prefetch sẵn cho ghi log theo lô, None thì query trực tiếp
+        """
         kwargs = {}
         if 1 in cost_cfg:
             kwargs['warehouse_id'] = doc_item.get('warehouse').id if doc_item.get('warehouse') else None
@@ -203,13 +208,22 @@ class ReportStockLog(DataAbstractModel):
 
         # Nếu Serial/Lot này là hàng của dự án mới lấy Order, không thì bỏ Order ra
         # (mới chỉ hô trợ check Serial (chính xác) và Lot (không check số lượng))
-        if not GReItemProductWarehouseSerial.objects.filter(
+        if gre_keys is not None:
+            product_id = doc_item.get('product').id
+            lot_mapped_id = kwargs.get('lot_mapped_id')
+            is_project_item = (
+                (product_id, kwargs.get('serial_number', '')) in gre_keys[0]
+                and (product_id, str(lot_mapped_id) if lot_mapped_id else None) in gre_keys[1]
+            )
+        else:
+            is_project_item = GReItemProductWarehouseSerial.objects.filter(
                 gre_item_prd_wh__gre_item__product=doc_item.get('product'),
                 sn_registered__serial_number=kwargs.get('serial_number', '')
-        ).exists() or not GReItemProductWarehouseLot.objects.filter(
+            ).exists() and GReItemProductWarehouseLot.objects.filter(
                 gre_item_prd_wh__gre_item__product=doc_item.get('product'),
-                lot_registeredd_id=kwargs.get('lot_mapped_id')
-        ).exists():
+                lot_registered_id=kwargs.get('lot_mapped_id')
+            ).exists()
+        if not is_project_item:
             kwargs['sale_order_id'] = None
             kwargs['lease_order_id'] = None
             kwargs['service_order_id'] = None
@@ -231,7 +245,7 @@ class ReportStockLog(DataAbstractModel):
                 if item['stock_type'] == -1:
                     latest_cost = ReportInventorySubFunction.get_export_cost_for_fifo(
                         doc_obj.company.company_config.definition_inventory_valuation,
-                        item['product'], item['warehouse'], item['quantity'], **kwargs
+                        item['product'], item['warehouse'], item['quantity'], item['system_date'], **kwargs
                     )
                     item['cost'] = latest_cost['cost']
             if item['product'].valuation_method == 1:
@@ -300,64 +314,42 @@ class ReportStockLog(DataAbstractModel):
                 if 'sale_order_id' in kwargs or 'lease_order_id' in kwargs or 'service_order_id' in kwargs:
                     GoodsRegistration.update_registration_inventory(item, doc_obj)
         new_logs = cls.objects.bulk_create(bulk_info)
+        ReportInventoryFifoLayer.create_layers(new_logs)
         return new_logs
 
     @classmethod
-    def update_log_cost_dict(cls, div, log, latest_cost):
-        """ cập nhập giá cost hiện tại cho log """
+    def update_log_cost_dict(cls, div, log, latest_cost, commit=True):
+        """ cập nhập giá cost hiện tại cho log (commit=False: chỉ tính trong bộ nhớ, không save) """
+        update_fields = []
         if div == 0:
+            new_cost_dict = None
             if log.product.valuation_method == 0:
                 new_cost_dict = ReportInventoryValuationMethod.fifo_in_perpetual(log, latest_cost)
-                log.perpetual_current_quantity = new_cost_dict['quantity'] if new_cost_dict['quantity'] > 0 else 0
-                log.perpetual_current_cost = new_cost_dict['cost'] if new_cost_dict['quantity'] > 0 else 0
-                log.perpetual_current_value = new_cost_dict['value'] if new_cost_dict['quantity'] > 0 else 0
-                log.save(update_fields=[
-                    'perpetual_current_quantity',
-                    'perpetual_current_cost',
-                    'perpetual_current_value'
-                ])
             if log.product.valuation_method == 1:
                 new_cost_dict = ReportInventoryValuationMethod.weighted_average_in_perpetual(log, latest_cost)
-                log.perpetual_current_quantity = new_cost_dict['quantity'] if new_cost_dict['quantity'] > 0 else 0
-                log.perpetual_current_cost = new_cost_dict['cost'] if new_cost_dict['quantity'] > 0 else 0
-                log.perpetual_current_value = new_cost_dict['value'] if new_cost_dict['quantity'] > 0 else 0
-                log.save(update_fields=[
-                    'perpetual_current_quantity',
-                    'perpetual_current_cost',
-                    'perpetual_current_value'
-                ])
             if log.product.valuation_method == 2:
                 new_cost_dict = ReportInventoryValuationMethod.specific_identification_in_perpetual(log)
+            if new_cost_dict:
                 log.perpetual_current_quantity = new_cost_dict['quantity'] if new_cost_dict['quantity'] > 0 else 0
                 log.perpetual_current_cost = new_cost_dict['cost'] if new_cost_dict['quantity'] > 0 else 0
                 log.perpetual_current_value = new_cost_dict['value'] if new_cost_dict['quantity'] > 0 else 0
-                log.save(update_fields=[
-                    'perpetual_current_quantity',
-                    'perpetual_current_cost',
-                    'perpetual_current_value'
-                ])
+                update_fields = ['perpetual_current_quantity', 'perpetual_current_cost', 'perpetual_current_value']
         else:
-            # kiểm kê định kì chưa hoàn chỉnh
-            if log.product.valuation_method == 0:
-                pass
+            # kiểm kê định kì chưa hoàn chỉnh (FIFO, SI: chưa hỗ trợ)
             if log.product.valuation_method == 1:
                 new_cost_dict = ReportInventoryValuationMethod.weighted_average_in_periodic(log, latest_cost)
                 # chỗ này k cần check SL = 0 -> cost = 0 vì mọi TH cost đều = 0
                 log.periodic_current_quantity = new_cost_dict['quantity']
                 log.periodic_current_cost = 0
                 log.periodic_current_value = 0
-                log.save(update_fields=[
-                    'periodic_current_quantity',
-                    'periodic_current_cost',
-                    'periodic_current_value'
-                ])
-            if log.product.valuation_method == 2:
-                pass
+                update_fields = ['periodic_current_quantity', 'periodic_current_cost', 'periodic_current_value']
+        if commit and update_fields:
+            log.save(update_fields=update_fields)
         return log
 
-    @classmethod
-    def update_log_cost(cls, log, period_obj, sub_period_order, cost_cfg, for_balance_init):
-        """ Step 2: Hàm để cập nhập giá trị tồn kho khi log được ghi vào """
+    @staticmethod
+    def get_cost_kwargs(log, cost_cfg):
+        """ các chiều tính cost của log (key của ReportInventoryCost) """
         kwargs = {}
         if 1 in cost_cfg:
             kwargs['warehouse_id'] = log.warehouse_id
@@ -368,23 +360,34 @@ class ReportStockLog(DataAbstractModel):
             kwargs['lease_order_id'] = log.lease_order_id
             kwargs['service_order_id'] = log.service_order_id
         kwargs['serial_number'] = log.serial_number
+        return kwargs
+
+    @classmethod
+    def update_log_cost(cls, log, period_obj, sub_period_order, cost_cfg, for_balance_init):
+        """
+        Step 2: Hàm để cập nhập giá trị tồn kho khi log được ghi vào.
+        Trả về (giá cost gần nhất trước khi ghi log, record cost nếu vừa được tạo mới - None nếu đã có)
+        để kiểm tra log ghi lùi ngày - ReportInventoryRepropagation
+        """
+        kwargs = cls.get_cost_kwargs(log, cost_cfg)
         div = log.company.company_config.definition_inventory_valuation
         latest_cost = ReportInventorySubFunction.get_latest_log_cost_dict(
             div, log.product, log.physical_warehouse, **kwargs
         )
         updated_log = cls.update_log_cost_dict(div, log, latest_cost)
-        cls.create_or_update_this_sub_period_cost(
+        this_sub_period_cost, is_new_cost = cls.create_or_update_this_sub_period_cost(
             updated_log, period_obj, sub_period_order, latest_cost, div, for_balance_init, **kwargs
         )
-        return True
+        return latest_cost, this_sub_period_cost if is_new_cost else None
 
     @classmethod
     def for_perpetual(
-            cls, this_sub_period_cost, log, period_obj, sub_period_order, new_cost_dict, for_balance_init, **kwargs
+            cls, this_sub_period_cost, log, period_obj, sub_period_order, new_cost_dict, for_balance_init,
+            commit=True, sub_period_obj=None, **kwargs
     ):
         ending_balance_quantity = new_cost_dict['quantity'] + (log.quantity * log.stock_type)
         if not this_sub_period_cost:  # không có thì tạo, gán sub_latest_log
-            this_sub_period_cost = ReportInventoryCost.objects.create(
+            this_sub_period_cost = ReportInventoryCost(
                 tenant_id=log.tenant_id,
                 company_id=log.company_id,
                 employee_created=log.employee_created,
@@ -392,7 +395,9 @@ class ReportStockLog(DataAbstractModel):
                 product=log.product,
                 period_mapped=period_obj,
                 sub_period_order=sub_period_order,
-                sub_period=period_obj.sub_periods_period_mapped.filter(order=sub_period_order).first(),
+                sub_period=sub_period_obj or period_obj.sub_periods_period_mapped.filter(
+                    order=sub_period_order
+                ).first(),
                 opening_balance_quantity=new_cost_dict['quantity'],
                 opening_balance_cost=new_cost_dict['cost'],
                 opening_balance_value=new_cost_dict['value'],
@@ -417,25 +422,18 @@ class ReportStockLog(DataAbstractModel):
             # nếu là xuất thì cập nhập SL xuất
             this_sub_period_cost.sum_output_quantity += log.quantity
             this_sub_period_cost.sum_output_value += log.quantity * log.cost
-        this_sub_period_cost.save(update_fields=[
-            'sum_input_quantity',
-            'sum_input_value',
-            'sum_output_quantity',
-            'sum_output_value',
-            'ending_balance_quantity',
-            'ending_balance_cost',
-            'ending_balance_value',
-            'sub_latest_log'
-        ])
+        if commit:
+            cls.save_sub_period_cost(this_sub_period_cost, cls.PERPETUAL_COST_UPDATE_FIELDS)
         return this_sub_period_cost
 
     @classmethod
     def for_periodic(
-            cls, this_sub_period_cost, log, period_obj, sub_period_order, new_cost_dict, for_balance_init, **kwargs
+            cls, this_sub_period_cost, log, period_obj, sub_period_order, new_cost_dict, for_balance_init,
+            commit=True, sub_period_obj=None, **kwargs
     ):
         ending_balance_quantity = new_cost_dict['quantity'] + (log.quantity * log.stock_type)
         if not this_sub_period_cost:
-            this_sub_period_cost = ReportInventoryCost.objects.create(
+            this_sub_period_cost = ReportInventoryCost(
                 tenant_id=log.tenant_id,
                 company_id=log.company_id,
                 employee_created=log.employee_created,
@@ -443,7 +441,9 @@ class ReportStockLog(DataAbstractModel):
                 product=log.product,
                 period_mapped=period_obj,
                 sub_period_order=sub_period_order,
-                sub_period=period_obj.sub_periods_period_mapped.filter(order=sub_period_order).first(),
+                sub_period=sub_period_obj or period_obj.sub_periods_period_mapped.filter(
+                    order=sub_period_order
+                ).first(),
                 opening_balance_quantity=new_cost_dict['quantity'],
                 opening_balance_cost=new_cost_dict['cost'],
                 opening_balance_value=new_cost_dict['value'],
@@ -473,17 +473,38 @@ class ReportStockLog(DataAbstractModel):
             # nếu là xuất thì cập nhập SL xuất
             this_sub_period_cost.sum_output_quantity += log.quantity
             this_sub_period_cost.sum_output_quantity += log.quantity
-        this_sub_period_cost.save(update_fields=[
-            'sum_input_quantity',
-            'sum_input_value',
-            'sum_output_quantity',
-            'sum_output_value',
-            'sub_latest_log',
-            'periodic_ending_balance_quantity',
-            'periodic_ending_balance_cost',
-            'periodic_ending_balance_value',
-            'periodic_closed'
-        ])
+        if commit:
+            cls.save_sub_period_cost(this_sub_period_cost, cls.PERIODIC_COST_UPDATE_FIELDS)
+        return this_sub_period_cost
+
+    PERPETUAL_COST_UPDATE_FIELDS = [
+        'sum_input_quantity',
+        'sum_input_value',
+        'sum_output_quantity',
+        'sum_output_value',
+        'ending_balance_quantity',
+        'ending_balance_cost',
+        'ending_balance_value',
+        'sub_latest_log'
+    ]
+    PERIODIC_COST_UPDATE_FIELDS = [
+        'sum_input_quantity',
+        'sum_input_value',
+        'sum_output_quantity',
+        'sum_output_value',
+        'sub_latest_log',
+        'periodic_ending_balance_quantity',
+        'periodic_ending_balance_cost',
+        'periodic_ending_balance_value',
+        'periodic_closed'
+    ]
+
+    @staticmethod
+    def save_sub_period_cost(this_sub_period_cost, update_fields):
+        if this_sub_period_cost._state.adding:  # pylint: disable=W0212
+            this_sub_period_cost.save()
+        else:
+            this_sub_period_cost.save(update_fields=list(update_fields))
         return this_sub_period_cost
 
     @classmethod
@@ -493,12 +514,14 @@ class ReportStockLog(DataAbstractModel):
         """
         Step 3: Hàm kiểm tra record cost của sp này trong kì nay đã có hay chưa ?
                 Chưa thì tạo mới - Có thì Update lại quantity-cost-value
+        Trả về (record cost, True nếu record vừa được tạo mới)
         """
         sub_period_obj = period_obj.sub_periods_period_mapped.filter(order=sub_period_order).first()
         if sub_period_obj:
-            sum_ending_quantity = 0
-            for record in ReportInventoryCostLatestLog.objects.filter(product_id=log.product_id, **kwargs):
-                sum_ending_quantity += record.latest_log.perpetual_current_quantity
+            sum_ending_quantity = sum(
+                record.latest_log.perpetual_current_quantity
+                for record in ReportInventoryCostLatestLog.objects.filter(product_id=log.product_id, **kwargs)
+            )
             this_sub_period_cost = ReportInventoryCost.objects.filter(
                 tenant_id=log.tenant_id,
                 company_id=log.company_id,
@@ -508,6 +531,7 @@ class ReportStockLog(DataAbstractModel):
                 sub_period=sub_period_obj,
                 **kwargs
             ).first()
+            is_new_cost = this_sub_period_cost is None
             this_sub_period_cost = cls.for_perpetual(
                 this_sub_period_cost, log, period_obj, sub_period_order,
                 {
@@ -564,7 +588,7 @@ class ReportStockLog(DataAbstractModel):
                         ReportInventoryCostLatestLog.objects.create(
                             product=log.product, latest_log=log, **kwargs
                         )
-            return True
+            return this_sub_period_cost, is_new_cost
         raise serializers.ValidationError({'Sub period missing': 'Sub period of this period does not exist.'})
 
     class Meta:
@@ -740,56 +764,27 @@ class ReportInventorySubFunction:
         ).first()
         latest_log = record.latest_log if record else None
         if latest_log:
+            # system_date: để nhận biết log mới ghi lùi ngày so với log gần nhất
             return {
                 'quantity': latest_log.perpetual_current_quantity,
                 'cost': latest_log.perpetual_current_cost,
-                'value': latest_log.perpetual_current_value
+                'value': latest_log.perpetual_current_value,
+                'system_date': latest_log.system_date
             } if div == 0 else {
                 'quantity': latest_log.periodic_current_quantity,
                 'cost': 0,
-                'value': 0
+                'value': 0,
+                'system_date': latest_log.system_date
             }
         return cls.get_opening_cost_dict(product_obj.id, 3, **kwargs)
 
     @classmethod
-    def get_export_cost_for_fifo(cls, div, product, physical_warehouse, quantity, **kwargs):
-        record = ReportInventoryCostLatestLog.objects.filter(
-            product=product, warehouse=physical_warehouse, **kwargs
-        ).first() if 'warehouse_id' not in kwargs else ReportInventoryCostLatestLog.objects.filter(
-            product=product, **kwargs
-        ).first()
-        fifo_flag_log = record.fifo_flag_log if record else None
-        latest_log = record.latest_log if record else None
-        if fifo_flag_log and latest_log:
-            pushed_quantity = quantity
-            fifo_cost_detail = []
-            for stock_log in ReportStockLog.objects.filter(
-                    product=product, stock_type=1, system_date__gte=fifo_flag_log.system_date, **kwargs
-            ).order_by('system_date'):
-                if stock_log.quantity - stock_log.fifo_pushed_quantity < pushed_quantity:
-                    fifo_cost_detail.append({
-                        'log_trans_id': str(stock_log.id),
-                        'log_trans_code': stock_log.trans_code,
-                        'log_fifo_pushed_quantity': stock_log.quantity - stock_log.fifo_pushed_quantity,
-                        'log_value': stock_log.cost * (stock_log.quantity - stock_log.fifo_pushed_quantity)
-                    })
-                    pushed_quantity -= stock_log.quantity - stock_log.fifo_pushed_quantity
-                    stock_log.fifo_pushed_quantity += stock_log.quantity - stock_log.fifo_pushed_quantity
-                    stock_log.save(update_fields=['fifo_pushed_quantity'])
-                else:
-                    fifo_cost_detail.append({
-                        'log_trans_id': str(stock_log.id),
-                        'log_trans_code': stock_log.trans_code,
-                        'log_fifo_pushed_quantity': pushed_quantity,
-                        'log_value': stock_log.cost * pushed_quantity
-                    })
-                    stock_log.fifo_pushed_quantity += pushed_quantity
-                    stock_log.save(update_fields=['fifo_pushed_quantity'])
-                    record = ReportInventoryCostLatestLog.objects.filter(product=product, **kwargs).first()
-                    if record:
-                        record.fifo_flag_log = stock_log
-                        record.save(update_fields=['fifo_flag_log'])
-                    break
+    def get_export_cost_for_fifo(
+            cls, div, product, physical_warehouse, quantity, system_date=None, **kwargs
+    ):  # pylint: disable=W0613
+        """ lấy giá xuất FIFO từ các lớp giá còn lại (ReportInventoryFifoLayer) có ngày nhập <= ngày xuất """
+        fifo_cost_detail, has_layer = ReportInventoryFifoLayer.consume(product, quantity, system_date, **kwargs)
+        if has_layer:
             export_fifo_cost = (sum(item['log_value'] for item in fifo_cost_detail) / quantity) if quantity > 0 else 0
             return {'cost': export_fifo_cost, 'fifo_cost_detail': fifo_cost_detail} if div == 0 else 0
         return {
@@ -870,28 +865,37 @@ class ReportInventorySubFunction:
         }
 
     @classmethod
-    def calculate_cost_dict_for_periodic(cls, period_obj, sub_period_order, tenant, company):
-        """ Cập nhập giá cost cuối kì cho tháng trước """
-        for this_sub_period_cost in ReportInventoryCost.objects.filter(
+    def close_periodic_cost(cls, this_sub_period_cost):
+        """ Chốt giá cost cuối kì (kiểm kê định kì) cho 1 record, chưa save """
+        sum_input_quantity = this_sub_period_cost.sum_input_quantity
+        sum_input_value = this_sub_period_cost.sum_input_value
+        sum_output_quantity = this_sub_period_cost.sum_output_quantity
+
+        if sum_input_quantity > 0:
+            quantity = sum_input_quantity - sum_output_quantity
+            cost = (sum_input_value / sum_input_quantity) if sum_input_quantity > 0 else 0
+            value = quantity * cost
+        else:
+            quantity = this_sub_period_cost.opening_balance_quantity
+            cost = this_sub_period_cost.opening_balance_cost
+            value = this_sub_period_cost.opening_balance_value
+
+        this_sub_period_cost.periodic_ending_balance_quantity = quantity if quantity > 0 else 0
+        this_sub_period_cost.periodic_ending_balance_cost = cost if quantity > 0 else 0
+        this_sub_period_cost.periodic_ending_balance_value = value if quantity > 0 else 0
+        this_sub_period_cost.periodic_closed = True
+        return this_sub_period_cost
+
+    @classmethod
+    def calculate_cost_dict_for_periodic(cls, period_obj, sub_period_order, tenant, company, product_ids=None):
+        """ Cập nhập giá cost cuối kì cho tháng trước (product_ids: chỉ tính cho các sản phẩm này) """
+        sub_period_costs = ReportInventoryCost.objects.filter(
             tenant=tenant, company=company, period_mapped=period_obj, sub_period_order=sub_period_order
-        ):
-            sum_input_quantity = this_sub_period_cost.sum_input_quantity
-            sum_input_value = this_sub_period_cost.sum_input_value
-            sum_output_quantity = this_sub_period_cost.sum_output_quantity
-
-            if sum_input_quantity > 0:
-                quantity = sum_input_quantity - sum_output_quantity
-                cost = (sum_input_value / sum_input_quantity) if sum_input_quantity > 0 else 0
-                value = quantity * cost
-            else:
-                quantity = this_sub_period_cost.opening_balance_quantity
-                cost = this_sub_period_cost.opening_balance_cost
-                value = this_sub_period_cost.opening_balance_value
-
-            this_sub_period_cost.periodic_ending_balance_quantity = quantity if quantity > 0 else 0
-            this_sub_period_cost.periodic_ending_balance_cost = cost if quantity > 0 else 0
-            this_sub_period_cost.periodic_ending_balance_value = value if quantity > 0 else 0
-            this_sub_period_cost.periodic_closed = True
+        )
+        if product_ids is not None:
+            sub_period_costs = sub_period_costs.filter(product_id__in=product_ids)
+        for this_sub_period_cost in sub_period_costs:
+            cls.close_periodic_cost(this_sub_period_cost)
             this_sub_period_cost.save(
                 update_fields=[
                     'periodic_ending_balance_quantity',
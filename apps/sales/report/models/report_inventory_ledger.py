@@ -0,0 +1,213 @@
+from django.db import models
+from apps.shared import SimpleAbstractModel, MasterDataAbstractModel, Caching
+
+
+# - ReportInventoryFifoLayer: lưu SL còn lại của từng lần nhập (lớp giá FIFO) theo sản phẩm + chiều tính cost
+# - ReportInventoryRebuildJob: lưu tiến trình chạy lại sổ kho (ReportInvReplay) của công ty
+
+
+class ReportInventoryFifoLayer(SimpleAbstractModel):
+    company = models.ForeignKey(
+        'company.Company', on_delete=models.CASCADE, related_name='rp_inv_fifo_layer_company', null=True
+    )
+    product = models.ForeignKey(
+        'saledata.Product', on_delete=models.CASCADE, related_name='rp_inv_fifo_layer_product'
+    )
+    warehouse = models.ForeignKey(
+        'saledata.WareHouse', on_delete=models.SET_NULL, related_name='rp_inv_fifo_layer_warehouse', null=True
+    )
+    lot_mapped = models.ForeignKey(
+        'saledata.ProductWareHouseLot',
+        on_delete=models.SET_NULL,
+        related_name='rp_inv_fifo_layer_lot_mapped',
+        null=True
+    )
+    serial_number = models.CharField(max_length=100, blank=True, null=True)
+    sale_order = models.ForeignKey(
+        'saleorder.SaleOrder', on_delete=models.SET_NULL,
+        related_name="rp_inv_fifo_layer_sale_order", null=True
+    )
+    lease_order = models.ForeignKey(
+        'leaseorder.LeaseOrder', on_delete=models.SET_NULL,
+        related_name="rp_inv_fifo_layer_lease_order", null=True
+    )
+    service_order = models.ForeignKey(
+        'serviceorder.ServiceOrder', on_delete=models.SET_NULL,
+        related_name="rp_inv_fifo_layer_service_order", null=True
+    )
+    stock_log = models.OneToOneField(
+        'report.ReportStockLog', on_delete=models.CASCADE, related_name='rp_inv_fifo_layer'
+    )  # log nhập tạo ra lớp giá này
+    trans_code = models.CharField(blank=True, max_length=100, null=True)
+    system_date = models.DateTimeField(null=True)
+    log_order = models.IntegerField(default=0)
+    quantity = models.FloatField(default=0)
+    cost = models.FloatField(default=0)
+    remaining_quantity = models.FloatField(default=0)
+    is_depleted = models.BooleanField(default=False, help_text='is True if remaining quantity is 0')
+
+    # số lớp giá lấy ra (và khóa) mỗi lần quét khi xuất
+    CONSUME_CHUNK_SIZE = 50
+
+    @classmethod
+    def create_layers(cls, new_logs):
+        """ Tạo lớp giá cho các log nhập của sản phẩm FIFO """
+        bulk_info = []
+        for log in new_logs:
+            if log.stock_type == 1 and log.product.valuation_method == 0 and log.quantity > 0:
+                bulk_info.append(
+                    cls(
+                        company_id=log.company_id,
+                        product_id=log.product_id,
+                        warehouse_id=log.warehouse_id,
+                        lot_mapped_id=log.lot_mapped_id,
+                        serial_number=log.serial_number,
+                        sale_order_id=log.sale_order_id,
+                        lease_order_id=log.lease_order_id,
+                        service_order_id=log.service_order_id,
+                        stock_log=log,
+                        trans_code=log.trans_code,
+                        system_date=log.system_date,
+                        log_order=log.log_order,
+                        quantity=log.quantity,
+                        cost=log.cost,
+                        remaining_quantity=log.quantity,
+                    )
+                )
+        return cls.objects.bulk_create(bulk_info)
+
+    @classmethod
+    def consume(cls, product, quantity, system_date=None, **kwargs):
+        """
+        Lấy SL xuất từ các lớp giá còn lại (cũ nhất trước), chỉ khóa và cập nhập các lớp bị lấy.
+        system_date: ngày của log xuất - chỉ lấy lớp giá nhập từ ngày này trở về trước (xuất ghi lùi ngày)
+        Trả về (fifo_cost_detail, has_layer) - has_layer = False nếu key này chưa có lớp giá nào tới ngày xuất.
+        """
+        if system_date:
+            kwargs['system_date__lte'] = system_date
+        fifo_cost_detail = []
+        pushed_quantity = quantity
+        layers_updated = []
+        queryset = cls.objects.select_for_update().filter(
+            product=product, is_depleted=False, **kwargs
+        ).order_by('system_date', 'log_order')
+        offset = 0
+        while pushed_quantity > 0:
+            layers = list(queryset[offset:offset + cls.CONSUME_CHUNK_SIZE])
+            for layer in layers:
+                taken_quantity = min(layer.remaining_quantity, pushed_quantity)
+                fifo_cost_detail.append({
+                    'log_trans_id': str(layer.stock_log_id),
+                    'log_trans_code': layer.trans_code,
+                    'log_fifo_pushed_quantity': taken_quantity,
+                    'log_value': layer.cost * taken_quantity
+                })
+                layer.remaining_quantity -= taken_quantity
+                layer.is_depleted = layer.remaining_quantity <= 0
+                layers_updated.append(layer)
+                pushed_quantity -= taken_quantity
+                if pushed_quantity <= 0:
+                    break
+            if len(layers) < cls.CONSUME_CHUNK_SIZE:
+                break
+            offset += cls.CONSUME_CHUNK_SIZE
+        cls.objects.bulk_update(layers_updated, fields=['remaining_quantity', 'is_depleted'])
+        has_layer = bool(layers_updated) or cls.objects.filter(product=product, **kwargs).exists()
+        return fifo_cost_detail, has_layer
+
+    @classmethod
+    def take_from_layers(cls, layers, quantity, system_date=None):
+        """
+        Giống consume nhưng lấy từ các lớp giá đã nạp sẵn (cũ nhất trước), chỉ tính trong bộ nhớ.
+        Trả về (fifo_cost_detail, các lớp bị lấy) - lưu lại các lớp bằng bulk_update ở nơi gọi
+        """
+        fifo_cost_detail = []
+        layers_updated = []
+        pushed_quantity = quantity
+        for layer in layers:
+            if pushed_quantity <= 0:
+                break
+            if layer.remaining_quantity <= 0:
+                continue
+            if system_date and (layer.system_date is None or layer.system_date > system_date):
+                continue
+            taken_quantity = min(layer.remaining_quantity, pushed_quantity)
+            fifo_cost_detail.append({
+                'log_trans_id': str(layer.stock_log_id),
+                'log_trans_code': layer.trans_code,
+                'log_fifo_pushed_quantity': taken_quantity,
+                'log_value': layer.cost * taken_quantity
+            })
+            layer.remaining_quantity -= taken_quantity
+            layer.is_depleted = layer.remaining_quantity <= 0
+            layers_updated.append(layer)
+            pushed_quantity -= taken_quantity
+        return fifo_cost_detail, layers_updated
+
+    @classmethod
+    def give_back_to_layers(cls, layers_by_log_id, fifo_cost_detail):
+        """ Trả lại SL đã lấy (fifo_cost_detail của 1 log xuất) cho các lớp giá đã nạp sẵn, chỉ tính trong bộ nhớ """
+        layers_updated = []
+        for item in fifo_cost_detail or []:
+            layer = layers_by_log_id.get(str(item.get('log_trans_id')))
+            if layer:
+                layer.remaining_quantity += item.get('log_fifo_pushed_quantity') or 0
+                layer.is_depleted = layer.remaining_quantity <= 0
+                layers_updated.append(layer)
+        return layers_updated
+
+    class Meta:
+        verbose_name = 'Report Inventory FIFO Layer'
+        verbose_name_plural = 'Report Inventory FIFO Layers'
+        ordering = ('system_date', 'log_order')
+        default_permissions = ()
+        permissions = ()
+        indexes = [
+            models.Index(fields=['product', 'is_depleted', 'system_date', 'log_order']),
+            models.Index(fields=['product', 'warehouse', 'lot_mapped', 'is_depleted', 'system_date']),
+        ]
+
+
+REBUILD_JOB_STATE = [
+    (0, 'Waiting'),
+    (1, 'Running'),
+    (2, 'Done'),
+    (3, 'Failed'),
+]
+
+
+class ReportInventoryRebuildJob(MasterDataAbstractModel):
+    state = models.SmallIntegerField(choices=REBUILD_JOB_STATE, default=0)
+    product_ids = models.JSONField(default=list, help_text='rỗng: chạy lại toàn bộ sản phẩm của công ty')
+    workers = models.PositiveSmallIntegerField(default=1)
+    total_postings = models.IntegerField(default=0)
+    done_postings = models.IntegerField(default=0)
+    msg = models.TextField(blank=True)
+    date_started = models.DateTimeField(null=True)
+    date_finished = models.DateTimeField(null=True)
+
+    @property
+    def key_progress(self):
+        return f'rp_inv_rebuild_job_progress_{self.id.hex}'
+
+    def update_progress(self, done_postings, total_postings):
+        # sổ kho được chạy lại trong 1 transaction (job cập nhập trong đó chỉ thấy được khi commit)
+        # -> tiến trình ghi vào cache, task lưu lại vào job khi chạy xong
+        self.done_postings = done_postings
+        self.total_postings = total_postings
+        Caching().set(self.key_progress, {'done_postings': done_postings, 'total_postings': total_postings})
+        return True
+
+    def get_progress(self):
+        if self.state == 1:
+            progress = Caching().get(self.key_progress)
+            if progress:
+                return progress
+        return {'done_postings': self.done_postings, 'total_postings': self.total_postings}
+
+    class Meta:
+        verbose_name = 'Report Inventory Rebuild Job'
+        verbose_name_plural = 'Report Inventory Rebuild Jobs'
+        ordering = ('-date_created',)
+        default_permissions = ()
+        permissions = ()
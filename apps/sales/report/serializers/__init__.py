@@ -3,3 +3,4 @@ from .balance_init import *
 from .report_inventory import *
 from .report_purchasing import *
 from .report_budget import *
+from .report_export import *
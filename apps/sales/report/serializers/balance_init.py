@@ -331,12 +331,13 @@ class BalanceInitializationCreateSerializer(serializers.ModelSerializer):
                             }
                         })
 
-                        # cập nhập hoặc tạo giá đich danh khi nhập
-                        ProductSpecificIdentificationSerialNumber.create_or_update_si_product_serial(
-                            product=instance.product,
-                            serial_obj=serial_obj,
-                            specific_value=serial.get('specific_value', 0)
-                        )
+                        # cập nhập hoặc tạo giá đich danh khi nhập (chạy lại sổ kho: giữ nguyên giá đích danh hiện có)
+                        if not ReportInvLog.is_capturing():
+                            ProductSpecificIdentificationSerialNumber.create_or_update_si_product_serial(
+                                product=instance.product,
+                                serial_obj=serial_obj,
+                                specific_value=serial.get('specific_value', 0)
+                            )
             else:
                 casted_quantity = ReportInvCommonFunc.cast_quantity_to_unit(
                     instance.product.inventory_uom,
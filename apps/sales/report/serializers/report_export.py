@@ -0,0 +1,25 @@
+from rest_framework import serializers
+from apps.sales.report.models import ReportExportJob
+
+
+class ReportExportJobListSerializer(serializers.ModelSerializer):
+    file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportExportJob
+        fields = (
+            'id',
+            'state',
+            'report_code',
+            'export_format',
+            'params',
+            'file',
+            'msg',
+            'date_created',
+            'date_started',
+            'date_finished'
+        )
+
+    @classmethod
+    def get_file(cls, obj):
+        return obj.file.get_detail() if obj.file else {}
@@ -0,0 +1,114 @@
+import logging
+import tempfile
+
+from celery import shared_task
+from django.core.files import File
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from apps.core.company.models import Company
+from apps.sales.report.models import ReportInventoryRebuildJob, ReportExportJob
+from apps.sales.report.utils.inventory_log import ReportInvCommonFunc
+from apps.sales.report.utils.inventory_replay import ReportInvReplay
+from apps.shared import DisperseModel
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def open_inventory_sub_period():
+    # đầu mỗi tháng: đẩy số dư cuối kỳ trước qua đầu kỳ này cho tất cả công ty,
+    # để phiếu nhập/xuất đầu tiên trong tháng không phải chạy bước này trong request của user.
+    # công ty lỗi không chặn các công ty khác, nhưng task sẽ báo lỗi (log + raise) sau khi chạy hết
+    failed_companies = []
+    for company in Company.objects.select_related('company_config'):
+        try:
+            if ReportInvCommonFunc.open_current_sub_period(company) is False:
+                logger.error('[open_inventory_sub_period] Can not open sub period for company: %s', company.id)
+                failed_companies.append(str(company.id))
+        except Exception:
+            logger.exception('[open_inventory_sub_period] Open sub period error for company: %s', company.id)
+            failed_companies.append(str(company.id))
+    if failed_companies:
+        raise Exception(f'Open inventory sub period failed for companies: {", ".join(failed_companies)}')
+    return True
+
+
+@shared_task
+def rebuild_inventory_report(job_id):
+    # chạy lại sổ kho của công ty theo job, cập nhập tiến trình vào job để FE theo dõi
+    job = ReportInventoryRebuildJob.objects.filter(id=job_id, state=0).first()
+    if not job:
+        return False
+    job.state = 1
+    job.date_started = timezone.now()
+    job.save(update_fields=['state', 'date_started'])
+    try:
+        ReportInvReplay(
+            job.company_id,
+            product_ids=job.product_ids or None,
+            workers=job.workers,
+            progress_callback=job.update_progress
+        ).run()
+        job.state = 2
+    except Exception as err:
+        job.state = 3
+        job.msg = str(err)
+    job.date_finished = timezone.now()
+    job.save(update_fields=['state', 'msg', 'date_finished', 'done_postings', 'total_postings'])
+    return job.state == 2
+
+
+def export_report_to_file(job):
+    """
+    Xuất báo cáo của job qua view class (queryset / serializer / writer), không qua HTTP:
+    user, tenant, company, employee và query params lấy từ job (ReportExportJobRequest),
+    quyền + filter backends giống API GET của view.
+    Ghi file stream ra file tạm rồi lưu vào attachments (Files)
+    """
+    if not job.employee_created or job.employee_created.company_id != job.company_id:
+        raise ValueError('Employee created is not working in company of this export job.')
+    view_cls = getattr(resolve(reverse(job.report_code)).func, 'view_class', None)
+    if not getattr(view_cls, 'export_columns', None):
+        raise ValueError(f'Report {job.report_code} does not support export.')
+
+    file_name, content_type, chunks = view_cls.export_job_stream(job)
+    files_cls = DisperseModel(app_model='attachments.Files').get_model()
+    with tempfile.TemporaryFile() as tmp_file:
+        file_size = 0
+        for chunk in chunks:
+            tmp_file.write(chunk)
+            file_size += len(chunk)
+        tmp_file.seek(0)
+        return files_cls.objects.create(
+            tenant_id=job.tenant_id,
+            company_id=job.company_id,
+            employee_created_id=job.employee_created_id,
+            file_name=file_name,
+            file_size=file_size,
+            file_type=content_type,
+            remarks=f'Export {job.report_code}',
+            file=File(tmp_file, name=file_name),
+        )
+
+
+@shared_task
+def export_report(job_id):
+    # xuất báo cáo ở background, FE theo dõi job và tải file qua attachments khi xong
+    job = ReportExportJob.objects.select_related(
+        'tenant', 'company__company_config', 'employee_created'
+    ).filter(id=job_id, state=0).first()
+    if not job:
+        return False
+    job.state = 1
+    job.date_started = timezone.now()
+    job.save(update_fields=['state', 'date_started'])
+    try:
+        job.file = export_report_to_file(job)
+        job.state = 2
+    except Exception as err:
+        job.state = 3
+        job.msg = str(err)
+    job.date_finished = timezone.now()
+    job.save(update_fields=['state', 'file', 'msg', 'date_finished'])
+    return job.state == 2
@@ -1,3 +1,685 @@
+import csv
+import datetime
+import io
+import uuid
+import zipfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.db import transaction
 from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.core.account.models import User
+from apps.core.company.models import Company, CompanyConfig
+from apps.core.hr.models import Employee, Group
+from apps.core.tenant.models import Tenant
+from apps.masterdata.saledata.models import (
+    Periods, Product, SubPeriods, UnitOfMeasure, UnitOfMeasureGroup, WareHouse,
+)
+from apps.masterdata.saledata.models.product import ProductSpecificIdentificationSerialNumber
+from apps.sales.report.models import (
+    ReportCashflow, ReportExportJob, ReportInventoryCost, ReportInventoryCostLatestLog, ReportInventoryFifoLayer,
+    ReportInventorySubFunction, ReportStock, ReportStockLog,
+)
+from apps.sales.report.tasks import export_report, open_inventory_sub_period
+from apps.sales.report.utils.inventory_log import ReportInvCommonFunc, ReportInvLog
+from apps.sales.report.utils.inventory_log_batch import ReportInvBatchPosting
+from apps.sales.report.utils.inventory_repropagation import ReportInventoryRepropagation
+from apps.sales.report.utils.inventory_replay import ReportInvReplay
+from apps.sales.report.utils.inventory_report_builder import IN_TRANS_TITLE, OUT_TRANS_TITLE, ReportInvListBuilder
+from apps.sales.report.views import ReportCashflowList, ReportInventoryCostList, ReportRevenueList, ReportStockList
+from apps.sales.saleorder.models import SaleOrder
+from apps.shared.extends.pagination import CustomResultsSetPagination
+from apps.shared.extends.tests import bulk_new
+
+
+class InventoryLedgerTestMixin:
+    """ Công ty kê khai thường xuyên, tính cost theo kho, năm 2025 (12 kỳ tháng), 2 kho, SP bình quân + FIFO """
+
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_INV')
+        company = bulk_new(Company, title='Company', code='COMPANY_INV', sub_domain='company-inv', tenant=self.tenant)
+        bulk_new(CompanyConfig, company=company)
+        self.company = Company.objects.get(id=company.id)
+        common = {'tenant': self.tenant, 'company': self.company}
+        self.employee = bulk_new(Employee, first_name='Inventory', last_name='Test', code='EMP_INV', **common)
+        self.period = bulk_new(
+            Periods, title='2025', code='2025', fiscal_year=2025,
+            start_date=datetime.date(2025, 1, 1), end_date=datetime.date(2025, 12, 31), **common
+        )
+        for month in range(1, 13):
+            bulk_new(
+                SubPeriods, period_mapped=self.period, order=month, code=f'M{month}', name=f'M{month}',
+                start_date=datetime.date(2025, month, 1),
+                end_date=datetime.date(2025 + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1),
+            )
+        self.product_wa = bulk_new(Product, title='Weighted average', code='WA', valuation_method=1, **common)
+        self.product_fifo = bulk_new(Product, title='FIFO', code='FIFO', valuation_method=0, **common)
+        self.warehouse_1 = bulk_new(WareHouse, title='Warehouse 1', code='W1', **common)
+        self.warehouse_2 = bulk_new(WareHouse, title='Warehouse 2', code='W2', **common)
+
+    def new_doc(self, code, month, day, lines):
+        """ lines: [(product, warehouse, stock_type, quantity, cost)] -> (doc_obj, doc_date, doc_data) """
+        doc_date = datetime.datetime(2025, month, day, 9)
+        doc_obj = SimpleNamespace(
+            id=code, code=code, tenant=self.tenant, company=self.company, tenant_id=self.tenant.id,
+            company_id=self.company.id, employee_created=self.employee, employee_inherit=self.employee,
+        )
+        doc_data = [
+            {
+                'product': product, 'warehouse': warehouse, 'system_date': doc_date, 'posting_date': doc_date,
+                'document_date': doc_date, 'stock_type': stock_type, 'trans_id': code, 'trans_code': code,
+                'trans_title': code, 'quantity': quantity, 'cost': cost, 'value': quantity * cost, 'lot_data': {},
+            } for product, warehouse, stock_type, quantity, cost in lines
+        ]
+        return doc_obj, doc_date, doc_data
+
+    def post_docs(self, docs, **kwargs):
+        for doc_obj, doc_date, doc_data in docs:
+            self.assertIsNotNone(ReportInvLog.log(doc_obj, doc_date, doc_data, **kwargs), doc_obj.code)
+
+    def snapshot(self):
+        """ toàn bộ sổ kho của công ty, không phụ thuộc id """
+        log_keys = {
+            log_id: (trans_code, log_order)
+            for log_id, trans_code, log_order in ReportStockLog.objects.filter(
+                company=self.company
+            ).values_list('id', 'trans_code', 'log_order')
+        }
+        return {
+            'logs': sorted(
+                (
+                    log.product.code, log.physical_warehouse.code, log.trans_code, log.log_order, log.stock_type,
+                    log.quantity, round(log.cost, 6), round(log.value, 6), log.perpetual_current_quantity,
+                    round(log.perpetual_current_cost, 6), round(log.perpetual_current_value, 6),
+                    log.report_stock.sub_period_order,
+                    [
+                        (item['log_fifo_pushed_quantity'], item['log_value'], log_keys[uuid.UUID(item['log_trans_id'])])
+                        for item in log.fifo_cost_detail
+                    ],
+                ) for log in ReportStockLog.objects.filter(company=self.company).select_related(
+                    'product', 'physical_warehouse', 'report_stock'
+                )
+            ),
+            'costs': sorted(
+                (
+                    rp_cost.product.code, rp_cost.warehouse.code, rp_cost.sub_period_order,
+                    rp_cost.opening_balance_quantity, round(rp_cost.opening_balance_cost, 6),
+                    round(rp_cost.opening_balance_value, 6), rp_cost.sum_input_quantity,
+                    round(rp_cost.sum_input_value, 6), rp_cost.sum_output_quantity, round(rp_cost.sum_output_value, 6),
+                    rp_cost.ending_balance_quantity, round(rp_cost.ending_balance_cost, 6),
+                    round(rp_cost.ending_balance_value, 6), log_keys.get(rp_cost.sub_latest_log_id),
+                ) for rp_cost in ReportInventoryCost.objects.filter(company=self.company).select_related(
+                    'product', 'warehouse'
+                )
+            ),
+            'latest_logs': sorted(
+                (record.product.code, record.warehouse.code, log_keys.get(record.latest_log_id))
+                for record in ReportInventoryCostLatestLog.objects.filter(
+                    product__company=self.company
+                ).select_related('product', 'warehouse')
+            ),
+            'fifo_layers': sorted(
+                (layer.product.code, log_keys[layer.stock_log_id], layer.remaining_quantity, layer.is_depleted)
+                for layer in ReportInventoryFifoLayer.objects.filter(company=self.company).select_related('product')
+            ),
+            'report_stocks': sorted(
+                ReportStock.objects.filter(company=self.company).values_list('product__code', 'sub_period_order')
+            ),
+        }
+
+
+class ReportInvBatchPostingTestCase(InventoryLedgerTestMixin, TestCase):
+    def get_docs(self):
+        wa, fifo = self.product_wa, self.product_fifo
+        wh_1, wh_2 = self.warehouse_1, self.warehouse_2
+        return [
+            self.new_doc('GR1', 3, 2, [
+                (wa if idx % 2 else fifo, wh_1 if idx % 3 else wh_2, 1, 10 + idx, 100 + idx * 7) for idx in range(24)
+            ]),
+            self.new_doc('GI1', 3, 10, [(wa, wh_1, -1, 15, 0), (fifo, wh_1, -1, 25, 0), (fifo, wh_2, -1, 5, 0)]),
+            self.new_doc('GR2', 4, 5, [(wa, wh_1, 1, 4, 300), (fifo, wh_2, 1, 6, 50)]),
+            self.new_doc('GI2', 4, 20, [(wa, wh_1, -1, 20, 0), (fifo, wh_1, -1, 30, 0)]),
+            # ghi lùi ngày vào tháng 3 sau khi tháng 4 đã có phát sinh
+            self.new_doc('GR3', 3, 20, [(wa, wh_1, 1, 8, 90), (fifo, wh_1, 1, 7, 40)]),
+        ]
+
+    def test_batch_same_as_per_row(self):
+        snapshots = {}
+        for batch_mode in (False, True):
+            with transaction.atomic():
+                self.post_docs(self.get_docs(), batch_mode=batch_mode)
+                snapshots[batch_mode] = self.snapshot()
+                transaction.set_rollback(True)
+        self.assertEqual(len(snapshots[False]['logs']), 33)
+        self.assertEqual(len(snapshots[False]['costs']), 8)
+        for key, value in snapshots[False].items():
+            self.assertEqual(snapshots[True][key], value, key)
+
+    def test_fifo_and_specific_in_memory(self):
+        # lớp giá FIFO + serial đích danh nạp 1 lần cho cả phiếu, không lấy / bật tắt từng dòng
+        fifo, wh_1 = self.product_fifo, self.warehouse_1
+        common = {'tenant': self.tenant, 'company': self.company}
+        specific = bulk_new(Product, title='Specific', code='SI', valuation_method=2, **common)
+        for serial_number, specific_value in (('SN1', 500), ('SN2', 700)):
+            bulk_new(
+                ProductSpecificIdentificationSerialNumber, product=specific, serial_number=serial_number,
+                specific_value=specific_value, serial_status=1, **common
+            )
+
+        def get_docs():
+            docs = [
+                self.new_doc('GR1', 3, 2, [
+                    (fifo, wh_1, 1, 10, 100), (fifo, wh_1, 1, 10, 200), (specific, wh_1, 1, 1, 500),
+                    (specific, wh_1, 1, 1, 700),
+                ]),
+                self.new_doc('GI1', 3, 10, [
+                    (fifo, wh_1, -1, 5, 0), (fifo, wh_1, -1, 8, 0), (specific, wh_1, -1, 1, 0),
+                ]),
+            ]
+            for (_doc_obj, _doc_date, doc_data), serial_numbers in zip(docs, [['SN1', 'SN2'], ['SN2']]):
+                for item, serial_number in zip(doc_data[2:], serial_numbers):
+                    item['serial_data'] = {'serial_number': serial_number}
+            return docs
+
+        results = {}
+        for batch_mode in (False, True):
+            with transaction.atomic(), mock.patch.object(
+                    ReportInventoryFifoLayer, 'consume', wraps=ReportInventoryFifoLayer.consume
+            ) as consume_mock, mock.patch.object(
+                ProductSpecificIdentificationSerialNumber, 'on_off_specific_serial',
+                wraps=ProductSpecificIdentificationSerialNumber.on_off_specific_serial
+            ) as on_off_mock:
+                self.post_docs(get_docs(), batch_mode=batch_mode)
+                results[batch_mode] = (
+                    self.snapshot(),
+                    dict(ProductSpecificIdentificationSerialNumber.objects.filter(
+                        product=specific
+                    ).values_list('serial_number', 'serial_status')),
+                    consume_mock.call_count, on_off_mock.call_count,
+                )
+                transaction.set_rollback(True)
+        snapshot, serial_status, consume_count, on_off_count = results[True]
+        self.assertEqual((consume_count, on_off_count), (0, 0))
+        self.assertEqual(results[False][2:], (2, 3))
+        self.assertEqual(serial_status, {'SN1': 0, 'SN2': 1})
+        self.assertEqual(serial_status, results[False][1])
+        for key, value in results[False][0].items():
+            self.assertEqual(snapshot[key], value, key)
+        issue_costs = sorted((log[2], log[3], log[6]) for log in snapshot['logs'] if log[2] == 'GI1')
+        self.assertEqual(issue_costs, [('GI1', 1, 100), ('GI1', 2, 137.5), ('GI1', 3, 700)])
+
+
+class ReportInventoryRepropagationTestCase(InventoryLedgerTestMixin, TestCase):
+    def test_backdated_into_period_with_later_months(self):
+        wa, fifo = self.product_wa, self.product_fifo
+        wh_1, wh_2 = self.warehouse_1, self.warehouse_2
+        for batch_mode in (False, True):
+            with transaction.atomic():
+                self.post_docs([
+                    self.new_doc('GR1', 3, 2, [(wa, wh_1, 1, 10, 100)]),
+                    # tháng 4, 5 được mở, WA - kho 1 không có phát sinh tháng 4
+                    self.new_doc('GR2', 5, 5, [(wa, wh_1, 1, 5, 200)]),
+                    # ghi lùi ngày vào tháng 3: key đã có (WA - kho 1) và key mới (FIFO - kho 2)
+                    self.new_doc('GR3', 3, 20, [(wa, wh_1, 1, 4, 100), (fifo, wh_2, 1, 6, 50)]),
+                ], batch_mode=batch_mode)
+                costs = {
+                    (product_code, warehouse_code, sub_period_order): (opening, ending, ending_value)
+                    for product_code, warehouse_code, sub_period_order, opening, ending, ending_value
+                    in ReportInventoryCost.objects.filter(company=self.company).values_list(
+                        'product__code', 'warehouse__code', 'sub_period_order',
+                        'opening_balance_quantity', 'ending_balance_quantity', 'ending_balance_value'
+                    )
+                }
+                transaction.set_rollback(True)
+            self.assertEqual(costs, {
+                ('WA', 'W1', 3): (0, 14, 1400),
+                ('WA', 'W1', 4): (14, 14, 1400),
+                ('WA', 'W1', 5): (14, 19, 2400),
+                ('FIFO', 'W2', 3): (0, 6, 300),
+                ('FIFO', 'W2', 4): (6, 6, 300),
+                ('FIFO', 'W2', 5): (6, 6, 300),
+            }, batch_mode)
+
+
+    def test_backdated_fifo_issue_skips_later_layers(self):
+        fifo, wh_1 = self.product_fifo, self.warehouse_1
+        for batch_mode in (False, True):
+            with transaction.atomic():
+                self.post_docs([
+                    self.new_doc('GR1', 3, 2, [(fifo, wh_1, 1, 10, 100)]),
+                    self.new_doc('GI1', 3, 10, [(fifo, wh_1, -1, 10, 0)]),
+                    self.new_doc('GR2', 5, 5, [(fifo, wh_1, 1, 10, 200)]),
+                    # xuất ghi lùi ngày vào tháng 4: không được lấy lớp giá nhập tháng 5
+                    self.new_doc('GI2', 4, 20, [(fifo, wh_1, -1, 4, 0)]),
+                ], batch_mode=batch_mode)
+                issue = ReportStockLog.objects.get(company=self.company, trans_code='GI2')
+                layers = dict(
+                    ReportInventoryFifoLayer.objects.filter(company=self.company).values_list(
+                        'trans_code', 'remaining_quantity'
+                    )
+                )
+                transaction.set_rollback(True)
+            self.assertEqual(issue.fifo_cost_detail, [], batch_mode)
+            self.assertEqual(layers, {'GR1': 0, 'GR2': 10}, batch_mode)
+
+    def test_backdated_fifo_receipt_recosts_later_issue(self):
+        fifo, wh_1 = self.product_fifo, self.warehouse_1
+        for batch_mode in (False, True):
+            with transaction.atomic():
+                self.post_docs([
+                    self.new_doc('GR1', 3, 2, [(fifo, wh_1, 1, 10, 100)]),
+                    self.new_doc('GI1', 4, 10, [(fifo, wh_1, -1, 5, 0)]),
+                    # nhập ghi lùi ngày trước GR1: GI1 phải lấy lớp giá này trước
+                    self.new_doc('GR2', 3, 1, [(fifo, wh_1, 1, 10, 40)]),
+                ], batch_mode=batch_mode)
+                issue = ReportStockLog.objects.get(company=self.company, trans_code='GI1')
+                layers = dict(
+                    ReportInventoryFifoLayer.objects.filter(company=self.company).values_list(
+                        'trans_code', 'remaining_quantity'
+                    )
+                )
+                costs = {
+                    sub_period_order: (ending_quantity, ending_value, output_value)
+                    for sub_period_order, ending_quantity, ending_value, output_value
+                    in ReportInventoryCost.objects.filter(company=self.company, product=fifo).values_list(
+                        'sub_period_order', 'ending_balance_quantity', 'ending_balance_value', 'sum_output_value'
+                    )
+                }
+                latest_log = ReportInventoryCostLatestLog.objects.get(product=fifo, warehouse=wh_1).latest_log
+                transaction.set_rollback(True)
+            self.assertEqual((issue.cost, issue.value), (40, 200), batch_mode)
+            self.assertEqual(
+                [(item['log_trans_code'], item['log_fifo_pushed_quantity']) for item in issue.fifo_cost_detail],
+                [('GR2', 5)], batch_mode
+            )
+            self.assertEqual(
+                (issue.perpetual_current_quantity, issue.perpetual_current_value), (15, 1200), batch_mode
+            )
+            self.assertEqual(layers, {'GR1': 10, 'GR2': 5}, batch_mode)
+            self.assertEqual(costs[3], (20, 1400, 0), batch_mode)
+            self.assertEqual(costs[4], (15, 1200, 200), batch_mode)
+            self.assertEqual(latest_log.trans_code, 'GI1', batch_mode)
+
+    def test_sub_latest_logs_one_query(self):
+        wa, wh_1 = self.product_wa, self.warehouse_1
+        self.post_docs([
+            self.new_doc('GR1', 3, 2, [(wa, wh_1, 1, 10, 100)]),
+            self.new_doc('GI1', 3, 12, [(wa, wh_1, -1, 2, 0)]),
+            self.new_doc('GR2', 5, 5, [(wa, wh_1, 1, 5, 200)]),
+            self.new_doc('GR3', 3, 20, [(wa, wh_1, 1, 4, 100)]),
+        ])
+        log = ReportStockLog.objects.select_related('report_stock').get(company=self.company, trans_code='GR1')
+        sub_period_costs = list(ReportInventoryCost.objects.filter(company=self.company, product=wa))
+        with self.assertNumQueries(1):
+            sub_latest_logs = ReportInventoryRepropagation.get_sub_latest_logs(
+                log, sub_period_costs, warehouse_id=wh_1.id
+            )
+        self.assertEqual(
+            {
+                rp_cost.sub_period_order: sub_latest_logs[rp_cost.sub_period_id].trans_code
+                for rp_cost in sub_period_costs if rp_cost.sub_period_id in sub_latest_logs
+            },
+            {3: 'GR3', 5: 'GR2'}
+        )
+        for rp_cost in sub_period_costs:
+            latest_log = sub_latest_logs.get(rp_cost.sub_period_id)
+            self.assertEqual(rp_cost.sub_latest_log_id, latest_log.id if latest_log else None)
+
+
+class OpenInventorySubPeriodTestCase(InventoryLedgerTestMixin, TestCase):
+    def test_no_current_period(self):
+        # năm tài chính 2025 không phải kỳ hiện tại -> không có gì để mở
+        self.assertIsNone(ReportInvCommonFunc.open_current_sub_period(self.company))
+
+    def test_failed_company_is_reported(self):
+        other_company = bulk_new(
+            Company, title='Other', code='COMPANY_OTHER', sub_domain='company-other', tenant=self.tenant
+        )
+        bulk_new(CompanyConfig, company=other_company)
+        opened = []
+
+        def open_sub_period(company):
+            if company.id == self.company.id:
+                raise ValueError('Lock timeout')
+            opened.append(company.id)
+            return True
+
+        with mock.patch.object(ReportInvCommonFunc, 'open_current_sub_period', side_effect=open_sub_period):
+            with self.assertLogs('apps.sales.report.tasks', level='ERROR') as logs:
+                with self.assertRaisesMessage(Exception, str(self.company.id)):
+                    open_inventory_sub_period()
+        # công ty lỗi không chặn công ty khác
+        self.assertEqual(opened, [other_company.id])
+        self.assertIn(str(self.company.id), logs.output[0])
+
+
+class ReportInvReplayTestCase(InventoryLedgerTestMixin, TestCase):
+    def get_docs(self):
+        wa, fifo = self.product_wa, self.product_fifo
+        wh_1, wh_2 = self.warehouse_1, self.warehouse_2
+        return [
+            self.new_doc('GR1', 3, 2, [(wa, wh_1, 1, 10, 100), (fifo, wh_1, 1, 20, 50), (fifo, wh_2, 1, 5, 40)]),
+            self.new_doc('GI1', 3, 10, [(wa, wh_1, -1, 4, 0), (fifo, wh_1, -1, 25, 0)]),
+            self.new_doc('GR2', 4, 5, [(wa, wh_1, 1, 4, 300), (fifo, wh_2, 1, 6, 50)]),
+            # ghi lùi ngày vào tháng 3 sau khi tháng 4 đã có phát sinh
+            self.new_doc('GR3', 3, 20, [(wa, wh_1, 1, 8, 90), (fifo, wh_1, 1, 7, 40)]),
+        ]
+
+    def replay(self, docs, **kwargs):
+        # thay các phiếu nguồn bằng dữ liệu ghi log của các phiếu test (mỗi phiếu 1 lần ghi log)
+        with mock.patch.object(
+                ReportInvReplay, 'iter_doc_postings',
+                return_value=iter([[(doc_obj, doc_date, doc_data, False)] for doc_obj, doc_date, doc_data in docs])
+        ):
+            return ReportInvReplay(self.company.id, **kwargs).run()
+
+    def test_replay_same_as_live(self):
+        self.post_docs(self.get_docs())
+        live = self.snapshot()
+        self.assertEqual(self.replay(self.get_docs()), 4)
+        for key, value in live.items():
+            self.assertEqual(self.snapshot()[key], value, key)
+
+    def test_replay_buckets_read_docs_once(self):
+        self.post_docs(self.get_docs())
+        live = self.snapshot()
+        # 1 sản phẩm mỗi nhóm: WA và FIFO ghi lại trong 2 transaction, các phiếu chỉ được đọc 1 lần
+        buckets = [{str(self.product_wa.id)}, {str(self.product_fifo.id)}]
+        with mock.patch.object(ReportInvReplay, 'make_buckets', return_value=buckets):
+            with mock.patch.object(
+                    ReportInvReplay, 'iter_doc_postings',
+                    return_value=iter([
+                        [(doc_obj, doc_date, doc_data, False)] for doc_obj, doc_date, doc_data in self.get_docs()
+                    ])
+            ) as iter_doc_postings:
+                with mock.patch.object(
+                        ReportInvReplay, 'run_bucket', autospec=True, side_effect=ReportInvReplay.run_bucket
+                ) as run_bucket, mock.patch.object(
+                    ReportInvReplay, 'iter_spilled_postings', side_effect=ReportInvReplay.iter_spilled_postings
+                ) as iter_spilled_postings:
+                    self.assertEqual(ReportInvReplay(self.company.id).run(), 4)
+        self.assertEqual(iter_doc_postings.call_count, 1)
+        self.assertEqual(run_bucket.call_count, 2)
+        # phần phiếu của mỗi nhóm được đọc lại từ file tạm của nhóm, không giữ trong bộ nhớ
+        self.assertEqual(iter_spilled_postings.call_count, 2)
+        for key, value in live.items():
+            self.assertEqual(self.snapshot()[key], value, key)
+
+    def test_failed_replay_keeps_old_ledger(self):
+        self.post_docs(self.get_docs())
+        live = self.snapshot()
+        with mock.patch.object(ReportInvBatchPosting, 'run', side_effect=[True, ValueError('Lock timeout')]):
+            with self.assertRaises(ValueError):
+                self.replay(self.get_docs())
+        self.assertEqual(self.snapshot(), live)
+
+    def test_capture_skips_side_effects(self):
+        self.assertFalse(ReportInvLog.is_capturing())
+        doc_obj, doc_date, doc_data = self.get_docs()[0]
+        with ReportInvLog.capture() as postings:
+            self.assertTrue(ReportInvLog.is_capturing())
+            self.assertEqual(ReportInvLog.log(doc_obj, doc_date, doc_data), [])
+        self.assertEqual(postings, [(doc_obj, doc_date, doc_data, False)])
+        self.assertFalse(ReportStockLog.objects.filter(company=self.company).exists())
+
+
+class ReportListPaginationTestCase(TestCase):
+    def test_no_page_without_changing_shared_paginator(self):
+        # báo cáo không phân trang bằng pagination_class riêng, không sửa page_size của class dùng chung
+        default_page_size = CustomResultsSetPagination.page_size
+        request = Request(APIRequestFactory().get('/'))
+        for view_cls in (ReportInventoryCostList, ReportStockList):
+            self.assertIsNot(view_cls.pagination_class, CustomResultsSetPagination)
+            self.assertEqual(view_cls.pagination_class().get_page_size(request), settings.CUSTOM_PAGE_MAXIMUM_SIZE)
+        self.assertEqual(CustomResultsSetPagination.page_size, default_page_size)
+
+
+class ReportInvListBuilderTestCase(InventoryLedgerTestMixin, TestCase):
+    """ ReportInvListBuilder so với cách cũ: query log / cost theo từng dòng báo cáo """
+    date_range = [5, 25]
+
+    def setUp(self):
+        super().setUp()
+        common = {'tenant': self.tenant, 'company': self.company}
+        uom_group = bulk_new(UnitOfMeasureGroup, title='Group', code='UG', **common)
+        uom = bulk_new(UnitOfMeasure, title='Box', code='BOX', group=uom_group, ratio=2.0, **common)
+        Product.objects.filter(id__in=[self.product_wa.id, self.product_fifo.id]).update(inventory_uom=uom)
+        wa, fifo = self.product_wa, self.product_fifo
+        wh_1, wh_2 = self.warehouse_1, self.warehouse_2
+        self.post_docs([
+            self.new_doc('GR1', 3, 2, [(wa, wh_1, 1, 10, 100), (fifo, wh_1, 1, 20, 50), (fifo, wh_2, 1, 5, 40)]),
+            self.new_doc('GI1', 3, 10, [(wa, wh_1, -1, 4, 0), (fifo, wh_1, -1, 25, 0)]),
+            self.new_doc('GR2', 3, 20, [(wa, wh_1, 1, 8, 90), (fifo, wh_2, 1, 7, 40)]),
+            self.new_doc('GI2', 3, 28, [(wa, wh_1, -1, 3, 0)]),
+        ])
+        ReportStockLog.objects.filter(trans_code__startswith='GR').update(trans_title='Goods receipt')
+        ReportStockLog.objects.filter(trans_code__startswith='GI').update(trans_title='Goods issue')
+        self.cost_cfg = ReportInvCommonFunc.get_cost_config(self.company)
+        self.wh_list = [[wh.id, wh.code, wh.title] for wh in (wh_1, wh_2)]
+
+    @classmethod
+    def legacy_in_out(cls, log, inventory_uom):
+        prefix = 'in' if log.trans_title in IN_TRANS_TITLE else 'out'
+        return {
+            f'{prefix}_quantity': log.quantity / inventory_uom.ratio,
+            f'{prefix}_value': log.value,
+            'system_date': log.system_date,
+            'log_order': log.log_order,
+            'trans_title': log.trans_title,
+            'trans_code': log.trans_code,
+        }
+
+    def legacy_cost_activities(self, obj):
+        inventory_uom = obj.product.inventory_uom
+        kwargs = {'physical_warehouse_id': obj.warehouse_id, 'serial_number': obj.serial_number}
+        if 1 in self.cost_cfg:
+            kwargs['warehouse_id'] = obj.warehouse_id
+        sums = {'in': [0, 0], 'out': [0, 0]}
+        data_stock_activity = []
+        for log in obj.product.report_stock_log_product.filter(
+                report_stock__period_mapped_id=obj.period_mapped_id,
+                report_stock__sub_period_order=obj.sub_period_order,
+                **kwargs
+        ):
+            if log.system_date.day in list(range(self.date_range[0], self.date_range[1] + 1)):
+                sums['in' if log.stock_type == 1 else 'out'][0] += log.quantity
+                sums['in' if log.stock_type == 1 else 'out'][1] += log.value
+                if log.trans_title in IN_TRANS_TITLE + OUT_TRANS_TITLE:
+                    data_stock_activity.append(self.legacy_in_out(log, inventory_uom))
+        this_sub_value = ReportInventorySubFunction.get_this_sub_period_cost_dict(obj)
+        return {
+            'opening_balance_quantity': this_sub_value['opening_balance_quantity'] / inventory_uom.ratio,
+            'opening_balance_value': this_sub_value['opening_balance_value'],
+            'sum_in_quantity': sums['in'][0] / inventory_uom.ratio,
+            'sum_in_value': sums['in'][1],
+            'sum_out_quantity': sums['out'][0] / inventory_uom.ratio,
+            'sum_out_value': sums['out'][1],
+            'ending_balance_quantity': this_sub_value['ending_balance_quantity'] / inventory_uom.ratio,
+            'ending_balance_value': this_sub_value['ending_balance_value'],
+            'data_stock_activity': sorted(data_stock_activity, key=lambda key: (key['system_date'], key['log_order'])),
+            'periodic_closed': obj.periodic_closed
+        }
+
+    def legacy_stock_activities(self, obj):
+        inventory_uom = obj.product.inventory_uom
+        result = []
+        for warehouse_id, warehouse_code, warehouse_title in self.wh_list:
+            this_sub_period_cost = obj.product.report_inventory_cost_product.filter(
+                period_mapped_id=obj.period_mapped_id, sub_period_order=obj.sub_period_order, warehouse_id=warehouse_id
+            ).first()
+            if this_sub_period_cost:
+                this_balance = ReportInventorySubFunction.get_this_sub_period_cost_dict(this_sub_period_cost)
+                data_stock_activity = []
+                for log in obj.product.report_stock_log_product.filter(
+                        report_stock__period_mapped_id=obj.period_mapped_id,
+                        report_stock__sub_period_order=obj.sub_period_order,
+                        warehouse_id=warehouse_id
+                ).order_by('system_date', 'log_order'):
+                    data_stock_activity.append({
+                        'system_date': log.system_date,
+                        'posting_date': log.posting_date,
+                        'document_date': log.document_date,
+                        'stock_type': log.stock_type,
+                        'trans_code': log.trans_code,
+                        'trans_title': log.trans_title,
+                        'quantity': log.quantity / inventory_uom.ratio,
+                        'cost': log.value / (log.quantity / inventory_uom.ratio),
+                        'value': log.value,
+                        'current_quantity': log.perpetual_current_quantity / inventory_uom.ratio,
+                        'current_cost': log.perpetual_current_value / (
+                            log.perpetual_current_quantity / inventory_uom.ratio
+                        ) if log.perpetual_current_quantity else 0,
+                        'current_value': log.perpetual_current_value,
+                        'log_order': log.log_order
+                    })
+                casted_obq = this_balance['opening_balance_quantity'] / inventory_uom.ratio
+                casted_ebq = this_balance['ending_balance_quantity'] / inventory_uom.ratio
+                result.append({
+                    'warehouse_id': warehouse_id,
+                    'warehouse_code': warehouse_code,
+                    'warehouse_title': warehouse_title,
+                    'opening_balance_quantity': casted_obq,
+                    'opening_balance_cost': this_balance['opening_balance_value'] / casted_obq if casted_obq else 0,
+                    'opening_balance_value': this_balance['opening_balance_value'],
+                    'ending_balance_quantity': casted_ebq,
+                    'ending_balance_cost': this_balance['ending_balance_value'] / casted_ebq if casted_ebq else 0,
+                    'ending_balance_value': this_balance['ending_balance_value'],
+                    'data_stock_activity': data_stock_activity,
+                    'periodic_closed': this_sub_period_cost.periodic_closed
+                })
+        return result
+
+    def assertAlmostSame(self, first, second):
+        if isinstance(first, dict):
+            self.assertEqual(first.keys(), second.keys())
+            for key, value in first.items():
+                self.assertAlmostSame(value, second[key])
+        elif isinstance(first, list):
+            self.assertEqual(len(first), len(second))
+            for value, other in zip(first, second):
+                self.assertAlmostSame(value, other)
+        elif isinstance(first, float) or isinstance(second, float):
+            self.assertAlmostEqual(first, second, places=6)
+        else:
+            self.assertEqual(first, second)
+
+    def test_cost_list_same_as_per_row(self):
+        objs = list(
+            ReportInventoryCost.objects.filter(company=self.company, sub_period_order=3).select_related(
+                'product__inventory_uom'
+            )
+        )
+        self.assertEqual(len(objs), 3)
+        builder = ReportInvListBuilder(0, self.cost_cfg, self.date_range).prepare_cost_list(objs)
+        for obj in objs:
+            self.assertAlmostSame(builder.get_inventory_cost_activities(obj), self.legacy_cost_activities(obj))
+        # WA - kho 1: GR1 (ngày 2) và GI2 (ngày 28) nằm ngoài date_range
+        activities = builder.get_inventory_cost_activities(
+            next(obj for obj in objs if obj.product_id == self.product_wa.id)
+        )
+        self.assertEqual(
+            (activities['sum_in_quantity'], activities['sum_out_quantity'], len(activities['data_stock_activity'])),
+            (4, 2, 2)
+        )
+
+    def test_stock_list_same_as_per_row(self):
+        objs = list(
+            ReportStock.objects.filter(company=self.company, sub_period_order=3).select_related(
+                'product__inventory_uom'
+            )
+        )
+        self.assertEqual(len(objs), 2)
+        builder = ReportInvListBuilder(0, self.cost_cfg).prepare_stock_list(objs)
+        for obj in objs:
+            self.assertAlmostSame(builder.get_stock_activities(obj, self.wh_list), self.legacy_stock_activities(obj))
+
+
+class ReportExportJobTestCase(TestCase):
+    """ Xuất báo cáo ở background: gọi thẳng queryset / serializer / writer theo tenant, company, employee của job """
+
+    def setUp(self):
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_EXPORT')
+        self.company = bulk_new(
+            Company, title='Company', code='COMPANY_EXPORT', sub_domain='company-export', tenant=self.tenant
+        )
+        bulk_new(CompanyConfig, company=self.company)
+        other_company = bulk_new(
+            Company, title='Other', code='COMPANY_EXPORT_OTHER', sub_domain='company-export-other', tenant=self.tenant
+        )
+        # company hiện tại của user khác company của job => job vẫn lọc theo company của job
+        user = bulk_new(
+            User, username='export', email='export@test.com', tenant_current=self.tenant, company_current=other_company,
+        )
+        self.employee = bulk_new(
+            Employee, first_name='Export', last_name='Test', code='EMP_EXPORT', tenant=self.tenant, company=self.company,
+            user=user,
+        )
+        group = bulk_new(Group, title='Group', code='GROUP_EXPORT', tenant=self.tenant, company=self.company)
+        for company, day, value in [
+            (self.company, 3, 100.5), (self.company, 12, 200), (self.company, 25, 300), (other_company, 12, 400),
+        ]:
+            bulk_new(
+                ReportCashflow, tenant=self.tenant, company=company, group_inherit=group, cashflow_type=1,
+                due_date=datetime.datetime(2025, 3, day), value_estimate_sale=value,
+            )
+
+    def new_job(self, export_format, report_code='ReportCashflowList', params=None):
+        return bulk_new(
+            ReportExportJob, tenant=self.tenant, company=self.company, employee_created=self.employee,
+            title='report', report_code=report_code, export_format=export_format,
+            params=params or {'due_date__gte': '2025-03-10', 'due_date__lte': '2025-03-31'},
+        )
+
+    def test_csv(self):
+        file_name, content_type, chunks = ReportCashflowList.export_job_stream(self.new_job('csv'))
+        self.assertTrue(file_name.startswith('report_cashflow_') and file_name.endswith('.csv'))
+        self.assertEqual(content_type, 'text/csv; charset=utf-8')
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8-sig'))))
+        # lọc theo company của job + filterset (due_date) trong params
+        self.assertEqual(rows[0], [header for header, _key in ReportCashflowList.export_columns])
+        self.assertEqual(sorted(row[3] for row in rows[1:]), ['200.0', '300.0'])
+
+    def test_xlsx(self):
+        _file_name, _content_type, chunks = ReportCashflowList.export_job_stream(self.new_job('xlsx'))
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as xlsx_file:
+            self.assertIn('[Content_Types].xml', xlsx_file.namelist())
+            sheet = xlsx_file.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('<t xml:space="preserve">Estimate sale</t>', sheet)
+        self.assertIn('<c><v>300.0</v></c>', sheet)
+        self.assertNotIn('<c><v>400.0</v></c>', sheet)
+
+    def test_filter_backends(self):
+        # search + ordering của params đi qua filter backends của view như API GET
+        sale_order = bulk_new(SaleOrder, title='SO export', code='SO_EXPORT', tenant=self.tenant, company=self.company)
+        ReportCashflow.objects.filter(company=self.company, value_estimate_sale__in=[100.5, 300]).update(
+            sale_order=sale_order
+        )
+        job = self.new_job('csv', params={'search': 'SO export', 'ordering': '-value_estimate_sale'})
+        with mock.patch.object(
+                ReportCashflowList, 'get_export_queryset', autospec=True,
+                side_effect=ReportCashflowList.get_export_queryset,
+        ) as get_export_queryset:
+            _file_name, _content_type, chunks = ReportCashflowList.export_job_stream(job)
+            rows = list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8-sig'))))
+        self.assertEqual([row[3] for row in rows[1:]], ['300.0', '100.5'])
+        self.assertEqual(
+            get_export_queryset.call_args.kwargs['filter_kwargs'],
+            {'tenant_id': str(self.tenant.id), 'company_id': str(self.company.id)},
+        )
+
+    def test_no_permission(self):
+        # ReportRevenueList yêu cầu quyền report.reportrevenue.view, employee chưa được cấp
+        with self.assertRaisesMessage(ValueError, 'no permission'):
+            ReportRevenueList.export_job_stream(self.new_job('csv', report_code='ReportRevenueList'))
 
-# Create your tests here.
+    def test_task_failed_job(self):
+        job = self.new_job('csv', report_code='ReportRevenueList')
+        self.assertFalse(export_report(str(job.id)))
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.file_id), (3, None))
+        self.assertIn('no permission', job.msg)
@@ -4,7 +4,8 @@ from .views import (
     ReportStockList, BalanceInitializationList, ReportInventoryCostList, ReportGeneralList,
     PurchaseOrderListReport, WarehouseAvailableProductList, BudgetReportCompanyList, PaymentListForBudgetReport,
     BudgetReportGroupList, ReportProductListForDashBoard, AdvanceFilterList,
-    AdvanceFilterDetail, WarehouseAvailableProductDetail, ReportLeaseList
+    AdvanceFilterDetail, WarehouseAvailableProductDetail, ReportLeaseList, ReportInventoryRebuildJobList,
+    ReportInventoryRebuildJobDetail, ReportExportJobList, ReportExportJobDetail
 )
 
 urlpatterns = [
@@ -25,6 +26,12 @@ urlpatterns = [
     path('balance-init/list', BalanceInitializationList.as_view(), name='BalanceInitializationList'),
     path('inventory-cost-report/list', ReportInventoryCostList.as_view(), name='ReportInventoryCostList'),
     path('inventory-stock-report/list', ReportStockList.as_view(), name='ReportStockList'),
+    path('inventory-rebuild/list', ReportInventoryRebuildJobList.as_view(), name='ReportInventoryRebuildJobList'),
+    path(
+        'inventory-rebuild/detail/<str:pk>',
+        ReportInventoryRebuildJobDetail.as_view(),
+        name='ReportInventoryRebuildJobDetail'
+    ),
     path(
         'warehouse-available-product-list',
         WarehouseAvailableProductList.as_view(),
@@ -44,6 +51,10 @@ urlpatterns = [
     path('budget-report-group/list', BudgetReportGroupList.as_view(), name='BudgetReportGroupList'),
     path('budget-report-payment/list', PaymentListForBudgetReport.as_view(), name='PaymentListForBudgetReport'),
 
+    # Report export (background)
+    path('export-job/list', ReportExportJobList.as_view(), name='ReportExportJobList'),
+    path('export-job/detail/<str:pk>', ReportExportJobDetail.as_view(), name='ReportExportJobDetail'),
+
     # Advance Filter
     path('advance-filter/list', AdvanceFilterList.as_view(), name='AdvanceFilterList'),
     path('advance-filter/detail/<str:pk>', AdvanceFilterDetail.as_view(), name='AdvanceFilterDetail'),
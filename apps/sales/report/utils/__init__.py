@@ -1,4 +1,6 @@
 from .inventory_log import *
+from .inventory_log_batch import *
+from .inventory_repropagation import *
 from .log_for_delivery import *
 from .log_for_goods_receipt import *
 from .log_for_goods_return import *
@@ -1,3 +1,5 @@
+import threading
+from contextlib import contextmanager
 from django.db import transaction
 from rest_framework import serializers
 from apps.masterdata.saledata.models import Periods, SubPeriods
@@ -5,14 +7,47 @@ from apps.sales.report.models import (
     ReportStockLog, ReportInventoryCost,
     ReportInventorySubFunction, ReportInventoryCostByWarehouse
 )
+from apps.sales.report.utils.inventory_log_batch import ReportInvBatchPosting
+from apps.sales.report.utils.inventory_repropagation import ReportInventoryRepropagation
+
+# trạng thái thu lại các lần gọi ReportInvLog.log (theo từng thread), xem ReportInvLog.capture
+_capture_state = threading.local()
 
 
 class ReportInvLog:
+    # phiếu có từ ngần này dòng trở lên sẽ ghi log theo lô (ReportInvBatchPosting)
+    BATCH_POSTING_MIN_LINES = 20
+
+    @classmethod
+    @contextmanager
+    def capture(cls):
+        """
+        Trong khối with, các lần gọi log chỉ được thu lại (doc_obj, doc_date, doc_data, for_balance_init)
+        mà không ghi vào sổ kho. Dùng cho chạy lại sổ kho (ReportInvReplay).
+        """
+        _capture_state.postings = []
+        try:
+            yield _capture_state.postings
+        finally:
+            _capture_state.postings = None
+
     @classmethod
-    def log(cls, doc_obj, doc_date, doc_data, for_balance_init=False):
+    def is_capturing(cls):
+        """ đang trong khối capture -> các handler không ghi lại các tác động ngoài sổ kho (vd: giá đích danh) """
+        return getattr(_capture_state, 'postings', None) is not None
+
+    @classmethod
+    def log(cls, doc_obj, doc_date, doc_data, for_balance_init=False, batch_mode=None):
+        """
+        batch_mode: True - ghi theo lô, False - ghi từng dòng, None - tự chọn theo số dòng của phiếu
+        """
         if not doc_obj or not doc_date or len(doc_data) == 0:
             print(f'*** NOT LOG (doc detail: {doc_obj.code}, {doc_date}, {len(doc_data)}) ***')
             return None
+        postings = getattr(_capture_state, 'postings', None)
+        if postings is not None:
+            postings.append((doc_obj, doc_date, doc_data, for_balance_init))
+            return []
         try:
             with transaction.atomic():
                 # lấy pp tính giá cost (0_FIFO, 1_WA, 2_SI)
@@ -41,16 +76,9 @@ class ReportInvLog:
                             if run_state is False:
                                 break
 
-                        # tạo các log
-                        new_logs = ReportStockLog.create_new_logs(
-                            doc_obj, doc_data, period_obj, sub_period_order, cost_cfg
+                        new_logs = cls.post(
+                            doc_obj, doc_data, period_obj, sub_period_obj, cost_cfg, for_balance_init, batch_mode
                         )
-
-                        # cập nhập giá cost cho từng log
-                        for log in new_logs:
-                            ReportStockLog.update_log_cost(
-                                log, period_obj, sub_period_order, cost_cfg, for_balance_init
-                            )
                         print('# Add log for balance init successfully!\n'
                               if for_balance_init else f'# Write {doc_obj.code} to Inventory Report successfully!')
                         return new_logs
@@ -60,6 +88,35 @@ class ReportInvLog:
             print(err)
             return None
 
+    @classmethod
+    def post(cls, doc_obj, doc_data, period_obj, sub_period_obj, cost_cfg, for_balance_init, batch_mode):
+        """ Ghi các dòng của phiếu vào sổ kho (theo lô hoặc từng dòng), trả về các log mới """
+        if batch_mode is None:
+            batch_mode = len(doc_data) >= cls.BATCH_POSTING_MIN_LINES
+        if batch_mode:
+            return ReportInvBatchPosting(
+                doc_obj, doc_data, period_obj, sub_period_obj, cost_cfg, for_balance_init
+            ).run()
+
+        # tạo các log
+        new_logs = ReportStockLog.create_new_logs(doc_obj, doc_data, period_obj, sub_period_obj.order, cost_cfg)
+        # cập nhập giá cost cho từng log
+        div = doc_obj.company.company_config.definition_inventory_valuation
+        has_later_sub_periods = None
+        created_cost_ids = set()
+        for log in new_logs:
+            latest_cost, created_cost = ReportStockLog.update_log_cost(
+                log, period_obj, sub_period_obj.order, cost_cfg, for_balance_init
+            )
+            if created_cost:
+                created_cost_ids.add(created_cost.id)
+            if has_later_sub_periods is None:
+                has_later_sub_periods = ReportInventoryRepropagation.get_later_sub_periods(log).exists()
+            # Step 4: log ghi lùi ngày hoặc ghi vào kỳ trước các kỳ đã mở -> tính lại các log phía sau và các kỳ sau
+            if has_later_sub_periods or ReportInventoryRepropagation.is_backdated(log, latest_cost.get('system_date')):
+                ReportInventoryRepropagation.run([log], div, cost_cfg, created_cost_ids)
+        return new_logs
+
 
 class ReportInvCommonFunc:
     @classmethod
@@ -168,32 +225,45 @@ class ReportInvCommonFunc:
             )
         return bulk_info, bulk_info_wh
 
+    # các field định danh 1 record ReportInventoryCost trong 1 kỳ con
+    COST_KEY_FIELDS = (
+        'product_id', 'warehouse_id', 'serial_number', 'lot_mapped_id',
+        'sale_order_id', 'lease_order_id', 'service_order_id'
+    )
+    ROLL_FORWARD_CHUNK_SIZE = 2000
+
     @classmethod
-    def push_to_next_sub(cls, tenant, company, emp_current, this_sub, last_sub):
+    def push_to_next_sub(cls, tenant, company, emp_current, this_sub, last_sub, product_ids=None):
+        """
+        Đẩy số dư cuối kỳ trước qua đầu kỳ này:
+        - lấy tập key đã có ở kỳ này bằng 1 query
+        - duyệt các record kỳ trước theo từng chunk (kèm kho vật lí), record nào chưa có key ở kỳ này thì tạo mới
+        product_ids: chỉ đẩy cho các sản phẩm này (dùng khi chạy lại sổ kho theo nhóm sản phẩm)
+        """
+        this_sub_costs = ReportInventoryCost.objects.filter(
+            tenant=tenant, company=company, period_mapped=this_sub.period_mapped, sub_period=this_sub
+        )
+        last_sub_costs = ReportInventoryCost.objects.filter(
+            tenant=tenant, company=company, period_mapped=last_sub.period_mapped, sub_period=last_sub
+        )
+        if product_ids is not None:
+            this_sub_costs = this_sub_costs.filter(product_id__in=product_ids)
+            last_sub_costs = last_sub_costs.filter(product_id__in=product_ids)
+        existed_keys = set(this_sub_costs.values_list(*cls.COST_KEY_FIELDS))
+        push_func = cls.by_perpetual if company.company_config.definition_inventory_valuation == 0 else cls.by_periodic
         bulk_info = []
         bulk_info_wh = []
-        for item in ReportInventoryCost.objects.filter(
-                tenant=tenant, company=company, period_mapped=last_sub.period_mapped, sub_period=last_sub
-        ):
-            if not ReportInventoryCost.objects.filter(
-                    tenant=tenant,
-                    company=company,
-                    period_mapped=this_sub.period_mapped,
-                    sub_period=this_sub,
-                    product_id=item.product_id,
-                    warehouse_id=item.warehouse_id,
-                    serial_number=item.serial_number,
-                    lot_mapped_id=item.lot_mapped_id,
-                    sale_order_id=item.sale_order_id,
-                    lease_order_id=item.lease_order_id,
-                    service_order_id=item.service_order_id,
-            ).exists():
-                bulk_info, bulk_info_wh = cls.by_perpetual(
-                    tenant, company, emp_current, item, this_sub.period_mapped, this_sub, bulk_info, bulk_info_wh
-                ) if company.company_config.definition_inventory_valuation == 0 else cls.by_periodic(
+        for item in last_sub_costs.prefetch_related(
+                'report_inventory_cost_wh'
+        ).iterator(chunk_size=cls.ROLL_FORWARD_CHUNK_SIZE):
+            if tuple(getattr(item, field) for field in cls.COST_KEY_FIELDS) not in existed_keys:
+                bulk_info, bulk_info_wh = push_func(
                     tenant, company, emp_current, item, this_sub.period_mapped, this_sub, bulk_info, bulk_info_wh
                 )
-
+            if len(bulk_info) >= cls.ROLL_FORWARD_CHUNK_SIZE:
+                ReportInventoryCost.objects.bulk_create(bulk_info)
+                ReportInventoryCostByWarehouse.objects.bulk_create(bulk_info_wh)
+                bulk_info, bulk_info_wh = [], []
         ReportInventoryCost.objects.bulk_create(bulk_info)
         ReportInventoryCostByWarehouse.objects.bulk_create(bulk_info_wh)
         return True
@@ -201,26 +271,46 @@ class ReportInvCommonFunc:
     @classmethod
     def check_and_push_to_next_sub(cls, tenant, company, emp_current, this_period, this_sub_order):
         """
-        1. Lấy kỳ hiện tại + kỳ con hiện tại
+        1. Lấy kỳ hiện tại + kỳ con hiện tại (khóa dòng kỳ con để không chạy trùng với task mở kỳ)
         2. Nếu kỳ hiện tại chưa chạy report thì:
             2.1: Lấy kỳ trước + kỳ con trước
             2.2: Nếu kỳ con trước đã chạy report -> đẩy cuối kỳ trước qua đầu kỳ hiện tại -> cập nhập tt report kỳ này
                  Nếu không có kỳ con -> cập nhập tt report kỳ này
+        emp_current có thể None khi chạy từ task mở kỳ (celery beat)
         """
-        this_sub = SubPeriods.objects.filter(period_mapped=this_period, order=this_sub_order).first()
-        if tenant and company and emp_current and this_period and this_sub:
-            if not this_sub.run_report_inventory:
-                last_period = Periods.objects.filter(
-                    tenant=tenant, company=company, fiscal_year=this_period.fiscal_year - 1
-                ).first() if int(this_sub_order) == 1 else this_period
-                last_sub_order = 12 if int(this_sub_order) == 1 else int(this_sub_order) - 1
-                last_sub = SubPeriods.objects.filter(period_mapped=last_period, order=last_sub_order).first()
-                if last_period and last_sub:
-                    if last_sub.run_report_inventory:
-                        cls.push_to_next_sub(tenant, company, emp_current, this_sub, last_sub)
-                this_sub.run_report_inventory = True
-                this_sub.save(update_fields=['run_report_inventory'])
-                print(f"Started {this_sub.start_date.month}/{this_period.fiscal_year}.")
-            return True
-        print('Error: Some objects are not exist (tenant, company, emp_current, this_period, this_sub).')
+        with transaction.atomic():
+            this_sub = SubPeriods.objects.select_for_update().filter(
+                period_mapped=this_period, order=this_sub_order
+            ).first()
+            if tenant and company and this_period and this_sub:
+                if not this_sub.run_report_inventory:
+                    last_period = Periods.objects.filter(
+                        tenant=tenant, company=company, fiscal_year=this_period.fiscal_year - 1
+                    ).first() if int(this_sub_order) == 1 else this_period
+                    last_sub_order = 12 if int(this_sub_order) == 1 else int(this_sub_order) - 1
+                    last_sub = SubPeriods.objects.filter(period_mapped=last_period, order=last_sub_order).first()
+                    if last_period and last_sub:
+                        if last_sub.run_report_inventory:
+                            cls.push_to_next_sub(tenant, company, emp_current, this_sub, last_sub)
+                    this_sub.run_report_inventory = True
+                    this_sub.save(update_fields=['run_report_inventory'])
+                    print(f"Started {this_sub.start_date.month}/{this_period.fiscal_year}.")
+                return True
+        print('Error: Some objects are not exist (tenant, company, this_period, this_sub).')
         return False
+
+    @classmethod
+    def open_current_sub_period(cls, company):
+        """
+        Mở kỳ con hiện tại (và các kỳ con trước đó chưa mở) của công ty, dùng cho task mở kỳ.
+        Trả về giống check_and_push_to_next_sub: True - đã mở, False - lỗi (dừng ở kỳ con lỗi),
+        None - công ty chưa có kỳ / kỳ con hiện tại (không có gì để mở)
+        """
+        this_period = Periods.get_current_period(company.tenant_id, company.id)
+        this_sub = Periods.get_current_sub_period(this_period) if this_period else None
+        if not this_sub:
+            return None
+        for order in range(1, this_sub.order + 1):
+            if cls.check_and_push_to_next_sub(company.tenant, company, None, this_period, order) is False:
+                return False
+        return True
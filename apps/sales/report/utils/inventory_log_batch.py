@@ -0,0 +1,462 @@
+from types import SimpleNamespace
+from django.db.models import Min, Q
+from django.utils import timezone
+from apps.masterdata.saledata.models.product import ProductSpecificIdentificationSerialNumber
+from apps.sales.inventory.models.goods_registration import (
+    GoodsRegistration, GReItemProductWarehouseSerial, GReItemProductWarehouseLot
+)
+from apps.sales.report.models import (
+    ReportStock, ReportStockLog, ReportInventoryCost, ReportInventoryCostByWarehouse,
+    ReportInventoryCostLatestLog, ReportInventoryFifoLayer
+)
+from apps.sales.report.utils.inventory_repropagation import ReportInventoryRepropagation
+
+
+# Ghi log theo lô: prefetch toàn bộ key (ReportStock, LatestLog, ReportInventoryCost của kỳ, lớp giá FIFO,
+# serial đích danh) bằng vài query, tính giá cost (BQ, FIFO, đích danh) trong bộ nhớ theo đúng thứ tự như
+# ReportInvLog.log, sau đó ghi lại bằng bulk_create / bulk_update. Kết quả sổ kho giống hệt cách ghi từng dòng.
+
+FIFO_LAYER_KEY_FIELDS = (
+    'warehouse_id', 'lot_mapped_id', 'serial_number', 'sale_order_id', 'lease_order_id', 'service_order_id'
+)
+
+
+def _match(obj, **kwargs):
+    """ So khớp obj với các điều kiện lọc dạng field=value (tương đương .filter(**kwargs) của Django) """
+    for key, value in kwargs.items():
+        obj_value = getattr(obj, key)
+        if (str(obj_value) if obj_value is not None else None) != (str(value) if value is not None else None):
+            return False
+    return True
+
+
+class ReportInvBatchPosting:  # pylint: disable=R0902
+    # giữ toàn bộ dữ liệu prefetch + các bản ghi chờ ghi của 1 phiếu trên cùng 1 đối tượng
+    def __init__(
+            self, doc_obj, doc_data, period_obj, sub_period_obj, cost_cfg, for_balance_init=False, replay=False,
+            last_sub_period=None
+    ):
+        """
+        replay: chạy lại sổ kho -> không chạy lại các tác động ngoài sổ kho (hàng đăng kí, bật/tắt serial)
+        last_sub_period: chạy lại sổ kho - kỳ con đã đi tới (thay cho trạng thái mở kỳ khi tìm các kỳ sau)
+        """
+        self.doc_obj = doc_obj
+        self.doc_data = doc_data
+        self.period_obj = period_obj
+        self.sub_period_obj = sub_period_obj
+        self.sub_period_order = sub_period_obj.order
+        self.cost_cfg = cost_cfg
+        self.for_balance_init = for_balance_init
+        self.replay = replay
+        self.last_sub_period = last_sub_period
+        self.has_later_sub_periods = None  # kỳ của phiếu có kỳ sau đã mở hay không (lấy khi cần)
+        self.div = doc_obj.company.company_config.definition_inventory_valuation
+        self.product_ids = {item['product'].id for item in doc_data}
+
+        # dữ liệu prefetch
+        self.gre_keys = (set(), set())
+        self.report_stocks = {}  # product_id: [ReportStock]
+        self.latest_logs = {}  # product_id: [ReportInventoryCostLatestLog]
+        self.sub_period_costs = {}  # product_id: [ReportInventoryCost]
+        self.balance_init_costs = {}  # product_id: [ReportInventoryCost]
+        self.cost_wh = {}  # report_inventory_cost_id: [ReportInventoryCostByWarehouse]
+        self.fifo_layers = {}  # product_id: [ReportInventoryFifoLayer] còn SL (đã khóa), cũ nhất trước
+        self.fifo_layer_keys = {}  # product_id: [key lớp giá + ngày nhập sớm nhất] (gồm cả lớp đã hết SL)
+        self.specific_serials = {}  # (product_id, serial_number): ProductSpecificIdentificationSerialNumber
+
+        # dữ liệu cần ghi
+        self.new_report_stocks = []
+        self.new_latest_logs = []
+        self.updated_latest_logs = {}
+        self.new_costs = []
+        self.updated_costs = {}
+        self.new_cost_wh = []
+        self.updated_cost_wh = {}
+        self.updated_fifo_layers = {}
+        self.updated_specific_serials = {}
+        # log ghi lùi ngày + chuỗi của chúng (các log sau trong phiếu cùng chuỗi cũng phải tính lại)
+        self.backdated_logs = []
+        self.backdated_chains = set()
+
+    def prefetch(self):
+        """ Lấy toàn bộ dữ liệu liên quan của các sản phẩm trong phiếu (mỗi loại 1 query) """
+        self.gre_keys = (
+            set(
+                GReItemProductWarehouseSerial.objects.filter(
+                    gre_item_prd_wh__gre_item__product_id__in=self.product_ids
+                ).values_list('gre_item_prd_wh__gre_item__product_id', 'sn_registered__serial_number')
+            ),
+            {
+                (product_id, str(lot_id) if lot_id else None)
+                for product_id, lot_id in GReItemProductWarehouseLot.objects.filter(
+                    gre_item_prd_wh__gre_item__product_id__in=self.product_ids
+                ).values_list('gre_item_prd_wh__gre_item__product_id', 'lot_registered_id')
+            }
+        )
+        for rp_stock in ReportStock.objects.filter(
+                tenant=self.doc_obj.tenant,
+                company=self.doc_obj.company,
+                product_id__in=self.product_ids,
+                period_mapped=self.period_obj,
+                sub_period_order=self.sub_period_order,
+                sub_period=self.sub_period_obj,
+        ):
+            self.report_stocks.setdefault(rp_stock.product_id, []).append(rp_stock)
+        for record in ReportInventoryCostLatestLog.objects.filter(
+                product_id__in=self.product_ids
+        ).select_related('latest_log'):
+            self.latest_logs.setdefault(record.product_id, []).append(record)
+        for rp_cost in ReportInventoryCost.objects.filter(
+                tenant_id=self.doc_obj.tenant_id,
+                company_id=self.doc_obj.company_id,
+                product_id__in=self.product_ids,
+                period_mapped=self.period_obj,
+                sub_period_order=self.sub_period_order,
+                sub_period=self.sub_period_obj,
+        ).prefetch_related('report_inventory_cost_wh'):
+            self.sub_period_costs.setdefault(rp_cost.product_id, []).append(rp_cost)
+            self.cost_wh[rp_cost.id] = list(rp_cost.report_inventory_cost_wh.all())
+        for rp_cost in ReportInventoryCost.objects.filter(product_id__in=self.product_ids, for_balance_init=True):
+            self.balance_init_costs.setdefault(rp_cost.product_id, []).append(rp_cost)
+        self.prefetch_fifo_layers()
+        self.prefetch_specific_serials()
+        return True
+
+    def prefetch_fifo_layers(self):
+        """ Lớp giá của các SP FIFO có dòng xuất: khóa + nạp 1 lần (thay cho ReportInventoryFifoLayer.consume) """
+        product_ids = {
+            item['product'].id for item in self.doc_data
+            if item['product'].valuation_method == 0 and item['stock_type'] == -1
+        }
+        if not product_ids:
+            return True
+        for layer in ReportInventoryFifoLayer.objects.select_for_update().filter(
+                product_id__in=product_ids, is_depleted=False
+        ).order_by('system_date', 'log_order'):
+            self.fifo_layers.setdefault(layer.product_id, []).append(layer)
+        # has_layer của consume: key đã có lớp giá (kể cả đã hết SL) nhập tới ngày xuất
+        for layer_key in ReportInventoryFifoLayer.objects.filter(product_id__in=product_ids).values(
+                'product_id', *FIFO_LAYER_KEY_FIELDS
+        ).annotate(first_date=Min('system_date')).order_by():
+            self.fifo_layer_keys.setdefault(layer_key['product_id'], []).append(SimpleNamespace(**layer_key))
+        return True
+
+    def prefetch_specific_serials(self):
+        """ Serial của các SP đích danh trong phiếu (thay cho get_specific_value / on_off_specific_serial từng dòng) """
+        keys = {
+            (item['product'].id, (item.get('serial_data') or {}).get('serial_number'))
+            for item in self.doc_data if item['product'].valuation_method == 2
+        }
+        if not keys:
+            return True
+        serial_numbers = {serial_number for _product_id, serial_number in keys}
+        serial_filter = Q(serial_number__in=[item for item in serial_numbers if item is not None])
+        if None in serial_numbers:
+            serial_filter |= Q(serial_number__isnull=True)
+        for si_serial in ProductSpecificIdentificationSerialNumber.objects.filter(
+                serial_filter, product_id__in={product_id for product_id, _serial_number in keys}
+        ):
+            # trùng serial => bản ghi đầu như .first()
+            self.specific_serials.setdefault((si_serial.product_id, si_serial.serial_number), si_serial)
+        return True
+
+    # --- tra cứu trong bộ nhớ (thay cho các .filter().first() của luồng ghi từng dòng)
+
+    def get_or_create_report_stock(self, doc_item, **kwargs):
+        product_obj = doc_item['product']
+        kwargs.pop('warehouse_id', None)
+        for rp_stock in self.report_stocks.get(product_obj.id, []):
+            if _match(rp_stock, **kwargs):
+                return rp_stock
+        rp_stock = ReportStock(
+            tenant=self.doc_obj.tenant,
+            company=self.doc_obj.company,
+            product=product_obj,
+            period_mapped=self.period_obj,
+            sub_period_order=self.sub_period_order,
+            sub_period=self.sub_period_obj,
+            employee_created=self.doc_obj.employee_created
+            if self.doc_obj.employee_created else self.doc_obj.employee_inherit,
+            employee_inherit=self.doc_obj.employee_inherit
+            if self.doc_obj.employee_inherit else self.doc_obj.employee_created,
+            **kwargs
+        )
+        self.report_stocks.setdefault(product_obj.id, []).append(rp_stock)
+        self.new_report_stocks.append(rp_stock)
+        return rp_stock
+
+    def filter_latest_logs(self, product_id, **kwargs):
+        return [record for record in self.latest_logs.get(product_id, []) if _match(record, **kwargs)]
+
+    def get_opening_cost_dict(self, product_id, **kwargs):
+        for rp_cost in self.balance_init_costs.get(product_id, []):
+            if _match(rp_cost, **kwargs):
+                return {
+                    'quantity': rp_cost.opening_balance_quantity,
+                    'cost': rp_cost.opening_balance_cost,
+                    'value': rp_cost.opening_balance_value
+                }
+        return {'quantity': 0, 'cost': 0, 'value': 0}
+
+    def get_latest_log_cost_dict(self, product_obj, physical_warehouse_id, **kwargs):
+        """ giống ReportInventorySubFunction.get_latest_log_cost_dict """
+        records = self.filter_latest_logs(
+            product_obj.id, warehouse_id=physical_warehouse_id, **kwargs
+        ) if 'warehouse_id' not in kwargs else self.filter_latest_logs(product_obj.id, **kwargs)
+        latest_log = records[0].latest_log if records else None
+        if latest_log:
+            return {
+                'quantity': latest_log.perpetual_current_quantity,
+                'cost': latest_log.perpetual_current_cost,
+                'value': latest_log.perpetual_current_value,
+                'system_date': latest_log.system_date
+            } if self.div == 0 else {
+                'quantity': latest_log.periodic_current_quantity,
+                'cost': 0,
+                'value': 0,
+                'system_date': latest_log.system_date
+            }
+        return self.get_opening_cost_dict(product_obj.id, **kwargs)
+
+    def get_export_cost_for_fifo(self, product_obj, quantity, system_date=None, **kwargs):
+        """ giống ReportInventorySubFunction.get_export_cost_for_fifo, lấy từ lớp giá đã nạp sẵn """
+        fifo_cost_detail, layers_updated = ReportInventoryFifoLayer.take_from_layers(
+            [layer for layer in self.fifo_layers.get(product_obj.id, []) if _match(layer, **kwargs)],
+            quantity, system_date
+        )
+        for layer in layers_updated:
+            self.updated_fifo_layers[layer.id] = layer
+        has_layer = bool(layers_updated) or any(
+            _match(layer_key, **kwargs) and (
+                system_date is None or (layer_key.first_date is not None and layer_key.first_date <= system_date)
+            ) for layer_key in self.fifo_layer_keys.get(product_obj.id, [])
+        )
+        if has_layer:
+            export_fifo_cost = (sum(item['log_value'] for item in fifo_cost_detail) / quantity) if quantity > 0 else 0
+            return {'cost': export_fifo_cost, 'fifo_cost_detail': fifo_cost_detail} if self.div == 0 else 0
+        return {
+            'cost': self.get_opening_cost_dict(product_obj.id, **kwargs)['cost'],
+            'fifo_cost_detail': []
+        }
+
+    def get_specific_value(self, product_obj, serial_number):
+        si_serial = self.specific_serials.get((product_obj.id, serial_number))
+        return si_serial.specific_value if si_serial else 0
+
+    def on_off_specific_serial(self, product_obj, serial_number, is_off=True):
+        si_serial = self.specific_serials.get((product_obj.id, serial_number))
+        if si_serial:
+            si_serial.serial_status = is_off
+            self.updated_specific_serials[si_serial.id] = si_serial
+        return True
+
+    def get_sub_period_cost(self, product_id, **kwargs):
+        for rp_cost in self.sub_period_costs.get(product_id, []):
+            if _match(rp_cost, **kwargs):
+                return rp_cost
+        return None
+
+    # --- các bước ghi log
+
+    def create_new_logs(self):
+        """ Step 1: giống ReportStockLog.create_new_logs nhưng chưa ghi xuống DB """
+        new_logs = []
+        log_order_number = 0
+        for item in self.doc_data:
+            kwargs = ReportStockLog.parse_params_report_inventory_create(item, self.cost_cfg, self.gre_keys)
+            rp_stock = self.get_or_create_report_stock(item, **kwargs)
+            latest_cost = {}
+            if item['product'].valuation_method == 0:
+                if item['stock_type'] == -1:
+                    latest_cost = self.get_export_cost_for_fifo(
+                        item['product'], item['quantity'], item['system_date'], **kwargs
+                    )
+                    item['cost'] = latest_cost['cost']
+            if item['product'].valuation_method == 1:
+                if item['stock_type'] == -1:
+                    latest_cost = self.get_latest_log_cost_dict(
+                        item['product'], item['warehouse'].id if item['warehouse'] else None, **kwargs
+                    )
+                    item['cost'] = latest_cost['cost']
+            if item['product'].valuation_method == 2:
+                serial_number = (item.get('serial_data') or {}).get('serial_number')
+                if item['stock_type'] == -1:
+                    item['cost'] = self.get_specific_value(item['product'], serial_number)
+                if not self.replay:
+                    self.on_off_specific_serial(item['product'], serial_number, is_off=item['stock_type'] == -1)
+            item['value'] = item['cost'] * item['quantity']
+            if len(item.get('lot_data', {})) != 0:
+                item['lot_data']['lot_quantity'] = item['quantity']
+                item['lot_data']['lot_value'] = item['value']
+            if float(item['quantity']) > 0:
+                log_order_number += 1
+                new_logs.append(ReportStockLog(
+                    tenant=self.doc_obj.tenant,
+                    company=self.doc_obj.company,
+                    employee_created=self.doc_obj.employee_created
+                    if self.doc_obj.employee_created else self.doc_obj.employee_inherit,
+                    employee_inherit=self.doc_obj.employee_inherit
+                    if self.doc_obj.employee_inherit else self.doc_obj.employee_created,
+                    report_stock=rp_stock,
+                    product=item['product'],
+                    physical_warehouse=item['warehouse'],
+                    sale_order=item.get('sale_order'),
+                    lease_order=item.get('lease_order'),
+                    service_order=item.get('service_order'),
+                    system_date=item['system_date'],
+                    posting_date=item['posting_date'],
+                    document_date=item['document_date'],
+                    stock_type=item['stock_type'],
+                    trans_id=item['trans_id'],
+                    trans_code=item['trans_code'],
+                    trans_title=item['trans_title'],
+                    quantity=item['quantity'],
+                    cost=item['cost'],
+                    value=item['value'],
+                    lot_data=item.get('lot_data', {}),
+                    log_order=log_order_number,
+                    fifo_cost_detail=latest_cost.get('fifo_cost_detail', []),
+                    **kwargs
+                ))
+                if not self.replay and (
+                        'sale_order_id' in kwargs or 'lease_order_id' in kwargs or 'service_order_id' in kwargs
+                ):
+                    GoodsRegistration.update_registration_inventory(item, self.doc_obj)
+        return new_logs
+
+    def update_log_cost(self, log):
+        """ Step 2 + 3: giống ReportStockLog.update_log_cost nhưng tính trong bộ nhớ """
+        kwargs = ReportStockLog.get_cost_kwargs(log, self.cost_cfg)
+        latest_cost = self.get_latest_log_cost_dict(log.product, log.physical_warehouse_id, **kwargs)
+        chain_key = (
+            log.product_id,
+            tuple(sorted(ReportInventoryRepropagation.get_chain_kwargs(log, **kwargs).items()))
+        )
+        if self.has_later_sub_periods is None:
+            self.has_later_sub_periods = ReportInventoryRepropagation.get_later_sub_periods(
+                log, self.last_sub_period
+            ).exists()
+        # log ghi lùi ngày hoặc ghi vào kỳ trước các kỳ đã mở
+        if self.has_later_sub_periods or chain_key in self.backdated_chains or (
+                ReportInventoryRepropagation.is_backdated(log, latest_cost.get('system_date'))
+        ):
+            self.backdated_chains.add(chain_key)
+            self.backdated_logs.append(log)
+        ReportStockLog.update_log_cost_dict(self.div, log, latest_cost, commit=False)
+
+        sum_ending_quantity = sum(
+            record.latest_log.perpetual_current_quantity
+            for record in self.filter_latest_logs(log.product_id, **kwargs) if record.latest_log
+        )
+        this_sub_period_cost = self.get_sub_period_cost(log.product_id, **kwargs)
+        is_new_cost = this_sub_period_cost is None
+        this_sub_period_cost = (ReportStockLog.for_perpetual if self.div == 0 else ReportStockLog.for_periodic)(
+            this_sub_period_cost, log, self.period_obj, self.sub_period_order,
+            {
+                'quantity': sum_ending_quantity,
+                'cost': latest_cost['cost'],
+                'value': sum_ending_quantity * latest_cost['cost']
+            }, self.for_balance_init, commit=False, sub_period_obj=self.sub_period_obj, **kwargs
+        )
+        if is_new_cost:
+            self.sub_period_costs.setdefault(log.product_id, []).append(this_sub_period_cost)
+            self.cost_wh[this_sub_period_cost.id] = []
+            self.new_costs.append(this_sub_period_cost)
+        elif this_sub_period_cost.id not in self.updated_costs:
+            self.updated_costs[this_sub_period_cost.id] = this_sub_period_cost
+
+        # Project
+        if 'sale_order_id' in kwargs or 'lease_order_id' in kwargs or 'service_order_id' in kwargs:
+            self.update_cost_wh(this_sub_period_cost, log)
+        self.update_latest_log(log, **kwargs)
+        return log
+
+    def update_cost_wh(self, this_sub_period_cost, log):
+        """ Project: cập nhập SL cuối kỳ theo kho vật lí của record cost """
+        this_sub_period_cost_wh = None
+        for cost_wh in self.cost_wh[this_sub_period_cost.id]:
+            if cost_wh.warehouse_id == log.physical_warehouse_id:
+                this_sub_period_cost_wh = cost_wh
+                break
+        if this_sub_period_cost_wh:
+            this_sub_period_cost_wh.ending_quantity += log.quantity * log.stock_type
+            if not this_sub_period_cost_wh._state.adding:  # pylint: disable=W0212
+                self.updated_cost_wh[this_sub_period_cost_wh.id] = this_sub_period_cost_wh
+        else:
+            # kho này chưa có dòng nào của record cost này -> số dư cuối kỳ trước bằng 0
+            this_sub_period_cost_wh = ReportInventoryCostByWarehouse(
+                report_inventory_cost=this_sub_period_cost,
+                warehouse_id=log.physical_warehouse_id,
+                opening_quantity=0,
+                ending_quantity=log.quantity * log.stock_type
+            )
+            self.cost_wh[this_sub_period_cost.id].append(this_sub_period_cost_wh)
+            self.new_cost_wh.append(this_sub_period_cost_wh)
+        return this_sub_period_cost_wh
+
+    def update_latest_log(self, log, **kwargs):
+        """ cập nhập log mới nhất, không có thì tạo mới """
+        if 'warehouse_id' not in kwargs:
+            kwargs['warehouse_id'] = log.physical_warehouse_id
+        records = self.filter_latest_logs(log.product_id, **kwargs)
+        if records:
+            records[0].latest_log = log
+            if not records[0]._state.adding:  # pylint: disable=W0212
+                self.updated_latest_logs[records[0].id] = records[0]
+            return records[0]
+        record = ReportInventoryCostLatestLog(
+            product=log.product,
+            latest_log=log,
+            fifo_flag_log=log if log.product.valuation_method == 0 else None,
+            **kwargs
+        )
+        self.latest_logs.setdefault(log.product_id, []).append(record)
+        self.new_latest_logs.append(record)
+        return record
+
+    def commit(self, new_logs):
+        """ Ghi toàn bộ thay đổi xuống DB bằng bulk """
+        now = timezone.now()
+        ReportStock.objects.bulk_create(self.new_report_stocks)
+        ReportStockLog.objects.bulk_create(new_logs)
+        ReportInventoryFifoLayer.create_layers(new_logs)
+        ReportInventoryFifoLayer.objects.bulk_update(
+            list(self.updated_fifo_layers.values()), fields=['remaining_quantity', 'is_depleted']
+        )
+        ProductSpecificIdentificationSerialNumber.objects.bulk_update(
+            list(self.updated_specific_serials.values()), fields=['serial_status']
+        )
+        ReportInventoryCost.objects.bulk_create(self.new_costs)
+        for rp_cost in self.updated_costs.values():
+            rp_cost.date_modified = now
+        ReportInventoryCost.objects.bulk_update(
+            list(self.updated_costs.values()),
+            fields=list(
+                ReportStockLog.PERPETUAL_COST_UPDATE_FIELDS
+                if self.div == 0 else ReportStockLog.PERIODIC_COST_UPDATE_FIELDS
+            ) + ['date_modified']
+        )
+        ReportInventoryCostByWarehouse.objects.bulk_create(self.new_cost_wh)
+        ReportInventoryCostByWarehouse.objects.bulk_update(
+            list(self.updated_cost_wh.values()), fields=['ending_quantity']
+        )
+        ReportInventoryCostLatestLog.objects.bulk_create(self.new_latest_logs)
+        # chỉ cập nhập latest_log
+        ReportInventoryCostLatestLog.objects.bulk_update(
+            list(self.updated_latest_logs.values()), fields=['latest_log']
+        )
+        return True
+
+    def run(self):
+        self.prefetch()
+        new_logs = self.create_new_logs()
+        for log in new_logs:
+            self.update_log_cost(log)
+        self.commit(new_logs)
+        # Step 4: log ghi lùi ngày -> tính lại các log phía sau và các kỳ sau
+        if self.backdated_logs:
+            ReportInventoryRepropagation.run(
+                self.backdated_logs, self.div, self.cost_cfg, {rp_cost.id for rp_cost in self.new_costs},
+                self.last_sub_period
+            )
+        return new_logs
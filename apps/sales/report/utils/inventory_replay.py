@@ -0,0 +1,336 @@
+import heapq
+import multiprocessing
+import pickle
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.db import connections, transaction
+from apps.core.company.models import Company
+from apps.masterdata.saledata.models import Periods, SubPeriods, Product, ProductWareHouse
+from apps.sales.delivery.models import OrderDeliverySub
+from apps.sales.inventory.models import GoodsIssue, GoodsReceipt, GoodsReturn, GoodsTransfer
+from apps.sales.report.models import (
+    ReportStock, ReportStockLog, ReportInventoryCost, ReportInventoryCostLatestLog, ReportInventorySubFunction,
+    BalanceInitialization
+)
+from apps.sales.report.serializers.balance_init import BalanceInitializationCreateSerializer
+from apps.sales.report.utils.inventory_log import ReportInvLog, ReportInvCommonFunc
+from apps.sales.report.utils.inventory_log_batch import ReportInvBatchPosting
+from apps.sales.report.utils.log_for_delivery import IRForDeliveryHandler
+from apps.sales.report.utils.log_for_goods_issue import IRForGoodsIssueHandler
+from apps.sales.report.utils.log_for_goods_receipt import IRForGoodsReceiptHandler
+from apps.sales.report.utils.log_for_goods_return import IRForGoodsReturnHandler
+from apps.sales.report.utils.log_for_goods_transfer import IRForGoodsTransferHandler
+
+
+# Chạy lại sổ kho (ReportStockLog, ReportStock, ReportInventoryCost, LatestLog, lớp FIFO) của 1 công ty:
+# 1. chia sản phẩm (cần chạy lại) thành các nhóm độc lập theo hash id sản phẩm (tối đa BUCKET_PRODUCTS sản phẩm,
+#    ít nhất 1 nhóm mỗi worker), mỗi nhóm xóa - ghi lại sổ kho của các sản phẩm trong nhóm trong 1 transaction riêng
+#    (không giữ khóa của cả công ty suốt lần chạy lại): lỗi giữa chừng -> rollback, sổ kho cũ của nhóm được giữ nguyên
+# 2. đọc lần lượt số dư đầu kì + các phiếu nhập - xuất đã duyệt theo thứ tự duyệt, thu lại dữ liệu ghi log của
+#    từng phiếu (ReportInvLog.capture) đúng 1 lần:
+#    - 1 nhóm: ghi ngay, không giữ các phiếu trong bộ nhớ
+#    - nhiều nhóm: chia các dòng của từng phiếu theo nhóm, phần của nhóm ghi tạm ra file riêng của nhóm (pickle
+#      từng phiếu, không giữ các phiếu trong bộ nhớ), sau đó các nhóm đọc lại file của mình và ghi
+#      (tuần tự, hoặc song song - mỗi nhóm chạy trong 1 process con khi workers > 1)
+# Module này không được import trong utils/__init__ (tránh import vòng với serializers).
+
+# đối tượng chạy lại + các nhóm sản phẩm + file dữ liệu ghi log theo nhóm, gán trước khi fork để process con
+# đọc lại mà không cần pickle
+_REPLAY_STATE = {}
+
+
+def _replay_bucket(bucket_index):
+    """ Chạy trong process con (mỗi file nhóm chỉ được đọc bởi 1 process) """
+    replay = _REPLAY_STATE['replay']
+    return replay.run_bucket(
+        _REPLAY_STATE['buckets'][bucket_index],
+        replay.iter_spilled_postings(_REPLAY_STATE['bucket_files'][bucket_index])
+    )
+
+
+class ReportInvReplay:
+    # các loại phiếu nguồn: (model, các hàm đẩy vào sổ kho)
+    SOURCE_DOCS = (
+        (OrderDeliverySub, (
+            IRForDeliveryHandler.push_to_inventory_report, IRForDeliveryHandler.push_to_inventory_report_lease
+        )),
+        (GoodsIssue, (IRForGoodsIssueHandler.push_to_inventory_report,)),
+        (GoodsReceipt, (IRForGoodsReceiptHandler.push_to_inventory_report,)),
+        (GoodsReturn, (IRForGoodsReturnHandler.push_to_inventory_report,)),
+        (GoodsTransfer, (IRForGoodsTransferHandler.push_to_inventory_report,)),
+    )
+    PROGRESS_STEP = 200
+    # số sản phẩm tối đa của 1 nhóm (1 transaction)
+    BUCKET_PRODUCTS = 200
+
+    def __init__(self, company_id, product_ids=None, workers=1, progress_callback=None):
+        """
+        product_ids: chỉ chạy lại các sản phẩm này (None: toàn bộ sản phẩm của công ty)
+        progress_callback(done_docs, total_docs): báo tiến trình
+        """
+        self.company = Company.objects.select_related('company_config').get(id=company_id)
+        self.product_ids = {str(product_id) for product_id in product_ids} if product_ids else None
+        self.workers = max(int(workers or 1), 1)
+        self.progress_callback = progress_callback
+        self.cost_cfg = ReportInvCommonFunc.get_cost_config(self.company)
+        self.sub_periods = list(
+            SubPeriods.objects.filter(
+                period_mapped__tenant_id=self.company.tenant_id, period_mapped__company_id=self.company.id
+            ).select_related('period_mapped').order_by('period_mapped__fiscal_year', 'order')
+        )
+        current_period = Periods.get_current_period(self.company.tenant_id, self.company.id)
+        current_sub = Periods.get_current_sub_period(current_period) if current_period else None
+        self.current_sub_index = next(
+            (index for index, sub_period in enumerate(self.sub_periods) if sub_period.id == current_sub.id), None
+        ) if current_sub else None
+
+    def report_progress(self, done_docs, total_docs):
+        if self.progress_callback:
+            self.progress_callback(done_docs, total_docs)
+        return True
+
+    def get_sub_period_index(self, doc_date):
+        for index, sub_period in enumerate(self.sub_periods):
+            if sub_period.start_date <= doc_date.date() <= sub_period.end_date:
+                return index
+        return None
+
+    def count_source_docs(self):
+        """ số phiếu cần đọc lại (số dư đầu kì + các phiếu đã duyệt), dùng để báo tiến trình """
+        return BalanceInitialization.objects.filter(company_id=self.company.id).count() + sum(
+            model.objects.filter(company_id=self.company.id, system_status=3, date_approved__isnull=False).count()
+            for model, _push_funcs in self.SOURCE_DOCS
+        )
+
+    def stream_source_docs(self):
+        """ Đọc lần lượt các phiếu đã duyệt của công ty theo thứ tự duyệt (merge các loại phiếu) """
+        streams = []
+        for model_index, (model, _push_funcs) in enumerate(self.SOURCE_DOCS):
+            streams.append(
+                (date_approved, model_index, doc_id)
+                for doc_id, date_approved in model.objects.filter(
+                    company_id=self.company.id, system_status=3, date_approved__isnull=False
+                ).order_by('date_approved').values_list('id', 'date_approved').iterator()
+            )
+        for _date_approved, model_index, doc_id in heapq.merge(*streams, key=lambda x: (x[0], x[1])):
+            model, push_funcs = self.SOURCE_DOCS[model_index]
+            yield model.objects.get(id=doc_id), push_funcs
+
+    def iter_doc_postings(self):
+        """
+        Step 1: mỗi lần trả về dữ liệu ghi log của 1 phiếu (số dư đầu kì trước, sau đó các phiếu theo thứ tự duyệt).
+        Trong khối capture các handler chỉ thu lại dữ liệu ghi log, không ghi sổ kho và không chạy lại các tác động
+        khác (vd: giá đích danh create_or_update_si_product_serial).
+        """
+        with ReportInvLog.capture() as postings:
+            for balance_init in BalanceInitialization.objects.filter(
+                    company_id=self.company.id
+            ).select_related('product', 'warehouse', 'company').iterator():
+                prd_wh_obj = ProductWareHouse.objects.filter(
+                    product=balance_init.product, warehouse=balance_init.warehouse
+                ).first()
+                if prd_wh_obj:
+                    BalanceInitializationCreateSerializer.push_to_inventory_report(balance_init, prd_wh_obj)
+                yield list(postings)
+                postings.clear()
+            for instance, push_funcs in self.stream_source_docs():
+                for push_func in push_funcs:
+                    push_func(instance)
+                yield list(postings)
+                postings.clear()
+
+    def capture_bucket_postings(self, buckets, bucket_files):
+        """
+        Step 1 (nhiều nhóm): đọc lại các phiếu 1 lần, chia các dòng của từng phiếu theo nhóm sản phẩm,
+        phần của nhóm ghi nối vào file của nhóm (bucket_files, mỗi phiếu 1 lần pickle) => bộ nhớ chỉ giữ 1 phiếu.
+        Trả về (số phiếu đã đọc, số phiếu đã ghi vào file của từng nhóm)
+        """
+        bucket_of_product = {product_id: index for index, bucket in enumerate(buckets) for product_id in bucket}
+        bucket_counts = [0] * len(buckets)
+        done_docs = 0
+        for doc_postings in self.iter_doc_postings():
+            postings_by_bucket = {}
+            for doc_obj, doc_date, doc_data, for_balance_init in doc_postings:
+                lines_by_bucket = {}
+                for item in doc_data:
+                    bucket_index = bucket_of_product.get(str(item['product'].id))
+                    if bucket_index is not None:
+                        lines_by_bucket.setdefault(bucket_index, []).append(item)
+                for bucket_index, lines in lines_by_bucket.items():
+                    postings_by_bucket.setdefault(bucket_index, []).append((doc_obj, doc_date, lines, for_balance_init))
+            for bucket_index, postings in postings_by_bucket.items():
+                pickle.dump(postings, bucket_files[bucket_index], protocol=pickle.HIGHEST_PROTOCOL)
+                bucket_counts[bucket_index] += 1
+            done_docs += 1
+        for file_obj in bucket_files:
+            file_obj.seek(0)
+        return done_docs, bucket_counts
+
+    @classmethod
+    def iter_spilled_postings(cls, file_obj):
+        """ đọc lại lần lượt dữ liệu ghi log của từng phiếu trong file của nhóm (capture_bucket_postings) """
+        while True:
+            try:
+                yield pickle.load(file_obj)
+            except EOFError:
+                return
+
+    def get_bucket_doc_data(self, doc_data, bucket_products):
+        """ các dòng của phiếu thuộc nhóm sản phẩm (bucket_products = None: toàn bộ sản phẩm của công ty) """
+        if bucket_products is None:
+            return doc_data
+        return [item for item in doc_data if str(item['product'].id) in bucket_products]
+
+    def delete_inventory_report_data(self, bucket_products):
+        """ Step 2: xóa sổ kho cũ của nhóm sản phẩm (lớp FIFO, kho vật lí của cost bị xóa theo) """
+        product_filter = {} if bucket_products is None else {'product_id__in': bucket_products}
+        ReportInventoryCost.objects.filter(company_id=self.company.id, **product_filter).delete()
+        ReportInventoryCostLatestLog.objects.filter(product__company_id=self.company.id, **product_filter).delete()
+        ReportStockLog.objects.filter(company_id=self.company.id, **product_filter).delete()
+        ReportStock.objects.filter(company_id=self.company.id, **product_filter).delete()
+        return True
+
+    def roll_forward(self, from_index, to_index, bucket_products):
+        """ đẩy số dư qua các kỳ con from_index + 1 .. to_index (chỉ cho các sản phẩm của nhóm) """
+        company = self.company
+        for sub_index in range(from_index + 1, to_index + 1):
+            last_sub = self.sub_periods[sub_index - 1]
+            if company.company_config.definition_inventory_valuation == 1:
+                ReportInventorySubFunction.calculate_cost_dict_for_periodic(
+                    last_sub.period_mapped, last_sub.order, company.tenant, company, bucket_products
+                )
+            ReportInvCommonFunc.push_to_next_sub(
+                company.tenant, company, None, self.sub_periods[sub_index], last_sub, bucket_products
+            )
+        return max(from_index, to_index)
+
+    def run_bucket(self, bucket_products, bucket_doc_postings, progress_callback=None):
+        """
+        Xóa rồi ghi lại sổ kho của nhóm sản phẩm trong 1 transaction.
+        bucket_doc_postings: dữ liệu ghi log của từng phiếu (iter_doc_postings hoặc phần của nhóm đã thu lại)
+        Các kỳ con được đi qua theo thứ tự:
+        trước khi ghi phiếu của kỳ sau thì đẩy số dư kỳ trước qua; phiếu thuộc kỳ đã đi qua (vd: phiếu trả hàng ghi
+        theo ngày tạo) được ghi như phiếu ghi lùi ngày.
+        Trả về (số phiếu đã ghi, (kỳ con đầu, kỳ con cuối) đã đi qua hoặc None)
+        """
+        done_docs = 0
+        first_index = last_index = None
+        with transaction.atomic():
+            self.delete_inventory_report_data(bucket_products)
+            for doc_postings in bucket_doc_postings:
+                for doc_obj, doc_date, doc_data, for_balance_init in doc_postings:
+                    sub_index = self.get_sub_period_index(doc_date)
+                    bucket_doc_data = self.get_bucket_doc_data(doc_data, bucket_products)
+                    if sub_index is None or not bucket_doc_data:
+                        continue
+                    if first_index is None:
+                        first_index = last_index = sub_index
+                    last_index = self.roll_forward(last_index, sub_index, bucket_products)
+                    this_sub = self.sub_periods[sub_index]
+                    ReportInvBatchPosting(
+                        doc_obj, bucket_doc_data, this_sub.period_mapped, this_sub, self.cost_cfg,
+                        for_balance_init, replay=True, last_sub_period=self.sub_periods[last_index]
+                    ).run()
+                done_docs += 1
+                if progress_callback and done_docs % self.PROGRESS_STEP == 0:
+                    progress_callback(done_docs)
+            if first_index is None:
+                return done_docs, None
+            # đi tiếp tới kỳ con hiện tại
+            last_index = self.roll_forward(last_index, max(last_index, self.current_sub_index or 0), bucket_products)
+        return done_docs, (first_index, last_index)
+
+    def make_buckets(self):
+        """
+        chia sản phẩm (cần chạy lại) của công ty thành các nhóm theo hash id: tối đa BUCKET_PRODUCTS sản phẩm mỗi nhóm,
+        ít nhất 1 nhóm cho mỗi worker
+        """
+        product_ids = self.product_ids or {
+            str(product_id) for product_id in Product.objects.filter(company_id=self.company.id).values_list(
+                'id', flat=True
+            )
+        }
+        bucket_count = max(self.workers, -(-len(product_ids) // self.BUCKET_PRODUCTS), 1)
+        buckets = [set() for _ in range(bucket_count)]
+        for product_id in product_ids:
+            buckets[uuid.UUID(product_id).int % bucket_count].add(product_id)
+        return [bucket for bucket in buckets if bucket]
+
+    def run_serial(self, buckets, bucket_files, total_postings):
+        """ các nhóm chạy lần lượt, mỗi nhóm 1 transaction """
+        done_postings = 0
+        walks = []
+        for bucket_products, file_obj in zip(buckets, bucket_files):
+            bucket_done, walk = self.run_bucket(
+                bucket_products, self.iter_spilled_postings(file_obj),
+                lambda done, offset=done_postings: self.report_progress(offset + done, total_postings)
+            )
+            done_postings += bucket_done
+            if walk:
+                walks.append(walk)
+            self.report_progress(done_postings, total_postings)
+        return walks
+
+    def run_parallel(self, buckets, bucket_files, total_postings):
+        """ mỗi nhóm sản phẩm chạy trong 1 process con, nhóm lỗi chỉ rollback sổ kho của các sản phẩm trong nhóm """
+        _REPLAY_STATE.update({'replay': self, 'buckets': buckets, 'bucket_files': bucket_files})
+        done_postings = 0
+        walks = []
+        try:
+            # process con mở kết nối DB riêng, không dùng chung kết nối của process cha
+            connections.close_all()
+            with ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('fork')
+            ) as executor:
+                futures = [executor.submit(_replay_bucket, bucket_index) for bucket_index in range(len(buckets))]
+                for future in as_completed(futures):
+                    bucket_done, walk = future.result()
+                    done_postings += bucket_done
+                    if walk:
+                        walks.append(walk)
+                    self.report_progress(done_postings, total_postings)
+        finally:
+            _REPLAY_STATE.clear()
+        return walks
+
+    def mark_sub_periods(self, walk):
+        """ cập nhập các kỳ con đã đi qua thành trạng thái 'đã chạy báo cáo' """
+        return SubPeriods.objects.filter(
+            id__in=[sub_period.id for sub_period in self.sub_periods[walk[0]:walk[1] + 1]]
+        ).update(run_report_inventory=True)
+
+    def run(self):
+        """
+        Chạy lại sổ kho theo nhóm sản phẩm (mỗi nhóm 1 transaction): tuần tự hoặc song song (workers > 1).
+        Worker celery là process daemon, không tạo được process con -> luôn chạy tuần tự.
+        Trả về số phiếu đã đọc
+        """
+        total_docs = self.count_source_docs()
+        print(f'#replay {self.company.title}: {total_docs} doc(s), {self.workers} worker(s)')
+        self.report_progress(0, total_docs)
+        buckets = self.make_buckets()
+        if len(buckets) <= 1:
+            done_docs, walk = self.run_bucket(
+                self.product_ids, self.iter_doc_postings(), lambda done: self.report_progress(done, total_docs)
+            )
+            walks = [walk] if walk else []
+            self.report_progress(done_docs, total_docs)
+        else:
+            bucket_files = [tempfile.TemporaryFile() for _bucket in buckets]
+            try:
+                done_docs, bucket_counts = self.capture_bucket_postings(buckets, bucket_files)
+                # tiến trình theo phần phiếu của từng nhóm (1 phiếu có thể thuộc nhiều nhóm)
+                total_postings = sum(bucket_counts)
+                self.report_progress(0, total_postings)
+                if self.workers > 1 and not multiprocessing.current_process().daemon:
+                    walks = self.run_parallel(buckets, bucket_files, total_postings)
+                else:
+                    walks = self.run_serial(buckets, bucket_files, total_postings)
+            finally:
+                for file_obj in bucket_files:
+                    file_obj.close()
+        if walks:
+            self.mark_sub_periods((min(walk[0] for walk in walks), max(walk[1] for walk in walks)))
+        print('#replay successfully!')
+        return done_docs
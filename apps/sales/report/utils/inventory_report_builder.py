@@ -0,0 +1,433 @@
+from collections import defaultdict
+import numpy as np
+from apps.sales.report.models import ReportStockLog, ReportInventoryCost, ReportInventoryCostByWarehouse
+
+
+__all__ = ['ReportInvRowIndex', 'ReportInvLogTable', 'ReportInvListBuilder']
+
+
+IN_TRANS_TITLE = (
+    'Goods receipt', 'Goods receipt (IA)', 'Goods return', 'Goods transfer (in)', 'Balance init input'
+)
+OUT_TRANS_TITLE = (
+    'Delivery (sale)', 'Delivery (lease)', 'Delivery (service)', 'Goods issue', 'Goods transfer (out)'
+)
+
+
+class ReportInvRowIndex:
+    """
+    Danh sách record (dict) + index theo bộ field lọc (dựng 1 lần / bộ field, lazy)
+    => thay cho queryset.filter(**kwargs) trên từng dòng báo cáo
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self._index = {}
+
+    def select(self, **kwargs) -> np.ndarray:
+        """ Vị trí các record khớp kwargs (giữ nguyên thứ tự load) """
+        fields = tuple(sorted(kwargs.keys()))
+        index = self._index.get(fields, None)
+        if index is None:
+            group = defaultdict(list)
+            for idx, row in enumerate(self.rows):
+                group[tuple(row[field] for field in fields)].append(idx)
+            index = {key: np.array(value, dtype=np.int64) for key, value in group.items()}
+            self._index[fields] = index
+        return index.get(tuple(kwargs[field] for field in fields), np.empty(0, dtype=np.int64))
+
+    def first(self, **kwargs):
+        idx = self.select(**kwargs)
+        return self.rows[idx[0]] if len(idx) > 0 else None
+
+
+class ReportInvLogTable(ReportInvRowIndex):
+    """ Log kho đã load + các cột số (numpy) dùng để lọc ngày, cộng nhập/xuất """
+    ARRAY_FIELDS = (
+        'quantity', 'value', 'perpetual_current_quantity', 'perpetual_current_value',
+        'periodic_current_quantity', 'periodic_current_value',
+    )
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.arrays = {
+            field: np.fromiter((row[field] or 0 for row in rows), dtype=np.float64, count=len(rows))
+            for field in self.ARRAY_FIELDS
+        }
+        self.stock_type = np.fromiter((row['stock_type'] for row in rows), dtype=np.int8, count=len(rows))
+        self.day = np.fromiter(
+            (row['system_date'].day if row['system_date'] else 0 for row in rows), dtype=np.int8, count=len(rows)
+        )
+
+    def get_date_mask(self, idx, date_range) -> np.ndarray:
+        if len(date_range) < 2:
+            return np.ones(len(idx), dtype=bool)
+        day = self.day[idx]
+        return (day >= date_range[0]) & (day <= date_range[1])
+
+
+class ReportInvListBuilder:
+    """
+    Dựng dữ liệu stock_activities cho ReportInventoryCostList / ReportStockList theo từng trang:
+        - 1 query stream toàn bộ log trong tháng của các sản phẩm trong trang (+ 1 query cost, 1 query cost theo kho)
+        - Gom nhóm theo key cost trong bộ nhớ (ReportInvRowIndex), không query theo từng dòng / từng kho
+        - Lọc ngày, cộng nhập/xuất và quy đổi UoM trên mảng numpy
+    Kết quả giữ nguyên format JSON của serializer cũ.
+    """
+    CHUNK_SIZE = 2000
+    LOG_FIELDS = (
+        'id', 'product_id', 'warehouse_id', 'physical_warehouse_id', 'lot_mapped_id', 'serial_number',
+        'sale_order_id', 'lease_order_id', 'service_order_id',
+        'system_date', 'posting_date', 'document_date', 'stock_type', 'trans_code', 'trans_title', 'log_order',
+        'quantity', 'value', 'perpetual_current_quantity', 'perpetual_current_value',
+        'periodic_current_quantity', 'periodic_current_value', 'lot_data', 'serial_data',
+    )
+    COST_FIELDS = (
+        'id', 'product_id', 'warehouse_id', 'lot_mapped_id', 'serial_number',
+        'sale_order_id', 'lease_order_id', 'service_order_id', 'periodic_closed',
+        'opening_balance_quantity', 'opening_balance_cost', 'opening_balance_value',
+        'ending_balance_quantity', 'ending_balance_cost', 'ending_balance_value',
+        'periodic_ending_balance_quantity', 'periodic_ending_balance_cost', 'periodic_ending_balance_value',
+    )
+    COST_WH_FIELDS = (
+        'id', 'report_inventory_cost_id', 'warehouse_id', 'warehouse__code', 'warehouse__title',
+        'opening_quantity', 'ending_quantity',
+    )
+
+    def __init__(self, div, cost_cfg, date_range=None):
+        self.div = div
+        self.cost_cfg = cost_cfg or []
+        self.date_range = date_range or []
+        self.logs = ReportInvLogTable([])
+        self.costs = ReportInvRowIndex([])
+        self.costs_wh = ReportInvRowIndex([])
+
+    # load dữ liệu
+    def load_logs(self, company_id, period_mapped_id, sub_period_order, product_ids):
+        self.logs = ReportInvLogTable(
+            list(
+                ReportStockLog.objects.filter(
+                    company_id=company_id,
+                    report_stock__period_mapped_id=period_mapped_id,
+                    report_stock__sub_period_order=sub_period_order,
+                    product_id__in=product_ids
+                ).order_by('system_date', 'log_order').values(*self.LOG_FIELDS).iterator(chunk_size=self.CHUNK_SIZE)
+            )
+        )
+        return self
+
+    def load_costs(self, period_mapped_id, sub_period_order, product_ids):
+        self.costs = ReportInvRowIndex(
+            list(
+                ReportInventoryCost.objects.filter(
+                    period_mapped_id=period_mapped_id, sub_period_order=sub_period_order, product_id__in=product_ids
+                ).order_by('id').values(*self.COST_FIELDS).iterator(chunk_size=self.CHUNK_SIZE)
+            )
+        )
+        return self
+
+    def load_costs_wh(self, cost_ids):
+        self.costs_wh = ReportInvRowIndex(
+            list(
+                ReportInventoryCostByWarehouse.objects.filter(
+                    report_inventory_cost_id__in=cost_ids
+                ).order_by('warehouse_id', 'id').values(*self.COST_WH_FIELDS).iterator(chunk_size=self.CHUNK_SIZE)
+            )
+        )
+        return self
+
+    def prepare_cost_list(self, objs):
+        """ objs: các ReportInventoryCost của trang hiện tại """
+        objs = list(objs)
+        if objs:
+            product_ids = {obj.product_id for obj in objs}
+            self.load_logs(objs[0].company_id, objs[0].period_mapped_id, objs[0].sub_period_order, product_ids)
+            self.load_costs_wh([obj.id for obj in objs])
+        return self
+
+    def prepare_stock_list(self, objs):
+        """ objs: các ReportStock của trang hiện tại """
+        objs = list(objs)
+        if objs:
+            product_ids = {obj.product_id for obj in objs}
+            period_mapped_id, sub_period_order = objs[0].period_mapped_id, objs[0].sub_period_order
+            self.load_logs(objs[0].company_id, period_mapped_id, sub_period_order, product_ids)
+            self.load_costs(period_mapped_id, sub_period_order, product_ids)
+            self.load_costs_wh([cost['id'] for cost in self.costs.rows])
+        return self
+
+    # hàm tính toán
+    @classmethod
+    def cast_array(cls, inventory_uom, array):
+        """ cast_unit_to_inv_quantity trên mảng """
+        if inventory_uom and inventory_uom.ratio:
+            return array / inventory_uom.ratio
+        return np.zeros_like(array)
+
+    @classmethod
+    def cast_value(cls, inventory_uom, quantity):
+        return (quantity / inventory_uom.ratio) if inventory_uom and inventory_uom.ratio else 0
+
+    @classmethod
+    def divide_array(cls, value, quantity):
+        """ value / quantity, quantity = 0 => 0 """
+        return np.divide(value, quantity, out=np.zeros_like(value), where=quantity != 0)
+
+    @classmethod
+    def get_cost_values(cls, obj):
+        return {field: getattr(obj, field) for field in cls.COST_FIELDS}
+
+    def get_cost_wh_list(self, cost_id):
+        return [self.costs_wh.rows[idx] for idx in self.costs_wh.select(report_inventory_cost_id=cost_id)]
+
+    def get_this_sub_period_cost_dict(self, cost, warehouse_id=None):
+        """ ReportInventorySubFunction.get_this_sub_period_cost_dict trên dữ liệu đã load """
+        if not warehouse_id:
+            if self.div == 0:
+                ending = (cost['ending_balance_quantity'], cost['ending_balance_cost'], cost['ending_balance_value'])
+            else:
+                ending = (
+                    cost['periodic_ending_balance_quantity'],
+                    cost['periodic_ending_balance_cost'],
+                    cost['periodic_ending_balance_value']
+                )
+            opening = (cost['opening_balance_quantity'], cost['opening_balance_cost'], cost['opening_balance_value'])
+        else:
+            cost_wh = self.costs_wh.first(report_inventory_cost_id=cost['id'], warehouse_id=warehouse_id)
+            if cost_wh:
+                opening = (
+                    cost_wh['opening_quantity'],
+                    cost['opening_balance_cost'],
+                    cost_wh['opening_quantity'] * cost['opening_balance_cost']
+                )
+                if self.div == 0:
+                    ending = (
+                        cost_wh['ending_quantity'],
+                        cost['ending_balance_cost'],
+                        cost_wh['ending_quantity'] * cost['ending_balance_cost']
+                    )
+                else:
+                    ending = (
+                        cost['periodic_ending_balance_quantity'],
+                        cost['periodic_ending_balance_cost'],
+                        cost['periodic_ending_balance_value']
+                    )
+            else:
+                opening, ending = (0, 0, 0), (0, 0, 0)
+        return {
+            'opening_balance_quantity': opening[0],
+            'opening_balance_cost': opening[1],
+            'opening_balance_value': opening[2],
+            'ending_balance_quantity': ending[0],
+            'ending_balance_cost': ending[1],
+            'ending_balance_value': ending[2],
+        }
+
+    # ReportStockList
+    def get_stock_activities_detail(self, inventory_uom, **kwargs):
+        idx = self.logs.select(**kwargs)
+        if len(idx) == 0:
+            return []
+        current_field = ['perpetual', 'periodic'][self.div]
+        quantity = self.cast_array(inventory_uom, self.logs.arrays['quantity'][idx])
+        value = self.logs.arrays['value'][idx]
+        current_quantity = self.cast_array(inventory_uom, self.logs.arrays[f'{current_field}_current_quantity'][idx])
+        current_value = self.logs.arrays[f'{current_field}_current_value'][idx]
+        cost = self.divide_array(value, quantity)
+        current_cost = self.divide_array(current_value, current_quantity)
+
+        data_stock_activity = []
+        for num, row_idx in enumerate(idx.tolist()):
+            log = self.logs.rows[row_idx]
+            data_stock_activity.append({
+                'system_date': log['system_date'],
+                'posting_date': log['posting_date'],
+                'document_date': log['document_date'],
+                'stock_type': log['stock_type'],
+                'trans_code': log['trans_code'],
+                'trans_title': log['trans_title'],
+                'quantity': float(quantity[num]),
+                'cost': float(cost[num]),
+                'value': log['value'],
+                'current_quantity': float(current_quantity[num]),
+                'current_cost': float(current_cost[num]),
+                'current_value': log[f'{current_field}_current_value'],
+                'log_order': log['log_order']
+            })
+        # log đã load theo thứ tự (system_date, log_order)
+        return data_stock_activity
+
+    def get_stock_activities(self, obj, wh_list):
+        kwargs = {'product_id': obj.product_id}
+        if 2 in self.cost_cfg:
+            kwargs['lot_mapped_id'] = obj.lot_mapped_id
+        if 3 in self.cost_cfg:
+            kwargs['sale_order_id'] = obj.sale_order_id
+            kwargs['lease_order_id'] = obj.lease_order_id
+            kwargs['service_order_id'] = obj.service_order_id
+        if obj.product.valuation_method == 2:
+            kwargs['serial_number'] = obj.serial_number
+        has_order = 3 in self.cost_cfg
+        inventory_uom = obj.product.inventory_uom
+
+        result = []
+        for warehouse_item in wh_list:
+            # warehouse_item: [id, code, title]
+            if 1 in self.cost_cfg:
+                kwargs['warehouse_id'] = warehouse_item[0] if len(warehouse_item) > 0 else None
+            this_sub_period_cost = self.costs.first(**kwargs)
+            if this_sub_period_cost:
+                this_balance = self.get_this_sub_period_cost_dict(
+                    this_sub_period_cost, warehouse_item[0] if has_order else None
+                )
+                casted_obq = self.cast_value(inventory_uom, this_balance['opening_balance_quantity'])
+                casted_obv = this_balance['opening_balance_value']
+                casted_ebq = self.cast_value(inventory_uom, this_balance['ending_balance_quantity'])
+                casted_ebv = this_balance['ending_balance_value']
+                log_kwargs = {**kwargs, 'physical_warehouse_id': warehouse_item[0]} if has_order else kwargs
+                result.append({
+                    'warehouse_id': warehouse_item[0],
+                    'warehouse_code': warehouse_item[1],
+                    'warehouse_title': warehouse_item[2],
+                    'opening_balance_quantity': casted_obq,
+                    'opening_balance_cost': casted_obv / casted_obq if casted_obq else 0,
+                    'opening_balance_value': casted_obv,
+                    'ending_balance_quantity': casted_ebq,
+                    'ending_balance_cost': casted_ebv / casted_ebq if casted_ebq else 0,
+                    'ending_balance_value': casted_ebv,
+                    'data_stock_activity': self.get_stock_activities_detail(inventory_uom, **log_kwargs),
+                    'periodic_closed': this_sub_period_cost['periodic_closed']
+                })
+        return sorted(result, key=lambda key: key['warehouse_code'])
+
+    # ReportInventoryCostList
+    def get_in_out_detail(self, log, casted_quantity, inventory_uom, prefix):
+        if len(log['lot_data']) > 0:
+            lot = log['lot_data']
+            return {
+                f'{prefix}_quantity': self.cast_value(inventory_uom, lot.get('lot_quantity', 0)),
+                f'{prefix}_value': lot.get('lot_value'),
+                'system_date': log['system_date'],
+                'lot_number': lot.get('lot_number'),
+                'expire_date': lot.get('lot_expire_date'),
+                'log_order': log['log_order'],
+                'trans_title': log['trans_title'],
+                'trans_code': log['trans_code'],
+            }
+        if len(log['serial_data']) > 0:
+            return {
+                f'{prefix}_quantity': 1,
+                f'{prefix}_value': log['value'],
+                'system_date': log['system_date'],
+                'serial_number': log['serial_data'].get('serial_number'),
+                'log_order': log['log_order'],
+                'trans_title': log['trans_title'],
+                'trans_code': log['trans_code'],
+            }
+        return {
+            f'{prefix}_quantity': casted_quantity,
+            f'{prefix}_value': log['value'],
+            'system_date': log['system_date'],
+            'log_order': log['log_order'],
+            'trans_title': log['trans_title'],
+            'trans_code': log['trans_code'],
+        }
+
+    def get_in_out_data(self, obj, **kwargs):
+        """ Tổng nhập/xuất + chi tiết nhập/xuất trong date_range của 1 nhóm log """
+        inventory_uom = obj.product.inventory_uom
+        idx = self.logs.select(product_id=obj.product_id, **kwargs)
+        idx = idx[self.logs.get_date_mask(idx, self.date_range)]
+        stock_in = self.logs.stock_type[idx] == 1
+        quantity = self.logs.arrays['quantity'][idx]
+        value = self.logs.arrays['value'][idx]
+        casted_quantity = self.cast_array(inventory_uom, quantity)
+
+        data_stock_activity = []
+        for num, row_idx in enumerate(idx.tolist()):
+            log = self.logs.rows[row_idx]
+            # lấy detail cho từng TH
+            prefix = 'in' if log['trans_title'] in IN_TRANS_TITLE else (
+                'out' if log['trans_title'] in OUT_TRANS_TITLE else None
+            )
+            if prefix:
+                data_stock_activity.append(
+                    self.get_in_out_detail(log, float(casted_quantity[num]), inventory_uom, prefix)
+                )
+
+        if self.div == 0:
+            sum_data = {
+                'sum_in_quantity': float(casted_quantity[stock_in].sum()),
+                'sum_in_value': float(value[stock_in].sum()),
+                'sum_out_quantity': float(casted_quantity[~stock_in].sum()),
+                'sum_out_value': float(value[~stock_in].sum()),
+            }
+        else:
+            sum_data = {
+                'sum_in_quantity': self.cast_value(inventory_uom, obj.sum_input_quantity),
+                'sum_in_value': obj.sum_input_value,
+                'sum_out_quantity': self.cast_value(inventory_uom, obj.sum_output_quantity),
+                'sum_out_value': obj.sum_output_value,
+            }
+        return sum_data, data_stock_activity
+
+    def for_project(self, obj):
+        result = []
+        this_sub_value = self.get_this_sub_period_cost_dict(self.get_cost_values(obj))
+        inventory_uom = obj.product.inventory_uom
+        for wh_sub in self.get_cost_wh_list(obj.id):
+            sum_data, data_stock_activity = self.get_in_out_data(
+                obj,
+                physical_warehouse_id=wh_sub['warehouse_id'],
+                sale_order_id=obj.sale_order_id,
+                lease_order_id=obj.lease_order_id,
+                service_order_id=obj.service_order_id,
+                serial_number=obj.serial_number,
+            )
+            result.append({
+                'opening_balance_quantity': self.cast_value(inventory_uom, wh_sub['opening_quantity']),
+                'opening_balance_value': wh_sub['opening_quantity'] * this_sub_value['opening_balance_cost'],
+                **sum_data,
+                'ending_balance_quantity': self.cast_value(inventory_uom, wh_sub['ending_quantity']),
+                'ending_balance_value': wh_sub['ending_quantity'] * this_sub_value['ending_balance_cost'],
+                'data_stock_activity': data_stock_activity,
+                'periodic_closed': obj.periodic_closed
+            })
+        return result
+
+    def for_none_project(self, obj):
+        kwargs = {'physical_warehouse_id': obj.warehouse_id, 'serial_number': obj.serial_number}
+        if 1 in self.cost_cfg:
+            kwargs['warehouse_id'] = obj.warehouse_id
+        if 2 in self.cost_cfg:
+            kwargs['lot_mapped_id'] = obj.lot_mapped_id
+        if 3 in self.cost_cfg:
+            kwargs['sale_order_id'] = obj.sale_order_id
+            kwargs['lease_order_id'] = obj.lease_order_id
+            kwargs['service_order_id'] = obj.service_order_id
+        sum_data, data_stock_activity = self.get_in_out_data(obj, **kwargs)
+        this_sub_value = self.get_this_sub_period_cost_dict(self.get_cost_values(obj))
+        inventory_uom = obj.product.inventory_uom
+        return {
+            'opening_balance_quantity': self.cast_value(inventory_uom, this_sub_value['opening_balance_quantity']),
+            'opening_balance_value': this_sub_value['opening_balance_value'],
+            **sum_data,
+            'ending_balance_quantity': self.cast_value(inventory_uom, this_sub_value['ending_balance_quantity']),
+            'ending_balance_value': this_sub_value['ending_balance_value'],
+            'data_stock_activity': data_stock_activity,
+            'periodic_closed': obj.periodic_closed
+        }
+
+    def get_inventory_cost_activities(self, obj):
+        if not obj.warehouse_id:  # Project
+            return self.for_project(obj)
+        return self.for_none_project(obj)
+
+    def get_warehouse_sub_list(self, obj):
+        return [{
+            'id': wh_sub['warehouse_id'],
+            'title': wh_sub['warehouse__title'],
+            'code': wh_sub['warehouse__code'],
+            'opening_quantity': wh_sub['opening_quantity'],
+            'ending_quantity': wh_sub['ending_quantity']
+        } if wh_sub['warehouse_id'] else {} for wh_sub in self.get_cost_wh_list(obj.id)]
@@ -0,0 +1,438 @@
+from django.db.models import Q, F, Sum, FloatField, OuterRef, Subquery
+from apps.masterdata.saledata.models import SubPeriods
+from apps.sales.report.models import (
+    ReportStockLog, ReportInventoryCost, ReportInventoryCostByWarehouse, ReportInventoryCostLatestLog,
+    ReportInventoryFifoLayer, ReportInventorySubFunction
+)
+
+
+class ReportInventoryRepropagation:
+    """
+    Log ghi lùi ngày (system_date trước log gần nhất của cùng key, hoặc key mới ghi vào kỳ trước các kỳ đã mở):
+    sau khi ghi như bình thường, chỉ tính lại phần đuôi chuỗi log của key đó (từ log này trở về sau) và các record
+    ReportInventoryCost từ kỳ của log tới các kỳ sau (kỳ đã mở chưa có record của key thì tạo, đẩy số dư qua).
+    Log ghi đúng thứ tự không đi qua bước này.
+    FIFO: trả lại các lớp giá đã bị lấy bởi các log xuất từ ngày của log này trở về sau (cùng key lớp giá), lấy lại
+    theo thứ tự ngày và tính lại giá xuất của các log đó trước khi tính lại chuỗi log - record cost.
+    """
+    LOG_ORDERING = ('system_date', 'date_created', 'log_order')
+
+    @classmethod
+    def is_backdated(cls, log, latest_system_date):
+        return bool(latest_system_date and log.system_date and log.system_date < latest_system_date)
+
+    @classmethod
+    def get_later_sub_periods(cls, log, last_sub_period=None):
+        """
+        Các kỳ con sau kỳ của log đã mở (đã đẩy số dư qua), theo thứ tự kỳ
+        last_sub_period: chỉ lấy tới kỳ này (chạy lại sổ kho: kỳ đã đi tới, không theo trạng thái mở kỳ)
+        """
+        fiscal_year = log.report_stock.period_mapped.fiscal_year
+        sub_period_order = log.report_stock.sub_period_order
+        sub_periods = SubPeriods.objects.filter(
+            period_mapped__tenant_id=log.tenant_id, period_mapped__company_id=log.company_id
+        ).filter(
+            Q(period_mapped__fiscal_year__gt=fiscal_year) | Q(
+                period_mapped__fiscal_year=fiscal_year, order__gt=sub_period_order
+            )
+        ).select_related('period_mapped').order_by('period_mapped__fiscal_year', 'order')
+        if last_sub_period is None:
+            return sub_periods.filter(run_report_inventory=True)
+        return sub_periods.filter(
+            Q(period_mapped__fiscal_year__lt=last_sub_period.period_mapped.fiscal_year) | Q(
+                period_mapped__fiscal_year=last_sub_period.period_mapped.fiscal_year,
+                order__lte=last_sub_period.order
+            )
+        )
+
+    @classmethod
+    def get_chain_kwargs(cls, log, **kwargs):
+        """ chuỗi log tính cost: theo kho vật lí nếu không tính cost theo kho (giống LatestLog) """
+        chain_kwargs = dict(kwargs)
+        if 'warehouse_id' not in chain_kwargs:
+            chain_kwargs['physical_warehouse_id'] = log.physical_warehouse_id
+        return chain_kwargs
+
+    @classmethod
+    def get_log_cost_dict(cls, div, log):
+        return {
+            'quantity': log.perpetual_current_quantity,
+            'cost': log.perpetual_current_cost,
+            'value': log.perpetual_current_value
+        } if div == 0 else {
+            'quantity': log.periodic_current_quantity,
+            'cost': 0,
+            'value': 0
+        }
+
+    @classmethod
+    def repropagate_chain(cls, log, div, **kwargs):
+        """ Tính lại log này và các log phía sau cùng chuỗi, bắt đầu từ log liền trước (hoặc số dư đầu kì) """
+        chain_kwargs = cls.get_chain_kwargs(log, **kwargs)
+        chain = ReportStockLog.objects.filter(
+            company_id=log.company_id, product_id=log.product_id, **chain_kwargs
+        ).select_related('product')
+        candidates = list(chain.filter(system_date__gte=log.system_date).order_by(*cls.LOG_ORDERING))
+        position = next((index for index, item in enumerate(candidates) if item.id == log.id), 0)
+        previous_log = candidates[position - 1] if position > 0 else chain.filter(
+            system_date__lt=log.system_date
+        ).order_by(*cls.LOG_ORDERING).last()
+        latest_cost = cls.get_log_cost_dict(div, previous_log) if previous_log else (
+            ReportInventorySubFunction.get_opening_cost_dict(log.product_id, 3, **kwargs)
+        )
+
+        suffix = candidates[position:]
+        for item in suffix:
+            # BQ: giá xuất là giá bình quân tại thời điểm xuất -> tính lại theo chuỗi mới
+            if div == 0 and item.stock_type == -1 and item.product.valuation_method == 1:
+                item.cost = latest_cost['cost']
+                item.value = item.cost * item.quantity
+                if isinstance(item.lot_data, dict) and len(item.lot_data) != 0:
+                    item.lot_data['lot_value'] = item.value
+            ReportStockLog.update_log_cost_dict(div, item, latest_cost, commit=False)
+            latest_cost = cls.get_log_cost_dict(div, item)
+        ReportStockLog.objects.bulk_update(suffix, fields=[
+            'cost', 'value', 'lot_data',
+            'perpetual_current_quantity', 'perpetual_current_cost', 'perpetual_current_value',
+            'periodic_current_quantity', 'periodic_current_cost', 'periodic_current_value'
+        ])
+
+        # log gần nhất của chuỗi là log cuối theo ngày, không phải log vừa ghi
+        latest_kwargs = dict(kwargs)
+        if 'warehouse_id' not in latest_kwargs:
+            latest_kwargs['warehouse_id'] = log.physical_warehouse_id
+        ReportInventoryCostLatestLog.objects.filter(product_id=log.product_id, **latest_kwargs).update(
+            latest_log=suffix[-1] if suffix else log
+        )
+        return suffix
+
+    @classmethod
+    def log_position(cls, log):
+        return tuple(getattr(log, field) for field in cls.LOG_ORDERING)
+
+    @classmethod
+    def recost_fifo_issues(cls, log, **kwargs):
+        """
+        FIFO: các log xuất cùng key lớp giá (mọi kho vật lí) từ log này trở về sau trả lại SL đã lấy cho lớp giá,
+        rồi lấy lại theo thứ tự ngày (chỉ lớp giá nhập tới ngày xuất), tính lại giá xuất (1 lần nạp lớp giá,
+        1 bulk_update cho log và lớp giá). Trả về các log xuất đã tính lại giá
+        """
+        log_position = cls.log_position(log)
+        issues = [
+            item for item in ReportStockLog.objects.filter(
+                company_id=log.company_id, product_id=log.product_id, stock_type=-1,
+                system_date__gte=log.system_date, **kwargs
+            ).select_related('product').order_by(*cls.LOG_ORDERING)
+            if cls.log_position(item) >= log_position
+        ]
+        if not issues:
+            return []
+
+        consumed_log_ids = {
+            item['log_trans_id'] for issue in issues for item in (issue.fifo_cost_detail or []) if item.get('log_trans_id')
+        }
+        layer_filter = Q(is_depleted=False)
+        if consumed_log_ids:
+            layer_filter |= Q(stock_log_id__in=consumed_log_ids)
+        layers = list(
+            ReportInventoryFifoLayer.objects.select_for_update().filter(
+                product_id=log.product_id, **kwargs
+            ).filter(layer_filter).order_by('system_date', 'log_order')
+        )
+        layers_by_log_id = {str(layer.stock_log_id): layer for layer in layers}
+        for issue in issues:
+            ReportInventoryFifoLayer.give_back_to_layers(layers_by_log_id, issue.fifo_cost_detail)
+
+        # giống has_layer của ReportInventoryFifoLayer.consume: key chưa có lớp giá nào tới ngày xuất -> số dư đầu kì
+        first_layer_date = ReportInventoryFifoLayer.objects.filter(
+            product_id=log.product_id, system_date__isnull=False, **kwargs
+        ).order_by('system_date').values_list('system_date', flat=True).first()
+        opening_cost = None
+        for issue in issues:
+            fifo_cost_detail, _layers_updated = ReportInventoryFifoLayer.take_from_layers(
+                layers, issue.quantity, issue.system_date
+            )
+            if first_layer_date and (issue.system_date is None or first_layer_date <= issue.system_date):
+                issue.cost = (
+                    sum(item['log_value'] for item in fifo_cost_detail) / issue.quantity
+                ) if issue.quantity > 0 else 0
+            else:
+                if opening_cost is None:
+                    opening_cost = ReportInventorySubFunction.get_opening_cost_dict(log.product_id, 3, **kwargs)['cost']
+                issue.cost = opening_cost
+            issue.fifo_cost_detail = fifo_cost_detail
+            issue.value = issue.cost * issue.quantity
+            if isinstance(issue.lot_data, dict) and len(issue.lot_data) != 0:
+                issue.lot_data['lot_value'] = issue.value
+        ReportStockLog.objects.bulk_update(issues, fields=['cost', 'value', 'lot_data', 'fifo_cost_detail'])
+        ReportInventoryFifoLayer.objects.bulk_update(layers, fields=['remaining_quantity', 'is_depleted'])
+        return issues
+
+    @classmethod
+    def get_sub_period_costs(cls, log, last_sub_period=None, **kwargs):
+        """
+        record cost của key từ kỳ trước kỳ của log tới các kỳ sau, theo thứ tự kỳ.
+        Kỳ đã mở sau kỳ của log chưa có record của key (vd: key mới ghi lùi ngày) -> tạo record, đẩy số dư qua
+        (giống ReportInvCommonFunc.push_to_next_sub), đầu kỳ - cuối kỳ được tính lại ở repropagate_sub_period_costs
+        """
+        fiscal_year = log.report_stock.period_mapped.fiscal_year
+        sub_period_order = log.report_stock.sub_period_order
+        period_filter = Q(period_mapped__fiscal_year__gt=fiscal_year) | Q(
+            period_mapped__fiscal_year=fiscal_year, sub_period_order__gte=sub_period_order - 1
+        )
+        if int(sub_period_order) == 1:
+            period_filter |= Q(period_mapped__fiscal_year=fiscal_year - 1, sub_period_order=12)
+        sub_period_costs = list(
+            ReportInventoryCost.objects.filter(
+                tenant_id=log.tenant_id, company_id=log.company_id, product_id=log.product_id, **kwargs
+            ).filter(period_filter).select_related('period_mapped').prefetch_related(
+                'report_inventory_cost_wh'
+            ).order_by('period_mapped__fiscal_year', 'sub_period_order')
+        )
+        existed_costs = {rp_cost.sub_period_id: rp_cost for rp_cost in sub_period_costs}
+        log_period_key = (fiscal_year, sub_period_order)
+        previous_cost = next(
+            (
+                rp_cost for rp_cost in reversed(sub_period_costs)
+                if (rp_cost.period_mapped.fiscal_year, rp_cost.sub_period_order) <= log_period_key
+            ), None
+        )
+        previous_whs = list(previous_cost.report_inventory_cost_wh.all()) if previous_cost else []
+        bulk_info, bulk_info_wh = [], []
+        for sub_period in cls.get_later_sub_periods(log, last_sub_period):
+            if sub_period.id in existed_costs:
+                previous_cost = existed_costs[sub_period.id]
+                previous_whs = list(previous_cost.report_inventory_cost_wh.all())
+            elif previous_cost:
+                previous_cost, previous_whs = cls.new_carried_cost(previous_cost, previous_whs, sub_period)
+                bulk_info.append(previous_cost)
+                bulk_info_wh.extend(previous_whs)
+        ReportInventoryCost.objects.bulk_create(bulk_info)
+        ReportInventoryCostByWarehouse.objects.bulk_create(bulk_info_wh)
+        return sorted(
+            sub_period_costs + bulk_info, key=lambda x: (x.period_mapped.fiscal_year, x.sub_period_order)
+        )
+
+    @classmethod
+    def new_carried_cost(cls, previous_cost, previous_whs, sub_period):
+        """ record cost của key ở kỳ sau, số dư cuối kỳ trước đẩy qua đầu kỳ (kể cả SL theo kho vật lí) """
+        rp_cost = ReportInventoryCost(
+            tenant_id=previous_cost.tenant_id,
+            company_id=previous_cost.company_id,
+            employee_created_id=previous_cost.employee_created_id,
+            employee_inherit_id=previous_cost.employee_inherit_id,
+            product_id=previous_cost.product_id,
+            serial_number=previous_cost.serial_number,
+            lot_mapped_id=previous_cost.lot_mapped_id,
+            warehouse_id=previous_cost.warehouse_id,
+            sale_order_id=previous_cost.sale_order_id,
+            lease_order_id=previous_cost.lease_order_id,
+            service_order_id=previous_cost.service_order_id,
+            period_mapped=sub_period.period_mapped,
+            sub_period_order=sub_period.order,
+            sub_period=sub_period,
+        )
+        return rp_cost, [
+            ReportInventoryCostByWarehouse(
+                report_inventory_cost=rp_cost,
+                warehouse_id=cost_wh.warehouse_id,
+                opening_quantity=cost_wh.ending_quantity,
+                ending_quantity=cost_wh.ending_quantity
+            ) for cost_wh in previous_whs
+        ]
+
+    @classmethod
+    def get_month_sums(cls, log, sub_period_costs, **kwargs):
+        """ tổng nhập - xuất theo từng kỳ của key (1 query) """
+        return {
+            item['report_stock__sub_period_id']: item
+            for item in ReportStockLog.objects.filter(
+                company_id=log.company_id, product_id=log.product_id,
+                report_stock__sub_period_id__in=[rp_cost.sub_period_id for rp_cost in sub_period_costs], **kwargs
+            ).values('report_stock__sub_period_id').annotate(
+                input_quantity=Sum('quantity', filter=Q(stock_type=1)),
+                input_value=Sum(F('quantity') * F('cost'), filter=Q(stock_type=1), output_field=FloatField()),
+                output_quantity=Sum('quantity', filter=Q(stock_type=-1)),
+                output_value=Sum(F('quantity') * F('cost'), filter=Q(stock_type=-1), output_field=FloatField()),
+            )
+        }
+
+    @classmethod
+    def get_sub_latest_logs(cls, log, sub_period_costs, **kwargs):
+        """ log cuối cùng theo từng kỳ của key (1 query) """
+        logs = ReportStockLog.objects.filter(company_id=log.company_id, product_id=log.product_id, **kwargs)
+        latest_id = logs.filter(
+            report_stock__sub_period_id=OuterRef('report_stock__sub_period_id')
+        ).order_by(*[f'-{field}' for field in cls.LOG_ORDERING]).values('id')[:1]
+        return {
+            item.report_stock.sub_period_id: item
+            for item in logs.filter(
+                report_stock__sub_period_id__in=[rp_cost.sub_period_id for rp_cost in sub_period_costs]
+            ).annotate(latest_id=Subquery(latest_id)).filter(id=F('latest_id')).select_related('report_stock')
+        }
+
+    @classmethod
+    def set_sums_and_ending_balance(cls, rp_cost, div, sums, sub_latest_log=None):
+        """ gán tổng nhập - xuất của kỳ và tính lại cuối kỳ từ đầu kỳ """
+        rp_cost.sum_input_quantity = sums.get('input_quantity') or 0
+        rp_cost.sum_input_value = sums.get('input_value') or 0
+        rp_cost.sum_output_quantity = sums.get('output_quantity') or 0
+        rp_cost.sum_output_value = sums.get('output_value') or 0
+        sub_latest_log = sub_latest_log if sums else None
+        if sub_latest_log:
+            rp_cost.sub_latest_log = sub_latest_log
+
+        ending_quantity = rp_cost.opening_balance_quantity + rp_cost.sum_input_quantity - rp_cost.sum_output_quantity
+        if div == 0:
+            ending_cost = sub_latest_log.perpetual_current_cost if sub_latest_log else rp_cost.opening_balance_cost
+            rp_cost.ending_balance_quantity = ending_quantity
+            rp_cost.ending_balance_cost = ending_cost
+            rp_cost.ending_balance_value = ending_quantity * ending_cost
+        elif rp_cost.periodic_closed:
+            ReportInventorySubFunction.close_periodic_cost(rp_cost)
+        else:
+            rp_cost.periodic_ending_balance_quantity = ending_quantity
+            rp_cost.periodic_ending_balance_cost = 0
+            rp_cost.periodic_ending_balance_value = 0
+        return rp_cost
+
+    @classmethod
+    def repropagate_sub_period_costs(cls, log, div, created_cost_ids=(), last_sub_period=None, **kwargs):
+        """
+        Tính lại tổng nhập - xuất, cuối kỳ của kỳ của log và đầu kỳ - cuối kỳ của các kỳ sau
+        created_cost_ids: các record cost vừa được tạo khi ghi log (không có kỳ trước -> đầu kỳ là số dư ban đầu)
+        Trả về các record cost đã tính lại (từ kỳ của log)
+        """
+        sub_period_costs = cls.get_sub_period_costs(log, last_sub_period, **kwargs)
+        month_sums = cls.get_month_sums(log, sub_period_costs, **kwargs)
+        sub_latest_logs = cls.get_sub_latest_logs(log, sub_period_costs, **kwargs)
+        log_period_key = (log.report_stock.period_mapped.fiscal_year, log.report_stock.sub_period_order)
+
+        previous_cost = None
+        updated_costs = []
+        for rp_cost in sub_period_costs:
+            if (rp_cost.period_mapped.fiscal_year, rp_cost.sub_period_order) < log_period_key:
+                previous_cost = rp_cost
+                continue
+            if previous_cost:
+                # đầu kỳ = cuối kỳ trước
+                rp_cost.opening_balance_quantity, rp_cost.opening_balance_cost, rp_cost.opening_balance_value = (
+                    previous_cost.ending_balance_quantity,
+                    previous_cost.ending_balance_cost,
+                    previous_cost.ending_balance_value
+                ) if div == 0 else (
+                    previous_cost.periodic_ending_balance_quantity,
+                    previous_cost.periodic_ending_balance_cost,
+                    previous_cost.periodic_ending_balance_value
+                )
+            elif rp_cost.id in created_cost_ids:
+                # record vừa được tạo cho log này và không có kỳ trước -> đầu kỳ là số dư ban đầu
+                opening_cost_dict = ReportInventorySubFunction.get_opening_cost_dict(log.product_id, 3, **kwargs)
+                rp_cost.opening_balance_quantity = opening_cost_dict['quantity']
+                rp_cost.opening_balance_cost = opening_cost_dict['cost']
+                rp_cost.opening_balance_value = opening_cost_dict['value']
+            cls.set_sums_and_ending_balance(
+                rp_cost, div, month_sums.get(rp_cost.sub_period_id, {}), sub_latest_logs.get(rp_cost.sub_period_id)
+            )
+            updated_costs.append(rp_cost)
+            previous_cost = rp_cost
+        ReportInventoryCost.objects.bulk_update(updated_costs, fields=[
+            'opening_balance_quantity', 'opening_balance_cost', 'opening_balance_value',
+            'sum_input_quantity', 'sum_input_value', 'sum_output_quantity', 'sum_output_value',
+            'ending_balance_quantity', 'ending_balance_cost', 'ending_balance_value', 'sub_latest_log',
+            'periodic_ending_balance_quantity', 'periodic_ending_balance_cost', 'periodic_ending_balance_value',
+            'periodic_closed'
+        ])
+        return updated_costs
+
+    @classmethod
+    def repropagate_project_warehouse(cls, log, updated_costs, physical_warehouse_id, **kwargs):
+        """
+        Project: tính lại SL theo kho vật lí của các record cost đã tính lại (từ kỳ của log),
+        đầu kỳ = cuối kỳ trước (kỳ của log giữ nguyên đầu kỳ), cuối kỳ = đầu kỳ + nhập - xuất trong kỳ.
+        Record chưa có dòng của kho thì tạo.
+        """
+        month_quantities = dict(
+            ReportStockLog.objects.filter(
+                company_id=log.company_id, product_id=log.product_id, physical_warehouse_id=physical_warehouse_id,
+                report_stock__sub_period_id__in=[rp_cost.sub_period_id for rp_cost in updated_costs], **kwargs
+            ).values('report_stock__sub_period_id').annotate(
+                quantity=Sum(F('quantity') * F('stock_type'), output_field=FloatField())
+            ).values_list('report_stock__sub_period_id', 'quantity')
+        )
+        cost_whs = {
+            cost_wh.report_inventory_cost_id: cost_wh
+            for cost_wh in ReportInventoryCostByWarehouse.objects.filter(
+                report_inventory_cost__in=updated_costs, warehouse_id=physical_warehouse_id
+            )
+        }
+        bulk_info_wh = []
+        ending_quantity = None
+        for rp_cost in updated_costs:
+            cost_wh = cost_whs.get(rp_cost.id)
+            if not cost_wh:
+                cost_wh = ReportInventoryCostByWarehouse(
+                    report_inventory_cost=rp_cost, warehouse_id=physical_warehouse_id, opening_quantity=0
+                )
+                bulk_info_wh.append(cost_wh)
+            if ending_quantity is not None:
+                cost_wh.opening_quantity = ending_quantity
+            cost_wh.ending_quantity = cost_wh.opening_quantity + (month_quantities.get(rp_cost.sub_period_id) or 0)
+            ending_quantity = cost_wh.ending_quantity
+        ReportInventoryCostByWarehouse.objects.bulk_create(bulk_info_wh)
+        ReportInventoryCostByWarehouse.objects.bulk_update(
+            list(cost_whs.values()), fields=['opening_quantity', 'ending_quantity']
+        )
+        return True
+
+    @classmethod
+    def run(cls, logs, div, cost_cfg, created_cost_ids=(), last_sub_period=None):
+        """
+        logs: các log ghi lùi ngày (đã được ghi như bình thường)
+        created_cost_ids: id các record cost được tạo khi ghi các log này
+        last_sub_period: kỳ con cuối cần tính lại (chỉ truyền khi chạy lại sổ kho)
+        """
+        logs = sorted(logs, key=cls.log_position)
+        chain_logs = list(logs)
+        if div == 0:
+            # FIFO: tính lại giá xuất trước, chuỗi log có log xuất được tính lại giá (kể cả kho vật lí khác) tính lại
+            # từ log xuất sớm nhất của chuỗi đó
+            layer_done = set()
+            for log in logs:
+                if log.product.valuation_method != 0:
+                    continue
+                kwargs = ReportStockLog.get_cost_kwargs(log, cost_cfg)
+                layer_key = (log.product_id, tuple(sorted(kwargs.items())))
+                if layer_key not in layer_done:
+                    layer_done.add(layer_key)
+                    chain_logs.extend(cls.recost_fifo_issues(log, **kwargs))
+            chain_logs = sorted(chain_logs, key=cls.log_position)
+        chain_done = set()
+        for log in chain_logs:
+            kwargs = ReportStockLog.get_cost_kwargs(log, cost_cfg)
+            chain_key = (log.product_id, tuple(sorted(cls.get_chain_kwargs(log, **kwargs).items())))
+            if chain_key not in chain_done:
+                chain_done.add(chain_key)
+                cls.repropagate_chain(log, div, **kwargs)
+        # tính lại record cost sau khi tất cả các chuỗi đã xong (1 record cost có thể gồm nhiều chuỗi)
+        cls.repropagate_costs(logs, div, cost_cfg, created_cost_ids, last_sub_period)
+        return True
+
+    @classmethod
+    def repropagate_costs(cls, logs, div, cost_cfg, created_cost_ids, last_sub_period):
+        """ tính lại record cost (1 lần cho mỗi key, từ log sớm nhất) + SL theo kho vật lí của Project """
+        cost_done = {}
+        for log in logs:
+            kwargs = ReportStockLog.get_cost_kwargs(log, cost_cfg)
+            cost_key = (log.product_id, tuple(sorted(kwargs.items())))
+            if cost_key not in cost_done:
+                cost_done[cost_key] = (log, cls.repropagate_sub_period_costs(
+                    log, div, created_cost_ids, last_sub_period, **kwargs
+                ), set())
+            first_log, updated_costs, warehouse_done = cost_done[cost_key]
+            if ('sale_order_id' in kwargs or 'lease_order_id' in kwargs or 'service_order_id' in kwargs) and (
+                    log.physical_warehouse_id not in warehouse_done
+            ):
+                warehouse_done.add(log.physical_warehouse_id)
+                cls.repropagate_project_warehouse(first_log, updated_costs, log.physical_warehouse_id, **kwargs)
+        return True
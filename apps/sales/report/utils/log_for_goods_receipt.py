@@ -105,12 +105,13 @@ class HasPurchaseRequestHandler:
                         }
                     })
 
-                    # cập nhập hoặc tạo giá đich danh khi nhập
-                    ProductSpecificIdentificationSerialNumber.create_or_update_si_product_serial(
-                        product=gr_item.product,
-                        serial_obj=serial_obj,
-                        specific_value=gr_item.product_unit_price
-                    )
+                    # cập nhập hoặc tạo giá đich danh khi nhập (chạy lại sổ kho: giữ nguyên giá đích danh hiện có)
+                    if not ReportInvLog.is_capturing():
+                        ProductSpecificIdentificationSerialNumber.create_or_update_si_product_serial(
+                            product=gr_item.product,
+                            serial_obj=serial_obj,
+                            specific_value=gr_item.product_unit_price
+                        )
         else:
             casted_quantity = ReportInvCommonFunc.cast_quantity_to_unit(gr_item.uom, prd_wh.quantity_import)
             casted_cost = (
@@ -263,12 +264,13 @@ class NoPurchaseRequestHandler:
                             }
                         })
 
-                        # cập nhập hoặc tạo giá đich danh khi nhập
-                        ProductSpecificIdentificationSerialNumber.create_or_update_si_product_serial(
-                            product=gr_item.product,
-                            serial_obj=serial_obj,
-                            specific_value=gr_item.product_unit_price
-                        )
+                        # cập nhập hoặc tạo giá đich danh khi nhập (chạy lại sổ kho: giữ nguyên giá đích danh hiện có)
+                        if not ReportInvLog.is_capturing():
+                            ProductSpecificIdentificationSerialNumber.create_or_update_si_product_serial(
+                                product=gr_item.product,
+                                serial_obj=serial_obj,
+                                specific_value=gr_item.product_unit_price
+                            )
         else:
             for gr_prd_wh in goods_receipt_warehouses.filter(goods_receipt_product__product=gr_item.product):
                 casted_quantity = ReportInvCommonFunc.cast_quantity_to_unit(gr_item.uom, gr_prd_wh.quantity_import)
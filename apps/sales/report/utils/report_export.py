@@ -0,0 +1,320 @@
+import codecs
+import csv
+import datetime
+import io
+import json
+import math
+import re
+from decimal import Decimal
+from itertools import islice
+from stat import S_IFREG
+from xml.sax.saxutils import escape
+
+from django.http import QueryDict, StreamingHttpResponse
+from django.utils import timezone
+from stream_zip import ZIP_32, stream_zip
+
+from apps.sales.report.models import ReportExportJob
+from apps.sales.report.serializers import ReportExportJobListSerializer
+from apps.sales.report.tasks import export_report
+from apps.shared import ResponseController, call_task_background
+from apps.shared.extends.mask_view import ViewAttribute, ViewChecking, ViewConfigDecorator
+
+
+__all__ = ['ReportExportWriter', 'ReportExportJobRequest', 'ReportExportMixin']
+
+
+class ReportExportWriter:
+    """
+    Ghi file báo cáo dạng generator (bytes) cho StreamingHttpResponse:
+        - CSV: UTF-8 có BOM (Excel đọc đúng tiếng Việt)
+        - XLSX: file zip được stream qua stream_zip, sheet ghi từng dòng (inline string, không shared strings)
+    Chỉ giữ trong bộ nhớ 1 nhóm FLUSH_ROWS dòng => bộ nhớ không tăng theo số dòng.
+    """
+    FLUSH_ROWS = 200
+    CONTENT_TYPE = {
+        'csv': 'text/csv; charset=utf-8',
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    }
+    XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    XML_ILLEGAL_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+    XLSX_CONTENT_TYPES = (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    )
+    XLSX_RELS = (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    )
+    XLSX_WORKBOOK = (
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+    XLSX_WORKBOOK_RELS = (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    )
+
+    # (kiểu, hàm chuyển) theo thứ tự kiểm tra: bool trước int (bool là int)
+    VALUE_PARSERS = (
+        (bool, int),
+        (float, lambda value: value if math.isfinite(value) else str(value)),
+        (int, lambda value: value),
+        (Decimal, float),
+        ((datetime.datetime, datetime.date), lambda value: value.isoformat()),
+        ((dict, list, tuple), lambda value: json.dumps(value, ensure_ascii=False, default=str)),
+    )
+
+    @classmethod
+    def parse_value(cls, value):
+        """ Giá trị ô: số giữ nguyên, còn lại chuyển về chuỗi """
+        if value is None:
+            return ''
+        for value_type, parser in cls.VALUE_PARSERS:
+            if isinstance(value, value_type):
+                return parser(value)
+        return str(value)
+
+    @classmethod
+    def csv_stream(cls, headers, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(headers)
+        yield codecs.BOM_UTF8 + buffer.getvalue().encode('utf-8')
+        for row_chunk in cls.chunked(rows, cls.FLUSH_ROWS):
+            buffer.seek(0)
+            buffer.truncate(0)
+            writer.writerows([[cls.parse_value(value) for value in row] for row in row_chunk])
+            yield buffer.getvalue().encode('utf-8')
+
+    @classmethod
+    def xlsx_cell(cls, value):
+        value = cls.parse_value(value)
+        if value == '':
+            return '<c/>'
+        if isinstance(value, (int, float)):
+            return f'<c><v>{value}</v></c>'
+        value = escape(cls.XML_ILLEGAL_CHARS.sub('', value))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{value}</t></is></c>'
+
+    @classmethod
+    def xlsx_row(cls, row):
+        return '<row>' + ''.join(cls.xlsx_cell(value) for value in row) + '</row>'
+
+    @classmethod
+    def xlsx_sheet_chunks(cls, headers, rows):
+        yield (
+            cls.XML_HEADER
+            + '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            + cls.xlsx_row(headers)
+        ).encode('utf-8')
+        for row_chunk in cls.chunked(rows, cls.FLUSH_ROWS):
+            yield ''.join(cls.xlsx_row(row) for row in row_chunk).encode('utf-8')
+        yield b'</sheetData></worksheet>'
+
+    @classmethod
+    def xlsx_stream(cls, headers, rows):
+        modified_at = timezone.now()
+        mode = S_IFREG | 0o600
+
+        def member(name, chunks):
+            return name, modified_at, mode, ZIP_32, chunks
+
+        def members():
+            yield member('[Content_Types].xml', [(cls.XML_HEADER + cls.XLSX_CONTENT_TYPES).encode('utf-8')])
+            yield member('_rels/.rels', [(cls.XML_HEADER + cls.XLSX_RELS).encode('utf-8')])
+            yield member('xl/workbook.xml', [(cls.XML_HEADER + cls.XLSX_WORKBOOK).encode('utf-8')])
+            yield member('xl/_rels/workbook.xml.rels', [(cls.XML_HEADER + cls.XLSX_WORKBOOK_RELS).encode('utf-8')])
+            yield member('xl/worksheets/sheet1.xml', cls.xlsx_sheet_chunks(headers, rows))
+
+        return stream_zip(members())
+
+    @classmethod
+    def stream(cls, export_format, headers, rows):
+        if export_format == 'xlsx':
+            return cls.xlsx_stream(headers, rows)
+        return cls.csv_stream(headers, rows)
+
+    @staticmethod
+    def chunked(iterable, size):
+        iterator = iter(iterable)
+        while True:
+            chunk = list(islice(iterator, size))
+            if not chunk:
+                return
+            yield chunk
+
+
+class ReportExportJobRequest:
+    """
+    Request của job xuất file ở background cho mask_view (ViewAttribute / ViewChecking) và filter backends của view:
+        - user: tài khoản của người tạo job, tenant/company/employee hiện tại gán theo job (chỉ trong bộ nhớ)
+        - query_params: params của job
+    """
+    method = 'GET'
+
+    def __init__(self, job: ReportExportJob):
+        user = getattr(job.employee_created, 'user', None)
+        if not user:
+            raise ValueError('Employee created has no user account.')
+        user.tenant_current, user.company_current, user.employee_current = job.tenant, job.company, job.employee_created
+        self.user = user
+        self.query_params = QueryDict(mutable=True)
+        self.query_params.update(job.params)
+        self.META = {}  # pylint: disable=C0103
+        self.headers = {}
+
+
+class ReportExportMixin:
+    """
+    Chế độ xuất file cho API list báo cáo (đặt trước BaseListMixin):
+        - ?export=csv|xlsx: stream file, queryset đọc theo chunk (iterator) + serializer list theo từng chunk
+        - ?export=csv|xlsx&export_background=1: tạo ReportExportJob, task export_report gọi export_job_stream
+          (request là ReportExportJobRequest: user + query params của job) rồi ghi file vào attachments
+    Cả 2 cách lọc dữ liệu qua get_export_queryset như API GET: filter_kwargs + quyền của mask_view, filter backends.
+    View khai báo export_columns [(header, key trong data serializer, dạng 'a.b.c')],
+    override get_export_rows nếu 1 dòng serializer tách thành nhiều dòng file.
+    get_queryset / setup_report_context của view đọc tham số qua get_report_params, get_report_scope.
+    """
+    EXPORT_FORMATS = ('csv', 'xlsx')
+    EXPORT_CHUNK_SIZE = 500
+    export_columns: list[tuple[str, str]] = []
+    export_file_name: str = 'report'
+
+    def get_report_params(self) -> dict:
+        return self.request.query_params.dict()
+
+    def get_report_scope(self):
+        """ (tenant, company, employee) của request (job: theo job) """
+        return self.request.user.tenant_current, self.request.user.company_current, self.request.user.employee_current
+
+    def setup_report_context(self):
+        # hook: dữ liệu dùng chung cho serializer (ser_context), gọi trước khi lấy queryset
+        return self.ser_context
+
+    def get_export_format(self):
+        export_format = self.request.query_params.get('export', None)
+        return export_format if export_format in self.EXPORT_FORMATS else None
+
+    def has_list_cache(self, is_minimal) -> bool:
+        if self.get_export_format():
+            return False
+        return super().has_list_cache(is_minimal=is_minimal)
+
+    def list_response(self, is_minimal, filter_kwargs, filter_kwargs_q):
+        export_format = self.get_export_format()
+        if not export_format:
+            return super().list_response(
+                is_minimal=is_minimal, filter_kwargs=filter_kwargs, filter_kwargs_q=filter_kwargs_q
+            )
+        if self.request.query_params.get('export_background', None) in ['1', 'true', 'True']:
+            return self.export_background(export_format)
+        queryset = self.get_export_queryset(filter_kwargs=filter_kwargs, filter_kwargs_q=filter_kwargs_q)
+        return self.export_response(queryset, export_format)
+
+    def get_export_queryset(self, filter_kwargs, filter_kwargs_q):
+        """
+        Queryset xuất file (GET và job dùng chung):
+        filter_kwargs (hidden field) + filter_kwargs_q (quyền) của mask_view, rồi filter backends của view
+        """
+        return self.get_queryset_and_filter_queryset(
+            is_minimal=False, filter_kwargs=filter_kwargs, filter_kwargs_q=filter_kwargs_q
+        )
+
+    def prepare_export_chunk(self, objs):
+        # hook: chuẩn bị dữ liệu dùng chung cho 1 chunk (vd: ReportInvListBuilder)
+        return objs
+
+    def get_export_rows(self, item):
+        yield item
+
+    @classmethod
+    def get_export_value(cls, item, key):
+        value = item
+        for part in key.split('.'):
+            value = value.get(part, None) if isinstance(value, dict) else None
+        if isinstance(value, list):
+            return ', '.join(str(sub) for sub in value)
+        return value
+
+    def iter_export_rows(self, queryset):
+        keys = [key for _header, key in self.export_columns]
+        for objs in ReportExportWriter.chunked(
+                queryset.iterator(chunk_size=self.EXPORT_CHUNK_SIZE), self.EXPORT_CHUNK_SIZE
+        ):
+            objs = self.prepare_export_chunk(objs)
+            for item in self.get_serializer_list(objs, many=True, is_minimal=False).data:
+                for row in self.get_export_rows(item):
+                    yield [self.get_export_value(row, key) for key in keys]
+
+    def get_export_stream(self, queryset, export_format):
+        return ReportExportWriter.stream(
+            export_format, [header for header, _key in self.export_columns], self.iter_export_rows(queryset)
+        )
+
+    def get_export_file_name(self, export_format):
+        return f'{self.export_file_name}_{timezone.now().strftime("%Y%m%d%H%M%S")}.{export_format}'
+
+    def export_response(self, queryset, export_format):
+        response = StreamingHttpResponse(
+            streaming_content=self.get_export_stream(queryset, export_format),
+            content_type=ReportExportWriter.CONTENT_TYPE[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename={self.get_export_file_name(export_format)}'
+        return response
+
+    def export_background(self, export_format):
+        params = {
+            key: value for key, value in self.request.query_params.items()
+            if key not in ['export', 'export_background']
+        }
+        job = ReportExportJob.objects.create(
+            tenant_id=self.request.user.tenant_current_id,
+            company_id=self.request.user.company_current_id,
+            employee_created_id=self.request.user.employee_current_id,
+            title=self.export_file_name,
+            report_code=self.__class__.__name__,
+            export_format=export_format,
+            params=params,
+        )
+        # FE theo dõi job qua API export-job, file kết quả xem/tải qua attachments
+        call_task_background(my_task=export_report, **{'job_id': str(job.id)})
+        job.refresh_from_db()
+        return ResponseController.success_200(data=ReportExportJobListSerializer(job).data, key_data='result')
+
+    # xuất ở background
+    @classmethod
+    def export_job_stream(cls, job):
+        """
+        -> (file_name, content_type, chunks bytes) của job
+        Kiểm tra quyền + lọc dữ liệu như API GET (cùng cấu hình mask_view) với user / query params của job
+        """
+        view = cls()
+        view.request = ReportExportJobRequest(job)
+        view.args, view.kwargs, view.format_kwarg = (), {}, None
+        view.cls_check = ViewChecking(
+            cls_attr=ViewAttribute(view_this=view),
+            cls_decor=ViewConfigDecorator(parent_kwargs=getattr(cls.get, 'mask_view_kwargs', {})),
+        )
+        if view.cls_check.always_check() is not True or view.cls_check.permit_check() is not True:
+            raise ValueError('Employee created has no permission on this report.')
+        view.ser_context = {}
+        view.setup_report_context()
+        queryset = view.get_export_queryset(filter_kwargs=view.filter_kwargs, filter_kwargs_q=view.filter_kwargs_q)
+        return (
+            view.get_export_file_name(job.export_format),
+            ReportExportWriter.CONTENT_TYPE[job.export_format],
+            view.get_export_stream(queryset, job.export_format),
+        )
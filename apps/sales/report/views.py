@@ -1,5 +1,6 @@
 import json
 import datetime
+from django.db import transaction
 from django.db.models import Prefetch, Q
 from drf_yasg.utils import swagger_auto_schema
 
@@ -11,14 +12,18 @@ from apps.sales.partnercenter.models import List
 from apps.sales.partnercenter.services import ListFilterService
 from apps.sales.purchasing.models import PurchaseOrder
 from apps.sales.report.utils.inventory_log import ReportInvCommonFunc
+from apps.sales.report.utils.inventory_report_builder import ReportInvListBuilder
+from apps.sales.report.utils.report_export import ReportExportMixin
 from apps.sales.report.models import (
     ReportRevenue, ReportProduct, ReportCustomer, ReportPipeline, ReportCashflow,
-    ReportStock, ReportInventoryCost, ReportStockLog, ReportInventorySubFunction, BalanceInitialization, ReportLease
+    ReportStock, ReportInventoryCost, ReportInventorySubFunction, BalanceInitialization, ReportLease,
+    ReportInventoryRebuildJob, ReportExportJob
 )
 from apps.sales.report.serializers import (
     ReportStockListSerializer, ReportInventoryCostListSerializer, WarehouseAvailableProductListSerializer,
     BalanceInitializationListSerializer, BalanceInitializationDetailSerializer,
-    BalanceInitializationCreateSerializer, WarehouseAvailableProductDetailSerializer
+    BalanceInitializationCreateSerializer, WarehouseAvailableProductDetailSerializer,
+    ReportInventoryRebuildJobListSerializer, ReportInventoryRebuildJobCreateSerializer, ReportExportJobListSerializer
 )
 from apps.sales.report.serializers.advance_filter import AdvanceFilterListSerializer, AdvanceFilterCreateSerializer, \
     AdvanceFilterDetailSerializer, AdvanceFilterUpdateSerializer
@@ -33,12 +38,18 @@ from apps.sales.report.serializers.report_sales import (
     ReportPipelineListSerializer, ReportCashflowListSerializer, ReportGeneralListSerializer,
     ReportProductListSerializerForDashBoard, ReportLeaseListSerializer
 )
+from apps.sales.report.tasks import rebuild_inventory_report
 from apps.sales.revenue_plan.models import RevenuePlanGroupEmployee
-from apps.shared import mask_view, BaseListMixin, BaseCreateMixin, BaseUpdateMixin, ResponseController, HttpMsg
+from apps.shared.extends.pagination import AllResultsSetPagination
+from apps.shared import (
+    mask_view, BaseListMixin, BaseCreateMixin, BaseUpdateMixin, BaseRetrieveMixin, ResponseController, HttpMsg,
+    call_task_background
+)
 
 
 # REPORT REVENUE
-class ReportRevenueList(BaseListMixin):
+class ReportRevenueList(ReportExportMixin, BaseListMixin):
+    pagination_class = AllResultsSetPagination
     queryset = ReportRevenue.objects
     search_fields = ['sale_order__title']
     filterset_fields = {
@@ -54,6 +65,22 @@ class ReportRevenueList(BaseListMixin):
     }
     serializer_list = ReportRevenueListSerializer
     list_hidden_field = BaseListMixin.LIST_HIDDEN_FIELD_DEFAULT
+    export_file_name = 'report_revenue'
+    export_columns = [
+        ('Sale order code', 'sale_order.code'),
+        ('Sale order', 'sale_order.title'),
+        ('Lease order code', 'lease_order.code'),
+        ('Lease order', 'lease_order.title'),
+        ('Opportunity code', 'opportunity.code'),
+        ('Customer code', 'customer.code'),
+        ('Customer', 'customer.title'),
+        ('Employee code', 'employee_inherit.code'),
+        ('Employee', 'employee_inherit.full_name'),
+        ('Date approved', 'date_approved'),
+        ('Revenue', 'revenue'),
+        ('Gross profit', 'gross_profit'),
+        ('Net income', 'net_income'),
+    ]
 
     def get_queryset(self):
         query_set = super().get_queryset().select_related(
@@ -66,7 +93,7 @@ class ReportRevenueList(BaseListMixin):
         ).filter(group_inherit__is_delete=False, is_initial=False).filter(
             Q(sale_order__system_status=3) | Q(lease_order__system_status=3)
         )
-        filter_item_id = self.request.query_params.get('advance_filter_id')
+        filter_item_id = self.get_report_params().get('advance_filter_id')
 
         filter_item_obj = List.objects.filter(id=filter_item_id).first()
 
@@ -85,12 +112,12 @@ class ReportRevenueList(BaseListMixin):
         label_code='report', model_code='reportrevenue', perm_code='view',
     )
     def get(self, request, *args, **kwargs):
-        self.pagination_class.page_size = -1
         return self.list(request, *args, **kwargs)
 
 
 # REPORT PRODUCT
 class ReportProductList(BaseListMixin):
+    pagination_class = AllResultsSetPagination
     queryset = ReportProduct.objects
     search_fields = ['product__title']
     filterset_fields = {
@@ -124,11 +151,11 @@ class ReportProductList(BaseListMixin):
         label_code='report', model_code='reportproduct', perm_code='view',
     )
     def get(self, request, *args, **kwargs):
-        self.pagination_class.page_size = -1
         return self.list(request, *args, **kwargs)
 
 
 class ReportProductListForDashBoard(BaseListMixin):
+    pagination_class = AllResultsSetPagination
     queryset = ReportProduct.objects
     search_fields = ['product__title']
     filterset_fields = {
@@ -159,12 +186,12 @@ class ReportProductListForDashBoard(BaseListMixin):
         label_code='report', model_code='reportproduct', perm_code='view',
     )
     def get(self, request, *args, **kwargs):
-        self.pagination_class.page_size = -1
         return self.list(request, *args, **kwargs)
 
 
 # REPORT CUSTOMER
-class ReportCustomerList(BaseListMixin):
+class ReportCustomerList(ReportExportMixin, BaseListMixin):
+    pagination_class = AllResultsSetPagination
     queryset = ReportCustomer.objects
     search_fields = ['customer__name']
     filterset_fields = {
@@ -178,6 +205,18 @@ class ReportCustomerList(BaseListMixin):
     }
     serializer_list = ReportCustomerListSerializer
     list_hidden_field = BaseListMixin.LIST_HIDDEN_FIELD_DEFAULT
+    export_file_name = 'report_customer'
+    export_columns = [
+        ('Customer code', 'customer.code'),
+        ('Customer', 'customer.title'),
+        ('Industry', 'customer.industry.title'),
+        ('Employee code', 'employee_inherit.code'),
+        ('Employee', 'employee_inherit.full_name'),
+        ('Date approved', 'date_approved'),
+        ('Revenue', 'revenue'),
+        ('Gross profit', 'gross_profit'),
+        ('Net income', 'net_income'),
+    ]
 
     def get_queryset(self):
         return super().get_queryset().select_related(
@@ -197,12 +236,12 @@ class ReportCustomerList(BaseListMixin):
         label_code='report', model_code='reportcustomer', perm_code='view',
     )
     def get(self, request, *args, **kwargs):
-        self.pagination_class.page_size = -1
         return self.list(request, *args, **kwargs)
 
 
 # REPORT PIPELINE
 class ReportPipelineList(BaseListMixin):
+    pagination_class = AllResultsSetPagination
     queryset = ReportPipeline.objects
     search_fields = ['opportunity__title', 'opportunity__code', 'employee_inherit__search_content']
     filterset_fields = {
@@ -239,12 +278,11 @@ class ReportPipelineList(BaseListMixin):
         label_code='report', model_code='reportpipeline', perm_code='view',
     )
     def get(self, request, *args, **kwargs):
-        self.pagination_class.page_size = -1
         return self.list(request, *args, **kwargs)
 
 
 # REPORT CASHFLOW
-class ReportCashflowList(BaseListMixin):
+class ReportCashflowList(ReportExportMixin, BaseListMixin):
     queryset = ReportCashflow.objects
     search_fields = ['sale_order__title']
     filterset_fields = {
@@ -258,6 +296,18 @@ class ReportCashflowList(BaseListMixin):
     }
     serializer_list = ReportCashflowListSerializer
     list_hidden_field = BaseListMixin.LIST_HIDDEN_FIELD_DEFAULT
+    export_file_name = 'report_cashflow'
+    export_columns = [
+        ('Cashflow type', 'cashflow_type'),
+        ('Due date', 'due_date'),
+        ('System status', 'system_status'),
+        ('Estimate sale', 'value_estimate_sale'),
+        ('Actual sale', 'value_actual_sale'),
+        ('Variance sale', 'value_variance_sale'),
+        ('Estimate cost', 'value_estimate_cost'),
+        ('Actual cost', 'value_actual_cost'),
+        ('Variance cost', 'value_variance_cost'),
+    ]
 
     def get_queryset(self):
         return super().get_queryset().select_related(
@@ -278,37 +328,53 @@ class ReportCashflowList(BaseListMixin):
 
 
 # REPORT INVENTORY
-class ReportInventoryCostList(BaseListMixin):
+class ReportInventoryCostList(ReportExportMixin, BaseListMixin):
+    pagination_class = AllResultsSetPagination
     queryset = ReportInventoryCost.objects
     serializer_list = ReportInventoryCostListSerializer
     list_hidden_field = BaseListMixin.LIST_HIDDEN_FIELD_DEFAULT
+    export_file_name = 'report_inventory_cost'
+    export_columns = [
+        ('Warehouse code', 'warehouse.code'),
+        ('Warehouse', 'warehouse.title'),
+        ('Product code', 'product.code'),
+        ('Product', 'product.title'),
+        ('UoM', 'product.uom.title'),
+        ('Lot number', 'product.lot_number'),
+        ('Serial number', 'product.serial_number'),
+        ('Order code', 'product.order_code'),
+        ('Opening quantity', 'opening_balance_quantity'),
+        ('Opening value', 'opening_balance_value'),
+        ('In quantity', 'sum_in_quantity'),
+        ('In value', 'sum_in_value'),
+        ('Out quantity', 'sum_out_quantity'),
+        ('Out value', 'sum_out_value'),
+        ('Ending quantity', 'ending_balance_quantity'),
+        ('Ending value', 'ending_balance_value'),
+    ]
 
     def get_queryset(self):
         filter_fields = {}
+        params = self.get_report_params()
         try:
-            period_mapped = Periods.objects.filter(id=self.request.query_params['period_mapped']).first()
-            sub_period_order = self.request.query_params['sub_period_order']
-            if 'sale_order' in self.request.query_params:
-                filter_fields['sale_order_id'] = self.request.query_params['sale_order']
+            period_mapped = Periods.objects.filter(id=params['period_mapped']).first()
+            sub_period_order = params['sub_period_order']
+            if 'sale_order' in params:
+                filter_fields['sale_order_id'] = params['sale_order']
 
+            tenant_obj, company_obj, employee_obj = self.get_report_scope()
             for order in range(1, int(sub_period_order) + 1):
                 run_state = ReportInvCommonFunc.check_and_push_to_next_sub(
-                    self.request.user.tenant_current,
-                    self.request.user.company_current,
-                    self.request.user.employee_current,
-                    period_mapped,
-                    order
+                    tenant_obj, company_obj, employee_obj, period_mapped, order
                 )
                 if run_state is False:
                     break
 
-            if self.request.query_params['product_id_list'] != '':
-                prd_id_list = self.request.query_params['product_id_list'].split(',')
+            if params['product_id_list'] != '':
+                prd_id_list = params['product_id_list'].split(',')
                 return_query = super().get_queryset().select_related(
-                    "product__inventory_uom", "warehouse", "period_mapped"
-                ).prefetch_related(
-                    'product__report_inventory_cost_product',
-                    'product__report_stock_log_product'
+                    "product__inventory_uom", "warehouse", "period_mapped",
+                    "lot_mapped", "sale_order", "lease_order", "service_order"
                 ).filter(
                     period_mapped=period_mapped,
                     sub_period_order=sub_period_order,
@@ -325,10 +391,8 @@ class ReportInventoryCostList(BaseListMixin):
                 )
 
             return_query = super().get_queryset().select_related(
-                "product__inventory_uom", "warehouse", "period_mapped"
-            ).prefetch_related(
-                'product__report_inventory_cost_product',
-                'product__report_stock_log_product'
+                "product__inventory_uom", "warehouse", "period_mapped",
+                "lot_mapped", "sale_order", "lease_order", "service_order"
             ).filter(
                 period_mapped=period_mapped,
                 sub_period_order=sub_period_order,
@@ -345,6 +409,43 @@ class ReportInventoryCostList(BaseListMixin):
         except KeyError:
             return super().get_queryset().none()
 
+    def paginate_queryset(self, queryset):
+        # chỉ load log/cost cho các dòng của trang hiện tại (pageSize = -1: lấy tất cả)
+        page = super().paginate_queryset(queryset)
+        self.ser_context['report_builder'] = ReportInvListBuilder(
+            self.ser_context.get('definition_inventory_valuation'),
+            self.ser_context.get('cost_cfg'),
+            self.ser_context.get('date_range', [])
+        ).prepare_cost_list(page if page is not None else queryset)
+        return page
+
+    def setup_report_context(self):
+        params = self.get_report_params()
+        _tenant_obj, company_obj, _employee_obj = self.get_report_scope()
+        self.ser_context = {
+            'definition_inventory_valuation': company_obj.company_config.definition_inventory_valuation,
+            'cost_cfg': ReportInvCommonFunc.get_cost_config(company_obj),
+        }
+        if 'date_range' in params:
+            self.ser_context['date_range'] = [int(num) for num in params['date_range'].split('-')]
+        return self.ser_context
+
+    def prepare_export_chunk(self, objs):
+        self.ser_context['report_builder'] = ReportInvListBuilder(
+            self.ser_context.get('definition_inventory_valuation'),
+            self.ser_context.get('cost_cfg'),
+            self.ser_context.get('date_range', [])
+        ).prepare_cost_list(objs)
+        return objs
+
+    def get_export_rows(self, item):
+        # theo dự án: 1 dòng / kho vật lí
+        if isinstance(item['stock_activities'], list):
+            for wh_sub, activity in zip(item['warehouse_sub_list'], item['stock_activities']):
+                yield {**item, **activity, 'warehouse': wh_sub}
+        else:
+            yield {**item, **item['stock_activities']}
+
     @swagger_auto_schema(
         operation_summary="Report inventory List",
         operation_description="Get report inventory List",
@@ -354,42 +455,51 @@ class ReportInventoryCostList(BaseListMixin):
         label_code='report', model_code='reportinventory', perm_code='view',
     )
     def get(self, request, *args, **kwargs):
-        self.pagination_class.page_size = -1
-        company_config = self.request.user.company_current.company_config
-        if 'date_range' in request.query_params:
-            self.ser_context = {
-                'date_range': [int(num) for num in request.query_params['date_range'].split('-')]
-            }
-        self.ser_context['definition_inventory_valuation'] = company_config.definition_inventory_valuation
-        self.ser_context['cost_cfg'] = ReportInvCommonFunc.get_cost_config(self.request.user.company_current)
+        self.setup_report_context()
         return self.list(request, *args, **kwargs)
 
 
-class ReportStockList(BaseListMixin):
+class ReportStockList(ReportExportMixin, BaseListMixin):
+    pagination_class = AllResultsSetPagination
     queryset = ReportStock.objects
     serializer_list = ReportStockListSerializer
     list_hidden_field = BaseListMixin.LIST_HIDDEN_FIELD_DEFAULT
+    export_file_name = 'report_inventory_stock'
+    export_columns = [
+        ('Product code', 'product.code'),
+        ('Product', 'product.title'),
+        ('UoM', 'product.uom.title'),
+        ('Lot number', 'product.lot_number'),
+        ('Serial number', 'product.serial_number'),
+        ('Order code', 'product.order_code'),
+        ('Warehouse code', 'warehouse_code'),
+        ('Warehouse', 'warehouse_title'),
+        ('Opening quantity', 'opening_balance_quantity'),
+        ('Opening cost', 'opening_balance_cost'),
+        ('Opening value', 'opening_balance_value'),
+        ('Ending quantity', 'ending_balance_quantity'),
+        ('Ending cost', 'ending_balance_cost'),
+        ('Ending value', 'ending_balance_value'),
+    ]
 
     def get_queryset(self):
+        params = self.get_report_params()
         try:
-            period_mapped = Periods.objects.filter(id=self.request.query_params['period_mapped']).first()
-            sub_period_order = int(self.request.query_params['sub_period_order'])
+            period_mapped = Periods.objects.filter(id=params['period_mapped']).first()
+            sub_period_order = int(params['sub_period_order'])
 
-            tenant_obj = self.request.user.tenant_current
-            company_obj = self.request.user.company_current
-            div = self.request.user.company_current.company_config.definition_inventory_valuation
-            if 'is_calculate' in self.request.query_params and div == 1:
+            tenant_obj, company_obj, _employee_obj = self.get_report_scope()
+            div = company_obj.company_config.definition_inventory_valuation
+            if 'is_calculate' in params and div == 1:
                 ReportInventorySubFunction.calculate_cost_dict_for_periodic(
                     period_mapped, sub_period_order, tenant_obj, company_obj
                 )
 
-            if self.request.query_params['product_id_list'] != '':
-                prd_id_list = self.request.query_params['product_id_list'].split(',')
+            if params['product_id_list'] != '':
+                prd_id_list = params['product_id_list'].split(',')
                 return super().get_queryset().select_related(
-                    "product", "period_mapped"
-                ).prefetch_related(
-                    'report_stock_log',
-                    'product__report_inventory_cost_product__period_mapped',
+                    "product__inventory_uom", "period_mapped",
+                    "lot_mapped", "sale_order", "lease_order", "service_order"
                 ).filter(
                     period_mapped=period_mapped, sub_period_order=sub_period_order, product_id__in=prd_id_list
                 ).order_by(
@@ -400,10 +510,7 @@ class ReportStockList(BaseListMixin):
                     'serial_number'
                 )
             return super().get_queryset().select_related(
-                "product", "period_mapped"
-            ).prefetch_related(
-                'report_stock_log',
-                'product__report_inventory_cost_product__period_mapped',
+                "product__inventory_uom", "period_mapped", "lot_mapped", "sale_order", "lease_order", "service_order"
             ).filter(
                 period_mapped=period_mapped, sub_period_order=sub_period_order
             ).order_by(
@@ -416,6 +523,36 @@ class ReportStockList(BaseListMixin):
         except KeyError:
             return super().get_queryset().none()
 
+    def paginate_queryset(self, queryset):
+        # chỉ load log/cost cho các dòng của trang hiện tại (pageSize = -1: lấy tất cả)
+        page = super().paginate_queryset(queryset)
+        self.ser_context['report_builder'] = ReportInvListBuilder(
+            self.ser_context.get('definition_inventory_valuation'), self.ser_context.get('cost_cfg')
+        ).prepare_stock_list(page if page is not None else queryset)
+        return page
+
+    def setup_report_context(self):
+        tenant_obj, company_obj, _employee_obj = self.get_report_scope()
+        self.ser_context = {
+            'wh_list': set(WareHouse.objects.filter(
+                tenant_id=tenant_obj.id, company_id=company_obj.id
+            ).values_list('id', 'code', 'title')),
+            'definition_inventory_valuation': company_obj.company_config.definition_inventory_valuation,
+            'cost_cfg': ReportInvCommonFunc.get_cost_config(company_obj),
+        }
+        return self.ser_context
+
+    def prepare_export_chunk(self, objs):
+        self.ser_context['report_builder'] = ReportInvListBuilder(
+            self.ser_context.get('definition_inventory_valuation'), self.ser_context.get('cost_cfg')
+        ).prepare_stock_list(objs)
+        return objs
+
+    def get_export_rows(self, item):
+        # 1 dòng / kho
+        for activity in item['stock_activities']:
+            yield {**item, **activity}
+
     @swagger_auto_schema(
         operation_summary="Report inventory Detail",
         operation_description="Get report inventory Detail",
@@ -425,30 +562,7 @@ class ReportStockList(BaseListMixin):
         label_code='report', model_code='reportinventory', perm_code='view',
     )
     def get(self, request, *args, **kwargs):
-        self.pagination_class.page_size = -1
-        tenant_id = self.request.user.tenant_current_id
-        company_id = self.request.user.company_current_id
-        company_config = self.request.user.company_current.company_config
-        self.ser_context = {
-            'wh_list': set(WareHouse.objects.filter(
-                tenant_id=tenant_id, company_id=company_id
-            ).values_list('id', 'code', 'title')),
-        }
-        if all([
-            'period_mapped' in self.request.query_params,
-            'sub_period_order' in self.request.query_params
-        ]):
-            self.ser_context['all_logs_by_month'] = ReportStockLog.objects.filter(
-                tenant_id=tenant_id, company_id=company_id,
-                report_stock__period_mapped_id=self.request.query_params['period_mapped'],
-                report_stock__sub_period_order=self.request.query_params['sub_period_order']
-            ).select_related('warehouse')
-        else:
-            self.ser_context['all_logs_by_month'] = ReportStockLog.objects.filter(
-                tenant_id=tenant_id, company_id=company_id,
-            ).select_related('warehouse')
-        self.ser_context['definition_inventory_valuation'] = company_config.definition_inventory_valuation
-        self.ser_context['cost_cfg'] = ReportInvCommonFunc.get_cost_config(self.request.user.company_current)
+        self.setup_report_context()
         return self.list(request, *args, **kwargs)
 
 
@@ -490,6 +604,97 @@ class BalanceInitializationList(BaseListMixin, BaseCreateMixin):
         return self.create(request, *args, **kwargs)
 
 
+class ReportInventoryRebuildJobList(BaseListMixin, BaseCreateMixin):
+    queryset = ReportInventoryRebuildJob.objects
+    serializer_list = ReportInventoryRebuildJobListSerializer
+    serializer_create = ReportInventoryRebuildJobCreateSerializer
+    serializer_detail = ReportInventoryRebuildJobListSerializer
+    list_hidden_field = BaseListMixin.LIST_HIDDEN_FIELD_DEFAULT
+    create_hidden_field = BaseCreateMixin.CREATE_MASTER_DATA_FIELD_HIDDEN_DEFAULT
+
+    def perform_create(self, serializer, extras: dict):
+        job = super().perform_create(serializer, extras)
+        # chạy lại sổ kho ở background, FE gọi lại list/detail để theo dõi tiến trình
+        # task chỉ nhận job ở trạng thái chờ (state=0) -> đợi transaction tạo job commit xong mới đẩy task
+        transaction.on_commit(
+            lambda: call_task_background(my_task=rebuild_inventory_report, **{'job_id': str(job.id)})
+        )
+        return job
+
+    @swagger_auto_schema(
+        operation_summary="Inventory report rebuild job list",
+        operation_description="Inventory report rebuild job list",
+    )
+    @mask_view(
+        login_require=True, auth_require=True,
+        allow_admin_tenant=True, allow_admin_company=True,
+    )
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Create inventory report rebuild job",
+        operation_description="Rebuild stock logs, costs and period balances from approved documents",
+        request_body=ReportInventoryRebuildJobCreateSerializer,
+    )
+    @mask_view(
+        login_require=True, auth_require=True,
+        allow_admin_tenant=True, allow_admin_company=True,
+    )
+    def post(self, request, *args, **kwargs):
+        self.ser_context['company_current'] = self.request.user.company_current
+        return self.create(request, *args, **kwargs)
+
+
+class ReportInventoryRebuildJobDetail(BaseRetrieveMixin):
+    queryset = ReportInventoryRebuildJob.objects
+    serializer_detail = ReportInventoryRebuildJobListSerializer
+    retrieve_hidden_field = BaseRetrieveMixin.RETRIEVE_MASTER_DATA_FIELD_HIDDEN_DEFAULT
+
+    @swagger_auto_schema(operation_summary='Inventory report rebuild job detail')
+    @mask_view(
+        login_require=True, auth_require=True,
+        allow_admin_tenant=True, allow_admin_company=True,
+    )
+    def get(self, request, *args, pk, **kwargs):
+        return self.retrieve(request, *args, pk, **kwargs)
+
+
+class ReportExportJobList(BaseListMixin):
+    queryset = ReportExportJob.objects
+    serializer_list = ReportExportJobListSerializer
+    list_hidden_field = BaseListMixin.LIST_HIDDEN_FIELD_DEFAULT
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('file').filter(
+            employee_created_id=self.request.user.employee_current_id
+        )
+
+    @swagger_auto_schema(
+        operation_summary="Report export job list",
+        operation_description="Background report exports of current employee",
+    )
+    @mask_view(login_require=True, auth_require=False, employee_require=True)
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class ReportExportJobDetail(BaseRetrieveMixin):
+    queryset = ReportExportJob.objects
+    serializer_detail = ReportExportJobListSerializer
+    retrieve_hidden_field = BaseRetrieveMixin.RETRIEVE_MASTER_DATA_FIELD_HIDDEN_DEFAULT
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('file').filter(
+            employee_created_id=self.request.user.employee_current_id
+        )
+
+    @swagger_auto_schema(operation_summary='Report export job detail')
+    @mask_view(login_require=True, auth_require=False, employee_require=True)
+    def get(self, request, *args, pk, **kwargs):
+        return self.retrieve(request, *args, pk, **kwargs)
+
+
 class WarehouseAvailableProductList(BaseListMixin):
     queryset = ProductWareHouse.objects
     serializer_list = WarehouseAvailableProductListSerializer
@@ -609,7 +814,8 @@ class ReportGeneralList(BaseListMixin):
 
 
 # REPORT PURCHASING
-class PurchaseOrderListReport(BaseListMixin):
+class PurchaseOrderListReport(ReportExportMixin, BaseListMixin):
+    pagination_class = AllResultsSetPagination
     queryset = PurchaseOrder.objects
     search_fields = ['title', 'code']
     filterset_fields = {
@@ -618,13 +824,40 @@ class PurchaseOrderListReport(BaseListMixin):
     }
     serializer_list = PurchaseOrderListReportSerializer
     list_hidden_field = BaseListMixin.LIST_HIDDEN_FIELD_DEFAULT
+    export_file_name = 'report_purchasing'
+    export_columns = [
+        ('Code', 'code'),
+        ('Title', 'title'),
+        ('Supplier code', 'supplier.code'),
+        ('Supplier', 'supplier.name'),
+        ('Employee', 'employee_inherit.fullname'),
+        ('Delivered date', 'delivered_date'),
+        ('Receipt status', 'receipt_status'),
+        ('Product code', 'product.code'),
+        ('Product', 'product.title'),
+        ('UoM', 'uom.title'),
+        ('Order quantity', 'order_quantity'),
+        ('Received quantity', 'received_quantity'),
+        ('Remaining quantity', 'remaining_quantity'),
+        ('Order value', 'order_value'),
+        ('Received value', 'received_value'),
+        ('Remaining value', 'remaining_value'),
+    ]
+
+    def get_export_rows(self, item):
+        # 1 dòng / sản phẩm của đơn mua
+        if not item['product_data']:
+            yield item
+        for product_item in item['product_data']:
+            yield {**item, **product_item}
 
     def get_queryset(self):
         try:
-            period_mapped_id = self.request.query_params.get('period_mapped')
-            sub_period_order = self.request.query_params.get('sub_period_order')
-            start_day = int(self.request.query_params.get('start_day', 1))
-            end_day = int(self.request.query_params.get('end_day', 1))
+            params = self.get_report_params()
+            period_mapped_id = params.get('period_mapped')
+            sub_period_order = params.get('sub_period_order')
+            start_day = int(params.get('start_day', 1))
+            end_day = int(params.get('end_day', 1))
             period_mapped = Periods.objects.filter(id=period_mapped_id).first()
             if period_mapped and sub_period_order and start_day and end_day:
                 sub_period_order = int(sub_period_order) + period_mapped.space_month
@@ -660,12 +893,12 @@ class PurchaseOrderListReport(BaseListMixin):
         label_code='report', model_code='reportpurchasing', perm_code='view',
     )
     def get(self, request, *args, **kwargs):
-        self.pagination_class.page_size = -1
         return self.list(request, *args, **kwargs)
 
 
 # REPORT BUDGET
 class BudgetReportCompanyList(BaseListMixin):
+    pagination_class = AllResultsSetPagination
     queryset = BudgetPlanCompanyExpense.objects
     filterset_fields = {
         'budget_plan__period_mapped_id': ['exact'],
@@ -684,11 +917,11 @@ class BudgetReportCompanyList(BaseListMixin):
         label_code='report', model_code='reportbudget', perm_code='view',
     )
     def get(self, request, *args, **kwargs):
-        self.pagination_class.page_size = -1
         return self.list(request, *args, **kwargs)
 
 
 class BudgetReportGroupList(BaseListMixin):
+    pagination_class = AllResultsSetPagination
     queryset = BudgetPlanGroupExpense.objects
     filterset_fields = {
         'budget_plan__period_mapped_id': ['exact'],
@@ -708,7 +941,6 @@ class BudgetReportGroupList(BaseListMixin):
         label_code='report', model_code='reportbudget', perm_code='view',
     )
     def get(self, request, *args, **kwargs):
-        self.pagination_class.page_size = -1
         return self.list(request, *args, **kwargs)
 
 
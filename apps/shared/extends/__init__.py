@@ -3,6 +3,7 @@ from .controllers import ResponseController
 from .tasks import call_task_background, check_active_celery_worker
 from .mixins import BaseMixin, BaseListMixin, BaseCreateMixin, BaseRetrieveMixin, BaseUpdateMixin, BaseDestroyMixin
 from .mask_view import mask_view, EmployeeAttribute
+from .permit_snapshot import PermitSnapshot
 from .models import (
     SimpleAbstractModel, DataAbstractModel, MasterDataAbstractModel, BastionFieldAbstractModel,
     DisperseModel,
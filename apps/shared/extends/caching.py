@@ -1,4 +1,5 @@
 import hashlib
+import time
 
 from django.conf import settings
 from django.utils.cache import caches
@@ -6,7 +7,7 @@ from django.utils.cache import caches
 from misapi.celery import app
 from .utils import StringHandler
 
-__all__ = ['Caching', 'CacheManagement', 'make_key_global']
+__all__ = ['Caching', 'CacheManagement', 'make_key_global', 'LIST_CACHE_TABLES']
 
 TABLE_REF = {  # clean cache reference when system clean cache of model. Bad performance but real data.
     'account_user': (
@@ -32,6 +33,18 @@ TABLE_REF = {  # clean cache reference when system clean cache of model. Bad per
     ),
 }
 
+LIST_CACHE_TABLES = {  # bảng của các view list bật cache (get_list_cache_tables) => nối signal tăng generation
+    'account_user', 'company_companyuseremployee',  # UserList, UserOfTenantList
+    'hr_employee',  # EmployeeList (minimal), EmployeeTenantList (minimal)
+    'hr_grouplevel',  # GroupLevelList
+    'base_country', 'base_city', 'base_district', 'base_baseitemunit', 'base_indicatorparam',  # core/base list
+    'saledata_account', 'saledata_accountaccounttypes', 'saledata_accountemployee',  # AccountDDList
+    'saledata_warehouse',  # WareHouseList
+    'saledata_product', 'saledata_productwarehouse', 'saledata_productproducttype', 'saledata_producttype',  # ProductList
+    'saledata_productattribute', 'saledata_productcategory', 'saledata_unitofmeasuregroup', 'saledata_unitofmeasure',
+    'saledata_tax', 'accountingsettings_assetcategory', 'accountingsettings_chartofaccounts',
+}
+
 
 def make_key_global(key, key_prefix, version):
     return ":".join([key_prefix, str(version), key])
@@ -43,83 +56,150 @@ def background_destroy_cache_many_key(tbl_name):
 
 
 class CacheManagement:
-    KEY_SAVE_ALL = f'{settings.CACHE_KEY_PREFIX}.all_keys'
+    """
+    Quản lý cache theo generation (namespace), không lưu danh sách toàn bộ key:
+        - global: tăng => toàn bộ key cache cũ hết hiệu lực (clean cache server)
+        - table: tăng => key của bảng (+ bảng trong TABLE_REF) hết hiệu lực ở mọi company
+        - scope (table, tenant, company): tăng => chỉ key list (get_table_generations) của company đó hết hiệu lực,
+          kèm generation 'company' của bảng - generation này được ghép vào mọi key không theo company
+          (key_cache_table, list không lọc company) => các key đó hết hiệu lực khi bất kỳ company nào ghi
+    Generation được ghép vào key khi get/set => xóa cache là O(1), key cũ tự hết hạn theo timeout / LRU.
+    Đổi lại mỗi get/set tốn thêm 1 get_many lấy generation (+ add khi generation chưa có / bị evict).
+    """
+    KEY_GLOBAL_GENERATION = 'generation'
+    KEY_TABLE_GENERATION = 'generation.table.{table_name}'
+    KEY_SCOPE_GENERATION = 'generation.table.{table_name}.{tenant_id}.{company_id}'
+    KEY_ANY_SCOPE_GENERATION = 'generation.table.{table_name}.company'
 
     def __init__(self, server=None):
         self.sv_cache = caches[server] if server else caches['default']
 
-    @property
-    def all_keys(self) -> list[str]:
-        """
-        Get all keys in storage caches.
-        Returns:
-
-        """
-        data = self.sv_cache.get(self.KEY_SAVE_ALL)
-        if data and isinstance(data, list):
-            return data
-        return []
-
-    def clean(self):
-        """
-        Delete all value of key in all_keys
-        Returns:
+    @classmethod
+    def key_global_generation(cls) -> str:
+        return Caching.parse_key(cls.KEY_GLOBAL_GENERATION)
 
-        """
-        return self.sv_cache.delete_many(self.all_keys)
+    @classmethod
+    def key_table_generation(cls, table_name) -> str:
+        return Caching.parse_key(cls.KEY_TABLE_GENERATION.format(table_name=str(table_name).lower()))
 
-    def add_to_all(self, keys: list[str]):
-        """
-        Add keys (list key) to field all_keys (management keys)
-        Args:
-            keys:
+    @classmethod
+    def key_scope_generation(cls, table_name, tenant_id=None, company_id=None) -> str:
+        if not company_id:
+            return Caching.parse_key(cls.KEY_ANY_SCOPE_GENERATION.format(table_name=str(table_name).lower()))
+        return Caching.parse_key(
+            cls.KEY_SCOPE_GENERATION.format(
+                table_name=str(table_name).lower(), tenant_id=str(tenant_id or ''), company_id=str(company_id),
+            )
+        )
 
-        Returns:
+    def init_generation(self, key) -> int:
+        # khởi tạo theo thời gian (µs, nhanh hơn tốc độ bump): key generation bị evict thì generation mới vẫn lớn hơn
+        self.sv_cache.add(key, time.time_ns() // 1000, None)
+        return self.sv_cache.get(key)
 
+    def get_generations(self, keys: list[str]) -> dict[str, int]:
         """
-        all_keys = self.sv_cache.get(self.KEY_SAVE_ALL)
-        if all_keys and isinstance(all_keys, list):
-            all_keys += keys
-        else:
-            all_keys = keys
-        self.sv_cache.set(self.KEY_SAVE_ALL, list(set(all_keys)), None)
-        return True
-
-    def remove(self, key):
+        Get generation of keys (1 call to cache storage). Generation is None when cache is dummy.
         """
-        Remove key from field all_keys (management keys)
-        Args:
-            key:
+        data = self.sv_cache.get_many(keys)
+        return {
+            key: data[key] if data.get(key, None) is not None else self.init_generation(key)
+            for key in keys
+        }
 
-        Returns:
+    def bump(self, key) -> int:
+        try:
+            return self.sv_cache.incr(key)
+        except ValueError:
+            return self.init_generation(key)
 
+    def clean(self):
         """
-        all_keys = self.sv_cache.get(self.KEY_SAVE_ALL)
-        if all_keys:
-            all_keys = list(set(all_keys))
-            if key in all_keys:
-                all_keys.remove(str(key))
-                self.sv_cache.set(self.KEY_SAVE_ALL, all_keys, None)
-        return True
-
-    def remove_from_all(self, keys: list[str]):
-        """
-        Remove keys (list key) to field all_keys (management keys)
-        Args:
-            keys:
-
-        Returns:
-
+        Make all keys in storage caches expired (increase global generation)
         """
-        for key in keys:
-            self.remove(key)
-        return True
+        return self.bump(self.key_global_generation())
 
 
 class Caching:
     def __init__(self, server=None):
         self.server = server
         self.sv_cache = caches[server] if server else caches['default']
+        self.management = CacheManagement(server)
+
+    @classmethod
+    def key_table_generation(cls, table_name) -> str:
+        return CacheManagement.key_table_generation(table_name)
+
+    @classmethod
+    def key_scope_generation(cls, table_name, tenant_id=None, company_id=None) -> str:
+        return CacheManagement.key_scope_generation(table_name, tenant_id=tenant_id, company_id=company_id)
+
+    def get_table_generations(self, table_names: list[str], tenant_id=None, company_id=None) -> dict[str, tuple]:
+        """
+        Get generation of tables + generation of scope (tenant, company) of tables (1 call to cache storage).
+        Without company_id, scope generation is the one increased by every company of table.
+        Generation is None when cache is dummy.
+        Returns:
+            {'{table_name}': (table_generation, scope_generation)}
+        """
+        keys = {
+            str(x).lower(): (
+                self.key_table_generation(x), self.key_scope_generation(x, tenant_id=tenant_id, company_id=company_id)
+            ) for x in table_names
+        }
+        data = self.management.get_generations([key for pair in keys.values() for key in pair])
+        return {table_name: (data[key_table], data[key_scope]) for table_name, (key_table, key_scope) in keys.items()}
+
+    def bump_table_generation(self, table_name, tenant_id=None, company_id=None) -> list[str]:
+        """
+        Increase generation of table + tables in TABLE_REF => all keys built on old generation are expired.
+        With company_id: only increase generation of scope (tenant, company) + 'company' generation of table
+        => list keys of other companies are kept, keys without company (key_cache_table) are still expired.
+        """
+        table_name = str(table_name).lower()
+        table_list = [table_name, *TABLE_REF.get(table_name, ())]
+        for tbl in table_list:
+            if company_id:
+                self.management.bump(self.key_scope_generation(tbl, tenant_id=tenant_id, company_id=company_id))
+                self.management.bump(self.key_scope_generation(tbl))
+            else:
+                self.management.bump(self.key_table_generation(tbl))
+        return table_list
+
+    @staticmethod
+    def split_key(key: str) -> str:
+        """
+        Get table_name from key (rule of key_cache_table: {table_name}-{hashed}), '' when key is not of table
+        """
+        key = Caching.unparse_key(key)
+        return key.split('-', 1)[0].lower() if '-' in key else ''
+
+    def generation_keys(self, keys: list[str]) -> dict[str, str]:
+        """
+        Fold generations (global + table + 'company' generation of table) into keys.
+        1 call to cache storage for all keys.
+        Key not of company => expired by every write to table, with or without company (bump_table_generation).
+        Returns:
+            {'{key}': '{key_parsed}'}
+        """
+        key_tables = {key: self.split_key(key) for key in keys}
+        gen_keys = {CacheManagement.key_global_generation()}
+        for table_name in set(key_tables.values()):
+            if table_name:
+                gen_keys.update([self.key_table_generation(table_name), self.key_scope_generation(table_name)])
+        generations = self.management.get_generations(list(gen_keys))
+
+        result = {}
+        for key, table_name in key_tables.items():
+            parts = [str(generations[CacheManagement.key_global_generation()])]
+            if table_name:
+                parts.append(str(generations[self.key_table_generation(table_name)]))
+                parts.append(str(generations[self.key_scope_generation(table_name)]))
+            result[key] = self.parse_key(f'g{"_".join(parts)}.{self.unparse_key(key)}')
+        return result
+
+    def generation_key(self, key: str) -> str:
+        return self.generation_keys([key])[key]
 
     @staticmethod
     def key_cache_table(table_name, string_key, hash_key=True, replace_pk_to_id=True):
@@ -155,6 +235,11 @@ class Caching:
             return key
         return f'{settings.CACHE_KEY_PREFIX}.{key}'
 
+    @staticmethod
+    def unparse_key(key: str) -> str:
+        prefix = f'{settings.CACHE_KEY_PREFIX}.'
+        return key[len(prefix):] if key.startswith(prefix) else key
+
     def set(self, key, value, timeout=None) -> str:
         """
         Set key=value to cache storage.
@@ -168,9 +253,8 @@ class Caching:
         """
         if not timeout:
             timeout = 60 * 60  # timeout = 1 hours
-        key_parsed = self.parse_key(key)
+        key_parsed = self.generation_key(key)
         self.sv_cache.set(key_parsed, value, timeout)
-        CacheManagement(self.server).add_to_all([key_parsed])
         return key_parsed
 
     def get(self, key: str) -> any:
@@ -182,8 +266,7 @@ class Caching:
         Returns:
 
         """
-        key_parsed = self.parse_key(key)
-        return self.sv_cache.get(key_parsed)
+        return self.sv_cache.get(self.generation_key(key))
 
     def get_many(self, keys: list[str]) -> dict:
         """
@@ -194,7 +277,9 @@ class Caching:
         Returns:
 
         """
-        return self.sv_cache.get_many([self.parse_key(k) for k in keys])
+        keys_parsed = self.generation_keys(keys)
+        data = self.sv_cache.get_many(list(keys_parsed.values()))
+        return {self.parse_key(key): data[key_parsed] for key, key_parsed in keys_parsed.items() if key_parsed in data}
 
     def delete(self, key: str) -> str:
         """
@@ -205,9 +290,8 @@ class Caching:
         Returns:
 
         """
-        key_parsed = self.parse_key(key)
+        key_parsed = self.generation_key(key)
         self.sv_cache.delete(key_parsed)
-        CacheManagement(self.server).remove_from_all([key_parsed])
         return key_parsed
 
     def delete_many(self, keys: list[str]) -> list[str]:
@@ -219,57 +303,16 @@ class Caching:
         Returns:
 
         """
-        keys_parsed = [self.parse_key(k) for k in keys]
+        keys_parsed = list(self.generation_keys(keys).values())
         self.sv_cache.delete_many(keys_parsed)
-        CacheManagement(self.server).remove_from_all(keys_parsed)
         return keys_parsed
 
-    @classmethod
-    def __key_cache_relate(cls, all_keys, table_name_parsed, table_ref_parsed_list):
-        """
-        Append all keys need destroy include key of main table and key of reference table.
-        Args:
-            all_keys:
-            table_name_parsed:
-            table_ref_parsed_list:
-
-        Returns:
-
-        """
-        key_mapped = []
-        for key in all_keys:
-            if key.startswith(table_name_parsed):
-                key_mapped.append(key)
-            else:
-                for item in table_ref_parsed_list:
-                    if key.startswith(item):
-                        key_mapped.append(key)
-        return key_mapped
-
-    @classmethod
-    def __key_cache_relate_many(cls, all_keys, table_name_parsed_list):
-        """
-        Append all keys need destroy include key of main table and key of reference table.
-        """
-        key_mapped = []
-        for key in all_keys:
-            for item in table_name_parsed_list:
-                if key.startswith(item):
-                    key_mapped.append(key)
-        return key_mapped
-
     def clean_by_prefix(self, table_name):
         """
-        Clean many keys from table name... Make sure cache don't have fake data.
+        Clean all keys of table (+ tables in TABLE_REF)... Make sure cache don't have fake data.
         """
         try:
-            all_keys = CacheManagement(self.server).all_keys
-            key_mapped = self.__key_cache_relate(
-                all_keys=all_keys if all_keys and isinstance(all_keys, list) else [],
-                table_name_parsed=self.parse_key(table_name),
-                table_ref_parsed_list=[self.parse_key(x) for x in TABLE_REF.get(table_name, [])],
-            )
-            self.delete_many(key_mapped)
+            self.bump_table_generation(table_name=table_name)
             return True
         except Exception as _err:
             print(_err)
@@ -277,7 +320,7 @@ class Caching:
 
     def clean_by_prefix_many(self, table_name_list: list[str]):
         """
-        Clean many keys from table name... Make sure cache don't have fake data.
+        Clean all keys of many tables (+ tables in TABLE_REF)... Make sure cache don't have fake data.
         Args:
             table_name_list:
 
@@ -285,19 +328,12 @@ class Caching:
 
         """
         try:
-            table_name_list = [x.lower() for x in table_name_list]
-            all_keys = CacheManagement(self.server).all_keys
-            table_mapped = []
+            table_mapped = set()
             for table_name in table_name_list:
-                for rel_tbn in TABLE_REF.get(table_name, []):
-                    table_mapped.append(rel_tbn)
-
-            table_mapped = list(set(table_mapped))
-            key_mapped = self.__key_cache_relate_many(
-                all_keys=all_keys if all_keys and isinstance(all_keys, list) else [],
-                table_name_parsed_list=[self.parse_key(x) for x in table_mapped],
-            )
-            self.delete_many(key_mapped)
+                table_name = table_name.lower()
+                table_mapped.update([table_name, *TABLE_REF.get(table_name, ())])
+            for table_name in table_mapped:
+                self.management.bump(self.key_table_generation(table_name))
             return True
         except Exception as _err:
             print(_err)
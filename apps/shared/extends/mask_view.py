@@ -20,6 +20,7 @@ from rest_framework.response import Response
 from .controllers import ResponseController
 from .utils import TypeCheck, ListHandler
 from .models import DisperseModel
+from .permit_snapshot import PermitSnapshot, ApplicationSnapshot
 from .exceptions import Empty200, handle_exception_all_view
 from ..permissions import FilterComponent, FilterComponentList
 from ..translations.base import PermissionMsg
@@ -174,32 +175,33 @@ class EmployeeAttribute:
 
     @property
     def manager_of_group_ids(self) -> list[str]:
-        if not self._manager_of_group_ids and self.model_hr_group:
-            self._manager_of_group_ids = [
-                str(x) for x in self.model_hr_group.objects.filter(
-                    Q(first_manager_id=self.employee_current_id)
-                ).filter_current(fill__tenant=True, fill__company=True).values_list('id', flat=True)
-            ]
+        self.load_snapshot()
+        if self._manager_of_group_ids is None:
+            self._manager_of_group_ids = []
+            if self.model_hr_group:
+                self._manager_of_group_ids = [
+                    str(x) for x in self.model_hr_group.objects.filter(
+                        Q(first_manager_id=self.employee_current_id)
+                    ).filter_current(fill__tenant=True, fill__company=True).values_list('id', flat=True)
+                ]
         return self._manager_of_group_ids
 
     @property
     def employee_staff_ids(self) -> list[str]:
-        if (
-                not self._employee_staff_ids
-                and self.employee_current
-                and self.manager_of_group_ids
-                and len(self.manager_of_group_ids) > 0
-        ):
-            employee_ids = self.model_hr_employee.objects.filter(
-                group_id__in=self.manager_of_group_ids,
-            ).filter_current(fill__tenant=True, fill__company=True).values_list('id', flat=True)
-            self._employee_staff_ids = list(
-                set(
-                    [
-                        str(x) for x in employee_ids
-                    ]
+        self.load_snapshot()
+        if self._employee_staff_ids is None:
+            self._employee_staff_ids = []
+            if self.employee_current and self.manager_of_group_ids and len(self.manager_of_group_ids) > 0:
+                employee_ids = self.model_hr_employee.objects.filter(
+                    group_id__in=self.manager_of_group_ids,
+                ).filter_current(fill__tenant=True, fill__company=True).values_list('id', flat=True)
+                self._employee_staff_ids = list(
+                    set(
+                        [
+                            str(x) for x in employee_ids
+                        ]
+                    )
                 )
-            )
         return self._employee_staff_ids
 
     def employee_staff_ids__exclude_me(self):
@@ -218,17 +220,20 @@ class EmployeeAttribute:
 
     @property
     def employee_same_group_ids(self) -> list[str]:
-        if not self._employee_same_group_ids and self.group_id_of_employee_current:
-            employee_ids = self.model_hr_employee.objects.filter(
-                group_id=self.group_id_of_employee_current
-            ).filter_current(fill__tenant=True, fill__company=True).values_list('id', flat=True)
-            self._employee_same_group_ids = list(
-                set(
-                    [
-                        str(x) for x in employee_ids
-                    ]
+        self.load_snapshot()
+        if self._employee_same_group_ids is None:
+            self._employee_same_group_ids = []
+            if self.group_id_of_employee_current:
+                employee_ids = self.model_hr_employee.objects.filter(
+                    group_id=self.group_id_of_employee_current
+                ).filter_current(fill__tenant=True, fill__company=True).values_list('id', flat=True)
+                self._employee_same_group_ids = list(
+                    set(
+                        [
+                            str(x) for x in employee_ids
+                        ]
+                    )
                 )
-            )
         return self._employee_same_group_ids
 
     def employee_same_group_ids__exclude_me(self):
@@ -249,6 +254,7 @@ class EmployeeAttribute:
 
     @property
     def roles(self):
+        self.load_snapshot()
         if self._roles is None and self.employee_current and hasattr(self.employee_current, 'role'):
             self._roles = [
                 {
@@ -260,15 +266,52 @@ class EmployeeAttribute:
             ]
         return self._roles
 
+    @property
+    def snapshot_version(self) -> Union[str, None]:
+        if self._snapshot_version is None and self.employee_current_id and self.company_id:
+            self._snapshot_version = PermitSnapshot.get_version(
+                company_id=self.company_id, employee_id=self.employee_current_id,
+            )
+        return self._snapshot_version
+
+    def load_snapshot(self):
+        """
+        Nạp roles + group/staff ids từ snapshot (nếu có), chưa có thì query một lần rồi lưu snapshot.
+        """
+        if self._snapshot_loaded is True:
+            return None
+        self._snapshot_loaded = True
+
+        if self.snapshot_version:
+            key = PermitSnapshot.make_key(self.company_id, self.snapshot_version, self.employee_current_id, 'attr')
+            data = PermitSnapshot.get(key)
+            if data is None:
+                PermitSnapshot.set(
+                    key, {
+                        'roles': self.roles,
+                        'manager_of_group_ids': self.manager_of_group_ids,
+                        'employee_staff_ids': self.employee_staff_ids,
+                        'employee_same_group_ids': self.employee_same_group_ids,
+                    }
+                )
+            else:
+                self._roles = data['roles']
+                self._manager_of_group_ids = data['manager_of_group_ids']
+                self._employee_staff_ids = data['employee_staff_ids']
+                self._employee_same_group_ids = data['employee_same_group_ids']
+        return None
+
     def __init__(self, employee_obj, **kwargs):
         self._model_hr_group = None
         self._model_hr_employee = None
         self._tenant_id = None
         self._company_id = None
         self._group_id_of_employee_current = None
-        self._manager_of_group_ids = []
-        self._employee_staff_ids = []
-        self._employee_same_group_ids = []
+        self._manager_of_group_ids: list[str] = None
+        self._employee_staff_ids: list[str] = None
+        self._employee_same_group_ids: list[str] = None
+        self._snapshot_version: str = None
+        self._snapshot_loaded: bool = False
         self._employee_in_company_ids = []
         self._roles: list[dict] = None
         self._is_admin_company: bool = False
@@ -793,7 +836,7 @@ class PermissionController:
     def config_data__get_by_config(cls, app_obj, perm_code, permissions_parsed: dict, state_depend_on: bool = None):
         # state_depend_on = None: not check is_depend_on
 
-        default_data = {'general': {}, 'ids': {}, 'opp': {}, 'prj': {}, 'app_obj': app_obj}
+        default_data = {'general': {}, 'ids': {}, 'ids_grant': {}, 'opp': {}, 'prj': {}, 'app_obj': app_obj}
         key = f'{app_obj.app_label}.{app_obj.model_code}.{perm_code}'.lower()
         if key in permissions_parsed:
             perm = permissions_parsed[key]
@@ -823,6 +866,10 @@ class PermissionController:
                         if settings.DEBUG_PERMIT:
                             print('* [IDS - depend] skip      :', 'state_depend_on =', state_depend_on)
 
+                if perm.get('ids_grant', None) and isinstance(perm['ids_grant'], dict):
+                    if state_depend_on in (None, False):
+                        default_data['ids_grant'] = perm['ids_grant']
+
                 if 'opp' in perm and isinstance(perm['opp'], dict):
                     if state_depend_on in (None, False):
                         default_data['opp'] = perm['opp']
@@ -850,7 +897,51 @@ class PermissionController:
     KEY_FILTER_PRJ_ID_IN_MODEL = 'project_id'
     ALLOWED_RANGE___PRJ = ['1', '4']
 
+    def get_snapshot_key(self, config_check_permit, *parts) -> Union[str, None]:
+        code = self.parse_config_permit_check_to_string(config_check_permit)
+        version = self.employee_attr.snapshot_version
+        if code and version:
+            return PermitSnapshot.make_key(
+                self.employee_attr.company_id, version, self.employee_attr.employee_current_id, code, *parts
+            )
+        return None
+
     def get_config_data(self, config_check_permit, has_roles=True, state_depend_on=None):
+        snapshot_key = self.get_snapshot_key(config_check_permit, 'config', has_roles, state_depend_on)
+        if snapshot_key:
+            config_tmp = PermitSnapshot.get(snapshot_key)
+            if config_tmp is not None:
+                return config_tmp
+
+        config_tmp = self.compile_config_data(
+            config_check_permit=config_check_permit, has_roles=has_roles, state_depend_on=state_depend_on,
+        )
+        if snapshot_key:
+            PermitSnapshot.set(snapshot_key, config_tmp)
+        return config_tmp
+
+    @classmethod
+    def merge_permission_grants(cls, permissions_parsed: dict, key: str, grant_data: Union[dict, None]) -> dict:
+        """
+        Gộp grant (hr.PermissionGrant) của 1 permit code vào permissions_parsed (phần general + ids/opp/prj legacy
+        chưa chuyển sang grant), lấy hợp của 2 nguồn. Grant theo ID chỉ là điều kiện lọc ('ids_grant'), ids legacy giữ nguyên
+        """
+        if not grant_data:
+            return permissions_parsed if permissions_parsed else {}
+        perm = dict(permissions_parsed.get(key, {}) if permissions_parsed else {})
+        general = {range_code: dict(range_data) for range_code, range_data in perm.get('general', {}).items()}
+        for range_code, range_data in grant_data['general'].items():
+            general.setdefault(range_code, {}).update(range_data)
+        perm['general'] = general
+        perm['ids_grant'] = grant_data.get('ids_grant', {})
+        for permit_from in ('opp', 'prj'):
+            merged = {source_id: dict(ranges) for source_id, ranges in perm.get(permit_from, {}).items()}
+            for source_id, ranges in grant_data[permit_from].items():
+                merged.setdefault(source_id, {}).update(ranges)
+            perm[permit_from] = merged
+        return {**(permissions_parsed if permissions_parsed else {}), key: perm}
+
+    def compile_config_data(self, config_check_permit, has_roles=True, state_depend_on=None):
         config_tmp = {'employee': {}, 'roles': []}
         # get from employee
         if config_check_permit:
@@ -874,12 +965,28 @@ class PermissionController:
                 if settings.DEBUG_PERMIT:
                     print('=> Application Object      :', app_obj_tmp, label_code, model_code, perm_code)
                 if app_obj_tmp and app_obj_tmp.permit_mapping and perm_code in app_obj_tmp.permit_mapping:
-                    application_obj = app_obj_tmp
+                    application_obj = ApplicationSnapshot(
+                        app_label=app_obj_tmp.app_label,
+                        model_code=app_obj_tmp.model_code,
+                        filtering_inheritor=app_obj_tmp.filtering_inheritor,
+                    )
 
             # get employee obj
             employee_obj = self.employee_attr.employee_current
             if employee_obj and application_obj:
-                permissions_parsed = getattr(employee_obj, self.KEY_STORAGE_PERMISSION_IN_MODEL, {})
+                # quyền theo ids/opp/prj: 1 truy vấn theo index (owner, permit_code) cho employee + roles
+                key = f'{application_obj.app_label}.{application_obj.model_code}.{perm_code}'.lower()
+                role_list = self.employee_attr.roles if has_roles is True else []
+                grants = DisperseModel(app_model='hr.PermissionGrant').get_model().get_parsed(
+                    permit_code=key,
+                    employee_id=employee_obj.id,
+                    role_ids=[role_data['id'] for role_data in role_list],
+                )
+
+                permissions_parsed = self.merge_permission_grants(
+                    permissions_parsed=getattr(employee_obj, self.KEY_STORAGE_PERMISSION_IN_MODEL, {}),
+                    key=key, grant_data=grants.get(str(employee_obj.id), None),
+                )
                 if permissions_parsed:
                     config_tmp['employee'] = self.config_data__get_by_config(
                         app_obj=application_obj,
@@ -890,8 +997,11 @@ class PermissionController:
 
                 # get from role
                 if has_roles is True:
-                    for role_data in self.employee_attr.roles:
-                        permissions_parsed = role_data[self.KEY_STORAGE_PERMISSION_IN_MODEL]
+                    for role_data in role_list:
+                        permissions_parsed = self.merge_permission_grants(
+                            permissions_parsed=role_data[self.KEY_STORAGE_PERMISSION_IN_MODEL],
+                            key=key, grant_data=grants.get(str(role_data['id']), None),
+                        )
                         if permissions_parsed:
                             config_tmp['roles'].append(
                                 self.config_data__get_by_config(
@@ -936,6 +1046,7 @@ class PermissionController:
                 if isinstance(self.config_data['employee'], dict) and (
                         self.config_data['employee']['general']
                         or self.config_data['employee']['ids']
+                        or self.config_data['employee'].get('ids_grant', None)
                         or self.config_data['employee']['opp']
                         or self.config_data['employee']['prj']
                 ):
@@ -945,6 +1056,7 @@ class PermissionController:
                     if isinstance(item, dict) and (
                             item['general']
                             or item['ids']
+                            or item.get('ids_grant', None)
                             or item['opp']
                             or item['prj']
                     ):
@@ -980,7 +1092,15 @@ class PermissionController:
         #     'roles': [{'{config_data__simple_list__item}'}],
         # }
         if not self._config_data__simple_list:
-            self._config_data__simple_list = self.get_config_data__simple_list(config_data=self.config_data)
+            snapshot_key = self.get_snapshot_key(
+                self.config_check_permit, 'simple', self.state_depend_on, self.opp_enabled, self.prj_enabled,
+            )
+            simple_list = PermitSnapshot.get(snapshot_key) if snapshot_key else None
+            if simple_list is None:
+                simple_list = self.get_config_data__simple_list(config_data=self.config_data)
+                if snapshot_key:
+                    PermitSnapshot.set(snapshot_key, simple_list)
+            self._config_data__simple_list = simple_list
             if settings.DEBUG_PERMIT:
                 print('* _config_data__simple_list:', self._config_data__simple_list)
         return self._config_data__simple_list
@@ -1076,6 +1196,10 @@ class PermissionController:
                 else:
                     # operator "AND" so one False is all False
                     one_item_allow = False
+            elif lookup_key == 'grant':
+                one_item_allow = bool(data_obj_key) and DisperseModel(
+                    app_model='hr.PermissionGrant'
+                ).get_model().objects.filter(permit_from='ids', source_id=data_obj_key, **data).exists()
             elif lookup_key == '_exclude':
                 if not data or (data and str(data_obj_key) != str(data)):
                     one_item_allow = True
@@ -1125,29 +1249,20 @@ class PermissionController:
 
     def config_data__check_obj_on_id_list(self, obj):  # check perm on DOC_ID (workflow)
         try:
-            data_check_id_list = {}
-            for data_item in self.config_data__simple_list:
-                if 'id__in' in data_item:
-                    data_check_id_list = data_item
-                    break
+            # id__in: ids legacy (JSON), id__grant: grant theo ID ở hr.PermissionGrant
+            data_check_id_list = [
+                data_item for data_item in self.config_data__simple_list
+                if 'id__in' in data_item or 'id__grant' in data_item
+            ]
         except Exception as err:
             return False
-        is_allow = False
-        one_item_allow = None
-        for key_full, data in data_check_id_list.items():
-            if is_allow is True:
-                break
-
-            one_item_allow = self.check_permit_each_item(key_full=key_full, data=data, obj_or_dict=obj)
-            if one_item_allow is True:
-                one_item_allow = True
-                continue
-            else:
-                one_item_allow = False
-                break
-
-        if one_item_allow is True:
-            return True
+        # giữa các item là "OR", trong 1 item là "AND"
+        for data_item in data_check_id_list:
+            if all(
+                    self.check_permit_each_item(key_full=key_full, data=data, obj_or_dict=obj) is True
+                    for key_full, data in data_item.items()
+            ):
+                return True
         return False
 
     def check_general_perm(self, general_perm, employee_inherit_id):
@@ -1371,6 +1486,11 @@ class PermissionController:
                     elif isinstance(tmp, list):
                         result_or += tmp
 
+            ids_grant = item_data.get('ids_grant', {})
+            if ids_grant:
+                # quyền theo ID ở hr.PermissionGrant: lọc bằng Exists (FilterComponent), không dựng id__in
+                result_or.append({'id__grant': ids_grant})
+
             if self.opp_enabled is True:
                 opp_data = item_data.get('opp', {})
                 if opp_data:
@@ -2038,6 +2158,9 @@ def mask_view(**parent_kwargs):
 
             return always_check
 
-        return wraps(func_view)(wrapper)
+        wrapped = wraps(func_view)(wrapper)
+        # giữ cấu hình quyền của view => xử lý ngoài request (vd: task xuất báo cáo) lọc dữ liệu theo cùng quyền
+        wrapped.mask_view_kwargs = decor_kwargs
+        return wrapped
 
     return decorated
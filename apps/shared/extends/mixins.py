@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 from collections.abc import Iterable
 import re
@@ -11,18 +13,22 @@ from django.core.exceptions import EmptyResultSet, ValidationError as DjangoVali
 from django.core.files.uploadedfile import TemporaryUploadedFile
 from django.db import transaction
 from django.db.models import Q, Model
-from django.utils import timezone
+from django.utils import timezone, translation
 
 from django_filters import rest_framework as filters
 
 from rest_framework import serializers, exceptions
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder as DRFJSONEncoder
 
+from apps.core.log.sink import ActivityLogSink
 from apps.core.log.tasks import force_log_activity
 from apps.core.workflow.tasks_not_use_import import call_log_update_at_zone
 
+from .caching import Caching
 from .controllers import ResponseController
+from .response import cus_response
 from .utils import TypeCheck
 from .mask_view import ViewChecking
 from .. import KEY_GET_LIST_FROM_APP, SPLIT_CODE_FROM_APP
@@ -751,24 +757,25 @@ class BaseMixin(GenericAPIView):  # pylint: disable=R0904
         task_id: Union[UUID, str] = kwargs.get('task_id', None)
 
         user = self.request.user
-        call_task_background(
-            force_log_activity,
-            **{
-                'tenant_id': user.tenant_current_id,
-                'company_id': user.company_current_id,
-                'request_method': self.request.method.upper(),
-                'date_created': timezone.now(),
-                'doc_id': doc_obj.id,
-                'doc_app': self.get_default_doc_app(),
-                'automated_logging': False,
-                'user_id': user.id,
-                'employee_id': user.employee_current_id,
-                'msg': self.get_default_log_msg(task_id=task_id),
-                'data_change': request_data if isinstance(request_data, dict) else self.request.data,
-                'change_partial': change_partial,
-                'task_workflow_id': task_id,
-            },
-        )
+        log_data = {
+            'tenant_id': user.tenant_current_id,
+            'company_id': user.company_current_id,
+            'request_method': self.request.method.upper(),
+            'date_created': timezone.now(),
+            'doc_id': doc_obj.id,
+            'doc_app': self.get_default_doc_app(),
+            'automated_logging': False,
+            'user_id': user.id,
+            'employee_id': user.employee_current_id,
+            'msg': self.get_default_log_msg(task_id=task_id),
+            'data_change': request_data if isinstance(request_data, dict) else self.request.data,
+            'change_partial': change_partial,
+            'task_workflow_id': task_id,
+        }
+        if ActivityLogSink.is_enabled():
+            ActivityLogSink.push(**log_data)
+        else:
+            call_task_background(force_log_activity, **log_data)
         if task_id:
             call_task_background(
                 call_log_update_at_zone,
@@ -876,25 +883,118 @@ class BaseListMixin(BaseMixin):
 
     def get_queryset_and_filter_queryset(self, is_minimal, filter_kwargs, filter_kwargs_q):
         if is_minimal is True:
-            if self.use_cache_minimal and self.query_extend_base_model:
-                queryset = self.filter_queryset(
-                    self.queryset.filter(**filter_kwargs).filter(filter_kwargs_q)
-                )
-            else:
-                queryset = self.filter_queryset(
-                    self.queryset.filter(**filter_kwargs).filter(filter_kwargs_q)
-                )
+            queryset = self.filter_queryset(
+                self.queryset.filter(**filter_kwargs).filter(filter_kwargs_q)
+            )
         else:
-            if self.use_cache_queryset and self.query_extend_base_model:
-                queryset = self.filter_queryset(
-                    self.get_queryset().filter(**filter_kwargs).filter(filter_kwargs_q)
-                )
-            else:
-                queryset = self.filter_queryset(
-                    self.get_queryset().filter(**filter_kwargs).filter(filter_kwargs_q)
-                )
+            queryset = self.filter_queryset(
+                self.get_queryset().filter(**filter_kwargs).filter(filter_kwargs_q)
+            )
         return queryset
 
+    # Bảng liên quan (ngoài bảng chính + TABLE_REF) mà serializer list đọc => đưa generation vào key cache list
+    cache_tables_relate: list[str] = []
+
+    def has_list_cache(self, is_minimal) -> bool:
+        """
+        Cache page list khi view bật use_cache_minimal (is_minimal) / use_cache_queryset.
+        View bật cache không được trả dữ liệu riêng theo user ngoài phạm vi quyền
+        (key theo phạm vi quyền + get_list_cache_scope, không theo user).
+        """
+        return (
+                settings.CACHE_ENABLED is True
+                and self.query_extend_base_model is True
+                and (self.use_cache_minimal if is_minimal is True else self.use_cache_queryset) is True
+        )
+
+    @classmethod
+    def get_list_cache_tables(cls) -> list[str]:
+        # bảng mà key cache list của view phụ thuộc: bảng chính + cache_tables_relate (rỗng khi view không bật cache)
+        model_cls = getattr(cls.queryset, 'model', None)
+        if model_cls is None or (cls.use_cache_minimal is not True and cls.use_cache_queryset is not True):
+            return []
+        return [model_cls._meta.db_table, *cls.cache_tables_relate]  # pylint: disable=protected-access / W0212
+
+    @classmethod
+    def get_all_list_cache_tables(cls) -> set[str]:
+        """
+        Bảng của tất cả view list bật cache (view phải được import trước, vd: qua ROOT_URLCONF),
+        phải nằm trong caching.LIST_CACHE_TABLES (kiểm tra bằng test).
+        """
+        tables, view_list = set(), list(cls.__subclasses__())
+        while view_list:
+            view_cls = view_list.pop()
+            tables.update(str(tbl).lower() for tbl in view_cls.get_list_cache_tables())
+            view_list.extend(view_cls.__subclasses__())
+        return tables
+
+    def get_list_cache_scope(self) -> str:
+        # view có queryset lọc theo user (vd: kho được phân quyền) override để tách key cache theo phạm vi đó
+        return ''
+
+    def get_list_cache_permit(self) -> Union[str, None]:
+        """
+        Phạm vi quyền của key cache list: version snapshot quyền + simple_list (dữ liệu thô dựng Q lọc quyền).
+        Không dùng str(Q): Q có thể chứa queryset (Exists của 'id__grant') => chuỗi khác nhau giữa các request.
+        None => không cache: list gọi từ app khác (from_app) lọc theo dữ liệu ngoài snapshot (vd: thành viên opp).
+        """
+        if self.has_get_list_from_app()[0] is True:
+            return None
+        permit_cls = getattr(getattr(self, 'cls_check', None), 'permit_cls', None)
+        if permit_cls is None:
+            return ''
+        return '|'.join(
+            [
+                str(permit_cls.employee_attr.snapshot_version),
+                json.dumps(permit_cls.config_data__simple_list, sort_keys=True, cls=DRFJSONEncoder),
+            ]
+        )
+
+    def get_list_cache_key(self, is_minimal, filter_kwargs) -> Union[str, None]:
+        cache_tables = self.get_list_cache_tables()
+        if not cache_tables:
+            return None
+        permit_key = self.get_list_cache_permit()
+        if permit_key is None:
+            return None
+        table_name = cache_tables[0]
+        # list lọc theo company => chỉ phụ thuộc generation của company đó (ghi ở company khác không làm mất cache)
+        generations = Caching().get_table_generations(
+            cache_tables, tenant_id=filter_kwargs.get('tenant_id', None), company_id=filter_kwargs.get('company_id', None)
+        )
+        if None in [generation for pair in generations.values() for generation in pair]:
+            return None
+        string_key = '|'.join(
+            [
+                f'{self.__class__.__module__}.{self.__class__.__name__}',
+                self.request.path,
+                str(sorted(self.request.query_params.lists())),
+                str(is_minimal),
+                str(translation.get_language()),
+                str(sorted((key, str(value)) for key, value in filter_kwargs.items())),
+                permit_key,
+                self.get_list_cache_scope(),
+                str(sorted(generations.items())),
+            ]
+        )
+        return f'{table_name}-list{hashlib.md5(string_key.encode("utf-8")).hexdigest()}'
+
+    @staticmethod
+    def get_list_cache(cache_key) -> Union[Response, None]:
+        data = Caching().get(cache_key)
+        if data is not None:
+            return cus_response(json.loads(data), status=200)
+        return None
+
+    @staticmethod
+    def set_list_cache(cache_key, response):
+        if response.status_code == 200:
+            # lưu dạng JSON đã encode theo DRF => response lấy từ cache render giống hệt response gốc
+            Caching().set(
+                cache_key, json.dumps(response.data, cls=DRFJSONEncoder), timeout=settings.CACHE_EXPIRES_DEFAULT
+            )
+        return response
+
     @staticmethod
     def convert_sql_str(data):
         pattern = r"[0-9a-f]{8}[0-9a-f]{4}[0-9a-f]{4}[0-9a-f]{4}[0-9a-f]{12}"
@@ -943,6 +1043,23 @@ class BaseListMixin(BaseMixin):
             print('# MIXINS.LIST              :', request.path)
             print('#  - filter_kwargs_q       :', filter_kwargs_q)
             print('#  - filter_kwargs         :', filter_kwargs)
+
+        if self.has_list_cache(is_minimal=is_minimal):
+            cache_key = self.get_list_cache_key(is_minimal=is_minimal, filter_kwargs=filter_kwargs)
+            if cache_key:
+                response = self.get_list_cache(cache_key)
+                if response is None:
+                    response = self.set_list_cache(
+                        cache_key=cache_key,
+                        response=self.list_response(
+                            is_minimal=is_minimal, filter_kwargs=filter_kwargs, filter_kwargs_q=filter_kwargs_q,
+                        ),
+                    )
+                return response
+
+        return self.list_response(is_minimal=is_minimal, filter_kwargs=filter_kwargs, filter_kwargs_q=filter_kwargs_q)
+
+    def list_response(self, is_minimal, filter_kwargs, filter_kwargs_q):
         queryset = self.get_queryset_and_filter_queryset(
             is_minimal=is_minimal,
             filter_kwargs=filter_kwargs,
@@ -2,15 +2,16 @@ import hashlib
 import json
 import re
 from copy import deepcopy
+from types import SimpleNamespace
 from uuid import uuid4
 
 from django.apps import apps
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from jsonfield import JSONField
 
-from .caching import Caching
+from .caching import Caching, TABLE_REF
 from .managers import NormalManager
 from ..constant import SYSTEM_STATUS
 
@@ -41,6 +42,63 @@ def post_save_handler(sender, **kwargs):
             print(f'Receive signal: {table_name}, ', kwargs)
 
 
+# bảng đã nối signal tăng generation (register_table_generation_signals)
+TABLE_GENERATION_WATCHED: set[str] = set()
+
+
+def table_generation_handler(sender, **kwargs):
+    """
+    Tăng generation của bảng khi dữ liệu thay đổi => cache dựng trên generation cũ (vd: cache list) tự hết hạn.
+    Instance có company: chỉ tăng generation theo (tenant, company) của instance, cache của company khác giữ nguyên.
+    Chạy sau commit để request khác không cache lại dữ liệu chưa commit.
+    """
+    if getattr(settings, 'CACHE_ENABLED', False) is not True:
+        return None
+    if str(kwargs.get('action', '')).startswith('pre_'):
+        # m2m_changed: chỉ tăng sau khi add/remove/clear xong
+        return None
+    table_name = sender._meta.db_table  # pylint: disable=protected-access / W0212
+    update_fields = kwargs.get('update_fields', None)
+    if table_name == 'account_user' and update_fields and list(update_fields) == ['last_login']:
+        # don't change generation when update last_login
+        return None
+    instance = kwargs.get('instance', None)
+    tenant_id = getattr(instance, 'tenant_id', None)
+    company_id = getattr(instance, 'company_id', None)
+    transaction.on_commit(
+        lambda: Caching().bump_table_generation(table_name=table_name, tenant_id=tenant_id, company_id=company_id)
+    )
+    return None
+
+
+def register_table_generation_signals(table_names) -> set[str]:
+    """
+    Nối signal tăng generation cho model có bảng nằm trong table_names (bảng của view list bật cache)
+    + bảng mà TABLE_REF tăng kèm tới các bảng đó. Model khác không phát sinh thêm query cache khi ghi.
+    """
+    watched = {str(tbl).lower() for tbl in table_names}
+    watched.update(tbl for tbl, ref_tables in TABLE_REF.items() if watched.intersection(ref_tables))
+    for model_cls in apps.get_models(include_auto_created=True):
+        if model_cls._meta.db_table.lower() in watched:  # pylint: disable=protected-access / W0212
+            models.signals.post_save.connect(table_generation_handler, sender=model_cls)
+            models.signals.post_delete.connect(table_generation_handler, sender=model_cls)
+            models.signals.m2m_changed.connect(table_generation_handler, sender=model_cls)
+    TABLE_GENERATION_WATCHED.update(watched)
+    return watched
+
+
+def bulk_table_generation(*model_classes, tenant_id=None, company_id=None):
+    """
+    bulk_create / bulk_update / queryset.update không phát signal => gọi sau khi ghi để tăng generation như signal,
+    chỉ cho bảng đã nối signal (bảng khác không có cache phụ thuộc).
+    company_id: các dòng vừa ghi cùng 1 company => chỉ tăng generation của company đó
+    """
+    scope = SimpleNamespace(tenant_id=tenant_id, company_id=company_id)
+    for model_cls in model_classes:
+        if model_cls._meta.db_table.lower() in TABLE_GENERATION_WATCHED:  # pylint: disable=protected-access / W0212
+            table_generation_handler(sender=model_cls, instance=scope)
+
+
 class CoreSignalRegisterMetaClass(models.base.ModelBase, type):
 
     def register_signals(cls):
@@ -45,3 +45,8 @@ class CustomResultsSetPagination(PageNumberPagination):
         if cutoff:
             return min(ret, cutoff)
         return ret
+
+
+class AllResultsSetPagination(CustomResultsSetPagination):
+    # mặc định không phân trang (như pageSize=-1): gán pagination_class của view thay vì sửa page_size của class dùng chung
+    page_size = -1
@@ -0,0 +1,138 @@
+"""
+Snapshot quyền đã biên dịch cho mask_view.
+    - Mỗi (employee, app, perm_code) được biên dịch một lần: config quyền của employee + roles, danh sách
+      group quản lý, staff, cùng group và simple_list (filter spec) để dựng Q.
+    - Lưu 2 tầng: memcached (dùng chung các process) + bộ nhớ process (LRU).
+    - Key có version theo company. Signal Employee/Role/Group/RoleHolder tăng version => toàn bộ snapshot cũ
+      của company tự vô hiệu (không cần xóa từng key). Grant theo ids/opp/prj chỉ tăng version của employee.
+    - Chỉ bật khi CACHE_ENABLED=True vì DummyCache không giữ được version giữa các process.
+Dữ liệu snapshot trả về là dùng chung (read-only), không được sửa trực tiếp.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.utils.cache import caches
+
+from .caching import Caching
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['PermitSnapshot', 'ApplicationSnapshot']
+
+# thay cho base.Application trong config_data: chỉ giữ các thuộc tính mask_view sử dụng
+ApplicationSnapshot = namedtuple('ApplicationSnapshot', ['app_label', 'model_code', 'filtering_inheritor'])
+
+
+class PermitSnapshot:
+    KEY_VERSION = 'permit_snapshot.version.{company_id}'
+    KEY_VERSION_EMPLOYEE = 'permit_snapshot.version.employee.{employee_id}'
+    KEY_DATA = 'permit_snapshot.{company_id}.{version}.{employee_id}.{parts}'
+    TIMEOUT = 60 * 60 * 12  # 12 hours
+    LOCAL_MAX_SIZE = 4096
+
+    _local_data = OrderedDict()
+    _local_lock = threading.Lock()
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return getattr(settings, 'CACHE_ENABLED', False) is True
+
+    @classmethod
+    def sv_cache(cls):
+        return caches['default']
+
+    @classmethod
+    def key_version(cls, company_id) -> str:
+        return Caching.parse_key(cls.KEY_VERSION.format(company_id=str(company_id)))
+
+    @classmethod
+    def key_version_employee(cls, employee_id) -> str:
+        return Caching.parse_key(cls.KEY_VERSION_EMPLOYEE.format(employee_id=str(employee_id)))
+
+    @classmethod
+    def init_version(cls, key) -> int:
+        # khởi tạo theo thời gian (ms): nếu key version bị evict thì version mới luôn lớn hơn version cũ
+        # => không trùng với snapshot cũ còn nằm trong bộ nhớ process
+        cls.sv_cache().add(key, int(time.time() * 1000), None)
+        return cls.sv_cache().get(key)
+
+    @classmethod
+    def get_version(cls, company_id, employee_id=None) -> str | None:
+        """
+        Version của company (+ version grant riêng của employee nếu có) - 1 lần gọi cache
+        """
+        if not cls.is_enabled() or not company_id:
+            return None
+        keys = [cls.key_version(company_id)]
+        if employee_id:
+            keys.append(cls.key_version_employee(employee_id))
+        data = cls.sv_cache().get_many(keys)
+        return '-'.join(
+            [
+                str(data[key]) if data.get(key, None) is not None else str(cls.init_version(key))
+                for key in keys
+            ]
+        )
+
+    @classmethod
+    def bump_key(cls, key):
+        try:
+            return cls.sv_cache().incr(key)
+        except ValueError:
+            return cls.init_version(key)
+
+    @classmethod
+    def bump(cls, company_id):
+        if not cls.is_enabled() or not company_id:
+            return None
+        return cls.bump_key(cls.key_version(company_id))
+
+    @classmethod
+    def bump_employee(cls, employee_id):
+        # grant theo ids/opp/prj chỉ thay đổi quyền của 1 employee => không làm mới snapshot cả company
+        if not cls.is_enabled() or not employee_id:
+            return None
+        return cls.bump_key(cls.key_version_employee(employee_id))
+
+    @classmethod
+    def make_key(cls, company_id, version, employee_id, *parts) -> str:
+        return Caching.parse_key(
+            cls.KEY_DATA.format(
+                company_id=str(company_id),
+                version=str(version),
+                employee_id=str(employee_id),
+                parts='.'.join([str(item) for item in parts]),
+            )
+        )
+
+    @classmethod
+    def local_set(cls, key, data):
+        with cls._local_lock:
+            cls._local_data[key] = data
+            cls._local_data.move_to_end(key)
+            while len(cls._local_data) > cls.LOCAL_MAX_SIZE:
+                cls._local_data.popitem(last=False)
+
+    @classmethod
+    def get(cls, key):
+        with cls._local_lock:
+            data = cls._local_data.get(key, None)
+            if data is not None:
+                cls._local_data.move_to_end(key)
+                return data
+        data = cls.sv_cache().get(key)
+        if data is not None:
+            cls.local_set(key, data)
+        return data
+
+    @classmethod
+    def set(cls, key, data):
+        try:
+            cls.sv_cache().set(key, data, cls.TIMEOUT)
+        except Exception as err:
+            logger.error('[PermitSnapshot] Set cache error: key=%s, err=%s', key, str(err))
+        cls.local_set(key, data)
+        return data
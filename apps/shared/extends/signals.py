@@ -9,7 +9,7 @@ from django.utils import translation
 from django.utils.translation import gettext_lazy as _
 from django_celery_results.models import TaskResult
 
-from apps.core.hr.models import Role, Employee, RoleHolder, EmployeePermission, RolePermission
+from apps.core.hr.models import Role, Employee, RoleHolder, EmployeePermission, RolePermission, Group
 from apps.core.hr.tasks import sync_plan_app_employee, uninstall_plan_app_employee
 from apps.core.log.models import Notifications
 from apps.core.process.models import Process, ProcessMembers  # SaleFunction
@@ -39,6 +39,7 @@ from apps.sales.saleorder.models import (
 from apps.sales.task.models import OpportunityTaskConfig, OpportunityTaskStatus
 
 from .caching import Caching
+from .permit_snapshot import PermitSnapshot
 from .push_notify import TeleBotPushNotify
 from .tasks import call_task_background
 from apps.core.tenant.models import TenantPlan
@@ -1359,7 +1360,13 @@ def update_stock(sender, instance, created, **kwargs):  # pylint: disable=W0613
 @receiver(post_save, sender=Notifications)
 def clear_cache_notify(sender, instance, **kwargs):  # pylint: disable=W0613
     if getattr(instance, 'employee_id', None):
-        Caching().delete(instance.cache_base_key(my_obj=instance))
+        Caching().delete(
+            Caching.key_cache_table(
+                table_name=Notifications.__name__,
+                string_key=instance.cache_base_key(my_obj=instance),
+                hash_key=True,
+            )
+        )
 
 
 @receiver(post_save, sender=RuntimeAssignee)
@@ -1525,6 +1532,29 @@ def new_employee_or_role(sender, instance, created, **kwargs):
             RolePermission.objects.get_or_create(role=instance)
 
 
+@receiver(post_save, sender=Role)
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=RoleHolder)
+@receiver(post_delete, sender=Role)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=RoleHolder)
+def bump_permit_snapshot_version(sender, instance, **kwargs):
+    # quyền / role / group / quan hệ quản lý thay đổi => vô hiệu snapshot quyền đã biên dịch của company
+    if not PermitSnapshot.is_enabled():
+        return None
+    if isinstance(instance, RoleHolder):
+        company_id = None
+        if instance.role_id:
+            company_id = Role.objects.filter(id=instance.role_id).values_list('company_id', flat=True).first()
+        if not company_id and instance.employee_id:
+            company_id = Employee.objects.filter(id=instance.employee_id).values_list('company_id', flat=True).first()
+    else:
+        company_id = getattr(instance, 'company_id', None)
+    return PermitSnapshot.bump(company_id=company_id)
+
+
 @receiver(post_save, sender=Employee)
 def new_employee(sender, instance, created, **kwargs):
     if created is True:
@@ -24,7 +24,7 @@ from apps.shared.permissions.util import PermissionController
 from .utils import CustomizeEncoder
 
 
-__all__ = ['AdvanceTestCase', 'count_queries']
+__all__ = ['AdvanceTestCase', 'count_queries', 'bulk_new']
 
 from ...core.base.models import PlanApplication
 from ...core.company.models import Company
@@ -54,6 +54,11 @@ def count_queries(func):
     return wraps(func)(wrapper)
 
 
+def bulk_new(model_cls, **kwargs):
+    # tạo dữ liệu mẫu không chạy save()/signal
+    return model_cls.objects.bulk_create([model_cls(**kwargs)])[0]
+
+
 class AdvanceTestCase(TestCase):
     def append_start_count_queries(self):
         if self.ctx__of_counter_queries:
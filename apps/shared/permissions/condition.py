@@ -2,6 +2,8 @@ from typing import Literal
 
 from django.db.models import Q
 
+from ..extends.models import DisperseModel
+
 OPERATOR_TYPE = Literal['and', 'or']  # pylint: disable=C0103
 DATA_CHILD_TYPE = dict[str, any]  # pylint: disable=C0103
 
@@ -13,6 +15,7 @@ __all__ = [
 
 class FilterComponent:  # pylint: disable=R0902
     code_special__exclude = '___exclude'
+    code_special__grant = '__grant'  # {'id__grant': {'permit_code': ..., 'employee_id' | 'role_id': ...}}
     _data = None
 
     @property
@@ -41,6 +44,13 @@ class FilterComponent:  # pylint: disable=R0902
             if key.endswith(self.code_special__exclude):
                 key_new = key.split(self.code_special__exclude)[0]
                 q__special &= ~Q(**{key_new: value})
+            elif key.endswith(self.code_special__grant):
+                key_new = key[:-len(self.code_special__grant)]
+                q__special &= Q(
+                    DisperseModel(app_model='hr.PermissionGrant').get_model().filter_ids_exists(
+                        outer_ref=key_new, **value
+                    )
+                )
             else:
                 result[key] = value
         return Q(**result) & q__special
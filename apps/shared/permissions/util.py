@@ -236,6 +236,12 @@ class PermissionController:
     def get_permission_parsed(cls, instance):  # pylint: disable=R0912
         return PermissionParsedTool().get_permission_parsed(instance)
 
+    @classmethod
+    def get_permission_grants(cls, instance, permit_from: BASTION_FROM_TYPE, source_id, perm_config):
+        return PermissionParsedTool().get_permission_grants(
+            instance=instance, permit_from=permit_from, source_id=source_id, perm_config=perm_config,
+        )
+
 
 class PermissionParsedTool:
     def __init__(self, **kwargs):
@@ -334,8 +340,8 @@ class PermissionParsedTool:
         if isinstance(data, dict):
             for key_perm, value_perm in data.items():
                 # key_perm:     'hr.employee.view'
-                # value_perm:   ['id', 'id', 'id']
-                if isinstance(value_perm, dict):
+                # value_perm:   ['id', 'id', 'id'] | {'id': {}}
+                if isinstance(value_perm, (dict, list)):
                     for doc_id in value_perm:
                         cls.push_range_to_key(
                             result=result,
@@ -597,19 +603,40 @@ class PermissionParsedTool:
             #
             self.push_general(result=result, data=instance.permission_by_configured)
 
+            # quyền theo ID / opp / prj lưu ở hr.PermissionGrant (xem get_permission_grants)
+            # JSON legacy chưa chuyển (convert_legacy_grants sẽ làm rỗng) vẫn được gộp để không mất quyền khi tính lại
+
             #
-            # parse for by ID
+            # parse for by ID (legacy)
             #
             self.push_ids(result=result, data=instance.permission_by_id)
 
             #
-            # parse for opp
+            # parse for opp (legacy)
             #
             self.push_opp(result=result, data=instance.permission_by_opp)
 
             #
-            # parse for prj
+            # parse for prj (legacy)
             #
             self.push_prj(result=result, data=instance.permission_by_project)
 
         return result
+
+    def get_permission_grants(self, instance, permit_from: BASTION_FROM_TYPE, source_id, perm_config) -> list[dict]:
+        """
+        Parse config permit của 1 opp/prj thành danh sách dòng cho hr.PermissionGrant
+        """
+        result = {}
+        if instance and hasattr(instance, 'id') and source_id:
+            self.app_ids_allowed, self.app_prefix_allowed = self.app_allow_from_instance(instance=instance)
+            if not isinstance(self.app_ids_allowed, list) or not isinstance(self.app_prefix_allowed, list):
+                raise ValueError('App allowed return data type not support!')
+
+            if permit_from == 'opp':
+                self.push_opp(result=result, data={str(source_id): perm_config})
+            elif permit_from == 'prj':
+                self.push_prj(result=result, data={str(source_id): perm_config})
+
+        grant_cls = DisperseModel(app_model='hr.PermissionGrant').get_model()
+        return grant_cls.rows_from_parsed(parsed=result, permit_from=permit_from, source_id=str(source_id))
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class SharedappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.sharedapp'
+
+    def ready(self):
+        # pylint: disable=import-outside-toplevel / C0415
+        from apps.shared.extends.caching import LIST_CACHE_TABLES
+        from apps.shared.extends.models import register_table_generation_signals
+
+        # bảng khai báo tĩnh (không import view), test kiểm tra đủ bảng của các view list bật cache
+        register_table_generation_signals(LIST_CACHE_TABLES)
@@ -0,0 +1,97 @@
+import datetime
+import time
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.sales.report.utils.inventory_report_builder import ReportInvListBuilder, ReportInvLogTable
+
+IN_TITLES = ('Goods receipt', 'Goods return', 'Goods transfer (in)', 'Balance init input')
+OUT_TITLES = ('Delivery (sale)', 'Goods issue', 'Goods transfer (out)')
+DATE_RANGE = [5, 25]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark inventory cost report rows on synthetic logs: ReportInvListBuilder (grouped index + numpy) '
+        'vs per-row log scan. No data is written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, help='Total products', default=500)
+        parser.add_argument('--warehouses', type=int, help='Warehouses per product', default=10)
+        parser.add_argument('--logs', type=int, help='Logs per product - warehouse', default=6)
+
+    @classmethod
+    def get_data(cls, products, warehouses, logs_per):
+        rng = np.random.default_rng(0)
+        company = SimpleNamespace(company_config=SimpleNamespace(definition_inventory_valuation=0))
+        warehouse_ids = [uuid.uuid4() for _ in range(warehouses)]
+        costs, logs = [], []
+        for _ in range(products):
+            product = SimpleNamespace(id=uuid.uuid4(), inventory_uom=SimpleNamespace(ratio=2.0), valuation_method=0)
+            for warehouse_id in warehouse_ids:
+                balance = {
+                    field: float(rng.integers(0, 100))
+                    for field in ReportInvListBuilder.COST_FIELDS if 'balance' in field
+                }
+                costs.append(SimpleNamespace(
+                    id=uuid.uuid4(), product=product, product_id=product.id, warehouse_id=warehouse_id,
+                    lot_mapped_id=None, serial_number=None, sale_order_id=None, lease_order_id=None,
+                    service_order_id=None, periodic_closed=False, company=company, **balance
+                ))
+                for log_order in range(logs_per):
+                    stock_type = int(rng.choice([1, -1]))
+                    logs.append({
+                        'id': uuid.uuid4(), 'product_id': product.id, 'warehouse_id': warehouse_id,
+                        'physical_warehouse_id': warehouse_id, 'lot_mapped_id': None, 'serial_number': None,
+                        'sale_order_id': None, 'lease_order_id': None, 'service_order_id': None,
+                        'system_date': datetime.datetime(2026, 9, int(rng.integers(1, 31))), 'posting_date': None,
+                        'document_date': None, 'stock_type': stock_type, 'trans_code': 'T', 'log_order': log_order,
+                        'trans_title': str(rng.choice(IN_TITLES if stock_type == 1 else OUT_TITLES)),
+                        'quantity': float(rng.integers(1, 10)), 'value': float(rng.integers(10, 90)),
+                        'perpetual_current_quantity': float(rng.integers(1, 50)),
+                        'perpetual_current_value': float(rng.integers(1, 500)),
+                        'periodic_current_quantity': 0.0, 'periodic_current_value': 0.0,
+                        'lot_data': [], 'serial_data': [],
+                    })
+        logs.sort(key=lambda row: (row['system_date'], row['log_order']))
+        return costs, logs
+
+    @classmethod
+    def get_naive_sums(cls, obj, logs):
+        """ cách cũ: lọc log theo từng dòng báo cáo """
+        sums = [0, 0, 0, 0]
+        for log in logs:
+            if (
+                    log['product_id'] == obj.product_id and log['warehouse_id'] == obj.warehouse_id
+                    and log['physical_warehouse_id'] == obj.warehouse_id
+                    and log['system_date'].day in list(range(DATE_RANGE[0], DATE_RANGE[1] + 1))
+            ):
+                offset = 0 if log['stock_type'] == 1 else 2
+                sums[offset] += log['quantity']
+                sums[offset + 1] += log['value']
+        ratio = obj.product.inventory_uom.ratio
+        return [sums[0] / ratio, sums[1], sums[2] / ratio, sums[3]]
+
+    def handle(self, *args, **options):
+        costs, logs = self.get_data(options['products'], options['warehouses'], options['logs'])
+
+        start = time.perf_counter()
+        builder = ReportInvListBuilder(0, [1], DATE_RANGE)
+        builder.logs = ReportInvLogTable(logs)
+        result = [builder.get_inventory_cost_activities(obj) for obj in costs]
+        builder_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = [self.get_naive_sums(obj, logs) for obj in costs]
+        naive_duration = time.perf_counter() - start
+
+        keys = ('sum_in_quantity', 'sum_in_value', 'sum_out_quantity', 'sum_out_value')
+        diff = float(np.max(np.abs(np.array([[item[key] for key in keys] for item in result]) - np.array(expected))))
+        self.stdout.write(f'Rows: {len(costs)}, logs: {len(logs)}')
+        self.stdout.write(f'builder: {builder_duration * 1000:.1f} ms')
+        self.stdout.write(f'  naive: {naive_duration * 1000:.1f} ms, max diff: {diff}')
+        self.stdout.write(self.style.SUCCESS('Successfully benchmark inventory report.'))
@@ -0,0 +1,123 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.hrm.payroll.utils import PayrollEngine, PayrollFormulaPlan, PayrollTaxTable
+
+TAX_BRACKETS = [
+    (0, 5e6, 5), (5e6, 10e6, 10), (10e6, 18e6, 15), (18e6, 32e6, 20), (32e6, 52e6, 25), (52e6, 80e6, 30), (80e6, 0, 35),
+]
+CONSTANTS = {
+    'social_insurance_employee': 0.08, 'social_insurance_employer': 0.175, 'social_insurance_ceiling': 46.8e6,
+    'unemployment_insurance_employee': 0.01, 'unemployment_insurance_employer': 0.01,
+    'unemployment_insurance_ceiling': 99.2e6, 'health_insurance_employee': 0.015, 'health_insurance_employer': 0.03,
+    'union_insurance_employee': 0, 'union_insurance_employer': 0.02,
+    'personal_deduction': 11e6, 'dependent_deduction': 4.4e6,
+}
+SYSTEM_CODES = (
+    'employee_salary', 'insurance_salary', 'actual_work', 'shift_standard_work', 'employee_social_insurance',
+    'company_social_insurance', 'employee_health_insurance', 'company_health_insurance',
+    'employee_unemployment_insurance', 'company_unemployment_insurance', 'company_union_insurance',
+    'employee_personal_deduction', 'employee_dependant_deduction',
+)
+FORMULAS = (
+    ('work_salary', 'ROUND(IF(shift_standard_work > 0, employee_salary * actual_work / shift_standard_work, 0))'),
+    ('overtime_salary', 'ROUND(employee_salary / MAX(shift_standard_work, 1) / 8 * overtime_hour * 1.5)'),
+    ('gross_salary', 'work_salary + overtime_salary + allowance'),
+    ('insurance_total', 'employee_social_insurance + employee_health_insurance + employee_unemployment_insurance'),
+    ('taxable_income', 'MAX(gross_salary - insurance_total - employee_personal_deduction'
+                       ' - employee_dependant_deduction, 0)'),
+    ('income_tax', 'ROUND(TAX(taxable_income))'),
+    ('net_salary', 'gross_salary - insurance_total - income_tax - advance_salary'),
+    ('company_cost', 'gross_salary + company_social_insurance + company_health_insurance'
+                     ' + company_unemployment_insurance + company_union_insurance'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark payroll template computation on synthetic employees: vectorized engine (numpy) '
+        'vs per-employee evaluator. No data is written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, help='Total employees', default=10000)
+
+    @classmethod
+    def get_attribute_list(cls):
+        attribute_list = [{'code': 'employee_name', 'type': 1, 'source': 0, 'order': 0}]
+        attribute_list += [{'code': code, 'type': 0, 'source': 0} for code in SYSTEM_CODES]
+        attribute_list += [
+            {'code': code, 'type': 0, 'source': 1} for code in ('allowance', 'overtime_hour', 'advance_salary')
+        ]
+        attribute_list += [
+            {'code': code, 'type': 4, 'source': 2, 'formula_type': True, 'formula': formula}
+            for code, formula in FORMULAS
+        ]
+        for order, item in enumerate(attribute_list):
+            item['order'] = order
+        return attribute_list
+
+    @classmethod
+    def get_data(cls, total):
+        rng = np.random.default_rng(0)
+        keys = [f'E{idx}' for idx in range(total)]
+        system_data = {
+            'employee_name': [f'Employee {idx}' for idx in range(total)],
+            'employee_salary': rng.integers(5, 150, total) * 1e6,
+            'insurance_salary': rng.integers(5, 120, total) * 1e6,
+            'actual_work': rng.integers(0, 23, total),
+            'shift_standard_work': np.full(total, 22),
+            'dependant_number': rng.integers(0, 4, total),
+        }
+        inputs = {
+            key: {
+                'allowance': float(rng.integers(0, 5) * 1e6), 'overtime_hour': int(rng.integers(0, 20)),
+                'advance_salary': float(rng.integers(0, 3) * 1e6),
+            } for key in keys
+        }
+        return keys, system_data, inputs
+
+    @classmethod
+    def run_engine(cls, attribute_list, data, tax_table):
+        keys, system_data, inputs = data
+        start = time.perf_counter()
+        engine = PayrollEngine(
+            template_obj=SimpleNamespace(attribute_list=attribute_list), period_start=None, period_end=None,
+            inputs=inputs,
+        )
+        result = engine.compute(keys, system_data, CONSTANTS, tax_table)
+        rows = engine.to_rows(result, len(keys))
+        return result, rows, time.perf_counter() - start
+
+    @classmethod
+    def run_naive(cls, attribute_list, data, tax_table):
+        """ cách cũ: tính công thức theo từng nhân viên """
+        keys, system_data, inputs = data
+        start = time.perf_counter()
+        plan = PayrollFormulaPlan(attribute_list)
+        expected = []
+        for idx, key in enumerate(keys):
+            env = {**CONSTANTS, **inputs[key]}
+            env.update({code: values[idx] for code, values in system_data.items() if code != 'employee_name'})
+            expected.append(plan.evaluate_one(env, tax_table=tax_table))
+        return plan, expected, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        total = options['employees']
+        attribute_list = self.get_attribute_list()
+        data = self.get_data(total)
+        tax_table = PayrollTaxTable(TAX_BRACKETS)
+
+        result, rows, engine_duration = self.run_engine(attribute_list, data, tax_table)
+        plan, expected, naive_duration = self.run_naive(attribute_list, data, tax_table)
+
+        diff = max(
+            float(np.max(np.abs(result[code] - np.array([item[code] for item in expected])))) for code in plan.order
+        )
+        self.stdout.write(f'Employees: {total}, columns: {len(attribute_list)} ({len(plan.order)} formula)')
+        self.stdout.write(f'engine: {engine_duration * 1000:.1f} ms ({len(rows)} rows)')
+        self.stdout.write(f' naive: {naive_duration * 1000:.1f} ms, max diff: {diff}')
+        self.stdout.write(self.style.SUCCESS('Successfully benchmark payroll.'))
@@ -0,0 +1,163 @@
+import csv
+import io
+import time
+from types import SimpleNamespace
+
+from crum import impersonate
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.core.base.import_job import ImportFileReader, ImportJobRunner
+from apps.core.base.models import BaseItemUnit, ImportJob
+from apps.core.company.models import Company
+from apps.core.hr.models import Employee
+from apps.core.tenant.models import Tenant
+from apps.masterdata.saledata.models import (
+    Currency, Manufacturer, Price, Product, ProductCategory, ProductType, Tax, TaxCategory, UnitOfMeasure,
+    UnitOfMeasureGroup,
+)
+from apps.masterdata.saledata.serializers.fimport_product import ProductImportCreateSerializer
+from apps.masterdata.saledata.views.fimport_product import ProductImportList
+from apps.shared.extends.tests import bulk_new
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark product import: per-row serializer (API import from FE, 1 request / row) vs background import job '
+        '(chunked many=True validation + bulk_create). Data is created in a transaction and rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, help='Total products in the file', default=20000)
+        parser.add_argument('--chunk-size', type=int, help='Import job chunk size', default=500)
+        parser.add_argument(
+            '--per-row', type=int, default=1000,
+            help='Rows imported per-row (~30 queries / row), time for all products is estimated from it; 0: all',
+        )
+
+    def setup_data(self):
+        tenant = bulk_new(Tenant, title='Benchmark', code='BENCH_IMPORT')
+        company = bulk_new(Company, title='Benchmark', code='BENCH_IMPORT', tenant=tenant)
+        common = {'tenant': tenant, 'company': company}
+        employee = bulk_new(Employee, first_name='Benchmark', last_name='Import', code='BENCH_IMPORT', **common)
+        uom_group = bulk_new(UnitOfMeasureGroup, title='Unit', code='UG', **common)
+        bulk_new(UnitOfMeasure, title='Piece', code='UOM', group=uom_group, is_referenced_unit=True, **common)
+        for code in ('PT1', 'PT2'):
+            bulk_new(ProductType, title=code, code=code, **common)
+        bulk_new(ProductCategory, title='Category', code='CAT', **common)
+        bulk_new(Manufacturer, title='Manufacturer', code='MF', **common)
+        bulk_new(
+            Tax, title='VAT 10%', code='VAT10', rate=10, tax_type=2, **common,
+            category=bulk_new(TaxCategory, title='VAT', code='VAT', **common),
+        )
+        bulk_new(Currency, title='VND', code='VND', abbreviation='VND', is_primary=True, **common)
+        default_price = bulk_new(
+            Price, title='General', code='PRICE', factor=1, price_list_type=0, is_default=True, **common
+        )
+        for idx in range(2):
+            bulk_new(
+                Price, title=f'Auto {idx}', code=f'PRICE_{idx}', factor=1 + idx / 10, price_list_type=0,
+                auto_update=True, price_list_mapped=default_price, **common
+            )
+        for title, measure in (('volume', 'm³'), ('weight', 'kg')):
+            if not BaseItemUnit.objects.filter(title=title).exists():
+                bulk_new(BaseItemUnit, title=title, measure=measure)
+        return tenant, company, employee
+
+    @classmethod
+    def get_rows(cls, prefix, total):
+        return [
+            {
+                'code': f'{prefix}{idx:06d}', 'title': f'Product {idx}', 'part_number': '', 'product_choice': '0,1,2',
+                'general_product_category': 'CAT', 'general_product_types_mapped': 'PT1,PT2',
+                'general_uom_group': 'UG', 'general_manufacturer': 'MF', 'volume': '1.5', 'weight': '2',
+                'sale_default_uom': 'UOM', 'sale_tax': 'VAT10', 'sale_general_price': str(1000 + idx),
+                'inventory_uom': 'UOM', 'valuation_method': '1', 'standard_price': '500',
+                'purchase_default_uom': 'UOM', 'purchase_tax': 'VAT10', 'supplied_by': '0',
+            } for idx in range(total)
+        ]
+
+    @classmethod
+    def to_csv(cls, rows) -> io.BytesIO:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+        return io.BytesIO(buffer.getvalue().encode('utf-8-sig'))
+
+    def run_per_row(self, runner, user, rows):
+        success = 0
+        with impersonate(user):
+            for row in rows:
+                serializer = ProductImportCreateSerializer(data=runner.handler.parse_row(row))
+                if serializer.is_valid():
+                    serializer.save(**runner.handler.extras)
+                    success += 1
+        return success
+
+    @classmethod
+    def run_job(cls, runner, file_obj, chunk_size):
+        success, chunk = 0, []
+        runner.handler.prefetch()
+        for _row_number, row in ImportFileReader(file_obj, 'product.csv'):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                success += sum(1 for status, _errors in runner.run_chunk(chunk) if status == runner.STATUS_SUCCESS)
+                chunk = []
+        if chunk:
+            success += sum(1 for status, _errors in runner.run_chunk(chunk) if status == runner.STATUS_SUCCESS)
+        return success
+
+    @classmethod
+    def measure(cls, func, *args):
+        """ Returns: (kết quả, thời gian chạy, số query) """
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            start = time.perf_counter()
+            result = func(*args)
+            duration = time.perf_counter() - start
+        return result, duration, queries.count
+
+    def write_result(self, company, total, per_row_total, per_row_result, job_result):
+        per_row_success, per_row_duration, per_row_queries = per_row_result
+        job_success, job_duration, job_queries = job_result
+        self.stdout.write(
+            f'per-row: {per_row_duration:.2f}s, {per_row_queries} queries, {per_row_success} imported'
+            f' => {total} products: ~{per_row_duration / per_row_total * total:.1f}s,'
+            f' ~{per_row_queries // per_row_total * total} queries'
+        )
+        self.stdout.write(f'    job: {job_duration:.2f}s, {job_queries} queries, {job_success} imported')
+        self.stdout.write(f'products in db: {Product.objects.filter(company=company).count()} (rolled back)')
+
+    def handle(self, *args, **options):
+        total, chunk_size = options['products'], options['chunk_size']
+        per_row_total = min(options['per_row'] or total, total)
+        with transaction.atomic():
+            tenant, company, employee = self.setup_data()
+            user = SimpleNamespace(tenant_current_id=tenant.id, company_current_id=company.id, space_current_id=None)
+            runner = ImportJobRunner(
+                job=bulk_new(
+                    ImportJob, import_code='ProductImportList', chunk_size=chunk_size, tenant=tenant,
+                    company=company, employee_created=employee,
+                ),
+                view_class=ProductImportList,
+            )
+            per_row_result = self.measure(self.run_per_row, runner, user, self.get_rows('ROW', per_row_total))
+            job_result = self.measure(self.run_job, runner, self.to_csv(self.get_rows('JOB', total)), chunk_size)
+
+            self.stdout.write(
+                f'Products: {total}, chunk size: {chunk_size}, '
+                f'price lists / product: {Price.objects.filter(company=company).count()}'
+            )
+            self.write_result(company, total, per_row_total, per_row_result, job_result)
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Successfully benchmark product import.'))
@@ -0,0 +1,139 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.core.base.models import ApplicationProperty
+from apps.core.company.models import Company
+from apps.core.hr.models import Employee
+from apps.core.workflow.models import (
+    Workflow, Node, Association, Zone, ZoneProperties, CollabInWorkflow, CollabInWorkflowZone,
+    CollabInWorkflowZoneHidden,
+)
+from apps.core.workflow.utils.plan import ConditionEvaluator, WorkflowPlan
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark config reads per approval step (next association + node + collaborators/zones) '
+        'of a temporary workflow: direct queries vs compiled workflow plan. All data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company_id', type=str, help='Company ID', required=True)
+        parser.add_argument('--nodes', type=int, help='Total nodes of workflow', default=20)
+        parser.add_argument('--loops', type=int, help='Number of runs through the workflow', default=5)
+
+    @classmethod
+    def create_zones(cls, workflow, common):
+        properties = list(ApplicationProperty.objects.all()[:6])
+        zones = []
+        for idx in range(3):
+            zone = Zone.objects.create(workflow=workflow, title=f'Zone {idx}', order=idx + 1, **common)
+            ZoneProperties.objects.bulk_create([ZoneProperties(zone=zone, app_property=obj) for obj in properties])
+            zones.append(zone)
+        return zones
+
+    @classmethod
+    def create_nodes(cls, workflow, node_total, employee_obj, zones, common):
+        nodes = [Node.objects.create(
+            workflow=workflow, title='Initial', is_system=True, code_node_system='initial', order=1, **common
+        )]
+        for idx in range(max(node_total - 3, 1)):
+            node = Node.objects.create(
+                workflow=workflow, title=f'Approve {idx}', option_collaborator=2, order=idx + 2, actions=[1, 2, 3],
+                **common,
+            )
+            collab = CollabInWorkflow.objects.create(
+                node=node, in_wf_option=2, employee=employee_obj, **common
+            )
+            CollabInWorkflowZone.objects.bulk_create([CollabInWorkflowZone(collab=collab, zone=zone) for zone in zones])
+            CollabInWorkflowZoneHidden.objects.create(collab=collab, zone=zones[0])
+            nodes.append(node)
+        for code in ('approved', 'completed'):
+            nodes.append(Node.objects.create(
+                workflow=workflow, title=code, is_system=True, code_node_system=code, order=len(nodes) + 1, **common
+            ))
+        return nodes
+
+    @classmethod
+    def create_workflow(cls, company_obj, node_total):
+        common = {'tenant_id': company_obj.tenant_id, 'company_id': company_obj.id}
+        employee_obj = Employee.objects.filter(company_id=company_obj.id).first()
+        workflow = Workflow.objects.create(title='Benchmark workflow plan', code='benchmark', **common)
+        zones = cls.create_zones(workflow, common)
+        nodes = cls.create_nodes(workflow, node_total, employee_obj, zones, common)
+        for node_in, node_out in zip(nodes[:-1], nodes[1:]):
+            # 2 nhánh ra: nhánh chính (total >= 0) + nhánh không bao giờ thỏa (total < 0)
+            for condition in (
+                    [{'left': 'total', 'math': '>=', 'right': 0, 'type': 'number'}, 'AND'],
+                    [{'left': 'total', 'math': '<', 'right': 0, 'type': 'number'}, 'AND'],
+            ):
+                Association.objects.create(
+                    workflow=workflow, node_in=node_in, node_out=node_out, condition=condition, **common
+                )
+        return workflow, nodes
+
+    @classmethod
+    def get_zone_data(cls, zone_objs):
+        return [WorkflowPlan.parse_zone(zone_obj) for zone_obj in zone_objs]
+
+    @classmethod
+    def step_query(cls, workflow, node_id, params):
+        # đọc cấu hình trực tiếp từ DB (cách runtime đọc trước khi có plan)
+        association_passed = [
+            obj for obj in Association.objects.filter(workflow_id=workflow.id, node_in_id=node_id)
+            if ConditionEvaluator.check(obj.condition, params)
+        ]
+        node_out = association_passed[0].node_out
+        collab_data = [
+            (cls.get_zone_data(collab.zone.all()), cls.get_zone_data(collab.zone_hidden.all()))
+            for collab in CollabInWorkflow.objects.filter(node=node_out)
+        ]
+        return node_out.id, collab_data
+
+    @classmethod
+    def step_plan(cls, workflow, node_id, params):
+        plan = WorkflowPlan.get(workflow)
+        node_out = plan.get_next(node_id, params=params).node_out
+        collab_data = [
+            (plan.get_zones(collab.zone), plan.get_zones(collab.zone_hidden))
+            for collab in plan.get_collab_in_wf(node_out.id)
+        ]
+        return node_out.id, collab_data
+
+    def run_steps(self, step_func, workflow, nodes, loops):
+        params = {'total': 100}
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            step_total = 0
+            for _idx in range(loops):
+                for node in nodes[:-2]:
+                    step_func(workflow, node.id, params)
+                    step_total += 1
+            duration = time.perf_counter() - start
+        return len(context.captured_queries) / step_total, duration * 1000 / step_total
+
+    def handle(self, *args, **options):
+        company_obj = Company.objects.get(id=options['company_id'])
+        with transaction.atomic():
+            workflow, nodes = self.create_workflow(company_obj, options['nodes'])
+            WorkflowPlan.clear()
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                WorkflowPlan.get(workflow)
+                compile_ms = (time.perf_counter() - start) * 1000
+            results = {
+                'query': self.run_steps(self.step_query, workflow, nodes, options['loops']),
+                'plan': self.run_steps(self.step_plan, workflow, nodes, options['loops']),
+            }
+            transaction.set_rollback(True)
+        WorkflowPlan.clear()
+
+        self.stdout.write(
+            f'Workflow: {len(nodes)} nodes, compile plan: {len(context.captured_queries)} queries, {compile_ms:.2f} ms'
+        )
+        for key, (query_count, latency) in results.items():
+            self.stdout.write(f'{key:>6}: {query_count:.1f} queries / approval, {latency:.3f} ms / approval')
+        self.stdout.write(self.style.SUCCESS('Successfully benchmark workflow plan.'))
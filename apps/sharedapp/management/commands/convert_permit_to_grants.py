@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from apps.core.hr.models import EmployeePermission, RolePermission
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert legacy permission_by_id / permission_by_opp / permission_by_project (JSON) to hr.PermissionGrant '
+        'and reduce permissions_parsed to the general part. Safe to re-run (existing grants are kept). '
+        'Until converted, the legacy JSON is still merged into permissions_parsed on every recompute.'
+    )
+
+    def handle(self, *args, **options):
+        legacy_filter = ~(Q(permission_by_id={}) & Q(permission_by_opp={}) & Q(permission_by_project={}))
+        grant_count = 0
+        for obj in EmployeePermission.objects.select_related('employee').filter(legacy_filter):
+            grant_count += obj.convert_legacy_grants(tenant_id=obj.employee.tenant_id)
+        for obj in RolePermission.objects.select_related('role').filter(legacy_filter):
+            grant_count += obj.convert_legacy_grants(tenant_id=obj.role.tenant_id)
+        self.stdout.write(self.style.SUCCESS(f'Successfully convert permit to grants ({grant_count} grants).'))
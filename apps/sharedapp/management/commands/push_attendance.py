@@ -0,0 +1,35 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from apps.core.company.models import Company
+from apps.hrm.attendance.models.attendance import Attendance
+
+
+class Command(BaseCommand):
+    help = 'Recompute attendance of all employees in a company for a date range from stored access logs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company_id', type=str, help='Company ID', required=True)
+        parser.add_argument('--date_from', type=str, help='Date from (YYYY-MM-DD)', required=True)
+        parser.add_argument('--date_to', type=str, help='Date to (YYYY-MM-DD), default = date_from')
+        parser.add_argument('--workers', type=int, help='Number of processes to compute shifts', default=None)
+
+    def handle(self, *args, **options):
+        company_obj = Company.objects.get(id=options['company_id'])
+        date_from = date.fromisoformat(options['date_from'])
+        date_to = date.fromisoformat(options['date_to']) if options['date_to'] else date_from
+        dates = [
+            (date_from + timedelta(days=idx)).isoformat() for idx in range((date_to - date_from).days + 1)
+        ]
+        attendance_objs = Attendance.push_attendance_data_range(
+            dates=dates,
+            tenant_id=company_obj.tenant_id,
+            company_id=company_obj.id,
+            push_log=False,
+            workers=options['workers'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully push attendance ({len(dates)} days, {len(attendance_objs)} records).'
+            )
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from apps.sales.report.utils.inventory_replay import ReportInvReplay
+
+
+class Command(BaseCommand):
+    help = 'Rebuild inventory report (stock logs, costs, period balances) of a company from approved documents.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company_id', type=str, help='Company ID', required=True)
+        parser.add_argument(
+            '--product_ids',
+            type=str,
+            help='only rebuild these products. commas between any product id',
+            default='', required=False,
+        )
+        parser.add_argument('--workers', type=int, help='Number of worker processes', default=1, required=False)
+
+    def handle(self, *args, **options):
+        product_ids = [item.strip() for item in options['product_ids'].split(',') if item.strip()]
+
+        def progress(done_docs, total_docs):
+            self.stdout.write(f'...{done_docs}/{total_docs} doc(s)')
+
+        done_docs = ReportInvReplay(
+            options['company_id'],
+            product_ids=product_ids or None,
+            workers=options['workers'],
+            progress_callback=progress
+        ).run()
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuild inventory report ({done_docs} doc(s)).'))
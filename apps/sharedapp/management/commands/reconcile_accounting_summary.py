@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from apps.accounting.accountingsettings.models import ChartOfAccountsSummarize
+from apps.accounting.journalentry.models import JournalEntrySummarize
+
+
+class Command(BaseCommand):
+    help = 'Rebuild journal entry summarize + chart of accounts summarize of a company from journal entry lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company_id', type=str, help='Company ID', required=True)
+
+    def handle(self, *args, **options):
+        company_id = options['company_id']
+        je_summarize_obj = JournalEntrySummarize.rebuild(company_id)
+        account_count = ChartOfAccountsSummarize.rebuild(company_id)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully reconcile accounting summarize ({je_summarize_obj.total_je_doc} journal entries, '
+                f'{account_count} accounts).'
+            )
+        )
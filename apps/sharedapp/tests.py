@@ -0,0 +1,278 @@
+import gc
+import uuid
+from types import SimpleNamespace
+from importlib import import_module
+from unittest import mock
+
+from django.conf import settings
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+
+from apps.core.account.models import User
+from apps.core.account.views import UserList, UserOfTenantList
+from apps.core.base.models import BaseItemUnit, City, Country, District, IndicatorParam
+from apps.core.base.views import BaseItemUnitList, CityList, CountryList, DistrictList, IndicatorParamList
+from apps.core.company.models import Company, CompanyUserEmployee
+from apps.core.hr.models import Employee, Group, GroupLevel
+from apps.core.hr.views.employee import EmployeeList, EmployeeTenantList
+from apps.core.hr.views.group import GroupLevelList
+from apps.core.tenant.models import Tenant
+from apps.masterdata.saledata.models import Account, AccountEmployee, Product, ProductWareHouse, WareHouse
+from apps.masterdata.saledata.views.accounts import AccountDDList
+from apps.masterdata.saledata.views.product import ProductList
+from apps.masterdata.saledata.views.warehouse import WareHouseList
+from apps.shared.extends.caching import Caching, LIST_CACHE_TABLES
+from apps.shared.extends.mixins import BaseListMixin
+from apps.shared.extends.models import bulk_table_generation, table_generation_handler
+from apps.shared.extends.tests import bulk_new
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CachingGenerationTestCase(TestCase):
+    def setUp(self):
+        self.caching = Caching()
+        self.caching.sv_cache.clear()
+        self.key_employee = Caching.key_cache_table(table_name='hr_employee', string_key='list')
+        self.key_product = Caching.key_cache_table(table_name='saledata_product', string_key='list')
+        self.caching.set(self.key_employee, 'employee')
+        self.caching.set(self.key_product, 'product')
+
+    def test_bump_table_generation(self):
+        self.caching.bump_table_generation('hr_employee')
+        self.assertIsNone(self.caching.get(self.key_employee))
+        self.assertEqual(self.caching.get(self.key_product), 'product')
+
+    def test_bump_table_ref(self):
+        # account_user tăng kèm hr_employee (TABLE_REF)
+        self.assertIn('hr_employee', self.caching.bump_table_generation('account_user'))
+        self.assertIsNone(self.caching.get(self.key_employee))
+        self.assertEqual(self.caching.get(self.key_product), 'product')
+
+    def test_clean_global(self):
+        self.caching.set('no_table_key', 'value')
+        self.caching.management.clean()
+        self.assertIsNone(self.caching.get('no_table_key'))
+        self.assertEqual(self.caching.get_many([self.key_employee, self.key_product]), {})
+
+    def test_generation_evicted(self):
+        # generation bị evict => khởi tạo lại lớn hơn generation cũ, key cũ không đọc lại được
+        key_parsed = self.caching.set(self.key_product, 'product')
+        self.caching.bump_table_generation('saledata_product')
+        self.caching.sv_cache.delete(Caching.key_table_generation('saledata_product'))
+        self.assertNotEqual(self.caching.generation_key(self.key_product), key_parsed)
+        self.assertIsNone(self.caching.get(self.key_product))
+
+    def test_scope_generation(self):
+        tenant_id, company_a, company_b = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+        def get_generations():
+            return {
+                scope: self.caching.get_table_generations(['saledata_product'], tenant_id, scope)['saledata_product']
+                for scope in (company_a, company_b, None)
+            }
+
+        before = get_generations()
+        self.caching.bump_table_generation('saledata_product', tenant_id=tenant_id, company_id=company_a)
+        after = get_generations()
+        # company A + generation chung của các company tăng, company B và generation bảng giữ nguyên
+        self.assertNotEqual(after[company_a], before[company_a])
+        self.assertEqual(after[company_a][0], before[company_a][0])
+        self.assertEqual(after[company_b], before[company_b])
+        self.assertNotEqual(after[None], before[None])
+        # key không theo company (key_cache_table) hết hiệu lực khi company bất kỳ ghi
+        self.assertIsNone(self.caching.get(self.key_product))
+        self.caching.set(self.key_product, 'product')
+
+        # ghi không có company => mọi company hết hiệu lực
+        self.caching.bump_table_generation('saledata_product')
+        self.assertTrue(all(get_generations()[scope][0] != after[scope][0] for scope in after))
+        self.assertIsNone(self.caching.get(self.key_product))
+
+    @override_settings(CACHE_ENABLED=True)
+    def test_handler_expires_plain_keys(self):
+        # model có company: signal vẫn làm hết hiệu lực key_cache_table của bảng (không chỉ key list)
+        with self.captureOnCommitCallbacks(execute=True):
+            table_generation_handler(
+                sender=Product, instance=SimpleNamespace(tenant_id=uuid.uuid4(), company_id=uuid.uuid4())
+            )
+        self.assertIsNone(self.caching.get(self.key_product))
+        self.assertEqual(self.caching.get(self.key_employee), 'employee')
+
+    @override_settings(CACHE_ENABLED=True)
+    def test_handler_uses_instance_scope(self):
+        tenant_id, company_id = uuid.uuid4(), uuid.uuid4()
+        with mock.patch.object(Caching, 'bump_table_generation') as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                table_generation_handler(
+                    sender=Product, instance=SimpleNamespace(tenant_id=tenant_id, company_id=company_id)
+                )
+        bump.assert_called_once_with(table_name='saledata_product', tenant_id=tenant_id, company_id=company_id)
+
+    @override_settings(CACHE_ENABLED=True)
+    def test_list_cache_key_by_company(self):
+        class ProductList(BaseListMixin):
+            queryset = Product.objects.all()
+            use_cache_queryset = True
+
+        view = ProductList()
+        view.request = SimpleNamespace(path='/api/product/list', query_params=QueryDict('page=1'))
+        tenant_id, company_a, company_b = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+        def get_keys():
+            return [
+                view.get_list_cache_key(False, {'tenant_id': tenant_id, 'company_id': company_id})
+                for company_id in (company_a, company_b)
+            ]
+
+        key_a, key_b = get_keys()
+        self.assertNotEqual(key_a, key_b)
+        self.caching.bump_table_generation('saledata_product', tenant_id=tenant_id, company_id=company_a)
+        new_key_a, new_key_b = get_keys()
+        self.assertNotEqual(new_key_a, key_a)
+        self.assertEqual(new_key_b, key_b)
+
+    @override_settings(CACHE_ENABLED=True)
+    def test_bulk_table_generation(self):
+        # bulk_create không phát signal => tăng generation thủ công, chỉ cho bảng đã nối signal
+        with mock.patch('apps.shared.extends.models.TABLE_GENERATION_WATCHED', {'hr_employee'}):
+            with self.captureOnCommitCallbacks(execute=True):
+                bulk_table_generation(Employee, Product)
+        self.assertIsNone(self.caching.get(self.key_employee))
+        self.assertEqual(self.caching.get(self.key_product), 'product')
+
+    @override_settings(CACHE_ENABLED=True)
+    def test_bulk_table_generation_scope(self):
+        tenant_id, company_a, company_b = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        before = {
+            company_id: self.caching.get_table_generations(['hr_employee'], tenant_id, company_id)['hr_employee']
+            for company_id in (company_a, company_b)
+        }
+        with mock.patch('apps.shared.extends.models.TABLE_GENERATION_WATCHED', {'hr_employee'}):
+            with self.captureOnCommitCallbacks(execute=True):
+                bulk_table_generation(Employee, tenant_id=tenant_id, company_id=company_a)
+        self.assertNotEqual(
+            self.caching.get_table_generations(['hr_employee'], tenant_id, company_a)['hr_employee'], before[company_a]
+        )
+        self.assertEqual(
+            self.caching.get_table_generations(['hr_employee'], tenant_id, company_b)['hr_employee'], before[company_b]
+        )
+        self.assertIsNone(self.caching.get(self.key_employee))
+
+
+@override_settings(
+    CACHE_ENABLED=True, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+)
+class ListCacheViewTestCase(TestCase):
+    """ mỗi view list bật cache: ghi vào bảng mà page list đọc => key cache list đổi (page cũ không được trả lại) """
+
+    def setUp(self):
+        Caching().sv_cache.clear()
+        self.tenant = bulk_new(Tenant, title='Tenant', code='TENANT_LIST_CACHE')
+        self.company = bulk_new(
+            Company, title='Company', code='COMPANY_LIST_CACHE', sub_domain='company-list-cache', tenant=self.tenant
+        )
+        self.common = {'tenant': self.tenant, 'company': self.company}
+        self.employee = bulk_new(Employee, first_name='List', last_name='Cache', code='EMP_LIST_CACHE', **self.common)
+        self.user = bulk_new(User, username='list-cache', email='list-cache@test.com', tenant_current=self.tenant)
+        self.scope = {'tenant_id': self.tenant.id, 'company_id': self.company.id}
+
+    def get_key(self, view_cls, filter_kwargs, query_params='page=1', permit_cls=None):
+        view = view_cls()
+        view.request = SimpleNamespace(
+            path='/list', query_params=QueryDict(query_params), user=SimpleNamespace(employee_current=None)
+        )
+        if permit_cls:
+            view.cls_check = SimpleNamespace(permit_cls=permit_cls)
+        return view.get_list_cache_key(False, filter_kwargs)
+
+    def assert_key_changed(self, view_cls, filter_kwargs, write):
+        key = self.get_key(view_cls, filter_kwargs)
+        self.assertIsNotNone(key, view_cls.__name__)
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        self.assertNotEqual(self.get_key(view_cls, filter_kwargs), key, view_cls.__name__)
+
+    def test_static_tables_cover_views(self):
+        # signal nối theo LIST_CACHE_TABLES (không import view lúc khởi động) => phải đủ bảng của mọi view bật cache
+        import_module(settings.ROOT_URLCONF)
+        # view tạm khai báo trong test khác (vd: ProductList) vẫn là subclass tới khi bị gc thu hồi
+        gc.collect()
+        self.assertEqual(BaseListMixin.get_all_list_cache_tables() - LIST_CACHE_TABLES, set())
+
+    def test_user_list(self):
+        cue = bulk_new(CompanyUserEmployee, company=self.company, user=self.user, employee=self.employee)
+        for view_cls, filter_kwargs in [
+            (UserList, {'id__in': [self.user.id]}), (UserOfTenantList, {'tenant_current_id': self.tenant.id}),
+        ]:
+            self.assert_key_changed(view_cls, filter_kwargs, self.user.save)
+            self.assert_key_changed(view_cls, filter_kwargs, cue.save)
+
+    def test_employee_list(self):
+        group = bulk_new(Group, title='Group', code='GROUP_LIST_CACHE', **self.common)
+        for view_cls, filter_kwargs in [(EmployeeList, self.scope), (EmployeeTenantList, {'tenant_id': self.tenant.id})]:
+            self.assert_key_changed(view_cls, filter_kwargs, self.employee.save)
+            self.assert_key_changed(view_cls, filter_kwargs, group.save)
+
+    def test_group_level_list(self):
+        group_level = bulk_new(GroupLevel, level=1, description='Level 1', **self.common)
+        self.assert_key_changed(GroupLevelList, self.scope, group_level.save)
+
+    def test_base_list(self):
+        country = bulk_new(Country, title='Viet Nam', code_2='VN', code_3='VNM')
+        city = bulk_new(City, country=country, title='Ha Noi', id_crawler=1)
+        for view_cls, obj in [
+            (CountryList, country),
+            (CityList, city),
+            (DistrictList, bulk_new(District, city=city, title='Ba Dinh', id_crawler=1)),
+            (BaseItemUnitList, bulk_new(BaseItemUnit, title='Kg', measure='weight')),
+            (IndicatorParamList, bulk_new(IndicatorParam, title='Param', code='PARAM_LIST_CACHE')),
+        ]:
+            self.assert_key_changed(view_cls, {}, obj.save)
+
+    def test_warehouse_list(self):
+        warehouse = bulk_new(WareHouse, title='Warehouse', code='WH_LIST_CACHE', **self.common)
+        self.assert_key_changed(WareHouseList, self.scope, warehouse.save)
+
+    def test_permit_key(self):
+        # key theo version snapshot quyền + simple_list, không theo str(Q) (Exists của 'id__grant' khác mỗi request)
+        def get_permit(version):
+            return SimpleNamespace(
+                employee_attr=SimpleNamespace(snapshot_version=version),
+                config_data__simple_list=[
+                    {'id__grant': {'permit_code': 'saledata.warehouse.view', 'employee_id': str(self.employee.id)}},
+                ],
+            )
+
+        key = self.get_key(WareHouseList, self.scope, permit_cls=get_permit('1-1'))
+        self.assertIsNotNone(key)
+        self.assertEqual(self.get_key(WareHouseList, self.scope, permit_cls=get_permit('1-1')), key)
+        # grant / role thay đổi => version snapshot tăng => key đổi
+        self.assertNotEqual(self.get_key(WareHouseList, self.scope, permit_cls=get_permit('1-2')), key)
+        # list gọi từ app khác lọc theo dữ liệu ngoài snapshot => không cache
+        self.assertIsNone(
+            self.get_key(
+                WareHouseList, self.scope, query_params='list_from_app=sales.opportunity.view',
+                permit_cls=get_permit('1-1'),
+            )
+        )
+
+    def test_product_list(self):
+        product = bulk_new(Product, title='Product', code='PRD_LIST_CACHE', **self.common)
+        warehouse = bulk_new(WareHouse, title='Warehouse', code='WH_PRD_LIST_CACHE', **self.common)
+        product_warehouse = bulk_new(ProductWareHouse, product=product, warehouse=warehouse, **self.common)
+
+        def update_stock():
+            # xuất kho cập nhập tồn bằng bulk_update => bulk_table_generation thay signal
+            product_warehouse.stock_amount = 5
+            ProductWareHouse.objects.bulk_update([product_warehouse], fields=['stock_amount'])
+            bulk_table_generation(ProductWareHouse, **self.scope)
+
+        self.assert_key_changed(ProductList, self.scope, product.save)
+        self.assert_key_changed(ProductList, self.scope, product_warehouse.save)
+        self.assert_key_changed(ProductList, self.scope, update_stock)
+
+    def test_account_dd_list(self):
+        account = bulk_new(Account, name='Account', code='ACC_LIST_CACHE', **self.common)
+        account_employee = bulk_new(AccountEmployee, account=account, employee=self.employee)
+        self.assert_key_changed(AccountDDList, self.scope, account.save)
+        self.assert_key_changed(AccountDDList, self.scope, account_employee.save)
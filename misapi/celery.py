@@ -46,4 +46,8 @@ app.conf.beat_schedule = {
         'task': 'apps.sales.task.tasks.summary_task_by_change_daily',
         'schedule': crontab(hour=0, minute=1),
     },
+    'open-inventory-sub-period-each-month': {
+        'task': 'apps.sales.report.tasks.open_inventory_sub_period',
+        'schedule': crontab(minute=5, hour=0, day_of_month=1, month_of_year='*', day_of_week='*'),
+    },
 }